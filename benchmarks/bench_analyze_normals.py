@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+翻转面检测基准：analyze_normals 逐面遍历（旧实现）vs NumPy 向量化（共享边配对）
+
+用法（项目根目录）::
+
+    python benchmarks/bench_analyze_normals.py [--size 100 --size 300 --size 600] [--flip 0.02]
+                                               [--tris] [--prim-n] [--seed 3]
+
+使用 benchmarks/mock_hou.py 的 hou 替身构建 size×size 的起伏网格（--tris 时每个四边形
+拆成两个三角形，--prim-n 时附带面属性 N），按 --flip 比例随机翻转面的顶点顺序。
+
+  old : 原实现（共享点邻接 + Python 点积，检查量受 max_sample=200000 限制）
+  new : 批量读取 P / 面 N 与拓扑，按共享边排序配对，一次算出全部点积
+
+基准值由纯 Python 边表独立计算：共享边的两个面中恰有一个被翻转的面对数。
+new 必须与基准值一致；old 按共享点统计（对角相邻也计入），且大网格会被截断。
+"""
+
+import os
+import sys
+import math
+import time
+import random
+import argparse
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_hou import MockHou  # noqa: E402
+
+mock = MockHou()
+sys.modules["hou"] = mock  # analyze_normals.run() 内部 import hou
+
+from houdini_agent.skills import analyze_normals  # noqa: E402
+
+
+def build_grid(size, flip_ratio, tris, prim_n, rng):
+    """起伏网格：返回 (几何体, 每个面是否被翻转)"""
+    points = []
+    for j in range(size + 1):
+        for i in range(size + 1):
+            x, y = i / size, j / size
+            points.append((x, y, 0.05 * math.sin(x * 9.0) * math.cos(y * 7.0)))
+    prims = []
+    for j in range(size):
+        for i in range(size):
+            a = j * (size + 1) + i
+            b, c, d = a + 1, a + size + 2, a + size + 1
+            prims.extend([(a, b, c), (a, c, d)] if tris else [(a, b, c, d)])
+    flipped = [rng.random() < flip_ratio for _ in prims]
+    prims = [tuple(reversed(p)) if f else p for p, f in zip(prims, flipped)]
+    geo = mock.geometry(points, prims)
+    if prim_n:
+        geo.add_attrib("prim", "N", [_face_normal(points, p) for p in prims])
+    return geo, flipped
+
+
+def _face_normal(points, prim):
+    p0, p1, p2 = (points[k] for k in prim[:3])
+    e1 = [p1[k] - p0[k] for k in range(3)]
+    e2 = [p2[k] - p0[k] for k in range(3)]
+    n = (e1[1] * e2[2] - e1[2] * e2[1], e1[2] * e2[0] - e1[0] * e2[2], e1[0] * e2[1] - e1[1] * e2[0])
+    length = math.sqrt(sum(c * c for c in n)) or 1.0
+    return tuple(c / length for c in n)
+
+
+def expected_flips(geo, flipped):
+    """纯 Python 边表：共享边且翻转状态不同的面对数"""
+    edges = {}
+    for idx, prim in enumerate(geo._prims):
+        for k in range(len(prim)):
+            a, b = prim[k], prim[(k + 1) % len(prim)]
+            edges.setdefault((min(a, b), max(a, b)), set()).add(idx)
+    pairs = set()
+    for owners in edges.values():
+        owners = sorted(owners)
+        for x in range(len(owners)):
+            for y in range(x + 1, len(owners)):
+                pairs.add((owners[x], owners[y]))
+    return sum(1 for a, b in pairs if flipped[a] != flipped[b]), len(pairs)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--size", type=int, action="append", help="网格边长（可多次指定）")
+    ap.add_argument("--flip", type=float, default=0.02, help="翻转面比例")
+    ap.add_argument("--tris", action="store_true", help="使用三角形网格")
+    ap.add_argument("--prim-n", action="store_true", help="附带面属性 N")
+    ap.add_argument("--threshold", type=float, default=120.0)
+    ap.add_argument("--max-sample", type=int, default=200000)
+    ap.add_argument("--seed", type=int, default=3)
+    args = ap.parse_args()
+    sizes = args.size or [100, 300, 600]
+    cos_t = math.cos(math.radians(args.threshold))
+
+    print(f"\n翻转比例 {args.flip:.0%}，阈值 {args.threshold:.0f}°，"
+          f"{'三角形' if args.tris else '四边形'}{'，面属性 N' if args.prim_n else ''}")
+    print(f"  {'面数':>9}  {'方式':<5}{'耗时':>10}{'hou 调用':>11}{'检查面对':>10}{'翻转面对':>10}{'基准值':>9}")
+    analyze_normals._check_flipped_faces_np(build_grid(4, 0.5, False, False, random.Random(0))[0], cos_t, np)  # 预热
+    ok = True
+    for size in sizes:
+        rng = random.Random(args.seed)
+        geo, flipped = build_grid(size, args.flip, args.tris, args.prim_n, rng)
+        prim_count = len(geo._prims)
+        truth, _ = expected_flips(geo, flipped)
+        for name in ("old", "new"):
+            mock.calls = 0
+            t0 = time.perf_counter()
+            if name == "old":
+                found, checked = analyze_normals._check_flipped_faces_py(geo, prim_count, cos_t, args.max_sample)
+            else:
+                found, checked = analyze_normals._check_flipped_faces_np(geo, cos_t, np)
+            elapsed = time.perf_counter() - t0
+            print(f"  {prim_count:>9}  {name:<5}{elapsed * 1000:>8.1f}ms{mock.calls:>11}"
+                  f"{checked:>10}{found:>10}{truth:>9}")
+            if name == "new" and found != truth:
+                ok = False
+
+    # 完整 Skill 调用（点 N + 翻转面），确认集成路径
+    node = mock.node("/obj").createNode("geo", "bench_geo").createNode("box", "mesh")
+    geo, _ = build_grid(sizes[0], args.flip, args.tris, args.prim_n, random.Random(args.seed))
+    geo.add_attrib("point", "N", [(0.0, 0.0, 1.0)] * (len(geo._P) // 3))
+    node.setGeometry(geo)
+    result = analyze_normals.run(node.path())
+    flips = [i for i in result["issues"] if i["type"] == "FLIPPED_FACES"]
+    print(f"\nrun({node.path()}): status={result['summary']['status']}, "
+          f"FLIPPED_FACES={flips[0]['count'] if flips else 0}, stats={result['stats']}")
+    print(f"new 与基准值一致: {'OK' if ok else 'MISMATCH'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP 传输基准：requests.Session（每会话一个线程）vs async_transport（共享事件循环）
+
+用法（项目根目录）::
+
+    python benchmarks/bench_async_transport.py [--sessions 1 --sessions 8 --sessions 32]
+                                               [--turns 3] [--events 40] [--ttfb 0.15] [--interval 0.01]
+
+在本机启动一个 OpenAI 兼容的 SSE 替身服务（HTTP/1.1 keep-alive + chunked，
+首字节延迟 --ttfb，之后每 --interval 秒推送一个 delta 事件），模拟 N 个并发会话，
+每个会话串行发起 --turns 轮流式请求：
+
+  requests : 每会话一个线程 + 独立 requests.Session（AIClient 原实现）
+  threads  : 每会话一个线程，通过 async_transport.stream() 读取（AIClient 现实现）
+  async    : 全部会话作为协程跑在传输层事件循环上（astream），不占额外线程
+
+统计首个内容事件延迟 (TTFB p50/p95)、总耗时、事件吞吐、服务端新建连接数与峰值线程数。
+最后用 AIClient.chat_stream（ollama provider 指向替身服务）校验两种传输产出的文本一致。
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+import contextlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from houdini_agent.utils import ai_client  # noqa: E402  （同时把 lib/ 加入 sys.path）
+from houdini_agent.utils.async_transport import AsyncTransport  # noqa: E402
+from houdini_agent.utils.sse_stream import OpenAIStreamParser  # noqa: E402
+
+import requests  # noqa: E402
+
+_parse_usage = ai_client.AIClient._parse_usage
+
+
+# ============================================================
+# SSE 替身服务
+# ============================================================
+
+class SSEServer:
+    """asyncio 实现的 OpenAI 兼容流式接口（独立线程 + 事件循环）"""
+
+    def __init__(self, events: int, ttfb: float, interval: float):
+        self.events = events
+        self.ttfb = ttfb
+        self.interval = interval
+        self.connections = 0
+        self.requests = 0
+        self.port = 0
+        self._loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def _run():
+            asyncio.set_event_loop(self._loop)
+            server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle, '127.0.0.1', 0, backlog=256))
+            self.port = server.sockets[0].getsockname()[1]
+            ready.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=_run, name='sse-stand-in', daemon=True).start()
+        ready.wait()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @staticmethod
+    def text_for(i: int) -> str:
+        return f"片段{i} "
+
+    def _event(self, i: int) -> bytes:
+        obj = {"id": "bench", "object": "chat.completion.chunk",
+               "choices": [{"index": 0, "delta": {"content": self.text_for(i)}, "finish_reason": None}]}
+        return b"data: " + json.dumps(obj, ensure_ascii=False).encode('utf-8') + b"\n\n"
+
+    @staticmethod
+    def _chunk(data: bytes) -> bytes:
+        return b"%x\r\n%s\r\n" % (len(data), data)
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                if length:
+                    await reader.readexactly(length)
+                self.requests += 1
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                             b"Transfer-Encoding: chunked\r\nConnection: keep-alive\r\n\r\n")
+                await asyncio.sleep(self.ttfb)
+                for i in range(self.events):
+                    writer.write(self._chunk(self._event(i)))
+                    await writer.drain()
+                    if self.interval:
+                        await asyncio.sleep(self.interval)
+                finish = {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+                writer.write(self._chunk(b"data: " + json.dumps(finish).encode() + b"\n\n"))
+                writer.write(self._chunk(b"data: [DONE]\n\n") + b"0\r\n\r\n")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def reset(self):
+        self.connections = 0
+        self.requests = 0
+
+
+# ============================================================
+# 客户端模式
+# ============================================================
+
+_PAYLOAD = {"model": "bench", "stream": True, "messages": [{"role": "user", "content": "hi"}]}
+
+
+def _consume(chunks, t0, ttfbs):
+    """解析字节流，记录首个内容事件延迟，返回内容事件数"""
+    parser = OpenAIStreamParser(_parse_usage)
+    n = 0
+    for raw in chunks:
+        for ev in parser.feed(raw):
+            if ev['type'] == 'content':
+                if n == 0:
+                    ttfbs.append(time.perf_counter() - t0)
+                n += 1
+        if parser.done:
+            break
+    return n
+
+
+class _PeakThreads:
+    def __init__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._t = threading.Thread(target=self._watch, daemon=True)
+        self._t.start()
+
+    def _watch(self):
+        while not self._stop.wait(0.005):
+            self.peak = max(self.peak, threading.active_count())
+
+    def stop(self):
+        self._stop.set()
+        self._t.join()
+        return self.peak
+
+
+def _run_threads(n_sessions, turns, url, request_fn):
+    ttfbs, counts = [], []
+    lock = threading.Lock()
+
+    def _session():
+        local_ttfb, local_n = [], 0
+        for _ in range(turns):
+            t0 = time.perf_counter()
+            local_n += request_fn(t0, local_ttfb)
+        with lock:
+            ttfbs.extend(local_ttfb)
+            counts.append(local_n)
+
+    threads = [threading.Thread(target=_session) for _ in range(n_sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return ttfbs, sum(counts)
+
+
+def mode_requests(n_sessions, turns, url, transport):
+    sessions = threading.local()
+
+    def _req(t0, ttfb):
+        sess = getattr(sessions, 's', None)
+        if sess is None:
+            sess = sessions.s = requests.Session()
+        with sess.post(url, json=_PAYLOAD, stream=True, timeout=(10, 60),
+                       proxies={'http': None, 'https': None}) as resp:
+            return _consume(resp.iter_content(chunk_size=4096), t0, ttfb)
+    return _run_threads(n_sessions, turns, url, _req)
+
+
+def mode_threads(n_sessions, turns, url, transport):
+    def _req(t0, ttfb):
+        with transport.post(url, json=_PAYLOAD, stream=True, timeout=(10, 60)) as resp:
+            return _consume(resp.iter_content(), t0, ttfb)
+    return _run_threads(n_sessions, turns, url, _req)
+
+
+def mode_async(n_sessions, turns, url, transport):
+    body = json.dumps(_PAYLOAD).encode()
+    headers = {'Content-Type': 'application/json'}
+    ttfbs = []
+
+    async def _session():
+        n = 0
+        for _ in range(turns):
+            t0 = time.perf_counter()
+            parser = OpenAIStreamParser(_parse_usage)
+            first = True
+            async with transport.astream('POST', url, body, headers) as (status, hdrs, chunks):
+                async for raw in chunks:
+                    for ev in parser.feed(raw):
+                        if ev['type'] == 'content':
+                            if first:
+                                ttfbs.append(time.perf_counter() - t0)
+                                first = False
+                            n += 1
+        return n
+
+    async def _all():
+        return await asyncio.gather(*(_session() for _ in range(n_sessions)))
+
+    counts = transport.submit(_all()).result()
+    return ttfbs, sum(counts)
+
+
+MODES = (('requests', mode_requests), ('threads', mode_threads), ('async', mode_async))
+
+
+# ============================================================
+# 正确性：AIClient.chat_stream 经两种传输产出相同文本
+# ============================================================
+
+def check_ai_client(server):
+    texts = {}
+    for label in ('requests', 'transport'):
+        client = ai_client.AIClient()
+        if label == 'requests':
+            client._transport = None
+        client.set_ollama_url(server.url)
+        parts = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            events = list(client.chat_stream([{'role': 'user', 'content': 'hi'}],
+                                             model='bench', provider='ollama'))
+        for ev in events:
+            if ev.get('type') == 'content':
+                parts.append(ev.get('content', ''))
+            elif ev.get('type') == 'error':
+                parts.append(f"<error {ev.get('error')}>")
+        texts[label] = ''.join(parts)
+    expected = ''.join(SSEServer.text_for(i) for i in range(server.events))
+    ok = texts['requests'] == texts['transport'] == expected
+    print(f"\nAIClient.chat_stream 文本一致: {'OK' if ok else 'MISMATCH'} "
+          f"({len(texts['transport'])} 字符)")
+    if not ok:
+        for k, v in texts.items():
+            print(f"  {k}: {v[:120]!r}")
+    return ok
+
+
+def _pct(values, q):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--sessions", type=int, action="append", help="并发会话数（可多次指定）")
+    ap.add_argument("--turns", type=int, default=3, help="每会话串行请求数")
+    ap.add_argument("--events", type=int, default=40, help="每个响应的 delta 事件数")
+    ap.add_argument("--ttfb", type=float, default=0.15, help="服务端首字节延迟（秒）")
+    ap.add_argument("--interval", type=float, default=0.01, help="事件间隔（秒）")
+    args = ap.parse_args()
+    sessions = args.sessions or [1, 8, 32]
+
+    server = SSEServer(args.events, args.ttfb, args.interval)
+    ok = check_ai_client(server)
+
+    print(f"\n每会话 {args.turns} 轮 × {args.events} 事件，TTFB {args.ttfb * 1000:.0f}ms，"
+          f"间隔 {args.interval * 1000:.0f}ms")
+    print(f"  {'会话':>4}  {'方式':<9}{'TTFB p50':>10}{'TTFB p95':>10}{'总耗时':>9}"
+          f"{'事件/s':>10}{'新建连接':>9}{'峰值线程':>9}")
+    for n in sessions:
+        for name, fn in MODES:
+            transport = AsyncTransport(max_connections_per_host=max(8, n))
+            transport.loop  # noqa: B018  预先启动循环线程，不计入耗时
+            server.reset()
+            base_threads = threading.active_count()
+            watch = _PeakThreads()
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):  # 屏蔽解析器的 [DONE] 日志
+                ttfbs, events = fn(n, args.turns, server.url + "/v1/chat/completions", transport)
+            elapsed = time.perf_counter() - t0
+            peak = watch.stop() - base_threads
+            transport.close()
+            print(f"  {n:>4}  {name:<9}{_pct(ttfbs, .5) * 1000:>8.1f}ms{_pct(ttfbs, .95) * 1000:>8.1f}ms"
+                  f"{elapsed:>8.2f}s{events / elapsed:>10.0f}{server.connections:>9}{peak:>9}")
+    # 峰值线程为相对基准的增量（含监视线程）；async 模式只使用传输层已有的循环线程
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
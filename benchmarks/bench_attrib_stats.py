@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+属性统计基准：analyze_geometry_attribs 元组读取 + 随机采样（旧实现）vs 分块流式统计
+
+用法（项目根目录）::
+
+    python benchmarks/bench_attrib_stats.py [--count 1000000 --count 10000000] [--large 100000000]
+                                            [--seed 11]
+
+使用 benchmarks/mock_hou.py 的 hou 替身提供合成属性（numpy 缓冲区，AsString 接口返回原始字节）：
+
+  density : float 标量，对数正态分布 + 少量 NaN / Inf
+  Cd      : float 向量（3 分量），各分量分布不同
+  id      : int 标量，大量重复值
+
+  old : 原实现（pointFloatAttribValues 元组 → np.array，超过 max_sample=100000 时随机采样）
+  new : 流式统计（AsString 零拷贝 + 分块 Welford，exact 分位数）
+
+与 numpy 全量计算的基准值比较 min / max / mean / std / 分位数的最大相对误差（new 应为 0 或浮点舍入级）。
+--large 只运行 new 且只测标量属性（旧实现需要把上亿个 Python float 装入元组）。
+"""
+
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_hou import MockHou  # noqa: E402
+
+mock = MockHou()
+sys.modules["hou"] = mock  # analyze_point_attrib.run() 内部 import hou
+
+from houdini_agent.skills import analyze_point_attrib  # noqa: E402
+
+QUANTILES = analyze_point_attrib._QUANTILES
+
+
+# ============================================================
+# 旧实现（analyze_point_attrib 改造前的数值属性路径）
+# ============================================================
+
+def legacy_stats(geo, name, size, is_float, max_sample=100000):
+    vals = np.array(geo.pointFloatAttribValues(name) if is_float else geo.pointIntAttribValues(name))
+    if size > 1:
+        vals = vals.reshape((-1, size))
+    max_sample = min(int(max_sample), 500000)
+    n = len(vals) if vals.ndim == 1 else vals.shape[0]
+    if n > max_sample:
+        idx = np.random.choice(n, max_sample, replace=False)
+        vals = vals[idx] if vals.ndim == 1 else vals[idx, :]
+    return {
+        "min": vals.min(axis=0).tolist() if size > 1 else float(vals.min()),
+        "max": vals.max(axis=0).tolist() if size > 1 else float(vals.max()),
+        "mean": vals.mean(axis=0).tolist() if size > 1 else float(vals.mean()),
+        "std": vals.std(axis=0).tolist() if size > 1 else float(vals.std()),
+        # 旧实现没有分位数，这里按同一份采样补算，用于比较误差
+        "quantiles": {f"p{int(q * 100)}": (np.quantile(vals, q, axis=0).tolist() if size > 1
+                                           else float(np.quantile(vals, q)))
+                      for q in QUANTILES},
+    }
+
+
+# ============================================================
+# 合成属性
+# ============================================================
+
+def make_attribs(count, rng, vector=True):
+    density = rng.lognormal(0.0, 1.0, count).astype(np.float32)
+    bad = rng.choice(count, max(1, count // 10000), replace=False)
+    density[bad[::2]] = np.nan
+    density[bad[1::2]] = np.inf
+    ids = rng.zipf(1.5, count).clip(max=10 ** 6).astype(np.int32)
+    if not vector:
+        return (("density", density, 1), ("id", ids, 1))
+    cd = np.empty((count, 3), dtype=np.float32)
+    cd[:, 0] = rng.random(count)
+    cd[:, 1] = rng.normal(0.5, 0.1, count)
+    cd[:, 2] = rng.beta(0.5, 5.0, count)
+    return (("density", density, 1), ("Cd", cd.reshape(-1), 3), ("id", ids, 1))
+
+
+def reference(buffer, size):
+    """numpy 全量计算（忽略 NaN / Inf）"""
+    cols = buffer.reshape((-1, size))
+    out = {"min": [], "max": [], "mean": [], "std": [], "quantiles": {f"p{int(q * 100)}": [] for q in QUANTILES}}
+    for c in range(size):
+        col = cols[:, c].astype(np.float64)
+        col = col[np.isfinite(col)]
+        out["min"].append(float(col.min()))
+        out["max"].append(float(col.max()))
+        out["mean"].append(float(col.mean()))
+        out["std"].append(float(col.std()))
+        for q, v in zip(QUANTILES, np.quantile(col, QUANTILES)):
+            out["quantiles"][f"p{int(q * 100)}"].append(float(v))
+    return out
+
+
+def max_rel_error(result, ref, size):
+    """result 中 min/max/mean/std/分位数相对基准值的最大相对误差"""
+    def _as_list(v):
+        return v if size > 1 else [v]
+    worst = 0.0
+    pairs = [(result[k], ref[k]) for k in ("min", "max", "mean", "std")]
+    pairs += [(result["quantiles"][k], ref["quantiles"][k]) for k in ref["quantiles"]]
+    for got, want in pairs:
+        for g, w in zip(_as_list(got), want):
+            if g is None or not np.isfinite(g):
+                return float("inf")
+            worst = max(worst, abs(g - w) / max(abs(w), 1e-12))
+    return worst
+
+
+def _measure(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--count", type=int, action="append", help="点数（可多次指定）")
+    ap.add_argument("--large", type=int, default=0, help="额外只用 new 运行的点数（如 100000000）")
+    ap.add_argument("--seed", type=int, default=11)
+    args = ap.parse_args()
+    counts = [(c, True) for c in (args.count or [1000000, 10000000])]
+    if args.large:
+        counts.append((args.large, False))
+
+    node = mock.node("/obj").createNode("geo", "bench_geo").createNode("null", "attribs")
+    print(f"\n  {'点数':>10}  {'属性':<8}{'方式':<5}{'耗时':>10}{'峰值内存':>11}{'最大相对误差':>14}")
+    ok = True
+    for count, with_old in counts:
+        rng = np.random.default_rng(args.seed)
+        geo = mock.point_cloud(count)
+        node.setGeometry(geo)
+        attribs = make_attribs(count, rng, vector=with_old)
+        for name, buffer, size in attribs:
+            geo.add_attrib_buffer("point", name, buffer, size)
+        for name, buffer, size in attribs:
+            ref = reference(buffer, size)
+            is_float = buffer.dtype.kind == "f"
+            impls = []
+            if with_old:
+                impls.append(("old", lambda: legacy_stats(geo, name, size, is_float)))
+            impls.append(("new", lambda: analyze_point_attrib.run(node.path(), name)))
+            for label, fn in impls:
+                result, elapsed, peak = _measure(fn)
+                err = max_rel_error(result, ref, size)
+                print(f"  {count:>10}  {name:<8}{label:<5}{elapsed:>9.2f}s{peak / 1e6:>9.1f}MB{err:>14.2e}")
+                if label == "new" and err > 1e-9:
+                    ok = False
+            del ref
+    print(f"\nnew 与全量基准一致: {'OK' if ok else 'MISMATCH'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
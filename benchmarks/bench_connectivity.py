@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+连通性分析基准：connectivity_analysis 逐顶点并查集（旧实现）vs NumPy 数组并查集 + bincount
+
+用法（项目根目录）::
+
+    python benchmarks/bench_connectivity.py [--pieces 200 --pieces 2000] [--size 12] [--seed 5]
+
+使用 benchmarks/mock_hou.py 的 hou 替身构建 N 块互不相连的四边形网格碎片（边长在
+[size/2, size] 间随机，另含若干孤立点），分别运行：
+
+  old : 原实现（两次 iterPrims + v.point().number()，逐分量保存点列表；class 路径每个 class 重扫全部面）
+  py  : 无 numpy 回退（一次拓扑遍历，只累计计数）
+  new : NumPy 数组并查集，分量点数 / 面数由 bincount 得出；class 路径一次 np.unique
+
+分别测试无 class 属性（并查集）、面 class、点 class 三种情况；三种实现的结果必须完全一致。
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_hou import MockHou  # noqa: E402
+
+mock = MockHou()
+sys.modules["hou"] = mock  # connectivity_analysis 内部 import hou
+
+from houdini_agent.skills import connectivity_analysis as ca  # noqa: E402
+
+
+# ============================================================
+# 旧实现（connectivity_analysis 改造前）
+# ============================================================
+
+def legacy_with_class(geo, class_attrib):
+    hou = mock
+    is_prim = (class_attrib.type() == hou.attribType.Prim)
+    if is_prim:
+        classes = geo.primIntAttribValues("class") if class_attrib.dataType() == hou.attribData.Int else geo.primFloatAttribValues("class")
+    else:
+        classes = geo.pointIntAttribValues("class") if class_attrib.dataType() == hou.attribData.Int else geo.pointFloatAttribValues("class")
+    unique_classes = sorted(set(classes))
+    components = []
+    for c in unique_classes:
+        if is_prim:
+            prim_count = sum(1 for v in classes if v == c)
+            point_set = set()
+            for prim in geo.iterPrims():
+                if prim.attribValue("class") == c:
+                    for v in prim.vertices():
+                        point_set.add(v.point().number())
+            point_count = len(point_set)
+        else:
+            point_count = sum(1 for v in classes if v == c)
+            prim_count = 0
+        components.append({"id": c, "point_count": point_count, "prim_count": prim_count})
+    return {
+        "method": "class_attribute",
+        "total_components": len(unique_classes),
+        "total_points": geo.intrinsicValue("pointcount"),
+        "total_prims": geo.intrinsicValue("primitivecount"),
+        "components": components[:20],
+    }
+
+
+def legacy_union_find(geo):
+    n = geo.intrinsicValue("pointcount")
+    num_prims = geo.intrinsicValue("primitivecount")
+    parent = list(range(n))
+
+    def find(x):
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(x, y):
+        px, py = find(x), find(y)
+        if px != py:
+            parent[px] = py
+
+    for prim in geo.iterPrims():
+        pt_nums = [v.point().number() for v in prim.vertices()]
+        if len(pt_nums) > 1:
+            for i in range(1, len(pt_nums)):
+                union(pt_nums[0], pt_nums[i])
+    comp_points = {}
+    for i in range(n):
+        root = find(i)
+        if root not in comp_points:
+            comp_points[root] = []
+        comp_points[root].append(i)
+    comp_prims = {root: set() for root in comp_points}
+    for prim in geo.iterPrims():
+        verts = list(prim.vertices())
+        if verts:
+            comp_prims[find(verts[0].point().number())].add(prim.number())
+    components = []
+    for root in sorted(comp_points.keys(), key=lambda r: -len(comp_points[r])):
+        components.append({
+            "point_count": len(comp_points[root]),
+            "prim_count": len(comp_prims[root]),
+            "point_ratio": round(len(comp_points[root]) / n * 100, 2),
+        })
+    return {
+        "method": "union_find",
+        "total_components": len(components),
+        "total_points": n,
+        "total_prims": num_prims,
+        "components": components[:20],
+    }
+
+
+# ============================================================
+# 测试几何体
+# ============================================================
+
+def build_pieces(pieces, size, rng):
+    """N 块互不相连的网格碎片（点号打乱），另加孤立点；返回 (几何体, 面所属碎片, 点所属碎片)"""
+    points, prims, prim_piece, point_piece = [], [], [], []
+    for k in range(pieces):
+        w, h = rng.randint(max(1, size // 2), size), rng.randint(max(1, size // 2), size)
+        base = len(points)
+        for j in range(h + 1):
+            for i in range(w + 1):
+                points.append((k * 2.0 * size + i, float(j), 0.0))
+                point_piece.append(k)
+        for j in range(h):
+            for i in range(w):
+                a = base + j * (w + 1) + i
+                prims.append((a, a + 1, a + w + 2, a + w + 1))
+                prim_piece.append(k)
+    for k in range(pieces // 10):
+        points.append((-1.0 - k, -1.0, 0.0))
+        point_piece.append(pieces + k)
+    # 打乱点号，避免分量恰好按点号连续排列
+    perm = list(range(len(points)))
+    rng.shuffle(perm)
+    inv = [0] * len(perm)
+    for new, old in enumerate(perm):
+        inv[old] = new
+    points = [points[old] for old in perm]
+    point_piece = [point_piece[old] for old in perm]
+    prims = [tuple(inv[p] for p in prim) for prim in prims]
+    return mock.geometry(points, prims), prim_piece, point_piece
+
+
+def _timed(fn, *args):
+    """先计时，再单独跑一次统计峰值内存（tracemalloc 会显著拖慢 Python 代码）"""
+    mock.calls = 0
+    t0 = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - t0
+    calls = mock.calls
+    tracemalloc.start()
+    fn(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, calls, peak
+
+
+def _without_numpy(fn):
+    """临时屏蔽 numpy，走纯 Python 回退"""
+    def _run(*args):
+        saved = sys.modules.get("numpy")
+        sys.modules["numpy"] = None
+        try:
+            return fn(*args)
+        finally:
+            sys.modules["numpy"] = saved
+    return _run
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--pieces", type=int, action="append", help="碎片数（可多次指定）")
+    ap.add_argument("--size", type=int, default=12, help="碎片最大边长（面数）")
+    ap.add_argument("--seed", type=int, default=5)
+    args = ap.parse_args()
+    pieces_list = args.pieces or [200, 2000]
+
+    print(f"\n{'碎片':>6} {'点数':>8} {'面数':>8}  {'路径':<6}{'方式':<5}{'耗时':>10}{'hou 调用':>10}"
+          f"{'峰值内存':>10}{'分量数':>8}")
+    ok = True
+    for pieces in pieces_list:
+        rng = random.Random(args.seed)
+        geo, prim_piece, point_piece = build_pieces(pieces, args.size, rng)
+        n_pts = len(geo._P) // 3
+        n_prims = len(geo._prims)
+        cases = (
+            ("union", None, None),
+            ("prim", "prim", prim_piece),
+            ("point", "point", point_piece),
+        )
+        for label, cls, values in cases:
+            geo._attribs["prim"].pop("class", None)
+            geo._attribs["point"].pop("class", None)
+            if cls:
+                geo.add_attrib(cls, "class", values)
+            attrib = geo.findPrimAttrib("class") or geo.findPointAttrib("class")
+            if attrib is None:
+                impls = (("old", legacy_union_find), ("py", _without_numpy(ca._analyze_with_union_find)),
+                         ("new", ca._analyze_with_union_find))
+            else:
+                impls = (("old", legacy_with_class), ("py", _without_numpy(ca._analyze_with_class)),
+                         ("new", ca._analyze_with_class))
+            results = {}
+            for name, fn in impls:
+                if name == "old" and label == "prim" and n_prims > 40000:
+                    print(f"  {pieces:>4} {n_pts:>8} {n_prims:>8}  {label:<6}{name:<5}{'(跳过，每 class 重扫全部面)':>20}")
+                    continue
+                result, elapsed, calls, peak = _timed(fn, *((geo, attrib) if attrib is not None else (geo,)))
+                results[name] = result
+                print(f"  {pieces:>4} {n_pts:>8} {n_prims:>8}  {label:<6}{name:<5}{elapsed * 1000:>8.1f}ms"
+                      f"{calls:>10}{peak / 1e6:>8.1f}MB{result['total_components']:>8}")
+            reference = results.get("old", results["py"])
+            if any(r != reference for r in results.values()):
+                ok = False
+                print(f"      结果不一致: {label}")
+
+        # 只比较分量标记本身（拓扑已取出，不含 hou 调用）
+        counts, ptnums = ca._prim_topology(geo)
+        t0 = time.perf_counter()
+        py = ca._components_py(n_pts, counts, ptnums)
+        t1 = time.perf_counter()
+        vec = ca._components_np(n_pts, counts, ptnums, np)
+        t2 = time.perf_counter()
+        ok = ok and py == vec
+        print(f"  {pieces:>4} {n_pts:>8} {n_prims:>8}  分量标记：py {(t1 - t0) * 1000:.1f}ms，"
+              f"new {(t2 - t1) * 1000:.1f}ms")
+    print(f"\n三种实现结果一致: {'OK' if ok else 'MISMATCH'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
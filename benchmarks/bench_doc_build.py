@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+文档索引构建基准：串行全量 vs 并行全量 vs 增量（模拟 Houdini 升级）
+
+用法（项目根目录）::
+
+    python benchmarks/bench_doc_build.py [--workers 4] [--changed 300]
+
+场景（均使用临时 help 目录与临时缓存目录，不影响项目 cache/）：
+  1. serial   : 无缓存，workers=0 —— 等价于旧版 _build_indexes() 的逐个 ZIP 串行解析
+  2. parallel : 无缓存，进程池解析
+  3. upgrade  : 把 --changed 个帮助页改写后重新打包为新版本 help 目录，
+                以场景 2 的缓存为基础增量构建（只重新解析指纹变化的成员）
+
+"parse" 列只统计 ZIP 解析阶段（_build_indexes），"total" 列为完整构造耗时
+（含知识库解析、倒排索引构建与缓存写入）。
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import zipfile
+import argparse
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from houdini_agent.utils.doc_rag import HoudiniDocIndex, _ZIP_KINDS, _member_wanted  # noqa: E402
+
+
+class _TimedIndex(HoudiniDocIndex):
+    """记录 ZIP 解析阶段耗时"""
+    parse_seconds = 0.0
+
+    def _build_indexes(self):
+        t0 = time.perf_counter()
+        super()._build_indexes()
+        type(self).parse_seconds = time.perf_counter() - t0
+
+
+def _make_upgraded_help(src: Path, dst: Path, changed: int, seed: int = 7) -> int:
+    """复制 help 目录并随机改写 changed 个帮助页，返回实际改写数"""
+    dst.mkdir(parents=True)
+    rng = random.Random(seed)
+    candidates = []
+    for zip_name, kind in _ZIP_KINDS:
+        zp = src / zip_name
+        if zp.exists():
+            with zipfile.ZipFile(zp) as zf:
+                candidates += [(zip_name, n) for n in zf.namelist() if _member_wanted(kind, n)]
+    picked = set(rng.sample(candidates, min(changed, len(candidates))))
+
+    for zip_name, _ in _ZIP_KINDS:
+        zp = src / zip_name
+        if not zp.exists():
+            continue
+        with zipfile.ZipFile(zp) as zin, \
+                zipfile.ZipFile(dst / zip_name, "w", zipfile.ZIP_DEFLATED) as zout:
+            for info in zin.infolist():
+                data = zin.read(info.filename)
+                if (zip_name, info.filename) in picked:
+                    data += b"\n\nUpdated in this Houdini build.\n"
+                zout.writestr(info, data)
+    return len(picked)
+
+
+def _run(label, help_dir: Path, cache_dir: Path, workers: int):
+    t0 = time.perf_counter()
+    idx = _TimedIndex(help_dir=str(help_dir), workers=workers, cache_dir=str(cache_dir),
+                      progress=lambda *_: None)
+    total = time.perf_counter() - t0
+    print(f"  {label:<34}{_TimedIndex.parse_seconds * 1000:>10.0f}{total * 1000:>12.0f}")
+    return idx, _TimedIndex.parse_seconds
+
+
+def _snapshot(idx: HoudiniDocIndex):
+    return ({k: vars(v) for k, v in idx.node_index.items()},
+            {k: vars(v) for k, v in idx.vex_index.items()},
+            {k: vars(v) for k, v in idx.hom_index.items()})
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--workers", type=int, default=max(2, min(8, (os.cpu_count() or 2) - 1)))
+    ap.add_argument("--changed", type=int, default=300, help="模拟升级时改写的帮助页数量")
+    ap.add_argument("--help-dir", default=str(ROOT / "Doc"), help="含 nodes/vex/hom.zip 的目录")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        v1 = tmp / "help_v1"
+        v1.mkdir()
+        for zip_name, _ in _ZIP_KINDS:
+            if (Path(args.help_dir) / zip_name).exists():
+                shutil.copy2(Path(args.help_dir) / zip_name, v1 / zip_name)
+        v2 = tmp / "help_v2"
+        n_changed = _make_upgraded_help(v1, v2, args.changed)
+
+        print(f"\n{'场景':<34}{'parse (ms)':>10}{'total (ms)':>12}")
+        serial, t_serial = _run("serial 全量 (旧版行为)", v1, tmp / "cache_serial", 0)
+        parallel, t_par = _run(f"parallel 全量 (workers={args.workers})", v1,
+                               tmp / "cache_incr", args.workers)
+        _, t_incr = _run(f"upgrade 增量 ({n_changed} 页变化)", v2, tmp / "cache_incr", args.workers)
+
+        same = _snapshot(serial) == _snapshot(parallel)
+        print(f"\n并行结果与串行一致: {'是' if same else '否'}")
+        print(f"并行全量加速比: {t_serial / max(t_par, 1e-9):.1f}x")
+        print(f"增量构建加速比: {t_serial / max(t_incr, 1e-9):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+文档索引冷启动基准：mmap 二进制缓存 vs 旧版 JSON 缓存
+
+用法（项目根目录）::
+
+    python benchmarks/bench_doc_cold_start.py [--runs 5]
+
+每次测量都在新的 Python 子进程中进行（模块导入不计入），分别记录：
+  - init : 索引就绪耗时（旧版 = json.load + 构造 dataclass + 重新解析 Doc/*.txt；
+           新版 = HoudiniDocIndex() 打开 houdini_doc_index.bin）
+  - first: 首次查询耗时（lookup_vex / lookup_hom / search）
+
+旧版 JSON 缓存由当前索引数据临时生成，格式与 v1.2.4 的 houdini_doc_index.json 相同。
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from houdini_agent.utils.doc_rag import HoudiniDocIndex  # noqa: E402
+
+
+_FIRST_QUERY = """
+t1 = time.perf_counter()
+idx.lookup_vex("pcfind")
+idx.lookup_hom("hou.Node")
+idx.lookup_node("scatter")
+__SEARCH__(idx, "heightfield erosion")
+first = (time.perf_counter() - t1) * 1000
+print(json.dumps({{"init": init, "first": first}}))
+"""
+
+_NEW = """
+import sys, time, json
+sys.path.insert(0, {root!r})
+from houdini_agent.utils import doc_rag
+t0 = time.perf_counter()
+idx = doc_rag.HoudiniDocIndex()
+init = (time.perf_counter() - t0) * 1000
+def _search(i, q):
+    return i.search(q)
+""" + _FIRST_QUERY.replace("__SEARCH__", "_search")
+
+_LEGACY = """
+import sys, time, json
+sys.path.insert(0, {root!r})
+sys.path.insert(0, {bench!r})
+from houdini_agent.utils import doc_rag
+from houdini_agent.utils.doc_rag import HoudiniDocIndex, NodeDoc, VexDoc, HomDoc
+from bench_doc_search import _legacy_search
+from pathlib import Path
+
+t0 = time.perf_counter()
+idx = HoudiniDocIndex.__new__(HoudiniDocIndex)
+idx.node_index, idx.vex_index, idx.hom_index = {{}}, {{}}, {{}}
+idx.knowledge_chunks, idx._node_aliases, idx._vex_categories = [], {{}}, {{}}
+with open({json_path!r}, "r", encoding="utf-8") as f:
+    data = json.load(f)
+for k, v in data.get("nodes", {{}}).items():
+    doc = NodeDoc(**v)
+    idx.node_index[k] = doc
+    if v.get("context"):
+        idx.node_index[v["context"] + "/" + k] = doc
+for k, v in data.get("vex", {{}}).items():
+    idx.vex_index[k] = VexDoc(**v)
+    if v.get("category"):
+        idx._vex_categories.setdefault(v["category"], []).append(k)
+for k, v in data.get("hom", {{}}).items():
+    idx.hom_index[k] = HomDoc(**v)
+idx._build_aliases()
+for p in Path({doc_dir!r}).glob("*.txt"):
+    idx.knowledge_chunks.extend(
+        HoudiniDocIndex._parse_txt_sections(p.read_text(encoding="utf-8"), p.stem))
+init = (time.perf_counter() - t0) * 1000
+""" + _FIRST_QUERY.replace("__SEARCH__", "_legacy_search")
+
+
+def _write_legacy_json(index: HoudiniDocIndex, path: str):
+    data = {
+        "help_dir": str(index._help_dir),
+        "version": 2,
+        "nodes": {k: vars(v) for k, v in index.node_index.items() if "/" not in k},
+        "vex": {k: vars(v) for k, v in index.vex_index.items()},
+        "hom": {k: vars(v) for k, v in index.hom_index.items()},
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def _run(code: str, runs: int):
+    inits, firsts = [], []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True,
+                             text=True, encoding="utf-8", check=True).stdout
+        rec = json.loads(out.strip().splitlines()[-1])
+        inits.append(rec["init"])
+        firsts.append(rec["first"])
+    return statistics.median(inits), statistics.median(firsts)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--runs", type=int, default=5, help="每种方案的子进程次数（取中位数）")
+    args = ap.parse_args()
+
+    # 确保 mmap 缓存已存在，并据此生成旧格式 JSON
+    index = HoudiniDocIndex()
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "houdini_doc_index.json")
+        _write_legacy_json(index, json_path)
+        bin_path = index._cache_dir / "houdini_doc_index.bin"
+        print(f"\n缓存体积: JSON {os.path.getsize(json_path) / 1024:.0f} KB (+ Doc/*.txt 重新解析), "
+              f"mmap {os.path.getsize(bin_path) / 1024:.0f} KB (含知识库与倒排索引)")
+
+        legacy = _LEGACY.format(root=ROOT, bench=BENCH_DIR, json_path=json_path,
+                                doc_dir=str(index._doc_dir))
+        old_init, old_first = _run(legacy, args.runs)
+        new_init, new_first = _run(_NEW.format(root=ROOT), args.runs)
+
+    print(f"\n冷启动（{args.runs} 个子进程中位数）:")
+    print(f"  {'':<22}{'init (ms)':>12}{'first query (ms)':>20}{'total (ms)':>14}")
+    print(f"  {'JSON 缓存 (旧)':<22}{old_init:>12.1f}{old_first:>20.2f}{old_init + old_first:>14.1f}")
+    print(f"  {'mmap 缓存 (新)':<22}{new_init:>12.1f}{new_first:>20.2f}{new_init + new_first:>14.1f}")
+    print(f"  加速比: {(old_init + old_first) / max(new_init + new_first, 1e-9):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+节点文档查询基准：类别扫描 + 本地帮助服务器 + HTML 压平（旧实现）vs doc_corpus 离线语料
+
+用法（项目根目录）::
+
+    python benchmarks/bench_doc_corpus.py [--nodes 1500] [--queries 400] [--help-dir DIR] [--seed 11]
+
+--help-dir 含 nodes.zip 时使用真实帮助页，否则在临时目录生成 --nodes 个合成帮助页（wiki 格式：
+标题、简介、正文、@parameters / @inputs / @related）。缓存写入临时目录，不影响项目 cache/。
+
+  old : HoudiniMCP._get_houdini_local_doc 改造前的路径 —— 线性遍历各类别的节点类型找到目标，
+        GET 本地帮助服务器（这里是进程内 http.server，直接返回预先生成的 HTML，不计服务器渲染耗时），
+        正则版 _html_to_text（无 bs4），_paginate_doc 运行时分页；整页文本进 128 条 LRU，
+        翻页命中时跳过请求
+  new : HelpCorpus.page（二分查找 + 读取一页记录）
+
+查询序列：按 Zipf 分布挑选节点，约三成查询会继续翻完后续页。报告首页 / 翻页的中位与 p95 延迟、
+语料构建与打开耗时；正确性检查比对每个帮助页的全部分页与旧 _paginate_doc 对同一文本的分页结果，
+以及 @inputs 解析结果。
+"""
+
+import re
+import sys
+import time
+import random
+import zipfile
+import argparse
+import tempfile
+import threading
+import statistics
+import urllib.request
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from houdini_agent.utils.doc_rag import HoudiniDocIndex, _member_wanted  # noqa: E402
+from houdini_agent.utils.doc_corpus import (HelpCorpus, PAGE_SIZE, parse_inputs,  # noqa: E402
+                                            render_help_page)
+
+_CONTEXTS = (("sop", "Sop", 0.6), ("obj", "Object", 0.1), ("dop", "Dop", 0.2), ("cop2", "Cop2", 0.1))
+_WORDS = ("points", "primitives", "attribute", "group", "volume", "geometry", "transform", "noise",
+          "velocity", "density", "polygon", "curve", "normal", "vertex", "scale", "frame", "cook",
+          "network", "input", "output", "mask", "iteration", "solver", "collision", "uv")
+
+
+# ============================================================
+# 合成帮助页
+# ============================================================
+
+def _sentence(rng, n=14):
+    words = [rng.choice(_WORDS) for _ in range(n)]
+    return " ".join(words).capitalize() + "."
+
+
+def _wiki_page(rng, ctx, name, idx):
+    title = name.replace("_", " ").title()
+    lines = [f"= {title} =", "", "#type: node", f"#context: {ctx}", f"#internal: {name}",
+             f"#icon: {ctx.upper()}/{name}", "", f'"""{_sentence(rng, 10)}"""', ""]
+    for _ in range(rng.randint(2, 10)):
+        lines += [_sentence(rng, rng.randint(20, 60)), ""]
+    lines += ["See [Node:sop/attribwrangle] and [the VEX guide|/vex/index].", "", "@parameters", ""]
+    for g in range(rng.randint(1, 4)):
+        lines += [f"== Group {g} ==", ""]
+        for p in range(rng.randint(3, 12)):
+            lines += [f"{title} Param {g}_{p}:", f"    #id: p{g}_{p}", f"    {_sentence(rng, 18)}", ""]
+    if idx % 4:
+        lines += ["@inputs", ""]
+        for i in range(rng.randint(1, 3)):
+            lines += [f"Input {i}:", f"    ''{_sentence(rng, 8)}''", ""]
+    lines += ["@related", "", "- [Node:sop/box]", "- [Node:sop/scatter]"]
+    return "\n".join(lines)
+
+
+def make_nodes_zip(path: Path, count: int, seed: int):
+    rng = random.Random(seed)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for i in range(count):
+            ctx = rng.choices([c[0] for c in _CONTEXTS], weights=[c[2] for c in _CONTEXTS])[0]
+            name = f"{rng.choice(_WORDS)}_{rng.choice(_WORDS)}{i}"
+            zf.writestr(f"{ctx}/{name}.txt", _wiki_page(rng, ctx, name, i))
+
+
+def load_pages(zip_path: Path):
+    """(context, 内部名) → 解析后的 wiki 文档"""
+    docs = {}
+    with zipfile.ZipFile(zip_path) as zf:
+        for info in zf.infolist():
+            if not _member_wanted("node", info.filename):
+                continue
+            doc = HoudiniDocIndex._parse_wiki(zf.read(info).decode("utf-8", errors="ignore"))
+            parts = info.filename.split("/")
+            name = doc.get("internal") or Path(parts[-1]).stem
+            ctx = (doc.get("context") or (parts[-2] if len(parts) >= 2 else "")).lower()
+            docs.setdefault((ctx, name.lower()), doc)
+    return docs
+
+
+def _html(doc):
+    """模拟帮助服务器返回的页面：导航、脚本 + 每行一个段落"""
+    body = "".join(f"<p>{line}</p>" for line in render_help_page(doc).split("\n") if line)
+    return ("<html><head><script>var nav = {};</script><style>p {margin: 0}</style></head><body>"
+            "<nav><a href='/'>Home</a><a href='/nodes'>Nodes</a></nav><header>Houdini Help</header>"
+            f"<main>{body}</main><footer>SideFX</footer></body></html>")
+
+
+class _HelpHandler(BaseHTTPRequestHandler):
+    pages = {}
+
+    def do_GET(self):
+        html = self.pages.get(self.path)
+        self.send_response(200 if html else 404)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        data = (html or "not found").encode("utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *_args):
+        pass
+
+
+# ============================================================
+# 旧实现（改造前 HoudiniMCP 的帮助文档查询）
+# ============================================================
+
+class _NodeType:
+    def __init__(self, ctx, name):
+        self._ctx, self._name = ctx, name
+
+    def helpUrl(self):
+        return f"/nodes/{self._ctx}/{self._name}"
+
+
+class LegacyDoc:
+    _DOC_PAGE_SIZE = 2500
+
+    def __init__(self, categories, port):
+        self.categories = categories        # hou.nodeTypeCategories() 的替身
+        self.port = port
+        self._doc_page_cache = OrderedDict()
+
+    def get(self, node_type, category="sop", page=1):
+        cache_key = f"{category}/{node_type}".lower()
+        if page > 1 and cache_key in self._doc_page_cache:
+            self._doc_page_cache.move_to_end(cache_key)
+            return True, self._paginate_doc(self._doc_page_cache[cache_key], node_type, category, page)
+        type_name_lower = node_type.lower().strip()
+        node_type_obj = None
+        cat_obj = self.categories.get(dict(sop="Sop", obj="Object", dop="Dop", cop2="Cop2")[category])
+        if cat_obj:
+            for name, nt in cat_obj.items():
+                name_low = name.lower()
+                if name_low == type_name_lower or name_low.endswith(f"::{type_name_lower}"):
+                    node_type_obj = nt
+                    break
+        url_path = node_type_obj.helpUrl() if node_type_obj else f"/nodes/{category}/{type_name_lower}"
+        with urllib.request.urlopen(f"http://127.0.0.1:{self.port}{url_path}", timeout=5) as resp:
+            text = self._html_to_text(resp.read().decode("utf-8"))
+        return True, self._paginate_doc(text, node_type, category, page)
+
+    @staticmethod
+    def _html_to_text(html):
+        text = re.sub(r'<script[^>]*>.*?</script>', '', html, flags=re.DOTALL | re.IGNORECASE)
+        text = re.sub(r'<style[^>]*>.*?</style>', '', text, flags=re.DOTALL | re.IGNORECASE)
+        text = re.sub(r'<nav[^>]*>.*?</nav>', '', text, flags=re.DOTALL | re.IGNORECASE)
+        text = re.sub(r'<header[^>]*>.*?</header>', '', text, flags=re.DOTALL | re.IGNORECASE)
+        text = re.sub(r'<footer[^>]*>.*?</footer>', '', text, flags=re.DOTALL | re.IGNORECASE)
+        text = re.sub(r'<(?:br|p|div|h[1-6]|li|tr)[^>]*>', '\n', text, flags=re.IGNORECASE)
+        text = re.sub(r'<[^>]+>', ' ', text)
+        lines = [l.strip() for l in text.split('\n')]
+        return '\n'.join(l for l in lines if l)
+
+    def _paginate_doc(self, text, node_type, category, page=1):
+        cache_key = f"{category}/{node_type}".lower()
+        self._doc_page_cache[cache_key] = text
+        self._doc_page_cache.move_to_end(cache_key)
+        while len(self._doc_page_cache) > 128:
+            self._doc_page_cache.popitem(last=False)
+
+        total_chars = len(text)
+        page_size = self._DOC_PAGE_SIZE
+        total_pages = max(1, (total_chars + page_size - 1) // page_size)
+        page = max(1, min(page, total_pages))
+        start = (page - 1) * page_size
+        end = min(start + page_size, total_chars)
+        page_text = text[start:end]
+        header = f"[{node_type} 节点文档] (第 {page}/{total_pages} 页, 共 {total_chars} 字符)\n\n"
+        if total_pages == 1:
+            return header + page_text
+        if page < total_pages:
+            footer = f"\n\n[第 {page}/{total_pages} 页] 还有更多内容，调用 get_houdini_node_doc(node_type=\"{node_type}\", category=\"{category}\", page={page + 1}) 查看下一页"
+        else:
+            footer = f"\n\n[第 {page}/{total_pages} 页 - 最后一页]"
+        return header + page_text + footer
+
+
+# ============================================================
+# 模拟
+# ============================================================
+
+def _queries(rng, keys, count):
+    """Zipf 分布挑选节点；三成查询继续翻完后续页"""
+    weights = [1 / (i + 1) for i in range(len(keys))]
+    out = []
+    while len(out) < count:
+        ctx, name = rng.choices(keys, weights=weights)[0]
+        out.append((name, ctx, 1))
+        if rng.random() < 0.3:
+            out += [(name, ctx, p) for p in range(2, 6)]
+    return out[:count]
+
+
+def _p95(values):
+    return sorted(values)[int(len(values) * 0.95)]
+
+
+def _check(corpus, legacy, docs):
+    """每个帮助页：新语料逐页输出 == 旧 _paginate_doc 对同一文本的分页；@inputs 一致"""
+    bad = 0
+    for (ctx, name), doc in docs.items():
+        text = render_help_page(doc)
+        pages = max(1, (len(text) + PAGE_SIZE - 1) // PAGE_SIZE)
+        for p in range(1, pages + 2):      # 多查一页：越界页码按最后一页返回
+            if corpus.page(name, ctx, p) != legacy._paginate_doc(text, name, ctx, p):
+                bad += 1
+        entry = corpus.lookup(name, ctx)
+        if entry is None or entry.inputs != parse_inputs(doc):
+            bad += 1
+    return bad
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--nodes", type=int, default=1500, help="合成帮助页数量（无 --help-dir 时）")
+    ap.add_argument("--queries", type=int, default=400)
+    ap.add_argument("--help-dir", default="", help="含 nodes.zip 的目录")
+    ap.add_argument("--seed", type=int, default=11)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        if args.help_dir and (Path(args.help_dir) / "nodes.zip").exists():
+            help_dir = Path(args.help_dir)
+        else:
+            help_dir = tmp / "help"
+            help_dir.mkdir()
+            make_nodes_zip(help_dir / "nodes.zip", args.nodes, args.seed)
+        docs = load_pages(help_dir / "nodes.zip")
+
+        t0 = time.perf_counter()
+        corpus = HelpCorpus(help_dir=str(help_dir), cache_dir=str(tmp / "cache"))
+        t_build = time.perf_counter() - t0
+        corpus.close()
+        t0 = time.perf_counter()
+        corpus = HelpCorpus(help_dir=str(help_dir), cache_dir=str(tmp / "cache"))
+        t_open = time.perf_counter() - t0
+        size = (tmp / "cache" / "help_corpus.bin").stat().st_size
+
+        categories = {}
+        hou_names = {c[0]: c[1] for c in _CONTEXTS}
+        for ctx, name in docs:
+            categories.setdefault(hou_names.get(ctx, ctx.capitalize()), {})[name] = _NodeType(ctx, name)
+            _HelpHandler.pages[f"/nodes/{ctx}/{name}"] = _html(docs[(ctx, name)])
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _HelpHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        legacy = LegacyDoc(categories, server.server_address[1])
+
+        rng = random.Random(args.seed)
+        keys = [k for k in docs if k[0] in hou_names]
+        rng.shuffle(keys)
+        queries = _queries(rng, keys, args.queries)
+        costs = {"old": {1: [], 2: []}, "new": {1: [], 2: []}}
+        for mode, fn in (("old", legacy.get), ("new", lambda n, c, p: (True, corpus.page(n, c, p)))):
+            for name, ctx, page in queries:
+                t0 = time.perf_counter()
+                ok, _text = fn(name, ctx, page)
+                costs[mode][min(page, 2)].append(time.perf_counter() - t0)
+        server.shutdown()
+        server.server_close()
+
+        print(f"\n{len(docs)} 个帮助页，{len(queries)} 次查询")
+        print(f"  语料构建 {t_build * 1e3:.0f}ms，打开(mmap) {t_open * 1e3:.1f}ms，"
+              f"文件 {size / 1024:.0f}KB，{len(corpus)} 个索引键")
+        print(f"  {'查询':<10}{'次数':>6}{'old 中位':>12}{'old p95':>12}{'new 中位':>12}{'new p95':>12}")
+        for page, label in ((1, "首页"), (2, "翻页")):
+            old, new = costs["old"][page], costs["new"][page]
+            if old:
+                print(f"  {label:<10}{len(old):>6}{statistics.median(old) * 1e3:>10.3f}ms"
+                      f"{_p95(old) * 1e3:>10.3f}ms{statistics.median(new) * 1e3:>10.3f}ms"
+                      f"{_p95(new) * 1e3:>10.3f}ms")
+        old_total = sum(sum(v) for v in costs["old"].values())
+        new_total = sum(sum(v) for v in costs["new"].values())
+        print(f"\n  总耗时 old {old_total * 1e3:.0f}ms / new {new_total * 1e3:.1f}ms"
+              f"（{old_total / max(new_total, 1e-9):.0f}x）")
+
+        bad = _check(corpus, legacy, docs)
+        corpus.close()
+    print(f"\n分页格式与 @inputs 一致: {'OK' if not bad else f'MISMATCH ({bad})'}")
+    return 0 if not bad else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
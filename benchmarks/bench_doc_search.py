@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+文档检索基准：倒排索引 (BM25 + n-gram) vs 旧版线性扫描
+
+用法（项目根目录）::
+
+    python benchmarks/bench_doc_search.py [--repeat 50]
+
+使用项目内置 Doc/ 目录（vex.zip / hom.zip / *.txt 知识库），无需 Houdini。
+旧版实现原样复制在本文件中（_legacy_search / _legacy_search_knowledge）作为对照。
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from houdini_agent.utils.doc_rag import HoudiniDocIndex  # noqa: E402
+
+
+QUERIES = [
+    "noise", "pcfind", "hou.Node", "attribute wrangle", "heightfield erosion",
+    "侵蚀 地形", "rbd fracture", "setpointattrib", "parm", "copy to points 复制",
+    "scatter points on surface", "vellum cloth", "hou.Geometry.points",
+    "xyzdist primuv", "volume sample", "mpm snow", "onnx inference",
+    "如何创建属性", "group expression", "labs trim texture",
+]
+
+
+# ============================================================
+# 旧版实现（对照组）
+# ============================================================
+
+def _legacy_search_knowledge(index, query, top_k=3):
+    if not index.knowledge_chunks:
+        return []
+    ql = query.lower()
+    query_words = set(re.findall(r'[a-zA-Z_@][a-zA-Z0-9_@.]*', ql))
+    query_cn = set(re.findall(r'[\u4e00-\u9fff]{2,}', query))
+    scored = []
+    for chunk in index.knowledge_chunks:
+        score = 0.0
+        chunk_kw_set = set(chunk.keywords)
+        matched = query_words & chunk_kw_set
+        score += len(matched) * 0.3
+        for cn in query_cn:
+            if cn in chunk.title or cn in chunk.content[:200]:
+                score += 0.5
+        for w in query_words:
+            if len(w) >= 3 and w in chunk.title.lower():
+                score += 0.8
+        if score > 0.2:
+            scored.append((score, chunk))
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return [{"type": "knowledge", "name": c.title, "score": min(s, 1.0)}
+            for s, c in scored[:top_k]]
+
+
+def _legacy_search(index, query, top_k=5):
+    results = []
+    ql = query.lower().strip()
+    node = index.lookup_node(ql)
+    if node:
+        results.append({"type": "node", "name": node.node_type, "score": 1.0})
+    vex = index.lookup_vex(ql)
+    if vex:
+        results.append({"type": "vex", "name": vex.name, "score": 1.0})
+    hom = index.lookup_hom(query)
+    if hom:
+        results.append({"type": "hom", "name": hom.name, "score": 1.0})
+
+    if len(results) < top_k:
+        words = {w for w in re.findall(r"[a-zA-Z_][a-zA-Z0-9_]{2,}", ql)}
+        seen = {r["name"] for r in results}
+        for w in words:
+            if len(results) >= top_k:
+                break
+            for ntype in (index._all_node_types or set()):
+                if w in ntype.lower() and ntype not in seen:
+                    results.append({"type": "node", "name": ntype, "score": 0.5})
+                    seen.add(ntype)
+                    if len(results) >= top_k:
+                        break
+            for fname in index.vex_index:
+                if w in fname.lower() and fname not in seen:
+                    results.append({"type": "vex", "name": fname, "score": 0.4})
+                    seen.add(fname)
+                    if len(results) >= top_k:
+                        break
+            for hname in index.hom_index:
+                if w in hname.lower() and hname not in seen:
+                    results.append({"type": "hom", "name": hname, "score": 0.4})
+                    seen.add(hname)
+                    if len(results) >= top_k:
+                        break
+
+    if len(results) < top_k:
+        kb = _legacy_search_knowledge(index, query, top_k=top_k - len(results))
+        seen = {r["name"] for r in results}
+        for kr in kb:
+            if kr["name"] not in seen:
+                results.append(kr)
+                seen.add(kr["name"])
+
+    results.sort(key=lambda x: x["score"], reverse=True)
+    return results[:top_k]
+
+
+# ============================================================
+# 计时
+# ============================================================
+
+def _time_queries(fn, repeat):
+    """返回每条查询的平均耗时列表 (ms)"""
+    per_query = []
+    for q in QUERIES:
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            fn(q)
+        per_query.append((time.perf_counter() - t0) * 1000.0 / repeat)
+    return per_query
+
+
+def _report(label, samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"  {label:<28} mean {statistics.mean(samples):8.3f} ms   "
+          f"p50 {statistics.median(samples):8.3f} ms   p95 {p95:8.3f} ms")
+    return statistics.mean(samples)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--repeat", type=int, default=50, help="每条查询重复次数")
+    args = ap.parse_args()
+
+    index = HoudiniDocIndex()
+    # 只比较词法检索；向量层的召回 / 延迟见 bench_doc_semantic.py
+    index._vector_index = False
+    print(f"\n文档集: {len(index._all_node_types or ())} 节点, {len(index.vex_index)} VEX, "
+          f"{len(index.hom_index)} HOM, {len(index.knowledge_chunks)} 知识库片段")
+
+    t0 = time.perf_counter()
+    built = index._build_search_index()
+    print(f"倒排索引构建: {(time.perf_counter() - t0) * 1000:.1f} ms "
+          f"({len(built)} 文档, {len(built.postings)} 词项, {len(built.grams)} trigram)")
+
+    print(f"\n{len(QUERIES)} 条查询 × {args.repeat} 次:")
+    old = _report("search() 线性扫描 (旧)", _time_queries(
+        lambda q: _legacy_search(index, q), args.repeat))
+    new = _report("search() 倒排索引 (新)", _time_queries(
+        lambda q: index.search(q), args.repeat))
+    print(f"  加速比: {old / max(new, 1e-9):.1f}x")
+
+    old_kb = _report("search_knowledge() 旧", _time_queries(
+        lambda q: _legacy_search_knowledge(index, q), args.repeat))
+    new_kb = _report("search_knowledge() 新", _time_queries(
+        lambda q: index.search_knowledge(q), args.repeat))
+    print(f"  加速比: {old_kb / max(new_kb, 1e-9):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
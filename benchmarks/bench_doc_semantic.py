@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+语义检索基准：词法检索 vs 向量层 vs 混合打分（召回率 + 延迟）
+
+用法（项目根目录）::
+
+    python benchmarks/bench_doc_semantic.py [--repeat 20] [--dim 4096]
+
+查询集取自 trainData/*.jsonl 中的真实用户消息（只保留 LABELS 中标注过的消息，
+标注 = 被视为相关的条目名称子串，小写匹配）。对每种检索方式统计：
+  - hit@k : top-k 中至少有一条相关结果的查询比例
+  - MRR   : 首个相关结果排名倒数的均值
+  - 延迟   : 每条查询平均耗时 (ms)；向量层另测批量查询（search_batch）的单条均摊耗时
+
+auto_retrieve 一栏统计注入上下文中是否包含相关条目（向量层关闭 / 开启）。
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from houdini_agent.utils.doc_rag import HoudiniDocIndex  # noqa: E402
+from houdini_agent.utils import doc_embed  # noqa: E402
+
+
+# trainData 用户消息 → 相关条目名称子串（节点 / VEX 函数名、知识库标题）
+LABELS = {
+    "创建一个HeightField地形，加点噪声和侵蚀":
+        ("erosion", "erode", "heightfield_noise", "noise types"),
+    "我想再在现在的基础上，给部分地形上一个mask，然后在mask上再叠加不同的噪声":
+        ("mask",),
+    "将我选中节点的vex代码改一下随机旋转，每个点的旋转值都不一样":
+        ("rand", "quaternion", "qrotate", "rotate", "orient"),
+    "帮我在instance_objects节点后面创建一个vex，给每个box都随机缩放":
+        ("rand", "pscale", "scale and orientation", "copytopoints"),
+    "先清理当前网络，然后创建风吹草的动画效果。":
+        ("noise", "wind", "grass"),
+    "噪声太弱了，可以加强一点":
+        ("noise", "噪波"),
+    "我把这个节点放到了正确的位置，但是现在你没发现他的pscale值都是一致的吗，他应该每个点都不同":
+        ("rand", "pscale", "几何属性", "scale and orientation"),
+    "你是完全不看报错是吗，我修复了，是@ptnum，不是ptnum":
+        ("ptnum", "全局变量", "属性简写", "获取属性"),
+}
+
+
+def load_queries():
+    """从 trainData/*.jsonl 读取已标注的用户消息（保持文件内出现顺序）"""
+    found = []
+    for path in sorted(glob.glob(os.path.join(ROOT, "trainData", "*.jsonl"))):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    messages = json.loads(line).get("messages", [])
+                except ValueError:
+                    continue
+                for m in messages:
+                    text = m.get("content") if m.get("role") == "user" else None
+                    if isinstance(text, str) and text.strip() in LABELS and text.strip() not in found:
+                        found.append(text.strip())
+    return found
+
+
+def _relevant(name: str, labels) -> bool:
+    low = name.lower()
+    return any(l in low for l in labels)
+
+
+def _evaluate(name, fn, queries, repeat, k=5):
+    hits3 = hits5 = 0
+    rr = []
+    times = []
+    for q in queries:
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            names = fn(q)
+        times.append((time.perf_counter() - t0) * 1000.0 / repeat)
+        ranks = [i for i, n in enumerate(names[:k]) if _relevant(n, LABELS[q])]
+        hits3 += bool(ranks and ranks[0] < 3)
+        hits5 += bool(ranks)
+        rr.append(1.0 / (ranks[0] + 1) if ranks else 0.0)
+    n = len(queries)
+    print(f"  {name:<30}{hits3 / n:>8.2f}{hits5 / n:>8.2f}{statistics.mean(rr):>8.3f}"
+          f"{statistics.mean(times):>12.3f}")
+
+
+def _names(results):
+    return [r["name"] for r in results]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--repeat", type=int, default=20, help="每条查询重复次数（计时）")
+    ap.add_argument("--dim", type=int, default=None, help="HashedEmbedder 维度（默认同正式配置）")
+    args = ap.parse_args()
+
+    queries = load_queries()
+    if not queries:
+        print("trainData/*.jsonl 中没有找到已标注的查询")
+        return
+    index = HoudiniDocIndex()
+    embedder = doc_embed.HashedEmbedder(args.dim) if args.dim else doc_embed.create_embedder()
+
+    t0 = time.perf_counter()
+    vec = doc_embed.DocVectorIndex.build(embedder, index._vector_items())
+    print(f"\n{len(queries)} 条查询 (trainData), 向量化器 {embedder.ident}, "
+          f"{len(vec)} 文档, 构建 {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    kinds = index._VECTOR_KINDS
+    print(f"\n  {'方式':<30}{'hit@3':>8}{'hit@5':>8}{'MRR':>8}{'ms/query':>12}")
+
+    index._vector_index = False
+    _evaluate("词法 search()", lambda q: _names(index.search(q)), queries, args.repeat)
+    _evaluate("BM25+术语扩展 (向量层关闭)", lambda q: _names(
+        index.semantic_search(q, kinds=kinds)), queries, args.repeat)
+
+    def _vector_only(q):
+        return [index._make_result(kind, key, s)["name"] for s, kind, key in
+                vec.search(q, kinds=kinds, top_k=5)]
+    _evaluate("向量层 (余弦)", _vector_only, queries, args.repeat)
+
+    index._vector_index = vec
+    _evaluate("混合 semantic_search()", lambda q: _names(
+        index.semantic_search(q, kinds=kinds)), queries, args.repeat)
+
+    # 批量查询：一次矩阵乘法处理全部查询
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        vec.search_batch(queries, kinds=kinds, top_k=5)
+    per = (time.perf_counter() - t0) * 1000.0 / args.repeat / len(queries)
+    print(f"  {'向量层 search_batch() 均摊':<30}{'':>24}{per:>12.3f}")
+
+    print("\n  auto_retrieve 注入相关条目的查询比例:")
+    for label, state in (("向量层关闭", False), ("向量层开启", vec)):
+        index._vector_index = state
+        hit = 0
+        for q in queries:
+            ctx = index.auto_retrieve(q).lower()
+            hit += any(l in ctx for l in LABELS[q])
+        print(f"    {label}: {hit}/{len(queries)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+"""
+历史恢复基准：分批渲染全部历史（旧实现）vs HistoryView 虚拟化（只实例化视口附近的组）
+
+用法（项目根目录，需要 PySide6 / PySide2）::
+
+    python benchmarks/bench_history_render.py [--messages 2000] [--width 480] [--height 900] [--seed 5]
+
+按固定随机种子生成一个长会话（用户消息 / 原生工具调用轮次 / 带思考与 Python Shell 的回复 /
+Markdown 正文与代码块 / 少量 add_todo），用 SessionLogStore 写成会话日志，
+在离屏 Qt 中创建真实的 AITab，经 _load_cache 恢复：
+
+  old  : 改造前的 _render_conversation_history（首批 30 组 + QTimer 分批渲染其余组）
+  full : 同一代码一次性同步渲染全部组（old 的分批逻辑在单组超出时间预算时会跳过其余组，
+         这里作为"全部实例化"的参照）
+  new  : HistoryView 虚拟化
+
+每种方式在独立子进程中运行（常驻内存互不干扰），报告首屏耗时、全部完成耗时、
+对话区控件数、顶层控件数、进程 RSS 增量；new 另外从底部逐屏滚动到顶部，报告每屏的
+首帧耗时（视口内容就绪）与预加载完成耗时，以及滚动中的控件数峰值。
+滚动结束后 new 已实测全部组的高度，其总和必须与 full 全量布局的历史高度一致。
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# 部分 PySide6 版本在 Python < 3.12（None 尚不是 immortal 对象）上每次调用文本控件 API 都会
+# 少计一次 None 的引用，几万次调用后触发 none_dealloc 崩溃；预先多持有一些 None 引用规避
+_NONE_GUARD = [None] * 20_000_000 if sys.version_info < (3, 12) else []
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_hou import MockHou  # noqa: E402
+
+sys.modules.setdefault("hou", MockHou())
+
+from houdini_agent.qt_compat import QtWidgets, QtCore  # noqa: E402
+from houdini_agent.ui.ai_tab import AITab  # noqa: E402
+from houdini_agent.ui.cursor_widgets import TodoList  # noqa: E402
+from houdini_agent.utils.session_log import SessionLogStore  # noqa: E402
+
+
+# ============================================================
+# 旧实现（AITab._render_conversation_history 改造前：分批渲染全部历史）
+# ============================================================
+
+class LegacyRender:
+    _BATCH_INITIAL = 30
+    _BATCH_SIZE = 15
+    _BATCH_BUDGET_MS = 8
+
+    def _render_conversation_history(self):
+        while self.chat_layout.count() > 1:
+            item = self.chat_layout.takeAt(0)
+            if item.widget():
+                item.widget().deleteLater()
+        if getattr(self, '_batch_render_timer', None) is not None:
+            self._batch_render_timer.stop()
+            self._batch_render_timer = None
+        messages = self._conversation_history
+        if not messages:
+            return
+        groups = self._group_messages_into_turns(messages)
+        total_groups = len(groups)
+        if total_groups <= self._BATCH_INITIAL:
+            self._render_message_groups(groups, 0, total_groups)
+            return
+        early_count = total_groups - self._BATCH_INITIAL
+        self._batch_placeholder = QtWidgets.QLabel(f"⏳ 加载历史消息 ({early_count} 轮)...")
+        self.chat_layout.insertWidget(self.chat_layout.count() - 1, self._batch_placeholder)
+        self._render_message_groups(groups, early_count, total_groups)
+        self._batch_groups = groups
+        self._batch_cursor = early_count
+        self._batch_insert_pos = 0
+        self._batch_render_timer = QtCore.QTimer(self)
+        self._batch_render_timer.setSingleShot(True)
+        self._batch_render_timer.timeout.connect(self._render_next_batch)
+        self._batch_render_timer.start(0)
+
+    def _render_message_groups(self, groups, start, end):
+        messages = self._conversation_history
+        for gi in range(start, end):
+            si, ei = groups[gi]
+            self._render_single_group(messages, si, ei)
+
+    def _render_next_batch(self):
+        if not getattr(self, '_batch_groups', None):
+            return
+        if self._batch_cursor <= 0:
+            self._finish_batch_render()
+            return
+        batch_start = max(0, self._batch_cursor - self._BATCH_SIZE)
+        batch_end = self._batch_cursor
+        start_time = time.time()
+        messages = self._conversation_history
+        insert_pos = self._batch_insert_pos
+        for gi in range(batch_start, batch_end):
+            si, ei = self._batch_groups[gi]
+            widgets_before = self.chat_layout.count()
+            self._render_single_group(messages, si, ei)
+            added = self.chat_layout.count() - widgets_before
+            for _ in range(added):
+                item = self.chat_layout.takeAt(self.chat_layout.count() - 2)
+                if item and item.widget():
+                    self.chat_layout.insertWidget(insert_pos, item.widget())
+                    insert_pos += 1
+            if (time.time() - start_time) * 1000 > self._BATCH_BUDGET_MS and gi < batch_end - 1:
+                self._batch_cursor = gi + 1
+                self._batch_insert_pos = insert_pos
+                self._batch_render_timer.start(0)
+                return
+        self._batch_cursor = batch_start
+        self._batch_insert_pos = insert_pos
+        if self._batch_cursor > 0:
+            self._batch_render_timer.start(0)
+        else:
+            self._finish_batch_render()
+
+    def _finish_batch_render(self):
+        if getattr(self, '_batch_placeholder', None):
+            self._batch_placeholder.setVisible(False)
+            self._batch_placeholder.deleteLater()
+            self._batch_placeholder = None
+        self._batch_groups = None
+        self._batch_render_timer = None
+
+
+# ============================================================
+# 合成会话
+# ============================================================
+
+_WORDS = ("节点", "参数", "/obj/geo1/box1", "attribwrangle", "@P.y", "Cd", "0.25", "cook", "点数",
+          "primitive", "scatter", "VEX", "copytopoints", "网格", "法线", "group", "subnet")
+
+
+def _text(rng, n_words):
+    return " ".join(rng.choice(_WORDS) for _ in range(n_words))
+
+
+def _markdown(rng):
+    parts = [_text(rng, rng.randint(10, 60))]
+    if rng.random() < 0.5:
+        parts.append("\n".join(f"- {_text(rng, rng.randint(3, 12))}" for _ in range(rng.randint(2, 6))))
+    if rng.random() < 0.35:
+        code = "\n".join(f"v@P += {rng.random():.3f} * v@N;  // {_text(rng, 3)}"
+                         for _ in range(rng.randint(3, 20)))
+        parts.append(f"```vex\n{code}\n```")
+    parts.append(_text(rng, rng.randint(5, 40)))
+    return "\n\n".join(parts)
+
+
+_TOKEN_STATS = {'input_tokens': 0, 'output_tokens': 0, 'reasoning_tokens': 0, 'cache_read': 0,
+                'cache_write': 0, 'total_tokens': 0, 'requests': 0, 'estimated_cost': 0.0}
+
+
+def build_history(n_messages, rng):
+    history = []
+    turn = 0
+    while len(history) < n_messages:
+        turn += 1
+        user = _text(rng, rng.randint(4, 40))
+        if rng.random() < 0.1:
+            user += "\n\n[Network structure]\n" + "\n".join(f"/obj/geo1/n{k} (attribwrangle)" for k in range(40))
+        history.append({'role': 'user', 'content': user})
+        r = rng.random()
+        if r < 0.7:
+            for step in range(rng.randint(1, 3)):
+                calls = [{'id': f"c{turn}_{step}_{k}", 'type': 'function',
+                          'function': {'name': rng.choice(("get_node_parameters", "create_node",
+                                                           "set_node_parameter", "execute_python")),
+                                       'arguments': json.dumps({'node_path': f"/obj/geo1/n{k}"})}}
+                         for k in range(rng.randint(1, 3))]
+                if rng.random() < 0.05:
+                    calls.append({'id': f"c{turn}_{step}_todo", 'type': 'function',
+                                  'function': {'name': 'add_todo', 'arguments': json.dumps(
+                                      {'todo_id': f"t{turn}", 'text': _text(rng, 4)})}})
+                history.append({'role': 'assistant', 'content': None, 'tool_calls': calls})
+                for c in calls:
+                    history.append({'role': 'tool', 'tool_call_id': c['id'],
+                                    'content': _text(rng, rng.randint(20, 400))})
+            final = {'role': 'assistant', 'content': _markdown(rng)}
+            if rng.random() < 0.3:
+                final['thinking'] = _text(rng, rng.randint(20, 200))
+            if rng.random() < 0.15:
+                final['python_shells'] = [{'code': "print(hou.node('/obj').children())",
+                                           'output': "输出:\n" + _text(rng, 30) + "\n执行时间: 0.012s",
+                                           'error': '', 'success': True}]
+            history.append(final)
+        else:
+            history.append({'role': 'assistant', 'content': _markdown(rng),
+                            **({'thinking': _text(rng, 60)} if r < 0.85 else {})})
+    return history[:n_messages]
+
+
+# ============================================================
+# 测量
+# ============================================================
+
+def _rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def _flush_deletes(app):
+    app.sendPostedEvents(None, QtCore.QEvent.DeferredDelete)
+
+
+def _widgets(tab):
+    return len(tab.chat_container.findChildren(QtWidgets.QWidget))
+
+
+def _top_level(tab):
+    """对话区中显示的消息控件（不含占位与 TodoList）"""
+    layout = tab.chat_layout
+    shown = [layout.itemAt(i).widget() for i in range(layout.count())]
+    return [w for w in shown if w is not None and not w.isHidden()
+            and not isinstance(w, TodoList) and w.objectName() != "historySpacer"]
+
+
+def _history_height(tab):
+    """全量布局中历史部分的高度（首个控件顶部到最后一个控件底部）"""
+    shown = _top_level(tab)
+    return shown[-1].geometry().bottom() + 1 - shown[0].geometry().top() + max(0, tab.chat_layout.spacing())
+
+
+def run_mode(mode, args):
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+    rng = random.Random(args.seed)
+    history = build_history(args.messages, rng)
+    tmp = tempfile.mkdtemp(prefix="bench_history_")
+    store = SessionLogStore(tmp)
+    store.save("bench", history, {'context_summary': '', 'todo_data': [], 'token_stats': dict(_TOKEN_STATS)})
+    store.flush()
+    path = store.log_path("bench")
+
+    if mode in ("old", "full"):
+        for name, fn in vars(LegacyRender).items():
+            if not name.startswith("__"):
+                setattr(AITab, name, fn)
+        if mode == "full":
+            AITab._BATCH_INITIAL = 10 ** 9
+    tab = AITab()
+    tab.resize(args.width, args.height)
+    tab.show()
+    for _ in range(5):
+        app.processEvents()
+    _flush_deletes(app)
+    base_rss, base_widgets = _rss(), _widgets(tab)
+
+    t0 = time.perf_counter()
+    tab._load_cache(path, silent=True)
+    first = time.perf_counter() - t0
+    deadline = time.perf_counter() + 600
+    if mode != "new":
+        while getattr(tab, '_batch_groups', None) and time.perf_counter() < deadline:
+            app.processEvents()
+    view = tab._history_view()
+    estimates = list(view._heights) if view is not None else []
+    while view is not None and view._timer.isActive() and time.perf_counter() < deadline:
+        app.processEvents()
+    for _ in range(3):
+        app.processEvents()
+    total = time.perf_counter() - t0
+    _flush_deletes(app)
+    result = {
+        'mode': mode, 'messages': len(history),
+        'groups': len(tab._group_messages_into_turns(history)),
+        'first': first, 'total': total,
+        'widgets': _widgets(tab) - base_widgets,
+        'top_level': len(_top_level(tab)),
+        'rss': _rss() - base_rss,
+    }
+    if mode != "new":
+        result['history_height'] = _history_height(tab)
+        return result
+
+    # 从底部逐屏滚动到顶部
+    sb = tab.scroll_area.verticalScrollBar()
+    result['at_bottom'] = sb.value() >= sb.maximum() - 2
+    step = max(1, int(tab.scroll_area.viewport().height() * 0.9))
+    frames, costs, peak = [], [], result['widgets']
+    while sb.value() > 0:
+        t0 = time.perf_counter()
+        sb.setValue(max(0, sb.value() - step))
+        app.processEvents()
+        frames.append(time.perf_counter() - t0)
+        while view._timer.isActive():
+            app.processEvents()
+        costs.append(time.perf_counter() - t0)
+        _flush_deletes(app)
+        peak = max(peak, _widgets(tab) - base_widgets)
+    frames.sort()
+    costs.sort()
+    measured = sum(view._heights)
+    result.update({
+        'scroll_steps': len(costs),
+        'frame_p50': frames[len(frames) // 2] if frames else 0.0,
+        'frame_max': frames[-1] if frames else 0.0,
+        'settle_p50': costs[len(costs) // 2] if costs else 0.0,
+        'scroll_peak_widgets': peak,
+        'all_measured': all(view._measured),
+        'history_height': measured,
+        'estimated_height': sum(estimates),
+        'estimate_error': (sum(abs(e - m) for e, m in zip(estimates, view._heights)) / max(measured, 1)),
+        'view_stats': view.stats,
+    })
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--messages", type=int, default=2000)
+    ap.add_argument("--width", type=int, default=480, help="面板宽度（像素）")
+    ap.add_argument("--height", type=int, default=900, help="面板高度（像素）")
+    ap.add_argument("--seed", type=int, default=5)
+    ap.add_argument("--only", choices=("old", "full", "new"), help="只在当前进程运行一种方式（输出 JSON）")
+    args = ap.parse_args()
+
+    if args.only:
+        print("RESULT " + json.dumps(run_mode(args.only, args)))
+        return 0
+
+    results = {}
+    for mode in ("old", "full", "new"):
+        cmd = [sys.executable, os.path.abspath(__file__), "--only", mode,
+               "--messages", str(args.messages), "--width", str(args.width),
+               "--height", str(args.height), "--seed", str(args.seed)]
+        out = subprocess.run(cmd, capture_output=True, text=True, cwd=ROOT).stdout
+        line = next((ln for ln in out.splitlines() if ln.startswith("RESULT ")), None)
+        if line is None:
+            print(f"  {mode} 运行失败:\n{out[-2000:]}")
+            return 1
+        results[mode] = json.loads(line[len("RESULT "):])
+
+    full, new = results["full"], results["new"]
+    print(f"\n{new['messages']} 条消息（{new['groups']} 组），面板 {args.width}×{args.height}")
+    print(f"  {'方式':<5}{'首屏':>10}{'全部完成':>10}{'控件数':>9}{'顶层控件':>9}{'RSS 增量':>11}")
+    for r in results.values():
+        print(f"  {r['mode']:<5}{r['first'] * 1e3:>8.1f}ms{r['total'] * 1e3:>8.0f}ms"
+              f"{r['widgets']:>9}{r['top_level']:>9}{r['rss'] / 1e6:>9.1f}MB")
+    print(f"\n  new 滚动到顶部: {new['scroll_steps']} 屏，首帧 p50 {new['frame_p50'] * 1e3:.1f}ms / "
+          f"最大 {new['frame_max'] * 1e3:.1f}ms，预加载完成 p50 {new['settle_p50'] * 1e3:.1f}ms，"
+          f"控件数峰值 {new['scroll_peak_widgets']}")
+    print(f"  new 统计: {new['view_stats']}")
+    print(f"  高度估算: 估算合计 {new['estimated_height']}px / 实测 {new['history_height']}px，"
+          f"逐组误差合计 {new['estimate_error'] * 100:.1f}%")
+    print(f"  恢复后停在底部: {'是' if new['at_bottom'] else '否'}")
+    ok = new['at_bottom'] and new['all_measured'] and abs(new['history_height'] - full['history_height']) <= 2
+    print(f"\n虚拟化布局高度与全量布局一致（full {full['history_height']}px / new {new['history_height']}px）: "
+          f"{'OK' if ok else 'MISMATCH'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    code = main()
+    sys.stdout.flush()
+    os._exit(code)
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+面板启动基准：-X importtime 导入报告，对比改造前的提交（全部模块立即导入 + 每次 show_tool 重载）
+
+用法（项目根目录）::
+
+    python benchmarks/bench_import_time.py [--runs 5] [--top 20] [--baseline REV] [--no-baseline]
+
+hou 用 mock_hou 替身，Qt 用 offscreen 平台。每次在新的子进程里用 -X importtime 导入 houdini_agent.main，
+再创建 AIClient / HoudiniMCP（面板 __init__ 里做的事）：
+
+  启动导入  : 导入 main + 创建客户端期间所有模块的导入时间，Qt（PySide6 / shiboken6）单独列出（Houdini 里已加载）
+  初始化    : AIClient() + HoudiniMCP() 的耗时
+  延迟模块  : 启动后不应出现在 sys.modules 里的模块（requests、asyncio、ssl、perf_report、doc_rag ...）
+  首次使用  : 访问代理后模块真正导入，异常类登记到 AIClient 的超时 / 连接错误元组
+  重载      : main._reload_modules()（旧版每次 show_tool 都执行，新版需 HOUDINI_AGENT_DEV_RELOAD=1）
+  报告      : 自身导入时间最长的 --top 个模块，按顶层包汇总
+
+旧版：从 git 取出 --baseline 提交的 houdini_agent / shared 到临时目录（lib 用符号链接）同样测量；
+默认是引入 utils/lazy_import.py 的提交的父提交（尚未提交时为 HEAD）。
+"""
+
+import os
+import io
+import sys
+import json
+import shutil
+import tarfile
+import argparse
+import tempfile
+import statistics
+import subprocess
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 启动后不应该已经导入的模块（第一次使用对应功能时才导入）
+DEFERRED = [
+    'requests', 'urllib3', 'charset_normalizer', 'idna', 'asyncio', 'ssl', 'trafilatura', 'bs4',
+    'houdini_agent.utils.async_transport',
+    'houdini_agent.utils.perf_report',
+    'houdini_agent.utils.doc_rag',
+    'houdini_agent.utils.doc_corpus',
+    'houdini_agent.utils.updater',
+    'houdini_agent.utils.training_data_exporter',
+    'houdini_agent.ui.font_settings_dialog',
+]
+
+QT_PACKAGES = ('PySide6', 'PySide2', 'shiboken6', 'shiboken2', 'shibokensupport')
+
+STARTUP_END = '-- startup end --'
+
+# 子进程：导入 main、创建客户端，输出 JSON（-X importtime 的报告在 stderr）
+CHILD = r'''
+import sys, json, time
+root, bench, deferred = sys.argv[1], sys.argv[2], json.loads(sys.argv[3])
+sys.path.insert(0, root)
+sys.path.insert(0, bench)
+from mock_hou import MockHou
+sys.modules.setdefault("hou", MockHou())
+t0 = time.perf_counter()
+import houdini_agent.main as main
+t1 = time.perf_counter()
+from houdini_agent.utils import ai_client
+from houdini_agent.utils.mcp import client as mcp_client
+ai_client.AIClient()
+mcp_client.HoudiniMCP()
+t2 = time.perf_counter()
+out = {"import": t1 - t0, "init": t2 - t1, "loaded": [m for m in deferred if m in sys.modules]}
+sys.stderr.write("-- startup end --\n")
+sys.stderr.flush()
+
+# 首次使用：代理导入真实模块，异常类登记到元组（旧版没有代理，记为 None）
+first_use = None
+if hasattr(ai_client, "async_transport"):
+    session = ai_client.requests.Session()
+    ai_client.async_transport.backoff_delay(0, 1.0)
+    timeouts = ai_client._TIMEOUT_ERRORS
+    first_use = ("requests" in sys.modules and session.__class__.__module__.startswith("requests")
+                 and ai_client.requests.exceptions.Timeout in timeouts
+                 and ai_client.async_transport.TransportTimeout in timeouts
+                 and mcp_client.perf_report.PerfAnalysis.__module__.endswith("perf_report"))
+out["first_use"] = first_use
+
+t3 = time.perf_counter()
+main._reload_modules()
+out["reload"] = time.perf_counter() - t3
+print(json.dumps(out))
+'''
+
+
+# ============================================================
+# -X importtime 报告解析
+# ============================================================
+
+def parse_importtime(text):
+    """返回 [(self_us, cumulative_us, depth, name)]，只保留 mock_hou 之后、启动结束标记之前的导入"""
+    rows = []
+    for line in text.splitlines():
+        if line.startswith(STARTUP_END):
+            break
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        head, cum, name = line.split('|', 2)
+        self_us = int(head.split(':')[1])
+        name = name[1:]  # '|' 后固定一个空格，其余缩进表示嵌套深度
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        rows.append((self_us, int(cum), depth, name.strip()))
+    for i, row in enumerate(rows):
+        if row[3] == 'mock_hou' and row[2] == 0:
+            return rows[i + 1:]
+    return rows
+
+
+def summarize(rows):
+    """(启动导入总时间, 其中 Qt, 按顶层包汇总的自身时间)，单位秒"""
+    groups = defaultdict(int)
+    for self_us, _cum, _depth, name in rows:
+        top = name.split('.')[0]
+        key = '.'.join(name.split('.')[:3]) if top == 'houdini_agent' else top
+        groups[key] += self_us
+    total = sum(groups.values())
+    qt = sum(v for k, v in groups.items() if k in QT_PACKAGES)
+    return total / 1e6, qt / 1e6, groups
+
+
+# ============================================================
+# 测量
+# ============================================================
+
+def measure(root, runs):
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen', PYTHONDONTWRITEBYTECODE='')
+    env.pop('HOUDINI_AGENT_DEV_RELOAD', None)
+    samples = []
+    for i in range(runs + 1):  # 第一次编译 .pyc，不计入
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD, root, BENCH_DIR,
+                               json.dumps(DEFERRED)],
+                              capture_output=True, text=True, env=env, cwd=root)
+        if proc.returncode != 0:
+            raise RuntimeError(f"子进程失败:\n{proc.stderr[-3000:]}")
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        rows = parse_importtime(proc.stderr)
+        result['total'], result['qt'], result['groups'] = summarize(rows)
+        result['rows'] = rows
+        if i:
+            samples.append(result)
+    samples.sort(key=lambda r: r['total'] - r['qt'])
+    median = samples[len(samples) // 2]
+    median['init'] = statistics.median(r['init'] for r in samples)
+    median['reload'] = statistics.median(r['reload'] for r in samples)
+    return median
+
+
+def default_baseline():
+    try:
+        revs = subprocess.run(['git', 'log', '--diff-filter=A', '--format=%H', '--',
+                               'houdini_agent/utils/lazy_import.py'],
+                              capture_output=True, text=True, cwd=ROOT, check=True).stdout.split()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{revs[-1]}^" if revs else 'HEAD'
+
+
+def extract_baseline(rev, dest):
+    """git archive 取出 rev 的 houdini_agent / shared；lib（第三方依赖）与当前树共用"""
+    data = subprocess.run(['git', 'archive', '--format=tar', rev, 'houdini_agent', 'shared'],
+                          capture_output=True, cwd=ROOT, check=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+        tar.extractall(dest)
+    lib = os.path.join(ROOT, 'lib')
+    if os.path.isdir(lib):
+        os.symlink(lib, os.path.join(dest, 'lib'), target_is_directory=True)
+
+
+def print_report(label, res, top):
+    print(f"\n{label}：启动导入 {res['total'] * 1e3:.0f}ms（Qt {res['qt'] * 1e3:.0f}ms，"
+          f"其余 {(res['total'] - res['qt']) * 1e3:.0f}ms），初始化 {res['init'] * 1e3:.0f}ms，"
+          f"重载 {res['reload'] * 1e3:.0f}ms")
+    groups = sorted(res['groups'].items(), key=lambda kv: -kv[1])[:top]
+    print("  按包汇总（自身时间）:")
+    for name, us in groups:
+        print(f"    {us / 1e3:8.1f}ms  {name}")
+    print("  自身时间最长的模块:")
+    for self_us, cum, _depth, name in sorted(res['rows'], key=lambda r: -r[0])[:top]:
+        print(f"    {self_us / 1e3:8.1f}ms  (累计 {cum / 1e3:7.1f}ms)  {name}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--runs", type=int, default=5, help="每个版本测量的次数（取中位数）")
+    ap.add_argument("--top", type=int, default=20, help="报告列出的模块数")
+    ap.add_argument("--baseline", default=None, help="对比的 git 提交（默认：引入 lazy_import.py 之前）")
+    ap.add_argument("--no-baseline", action="store_true", help="只测当前树")
+    args = ap.parse_args()
+
+    new = measure(ROOT, args.runs)
+    print_report("new（当前树）", new, args.top)
+    ok = not new['loaded'] and new['first_use'] is True
+    print(f"\n延迟模块：启动后已导入 {new['loaded'] or '无'}")
+    print(f"首次使用：{'代理导入正常、异常类已登记' if new['first_use'] else '失败'}")
+
+    rev = None if args.no_baseline else (args.baseline or default_baseline())
+    if rev:
+        tmp = tempfile.mkdtemp(prefix='houdini_agent_baseline_')
+        try:
+            extract_baseline(rev, tmp)
+            old = measure(tmp, args.runs)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        print_report(f"old（{rev}）", old, args.top)
+        print(f"\n延迟模块：old 启动后已导入 {len(old['loaded'])} 个 {old['loaded']}")
+        new_app = new['total'] - new['qt'] + new['init']
+        old_app = old['total'] - old['qt'] + old['init']
+        # 旧版每次 show_tool 都重载全部模块，新版默认不重载
+        print(f"\n首次打开（不含 Qt）：old {old_app * 1e3:.0f}ms / new {new_app * 1e3:.0f}ms"
+              f"（{old_app / new_app:.1f}x）")
+        print(f"再次打开：old 重载 {old['reload'] * 1e3:.0f}ms / new 0ms（开发模式下 {new['reload'] * 1e3:.0f}ms）")
+        ok &= new_app < old_app
+
+    print(f"\n结果一致: {'OK' if ok else 'MISMATCH'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
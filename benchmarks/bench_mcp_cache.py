@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+HoudiniMCP 缓存基准：类级 dict（只增不减）vs cache_store 限额 LRU + TTL + 按节点失效
+
+用法（项目根目录）::
+
+    python benchmarks/bench_mcp_cache.py [--nodes 400] [--steps 5000] [--seed 3]
+
+使用 benchmarks/mock_hou.py 的 hou 替身构建一个 SOP 网络，SceneMirror 监听该网络，
+按固定随机种子模拟一次长会话（每步约 5 秒）：
+
+  get_node_parameters 第 1 页（完整参数表写入分页缓存，依赖节点路径）
+  紧随其后翻到第 2 页 / 隔很久后翻看旧结果的第 2 页（读缓存）
+  execute_python 大段输出（无依赖，只按限额 / TTL 淘汰）
+  用户在 Houdini 中修改节点参数（scene_mirror 事件 → 缓存失效）
+
+  old : HoudiniMCP 原先的 _tool_page_cache 类级 dict
+  new : HoudiniMCP._tool_page_cache（cache_store 命名空间）
+
+报告会话结束时缓存常驻内存（tracemalloc，单独一次运行）、条目数、翻页命中率、
+写入 / 读取缓存的累计耗时，以及过期命中数（缓存文本与节点当前状态不一致；new 必须为 0）。
+"""
+
+import os
+import sys
+import time
+import random
+import hashlib
+import argparse
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_hou import MockHou  # noqa: E402
+
+mock = MockHou()
+sys.modules["hou"] = mock
+
+from houdini_agent.utils.mcp import scene_mirror  # noqa: E402
+from houdini_agent.utils.mcp.client import HoudiniMCP  # noqa: E402
+from houdini_agent.utils.mcp.cache_store import get_cache_registry  # noqa: E402
+
+scene_mirror.hou = mock
+scene_mirror._scene_mirror = None
+
+
+# ============================================================
+# 旧实现（HoudiniMCP._paginate_tool_result 改造前：写入类级 dict）
+# ============================================================
+
+_legacy_page_cache = {}
+
+
+def legacy_paginate(text, cache_key, tool_hint, page=1, page_lines=50):
+    _legacy_page_cache[cache_key] = text
+    lines = text.split('\n')
+    total_lines = len(lines)
+    total_pages = max(1, (total_lines + page_lines - 1) // page_lines)
+    page = max(1, min(page, total_pages))
+    start = (page - 1) * page_lines
+    page_text = '\n'.join(lines[start:min(start + page_lines, total_lines)])
+    if total_pages == 1:
+        return page_text
+    header = f"[第 {page}/{total_pages} 页, 共 {total_lines} 行]\n\n"
+    if page < total_pages:
+        next_page = page + 1
+        footer = f"\n\n[第 {page}/{total_pages} 页] 还有更多内容，调用 {tool_hint.replace(f'page={page}', f'page={next_page}')} 查看下一页"
+    else:
+        footer = f"\n\n[第 {page}/{total_pages} 页 - 最后一页]"
+    return header + page_text + footer
+
+
+# ============================================================
+# 模拟会话
+# ============================================================
+
+def _build(n_nodes):
+    geo = mock.node("/obj").createNode("geo", "geo1")
+    for i in range(n_nodes):
+        geo.createNode("attribwrangle", f"n{i}", parms={"snippet": f"@P.y += {i};"})
+    return geo
+
+
+def render_parameters(node, n_parms=300):
+    """模拟 get_node_parameters 的完整输出（约 20KB，包含节点当前状态）"""
+    snippet = node.parm("snippet").eval()
+    lines = [f"节点: {node.path()} (attribwrangle)", f"snippet = {snippet!r}"]
+    lines += [f"  parm_{k:03d} (Float) 默认: {k * 0.5:.3f} 当前: {k * 0.5 + len(snippet):.3f} [{snippet[:16]}]"
+              for k in range(n_parms)]
+    return "\n".join(lines)
+
+
+def render_python_output(rng):
+    """模拟 execute_python 的大段输出（2–60KB）"""
+    n = rng.randint(40, 1200)
+    return "\n".join(f"/obj/geo1/n{rng.randint(0, 999)}: {rng.random():.6f}" for _ in range(n))
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _session(mode, geo, args, trace=False):
+    """运行一次会话；trace=True 时用 tracemalloc 统计会话结束时缓存常驻内存（不计时）"""
+    rng = random.Random(args.seed)
+    clock = _Clock()
+    ns = HoudiniMCP._tool_page_cache
+    ns.clear()
+    ns._clock = clock
+    legacy = _legacy_page_cache
+    legacy.clear()
+    kids = list(geo._children)
+    recent = []       # 查询过的 (cache_key, node)
+    page2 = hits = stale = 0
+    t_cache = 0.0
+
+    if trace:
+        tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0] if trace else 0
+    for step in range(args.steps):
+        clock.now += 5.0
+        r = rng.random()
+        if r < 0.40:
+            # 工作集集中在少数节点，偶尔换一批
+            node = kids[int(rng.paretovariate(1.2) * 7) % len(kids)] if rng.random() < 0.7 else rng.choice(kids)
+            key = f"get_node_parameters:{node.path()}"
+            text = render_parameters(node)
+            t0 = time.perf_counter()
+            if mode == "old":
+                legacy_paginate(text, key, "hint", 1)
+            else:
+                HoudiniMCP._paginate_tool_result(text, key, "hint", 1, deps=[node.path()])
+            t_cache += time.perf_counter() - t0
+            recent.append((key, node))
+        elif r < 0.75 and recent:
+            # 翻页：多数紧随最近一次查询，少数回看很久以前的结果
+            key, node = recent[-1] if rng.random() < 0.8 else rng.choice(recent)
+            page2 += 1
+            t0 = time.perf_counter()
+            cached = legacy.get(key) if mode == "old" else ns.get(key)
+            t_cache += time.perf_counter() - t0
+            if cached is not None:
+                hits += 1
+                if cached != render_parameters(node):
+                    stale += 1
+        elif r < 0.90:
+            text = render_python_output(rng)
+            key = f"execute_python:{hashlib.md5(str(step).encode()).hexdigest()[:12]}"
+            t0 = time.perf_counter()
+            if mode == "old":
+                legacy_paginate(text, key, "hint", 1)
+            else:
+                HoudiniMCP._paginate_tool_result(text, key, "hint", 1)
+            t_cache += time.perf_counter() - t0
+        else:
+            # 用户手动修改参数（scene_mirror 转发 ParmTupleChanged → 缓存失效）
+            node = rng.choice(kids)
+            node.parm("snippet").set(f"@P.z += {rng.random():.3f};")
+    held = 0
+    if trace:
+        held = tracemalloc.get_traced_memory()[0] - base
+        tracemalloc.stop()
+    entries = len(legacy) if mode == "old" else len(ns)
+    legacy.clear()
+    ns._clock = time.monotonic
+    return held, entries, page2, hits, stale, t_cache, ns.stats()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--nodes", type=int, default=400)
+    ap.add_argument("--steps", type=int, default=5000, help="会话步数（每步约 5 秒）")
+    ap.add_argument("--seed", type=int, default=3)
+    args = ap.parse_args()
+
+    geo = _build(args.nodes)
+    scene_mirror.get_scene_mirror().mirror_for(geo).structure()
+    ns = HoudiniMCP._tool_page_cache
+    print(f"\n{args.nodes} 节点，{args.steps} 步（≈{args.steps * 5 / 3600:.1f} 小时），"
+          f"tool_pages 限额 {ns.max_bytes / 1e6:.1f}MB / {ns.max_entries} 条 / TTL {ns.ttl:.0f}s")
+    print(f"  {'方式':<5}{'常驻内存':>10}{'条目':>7}{'翻页':>7}{'命中':>7}{'命中率':>8}{'过期命中':>9}{'缓存耗时':>10}")
+    ok = True
+    for mode in ("old", "new"):
+        _, entries, page2, hits, stale, t_cache, stats = _session(mode, geo, args)
+        held = _session(mode, geo, args, trace=True)[0]
+        print(f"  {mode:<5}{held / 1e6:>8.1f}MB{entries:>7}{page2:>7}{hits:>7}"
+              f"{hits / max(page2, 1) * 100:>7.1f}%{stale:>9}{t_cache * 1000:>8.1f}ms")
+        if mode == "new":
+            ok = stale == 0 and stats["bytes"] <= ns.max_bytes
+            print(f"\n  new 统计: entries {stats['entries']}  bytes {stats['bytes'] / 1e6:.2f}MB  "
+                  f"evictions {stats['evictions']}  expired {stats['expired']}  "
+                  f"invalidated {stats['invalidated']}")
+    print(f"  registry 合计: {get_cache_registry().stats()['bytes'] / 1e6:.2f}MB")
+    print(f"\nnew 无过期命中且未超限额: {'OK' if ok else 'FAIL'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
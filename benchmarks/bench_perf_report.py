@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+perfMon 报告基准：猜键名的旧 perf_stop_and_report vs perf_report 解析 / 聚合 / 对比引擎
+
+用法（项目根目录）::
+
+    python benchmarks/bench_perf_report.py [--nodes 400] [--frames 24] [--seed 9]
+
+在临时目录生成同一次 profile 的多种夹具文件（不需要 Houdini）：
+  stats_nested.json : {"objects": [{"path": 网络, "children": [{"name": 节点, "events": [...]}]}]} 树形结构
+  stats_events.json : {"events": [{"type", "path", "selfTime", "frame", "memory"}]} 扁平事件列表
+  stats_cook.json   : {"cookStats": {路径: {"time", "count"}}, "memoryStats": {...}} 聚合格式
+  profile.csv       : exportAsCSV 风格的 CSV
+  after.hperf.json  : 优化后的 profile（perf_stop_and_report 写出的伴随 JSON）
+
+场景中埋入已知问题：若干热点节点、同一帧重复 cook 的节点（缓存反复失效）、内存增长大的节点；
+优化后的 profile 去掉重复 cook 并让一个热点变快。
+
+  old : 改造前 _tool_perf_stop_and_report 的统计解析（cookStats / cook_stats 取前 15 项）
+  new : HoudiniMCP 的 perf_stop_and_report / perf_analyze_profile（perf_report 引擎）
+
+报告各格式的解析 + 聚合耗时、两种实现识别出的埋入问题数；正确性检查：各格式聚合结果一致、
+inclusive 时间等于子孙节点 self 时间之和、埋入问题全部被标记、对比报告找到优化的节点、
+停止后翻页 / 下钻可用。
+"""
+
+import csv
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+from pathlib import Path
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_hou import MockHou  # noqa: E402
+
+_hou = sys.modules.setdefault("hou", MockHou())
+
+from houdini_agent.utils.mcp import client as mcp_client  # noqa: E402
+from houdini_agent.utils.perf_report import (PerfAnalysis, PerfProfile, load_profile,  # noqa: E402
+                                             node_id)
+
+
+# ============================================================
+# 夹具
+# ============================================================
+
+def make_scene(rng, n_nodes, frames):
+    """(事件列表, 埋入的问题) —— 事件为 (路径, 帧, self 毫秒, 内存字节)"""
+    nets = [f"/obj/geo{i}" for i in range(max(2, n_nodes // 40))]
+    nodes = []
+    for i in range(n_nodes):
+        net = rng.choice(nets)
+        if rng.random() < 0.2:
+            net += f"/subnet{i % 5}"
+        nodes.append(f"{net}/node{i}")
+    hot = set(rng.sample(nodes, 3))
+    thrash = set(rng.sample([n for n in nodes if n not in hot], 4))
+    memory = set(rng.sample([n for n in nodes if n not in hot | thrash], 3))
+    events = []
+    for f in range(1, frames + 1):
+        for n in nodes:
+            if rng.random() < 0.5 and n not in hot | thrash | memory:
+                continue         # 不是每帧都 cook
+            ms = round(rng.uniform(0.01, 0.4), 3)
+            if n in hot:
+                ms = round(rng.uniform(30, 60), 3)
+            mem = (64 << 20) // frames + 1 if n in memory else 0
+            for _ in range(4 if n in thrash else 1):
+                events.append((n, float(f), ms, mem))
+    return events, {"hot": hot, "recook": thrash, "memory": memory}
+
+
+def write_fixtures(tmp: Path, events):
+    files = {}
+    by_node = {}
+    for path, frame, ms, mem in events:
+        by_node.setdefault(path, []).append((frame, ms, mem))
+
+    # 树形：网络 → children（相对名称）→ events
+    tree = {}
+    for path, evs in by_node.items():
+        parent, name = path.rsplit("/", 1)
+        tree.setdefault(parent, []).append(
+            {"name": name, "events": [{"type": "cook", "selfTime": ms, "frame": f, "memory": mem}
+                                      for f, ms, mem in evs]})
+    nested = {"title": "nested", "objects": [{"path": p, "children": c} for p, c in tree.items()]}
+    files["stats_nested.json"] = nested
+
+    files["stats_events.json"] = {"title": "events", "events": [
+        {"type": "cook", "path": p, "selfTime": ms, "frame": f, "memory": mem} for p, f, ms, mem in events]}
+
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(["Event Type", "Node Path", "Frame", "Self Time (ms)", "Memory Growth"])
+    for p, f, ms, mem in events:
+        w.writerow(["Cook", p, f, ms, mem])
+    files["profile.csv"] = buf.getvalue()
+
+    for name, data in files.items():
+        text = data if isinstance(data, str) else json.dumps(data)
+        (tmp / name).write_text(text, encoding="utf-8")
+
+    # 聚合格式（没有帧信息：重复 cook 只能按 profile 帧数判断）
+    cook = {}
+    for p, evs in by_node.items():
+        cook[p] = {"time": round(sum(ms for _f, ms, _m in evs), 6), "count": len(evs)}
+    mem = {p: {"growth": sum(m for _f, _ms, m in evs)} for p, evs in by_node.items()
+           if any(m for _f, _ms, m in evs)}
+    return {"cookStats": cook, "memoryStats": mem}
+
+
+def optimized(events, planted):
+    """优化后：去掉重复 cook，第一个热点提速 10 倍"""
+    fast = sorted(planted["hot"])[0]
+    out, seen = [], set()
+    for p, f, ms, mem in events:
+        if p in planted["recook"]:
+            if (p, f) in seen:
+                continue
+            seen.add((p, f))
+        out.append((p, f, round(ms / 10, 3) if p == fast else ms, mem))
+    return out, fast
+
+
+# ============================================================
+# 旧实现（改造前 _tool_perf_stop_and_report 的统计解析）
+# ============================================================
+
+def legacy_report(stats_data):
+    report_parts = ["=== 性能分析报告 ==="]
+    names = []
+    if isinstance(stats_data, dict):
+        cook_stats = stats_data.get("cookStats", stats_data.get("cook_stats", {}))
+        if cook_stats:
+            node_times = []
+            if isinstance(cook_stats, dict):
+                for key, val in cook_stats.items():
+                    if isinstance(val, dict):
+                        node_times.append((key, val.get("time", val.get("selfTime", 0))))
+                    elif isinstance(val, (int, float)):
+                        node_times.append((key, val))
+            node_times.sort(key=lambda x: x[1], reverse=True)
+            for name, t in node_times[:15]:
+                report_parts.append(f"  {name}: {t:.2f}ms")
+                names.append(name)
+        else:
+            raw = json.dumps(stats_data, indent=2, default=str, ensure_ascii=False)
+            report_parts.append(raw[:2000])
+    return "\n".join(report_parts), names
+
+
+# ============================================================
+# HoudiniMCP 端到端（模拟一次 perfMon profile）
+# ============================================================
+
+class _FakeProfile:
+    def __init__(self, stats):
+        self._stats = stats
+
+    def stop(self):
+        pass
+
+    def stats(self):
+        return self._stats
+
+    def title(self):
+        return "bench"
+
+
+class _PerfMon:
+    def saveProfile(self, profile, path):
+        Path(path).write_bytes(b"HPERF")
+
+
+def _summary(a: PerfAnalysis):
+    return (round(a.total_ms, 3),
+            {p: (round(s.self_ms, 3), round(s.inclusive_ms, 3), s.cooks, s.memory)
+             for p, s in a.nodes.items()})
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--nodes", type=int, default=400)
+    ap.add_argument("--frames", type=int, default=24)
+    ap.add_argument("--seed", type=int, default=9)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    events, planted = make_scene(rng, args.nodes, args.frames)
+    problems = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        cook_stats = write_fixtures(tmp, events)
+        (tmp / "stats_cook.json").write_text(json.dumps(dict(cook_stats, frames=args.frames)))
+
+        print(f"\n{len(events)} 个事件，{len({e[0] for e in events})} 个节点，{args.frames} 帧")
+        print(f"  {'格式':<20}{'解析+聚合':>12}{'热点':>8}{'重复cook':>10}{'内存':>8}")
+        analyses = {}
+        for name in ("stats_nested.json", "stats_events.json", "profile.csv", "stats_cook.json"):
+            t0 = time.perf_counter()
+            a = PerfAnalysis(load_profile(str(tmp / name)))
+            dt = time.perf_counter() - t0
+            analyses[name] = a
+            found = {k: sum(1 for p in v if k in a.nodes[p].issues) for k, v in planted.items()}
+            print(f"  {name:<20}{dt * 1e3:>10.1f}ms{found['hot']:>6}/{len(planted['hot'])}"
+                  f"{found['recook']:>8}/{len(planted['recook'])}{found['memory']:>6}/{len(planted['memory'])}")
+            if found != {k: len(v) for k, v in planted.items()}:
+                problems.append(f"{name}: 埋入问题未全部标记 {found}")
+            extra = {k for st in a.leaves() for k in st.issues if st.path not in planted[k]}
+            if extra:
+                problems.append(f"{name}: 误报 {extra}")
+
+        t0 = time.perf_counter()
+        _text, legacy_names = legacy_report(cook_stats)
+        dt = time.perf_counter() - t0
+        legacy_hot = len(planted["hot"] & set(legacy_names))
+        print(f"  {'old (cookStats)':<20}{dt * 1e3:>10.1f}ms{legacy_hot:>6}/{len(planted['hot'])}"
+              f"{'-':>8}/{len(planted['recook'])}{'-':>6}/{len(planted['memory'])}  (前 15 项，无层级 / 帧 / 内存)")
+        _text, legacy_names = legacy_report(json.loads((tmp / "stats_nested.json").read_text()))
+        print(f"  {'old (树形结构)':<20}{'':>12}{len(planted['hot'] & set(legacy_names)):>6}/{len(planted['hot'])}"
+              "  (格式未知，输出 2000 字符原始 JSON)")
+
+        # 各格式聚合结果一致（聚合格式没有帧，cook 次数 / 时间仍应一致）
+        base = _summary(analyses["stats_events.json"])
+        for name, a in analyses.items():
+            if _summary(a) != base:
+                problems.append(f"{name}: 聚合结果与事件列表不一致")
+        a = analyses["stats_nested.json"]
+        for path, st in a.nodes.items():
+            desc = sum(s.self_ms for p, s in a.nodes.items() if p == path or p.startswith(path + "/"))
+            if abs(desc - st.inclusive_ms) > 1e-6:
+                problems.append(f"inclusive 不等于子孙 self 之和: {path}")
+                break
+
+        # HoudiniMCP 端到端：stop → 保存 → 翻页 / 下钻 → 与优化后的 profile 对比
+        _hou.perfMon = _PerfMon()
+        mcp = mcp_client.HoudiniMCP()
+        mcp._active_perf_profile = _FakeProfile(json.loads((tmp / "stats_nested.json").read_text()))
+        before = str(tmp / "before.hperf")
+        r1 = mcp._tool_perf_stop_and_report({"save_path": before, "top_n": 60})
+        r2 = mcp._tool_perf_stop_and_report({"top_n": 60, "page": 2})
+        hot_id = node_id(sorted(planted["hot"])[0])
+        r3 = mcp._tool_perf_stop_and_report({"focus": hot_id})
+        after_events, fast = optimized(events, planted)
+        after = PerfProfile.from_stats(
+            {"events": [{"path": p, "selfTime": ms, "frame": f, "memory": m} for p, f, ms, m in after_events]},
+            title="after")
+        (tmp / "after.hperf.json").write_text(json.dumps(after.to_json()))
+        (tmp / "after.hperf").write_bytes(b"HPERF")
+        r4 = mcp._tool_perf_analyze_profile({"profile_path": str(tmp / "after.hperf"), "baseline_path": before})
+        for label, r in (("stop", r1), ("翻页", r2), ("下钻", r3), ("对比", r4)):
+            if not r.get("success"):
+                problems.append(f"{label}: {r.get('error')}")
+        if r1.get("success") and "[第 1/" not in r1["result"]:
+            problems.append("报告未分页")
+        if r3.get("success") and sorted(planted["hot"])[0] not in r3["result"]:
+            problems.append("下钻结果不含目标节点")
+        if r4.get("success"):
+            first = next((l for l in r4["result"].splitlines() if l.startswith("  [n")), "")
+            print(f"\n对比报告首行: {first.strip()}")
+            if fast not in first:
+                problems.append("对比报告首行不是提速的节点")
+            for p in planted["recook"]:
+                if f"已消除 [{node_id(p)}]" not in r4["result"]:
+                    problems.append(f"对比报告未列出已消除的重复 cook: {p}")
+        print(f"报告 {r1.get('result', '').count(chr(10)) + 1} 行/页，下钻 {len(r3.get('result', '').splitlines())} 行")
+
+    for p in problems[:10]:
+        print(f"  ! {p}")
+    print(f"\n结果: {'OK' if not problems else 'MISMATCH'}")
+    return 0 if not problems else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+"""
+Prompt 前缀缓存基准：旧的请求组装与裁剪 vs prompt_cache（冻结附加内容 + 按缓存块裁剪）
+
+用法（项目根目录）::
+
+    python benchmarks/bench_prompt_cache.py [--turns 120] [--tool-kb 4] [--limit 64000] [--seed 3]
+
+按固定随机种子模拟一次长会话，每轮与 AITab / AIClient 一样：
+
+  1. 追加用户消息，组装请求：系统提示 + 历史 + 本轮 RAG 检索结果 / [Context] 提醒，
+     超过压缩阈值时预发送压缩（_run_agent）
+  2. 发送两次请求（工具调用前 / 工具结果回传后）
+  3. 把助手的 tool_calls、工具结果与最终回复写回历史，_manage_context 裁剪
+
+  old : 改造前的实现（RAG / [Context] 只在当轮发送；每次裁剪都重新摘要、逐轮删除）
+  new : prompt_cache（附加内容冻结在 user 消息上原样重发；按缓存块摘要 / 删除）
+        与 AITab._manage_context
+
+服务端按 DeepSeek / OpenAI 的自动前缀缓存计费：一次请求中与近期任一请求逐字节相同的最长前缀
+（工具定义 → 系统提示 → 消息，按整条消息比较）按缓存价格计费。报告缓存命中的输入比例
+（input_cache_ratio）、按 deepseek-chat / claude-sonnet-4-5 定价的输入费用与缓存节省。
+
+另外把 new 的最后一次请求转换为 Anthropic 格式，检查 cache_control 断点不超过 4 个、
+顶层 system 只含开头的系统消息（RAG / [Context] 不在其中）、消息角色严格交替；
+所有 new 请求的 tool 消息都必须能对应到其前面助手消息的 tool_calls。
+"""
+
+import os
+import sys
+import copy
+import json
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_hou import MockHou  # noqa: E402
+
+sys.modules.setdefault("hou", MockHou())
+
+from houdini_agent.ui.ai_tab import AITab  # noqa: E402
+from houdini_agent.ui.i18n import tr  # noqa: E402
+from houdini_agent.utils.ai_client import AIClient, HOUDINI_TOOLS  # noqa: E402
+from houdini_agent.utils.prompt_cache import EXTRAS_FIELD, plan_block_trim, split_rounds  # noqa: E402
+from houdini_agent.utils.token_accounting import get_token_counter, tools_json  # noqa: E402
+from houdini_agent.utils.token_optimizer import TokenOptimizer, calculate_cost_from_stats  # noqa: E402
+
+COUNTER = get_token_counter('')
+
+
+def _summarize(c, n):
+    return c[:n] + '...[summary]'
+
+
+# ============================================================
+# 旧实现（改造前：_run_agent 的预发送压缩 / AITab._manage_context）
+# ============================================================
+
+def legacy_presend(opt, messages, limit):
+    current = COUNTER.messages(messages)
+    if not opt.should_compress(current, limit)[0]:
+        return messages
+    first_system = messages[0] if messages and messages[0].get('role') == 'system' else None
+    last_context = messages[-1] if messages and '[Context]' in (messages[-1].get('content') or '') else None
+    body = messages[1 if first_system else 0:-1 if last_context else len(messages)]
+    rounds = split_rounds(body)
+    n_rounds = len(rounds)
+    protect_n = max(2, int(n_rounds * 0.6))
+    for r_idx in range(n_rounds - protect_n):
+        for m in rounds[r_idx]:
+            if m.get('role') == 'tool':
+                c = m.get('content') or ''
+                if len(c) > 200:
+                    m['content'] = _summarize(c, 200)
+    target = int(limit * 0.7)
+    round_tokens = [COUNTER.messages(rnd) for rnd in rounds]
+    remaining = sum(round_tokens) + COUNTER.messages(
+        ([first_system] if first_system else []) + ([last_context] if last_context else []))
+    while len(rounds) > 2 and remaining > target:
+        rounds.pop(0)
+        remaining -= round_tokens.pop(0)
+    out = [first_system] if first_system else []
+    if n_rounds - len(rounds) > 0:
+        out.append({'role': 'system', 'content': tr('ai.old_rounds', n_rounds - len(rounds))})
+    out.extend(m for rnd in rounds for m in rnd)
+    if last_context:
+        out.append(last_context)
+    return out
+
+
+def legacy_manage_context(self):
+    history = self._conversation_history
+    if len(history) < 6:
+        return
+    old_tokens = COUNTER.messages(history)
+    limit = self._get_current_context_limit()
+    if not self.token_optimizer.should_compress(old_tokens, limit)[0]:
+        return
+    rounds = split_rounds(history)
+    if len(rounds) <= 2:
+        return
+    n_rounds = len(rounds)
+    protect_n = max(2, int(n_rounds * 0.6))
+    for r_idx in range(n_rounds - protect_n):
+        for m in rounds[r_idx]:
+            if m.get('role') == 'tool':
+                c = m.get('content') or ''
+                if len(c) > 200:
+                    m['content'] = _summarize(c, 200)
+    compressed = [m for rnd in rounds for m in rnd]
+    new_tokens = COUNTER.messages(compressed)
+    if new_tokens < limit * self.token_optimizer.budget.compression_threshold:
+        history[:] = compressed
+        return
+    target = int(limit * 0.65)
+    round_tokens = [COUNTER.messages(rnd) for rnd in rounds]
+    while len(rounds) > 2:
+        rounds.pop(0)
+        new_tokens -= round_tokens.pop(0)
+        if new_tokens <= target:
+            break
+    history[:] = [{'role': 'system', 'content': tr('ai.old_rounds', n_rounds - len(rounds))}]
+    history.extend(m for rnd in rounds for m in rnd)
+
+
+# ============================================================
+# 宿主替身（_manage_context 只用到以下属性）
+# ============================================================
+
+class _Signal:
+    def emit(self, *_):
+        pass
+
+
+class _Client:
+    _summarize_tool_content = staticmethod(_summarize)
+
+
+class Host:
+    def __init__(self, limit):
+        self.token_optimizer = TokenOptimizer()
+        self._agent_history = None
+        self._conversation_history = []
+        self._auto_optimize = True
+        self.client = _Client()
+        self._addStatus = _Signal()
+        self._limit = limit
+
+    def _get_current_context_limit(self):
+        return self._limit
+
+    def _render_conversation_history(self):
+        pass
+
+
+# ============================================================
+# 请求组装（与 _run_agent 相同的顺序）
+# ============================================================
+
+def _clean(m):
+    """发送用的消息副本（tool 消息在 _run_agent 中也是副本）"""
+    return {k: v for k, v in m.items() if k != EXTRAS_FIELD}
+
+
+def assemble_old(host, system, extras):
+    history = host._conversation_history
+    messages = [system] + [_clean(m) if m.get('role') == 'tool' else m for m in history] + extras
+    return legacy_presend(host.token_optimizer, messages, host._limit)
+
+
+def assemble_new(host, system, extras):
+    history = host._conversation_history
+    last_user = max(i for i, m in enumerate(history) if m.get('role') == 'user')
+    messages = [system]
+    for i, m in enumerate(history):
+        frozen = m.get(EXTRAS_FIELD)
+        messages.append(_clean(m) if frozen is not None or m.get('role') == 'tool' else m)
+        if frozen and i != last_user:
+            messages.extend(frozen)
+    if extras:
+        history[last_user][EXTRAS_FIELD] = extras
+    else:
+        history[last_user].pop(EXTRAS_FIELD, None)
+    messages.extend(extras)
+    limit = host._limit
+    if host.token_optimizer.should_compress(COUNTER.messages(messages), limit)[0]:
+        head = messages[:1]
+        tail = messages[len(messages) - len(extras):]
+        rounds = split_rounds(messages[1:len(messages) - len(extras)])
+        _, dropped, _ = plan_block_trim(
+            rounds, COUNTER.messages, _summarize,
+            target=int(limit * 0.7),
+            fixed=COUNTER.messages(head + tail),
+            keep_recent=max(2, int(len(rounds) * 0.6)),
+        )
+        messages = list(head)
+        if dropped:
+            messages.append({'role': 'system', 'content': tr('ai.old_rounds', dropped)})
+        messages.extend(m for rnd in rounds[dropped:] for m in rnd)
+        messages.extend(tail)
+    return messages
+
+
+# ============================================================
+# 服务端前缀缓存
+# ============================================================
+
+class PrefixCache:
+    """按整条消息比较的前缀缓存：与近期任一请求的最长公共前缀视为命中"""
+
+    def __init__(self, tool_tokens, keep=16):
+        self.tool_tokens = tool_tokens
+        self.keep = keep
+        self.recent = []
+        self.prompt = self.hit = 0
+
+    def request(self, messages):
+        keys = [json.dumps(m, ensure_ascii=False, sort_keys=True) for m in messages]
+        sizes = [COUNTER.message(m) for m in messages]
+        common = 0
+        for prev in self.recent:
+            n = 0
+            for a, b in zip(prev, keys):
+                if a != b:
+                    break
+                n += 1
+            common = max(common, n)
+        hit = (self.tool_tokens + sum(sizes[:common])) if self.recent else 0
+        self.prompt += self.tool_tokens + sum(sizes)
+        self.hit += hit
+        self.recent = ([keys] + self.recent)[:self.keep]
+
+
+# ============================================================
+# 合成会话
+# ============================================================
+
+def _text(rng, n_chars):
+    words = ("node", "parm", "/obj/geo1/box1", "attribwrangle", "P", "Cd", "0.125", "cook",
+             "{", "}", "错误", "点数", "几何体")
+    out, size = [], 0
+    while size < n_chars:
+        w = rng.choice(words)
+        out.append(w)
+        size += len(w) + 1
+    return " ".join(out)
+
+
+def _turn(rng, turn, tool_kb):
+    calls = [{'id': f"call_{turn}_{k}", 'type': 'function',
+              'function': {'name': 'get_node_parameters', 'arguments': json.dumps({'node_path': f"/obj/geo1/n{k}"})}}
+             for k in range(rng.randint(1, 4))]
+    user = {'role': 'user', 'content': _text(rng, rng.randint(40, 400))}
+    call_msg = {'role': 'assistant', 'content': None, 'tool_calls': calls}
+    tools = [{'role': 'tool', 'tool_call_id': c['id'],
+              'content': _text(rng, int(rng.expovariate(1.0 / (tool_kb * 1024))) + 200)} for c in calls]
+    final = {'role': 'assistant', 'content': _text(rng, rng.randint(200, 2000))}
+    rag = _text(rng, rng.randint(800, 3000)) if rng.random() < 0.5 else ''
+    return user, call_msg, tools, final, rag
+
+
+def chain_ok(messages):
+    """tool 消息都能对应到前面助手消息的 tool_calls"""
+    ids = set()
+    for m in messages:
+        for tc in m.get('tool_calls') or ():
+            ids.add(tc['id'])
+        if m.get('role') == 'tool' and m.get('tool_call_id') not in ids:
+            return False
+    return True
+
+
+def simulate(mode, turns, system, args):
+    host = Host(args.limit)
+    manage = legacy_manage_context if mode == "old" else AITab._manage_context
+    assemble = assemble_old if mode == "old" else assemble_new
+    cache = PrefixCache(COUNTER.text(tools_json(HOUDINI_TOOLS)))
+    history = host._conversation_history
+    chains, last = True, None
+    for turn in turns:
+        user, call_msg, tools, final, rag = copy.deepcopy(turn)
+        history.append(user)
+        extras = []
+        if rag:
+            extras.append({'role': 'system', 'content': rag})
+        extras.append({'role': 'system',
+                       'content': f"[Context] [{len(history)} messages in context, reuse prior info]"})
+        base = assemble(host, system, extras)
+        for request in (base, base + [call_msg] + tools):
+            cache.request(request)
+            chains = chains and chain_ok(request)
+            last = request
+        history.extend([call_msg] + tools + [final])
+        manage(host)
+    return cache, chains, last
+
+
+def anthropic_check(messages):
+    system_blocks, merged = AIClient._convert_messages_to_anthropic(copy.deepcopy(messages))
+    tools = AIClient._convert_tools_to_anthropic(HOUDINI_TOOLS)
+    marks = sum('cache_control' in b for b in system_blocks) + sum('cache_control' in t for t in tools)
+    for m in merged:
+        content = m['content']
+        if isinstance(content, list):
+            marks += sum(isinstance(b, dict) and 'cache_control' in b for b in content)
+    alternating = all(a['role'] != b['role'] for a, b in zip(merged, merged[1:])) and merged[0]['role'] == 'user'
+    leading = []
+    for m in messages:
+        if m.get('role') != 'system':
+            break
+        leading.append(m['content'])
+    system_only = len(system_blocks) == 1 and system_blocks[0]['text'] == "\n\n".join(leading)
+    return marks, alternating, system_only
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--turns", type=int, default=120)
+    ap.add_argument("--tool-kb", type=float, default=4.0, help="工具结果平均大小（KB）")
+    ap.add_argument("--limit", type=int, default=64000, help="上下文上限（token）")
+    ap.add_argument("--seed", type=int, default=3)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    turns = [_turn(rng, t, args.tool_kb) for t in range(args.turns)]
+    system = {'role': 'system', 'content': _text(random.Random(0), 6000)}
+    print(f"\n{args.turns} 轮（每轮 2 次请求），工具结果平均 {args.tool_kb:.0f}KB，"
+          f"上下文上限 {args.limit // 1000}K")
+    print(f"  {'方式':<5}{'总输入':>12}{'缓存命中':>12}{'命中比例':>10}"
+          f"{'deepseek-chat':>16}{'缓存节省':>10}{'claude-sonnet-4-5':>20}")
+    ratios, ok = {}, True
+    for mode in ("old", "new"):
+        cache, chains, last = simulate(mode, turns, system, args)
+        stats = {'input_tokens': cache.prompt, 'cache_read': cache.hit,
+                 'cache_write': cache.prompt - cache.hit, 'output_tokens': 0}
+        ds = calculate_cost_from_stats('deepseek-chat', stats, breakdown=True)
+        cl = calculate_cost_from_stats('claude-sonnet-4-5', stats, breakdown=True)
+        ratios[mode] = ds['input_cache_ratio']
+        print(f"  {mode:<5}{cache.prompt:>12,}{cache.hit:>12,}{ds['input_cache_ratio'] * 100:>9.1f}%"
+              f"{'$%.4f' % ds['input_cost']:>16}{'$%.4f' % ds['cache_savings']:>10}"
+              f"{'$%.4f' % cl['input_cost']:>20}")
+        if mode == "new":
+            ok = ok and chains
+            marks, alternating, system_only = anthropic_check(last)
+            print(f"\n  new 最后一次请求（Anthropic 格式）: cache_control 断点 {marks} 个，"
+                  f"角色交替 {'是' if alternating else '否'}，顶层 system 只含开头的系统消息 {'是' if system_only else '否'}；"
+                  f"tool 链完整 {'是' if chains else '否'}")
+            ok = ok and marks <= 4 and alternating and system_only
+    ok = ok and ratios["new"] > ratios["old"]
+    print(f"\n缓存命中比例提升且请求格式有效: {'OK' if ok else 'MISMATCH'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+execute_python 基准：全局替换 stdout 的 eval / exec（旧实现）vs py_worker 执行引擎
+
+用法（项目根目录）::
+
+    python benchmarks/bench_py_worker.py [--calls 8] [--table 300000] [--loop 2000000] [--fcalls 1000000]
+
+hou 用 mock_hou 替身，不需要 Houdini。
+
+  old : 改造前的 HoudiniMCP.execute_python（替换 sys.stdout / sys.stderr，先 eval 再 exec，每次新命名空间）
+  new : HoudiniMCP.execute_python（py_worker.PythonWorker，按会话保留命名空间）
+
+场景：
+  结果一致  : 一组代码片段的输出和返回值与旧实现相同（每个片段用新会话）
+  线程串扰  : 执行期间另一个线程持续 print，统计混入工具输出 / 从控制台丢失的行数
+  超时      : 死循环（单行 / 多行）在 timeout 后被中断（旧实现不会返回，不运行）
+  增量输出  : 逐行 print + sleep，第一块输出到达的时间 vs 整体执行时间
+  持久命名空间 : Agent 连续 --calls 次查询同一张大表；旧实现每次重建，新实现只建一次
+  执行开销  : 纯 Python 紧循环、函数调用密集循环（小函数 + len()，如逐点 p.position()）的执行时间
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_hou import MockHou  # noqa: E402
+
+hou = sys.modules.setdefault("hou", MockHou())
+
+from houdini_agent.utils.mcp.client import HoudiniMCP  # noqa: E402
+
+
+# ============================================================
+# 旧实现（改造前 HoudiniMCP.execute_python）
+# ============================================================
+
+def legacy_execute(mcp, code):
+    import traceback
+
+    start_time = time.time()
+    old_stdout = sys.stdout
+    old_stderr = sys.stderr
+    captured_output = io.StringIO()
+    captured_error = io.StringIO()
+    result = {"output": "", "return_value": None, "error": "", "execution_time": 0.0}
+    try:
+        sys.stdout = captured_output
+        sys.stderr = captured_error
+        exec_globals = {'hou': hou, '__builtins__': __builtins__}
+        exec_locals = {}
+        try:
+            return_value = eval(code.strip(), exec_globals, exec_locals)
+            result["return_value"] = mcp._safe_repr(return_value)
+        except SyntaxError:
+            exec(code, exec_globals, exec_locals)
+            if exec_locals:
+                last_var = list(exec_locals.keys())[-1]
+                if not last_var.startswith('_'):
+                    result["return_value"] = mcp._safe_repr(exec_locals[last_var])
+        result["output"] = captured_output.getvalue()
+        stderr_content = captured_error.getvalue()
+        if stderr_content:
+            result["output"] += f"\n[stderr]\n{stderr_content}"
+        result["execution_time"] = time.time() - start_time
+        return True, result
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {str(e)}\n{traceback.format_exc()}"
+        result["output"] = captured_output.getvalue()
+        result["execution_time"] = time.time() - start_time
+        return False, result
+    finally:
+        sys.stdout = old_stdout
+        sys.stderr = old_stderr
+
+
+def new_execute(mcp, code, session="bench", timeout=HoudiniMCP.PYTHON_DEFAULT_TIMEOUT, on_output=None):
+    mcp.set_python_context(session=session, on_output=on_output)
+    try:
+        return mcp.execute_python(code, timeout=timeout)
+    finally:
+        mcp.set_python_context(session=session)
+
+
+# ============================================================
+# 场景
+# ============================================================
+
+SNIPPETS = [
+    "1 + 2",
+    "print('hello')\nx = 40\ny = x + 2",
+    "import math\nr = round(math.sqrt(2), 6)",
+    "hou.node('/obj').path()",
+    "names = [c.name() for c in hou.node('/obj').children()]\nprint(len(names))",
+    "import sys\nprint('warn', file=sys.stderr)\nz = {'a': 1}",
+    "for i in range(3):\n    print(i)",
+    "1 / 0",
+]
+
+
+def check_snippets(mcp):
+    rows = []
+    for i, code in enumerate(SNIPPETS):
+        ok_old, old = legacy_execute(mcp, code)
+        ok_new, new = new_execute(mcp, code, session=f"snippet{i}")
+        same = (ok_old == ok_new and old["output"] == new["output"]
+                and old["return_value"] == new["return_value"]
+                and old["error"].split("\n")[0] == new["error"].split("\n")[0])
+        rows.append((code.split("\n")[0], same))
+    return rows
+
+
+def crosstalk(mcp, run, iterations):
+    """执行期间后台线程每 2ms print 一行；返回 (混入工具输出的行数, 控制台丢失的行数, 后台总行数)"""
+    console = io.StringIO()
+    real = sys.stdout
+    sys.stdout = console
+    stop = threading.Event()
+    sent = [0]
+
+    def _chatter():
+        while not stop.is_set():
+            print(f"[bg] {sent[0]}")
+            sent[0] += 1
+            time.sleep(0.002)
+
+    code = f"import time\nfor i in range({iterations}):\n    print('fg', i)\n    time.sleep(0.005)"
+    worker = threading.Thread(target=_chatter)
+    worker.start()
+    try:
+        _ok, result = run(code)
+    finally:
+        stop.set()
+        worker.join()
+        sys.stdout = real
+    leaked = result["output"].count("[bg]")
+    lost = sent[0] - console.getvalue().count("[bg]")
+    fg_ok = result["output"].count("fg ") == iterations
+    return leaked, lost, sent[0], fg_ok
+
+
+def timeouts(mcp):
+    rows = []
+    for label, code in (("while True: pass", "while True: pass"),
+                        ("while True: 多行", "n = 0\nwhile True:\n    n += 1"),
+                        ("try/except 吞异常", "while True:\n    try:\n        pass\n    except Exception:\n        pass")):
+        t0 = time.perf_counter()
+        ok, result = new_execute(mcp, code, session="timeout", timeout=1)
+        rows.append((label, time.perf_counter() - t0, result.get("status")))
+    return rows
+
+
+def streaming(mcp):
+    code = "import time\nfor i in range(10):\n    print('line', i)\n    time.sleep(0.05)"
+    t0 = time.perf_counter()
+    chunks = []
+    _ok, result = new_execute(mcp, code, on_output=lambda s, t: chunks.append((time.perf_counter() - t0, t)))
+    total_new = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    legacy_execute(mcp, code)
+    total_old = time.perf_counter() - t0
+    streamed = "".join(t for _, t in chunks)
+    return chunks[0][0] if chunks else total_new, total_old, len(chunks), streamed == result["output"]
+
+
+def persistence(mcp, calls, table):
+    setup = f"TABLE = {{i: str(i) * 3 for i in range({table})}}"
+    queries = [f"n = len(TABLE[{(k * 7919) % table}])" for k in range(calls)]
+
+    t0 = time.perf_counter()
+    old_vals = [legacy_execute(mcp, f"{setup}\n{q}")[1]["return_value"] for q in queries]
+    old_t = time.perf_counter() - t0
+
+    mcp.reset_python_session("persist")
+    t0 = time.perf_counter()
+    new_execute(mcp, setup, session="persist")
+    new_vals = [new_execute(mcp, q, session="persist")[1]["return_value"] for q in queries]
+    new_t = time.perf_counter() - t0
+    return old_t, new_t, old_vals == new_vals
+
+
+def overhead(mcp, code):
+    t0 = time.perf_counter()
+    _ok, old = legacy_execute(mcp, code)
+    old_t = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    _ok, new = new_execute(mcp, code)
+    new_t = time.perf_counter() - t0
+    return old_t, new_t, old["return_value"] == new["return_value"]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--calls", type=int, default=8, help="持久命名空间场景的查询次数")
+    ap.add_argument("--table", type=int, default=300000, help="查询表的条目数")
+    ap.add_argument("--loop", type=int, default=2000000, help="执行开销场景纯循环的次数")
+    ap.add_argument("--fcalls", type=int, default=1000000, help="执行开销场景函数调用循环的次数")
+    args = ap.parse_args()
+
+    mcp = HoudiniMCP()
+    ok = True
+
+    print("\n结果一致（输出 / 返回值 / 错误类型）")
+    for label, same in check_snippets(mcp):
+        print(f"  {label[:40]:<42}{'same' if same else 'DIFF'}")
+        ok &= same
+
+    print("\n线程串扰（后台线程每 2ms print）")
+    for mode, run in (("old", lambda c: legacy_execute(mcp, c)), ("new", lambda c: new_execute(mcp, c))):
+        leaked, lost, sent, fg_ok = crosstalk(mcp, run, 40)
+        print(f"  {mode}: 混入工具输出 {leaked} 行 / 控制台丢失 {lost} 行（后台共 {sent} 行）")
+        if mode == "new":
+            ok &= leaked == 0 and lost == 0 and fg_ok
+
+    print("\n超时（timeout=1s；旧实现忽略 timeout，死循环永不返回，不运行）")
+    for label, elapsed, status in timeouts(mcp):
+        print(f"  {label:<22}{elapsed:>6.2f}s  {status}")
+        ok &= status == "timeout" and elapsed < 1.6
+
+    first, total_old, n_chunks, complete = streaming(mcp)
+    print(f"\n增量输出：new 第一块 {first * 1e3:.0f}ms（共 {n_chunks} 块）/ old 全部输出在 {total_old * 1e3:.0f}ms 后一次返回")
+    ok &= complete and first < total_old / 2
+
+    old_t, new_t, same = persistence(mcp, args.calls, args.table)
+    print(f"\n持久命名空间（{args.calls} 次查询，{args.table} 项表）：old {old_t:.2f}s / new {new_t:.2f}s"
+          f"（{old_t / new_t:.1f}x）")
+    ok &= same
+
+    print("\n执行开销")
+    cases = ((f"{args.loop} 次纯 Python 循环", f"s = 0\nfor i in range({args.loop}):\n    s += i"),
+             (f"{args.fcalls} 次函数调用 + len()",
+              f"def f(x):\n    return x + 1\ns = 0\nitems = [1, 2, 3]\n"
+              f"for i in range({args.fcalls}):\n    s += f(i) + len(items)"))
+    for label, code in cases:
+        old_t, new_t, same = overhead(mcp, code)
+        print(f"  {label:<28}old {old_t:.2f}s / new {new_t:.2f}s（{new_t / old_t:.2f}x）")
+        ok &= same and new_t < old_t * 1.3
+
+    print(f"\n结果一致: {'OK' if ok else 'MISMATCH'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+网络镜像基准：事件驱动镜像 vs 全量遍历（正确性 + hou 调用次数 + 延迟）
+
+用法（项目根目录）::
+
+    python benchmarks/bench_scene_mirror.py [--nodes 2000] [--steps 400] [--call-us 2]
+
+使用 benchmarks/mock_hou.py 的 hou 替身构建一个含 wrangle / python / NetworkBox 的网络，
+按固定随机种子驱动事件流（创建、删除、重连、改名、改参数、显示标志、位置、
+错误状态、box 归属、File > New），每一步后校验：
+  - get_network_structure() 镜像结果 == HOUDINI_AGENT_SCENE_MIRROR=0 时的全量遍历结果
+  - 镜像 changes_since() == 前后两次全量快照的 diff（ai_tab 旧行为）
+
+计时场景：
+  1. 无变化时重复查询
+  2. 单个节点改参数后查询
+  3. 修改工具前后 diff（创建一个节点）
+
+--call-us 为每次 hou 调用附加的模拟耗时（真实 Houdini 中 hou 调用跨越 C++ 边界，
+单次约数微秒），0 表示只统计调用次数。
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_hou import MockHou  # noqa: E402
+from houdini_agent.utils.mcp import client as mcp_client  # noqa: E402
+from houdini_agent.utils.mcp import scene_mirror  # noqa: E402
+
+_TYPES = ("box", "sphere", "transform", "merge", "attribwrangle", "pointwrangle",
+          "python", "scatter", "copytopoints", "null")
+
+
+def _install(mock):
+    """把替身注入插件模块，并重置镜像单例"""
+    mcp_client.hou = mock
+    scene_mirror.hou = mock
+    if scene_mirror._scene_mirror is not None:
+        scene_mirror._scene_mirror.clear()
+    scene_mirror._scene_mirror = None
+
+
+def _build(mock, n_nodes, rng):
+    for t in _TYPES:
+        mock.register_type(t, input_labels=("Input 1", "Input 2"))
+    geo = mock.node("/obj").createNode("geo", "geo1")
+    nodes = []
+    for i in range(n_nodes):
+        t = rng.choice(_TYPES)
+        parms = {}
+        if "wrangle" in t:
+            parms["snippet"] = f"@P.y += {i % 7} * 0.1;"
+        elif t == "python":
+            parms["python"] = f"node = hou.pwd()  # {i}"
+        node = geo.createNode(t, parms=parms)
+        node.setPosition((i % 40 * 2.0, -(i // 40) * 1.5))
+        if nodes and rng.random() < 0.8:
+            node.setInput(0, rng.choice(nodes[-20:]))
+        nodes.append(node)
+    for b in range(max(1, n_nodes // 200)):
+        box = geo.createNetworkBox(f"box{b}", f"group {b}")
+        for node in rng.sample(nodes, min(10, len(nodes))):
+            box.addNode(node)
+    nodes[-1].setDisplayFlag(True)
+    return geo
+
+
+def _normalize(data):
+    key_nodes = sorted(data["nodes"], key=lambda d: d["path"])
+    key_conns = sorted(data["connections"], key=lambda d: (d["to"], d["input_index"]))
+    boxes = [dict(b, nodes=sorted(b["nodes"])) for b in data["network_boxes"]]
+    return (data["network_path"], data["network_type"], data["node_count"], key_nodes,
+            key_conns, boxes, sorted(data["boxed_node_paths"]))
+
+
+def _full_structure(mcp, path):
+    os.environ["HOUDINI_AGENT_SCENE_MIRROR"] = "0"
+    try:
+        return mcp.get_network_structure(path)
+    finally:
+        os.environ.pop("HOUDINI_AGENT_SCENE_MIRROR", None)
+
+
+def _full_children(geo):
+    """ai_tab 旧版 _snapshot_network_children 的全量快照"""
+    return {c.path(): {"name": c.name(), "type": c.type().name(), "path": c.path()}
+            for c in geo.children()}
+
+
+def _path_diff(before, after):
+    created = [after[p] for p in sorted(set(after) - set(before))]
+    deleted = [before[p] for p in sorted(set(before) - set(after))]
+    return {"created": created, "deleted": deleted} if created or deleted else None
+
+
+def _random_step(mock, geo, rng, counter):
+    """执行一个随机修改，返回操作名"""
+    kids = list(geo._children)
+    op = rng.choice(("create", "destroy", "rewire", "rename", "parm", "display",
+                     "position", "errors", "box") if len(kids) > 5 else ("create",))
+    if op == "create":
+        node = geo.createNode(rng.choice(_TYPES), parms={"snippet": "@Cd = 1;"})
+        if kids:
+            node.setInput(0, rng.choice(kids))
+    elif op == "destroy":
+        rng.choice(kids).destroy()
+    elif op == "rewire":
+        a, b = rng.sample(kids, 2)
+        a.setInput(rng.randint(0, 1), b if rng.random() < 0.8 else None)
+    elif op == "rename":
+        counter[0] += 1
+        rng.choice(kids).setName(f"renamed{counter[0]}")
+    elif op == "parm":
+        node = rng.choice([k for k in kids if k._parms] or kids)
+        for p in node._parms.values():
+            p.set(f"@P.x += {rng.random():.3f};")
+    elif op == "display":
+        rng.choice(kids).setDisplayFlag(True)
+    elif op == "position":
+        rng.choice(kids).setPosition((rng.random() * 50, rng.random() * 50))
+    elif op == "errors":
+        rng.choice(kids).setErrors(("Cook error",) if rng.random() < 0.5 else ())
+    elif op == "box" and geo._boxes:
+        rng.choice(geo._boxes).addNode(rng.choice(kids))
+    return op
+
+
+def _verify(mock, geo, n_nodes, steps, seed):
+    rng = random.Random(seed)
+    mcp = mcp_client.HoudiniMCP()
+    path = geo.path()
+    mismatches = diff_mismatches = 0
+    counter = [0]
+    mirror = scene_mirror.get_scene_mirror().mirror_for(geo)
+    for step in range(steps):
+        if step and step % 150 == 0:
+            # 模拟 File > New 后重建网络：镜像必须整体丢弃
+            mock.clear_hip()
+            geo = _build(mock, n_nodes // 4, rng)
+            path = geo.path()
+            mirror = scene_mirror.get_scene_mirror().mirror_for(geo)
+            op = "clear_hip"
+        else:
+            before = _full_children(geo)
+            token = mirror.seq
+            op = _random_step(mock, geo, rng, counter)
+            if op in ("create", "destroy"):
+                # 改名也会让基于路径的旧 diff 报告删除+创建，只在增删时对比
+                expected = _path_diff(before, _full_children(geo))
+                if mirror.changes_since(token) != expected:
+                    diff_mismatches += 1
+                    print(f"  [diff 不一致] step {step} op {op}")
+        ok_m, via_mirror = mcp.get_network_structure(path)
+        ok_f, via_full = _full_structure(mcp, path)
+        if not (ok_m and ok_f) or _normalize(via_mirror) != _normalize(via_full):
+            mismatches += 1
+            print(f"  [结构不一致] step {step} op {op}")
+    return mismatches, diff_mismatches
+
+
+def _measure(mock, label, fn, repeat, call_us):
+    mock.calls = 0
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    ms = (time.perf_counter() - t0) * 1000.0 / repeat
+    calls = mock.calls / repeat
+    print(f"  {label:<36}{calls:>12.0f}{ms:>10.3f}{ms + calls * call_us / 1000.0:>12.3f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--nodes", type=int, default=2000)
+    ap.add_argument("--steps", type=int, default=400, help="正确性校验的随机事件数")
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--call-us", type=float, default=2.0, help="每次 hou 调用的模拟耗时 (µs)")
+    ap.add_argument("--seed", type=int, default=11)
+    args = ap.parse_args()
+
+    mock = MockHou()
+    _install(mock)
+    rng = random.Random(args.seed)
+    geo = _build(mock, args.nodes, rng)
+
+    print(f"\n正确性校验: {args.steps} 个随机事件 ({args.nodes} 节点网络)")
+    mismatches, diff_mismatches = _verify(mock, geo, args.nodes, args.steps, args.seed)
+    print(f"  结构不一致: {mismatches}   diff 不一致: {diff_mismatches}")
+
+    # 计时使用全新场景
+    mock = MockHou()
+    _install(mock)
+    geo = _build(mock, args.nodes, random.Random(args.seed))
+    mcp = mcp_client.HoudiniMCP()
+    path = geo.path()
+    mirror = scene_mirror.get_scene_mirror().mirror_for(geo)
+    mcp.get_network_structure(path)  # 首次全量读取
+    target = next(c for c in geo._children if c._parms)
+
+    def _edit():
+        for p in target._parms.values():
+            p.set("@P.z += 1;")
+
+    def _diff_full():
+        before = _full_children(geo)
+        geo.createNode("null").destroy()
+        _path_diff(before, _full_children(geo))
+
+    def _diff_mirror():
+        token = mirror.seq
+        geo.createNode("null").destroy()
+        mirror.changes_since(token)
+
+    print(f"\n{args.nodes} 节点网络，模拟 hou 调用耗时 {args.call_us} µs/次")
+    print(f"  {'场景':<36}{'hou 调用':>12}{'ms':>10}{'ms(含模拟)':>12}")
+    _measure(mock, "重复查询 全量遍历", lambda: _full_structure(mcp, path), args.repeat, args.call_us)
+    _measure(mock, "重复查询 镜像", lambda: mcp.get_network_structure(path), args.repeat, args.call_us)
+    _measure(mock, "改 1 个参数后查询 全量遍历",
+             lambda: (_edit(), _full_structure(mcp, path)), args.repeat, args.call_us)
+    _measure(mock, "改 1 个参数后查询 镜像",
+             lambda: (_edit(), mcp.get_network_structure(path)), args.repeat, args.call_us)
+    _measure(mock, "修改前后 diff 全量快照", _diff_full, args.repeat, args.call_us)
+    _measure(mock, "修改前后 diff 镜像变更日志", _diff_mirror, args.repeat, args.call_us)
+    print(f"\n镜像统计: {scene_mirror.get_scene_mirror().stats()}")
+
+
+if __name__ == "__main__":
+    main()
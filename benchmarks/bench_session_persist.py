@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+会话持久化基准：全量 JSON 重写（旧实现）vs 追加式 JSONL 会话日志（后台写线程）
+
+用法（项目根目录）::
+
+    python benchmarks/bench_session_persist.py [--sessions 3] [--turns 60] [--tool-kb 12] [--seed 9]
+
+按固定随机种子模拟多个会话标签的长对话：每轮追加 用户消息 + 带 tool_calls 的助手消息
++ 若干工具结果（平均 --tool-kb KB）+ 最终回复；每 10 轮对活跃会话做一次上下文压缩
+（原地把旧 tool 结果替换为摘要）。每轮结束时自动保存活跃会话，每 5 轮保存全部会话
+（对应 AITab 的 _save_cache 与 60 秒定时 _periodic_save_all）。
+
+  old : 旧版 _save_cache / _save_all_sessions（indent=2 全量重写 session_*.json、
+        cache_latest.json 与 manifest，全部在调用线程）
+  new : SessionLogStore（主线程只做增量比对，序列化与追加写在后台线程）
+
+报告主线程每次保存耗时（p50 / 最大 / 最后 10 次均值）、总写入字节、磁盘占用，
+以及启动恢复耗时；恢复出的历史必须与内存中的会话一致。
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from houdini_agent.utils.session_log import SessionLogStore, read_session_file  # noqa: E402
+
+
+# ============================================================
+# 旧实现（AITab 改造前的保存路径）
+# ============================================================
+
+def strip_images(history):
+    """AITab._strip_images_for_cache 的等价实现（合成数据中不含图片，直接引用）"""
+    return [dict(m, content=[p for p in m['content']]) if isinstance(m.get('content'), list) else m
+            for m in history]
+
+
+class LegacyStore:
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.bytes_written = 0
+
+    def _dump(self, path, data):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        self.bytes_written += path.stat().st_size
+
+    def _cache_data(self, sid, sdata):
+        return {
+            'version': '1.0',
+            'session_id': sid,
+            'message_count': len(sdata['history']),
+            'conversation_history': strip_images(sdata['history']),
+            'context_summary': '',
+            'todo_data': [],
+            'token_stats': sdata['stats'],
+        }
+
+    def _manifest(self, sessions, active):
+        self._dump(self.cache_dir / "sessions_manifest.json", {
+            'version': '1.0', 'active_session_id': active,
+            'tabs': [{'session_id': sid, 'tab_label': sid, 'file': f"session_{sid}.json"}
+                     for sid in sessions]})
+
+    def save_active(self, sessions, active):
+        data = self._cache_data(active, sessions[active])
+        self._dump(self.cache_dir / f"session_{active}.json", data)
+        self._dump(self.cache_dir / "cache_latest.json", data)
+        self._manifest(sessions, active)
+
+    def save_all(self, sessions, active):
+        for sid, sdata in sessions.items():
+            self._dump(self.cache_dir / f"session_{sid}.json", self._cache_data(sid, sdata))
+        self._manifest(sessions, active)
+        self._dump(self.cache_dir / "cache_latest.json", self._cache_data(active, sessions[active]))
+
+    def flush(self):
+        pass
+
+    def restore(self, sids):
+        out = {}
+        for sid in sids:
+            with open(self.cache_dir / f"session_{sid}.json", 'r', encoding='utf-8') as f:
+                out[sid] = json.load(f)['conversation_history']
+        return out
+
+
+class NewStore:
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.store = SessionLogStore(cache_dir)
+
+    @property
+    def bytes_written(self):
+        return self.store.stats['bytes_written']
+
+    def _save(self, sid, sdata):
+        self.store.save(sid, sdata['history'], {'context_summary': '', 'todo_data': [],
+                                                'token_stats': sdata['stats']}, prepare=strip_images)
+
+    def _manifest(self, sessions, active):
+        self.store.save_manifest({
+            'version': '1.0', 'active_session_id': active,
+            'tabs': [{'session_id': sid, 'tab_label': sid, 'file': f"session_{sid}.jsonl"}
+                     for sid in sessions]})
+
+    def save_active(self, sessions, active):
+        self._save(active, sessions[active])
+        self._manifest(sessions, active)
+
+    def save_all(self, sessions, active):
+        for sid, sdata in sessions.items():
+            self._save(sid, sdata)
+        self._manifest(sessions, active)
+
+    def flush(self):
+        self.store.flush()
+
+    def restore(self, sids):
+        return {sid: read_session_file(self.cache_dir / f"session_{sid}.jsonl")['conversation_history']
+                for sid in sids}
+
+
+# ============================================================
+# 合成会话
+# ============================================================
+
+def _text(rng, n_chars):
+    words = ("node", "parm", "/obj/geo1/box1", "attribwrangle", "P", "Cd", "0.125", "cook", "错误", "点数")
+    out, size = [], 0
+    while size < n_chars:
+        w = rng.choice(words)
+        out.append(w)
+        size += len(w) + 1
+    return " ".join(out)
+
+
+def _turn(rng, turn, tool_kb):
+    n_tools = rng.randint(1, 4)
+    calls = [{'id': f"call_{turn}_{k}", 'type': 'function',
+              'function': {'name': 'get_node_parameters', 'arguments': json.dumps({'node_path': f"/obj/geo1/n{k}"})}}
+             for k in range(n_tools)]
+    msgs = [{'role': 'user', 'content': _text(rng, rng.randint(40, 400))},
+            {'role': 'assistant', 'content': None, 'tool_calls': calls}]
+    for c in calls:
+        msgs.append({'role': 'tool', 'tool_call_id': c['id'],
+                     'content': _text(rng, int(rng.expovariate(1.0 / (tool_kb * 1024))) + 200)})
+    msgs.append({'role': 'assistant', 'content': _text(rng, rng.randint(200, 3000))})
+    return msgs
+
+
+def _compress(history):
+    """上下文压缩：原地把较旧轮次的长 tool 结果替换为摘要（与 AITab 一致）"""
+    for m in history[:int(len(history) * 0.4)]:
+        if m.get('role') == 'tool' and len(m.get('content') or '') > 200:
+            m['content'] = m['content'][:200] + '...[summary]'
+
+
+def simulate(impl, args):
+    rng = random.Random(args.seed)
+    sessions = {f"s{k}": {'history': [], 'stats': {'requests': 0, 'total_tokens': 0}}
+                for k in range(args.sessions)}
+    costs = []
+    for turn in range(args.turns * args.sessions):
+        active = f"s{turn % args.sessions}"
+        sdata = sessions[active]
+        sdata['history'].extend(_turn(rng, turn, args.tool_kb))
+        sdata['stats'] = dict(sdata['stats'], requests=sdata['stats']['requests'] + 1,
+                              total_tokens=sdata['stats']['total_tokens'] + rng.randint(500, 5000))
+        if turn % 10 == 9:
+            _compress(sdata['history'])
+        t0 = time.perf_counter()
+        impl.save_active(sessions, active)
+        costs.append(time.perf_counter() - t0)
+        if turn % 5 == 4:
+            t0 = time.perf_counter()
+            impl.save_all(sessions, active)
+            costs.append(time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    impl.flush()
+    drain = time.perf_counter() - t0
+    return sessions, costs, drain
+
+
+def _disk_usage(path):
+    return sum(p.stat().st_size for p in Path(path).iterdir() if p.is_file())
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--sessions", type=int, default=3)
+    ap.add_argument("--turns", type=int, default=60, help="每个会话的轮数")
+    ap.add_argument("--tool-kb", type=float, default=12.0, help="工具结果平均大小（KB）")
+    ap.add_argument("--seed", type=int, default=9)
+    args = ap.parse_args()
+
+    print(f"\n{args.sessions} 个会话 × {args.turns} 轮，工具结果平均 {args.tool_kb:.0f}KB，每 10 轮压缩一次上下文")
+    print(f"  {'方式':<5}{'保存次数':>8}{'p50':>10}{'最大':>10}{'末10次均值':>12}{'后台落盘':>10}"
+          f"{'总写入':>10}{'磁盘占用':>10}{'恢复耗时':>10}")
+    ok = True
+    for name, cls in (("old", LegacyStore), ("new", NewStore)):
+        tmp = tempfile.mkdtemp(prefix=f"bench_session_{name}_")
+        try:
+            impl = cls(tmp)
+            sessions, costs, drain = simulate(impl, args)
+            t0 = time.perf_counter()
+            restored = impl.restore(list(sessions))
+            restore = time.perf_counter() - t0
+            expected = {sid: json.loads(json.dumps(strip_images(s['history']))) for sid, s in sessions.items()}
+            if restored != expected:
+                ok = False
+                print(f"      恢复结果与内存不一致: {name}")
+            ordered = sorted(costs)
+            tail = sum(costs[-10:]) / min(10, len(costs))
+            print(f"  {name:<5}{len(costs):>8}{ordered[len(ordered) // 2] * 1e3:>8.2f}ms"
+                  f"{ordered[-1] * 1e3:>8.1f}ms{tail * 1e3:>10.2f}ms{drain * 1e3:>8.1f}ms"
+                  f"{impl.bytes_written / 1e6:>8.1f}MB{_disk_usage(tmp) / 1e6:>8.1f}MB{restore * 1e3:>8.1f}ms")
+            if name == "new":
+                print(f"\n  new 日志统计: {impl.store.stats}")
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+    print(f"\n恢复结果与内存一致: {'OK' if ok else 'MISMATCH'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+execute_shell 基准：subprocess.run 阻塞捕获（旧实现）vs shell_runner 流式执行
+
+用法（项目根目录）::
+
+    python benchmarks/bench_shell_runner.py [--lines 2000000] [--concurrent 6]
+
+hou 用 mock_hou 替身，不需要 Houdini；命令用 /bin/sh（Windows 上部分场景跳过）。
+
+  old : 改造前的 HoudiniMCP._tool_execute_shell（subprocess.run(capture_output=True)，完整文本进分页缓存）
+  new : HoudiniMCP._tool_execute_shell（shell_runner.run_shell，超量输出落盘，按行偏移翻页）
+
+场景：
+  结果一致  : 一组命令第 1 页 / 末页的文本与旧实现相同
+  增量输出  : 逐行 echo + sleep，第一行到达的时间 vs 旧实现整体返回的时间
+  大输出    : seq 输出 --lines 行，峰值内存（tracemalloc）、保留内存、翻到中间一页的耗时
+  取消      : sleep 30 在 0.3s 后被取消，后台子进程一并结束（旧实现只能等超时）
+  并发      : 一轮 --concurrent 个 sleep 0.5 并行提交，同时运行的进程数不超过 MAX_CONCURRENT
+"""
+
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_hou import MockHou  # noqa: E402
+
+sys.modules.setdefault("hou", MockHou())
+
+from houdini_agent.utils.mcp import shell_runner  # noqa: E402
+from houdini_agent.utils.mcp.client import HoudiniMCP  # noqa: E402
+
+
+# ============================================================
+# 旧实现（改造前 HoudiniMCP._tool_execute_shell）
+# ============================================================
+
+def legacy_execute_shell(mcp, args):
+    import hashlib
+
+    command = args.get("command", "").strip()
+    if not command:
+        return {"success": False, "error": "缺少 command 参数"}
+
+    page = int(args.get("page", 1))
+    timeout = min(int(args.get("timeout", 30)), 120)
+
+    cmd_hash = hashlib.md5(command.encode()).hexdigest()[:12]
+    cache_key = f"legacy_shell:{cmd_hash}"
+    cached = mcp._tool_page_cache.get(cache_key) if page > 1 else None
+    if cached is not None:
+        hint = f'execute_shell(command="...同上...", page={page})'
+        return {"success": True, "result": mcp._paginate_tool_result(cached, cache_key, hint, page)}
+
+    security_msg = mcp._check_shell_security(command)
+    if security_msg:
+        return {"success": False, "error": security_msg}
+
+    cwd = args.get("cwd", "") or ROOT
+    start_time = time.time()
+    try:
+        proc = subprocess.run(command, shell=True, capture_output=True, text=True,
+                              timeout=timeout, cwd=cwd)
+        elapsed = time.time() - start_time
+        parts = []
+        if proc.stdout:
+            parts.append(proc.stdout.rstrip())
+        if proc.stderr:
+            parts.append(f"[stderr]\n{proc.stderr.rstrip()}")
+        parts.append(f"[退出码: {proc.returncode}, 耗时: {elapsed:.2f}s]")
+        full_text = "\n".join(parts)
+        hint = f'execute_shell(command="...同上...", page={page})'
+        return {"success": proc.returncode == 0, "result": mcp._paginate_tool_result(
+            full_text, cache_key, hint, page)}
+    except subprocess.TimeoutExpired:
+        elapsed = time.time() - start_time
+        return {"success": False, "error": f"命令超时（{timeout}s 限制）\n命令: {command}\n耗时: {elapsed:.2f}s"}
+
+
+def new_execute_shell(mcp, args, on_output=None, cancel=None):
+    mcp.set_shell_context(on_output=on_output, cancel=cancel)
+    try:
+        return mcp._tool_execute_shell({"cwd": ROOT, **args})
+    finally:
+        mcp.set_shell_context()
+
+
+def _strip_elapsed(text):
+    """耗时每次不同，比较前去掉"""
+    import re
+    return re.sub(r"耗时: [\d.]+s", "耗时: -", text)
+
+
+# ============================================================
+# 场景
+# ============================================================
+
+COMMANDS = [
+    "echo hello",
+    "echo out; echo err 1>&2",
+    "printf 'a  \\n\\n\\n'",
+    "printf 'crlf\\r\\nline2\\rline3\\n'",
+    "echo '   '",
+    "printf 'no newline'",
+    "echo bad 1>&2; exit 3",
+    "true",
+    "printf '中文输出\\n'",
+    "seq 1 120",
+    "seq 1 400000; seq 1 30 1>&2",
+]
+
+
+def check_results(mcp):
+    rows = []
+    for command in COMMANDS:
+        old = legacy_execute_shell(mcp, {"command": command})
+        new = new_execute_shell(mcp, {"command": command})
+        same = (old["success"] == new["success"]
+                and _strip_elapsed(old["result"]) == _strip_elapsed(new["result"]))
+        # 多页时再比较末页
+        if same and "页, 共" in old["result"]:
+            last = int(old["result"].split("/")[1].split(" ")[0])
+            old_p = legacy_execute_shell(mcp, {"command": command, "page": last})
+            new_p = new_execute_shell(mcp, {"command": command, "page": last})
+            same = _strip_elapsed(old_p["result"]) == _strip_elapsed(new_p["result"])
+        rows.append((command, same))
+    return rows
+
+
+def streaming(mcp):
+    command = "for i in 1 2 3 4 5 6 7 8 9 10; do echo line $i; sleep 0.1; done"
+    t0 = time.perf_counter()
+    legacy_execute_shell(mcp, {"command": command})
+    total_old = time.perf_counter() - t0
+    chunks = []
+    t0 = time.perf_counter()
+    result = new_execute_shell(mcp, {"command": command},
+                               on_output=lambda rid, s, t: chunks.append((time.perf_counter() - t0, t)))
+    streamed = "".join(t for _, t in chunks).rstrip("\n")
+    complete = result["result"].startswith(streamed) and streamed.count("line") == 10
+    return chunks[0][0] if chunks else float("inf"), total_old, len(chunks), complete
+
+
+def large_output(mcp, lines):
+    command = f"seq 1 {lines}"
+    res = {}
+    for mode, run in (("old", legacy_execute_shell), ("new", new_execute_shell)):
+        tracemalloc.start()
+        first = run(mcp, {"command": command})
+        _cur, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        total_pages = int(first["result"].split("/")[1].split(" ")[0])
+        mid = total_pages // 2
+        t0 = time.perf_counter()
+        for _ in range(5):
+            page = run(mcp, {"command": command, "page": mid})
+        page_t = (time.perf_counter() - t0) / 5
+        res[mode] = (peak, page_t, page["result"])
+    old_cached = mcp._tool_page_cache.get(
+        "legacy_shell:" + __import__("hashlib").md5(command.encode()).hexdigest()[:12])
+    kept_old = sys.getsizeof(old_cached) if old_cached is not None else 0
+    new_run = HoudiniMCP._shell_runs.get(
+        "shell:" + __import__("hashlib").md5(command.encode()).hexdigest()[:12])
+    kept_new = new_run.memory_bytes() if new_run is not None else 0
+    same = res["old"][2] == res["new"][2]
+    return res, kept_old, kept_new, same
+
+
+def cancellation(mcp):
+    t0 = time.perf_counter()
+    pid_lines = []
+    result = new_execute_shell(
+        mcp, {"command": "sleep 30 & echo $!; wait", "timeout": 60},
+        on_output=lambda rid, s, t: pid_lines.append(t),
+        cancel=lambda: time.perf_counter() - t0 > 0.3)
+    elapsed = time.perf_counter() - t0
+    child_alive = False
+    if pid_lines:
+        pid = int(pid_lines[0].split()[0])
+        time.sleep(0.05)
+        try:
+            os.kill(pid, 0)
+            # 僵尸进程（已结束未回收）也算结束
+            with open(f"/proc/{pid}/stat") as f:
+                child_alive = f.read().split()[2] != "Z"
+        except (OSError, FileNotFoundError):
+            child_alive = False
+    return elapsed, result.get("status"), child_alive
+
+
+def concurrency(mcp, n):
+    running = [0]
+    peak = [0]
+
+    def _on_output(rid, stream, text):
+        if "start" in text:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+
+    def _one(i):
+        r = new_execute_shell(mcp, {"command": f"echo start {i}; sleep 0.5"}, on_output=_on_output)
+        running[0] -= 1
+        return r["success"]
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        ok = all(pool.map(_one, range(n)))
+    return time.perf_counter() - t0, peak[0], ok
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--lines", type=int, default=2000000, help="大输出场景的行数")
+    ap.add_argument("--concurrent", type=int, default=6, help="并发场景同时提交的命令数")
+    args = ap.parse_args()
+
+    if sys.platform == "win32":
+        print("需要 /bin/sh（seq / sleep / printf），Windows 上不运行")
+        return 0
+
+    mcp = HoudiniMCP()
+    ok = True
+
+    print("\n结果一致（第 1 页 / 末页文本，忽略耗时）")
+    for command, same in check_results(mcp):
+        print(f"  {command[:44]:<46}{'same' if same else 'DIFF'}")
+        ok &= same
+
+    first, total_old, n_chunks, complete = streaming(mcp)
+    print(f"\n增量输出：new 第一行 {first * 1e3:.0f}ms（共 {n_chunks} 块）/ old 全部输出在 {total_old * 1e3:.0f}ms 后一次返回")
+    ok &= complete and first < total_old / 2
+
+    res, kept_old, kept_new, same = large_output(mcp, args.lines)
+    print(f"\n大输出（{args.lines} 行）")
+    for mode in ("old", "new"):
+        peak, page_t, _ = res[mode]
+        kept = kept_old if mode == "old" else kept_new
+        note = "（超出分页缓存限额，每次翻页重新执行命令）" if mode == "old" and not kept else ""
+        print(f"  {mode}: 峰值内存 {peak / 1e6:7.1f} MB  保留 {kept / 1e6:6.1f} MB  "
+              f"翻到中间一页 {page_t * 1e3:7.2f}ms{note}")
+    ok &= same
+
+    elapsed, status, child_alive = cancellation(mcp)
+    print(f"\n取消（sleep 30，0.3s 后停止）：{elapsed:.2f}s 返回，status={status}，"
+          f"后台子进程{'仍在运行' if child_alive else '已结束'}（旧实现等到超时才返回，且不结束子进程）")
+    ok &= status == "cancelled" and elapsed < 1.0 and not child_alive
+
+    elapsed, peak, all_ok = concurrency(mcp, args.concurrent)
+    waves = -(-args.concurrent // shell_runner.MAX_CONCURRENT)
+    print(f"\n并发（{args.concurrent} 个 sleep 0.5）：{elapsed:.2f}s，同时运行最多 {peak} 个进程"
+          f"（上限 {shell_runner.MAX_CONCURRENT}，预计 {waves} 批）")
+    ok &= all_ok and peak <= shell_runner.MAX_CONCURRENT and elapsed < waves * 0.5 + 0.6
+
+    HoudiniMCP._shell_runs.clear()
+    print(f"\n结果一致: {'OK' if ok else 'MISMATCH'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,448 @@
+# -*- coding: utf-8 -*-
+"""
+SSE 解析基准：旧版逐行字符串切分 vs sse_stream 字节级解析器（回放 SSE 记录）
+
+用法（项目根目录）::
+
+    python benchmarks/bench_sse_parser.py [--repeat 5] [--chunk 4096 --chunk 256]
+    python benchmarks/bench_sse_parser.py --transcript body1.sse --transcript body2.sse
+
+--transcript 为原始 SSE 响应体（例如 `curl -N ... > body.sse` 录制）；包含 "event: "
+行时按 Anthropic 协议回放，否则按 OpenAI 兼容协议。未指定时使用内置合成记录：
+  reasoning  : 长推理输出（数千个 reasoning_content 小片段 + 正文，中英混排）
+  tool_calls : 正文 + 3 个工具调用，参数含 VEX 代码，按 4~12 字符分片
+  proxy_bug  : 代理把两个工具调用的参数拼到同一 index 上（{...}{...}，需拆分）
+  anthropic  : Anthropic 事件流（thinking_delta + text_delta + input_json_delta）
+
+响应体按 --chunk 字节切块（切点可能落在多字节字符中间），分别交给旧解析循环
+（ai_client 原实现的等价复制）与新解析器，比对产出的事件序列并计时。
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import codecs
+import random
+import argparse
+import contextlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from houdini_agent.utils.ai_client import AIClient  # noqa: E402
+from houdini_agent.utils.sse_stream import OpenAIStreamParser, AnthropicStreamParser  # noqa: E402
+
+_parse_usage = AIClient._parse_usage
+
+
+# ============================================================
+# 旧实现（ai_client.chat_stream / _chat_stream_anthropic 改造前的解析循环）
+# ============================================================
+
+def _legacy_split_concat(buffer):
+    fixed = {}
+    next_idx = max(buffer.keys()) + 1
+    for k in sorted(buffer.keys()):
+        entry = buffer[k]
+        args_str = entry['function']['arguments'].strip()
+        if args_str.startswith('{'):
+            try:
+                json.loads(args_str)
+                fixed[k] = entry
+            except (json.JSONDecodeError, ValueError):
+                parts, depth, start = [], 0, -1
+                for ci, ch in enumerate(args_str):
+                    if ch == '{':
+                        if depth == 0:
+                            start = ci
+                        depth += 1
+                    elif ch == '}':
+                        depth -= 1
+                        if depth == 0 and start >= 0:
+                            part = args_str[start:ci + 1]
+                            try:
+                                json.loads(part)
+                                parts.append(part)
+                            except Exception:
+                                pass
+                            start = -1
+                if parts:
+                    entry['function']['arguments'] = parts[0]
+                    fixed[k] = entry
+                    for extra in parts[1:]:
+                        fixed[next_idx] = {'id': 'call_split', 'type': 'function',
+                                           'function': {'name': entry['function']['name'], 'arguments': extra}}
+                        next_idx += 1
+                else:
+                    fixed[k] = entry
+        else:
+            fixed[k] = entry
+    return fixed
+
+
+def legacy_openai(chunks, enable_thinking=True):
+    st = {'buf': {}, 'usage': {}, 'finish': None}
+
+    def process(line):
+        results = []
+        if not line.startswith('data: '):
+            return results
+        data_str = line[6:]
+        if data_str.strip() == '[DONE]':
+            results.append({"type": "done", "finish_reason": st['finish'] or "stop", "usage": st['usage']})
+            return results
+        try:
+            data = json.loads(data_str)
+        except json.JSONDecodeError:
+            return results
+        choices = data.get('choices', [])
+        if data.get('usage'):
+            st['usage'] = _parse_usage(data['usage'])
+        if not choices:
+            return results
+        choice = choices[0]
+        delta = choice.get('delta', {})
+        thinking = delta.get('reasoning_content') or delta.get('thinking_content') or delta.get('reasoning') or ''
+        if thinking and enable_thinking:
+            results.append({"type": "thinking", "content": thinking})
+        if 'content' in delta and delta['content']:
+            results.append({"type": "content", "content": delta['content']})
+        buf = st['buf']
+        if delta.get('tool_calls'):
+            for tc in delta['tool_calls']:
+                idx = tc.get('index', 0)
+                tc_id = tc.get('id', '')
+                if tc_id and idx in buf:
+                    existing = buf[idx].get('id', '')
+                    if existing and existing != tc_id:
+                        idx = max(buf.keys()) + 1
+                if idx not in buf:
+                    buf[idx] = {'id': tc_id, 'type': 'function', 'function': {'name': '', 'arguments': ''}}
+                if tc_id:
+                    buf[idx]['id'] = tc_id
+                if 'function' in tc:
+                    fn = tc['function']
+                    if 'name' in fn and fn['name']:
+                        buf[idx]['function']['name'] = fn['name']
+                    if 'arguments' in fn:
+                        buf[idx]['function']['arguments'] += fn['arguments']
+                        name = buf[idx]['function'].get('name', '')
+                        if name:
+                            results.append({"type": "tool_args_delta", "index": idx, "name": name,
+                                            "delta": fn['arguments'],
+                                            "accumulated": buf[idx]['function']['arguments']})
+        if choice.get('finish_reason'):
+            if buf:
+                fixed = _legacy_split_concat(buf)
+                for k in sorted(fixed.keys()):
+                    results.append({"type": "tool_call", "tool_call": fixed[k]})
+                st['buf'] = {}
+            st['finish'] = choice['finish_reason']
+        return results
+
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    line_buf = ""
+    for raw in chunks:
+        line_buf += decoder.decode(raw)
+        should_return = False
+        while '\n' in line_buf:
+            one_line, line_buf = line_buf.split('\n', 1)
+            one_line = one_line.rstrip('\r')
+            if not one_line:
+                continue
+            for item in process(one_line):
+                yield item
+                if item.get('type') == 'done':
+                    should_return = True
+        if should_return:
+            return
+    line_buf += decoder.decode(b'', final=True)
+    if line_buf.strip():
+        for item in process(line_buf.strip()):
+            yield item
+            if item.get('type') == 'done':
+                return
+    if st['buf']:
+        fixed = _legacy_split_concat(st['buf'])
+        for k in sorted(fixed.keys()):
+            yield {"type": "tool_call", "tool_call": fixed[k]}
+    yield {"type": "done", "finish_reason": st['finish'] or "stop", "usage": st['usage']}
+
+
+def legacy_anthropic(chunks, enable_thinking=True):
+    st = {'blocks': {}, 'args': {}, 'usage': {}, 'stop': None}
+
+    def process(event_type, data_str):
+        results = []
+        try:
+            data = json.loads(data_str)
+        except json.JSONDecodeError:
+            return results
+        ev = data.get('type', event_type)
+        if ev == 'message_start':
+            usage = data.get('message', {}).get('usage', {})
+            if usage:
+                st['usage'] = _parse_usage(usage)
+        elif ev == 'content_block_start':
+            idx = data.get('index', 0)
+            block = data.get('content_block', {})
+            st['blocks'][idx] = {'type': block.get('type', 'text'), 'id': block.get('id', ''),
+                                 'name': block.get('name', '')}
+            if block.get('type') == 'tool_use':
+                st['args'][idx] = ''
+        elif ev == 'content_block_delta':
+            idx = data.get('index', 0)
+            delta = data.get('delta', {})
+            dt = delta.get('type', '')
+            info = st['blocks'].get(idx, {})
+            if dt == 'text_delta' and delta.get('text', ''):
+                results.append({"type": "content", "content": delta['text']})
+            elif dt == 'thinking_delta' and delta.get('thinking', ''):
+                if enable_thinking:
+                    results.append({"type": "thinking", "content": delta['thinking']})
+            elif dt == 'input_json_delta':
+                partial = delta.get('partial_json', '')
+                if partial and idx in st['args']:
+                    st['args'][idx] += partial
+                    if info.get('name', ''):
+                        results.append({"type": "tool_args_delta", "index": idx, "name": info['name'],
+                                        "delta": partial, "accumulated": st['args'][idx]})
+        elif ev == 'content_block_stop':
+            idx = data.get('index', 0)
+            info = st['blocks'].get(idx, {})
+            if info.get('type') == 'tool_use':
+                results.append({"type": "tool_call", "tool_call": {
+                    'id': info.get('id', ''), 'type': 'function',
+                    'function': {'name': info.get('name', ''), 'arguments': st['args'].get(idx, '{}')}}})
+        elif ev == 'message_delta':
+            st['stop'] = data.get('delta', {}).get('stop_reason')
+            usage = data.get('usage', {})
+            if usage:
+                for k, v in _parse_usage(usage).items():
+                    if isinstance(v, (int, float)):
+                        st['usage'][k] = st['usage'].get(k, 0) + v
+        elif ev == 'message_stop':
+            finish = 'stop'
+            if st['stop'] == 'tool_use':
+                finish = 'tool_calls'
+            elif st['stop'] == 'max_tokens':
+                finish = 'length'
+            results.append({"type": "done", "finish_reason": finish, "usage": st['usage']})
+        elif ev == 'error':
+            results.append({"type": "error", "error": data.get('error', {}).get('message', str(data))})
+        return results
+
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    line_buf = ""
+    event_type = ""
+    should_return = False
+    for raw in chunks:
+        line_buf += decoder.decode(raw)
+        while '\n' in line_buf:
+            one_line, line_buf = line_buf.split('\n', 1)
+            one_line = one_line.rstrip('\r')
+            if not one_line:
+                continue
+            if one_line.startswith('event: '):
+                event_type = one_line[7:].strip()
+                continue
+            if one_line.startswith('data: '):
+                for item in process(event_type, one_line[6:]):
+                    yield item
+                    if item.get('type') in ('done', 'error'):
+                        should_return = True
+                event_type = ""
+        if should_return:
+            return
+    line_buf += decoder.decode(b'', final=True)
+    if line_buf.strip():
+        for line in line_buf.strip().split('\n'):
+            line = line.strip()
+            if line.startswith('event: '):
+                event_type = line[7:].strip()
+            elif line.startswith('data: '):
+                for item in process(event_type, line[6:]):
+                    yield item
+                    if item.get('type') in ('done', 'error'):
+                        return
+    yield {"type": "done", "finish_reason": st['stop'] or "stop", "usage": st['usage']}
+
+
+def new_parser(parser_cls, chunks, enable_thinking=True):
+    parser = parser_cls(_parse_usage, enable_thinking)
+    for raw in chunks:
+        yield from parser.feed(raw)
+        if parser.done:
+            return
+    yield from parser.finish()
+
+
+# ============================================================
+# 合成 SSE 记录
+# ============================================================
+
+_WORDS = ("节点", "网络", "参数", "VEX", "wrangle", "点云", "法线", " the", " geometry", " copy",
+          "。", "，", " @P", " noise", "属性", " scatter", "\n", " 🧠", "检查", " cook")
+
+
+def _text_pieces(rng, n):
+    return ["".join(rng.choice(_WORDS) for _ in range(rng.randint(1, 3))) for _ in range(n)]
+
+
+def _oa(delta=None, finish=None, usage=None):
+    obj = {"id": "chatcmpl-x", "object": "chat.completion.chunk", "model": "bench",
+           "choices": [{"index": 0, "delta": delta or {}, "finish_reason": finish}] if delta is not None or finish else []}
+    if usage:
+        obj["usage"] = usage
+    return "data: " + json.dumps(obj, ensure_ascii=False) + "\n\n"
+
+
+def _fragments(rng, s, lo=4, hi=12):
+    out, i = [], 0
+    while i < len(s):
+        n = rng.randint(lo, hi)
+        out.append(s[i:i + n])
+        i += n
+    return out
+
+
+_USAGE = {"prompt_tokens": 12000, "completion_tokens": 3000,
+          "prompt_tokens_details": {"cached_tokens": 9000},
+          "completion_tokens_details": {"reasoning_tokens": 2000}}
+
+
+def _tool_args(rng, i):
+    code = "\n".join(f'@P.y += noise(@P * {rng.random():.3f}) * chf("amp{j}"); // {{block}} "q"'
+                     for j in range(rng.randint(8, 20)))
+    return json.dumps({"parent_path": "/obj/geo1", "name": f"wr{i}", "run_over": "points",
+                       "vex_code": code}, ensure_ascii=False)
+
+
+def synth_reasoning(rng):
+    body = [_oa({"role": "assistant", "content": ""})]
+    body += [_oa({"reasoning_content": p}) for p in _text_pieces(rng, 6000)]
+    body += [_oa({"content": p}) for p in _text_pieces(rng, 1500)]
+    body += [_oa(finish="stop"), _oa(usage=_USAGE), "data: [DONE]\n\n"]
+    return "".join(body).encode("utf-8")
+
+
+def synth_tool_calls(rng, proxy_bug=False):
+    body = [_oa({"content": p}) for p in _text_pieces(rng, 300)]
+    for i in range(2 if proxy_bug else 3):
+        idx = 0 if proxy_bug else i
+        body.append(_oa({"tool_calls": [{"index": idx, "id": f"call_{i}" if not proxy_bug or i == 0 else "",
+                                         "type": "function",
+                                         "function": {"name": "create_wrangle_node", "arguments": ""}}]}))
+        for frag in _fragments(rng, _tool_args(rng, i)):
+            body.append(_oa({"tool_calls": [{"index": idx, "function": {"arguments": frag}}]}))
+    body += [_oa(finish="tool_calls"), _oa(usage=_USAGE), "data: [DONE]\n\n"]
+    return "".join(body).encode("utf-8")
+
+
+def synth_anthropic(rng):
+    def ev(name, obj):
+        return f"event: {name}\ndata: {json.dumps(obj, ensure_ascii=False)}\n\n"
+    body = [ev("message_start", {"type": "message_start", "message": {"usage": {"input_tokens": 12000,
+                                                                                "cache_read_input_tokens": 9000}}}),
+            ev("content_block_start", {"type": "content_block_start", "index": 0,
+                                       "content_block": {"type": "thinking"}})]
+    body += [ev("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                        "delta": {"type": "thinking_delta", "thinking": p}})
+             for p in _text_pieces(rng, 4000)]
+    body.append(ev("content_block_stop", {"type": "content_block_stop", "index": 0}))
+    body.append(ev("content_block_start", {"type": "content_block_start", "index": 1,
+                                           "content_block": {"type": "text"}}))
+    body += [ev("content_block_delta", {"type": "content_block_delta", "index": 1,
+                                        "delta": {"type": "text_delta", "text": p}})
+             for p in _text_pieces(rng, 800)]
+    body.append(ev("content_block_stop", {"type": "content_block_stop", "index": 1}))
+    for i in range(2):
+        idx = 2 + i
+        body.append(ev("content_block_start", {"type": "content_block_start", "index": idx,
+                                               "content_block": {"type": "tool_use", "id": f"toolu_{i}",
+                                                                 "name": "create_wrangle_node"}}))
+        body += [ev("content_block_delta", {"type": "content_block_delta", "index": idx,
+                                            "delta": {"type": "input_json_delta", "partial_json": f}})
+                 for f in _fragments(rng, _tool_args(rng, i))]
+        body.append(ev("content_block_stop", {"type": "content_block_stop", "index": idx}))
+    body.append(ev("message_delta", {"type": "message_delta", "delta": {"stop_reason": "tool_use"},
+                                     "usage": {"output_tokens": 3000}}))
+    body.append(ev("message_stop", {"type": "message_stop"}))
+    return "".join(body).encode("utf-8")
+
+
+# ============================================================
+# 回放
+# ============================================================
+
+def _chunks(body, size):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+def _normalize(events):
+    """拆分产生的调用 id 是随机的，比较前统一"""
+    out = []
+    for e in events:
+        if e.get("type") == "tool_call":
+            tc = dict(e["tool_call"])
+            if tc["id"].startswith("call_") and not tc["id"][5:].isdigit():
+                tc["id"] = "call_split"
+            e = {"type": "tool_call", "tool_call": json.loads(json.dumps(tc))}
+        out.append(json.loads(json.dumps(e, ensure_ascii=False)))
+    return out
+
+
+def _time(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = list(fn())
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000.0, result
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--transcript", action="append", default=[], help="原始 SSE 响应体文件（可多次指定）")
+    ap.add_argument("--chunk", type=int, action="append", default=[], help="字节块大小（可多次指定）")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=3)
+    args = ap.parse_args()
+    sizes = args.chunk or [4096, 256]
+
+    rng = random.Random(args.seed)
+    if args.transcript:
+        cases = []
+        for path in args.transcript:
+            with open(path, "rb") as f:
+                body = f.read()
+            cases.append((os.path.basename(path), body, b"\nevent: " in b"\n" + body))
+    else:
+        cases = [("reasoning", synth_reasoning(rng), False),
+                 ("tool_calls", synth_tool_calls(rng), False),
+                 ("proxy_bug", synth_tool_calls(rng, proxy_bug=True), False),
+                 ("anthropic", synth_anthropic(rng), True)]
+
+    print(f"\n  {'记录':<14}{'大小':>9}{'块':>7}{'事件':>8}{'旧 ms':>10}{'新 ms':>10}{'加速':>8}  一致")
+    for name, body, is_anthropic in cases:
+        for size in sizes:
+            chunks = _chunks(body, size)
+            if is_anthropic:
+                old_fn = lambda: legacy_anthropic(chunks)  # noqa: E731
+                new_fn = lambda: new_parser(AnthropicStreamParser, chunks)  # noqa: E731
+            else:
+                old_fn = lambda: legacy_openai(chunks)  # noqa: E731
+                new_fn = lambda: new_parser(OpenAIStreamParser, chunks)  # noqa: E731
+            old_ms, old_ev = _time(old_fn, args.repeat)
+            new_ms, new_ev = _time(new_fn, args.repeat)
+            same = _normalize(old_ev) == _normalize(new_ev)
+            print(f"  {name:<14}{len(body) / 1024:>8.0f}K{size:>7}{len(new_ev):>8}"
+                  f"{old_ms:>10.2f}{new_ms:>10.2f}{old_ms / max(new_ms, 1e-9):>7.2f}x  {'是' if same else '否'}")
+
+
+if __name__ == "__main__":
+    main()
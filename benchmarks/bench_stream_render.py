@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+流式渲染基准：AIResponse.append_content 旧版（每个 delta 全量重扫 + setPlainText）
+vs MarkdownStreamFreezer（只扫描新文本 + 光标追加）
+
+用法（项目根目录）::
+
+    python benchmarks/bench_stream_render.py [--tokens 50000] [--seed 7] [--only new]
+
+无界面 Qt（QT_QPA_PLATFORM=offscreen）中创建 AIResponse，回放一段合成回复：
+标题、中英混排段落、无空行的大表格、长代码块、列表，按约 4 字符/token 随机切成 delta。
+逐个 delta 计时 append_content（含活跃区域自动调高），报告 p50 / p99 / 最大耗时，
+以及前 10% 与后 10% delta 的平均耗时（比值接近 1 说明单个 delta 的成本不随回复长度增长）。
+每 64 个 delta 处理一次事件（布局 / 绘制在这里发生），报告事件处理总耗时与单次最长耗时
+（界面卡顿：冻结控件的首次排版在这里阻塞事件循环），finalize 及其后的事件处理计为最后一次。
+finalize 后比对冻结内容与原文（忽略空白）。
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# 部分 PySide6 版本在 Python < 3.12（None 尚不是 immortal 对象）上每次调用文本控件 API 都会
+# 少计一次 None 的引用，几万次回放后触发 none_dealloc 崩溃；预先多持有一些 None 引用规避
+_NONE_GUARD = [None] * 20_000_000 if sys.version_info < (3, 12) else []
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_hou import MockHou  # noqa: E402
+
+sys.modules.setdefault("hou", MockHou())
+
+from houdini_agent.qt_compat import QtWidgets, QtGui  # noqa: E402
+from houdini_agent.ui.cursor_widgets import AIResponse, SimpleMarkdown  # noqa: E402
+
+
+# ============================================================
+# 旧实现（cursor_widgets.AIResponse 改造前的 append_content）
+# ============================================================
+
+class LegacyAIResponse(AIResponse):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._pending_text = ""
+        self._in_code_fence = False
+        self._code_fence_lang = ""
+
+    def append_content(self, text):
+        if not text.strip():
+            return
+        if '�' in text:
+            text = text.replace('�', '')
+        self._content_parts.append(text)
+        self._pending_text += text
+        if self._incremental_enabled:
+            self._try_freeze_completed()
+        self.content_label.setPlainText(self._pending_text)
+        self._apply_line_spacing(160)
+        cursor = self.content_label.textCursor()
+        cursor.movePosition(QtGui.QTextCursor.End)
+        self.content_label.setTextCursor(cursor)
+
+    def _try_freeze_completed(self):
+        text = self._pending_text
+        if not text:
+            return
+        lines = text.split('\n')
+        freeze_up_to = -1
+        i = 0
+        in_fence = self._in_code_fence
+        while i < len(lines):
+            stripped = lines[i].strip()
+            if in_fence:
+                if stripped.startswith('```'):
+                    in_fence = False
+                    freeze_up_to = i + 1
+                i += 1
+                continue
+            if stripped.startswith('```'):
+                in_fence = True
+                self._code_fence_lang = stripped[3:].strip()
+                i += 1
+                continue
+            if not stripped:
+                if i > 0 and freeze_up_to < i:
+                    has_content_before = any(lines[j].strip() for j in range(
+                        max(0, freeze_up_to + 1 if freeze_up_to >= 0 else 0), i))
+                    if has_content_before:
+                        freeze_up_to = i
+            i += 1
+        self._in_code_fence = in_fence
+        if freeze_up_to > 0 and not in_fence:
+            frozen_text = '\n'.join(lines[:freeze_up_to])
+            remaining_text = '\n'.join(lines[freeze_up_to:])
+            if frozen_text.strip():
+                self._freeze_text(frozen_text)
+            self._pending_text = remaining_text
+
+    def _auto_resize_content(self):
+        doc = self.content_label.document()
+        doc.adjustSize()
+        target = max(int(doc.size().height()) + 4, self._content_line_h + 4)
+        if abs(target - self.content_label.height()) > 1:
+            self.content_label.setFixedHeight(target)
+
+    def finalize(self):
+        self._freezer._parts = [self._pending_text]  # 让基类 finalize 处理旧版残余
+        super().finalize()
+
+
+# ============================================================
+# 合成回复
+# ============================================================
+
+_WORDS = ("节点", "参数", "几何体", "属性", "网络", "wrangle", "VEX", "point", "primitive",
+          "法线", "cook", "SOP", "copy to points", "attribute", "缓存", "性能", "的", "并且")
+
+
+def _sentence(rng, n):
+    return "".join(rng.choice(_WORDS) + ("" if rng.random() < 0.5 else " ") for _ in range(n)) + "。"
+
+
+def build_response(n_chars, rng):
+    parts = []
+    size = 0
+    k = 0
+    while size < n_chars:
+        k += 1
+        kind = k % 5
+        if kind == 0:
+            rows = ["| 节点 | 类型 | 点数 | 耗时 (ms) | 说明 |", "|---|---|---:|---:|---|"]
+            rows += [f"| /obj/geo1/node{i} | attribwrangle | {rng.randint(1, 10 ** 6)} | "
+                     f"{rng.random() * 100:.2f} | {_sentence(rng, 4)} |" for i in range(rng.randint(150, 400))]
+            block = "\n".join(rows)
+        elif kind == 1:
+            lines = [f"// 步骤 {i}\nv@P += set(0, {rng.random():.3f}, 0) * @ptnum;"
+                     for i in range(rng.randint(200, 500))]
+            block = "```vex\n" + "\n".join(lines) + "\n```"
+        elif kind == 2:
+            block = "\n".join(f"- {_sentence(rng, rng.randint(3, 10))}" for _ in range(rng.randint(5, 30)))
+        elif kind == 3:
+            block = f"## 第 {k} 节 {_sentence(rng, 3)}"
+        else:
+            block = " ".join(_sentence(rng, rng.randint(6, 20)) for _ in range(rng.randint(2, 8)))
+        parts.append(block)
+        size += len(block) + 2
+    return "\n\n".join(parts)
+
+
+def split_deltas(text, n_tokens, rng):
+    """按平均 len(text)/n_tokens 字符切成 delta（模拟 SSE token 流）"""
+    avg = max(1, len(text) / n_tokens)
+    deltas, i = [], 0
+    while i < len(text):
+        step = max(1, int(rng.expovariate(1.0 / avg)) + 1)
+        deltas.append(text[i:i + step])
+        i += step
+    return deltas
+
+
+def _squash(text):
+    return re.sub(r"\s+", "", text)
+
+
+def replay(cls, deltas, app):
+    # 与聊天面板一致：AIResponse 放在可滚动区域内，只绘制视口
+    area = QtWidgets.QScrollArea()
+    area.setWidgetResizable(True)
+    area.resize(720, 600)
+    resp = cls()
+    area.setWidget(resp)
+    area.show()
+    costs = []
+    passes = []
+    for i, d in enumerate(deltas):
+        t0 = time.perf_counter()
+        resp.append_content(d)
+        costs.append(time.perf_counter() - t0)
+        if i % 64 == 63:
+            t1 = time.perf_counter()
+            app.processEvents()
+            area.verticalScrollBar().setValue(area.verticalScrollBar().maximum())
+            passes.append(time.perf_counter() - t1)
+    t1 = time.perf_counter()
+    resp.finalize()
+    app.processEvents()
+    passes.append(time.perf_counter() - t1)
+    return area, resp, costs, passes
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--tokens", type=int, default=50000, help="delta 数（≈token 数）")
+    ap.add_argument("--chars-per-token", type=float, default=4.0)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--only", choices=("old", "new"), help="只运行一种实现")
+    args = ap.parse_args()
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+    rng = random.Random(args.seed)
+    text = build_response(int(args.tokens * args.chars_per_token), rng)
+    deltas = split_deltas(text, args.tokens, rng)
+    print(f"\n回复 {len(text)} 字符，{len(deltas)} 个 delta，"
+          f"{len(SimpleMarkdown.parse_segments(text))} 个 Markdown 段")
+    print(f"  {'方式':<5}{'总耗时':>9}{'p50':>9}{'p99':>9}{'最大':>9}{'前10%均值':>11}{'后10%均值':>11}"
+          f"{'事件处理':>9}{'最长卡顿':>9}{'冻结段':>7}")
+    ok = True
+    for name, cls in (("old", LegacyAIResponse), ("new", AIResponse)):
+        if args.only and args.only != name:
+            continue
+        area, resp, costs, passes = replay(cls, deltas, app)
+        ordered = sorted(costs)
+        tenth = max(1, len(costs) // 10)
+        head = sum(costs[:tenth]) / tenth
+        tail = sum(costs[-tenth:]) / tenth
+        print(f"  {name:<5}{sum(costs):>8.2f}s{ordered[len(ordered) // 2] * 1e6:>7.0f}µs"
+              f"{ordered[int(len(ordered) * .99)] * 1e6:>7.0f}µs{ordered[-1] * 1e3:>7.1f}ms"
+              f"{head * 1e6:>9.0f}µs{tail * 1e6:>9.0f}µs{sum(passes):>8.2f}s{max(passes) * 1e3:>7.0f}ms"
+              f"{len(resp._frozen_segments):>7}")
+        if name == "new":
+            # 冻结段拼接后必须覆盖原文全部内容
+            if _squash("".join(resp._frozen_segments)) != _squash(text):
+                ok = False
+        area.deleteLater()
+    if not args.only or args.only == "new":
+        print(f"\nnew 冻结内容与原文一致: {'OK' if ok else 'MISMATCH'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    code = main()
+    sys.stdout.flush()
+    os._exit(code)
@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""
+Token 记账基准：每次整段重算（旧实现）vs token_accounting 逐消息记忆 + 按轮次累计
+
+用法（项目根目录）::
+
+    python benchmarks/bench_token_accounting.py [--turns 300] [--tool-kb 6] [--limit 200000] [--seed 11]
+
+按固定随机种子模拟一次长会话：每轮追加 用户消息 + 带 tool_calls 的助手消息 + 若干工具结果
+（平均 --tool-kb KB）+ 最终回复，随后与 AITab 一样：
+
+  1. 刷新上下文统计（_calculate_context_tokens 的对话历史部分）
+  2. _manage_context：超过上下文上限的 80% 时压缩旧轮次 tool 结果，仍超限则逐轮删除最早的轮次
+
+  old : 改造前的实现（calculate_message_tokens 每次整段重算，删除每一轮后再整段重算）
+  new : AITab._manage_context（ContextLedger）与 ContextLedger.sync
+
+两种方式处理同一份会话，报告每轮耗时（p50 / 最大 / 末 10 轮均值）、底层 count_tokens 调用次数，
+以及裁剪次数。_manage_context 已改为按缓存块裁剪（prompt_cache.plan_block_trim），裁剪结果与旧实现
+不再逐轮相同；校验项为：new 每轮的账本计数与对同一份历史整段重算（旧实现）完全一致（未校准时）。
+
+最后模拟服务端按另一种分词规则返回 prompt_tokens，报告启发式估算在校准前后的相对误差
+（模型名 bench-calibration 没有 tiktoken 专属编码，tiktoken 可用时也参与校准）。
+"""
+
+import os
+import re
+import sys
+import copy
+import json
+import time
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_hou import MockHou  # noqa: E402
+
+sys.modules.setdefault("hou", MockHou())
+
+from houdini_agent.ui.ai_tab import AITab  # noqa: E402
+from houdini_agent.ui.i18n import tr  # noqa: E402
+from houdini_agent.utils import token_accounting, token_optimizer  # noqa: E402
+from houdini_agent.utils.token_optimizer import TokenOptimizer  # noqa: E402
+from houdini_agent.utils.token_accounting import (  # noqa: E402
+    ContextLedger, get_token_counter, observe_usage, tools_json)
+
+
+# ============================================================
+# 计数调用统计
+# ============================================================
+
+_calls = {'n': 0}
+_count_tokens = token_optimizer.count_tokens
+
+
+def _counting(text, model=''):
+    _calls['n'] += 1
+    return _count_tokens(text, model)
+
+
+token_accounting.count_tokens = _counting
+
+
+# ============================================================
+# 旧实现（改造前：TokenOptimizer.calculate_message_tokens / AITab._manage_context）
+# ============================================================
+
+def legacy_message_tokens(messages):
+    total = 0
+    for msg in messages:
+        content = msg.get('content', '') or ''
+        if isinstance(content, list):
+            for part in content:
+                if isinstance(part, dict):
+                    if part.get('type') == 'text':
+                        total += _counting(part.get('text', ''))
+                    elif part.get('type') == 'image_url':
+                        total += 765
+                elif isinstance(part, str):
+                    total += _counting(part)
+        else:
+            total += _counting(content)
+        tool_calls = msg.get('tool_calls')
+        if tool_calls:
+            for tc in tool_calls:
+                fn = tc.get('function', {})
+                total += _counting(fn.get('name', ''))
+                total += _counting(fn.get('arguments', ''))
+                total += 8
+        total += 4
+    return total
+
+
+def legacy_manage_context(self):
+    history = self._agent_history if self._agent_history is not None else self._conversation_history
+    if len(history) < 6:
+        return
+    current_tokens = legacy_message_tokens(history)
+    context_limit = self._get_current_context_limit()
+    self.token_optimizer.budget.max_tokens = context_limit
+    should_compress, reason = self.token_optimizer.should_compress(current_tokens, context_limit)
+    if not (should_compress and self._auto_optimize):
+        return
+    old_tokens = current_tokens
+    rounds = []
+    current_round = []
+    for m in history:
+        if m.get('role') == 'user' and current_round:
+            rounds.append(current_round)
+            current_round = []
+        current_round.append(m)
+    if current_round:
+        rounds.append(current_round)
+    if len(rounds) <= 2:
+        return
+    n_rounds = len(rounds)
+    protect_n = max(2, int(n_rounds * 0.6))
+    for r_idx in range(n_rounds - protect_n):
+        for m in rounds[r_idx]:
+            if m.get('role') == 'tool':
+                c = m.get('content') or ''
+                if len(c) > 200:
+                    m['content'] = self.client._summarize_tool_content(c, 200)
+    compressed = [m for rnd in rounds for m in rnd]
+    new_tokens = legacy_message_tokens(compressed)
+    if new_tokens < context_limit * self.token_optimizer.budget.compression_threshold:
+        history.clear()
+        history.extend(compressed)
+        if old_tokens - new_tokens > 0:
+            self._addStatus.emit(tr('opt.auto_status', old_tokens - new_tokens))
+        return
+    target = int(context_limit * 0.65)
+    while len(rounds) > 2:
+        rounds.pop(0)
+        compressed = [m for rnd in rounds for m in rnd]
+        new_tokens = legacy_message_tokens(compressed)
+        if new_tokens <= target:
+            break
+    history.clear()
+    history.append({'role': 'system', 'content': tr('ai.old_rounds', n_rounds - len(rounds))})
+    history.extend([m for rnd in rounds for m in rnd])
+    saved = old_tokens - legacy_message_tokens(history)
+    if saved > 0:
+        self._addStatus.emit(tr('opt.auto_status', saved))
+        self._render_conversation_history()
+
+
+# ============================================================
+# 宿主替身（_manage_context 只用到以下属性）
+# ============================================================
+
+class _Signal:
+    def __init__(self):
+        self.count = 0
+
+    def emit(self, *_):
+        self.count += 1
+
+
+class _Client:
+    @staticmethod
+    def _summarize_tool_content(c, n):
+        return c[:n] + '...[summary]'
+
+
+class Host:
+    def __init__(self, limit, manage):
+        self.token_optimizer = TokenOptimizer()
+        self._agent_history = None
+        self._conversation_history = []
+        self._auto_optimize = True
+        self.client = _Client()
+        self._addStatus = _Signal()
+        self._limit = limit
+        self._manage = manage
+        self.trims = 0
+
+    def _get_current_context_limit(self):
+        return self._limit
+
+    def _render_conversation_history(self):
+        self.trims += 1
+
+    def manage(self):
+        self._manage(self)
+
+
+# ============================================================
+# 合成会话
+# ============================================================
+
+def _text(rng, n_chars):
+    words = ("node", "parm", "/obj/geo1/box1", "attribwrangle", "P", "Cd", "0.125", "cook",
+             "{", "}", "错误", "点数", "几何体")
+    out, size = [], 0
+    while size < n_chars:
+        w = rng.choice(words)
+        out.append(w)
+        size += len(w) + 1
+    return " ".join(out)
+
+
+def _turn(rng, turn, tool_kb):
+    calls = [{'id': f"call_{turn}_{k}", 'type': 'function',
+              'function': {'name': 'get_node_parameters', 'arguments': json.dumps({'node_path': f"/obj/geo1/n{k}"})}}
+             for k in range(rng.randint(1, 4))]
+    msgs = [{'role': 'user', 'content': _text(rng, rng.randint(40, 400))},
+            {'role': 'assistant', 'content': None, 'tool_calls': calls}]
+    for c in calls:
+        msgs.append({'role': 'tool', 'tool_call_id': c['id'],
+                     'content': _text(rng, int(rng.expovariate(1.0 / (tool_kb * 1024))) + 200)})
+    msgs.append({'role': 'assistant', 'content': _text(rng, rng.randint(200, 3000))})
+    return msgs
+
+
+def simulate(mode, turns, args):
+    host = Host(args.limit, legacy_manage_context if mode == "old" else AITab._manage_context)
+    ledger = ContextLedger(get_token_counter(''))
+    history = host._conversation_history
+    costs, counts, mismatches = [], [], 0
+    _calls['n'] = 0
+    for msgs in turns:
+        history.extend(copy.deepcopy(msgs))
+        t0 = time.perf_counter()
+        if mode == "old":
+            counts.append(legacy_message_tokens(history))
+        else:
+            counts.append(ledger.sync(history))
+        host.manage()
+        costs.append(time.perf_counter() - t0)
+        if mode == "new":
+            # 校验（不计时、不计入调用次数）：裁剪后的账本与整段重算一致
+            n = _calls['n']
+            mismatches += ledger.sync(history) != legacy_message_tokens(history)
+            _calls['n'] = n
+    return host, costs, counts, _calls['n'], mismatches
+
+
+# ============================================================
+# 校准
+# ============================================================
+
+_TOKEN_RE = re.compile(r'[一-鿿]|[A-Za-z]+|\d|[^\sA-Za-z\d一-鿿]')
+
+
+def provider_tokens(text):
+    """服务端分词的替身：每个汉字 / 英文单词 / 数字 / 符号各算 1 个 token"""
+    return len(_TOKEN_RE.findall(text or ''))
+
+
+def provider_prompt(messages, tools):
+    n = sum(provider_tokens(m.get('content')) + 4 for m in messages)
+    n += sum(provider_tokens(tc['function']['name']) + provider_tokens(tc['function']['arguments']) + 8
+             for m in messages for tc in m.get('tool_calls') or ())
+    return n + provider_tokens(tools_json(tools))
+
+
+def calibration(turns, tools):
+    counter = get_token_counter('bench-calibration')
+    if counter.exact:
+        return None
+    history, errors = [], []
+    for msgs in turns:
+        history.extend(msgs)
+        request = [{'role': 'system', 'content': _text(random.Random(0), 4000)}] + history[-60:]
+        actual = provider_prompt(request, tools)
+        estimate = counter.messages(request) + counter.text(tools_json(tools))
+        errors.append(abs(estimate - actual) / actual)
+        observe_usage('bench-calibration', request, tools, {'prompt_tokens': actual})
+    return errors, counter.stats()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--turns", type=int, default=300)
+    ap.add_argument("--tool-kb", type=float, default=6.0, help="工具结果平均大小（KB）")
+    ap.add_argument("--limit", type=int, default=200000, help="上下文上限（token）")
+    ap.add_argument("--seed", type=int, default=11)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    turns = [_turn(rng, t, args.tool_kb) for t in range(args.turns)]
+    exact = get_token_counter('').exact
+    print(f"\n{args.turns} 轮，工具结果平均 {args.tool_kb:.0f}KB，上下文上限 {args.limit // 1000}K，"
+          f"计数方式 {'tiktoken' if exact else '启发式'}")
+    print(f"  {'方式':<5}{'总耗时':>10}{'p50':>10}{'最大':>10}{'末10轮均值':>12}{'count_tokens':>14}"
+          f"{'删轮裁剪':>8}{'末轮 token':>11}")
+    ok = True
+    for mode in ("old", "new"):
+        host, costs, counts, calls, mismatches = simulate(mode, turns, args)
+        ok = ok and not mismatches
+        ordered = sorted(costs)
+        print(f"  {mode:<5}{sum(costs) * 1e3:>8.0f}ms{ordered[len(ordered) // 2] * 1e3:>8.2f}ms"
+              f"{ordered[-1] * 1e3:>8.1f}ms{sum(costs[-10:]) / 10 * 1e3:>10.2f}ms{calls:>14}"
+              f"{host.trims:>8}{counts[-1]:>11}")
+    print(f"\n  new 计数器统计: {get_token_counter('').stats()}")
+
+    from houdini_agent.utils.ai_client import HOUDINI_TOOLS
+    cal = calibration(turns[:80], HOUDINI_TOOLS)
+    if cal is None:
+        print("\n校准: tiktoken 可用，精确计数不校准")
+    else:
+        errors, stats = cal
+        print(f"\n校准（服务端按另一种分词规则计数）: 首次请求误差 {errors[0] * 100:.1f}%  "
+              f"末 20 次平均误差 {sum(errors[-20:]) / 20 * 100:.1f}%  "
+              f"系数 ×{stats['scale']:.3f}（{stats['samples']} 个样本）")
+    print(f"\n账本计数与整段重算一致: {'OK' if ok else 'MISMATCH'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
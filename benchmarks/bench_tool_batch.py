@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+主线程工具调度基准：逐个 BlockingQueued 调用 vs 整轮批量调度
+
+用法（项目根目录，需要 PySide6 / PySide2）::
+
+    python benchmarks/bench_tool_batch.py [--calls 15] [--rounds 30] [--tool-ms 0.3] [--undo-ms 0.5]
+
+在离屏 Qt 应用中创建真实的 AITab（hou 由 benchmarks/mock_hou.py 替身提供），
+后台线程模拟 Agent 循环的一轮工具调用：
+  serial : 每个调用走 _execute_tool_with_todo（一次线程切换 + 一个 undo group + processEvents）
+  batch  : 整轮走 _execute_tools_batch（一次调度、一个 undo group，重复只读调用合并）
+
+每个工具的实际工作由替身执行（创建节点 / 设置参数 / 读取参数），另加 --tool-ms 的模拟耗时；
+--undo-ms 模拟 Houdini 每次开关 undo group 的开销。两种方式的结果逐项比对。
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from mock_hou import MockHou, MockParm  # noqa: E402
+
+_mock = MockHou()
+sys.modules["hou"] = _mock
+
+from houdini_agent.qt_compat import QtWidgets, QtCore  # noqa: E402
+from houdini_agent.ui.ai_tab import AITab  # noqa: E402
+
+
+def _spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def _make_executor(geo, tool_seconds):
+    """替代 HoudiniMCP.execute_tool：在替身场景上做真实的节点读写"""
+    def execute_tool(tool_name, kwargs):
+        _spin(tool_seconds)
+        if tool_name == "create_node":
+            node = geo.createNode(kwargs["node_type"], kwargs.get("node_name"))
+            return {"success": True, "result": node.path()}
+        node = _mock.node(kwargs.get("node_path", ""))
+        if node is None:
+            return {"success": False, "error": f"节点不存在: {kwargs.get('node_path')}"}
+        if tool_name == "set_node_parameter":
+            parm = node.parm(kwargs["param_name"])
+            if parm is None:
+                node._parms[kwargs["param_name"]] = parm = MockParm(node, kwargs["param_name"], None)
+            parm.set(kwargs["value"])
+            return {"success": True, "result": f"{node.path()}/{kwargs['param_name']}"}
+        if tool_name == "get_node_parameters":
+            return {"success": True, "result": {k: p.eval() for k, p in node._parms.items()}}
+        return {"success": False, "error": f"未知工具: {tool_name}"}
+    return execute_tool
+
+
+def _round_calls(r, n_calls):
+    """一轮典型调用：创建节点 → 设置参数 → 连续重复读取参数"""
+    calls = []
+    n_create = max(1, n_calls // 3)
+    for i in range(n_create):
+        calls.append(("create_node", {"node_type": "attribwrangle", "node_name": f"r{r}_n{i}"}))
+    i = 0
+    while len(calls) < n_calls - 2:
+        calls.append(("set_node_parameter", {"node_path": f"/obj/geo1/r{r}_n{i % n_create}",
+                                             "param_name": "snippet", "value": f"@P.y += {i};"}))
+        i += 1
+    read = ("get_node_parameters", {"node_path": f"/obj/geo1/r{r}_n0"})
+    calls += [read, read]
+    return calls[:n_calls]
+
+
+def _strip(result):
+    return {k: v for k, v in result.items() if not k.startswith("_")}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--calls", type=int, default=15, help="每轮工具调用数")
+    ap.add_argument("--rounds", type=int, default=30)
+    ap.add_argument("--tool-ms", type=float, default=0.3, help="每个工具的模拟执行耗时")
+    ap.add_argument("--undo-ms", type=float, default=0.5, help="每次开 / 关 undo group 的模拟耗时")
+    args = ap.parse_args()
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    tab = AITab()
+    geo = _mock.node("/obj").createNode("geo", "geo1")
+    tab.mcp.execute_tool = _make_executor(geo, args.tool_ms / 1000.0)
+    _mock.undos.cost = args.undo_ms / 1000.0
+
+    timings = {"serial": [], "batch": []}
+    groups = {}
+    mismatches = [0]
+
+    def worker():
+        for mode in ("serial", "batch"):
+            start_groups = _mock.undos.groups
+            for r in range(args.rounds):
+                calls = _round_calls(f"{mode}{r}", args.calls)
+                t0 = time.perf_counter()
+                if mode == "serial":
+                    results = [tab._execute_tool_with_todo(n, **k) for n, k in calls]
+                else:
+                    results = tab._execute_tools_batch(calls)
+                timings[mode].append((time.perf_counter() - t0) * 1000.0)
+                if any(not res.get("success") for res in results) or len(results) != len(calls):
+                    mismatches[0] += 1
+                timings.setdefault(f"{mode}_results", []).append(
+                    [_strip(res) for res in results])
+            groups[mode] = _mock.undos.groups - start_groups
+        QtCore.QMetaObject.invokeMethod(app, "quit", QtCore.Qt.QueuedConnection)
+
+    threading.Thread(target=worker, daemon=True).start()
+    app.exec() if hasattr(app, "exec") else app.exec_()
+
+    # 两种方式的结果应一致（节点名带轮次前缀，比较时去掉模式名）
+    same = all(
+        str(a).replace("serial", "X") == str(b).replace("batch", "X")
+        for a, b in zip(timings["serial_results"], timings["batch_results"]))
+
+    print(f"\n每轮 {args.calls} 个 Houdini 工具调用，{args.rounds} 轮；"
+          f"模拟工具 {args.tool_ms} ms/次，undo group {args.undo_ms} ms/次开关")
+    print(f"  {'方式':<10}{'ms/轮 (中位)':>14}{'ms/轮 (均值)':>14}{'undo groups/轮':>16}")
+    for mode in ("serial", "batch"):
+        print(f"  {mode:<10}{statistics.median(timings[mode]):>14.2f}"
+              f"{statistics.mean(timings[mode]):>14.2f}{groups[mode] / args.rounds:>16.1f}")
+    speedup = statistics.median(timings["serial"]) / max(statistics.median(timings["batch"]), 1e-9)
+    print(f"\n批量调度加速比: {speedup:.2f}x   结果一致: {'是' if same else '否'}   "
+          f"失败轮次: {mismatches[0]}")
+    # 跳过解释器收尾：PySide 在 finalize 阶段析构 AITab 的子控件可能崩溃
+    sys.stdout.flush()
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+工具结果缓存基准：跨轮次缓存（按节点路径失效）vs 旧版单次运行内去重
+
+用法（项目根目录）::
+
+    python benchmarks/bench_tool_cache.py [--nodes 300] [--turns 40] [--calls 12] [--seed 5]
+
+使用 benchmarks/mock_hou.py 的 hou 替身构建一条带分支的 SOP 链，SceneMirror 监听该网络，
+按固定随机种子模拟多轮 Agent 运行：每轮若干查询（参数 / 网络结构 / 错误检查 / 文档）
+穿插修改工具（设置参数 / 连接 / 创建节点），轮次之间模拟用户手动改参数。
+
+  new : ToolResultCache（会话级，mirror 事件 + 工具语义失效，下游由镜像解析）
+  old : 每次运行新建去重表，任何网络修改后按前缀清空网络类条目（ai_client 旧行为）
+
+每次缓存命中都与实时执行结果比对，统计过期命中数（必须为 0）。
+
+另外校验 tool_cache 登记的参数名都存在于 HOUDINI_TOOLS 对应工具的 schema 中，
+以及递归查询（镜像看不到嵌套子网内的修改）不会跨轮次命中。
+"""
+
+import os
+import sys
+import json
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_hou import MockHou  # noqa: E402
+from houdini_agent.utils.mcp import scene_mirror  # noqa: E402
+from houdini_agent.utils import tool_cache  # noqa: E402
+from houdini_agent.utils.tool_cache import ToolResultCache, STATIC_TOOLS, affects_scene  # noqa: E402
+
+
+def _build(mock, n_nodes, rng):
+    geo = mock.node("/obj").createNode("geo", "geo1")
+    nodes = []
+    for i in range(n_nodes):
+        node = geo.createNode("attribwrangle", f"n{i}", parms={"snippet": f"@P.y += {i};"})
+        if nodes:
+            # 主链 + 少量分支
+            node.setInput(0, nodes[-1] if rng.random() < 0.85 else rng.choice(nodes))
+        nodes.append(node)
+    return geo
+
+
+def _cook_errors(mock, path):
+    """替身 cook：上游任意节点代码含 'bad' 时报错（结果依赖上游参数）"""
+    node = mock.node(path)
+    seen = set()
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        if n is None or n._sid in seen:
+            continue
+        seen.add(n._sid)
+        if "bad" in str(n._parms.get("snippet").eval() if "snippet" in n._parms else ""):
+            return ["Cook error: upstream " + n._name]
+        stack.extend(n._inputs)
+    return []
+
+
+def _execute(mock, geo, tool, args):
+    """在替身场景上实时执行工具"""
+    if tool == "get_node_parameters":
+        node = mock.node(args["node_path"])
+        if node is None:
+            return {"success": False, "error": "节点不存在"}
+        return {"success": True, "result": {k: p.eval() for k, p in node._parms.items()}}
+    if tool == "check_errors":
+        if mock.node(args["node_path"]) is None:
+            return {"success": False, "error": "节点不存在"}
+        return {"success": True, "result": _cook_errors(mock, args["node_path"])}
+    if tool == "get_network_structure":
+        return {"success": True, "result": sorted(
+            (c._name, tuple(i._name for i in c._inputs if i)) for c in geo._children)}
+    if tool == "search_local_doc":
+        return {"success": True, "result": f"doc:{args['query']}"}
+    if tool == "set_node_parameter":
+        mock.node(args["node_path"]).parm("snippet").set(args["value"])
+        return {"success": True, "result": "ok"}
+    if tool == "connect_nodes":
+        mock.node(args["to_path"]).setInput(0, mock.node(args["from_path"]))
+        return {"success": True, "result": "ok"}
+    if tool == "create_node":
+        geo.createNode("attribwrangle", args["node_name"], parms={"snippet": "@Cd = 1;"})
+        return {"success": True, "result": "ok"}
+    return {"success": False, "error": tool}
+
+
+def _turn_calls(rng, geo, turn, n_calls):
+    """一轮调用：集中在少数“工作”节点上的查询 + 少量修改"""
+    kids = [c._name for c in geo._children]
+    focus = rng.sample(kids, min(6, len(kids)))
+    calls = []
+    for i in range(n_calls):
+        r = rng.random()
+        path = "/obj/geo1/" + rng.choice(focus)
+        if r < 0.35:
+            calls.append(("get_node_parameters", {"node_path": path}))
+        elif r < 0.55:
+            calls.append(("check_errors", {"node_path": path}))
+        elif r < 0.65:
+            calls.append(("get_network_structure", {"network_path": "/obj/geo1"}))
+        elif r < 0.80:
+            calls.append(("search_local_doc", {"query": rng.choice(("vex", "noise", "copy", "pack"))}))
+        elif r < 0.92:
+            bad = " bad" if rng.random() < 0.3 else ""
+            calls.append(("set_node_parameter", {"node_path": path, "param_name": "snippet",
+                                                 "value": f"@P.x += {rng.random():.3f};{bad}"}))
+        elif r < 0.97:
+            calls.append(("connect_nodes", {"from_path": "/obj/geo1/" + rng.choice(kids),
+                                            "to_path": path}))
+        else:
+            calls.append(("create_node", {"parent_path": "/obj/geo1", "node_type": "attribwrangle",
+                                          "node_name": f"t{turn}_{i}"}))
+    return calls
+
+
+_OLD_DEDUP = frozenset({"get_network_structure", "get_node_parameters", "check_errors", "search_local_doc"})
+_OLD_MUTATING = frozenset({"create_node", "connect_nodes"})
+
+
+def _run(mode, args):
+    mock = MockHou()
+    scene_mirror.hou = mock
+    scene_mirror._scene_mirror = None
+    rng = random.Random(args.seed)
+    geo = _build(mock, args.nodes, rng)
+    registry = scene_mirror.get_scene_mirror()
+    registry.mirror_for(geo).structure()  # 读取连接关系，供下游解析使用
+
+    cache = ToolResultCache()
+    cache.downstream_resolver = registry.downstream_paths
+
+    def on_change(paths, downstream):
+        if paths is None:
+            cache.invalidate_scene()
+        else:
+            cache.invalidate(paths, downstream=downstream)
+    registry.add_listener(on_change)
+
+    executed = hits = stale = 0
+    for turn in range(args.turns):
+        calls = _turn_calls(rng, geo, turn, args.calls)
+        if mode == "new":
+            cache.begin_turn(registry.watched_networks())
+            # 镜像的连接关系在查询时刷新（真实环境由 get_network_structure 触发）
+            registry.mirror_for(geo).structure()
+        dedup = {}
+        mutated = False
+        for tool, targs in calls:
+            if mode == "new":
+                hit = None if (mutated and tool not in STATIC_TOOLS) else cache.lookup(tool, targs)
+                mutated = mutated or affects_scene(tool)
+            else:
+                key = f"{tool}:{json.dumps(targs, sort_keys=True)}"
+                hit = dedup.get(key) if tool in _OLD_DEDUP else None
+            if hit is not None:
+                hits += 1
+                if _execute(mock, geo, tool, targs)["result"] != hit["result"]:
+                    stale += 1
+                continue
+            result = _execute(mock, geo, tool, targs)
+            executed += 1
+            if mode == "new":
+                cache.invalidate_for_tool(tool, targs, result)
+                cache.store(tool, targs, result)
+            else:
+                if tool in _OLD_MUTATING:
+                    for k in [k for k in dedup if k.startswith(("get_network_structure:", "check_errors:"))]:
+                        del dedup[k]
+                if tool in _OLD_DEDUP:
+                    dedup[f"{tool}:{json.dumps(targs, sort_keys=True)}"] = result
+        # 轮次之间：用户在 Houdini 中手动修改若干节点
+        for _ in range(args.user_edits):
+            node = rng.choice(geo._children)
+            node.parm("snippet").set(f"@P.z += {rng.random():.3f};")
+    return executed, hits, stale, cache.stats()
+
+
+# ============================================================
+# 一致性校验
+# ============================================================
+
+def check_schema_names():
+    """SCENE_TOOLS / RECURSIVE_READS / _MUTATION_PATHS / _CREATE_TOOLS 的参数名必须存在于工具 schema"""
+    from houdini_agent.utils.ai_client import HOUDINI_TOOLS
+    props = {t["function"]["name"]: set(t["function"]["parameters"].get("properties", {}))
+             for t in HOUDINI_TOOLS}
+    registered = []
+    registered += [(tool, keys) for tool, keys in tool_cache.SCENE_TOOLS.items()]
+    registered += [(tool, (flag[0],)) for tool, flag in tool_cache.RECURSIVE_READS.items() if flag]
+    registered += [(tool, keys) for tool, (keys, _down) in tool_cache._MUTATION_PATHS.items()]
+    registered += [(tool, keys) for tool, keys in tool_cache._CREATE_TOOLS.items()]
+    problems = []
+    for tool, keys in registered:
+        if tool not in props:
+            problems.append(f"{tool}: 不在 HOUDINI_TOOLS 中")
+            continue
+        problems += [f"{tool}.{k}: schema 中没有该参数" for k in keys if k not in props[tool]]
+    return problems
+
+
+def check_recursive_turn():
+    """递归查询在新一轮开始时必须丢弃，非递归查询在监听范围内保留"""
+    cache = ToolResultCache()
+    ok = {"success": True, "result": []}
+    recursive = [("check_errors", {"node_path": "/obj/geo1"}),
+                 ("find_nodes_by_param", {"network_path": "/obj/geo1", "value": "x"}),
+                 ("list_children", {"network_path": "/obj/geo1", "recursive": True})]
+    flat = [("list_children", {"network_path": "/obj/geo1", "recursive": "false"}),
+            ("get_node_parameters", {"node_path": "/obj/geo1/n0"})]
+    for tool, targs in recursive + flat:
+        cache.store(tool, targs, ok)
+    cache.begin_turn({"/obj/geo1"})
+    kept_recursive = [t for t, a in recursive if cache.lookup(t, a) is not None]
+    lost_flat = [t for t, a in flat if cache.lookup(t, a) is None]
+    return kept_recursive, lost_flat
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--nodes", type=int, default=300)
+    ap.add_argument("--turns", type=int, default=40)
+    ap.add_argument("--calls", type=int, default=12, help="每轮工具调用数")
+    ap.add_argument("--user-edits", type=int, default=2, help="轮次之间用户手动修改的节点数")
+    ap.add_argument("--seed", type=int, default=5)
+    args = ap.parse_args()
+
+    total = args.turns * args.calls
+    print(f"\n{args.nodes} 节点网络，{args.turns} 轮 × {args.calls} 个调用，"
+          f"每轮间用户手动修改 {args.user_edits} 个节点")
+    print(f"  {'方式':<8}{'实际执行':>10}{'缓存命中':>10}{'命中率':>10}{'过期命中':>10}")
+    for mode in ("old", "new"):
+        executed, hits, stale, stats = _run(mode, args)
+        print(f"  {mode:<8}{executed:>10}{hits:>10}{hits / total * 100:>9.1f}%{stale:>10}")
+    print(f"\n缓存统计 (new): {stats}")
+    # 旧版去重不感知参数修改，可能出现过期命中；新版必须为 0
+    ok = stale == 0
+
+    problems = check_schema_names()
+    print(f"参数名校验: {'; '.join(problems) if problems else '全部存在于 schema'}")
+    kept_recursive, lost_flat = check_recursive_turn()
+    print(f"跨轮次: 保留的递归查询 {kept_recursive or '无'}，丢失的非递归查询 {lost_flat or '无'}")
+    ok &= not problems and not kept_recursive and not lost_flat
+
+    print(f"\n结果一致: {'OK' if ok else 'MISMATCH'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+一轮工具调用的调度基准：web / shell 并行 + 其余串行（旧实现）vs tool_schedule 依赖图调度
+
+用法（项目根目录）::
+
+    python benchmarks/bench_tool_dag.py [--rounds 12] [--hop-ms 8] [--seed 3]
+
+AIClient 挂上一个模拟 AITab 的执行器：
+  单个调用（_execute_tool_with_todo）：Todo / 不依赖 hou 的工具在调用线程执行，其余一次主线程调度
+  批量调用（_execute_tools_batch）：连续的主线程工具合并为一次调度，遇到 Todo / 后台工具先执行已排队的调用
+每次主线程调度另加 --hop-ms（线程切换 + undo group + processEvents）；各工具按类型固定耗时，
+主线程同一时刻只执行一个工具。
+
+  old : 改造前的 agent_loop_stream 工具执行段（web / fetch / shell 先并行，其余调用按顺序批量执行）
+  new : AIClient._execute_round_calls（tool_schedule.plan_round + run_round）
+
+按几类典型轮次分别报告每轮耗时（中位数），两种方式的结果逐项比对。
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_hou import MockHou  # noqa: E402
+
+sys.modules.setdefault("hou", MockHou())
+
+from houdini_agent.utils.ai_client import AIClient  # noqa: E402
+
+# 各工具耗时（秒）
+_SECONDS = {
+    'web_search': 0.250, 'fetch_webpage': 0.300, 'execute_shell': 0.120,
+    'search_local_doc': 0.040, 'list_skills': 0.005, 'add_todo': 0.001, 'update_todo': 0.001,
+    'get_node_parameters': 0.010, 'check_errors': 0.020, 'get_houdini_node_doc': 0.030,
+    'create_node': 0.015, 'set_node_parameter': 0.015,
+}
+_BG_SAFE = frozenset({'execute_shell', 'search_local_doc', 'list_skills'})
+_TODO = frozenset({'add_todo', 'update_todo'})
+
+
+# ============================================================
+# 模拟 AITab 执行器
+# ============================================================
+
+class Host:
+    def __init__(self, hop_s):
+        self.hop_s = hop_s
+        self.main = threading.Lock()
+        self.nodes = {}
+        self.hops = 0
+
+    def _work(self, name, args):
+        time.sleep(_SECONDS.get(name, 0.01))
+        path = args.get('node_path', '')
+        if name == 'create_node':
+            path = f"{args['parent_path']}/{args['node_name']}"
+            self.nodes[path] = 0
+            return {'success': True, 'result': f"✓{path}"}
+        if name == 'set_node_parameter':
+            self.nodes[path] = self.nodes.get(path, 0) + 1
+            return {'success': True, 'result': f"{path} v{self.nodes[path]}"}
+        if name in ('get_node_parameters', 'check_errors'):
+            return {'success': True, 'result': f"{name} {path} v{self.nodes.get(path, 0)}"}
+        return {'success': True, 'result': f"{name} {sorted(args.items())}"}
+
+    def _hop(self, calls):
+        with self.main:
+            self.hops += 1
+            time.sleep(self.hop_s)
+            return [self._work(n, a) for n, a in calls]
+
+    def execute(self, name, **kwargs):
+        """_execute_tool_with_todo"""
+        if name in _TODO or name in _BG_SAFE or name in ('web_search', 'fetch_webpage'):
+            return self._work(name, kwargs)
+        return self._hop([(name, kwargs)])[0]
+
+    def execute_batch(self, calls):
+        """_execute_tools_batch"""
+        results = [None] * len(calls)
+        pending = []
+
+        def _flush():
+            if pending:
+                for (idx, _n, _a), res in zip(pending, self._hop([(n, a) for _, n, a in pending])):
+                    results[idx] = res
+                pending.clear()
+
+        for idx, (name, kwargs) in enumerate(calls):
+            if name in _TODO or name in _BG_SAFE:
+                _flush()
+                results[idx] = self.execute(name, **kwargs)
+            else:
+                pending.append((idx, name, kwargs))
+        _flush()
+        return results
+
+
+# ============================================================
+# 旧实现（改造前 agent_loop_stream 的工具执行段）
+# ============================================================
+
+def legacy_round(client, calls):
+    async_names = frozenset({'web_search', 'fetch_webpage', 'execute_shell'})
+    results = [None] * len(calls)
+    uncached_async = [(i, c) for i, c in enumerate(calls) if c[0] in async_names]
+    uncached_houdini = [(i, c) for i, c in enumerate(calls) if c[0] not in async_names]
+
+    def _exec_async(idx_c):
+        idx, (tname, targs) = idx_c
+        if tname == 'web_search':
+            return idx, client._execute_web_search(targs)
+        elif tname == 'fetch_webpage':
+            return idx, client._execute_fetch_webpage(targs)
+        return idx, client._tool_executor(tname, **targs)
+
+    if len(uncached_async) > 1:
+        for idx, result in client._parallel_pool().map(_exec_async, uncached_async):
+            results[idx] = result
+    elif len(uncached_async) == 1:
+        idx, result = _exec_async(uncached_async[0])
+        results[idx] = result
+    houdini_results = client._execute_houdini_calls([c for _, c in uncached_houdini])
+    for (idx, _c), res in zip(uncached_houdini, houdini_results):
+        results[idx] = res
+    return results
+
+
+# ============================================================
+# 典型轮次
+# ============================================================
+
+def _nodes(rng, n):
+    return [f"/obj/geo1/n{rng.randrange(40)}" for _ in range(n)]
+
+
+def _mix_reads(rng, r):
+    paths = _nodes(rng, 10)
+    calls = [('get_node_parameters', {'node_path': p}) for p in paths[:5]]
+    calls.append(('update_todo', {'todo_id': f"t{r}", 'status': 'done'}))
+    calls += [('get_node_parameters', {'node_path': p}) for p in paths[5:]]
+    return calls + [('add_todo', {'todo_id': f"t{r + 1}", 'text': '检查参数'})]
+
+
+def _mix_docs(rng, r):
+    types = rng.sample(('box', 'scatter', 'copytopoints', 'attribwrangle'), 2)
+    return [('get_houdini_node_doc', {'node_type': types[0]}),
+            ('search_local_doc', {'query': f"vex {r}"}),
+            ('get_houdini_node_doc', {'node_type': types[1]})]
+
+
+def _mix_web(rng, r):
+    path = f"/obj/geo1/w{r}"
+    return [('web_search', {'query': f"houdini {r}"}), ('fetch_webpage', {'url': f"https://example.com/{r}"}),
+            ('create_node', {'parent_path': '/obj/geo1', 'node_type': 'box', 'node_name': f"w{r}"}),
+            ('set_node_parameter', {'node_path': path, 'param_name': 'sizex', 'value': r}),
+            ('check_errors', {'node_path': path})]
+
+
+def _mix_shell(rng, r):
+    return ([('execute_shell', {'command': f"ls {r}"})] +
+            [('get_node_parameters', {'node_path': p}) for p in _nodes(rng, 3)] +
+            [('list_skills', {})])
+
+
+def _mix_writes(rng, r):
+    paths = _nodes(rng, 3)
+    calls = [('set_node_parameter', {'node_path': p, 'param_name': 'scale', 'value': r}) for p in paths]
+    return calls + [('get_node_parameters', {'node_path': p}) for p in paths]
+
+
+MIXES = [
+    ("10 读取，中间夹 Todo", _mix_reads),
+    ("节点文档 + 文档检索", _mix_docs),
+    ("web + 建节点/设参/检查", _mix_web),
+    ("shell + 读取 + 技能", _mix_shell),
+    ("3 写 + 3 读（冲突）", _mix_writes),
+]
+
+
+def simulate(mode, rounds, args):
+    host = Host(args.hop_ms / 1000)
+    client = AIClient(api_key='bench')
+    client.set_tool_executor(host.execute)
+    client.set_batch_tool_executor(host.execute_batch)
+    client._execute_web_search = lambda a: host._work('web_search', a)
+    client._execute_fetch_webpage = lambda a: host._work('fetch_webpage', a)
+    run = (lambda calls: legacy_round(client, calls)) if mode == "old" else client._execute_round_calls
+    costs = {name: [] for name, _ in MIXES}
+    results = []
+    for name, calls in rounds:
+        t0 = time.perf_counter()
+        results.append(run(calls))
+        costs[name].append(time.perf_counter() - t0)
+    client._parallel_pool().shutdown(wait=True)
+    return costs, results, host.hops
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--rounds", type=int, default=12, help="每类轮次的次数")
+    ap.add_argument("--hop-ms", type=float, default=8.0, help="每次主线程调度的固定开销（毫秒）")
+    ap.add_argument("--seed", type=int, default=3)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    rounds = [(name, make(rng, r)) for r in range(args.rounds) for name, make in MIXES]
+    runs = {mode: simulate(mode, rounds, args) for mode in ("old", "new")}
+
+    print(f"\n每类 {args.rounds} 轮，主线程调度开销 {args.hop_ms:.0f}ms")
+    print(f"  {'轮次':<22}{'old':>10}{'new':>10}{'加速':>8}")
+    for name, _ in MIXES:
+        old = statistics.median(runs["old"][0][name])
+        new = statistics.median(runs["new"][0][name])
+        print(f"  {name:<22}{old * 1e3:>8.0f}ms{new * 1e3:>8.0f}ms{old / new:>7.2f}x")
+    old_total = sum(sum(v) for v in runs["old"][0].values())
+    new_total = sum(sum(v) for v in runs["new"][0].values())
+    print(f"\n  总耗时 old {old_total:.2f}s / new {new_total:.2f}s（{old_total / new_total:.2f}x）；"
+          f"主线程调度次数 old {runs['old'][2]} / new {runs['new'][2]}")
+
+    ok = runs["old"][1] == runs["new"][1]
+    print(f"\n结果一致: {'OK' if ok else 'MISMATCH'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+投机预取基准：流式输出期间主线程空闲（旧实现）vs tool_prefetch 提前执行只读查询
+
+用法（项目根目录）::
+
+    python benchmarks/bench_tool_prefetch.py [--turns 20] [--chunk-ms 15] [--preamble 12] [--follow 0.8] [--edit 0.2] [--seed 5]
+
+真实的 AIClient.agent_loop_stream 驱动一个脚本化的模型（替换 chat_stream，每个流式 chunk 间隔
+--chunk-ms）与一个串行的「主线程」工具执行器（按工具类型固定耗时）。每个用户轮次是一条典型的
+建节点流程：
+
+  1. search_node_types
+  2. get_houdini_node_doc（第一个结果）+ create_node
+  3. get_node_parameters（新节点）
+  4. set_node_parameter
+  5. check_errors（新节点）→ 最终回复
+
+第 2 / 3 / 5 步的只读查询各以 --follow 的概率出现（否则模型直接跳过，预取被丢弃）；第 3 步流式
+输出期间以 --edit 的概率模拟用户手动修改新节点（参数改变 + 缓存按路径失效），此时预取结果必须作废。
+
+  old : 不设置预取执行器（与改造前相同）
+  new : AIClient.set_prefetch_executor + ToolPrefetcher
+
+报告每轮耗时、预取发起 / 命中 / 命中率、节省与浪费的主线程时间；两种方式模型看到的工具结果
+逐条比对。
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_hou import MockHou  # noqa: E402
+
+sys.modules.setdefault("hou", MockHou())
+
+from houdini_agent.utils.ai_client import AIClient, HOUDINI_TOOLS  # noqa: E402
+from houdini_agent.utils.tool_cache import ToolResultCache  # noqa: E402
+
+# 各工具在主线程上的耗时（秒）
+_TOOL_SECONDS = {
+    'search_node_types': 0.060,
+    'get_houdini_node_doc': 0.120,
+    'create_node': 0.040,
+    'get_node_parameters': 0.050,
+    'set_node_parameter': 0.030,
+    'check_errors': 0.080,
+}
+
+_NODE_TYPES = ("box", "sphere", "grid", "tube", "torus", "scatter", "mountain", "attribnoise")
+
+
+# ============================================================
+# 场景与「主线程」执行器
+# ============================================================
+
+class Scene:
+    def __init__(self):
+        self.nodes = {}
+        self.lock = threading.Lock()     # 主线程：一次只执行一个工具
+        self.busy = 0.0
+
+    def execute(self, name, args):
+        with self.lock:
+            t0 = time.perf_counter()
+            time.sleep(_TOOL_SECONDS.get(name, 0.02))
+            try:
+                return self._run(name, args)
+            finally:
+                self.busy += time.perf_counter() - t0
+
+    def _run(self, name, args):
+        if name == 'search_node_types':
+            kw = args.get('keywords', '')
+            hits = [t for t in _NODE_TYPES if t.startswith(kw[:2])] or list(_NODE_TYPES[:2])
+            return {'success': True, 'result': f"根据 '{kw}' 找到以下节点:\n" +
+                    "\n".join(f"- `sop/{t}` — {t.title()}" for t in hits)}
+        if name == 'get_houdini_node_doc':
+            return {'success': True, 'result': f"{args['node_type']} 文档（{args.get('category', 'sop')}）"}
+        if name == 'create_node':
+            parent = args['parent_path']
+            base = args['node_type']
+            i = 1
+            while f"{parent}/{base}{i}" in self.nodes:
+                i += 1
+            path = f"{parent}/{base}{i}"
+            self.nodes[path] = {'scale': 1.0}
+            return {'success': True, 'result': f"✓{path} (父网络: {parent}, 子节点数: {len(self.nodes)})"}
+        node = self.nodes.get(args.get('node_path', ''))
+        if node is None:
+            return {'success': False, 'error': f"节点不存在: {args.get('node_path')}"}
+        if name == 'get_node_parameters':
+            return {'success': True, 'result': json.dumps(node, sort_keys=True)}
+        if name == 'set_node_parameter':
+            node[args['param_name']] = args['value']
+            return {'success': True, 'result': f"{args['node_path']}/{args['param_name']} = {args['value']}"}
+        if name == 'check_errors':
+            return {'success': True, 'result': f"{args['node_path']}: 无错误 (scale={node.get('scale')})"}
+        return {'success': False, 'error': f"未知工具: {name}"}
+
+
+# ============================================================
+# 脚本化的流式模型
+# ============================================================
+
+def _plan(rng, turn, follow, edit):
+    """一个用户轮次的脚本：每步 (调用生成器, 流式期间的用户修改)；调用参数可依赖上一步结果"""
+    kw = rng.choice(_NODE_TYPES)
+    want = [rng.random() < follow for _ in range(3)]
+    do_edit = rng.random() < edit
+    value = round(rng.uniform(0.5, 3.0), 2)
+
+    def step2(ctx):
+        node_type = ctx['types'][0]
+        calls = [('get_houdini_node_doc', {'node_type': node_type})] if want[0] else []
+        return calls + [('create_node', {'parent_path': '/obj/geo1', 'node_type': node_type})]
+
+    steps = [
+        (lambda ctx: [('search_node_types', {'keywords': kw})], False),
+        (step2, False),
+        (lambda ctx: [('get_node_parameters', {'node_path': ctx['created']})] if want[1] else [], do_edit),
+        (lambda ctx: [('set_node_parameter', {'node_path': ctx['created'], 'param_name': 'scale',
+                                              'value': value})], False),
+        (lambda ctx: [('check_errors', {'node_path': ctx['created']})] if want[2] else [], False),
+    ]
+    return steps
+
+
+class ScriptedModel:
+    def __init__(self, client, scene, cache, chunk_s, preamble):
+        self.client = client
+        self.scene = scene
+        self.cache = cache
+        self.chunk_s = chunk_s
+        self.preamble = preamble
+        self.steps = []
+        self.ctx = {}
+
+    def start_turn(self, steps):
+        self.steps = list(steps)
+        self.ctx = {}
+
+    def _observe(self, messages):
+        """从上一轮工具结果中取出脚本需要的值（节点类型、新节点路径）"""
+        for m in messages[-4:]:
+            if m.get('role') != 'tool':
+                continue
+            text = m.get('content') or ''
+            if '找到以下节点' in text:
+                self.ctx['types'] = [line.split('/')[1].split('`')[0]
+                                     for line in text.splitlines() if line.startswith('- `')]
+            elif text.startswith('✓'):
+                self.ctx['created'] = text[1:].split(' ')[0]
+
+    def chat_stream(self, messages, **_kw):
+        self._observe(messages)
+        calls, do_edit = [], False
+        while self.steps and not calls:
+            make, do_edit = self.steps.pop(0)
+            calls = make(self.ctx)
+        # 回复前的说明文字
+        for _ in range(self.preamble):
+            time.sleep(self.chunk_s)
+            yield {'type': 'content', 'content': '…'}
+        if do_edit and self.ctx.get('created'):
+            # 用户在 Houdini 中修改了新节点：scene_mirror 通知缓存按路径失效
+            path = self.ctx['created']
+            with self.scene.lock:
+                self.scene.nodes[path]['scale'] = -1.0
+            self.cache.invalidate([path], downstream=True)
+        tool_calls = []
+        for idx, (name, args) in enumerate(calls):
+            text = json.dumps(args, ensure_ascii=False)
+            step = max(1, len(text) // 4)
+            for end in range(step, len(text) + step, step):
+                time.sleep(self.chunk_s)
+                yield {'type': 'tool_args_delta', 'index': idx, 'name': name,
+                       'delta': text[end - step:end], 'accumulated': text[:end]}
+            tool_calls.append({'id': f"call_{idx}", 'type': 'function',
+                               'function': {'name': name, 'arguments': text}})
+        if not calls:
+            for _ in range(self.preamble):
+                time.sleep(self.chunk_s)
+                yield {'type': 'content', 'content': '完成。'}
+        for tc in tool_calls:
+            yield {'type': 'tool_call', 'tool_call': tc}
+        yield {'type': 'done', 'usage': {}}
+
+
+# ============================================================
+# 模拟
+# ============================================================
+
+def simulate(mode, plans, args):
+    scene = Scene()
+    cache = ToolResultCache()
+    client = AIClient(api_key='bench')
+    client.set_tool_executor(lambda name, **kw: scene.execute(name, kw))
+    client.set_tool_cache(cache)
+    if mode == "new":
+        client.set_prefetch_executor(scene.execute)
+    model = ScriptedModel(client, scene, cache, args.chunk_ms / 1000, args.preamble)
+    client.chat_stream = model.chat_stream
+
+    seen, costs, stats = [], [], []
+    for steps in plans:
+        model.start_turn(steps)
+        t0 = time.perf_counter()
+        result = client.agent_loop_auto(
+            messages=[{'role': 'system', 'content': 'bench'}, {'role': 'user', 'content': 'go'}],
+            model='deepseek-chat', provider='deepseek', enable_thinking=False,
+            tools_override=HOUDINI_TOOLS)
+        costs.append(time.perf_counter() - t0)
+        seen.append([(h['tool_name'], json.dumps(h['result'], sort_keys=True, ensure_ascii=False))
+                     for h in result['tool_calls_history']])
+        stats.append(result.get('prefetch'))
+        cache.begin_turn(None)
+    client._parallel_pool().shutdown(wait=True)
+    return costs, seen, stats, scene.busy
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--turns", type=int, default=20)
+    ap.add_argument("--chunk-ms", type=float, default=15.0, help="流式 chunk 间隔（毫秒）")
+    ap.add_argument("--preamble", type=int, default=12, help="每次回复中工具调用前的文字 chunk 数")
+    ap.add_argument("--follow", type=float, default=0.8, help="模型请求预测中的只读查询的概率")
+    ap.add_argument("--edit", type=float, default=0.2, help="流式期间用户手动修改新节点的概率")
+    ap.add_argument("--seed", type=int, default=5)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    plans = [_plan(rng, t, args.follow, args.edit) for t in range(args.turns)]
+
+    import contextlib
+    import io
+    runs = {}
+    for mode in ("old", "new"):
+        with contextlib.redirect_stdout(io.StringIO()):
+            runs[mode] = simulate(mode, plans, args)
+
+    print(f"\n{args.turns} 轮，chunk 间隔 {args.chunk_ms:.0f}ms，跟进概率 {args.follow:.0%}，"
+          f"手动修改概率 {args.edit:.0%}")
+    print(f"  {'方式':<5}{'总耗时':>10}{'每轮均值':>10}{'主线程占用':>12}")
+    for mode in ("old", "new"):
+        costs, _seen, _stats, busy = runs[mode]
+        print(f"  {mode:<5}{sum(costs):>9.2f}s{sum(costs) / len(costs) * 1e3:>8.0f}ms{busy:>11.2f}s")
+
+    stats = [s or {} for s in runs["new"][2]]
+    submitted = sum(s.get('submitted', 0) for s in stats)
+    served = sum(s.get('served', 0) for s in stats)
+    stale = sum(s.get('stale', 0) for s in stats)
+    saved = sum(s.get('saved_ms', 0.0) for s in stats)
+    wasted = sum(s.get('wasted_ms', 0.0) for s in stats)
+    per_turn = [s['served'] / s['submitted'] for s in stats if s.get('submitted')]
+    old_total, new_total = sum(runs["old"][0]), sum(runs["new"][0])
+    print(f"\n  预取: 发起 {submitted}，命中 {served}（{served / max(1, submitted) * 100:.0f}%），"
+          f"过期作废 {stale}；每轮命中率均值 {sum(per_turn) / max(1, len(per_turn)) * 100:.0f}%")
+    print(f"  每轮节省工具等待 {saved / len(stats):.0f}ms，浪费主线程 {wasted / len(stats):.0f}ms；"
+          f"端到端 {(old_total - new_total) / len(stats) * 1e3:.0f}ms/轮"
+          f"（{(1 - new_total / old_total) * 100:.1f}%）")
+
+    ok = runs["old"][1] == runs["new"][1]
+    print(f"\n模型看到的工具结果一致: {'OK' if ok else 'MISMATCH'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,655 @@
+# -*- coding: utf-8 -*-
+"""
+最小 hou 替身（供 benchmarks/ 下的脚本在无 Houdini 环境中驱动插件代码）
+
+只实现基准脚本用到的 API 子集：节点树、输入连接、参数、标志、位置、错误、
+NetworkBox，以及节点 / hip 文件事件回调。事件触发时机与 Houdini 一致：
+    createNode        → 父网络 ChildCreated(child_node)
+    destroy           → 节点 BeingDeleted，下游 InputRewired，父网络 ChildDeleted
+    setInput          → 节点 InputRewired(input_index)
+    setName           → 节点 NameChanged
+    parm().set        → 节点 ParmTupleChanged(parm_tuple)
+    setDisplayFlag    → 节点 FlagChanged
+    setPosition       → 节点 PositionChanged
+    setErrors         → 节点 AppearanceChanged（替身专用：模拟 cook 后错误状态变化）
+
+MockGeometry 提供几何体读取 API 子集（点位置、点 / 面属性的逐元素与批量读取、
+iterPrims / Prim.vertices / Vertex.point），由 node.setGeometry() 挂到节点上。
+
+MockHou.calls 统计所有 hou 调用次数，用于衡量“每次查询触达多少 hou API”。
+MockHou.undos 记录 undo group 的开启次数，可用 undo_cost 模拟每次开关的耗时。
+
+用法::
+
+    from mock_hou import MockHou
+    hou = MockHou()
+    geo = hou.node("/obj").createNode("geo", "geo1")
+    box = geo.createNode("box")
+"""
+
+import time
+import array
+import itertools
+from types import SimpleNamespace
+
+
+class _EnumValue:
+    def __init__(self, full_name):
+        self._full_name = full_name
+
+    def name(self):
+        return self._full_name.rsplit(".", 1)[-1]
+
+    def __repr__(self):
+        return self._full_name
+
+
+class _Enum:
+    """hou 枚举替身：每个成员是唯一的命名哨兵对象"""
+
+    def __init__(self, prefix, names):
+        for n in names:
+            setattr(self, n, _EnumValue(f"{prefix}.{n}"))
+
+
+NODE_EVENTS = ("BeingDeleted", "NameChanged", "FlagChanged", "AppearanceChanged",
+               "PositionChanged", "InputRewired", "InputDataChanged", "ParmTupleChanged",
+               "ChildCreated", "ChildDeleted", "ChildSwitched", "NetworkBoxCreated",
+               "NetworkBoxChanged", "NetworkBoxDeleted")
+HIP_EVENTS = ("BeforeClear", "AfterClear", "BeforeLoad", "AfterLoad", "BeforeSave", "AfterSave")
+
+
+class MockNodeType:
+    def __init__(self, hou, name, category="Sop", description="", input_labels=()):
+        self._hou = hou
+        self._name = name
+        self._category = SimpleNamespace(name=lambda: category)
+        self._description = description or name.capitalize()
+        self._labels = list(input_labels)
+
+    def name(self):
+        self._hou.calls += 1
+        return self._name
+
+    def category(self):
+        self._hou.calls += 1
+        return self._category
+
+    def description(self):
+        self._hou.calls += 1
+        return self._description
+
+    def inputLabel(self, idx):
+        self._hou.calls += 1
+        return self._labels[idx] if idx < len(self._labels) else ""
+
+
+class MockParmTuple:
+    def __init__(self, parm):
+        self._parm = parm
+
+    def name(self):
+        return self._parm._name
+
+
+class MockParm:
+    def __init__(self, node, name, value):
+        self._node = node
+        self._name = name
+        self._value = value
+
+    def name(self):
+        self._node._hou.calls += 1
+        return self._name
+
+    def eval(self):
+        self._node._hou.calls += 1
+        return self._value
+
+    def set(self, value):
+        self._node._hou.calls += 1
+        self._value = value
+        self._node._fire("ParmTupleChanged", parm_tuple=MockParmTuple(self))
+
+
+class MockNetworkBox:
+    def __init__(self, parent, name, comment=""):
+        self._parent = parent
+        self._name = name
+        self._comment = comment
+        self._nodes = []
+
+    def name(self):
+        self._parent._hou.calls += 1
+        return self._name
+
+    def comment(self):
+        self._parent._hou.calls += 1
+        return self._comment
+
+    def nodes(self):
+        self._parent._hou.calls += 1
+        return [n for n in self._nodes if n._alive]
+
+    def addNode(self, node):
+        self._nodes.append(node)
+        self._parent._fire("NetworkBoxChanged", network_box=self)
+
+
+class MockNode:
+    def __init__(self, hou, parent, node_type, name):
+        self._hou = hou
+        self._parent = parent
+        self._type = node_type
+        self._name = name
+        self._sid = next(hou._sids)
+        self._children = []
+        self._inputs = []
+        self._parms = {}
+        self._pos = (0.0, 0.0)
+        self._display = False
+        self._errors = ()
+        self._boxes = []
+        self._callbacks = {}
+        self._alive = True
+        self._geometry = None
+        hou._by_sid[self._sid] = self
+
+    # --- 事件 ---
+
+    def addEventCallback(self, event_types, callback):
+        self._hou.calls += 1
+        for ev in event_types:
+            cbs = self._callbacks.setdefault(ev, [])
+            if callback not in cbs:
+                cbs.append(callback)
+
+    def removeEventCallback(self, event_types, callback):
+        self._hou.calls += 1
+        for ev in event_types:
+            cbs = self._callbacks.get(ev, [])
+            if callback in cbs:
+                cbs.remove(callback)
+
+    def _fire(self, name, **kwargs):
+        ev = getattr(self._hou.nodeEventType, name)
+        for cb in list(self._callbacks.get(ev, ())):
+            cb(event_type=ev, node=self, **kwargs)
+
+    # --- 基本信息 ---
+
+    def sessionId(self):
+        self._hou.calls += 1
+        return self._sid
+
+    def name(self):
+        self._hou.calls += 1
+        return self._name
+
+    def path(self):
+        self._hou.calls += 1
+        if self._parent is None:
+            return "/"
+        base = self._parent.path()
+        return ("" if base == "/" else base) + "/" + self._name
+
+    def type(self):
+        self._hou.calls += 1
+        return self._type
+
+    def children(self):
+        self._hou.calls += 1
+        return tuple(self._children)
+
+    def node(self, rel):
+        return self._hou.node(rel if rel.startswith("/") else self.path() + "/" + rel)
+
+    def inputs(self):
+        self._hou.calls += 1
+        return tuple(self._inputs)
+
+    def outputs(self):
+        self._hou.calls += 1
+        return tuple(n for n in self._parent._children if self in n._inputs) if self._parent else ()
+
+    def parm(self, name):
+        self._hou.calls += 1
+        return self._parms.get(name)
+
+    def position(self):
+        self._hou.calls += 1
+        return self._pos
+
+    def isDisplayFlagSet(self):
+        self._hou.calls += 1
+        return self._display
+
+    def errors(self):
+        self._hou.calls += 1
+        return self._errors
+
+    def networkBoxes(self):
+        self._hou.calls += 1
+        return tuple(self._boxes)
+
+    # --- 修改 ---
+
+    def createNode(self, type_name, node_name=None, parms=None):
+        self._hou.calls += 1
+        node_type = self._hou.nodeType(type_name)
+        if not node_name:
+            i = 1
+            names = {c._name for c in self._children}
+            while f"{type_name}{i}" in names:
+                i += 1
+            node_name = f"{type_name}{i}"
+        node = MockNode(self._hou, self, node_type, node_name)
+        for k, v in (parms or {}).items():
+            node._parms[k] = MockParm(node, k, v)
+        self._children.append(node)
+        self._fire("ChildCreated", child_node=node)
+        return node
+
+    def createNetworkBox(self, name, comment=""):
+        box = MockNetworkBox(self, name, comment)
+        self._boxes.append(box)
+        self._fire("NetworkBoxCreated", network_box=box)
+        return box
+
+    def destroy(self):
+        self._hou.calls += 1
+        self._fire("BeingDeleted")
+        parent = self._parent
+        for other in parent._children:
+            for idx, src in enumerate(other._inputs):
+                if src is self:
+                    other._inputs[idx] = None
+                    other._fire("InputRewired", input_index=idx)
+        parent._children.remove(self)
+        self._alive = False
+        parent._fire("ChildDeleted", child_node=self)
+        self._callbacks.clear()
+        del self._hou._by_sid[self._sid]
+
+    def setInput(self, idx, node):
+        self._hou.calls += 1
+        while len(self._inputs) <= idx:
+            self._inputs.append(None)
+        self._inputs[idx] = node
+        while self._inputs and self._inputs[-1] is None:
+            self._inputs.pop()
+        self._fire("InputRewired", input_index=idx)
+
+    def setName(self, name):
+        self._hou.calls += 1
+        self._name = name
+        self._fire("NameChanged")
+
+    def setDisplayFlag(self, on):
+        self._hou.calls += 1
+        if on:
+            for sib in self._parent._children:
+                if sib._display and sib is not self:
+                    sib._display = False
+                    sib._fire("FlagChanged")
+        self._display = bool(on)
+        self._fire("FlagChanged")
+
+    def setPosition(self, pos):
+        self._hou.calls += 1
+        self._pos = (float(pos[0]), float(pos[1]))
+        self._fire("PositionChanged")
+
+    def geometry(self):
+        self._hou.calls += 1
+        return self._geometry
+
+    def setGeometry(self, geo):
+        """替身专用：设置节点 cook 结果"""
+        self._geometry = geo
+
+    def setErrors(self, errors):
+        """替身专用：模拟 cook 后节点错误状态变化"""
+        self._errors = tuple(errors)
+        self._fire("AppearanceChanged")
+
+
+# ============================================================
+# 几何体
+# ============================================================
+
+class MockAttrib:
+    def __init__(self, hou, attrib_type, name, size, data_type):
+        self._hou = hou
+        self._type = attrib_type
+        self._name = name
+        self._size = size
+        self._data_type = data_type
+
+    def name(self):
+        return self._name
+
+    def size(self):
+        return self._size
+
+    def type(self):
+        return self._type
+
+    def dataType(self):
+        return self._data_type
+
+
+class MockPoint:
+    __slots__ = ("_geo", "_num")
+
+    def __init__(self, geo, num):
+        self._geo = geo
+        self._num = num
+
+    def number(self):
+        self._geo._hou.calls += 1
+        return self._num
+
+    def position(self):
+        self._geo._hou.calls += 1
+        i = self._num * 3
+        return tuple(self._geo._P[i:i + 3])
+
+    def attribValue(self, name):
+        return self._geo._element_value("point", name, self._num)
+
+
+class MockVertex:
+    __slots__ = ("_geo", "_pt")
+
+    def __init__(self, geo, pt):
+        self._geo = geo
+        self._pt = pt
+
+    def point(self):
+        self._geo._hou.calls += 1
+        return MockPoint(self._geo, self._pt)
+
+
+class MockPrim:
+    __slots__ = ("_geo", "_num")
+
+    def __init__(self, geo, num):
+        self._geo = geo
+        self._num = num
+
+    def number(self):
+        self._geo._hou.calls += 1
+        return self._num
+
+    def type(self):
+        self._geo._hou.calls += 1
+        return self._geo._hou.primType.Polygon
+
+    def numVertices(self):
+        self._geo._hou.calls += 1
+        return len(self._geo._prims[self._num])
+
+    def vertices(self):
+        self._geo._hou.calls += 1
+        return tuple(MockVertex(self._geo, pt) for pt in self._geo._prims[self._num])
+
+    def points(self):
+        self._geo._hou.calls += 1
+        return tuple(MockPoint(self._geo, pt) for pt in self._geo._prims[self._num])
+
+    def attribValue(self, name):
+        return self._geo._element_value("prim", name, self._num)
+
+
+class MockGeometry:
+    """多边形几何体替身：points 为 [(x, y, z)]，prims 为每个面的点编号列表
+
+    属性通过 add_attrib(cls, name, values) 添加，cls 为 "point" / "prim" / "global"，
+    values 为逐元素的值（标量或元组）。
+    """
+
+    def __init__(self, hou, points, prims, point_count=None):
+        self._hou = hou
+        self._P = array.array("f", [c for p in points for c in p])
+        self._point_count = len(self._P) // 3 if point_count is None else point_count
+        self._prims = [tuple(p) for p in prims]
+        self._attribs = {"point": {}, "prim": {}, "global": {}}
+        self._values = {"point": {}, "prim": {}, "global": {}}
+        self._attribs["point"]["P"] = MockAttrib(hou, hou.attribType.Point, "P", 3, hou.attribData.Float)
+
+    def add_attrib(self, cls, name, values):
+        first = values[0] if len(values) else 0.0
+        size = len(first) if isinstance(first, (tuple, list)) else 1
+        sample = first[0] if size > 1 else first
+        data_type = (self._hou.attribData.String if isinstance(sample, str)
+                     else self._hou.attribData.Int if isinstance(sample, int)
+                     else self._hou.attribData.Float)
+        attrib_type = {"point": self._hou.attribType.Point, "prim": self._hou.attribType.Prim,
+                       "global": self._hou.attribType.Global}[cls]
+        self._attribs[cls][name] = MockAttrib(self._hou, attrib_type, name, size, data_type)
+        self._values[cls][name] = list(values)
+
+    def add_attrib_buffer(self, cls, name, buffer, size=1):
+        """以展平的 numpy 数组（float32 / int32）提供属性值，用于大数据量基准"""
+        data_type = self._hou.attribData.Int if buffer.dtype.kind == "i" else self._hou.attribData.Float
+        attrib_type = {"point": self._hou.attribType.Point, "prim": self._hou.attribType.Prim}[cls]
+        self._attribs[cls][name] = MockAttrib(self._hou, attrib_type, name, size, data_type)
+        self._values[cls][name] = buffer
+
+    def _flat(self, cls, name):
+        if cls == "point" and name == "P":
+            return list(self._P)
+        vals = self._values[cls][name]
+        if hasattr(vals, "tolist"):
+            return vals.tolist()
+        if self._attribs[cls][name].size() == 1:
+            return list(vals)
+        return [c for v in vals for c in v]
+
+    def _element_value(self, cls, name, idx):
+        self._hou.calls += 1
+        if cls == "point" and name == "P":
+            return tuple(self._P[idx * 3:idx * 3 + 3])
+        return self._values[cls][name][idx]
+
+    # --- 信息 ---
+
+    def intrinsicValue(self, name):
+        self._hou.calls += 1
+        return {"pointcount": self._point_count,
+                "primitivecount": len(self._prims),
+                "vertexcount": sum(len(p) for p in self._prims)}[name]
+
+    def findPointAttrib(self, name):
+        self._hou.calls += 1
+        return self._attribs["point"].get(name)
+
+    def findPrimAttrib(self, name):
+        self._hou.calls += 1
+        return self._attribs["prim"].get(name)
+
+    def findGlobalAttrib(self, name):
+        self._hou.calls += 1
+        return self._attribs["global"].get(name)
+
+    def findVertexAttrib(self, name):
+        self._hou.calls += 1
+        return None
+
+    def pointAttribs(self):
+        self._hou.calls += 1
+        return tuple(self._attribs["point"].values())
+
+    def primAttribs(self):
+        self._hou.calls += 1
+        return tuple(self._attribs["prim"].values())
+
+    def vertexAttribs(self):
+        self._hou.calls += 1
+        return ()
+
+    def globalAttribs(self):
+        self._hou.calls += 1
+        return tuple(self._attribs["global"].values())
+
+    # --- 元素 ---
+
+    def iterPrims(self):
+        self._hou.calls += 1
+        return (MockPrim(self, i) for i in range(len(self._prims)))
+
+    def prims(self):
+        self._hou.calls += 1
+        return tuple(MockPrim(self, i) for i in range(len(self._prims)))
+
+    def points(self):
+        self._hou.calls += 1
+        return tuple(MockPoint(self, i) for i in range(self._point_count))
+
+    # --- 批量读取 ---
+
+    def vertexFloatAttribValues(self, name):
+        self._hou.calls += 1
+        return ()
+
+    def vertexIntAttribValues(self, name):
+        self._hou.calls += 1
+        return ()
+
+    def vertexStringAttribValues(self, name):
+        self._hou.calls += 1
+        return ()
+
+    def pointFloatAttribValues(self, name):
+        self._hou.calls += 1
+        return tuple(float(v) for v in self._flat("point", name))
+
+    def pointIntAttribValues(self, name):
+        self._hou.calls += 1
+        return tuple(int(v) for v in self._flat("point", name))
+
+    def pointStringAttribValues(self, name):
+        self._hou.calls += 1
+        return tuple(self._flat("point", name))
+
+    def primFloatAttribValues(self, name):
+        self._hou.calls += 1
+        return tuple(float(v) for v in self._flat("prim", name))
+
+    def primIntAttribValues(self, name):
+        self._hou.calls += 1
+        return tuple(int(v) for v in self._flat("prim", name))
+
+    def primStringAttribValues(self, name):
+        self._hou.calls += 1
+        return tuple(self._flat("prim", name))
+
+    def _raw(self, cls, name, typecode):
+        vals = self._values[cls].get(name)
+        if hasattr(vals, "tobytes"):
+            return vals.tobytes()
+        return array.array(typecode, self._flat(cls, name)).tobytes()
+
+    def pointFloatAttribValuesAsString(self, name):
+        """与 HOM 一致：float32 原始字节"""
+        self._hou.calls += 1
+        return self._raw("point", name, "f")
+
+    def primFloatAttribValuesAsString(self, name):
+        self._hou.calls += 1
+        return self._raw("prim", name, "f")
+
+    def pointIntAttribValuesAsString(self, name):
+        self._hou.calls += 1
+        return self._raw("point", name, "i")
+
+    def primIntAttribValuesAsString(self, name):
+        self._hou.calls += 1
+        return self._raw("prim", name, "i")
+
+
+class MockUndos:
+    """hou.undos 替身：统计 undo group 次数，可选模拟开关耗时（秒）"""
+
+    def __init__(self, cost: float = 0.0):
+        self.cost = cost
+        self.groups = 0
+        self.depth = 0
+
+    def _spend(self):
+        if self.cost:
+            end = time.perf_counter() + self.cost
+            while time.perf_counter() < end:
+                pass
+
+    def beginGroup(self, label=""):
+        self.groups += 1
+        self.depth += 1
+        self._spend()
+
+    def endGroup(self):
+        self.depth -= 1
+        self._spend()
+
+
+class MockHou:
+    """hou 模块替身"""
+
+    def __init__(self):
+        self.calls = 0
+        self._sids = itertools.count(1)
+        self._by_sid = {}
+        self._types = {}
+        self._hip_callbacks = []
+        self.undos = MockUndos()
+        self.nodeEventType = _Enum("hou.nodeEventType", NODE_EVENTS)
+        self.hipFileEventType = _Enum("hou.hipFileEventType", HIP_EVENTS)
+        self.attribType = _Enum("hou.attribType", ("Point", "Prim", "Vertex", "Global"))
+        self.attribData = _Enum("hou.attribData", ("Float", "Int", "String", "Dict"))
+        self.primType = _Enum("hou.primType", ("Polygon",))
+        self.hipFile = SimpleNamespace(
+            addEventCallback=self._hip_callbacks.append,
+            removeEventCallback=self._hip_callbacks.remove,
+        )
+        self._root = MockNode(self, None, MockNodeType(self, "root", "Manager"), "")
+        self._root.createNode("obj", "obj")
+
+    def register_type(self, name, category="Sop", description="", input_labels=()):
+        self._types[name] = MockNodeType(self, name, category, description, input_labels)
+
+    def nodeType(self, name):
+        if name not in self._types:
+            self.register_type(name)
+        return self._types[name]
+
+    def node(self, path):
+        self.calls += 1
+        cur = self._root
+        for part in [p for p in path.split("/") if p]:
+            cur = next((c for c in cur._children if c._name == part), None)
+            if cur is None:
+                return None
+        return cur
+
+    def geometry(self, points, prims):
+        """替身专用：构建多边形几何体（挂到节点上用 node.setGeometry）"""
+        return MockGeometry(self, points, prims)
+
+    def point_cloud(self, count):
+        """替身专用：count 个点、无面的几何体（不分配 P，只用于属性统计）"""
+        return MockGeometry(self, (), (), point_count=count)
+
+    def nodeBySessionId(self, sid):
+        self.calls += 1
+        return self._by_sid.get(sid)
+
+    def clear_hip(self):
+        """模拟 File > New：触发 hip 事件并清空场景"""
+        for cb in list(self._hip_callbacks):
+            cb(self.hipFileEventType.BeforeClear)
+        obj = self.node("/obj")
+        for child in list(obj._children):
+            child.destroy()
+        for cb in list(self._hip_callbacks):
+            cb(self.hipFileEventType.AfterClear)
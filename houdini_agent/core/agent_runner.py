@@ -5,10 +5,9 @@ Agent Runner — Agent 循环辅助：标题生成、确认模式、工具调度
 从 ai_tab.py 中拆分出的 Mixin，负责：
 - 自动 AI 标题生成
 - 确认模式拦截
-- 工具分类常量（Ask 模式白名单、后台安全工具、静默工具）
+- 工具分类常量（Ask 模式白名单、后台安全工具、可合并只读工具、静默工具）
 """
 
-import threading
 import queue
 from houdini_agent.qt_compat import QtWidgets, QtCore
 from ..ui.i18n import tr, get_language
@@ -50,6 +49,14 @@ class AgentRunnerMixin:
         'list_skills',         # 纯 Python 列表
     })
 
+    # 批量执行时可合并的只读工具：同一批次内参数相同、且两次之间只有本集合内的调用时只执行一次
+    _COALESCE_TOOLS = frozenset({
+        'get_network_structure', 'get_node_parameters', 'list_children',
+        'read_selection', 'search_node_types', 'semantic_search_nodes',
+        'find_nodes_by_param', 'check_errors', 'get_houdini_node_doc',
+        'get_node_inputs', 'get_node_positions', 'list_network_boxes',
+    })
+
     # 静默工具：不在执行列表 UI 中显示（AI 自行调用，用户无需感知）
     _SILENT_TOOLS = frozenset({
         'add_todo',
@@ -86,6 +93,7 @@ class AgentRunnerMixin:
         # PerfMon 性能分析（只读）
         'perf_start_profile',
         'perf_stop_and_report',
+        'perf_analyze_profile',
     })
 
     # ---------- 自动 AI 标题生成 ----------
@@ -121,7 +129,7 @@ class AgentRunnerMixin:
         
         sdata['_ai_title_generated'] = True  # 标记防止重复
         
-        # 后台线程异步生成标题
+        # 共享后台线程池中异步生成标题（不再每次新建线程）
         def _gen():
             try:
                 title = self._generate_short_title(first_user, first_assistant)
@@ -130,8 +138,7 @@ class AgentRunnerMixin:
             except Exception:
                 pass
         
-        t = threading.Thread(target=_gen, daemon=True)
-        t.start()
+        self.client.run_background(_gen)
 
     def _generate_short_title(self, user_msg: str, assistant_msg: str) -> str:
         """调用 LLM 生成 ≤10 字的对话标题"""
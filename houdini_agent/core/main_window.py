@@ -92,7 +92,7 @@ class MainWindow(QtWidgets.QMainWindow):
             has_sessions = False
             tab_count = 0
             if hasattr(self, 'ai_tab') and self.ai_tab:
-                has_sessions = self.ai_tab._save_all_sessions()
+                has_sessions = self.ai_tab._save_all_sessions(wait=True)
                 tab_count = self.ai_tab.session_tabs.count()
             
             workspace_data = {
@@ -157,10 +157,12 @@ class MainWindow(QtWidgets.QMainWindow):
             if self.ai_tab._restore_all_sessions():
                 return
             
+            # 旧版 cache_latest.json：恢复一次后由会话日志接管，不再保留
             cache_dir = self.ai_tab._cache_dir
             latest_cache = cache_dir / "cache_latest.json"
             if latest_cache.exists():
-                self.ai_tab._load_cache_silent(latest_cache)
+                if self.ai_tab._load_cache_silent(latest_cache):
+                    latest_cache.unlink()
         except Exception as e:
             print(f"[Workspace] Cache load failed: {str(e)}")
     
@@ -258,17 +258,14 @@ class SessionManagerMixin:
         # 移除标签和会话数据
         self.session_tabs.removeTab(tab_index)
         sdata = self._sessions.pop(session_id, None)
+        self._tool_caches.pop(session_id, None)
+        self.mcp.reset_python_session(session_id)
         if sdata and sdata.get('scroll_area'):
             self.session_stack.removeWidget(sdata['scroll_area'])
             sdata['scroll_area'].deleteLater()
         
-        # ★ 关闭 tab 后同步删除对应的磁盘 session 文件
-        try:
-            session_file = self._cache_dir / f"session_{session_id}.json"
-            if session_file.exists():
-                session_file.unlink()
-        except Exception:
-            pass
+        # ★ 关闭 tab 后同步删除对应的会话日志
+        self._session_log.delete(session_id)
         
         self._sync_tabs_backup()
         self._update_context_stats()
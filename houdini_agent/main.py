@@ -3,20 +3,40 @@ import sys
 import hou
 from houdini_agent.qt_compat import QtWidgets
 
-# 强制重新加载模块，避免缓存问题
-def _reload_modules():
+# 开发模式：每次 show_tool() 重新加载全部模块，修改代码后不用重启 Houdini
+# 设置环境变量 HOUDINI_AGENT_DEV_RELOAD=1 开启；默认不重载（重载会重新执行下面所有模块，打开面板变慢）
+def _dev_reload_enabled() -> bool:
+    return os.environ.get('HOUDINI_AGENT_DEV_RELOAD', '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _drop_legacy_modules():
     # ---- 清理旧包名残留（HOUDINI_HIP_MANAGER → houdini_agent 迁移） ----
     old_mods = [k for k in sys.modules if k.startswith('HOUDINI_HIP_MANAGER')]
     for k in old_mods:
         del sys.modules[k]
-    
+
+
+# 强制重新加载模块，避免缓存问题（仅开发模式）
+def _reload_modules():
     modules_to_reload = [
         'houdini_agent.qt_compat',  # ★ Qt 兼容层最先重载
         'houdini_agent.utils.token_optimizer',
         'houdini_agent.utils.ultra_optimizer',
         'houdini_agent.utils.training_data_exporter',
         'houdini_agent.utils.updater',
+        'houdini_agent.utils.tool_cache',
+        'houdini_agent.utils.tool_prefetch',
+        'houdini_agent.utils.tool_schedule',
+        'houdini_agent.utils.doc_corpus',
+        'houdini_agent.utils.perf_report',
+        'houdini_agent.utils.session_log',
+        'houdini_agent.utils.sse_stream',
+        'houdini_agent.utils.prompt_cache',
+        'houdini_agent.utils.async_transport',
+        'houdini_agent.utils.lazy_import',
         'houdini_agent.utils.ai_client',
+        'houdini_agent.utils.mcp.py_worker',
+        'houdini_agent.utils.mcp.shell_runner',
         'houdini_agent.utils.mcp.client',
         'houdini_agent.utils.mcp',
         'houdini_agent.ui.i18n',
@@ -46,15 +66,17 @@ _main_window = None
 def show_tool():
     global _main_window, MainWindow
     
-    # 每次调用时强制重新加载模块
-    _reload_modules()
-    
-    # ★ 重载后刷新 MainWindow 引用，避免使用旧类
-    try:
-        from houdini_agent.core.main_window import MainWindow as _MW
-        MainWindow = _MW
-    except Exception:
-        pass
+    _drop_legacy_modules()
+    # 开发模式下每次调用时强制重新加载模块
+    if _dev_reload_enabled():
+        _reload_modules()
+        
+        # ★ 重载后刷新 MainWindow 引用，避免使用旧类
+        try:
+            from houdini_agent.core.main_window import MainWindow as _MW
+            MainWindow = _MW
+        except Exception:
+            pass
     
     if not QtWidgets.QApplication.instance():
         app = QtWidgets.QApplication([])
@@ -1,8 +1,8 @@
 # -*- coding: utf-8 -*-
 """Cook 性能分析 Skill
 
-遍历网络中所有节点，收集 cook 时间、cook 次数、几何体大小等指标，
-识别瓶颈节点和几何体膨胀点，返回结构化分析报告。
+遍历网络中所有节点（默认递归进入子网络），收集 cook 时间、cook 次数、几何体大小等指标，
+识别瓶颈节点和几何体膨胀点，并汇总各子网络的 inclusive cook 时间，返回结构化分析报告。
 
 不依赖 hou.perfMon，直接使用 node.lastCookTime() 等 HOM API，
 适合快速诊断场景。
@@ -30,17 +30,23 @@ SKILL_INFO = {
             "description": "分析前是否强制重新 cook 以获取最新数据（默认 false）",
             "required": False,
         },
+        "recursive": {
+            "type": "boolean",
+            "description": "是否递归分析子网络中的节点（默认 true）",
+            "required": False,
+        },
     },
 }
 
 
-def run(network_path, top_n=10, force_cook=False):
+def run(network_path, top_n=10, force_cook=False, recursive=True):
     """分析网络 cook 性能
 
     Args:
         network_path: 网络路径
         top_n: 返回最慢的前 N 个节点
         force_cook: 是否强制 cook
+        recursive: 是否递归进入子网络
     """
     import hou  # type: ignore
 
@@ -77,8 +83,14 @@ def run(network_path, top_n=10, force_cook=False):
     # ---- 收集数据 ----
     node_data = []
     error_nodes = []
+    all_nodes = children
+    if recursive:
+        try:
+            all_nodes = network.allSubChildren()
+        except Exception:
+            pass
 
-    for node in children:
+    for node in all_nodes:
         info = {
             "name": node.name(),
             "type": node.type().name(),
@@ -143,10 +155,21 @@ def run(network_path, top_n=10, force_cook=False):
     total_cook_time = sum(n["cook_time_ms"] for n in node_data)
     slow_nodes = node_data[:top_n]
 
+    # ---- 子网络 inclusive 时间（所有子孙节点 cook 时间之和）----
+    subnet_times = {}
+    for n in node_data:
+        parent = n["path"].rsplit("/", 1)[0]
+        while len(parent) > len(network_path.rstrip("/")):
+            subnet_times[parent] = subnet_times.get(parent, 0.0) + n["cook_time_ms"]
+            parent = parent.rsplit("/", 1)[0]
+    slow_subnets = sorted(
+        ({"path": p, "inclusive_cook_time_ms": round(t, 3)} for p, t in subnet_times.items()),
+        key=lambda x: x["inclusive_cook_time_ms"], reverse=True)[:5]
+
     # ---- 检测几何体膨胀点 ----
     # 沿连接链追踪，找到输出点数远大于输入点数的节点
     geometry_growth = []
-    for node_obj in children:
+    for node_obj in all_nodes:
         try:
             inputs = node_obj.inputs()
             if not inputs:
@@ -231,6 +254,7 @@ def run(network_path, top_n=10, force_cook=False):
         "total_cook_time_ms": round(total_cook_time, 3),
         "bottleneck_count": sum(1 for n in node_data if n["cook_time_ms"] > 50),
         "slow_nodes": slow_nodes,
+        "slow_subnets": slow_subnets,
         "geometry_growth": geometry_growth[:5],
         "error_nodes": error_nodes,
         "time_dependent_count": sum(1 for n in node_data if n.get("time_dependent")),
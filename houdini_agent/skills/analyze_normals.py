@@ -8,6 +8,9 @@
   - ZERO_NORMAL   : 零向量法线（长度为 0）
   - NON_NORMALIZED: 未归一化（长度 ≠ 1）
   - FLIPPED_FACES : 翻转的面（相邻面法线方向相反）
+
+翻转面检测在 numpy 可用时整体向量化：批量读取 P / 面 N 与面-点拓扑，按共享边排序配对
+相邻面，一次算出全部点积，不再采样；无 numpy 时回退到逐面遍历（受 max_sample 限制）。
 """
 
 SKILL_INFO = {
@@ -34,7 +37,7 @@ SKILL_INFO = {
         },
         "max_sample": {
             "type": "integer",
-            "description": "最大采样数（默认 200000，超过时随机采样）",
+            "description": "最大采样数（默认 200000，点法线超过时随机采样；无 numpy 时同时限制翻转面检查量）",
             "required": False,
         },
     },
@@ -286,7 +289,8 @@ def run(node_path, tolerance=0.001, flip_angle_threshold=120.0, max_sample=20000
 
     # ---- 6. 翻转面检测 ----
     if prim_count > 0:
-        flipped_count = _check_flipped_faces(geo, prim_count, flip_angle_threshold, max_sample)
+        flipped_count, pairs_checked = _check_flipped_faces(geo, prim_count, flip_angle_threshold, max_sample)
+        stats["adjacent_pairs_checked"] = pairs_checked
         if flipped_count > 0:
             issues.append({
                 "type": "FLIPPED_FACES",
@@ -322,13 +326,104 @@ def run(node_path, tolerance=0.001, flip_angle_threshold=120.0, max_sample=20000
 
 
 def _check_flipped_faces(geo, prim_count, angle_threshold, max_check):
-    """检测翻转面：通过比较相邻面法线方向判断
+    """检测翻转面：比较相邻面法线夹角
 
-    构建简易邻接关系（基于共享边/点），比较相邻面法线夹角。
+    Returns:
+        (夹角超过阈值的相邻面对数, 检查的相邻面对数)
     """
     import math
 
     cos_threshold = math.cos(math.radians(angle_threshold))
+    try:
+        import numpy as np
+    except ImportError:
+        return _check_flipped_faces_py(geo, prim_count, cos_threshold, max_check)
+    return _check_flipped_faces_np(geo, cos_threshold, np)
+
+
+def _prim_topology(geo):
+    """面-点拓扑：(每个面的顶点数, 按面顺序展平的点编号)"""
+    counts = []
+    ptnums = []
+    for prim in geo.iterPrims():
+        nums = [pt.number() for pt in prim.points()]
+        counts.append(len(nums))
+        ptnums.extend(nums)
+    return counts, ptnums
+
+
+def _check_flipped_faces_np(geo, cos_threshold, np):
+    """向量化检测：共享边配对相邻面，全部点积一次算出（不采样）
+
+    面法线优先使用面属性 N，否则用 Newell 法由顶点位置计算（对凹多边形 / 非平面面同样稳定）。
+    相邻关系为共享边：每条半边以 (小点号, 大点号) 编码后排序，键相同的相邻半边即属于相邻两面。
+    """
+    counts, ptnums = _prim_topology(geo)
+    counts = np.asarray(counts, dtype=np.int64)
+    ptnums = np.asarray(ptnums, dtype=np.int64)
+    n_prims = len(counts)
+    if n_prims < 2 or len(ptnums) == 0:
+        return 0, 0
+
+    # 每个顶点所属的面，以及同一面内的下一个顶点（环绕回首顶点）
+    prim_of_vert = np.repeat(np.arange(n_prims, dtype=np.int64), counts)
+    starts = np.cumsum(counts) - counts
+    nonempty = counts > 0
+    nxt = np.arange(1, len(ptnums) + 1, dtype=np.int64)
+    nxt[(starts + counts - 1)[nonempty]] = starts[nonempty]
+    next_pts = ptnums[nxt]
+
+    # ---- 面法线 ----
+    if geo.findPrimAttrib("N") is not None:
+        normals = np.frombuffer(geo.primFloatAttribValuesAsString("N"), dtype=np.float32)
+        normals = normals.reshape((-1, 3)).astype(np.float64)
+    else:
+        positions = np.frombuffer(geo.pointFloatAttribValuesAsString("P"), dtype=np.float32)
+        positions = positions.reshape((-1, 3)).astype(np.float64)
+        cur = positions[ptnums]
+        nx = positions[next_pts]
+        # Newell: N = Σ (y_i - y_j)(z_i + z_j), (z_i - z_j)(x_i + x_j), (x_i - x_j)(y_i + y_j)
+        terms = (
+            (cur[:, 1] - nx[:, 1]) * (cur[:, 2] + nx[:, 2]),
+            (cur[:, 2] - nx[:, 2]) * (cur[:, 0] + nx[:, 0]),
+            (cur[:, 0] - nx[:, 0]) * (cur[:, 1] + nx[:, 1]),
+        )
+        normals = np.stack([np.bincount(prim_of_vert, weights=t, minlength=n_prims) for t in terms], axis=1)
+
+    lengths = np.linalg.norm(normals, axis=1)
+    usable = np.isfinite(lengths) & (lengths >= 1e-10) & (counts >= 3)
+    normals = normals / np.where(usable, lengths, 1.0)[:, None]
+
+    # ---- 共享边配对 ----
+    lo = np.minimum(ptnums, next_pts)
+    hi = np.maximum(ptnums, next_pts)
+    edge_ok = (lo != hi) & usable[prim_of_vert]
+    keys = lo[edge_ok] * (int(hi.max()) + 1) + hi[edge_ok]
+    owners = prim_of_vert[edge_ok]
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    owners = owners[order]
+    same = keys[1:] == keys[:-1]
+    pa = owners[:-1][same]
+    pb = owners[1:][same]
+    distinct = pa != pb
+    pa, pb = pa[distinct], pb[distinct]
+    if len(pa) == 0:
+        return 0, 0
+
+    # 两个面共享多条边时只计一次
+    pair_keys = np.unique(np.minimum(pa, pb) * n_prims + np.maximum(pa, pb))
+    pa = pair_keys // n_prims
+    pb = pair_keys % n_prims
+
+    dots = np.einsum("ij,ij->i", normals[pa], normals[pb])
+    return int((dots < cos_threshold).sum()), len(pair_keys)
+
+
+def _check_flipped_faces_py(geo, prim_count, cos_threshold, max_check):
+    """纯 Python 回退：基于共享点的邻接，检查量受 max_check 限制"""
+    import math
+
     flipped = 0
 
     # 构建 prim -> normal 映射（使用面中心法线或 prim N）
@@ -402,4 +497,4 @@ def _check_flipped_faces(geo, prim_count, angle_threshold, max_check):
         if len(checked_pairs) > max_check:
             break
 
-    return flipped
+    return flipped, len(checked_pairs)
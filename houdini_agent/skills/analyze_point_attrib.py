@@ -2,14 +2,24 @@
 """通用几何属性分析 Skill
 
 分析 Houdini 节点几何体的属性统计信息，支持 point/vertex/prim/detail 四种属性类别。
-不指定属性名时返回属性列表，指定时返回统计信息（min/max/mean/std/nan/inf）。
+不指定属性名时返回属性列表，指定时返回统计信息（min/max/mean/std/nan/inf/分位数/直方图）。
+
+数值属性按固定大小的分块流式统计，不再随机采样：
+  - 优先用 *AttribValuesAsString 取得 float32/int32 原始字节，np.frombuffer 零拷贝读取，
+    不生成逐元素的 Python 元组；取不到时回退到元组读取
+  - 每块转为 float64 后按 Chan/Welford 合并 count/mean/M2，同时累计 min/max 与 NaN/Inf 计数，
+    额外内存只与分块大小有关
+  - 分位数：先在 [min, max] 上做 4096 桶直方图；exact 模式下对目标秩所在的桶逐级细分，
+    桶内元素足够少时取出排序，得到与 np.quantile 一致的精确值；approx 模式直接在桶内插值
+  - 向量属性（如 P、N、Cd）逐分量给出 NaN/Inf 与直方图
 """
 
 SKILL_INFO = {
     "name": "analyze_geometry_attribs",
     "description": (
         "分析节点几何体属性。支持 point/vertex/prim/detail 四种类别。"
-        "不传 attrib_name 时返回属性列表；传入时返回统计信息（min/max/mean/std/nan/inf）。"
+        "不传 attrib_name 时返回属性列表；传入时返回全量统计信息（min/max/mean/std/nan/inf、"
+        "分位数 p1~p99、直方图，向量属性逐分量给出）。"
     ),
     "parameters": {
         "node_path": {
@@ -27,23 +37,33 @@ SKILL_INFO = {
             "description": "属性类别: point, vertex, prim, detail（默认 point）",
             "required": False,
         },
-        "max_sample": {
-            "type": "integer",
-            "description": "最大采样数（默认 100000，超过时随机采样）",
+        "mode": {
+            "type": "string",
+            "description": "分位数模式: exact（默认，精确值）或 approx（直方图插值，少一次遍历）",
             "required": False,
         },
     },
 }
 
+# 每块元素数（向量属性按 元素数 / 分量数 取行），决定流式统计的额外内存
+_CHUNK = 1 << 18
+# 分位数直方图桶数 / exact 模式下直接排序的桶内元素上限
+_HIST_BINS = 4096
+_EXACT_CAP = 1 << 16
+# 返回给模型的直方图桶数
+_OUTPUT_BINS = 16
+_QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
 
-def run(node_path, attrib_name=None, attrib_class="point", max_sample=100000):
+
+def run(node_path, attrib_name=None, attrib_class="point", mode="exact", max_sample=None):
     """入口函数
 
     Args:
         node_path: 节点路径
         attrib_name: 属性名（None 则返回属性列表）
         attrib_class: 属性类别 - point/vertex/prim/detail
-        max_sample: 最大采样数
+        mode: 分位数模式 - exact/approx
+        max_sample: 兼容旧参数，已不再采样
     """
     import hou  # type: ignore
     import numpy as np
@@ -90,6 +110,8 @@ def run(node_path, attrib_name=None, attrib_class="point", max_sample=100000):
 
     if attrib_class not in attrib_map:
         return {"error": f"无效的属性类别: {attrib_class}，可选: point, vertex, prim, detail"}
+    if mode not in ("exact", "approx"):
+        return {"error": f"无效的模式: {mode}，可选: exact, approx"}
 
     find_func, float_func, int_func, str_func, elem_count = attrib_map[attrib_class]
 
@@ -154,9 +176,9 @@ def run(node_path, attrib_name=None, attrib_class="point", max_sample=100000):
 
     # 获取属性值
     if data_type == "Float":
-        vals = np.array(float_func(attrib_name))
+        vals = _read_numeric(geo, attrib_class, "Float", attrib_name, float_func, np)
     elif data_type == "Int":
-        vals = np.array(int_func(attrib_name))
+        vals = _read_numeric(geo, attrib_class, "Int", attrib_name, int_func, np)
     else:  # String
         vals = str_func(attrib_name)
         unique = list(set(vals))
@@ -169,36 +191,287 @@ def run(node_path, attrib_name=None, attrib_class="point", max_sample=100000):
             "unique_values": unique[:20],
         }
 
-    # 重塑多维属性
-    if size > 1:
-        vals = vals.reshape((-1, size))
+    # 重塑多维属性（视图，不复制）
+    vals = vals.reshape((-1, size))
+    n = vals.shape[0]
+
+    stats = _StreamingStats(size, np)
+    for chunk in _row_chunks(vals, np):
+        stats.update(chunk)
 
-    # 采样（大数据量时）
-    max_sample = min(int(max_sample), 500000)
-    n = len(vals) if vals.ndim == 1 else vals.shape[0]
-    sampled = False
-    if n > max_sample:
-        idx = np.random.choice(n, max_sample, replace=False)
-        vals = vals[idx] if vals.ndim == 1 else vals[idx, :]
-        sampled = True
+    def _out(values):
+        # 标量属性返回单值，向量属性返回逐分量列表
+        return values if size > 1 else values[0]
 
-    # 返回统计信息
     result = {
         "node_path": node_path,
         "name": attrib_name,
         "type": data_type,
         "size": size,
         "count": int(n),
-        "sampled": sampled,
-        "min": vals.min(axis=0).tolist() if size > 1 else float(vals.min()),
-        "max": vals.max(axis=0).tolist() if size > 1 else float(vals.max()),
-        "mean": vals.mean(axis=0).tolist() if size > 1 else float(vals.mean()),
-        "std": vals.std(axis=0).tolist() if size > 1 else float(vals.std()),
+        "mode": mode,
+        "min": _out(stats.min_list()),
+        "max": _out(stats.max_list()),
+        "mean": _out(stats.mean_list()),
+        "std": _out(stats.std_list()),
     }
 
     # NaN/Inf 检测（仅 float）
     if data_type == "Float":
-        result["nan_count"] = int(np.isnan(vals).sum())
-        result["inf_count"] = int(np.isinf(vals).sum())
+        result["nan_count"] = int(stats.nan.sum())
+        result["inf_count"] = int(stats.inf.sum())
+
+    # 分位数与直方图（逐分量）
+    per_component = []
+    for c in range(size):
+        hist = None
+        quantiles = [None] * len(_QUANTILES)
+        if stats.count[c]:
+            lo, hi = float(stats.min[c]), float(stats.max[c])
+            hist = _histogram(vals, c, lo, hi, np)
+            quantiles = _quantiles(vals, c, lo, hi, int(stats.count[c]), hist, mode == "exact", np)
+        per_component.append((hist, quantiles))
+
+    result["quantiles"] = {
+        f"p{int(q * 100)}": _out([qs[i] for _, qs in per_component])
+        for i, q in enumerate(_QUANTILES)
+    }
+    if size == 1:
+        result["histogram"] = _coarse_histogram(stats.min[0], stats.max[0], per_component[0][0])
+    else:
+        result["components"] = [
+            {
+                "component": c,
+                "nan_count": int(stats.nan[c]),
+                "inf_count": int(stats.inf[c]),
+                "histogram": _coarse_histogram(stats.min[c], stats.max[c], per_component[c][0]),
+            }
+            for c in range(size)
+        ]
 
     return result
+
+
+# ============================================================
+# 读取
+# ============================================================
+
+def _read_numeric(geo, attrib_class, data_type, attrib_name, tuple_func, np):
+    """读取数值属性为一维数组
+
+    优先 <class><Float|Int>AttribValuesAsString：HOM 返回 float32 / int32 原始字节，
+    np.frombuffer 直接作为只读视图使用；没有该接口时退回元组读取。
+    """
+    getter = getattr(geo, f"{attrib_class}{data_type}AttribValuesAsString", None)
+    if getter is not None:
+        try:
+            raw = getter(attrib_name)
+            return np.frombuffer(raw, dtype=np.float32 if data_type == "Float" else np.int32)
+        except Exception:
+            pass
+    return np.asarray(tuple_func(attrib_name), dtype=np.float64 if data_type == "Float" else np.int64)
+
+
+def _row_chunks(vals, np):
+    """按约 _CHUNK 个元素切块，每块转为 float64（只占一块的临时内存）"""
+    rows = max(1, _CHUNK // vals.shape[1])
+    for start in range(0, vals.shape[0], rows):
+        yield vals[start:start + rows].astype(np.float64)
+
+
+def _column_chunks(vals, comp, np):
+    """单个分量的 float64 分块"""
+    for start in range(0, vals.shape[0], _CHUNK):
+        yield vals[start:start + _CHUNK, comp].astype(np.float64)
+
+
+# ============================================================
+# 流式统计
+# ============================================================
+
+class _StreamingStats:
+    """逐分量的流式统计：有限值的 count/min/max/mean/M2（Chan 分块合并），以及 NaN/Inf 计数"""
+
+    def __init__(self, size, np):
+        self._np = np
+        self.count = np.zeros(size, dtype=np.int64)
+        self.mean = np.zeros(size)
+        self.m2 = np.zeros(size)
+        self.min = np.full(size, np.inf)
+        self.max = np.full(size, -np.inf)
+        self.nan = np.zeros(size, dtype=np.int64)
+        self.inf = np.zeros(size, dtype=np.int64)
+
+    def update(self, chunk):
+        np = self._np
+        finite = np.isfinite(chunk)
+        if finite.all():
+            nb = np.full(chunk.shape[1], chunk.shape[0], dtype=np.int64)
+            self.min = np.minimum(self.min, chunk.min(axis=0))
+            self.max = np.maximum(self.max, chunk.max(axis=0))
+            mean_b = chunk.sum(axis=0) / chunk.shape[0]
+            chunk -= mean_b
+            m2_b = np.einsum("ij,ij->j", chunk, chunk)
+        else:
+            nan = np.isnan(chunk)
+            self.nan += nan.sum(axis=0)
+            self.inf += (~finite & ~nan).sum(axis=0)
+            nb = finite.sum(axis=0)
+            if not nb.any():
+                return
+            self.min = np.minimum(self.min, np.where(finite, chunk, np.inf).min(axis=0))
+            self.max = np.maximum(self.max, np.where(finite, chunk, -np.inf).max(axis=0))
+            mean_b = np.where(finite, chunk, 0.0).sum(axis=0) / np.maximum(nb, 1)
+            dev = np.where(finite, chunk - mean_b, 0.0)
+            m2_b = np.einsum("ij,ij->j", dev, dev)
+
+        na = self.count
+        total = na + nb
+        safe_total = np.maximum(total, 1)
+        delta = mean_b - self.mean
+        self.mean = self.mean + delta * nb / safe_total
+        self.m2 = self.m2 + m2_b + delta * delta * na * nb / safe_total
+        self.count = total
+
+    def min_list(self):
+        return [float(v) if c else None for v, c in zip(self.min, self.count)]
+
+    def max_list(self):
+        return [float(v) if c else None for v, c in zip(self.max, self.count)]
+
+    def mean_list(self):
+        return [float(v) if c else None for v, c in zip(self.mean, self.count)]
+
+    def std_list(self):
+        np = self._np
+        return [float(np.sqrt(m2 / c)) if c else None for m2, c in zip(self.m2, self.count)]
+
+
+# ============================================================
+# 直方图与分位数
+# ============================================================
+
+def _edges(lo, hi, np):
+    return np.linspace(lo, hi, _HIST_BINS + 1)
+
+
+def _histogram(vals, comp, lo, hi, np):
+    """[lo, hi] 内有限值的 _HIST_BINS 桶计数；lo == hi 时返回 None
+
+    NaN / Inf 不落在区间内，自然被排除。
+    """
+    if lo == hi:
+        return None
+    counts = np.zeros(_HIST_BINS, dtype=np.int64)
+    for chunk in _column_chunks(vals, comp, np):
+        counts += np.bincount(_bin_index(chunk[(chunk >= lo) & (chunk <= hi)], lo, hi, np),
+                              minlength=_HIST_BINS)
+    return counts
+
+
+def _bin_index(values, lo, hi, np):
+    """桶号 floor((x - lo) * 桶数 / (hi - lo))，hi 归入最后一个桶
+
+    该映射对 x 单调不减，因此每个桶内的元素恰好是其实际 [最小值, 最大值] 区间内的全部元素，
+    exact 模式细分大桶时可直接按值域筛选。
+    """
+    idx = ((values - lo) * (_HIST_BINS / (hi - lo))).astype(np.int64)
+    np.clip(idx, 0, _HIST_BINS - 1, out=idx)
+    return idx
+
+
+def _coarse_histogram(lo, hi, counts):
+    """把细直方图合并为 _OUTPUT_BINS 桶，供模型阅读"""
+    if counts is None:
+        if lo > hi:  # 没有有限值
+            return None
+        return {"edges": [float(lo), float(hi)], "counts": None}
+    group = _HIST_BINS // _OUTPUT_BINS
+    step = (float(hi) - float(lo)) / _OUTPUT_BINS
+    return {
+        "edges": [float(lo) + step * i for i in range(_OUTPUT_BINS)] + [float(hi)],
+        "counts": counts.reshape((_OUTPUT_BINS, group)).sum(axis=1).tolist(),
+    }
+
+
+def _quantiles(vals, comp, lo, hi, total, counts, exact, np):
+    """按 np.quantile 默认的线性插值规则计算 _QUANTILES"""
+    if counts is None:  # 所有有限值相等
+        return [lo] * len(_QUANTILES)
+    positions = [q * (total - 1) for q in _QUANTILES]
+    ranks = sorted({int(p) for p in positions} | {min(int(p) + 1, total - 1) for p in positions})
+    if exact:
+        found = _select_ranks(vals, comp, lo, hi, 0, counts, ranks, np)
+    else:
+        found = _interpolate_ranks(lo, hi, counts, ranks, np)
+    result = []
+    for p in positions:
+        a = found[int(p)]
+        b = found[min(int(p) + 1, total - 1)]
+        result.append(float(a + (b - a) * (p - int(p))))
+    return result
+
+
+def _interpolate_ranks(lo, hi, counts, ranks, np):
+    """approx：假设桶内均匀分布，误差不超过一个桶宽 (max-min)/_HIST_BINS"""
+    edges = _edges(lo, hi, np)
+    cum = np.cumsum(counts)
+    found = {}
+    for r in ranks:
+        k = int(np.searchsorted(cum, r, side="right"))
+        before = int(cum[k - 1]) if k else 0
+        frac = (r - before + 0.5) / max(int(counts[k]), 1)
+        found[r] = float(edges[k] + (edges[k + 1] - edges[k]) * min(frac, 1.0))
+    return found
+
+
+def _select_ranks(vals, comp, lo, hi, base, counts, ranks, np):
+    """exact：在 [lo, hi] 内找到全局秩 ranks（有限值升序，0 起）对应的值
+
+    base 为小于 lo 的有限值个数，counts 为该区间的 _HIST_BINS 桶计数。
+    目标桶内元素不超过 _EXACT_CAP 时一次遍历取出排序；更大的桶（大量重复值或
+    极度集中）先求桶内实际范围，再在其中做下一级直方图。
+    """
+    cum = np.cumsum(counts)
+    by_bin = {}
+    for r in ranks:
+        k = int(np.searchsorted(cum, r - base, side="right"))
+        by_bin.setdefault(k, []).append(r)
+
+    def _offset(k):
+        return base + (int(cum[k - 1]) if k else 0)
+
+    found = {}
+    small = np.array(sorted(k for k in by_bin if counts[k] <= _EXACT_CAP), dtype=np.int64)
+    if len(small):
+        picked_vals, picked_bins = [], []
+        for chunk in _column_chunks(vals, comp, np):
+            chunk = chunk[(chunk >= lo) & (chunk <= hi)]
+            idx = _bin_index(chunk, lo, hi, np)
+            sel = np.isin(idx, small)
+            picked_vals.append(chunk[sel])
+            picked_bins.append(idx[sel])
+        picked_vals = np.concatenate(picked_vals)
+        picked_bins = np.concatenate(picked_bins)
+        for k in small.tolist():
+            values = np.sort(picked_vals[picked_bins == k])
+            for r in by_bin[k]:
+                found[r] = float(values[r - _offset(k)])
+
+    for k, bin_ranks in by_bin.items():
+        if counts[k] <= _EXACT_CAP:
+            continue
+        inner_lo, inner_hi = np.inf, -np.inf
+        for chunk in _column_chunks(vals, comp, np):
+            chunk = chunk[(chunk >= lo) & (chunk <= hi)]
+            sel = chunk[_bin_index(chunk, lo, hi, np) == k]
+            if len(sel):
+                inner_lo = min(inner_lo, float(sel.min()))
+                inner_hi = max(inner_hi, float(sel.max()))
+        if inner_lo == inner_hi:
+            for r in bin_ranks:
+                found[r] = inner_lo
+            continue
+        sub_counts = _histogram(vals, comp, inner_lo, inner_hi, np)
+        found.update(_select_ranks(vals, comp, inner_lo, inner_hi, _offset(k), sub_counts, bin_ranks, np))
+    return found
@@ -3,6 +3,9 @@
 
 分析几何体有多少个独立的连通部分，每部分的点数/面数。
 优先使用已有的 class 属性（connectivity 节点生成），否则用并查集算法计算。
+
+numpy 可用时整体向量化：一次遍历取得面-点拓扑后，用数组并查集标记分量，各分量的点数 /
+面数由 bincount 统计；class 属性路径用一次 np.unique 计数。无 numpy 时回退到纯 Python。
 """
 
 SKILL_INFO = {
@@ -22,49 +25,102 @@ SKILL_INFO = {
 }
 
 
+def _prim_topology(geo):
+    """面-点拓扑：(每个面的顶点数, 按面顺序展平的点编号)，一次遍历
+
+    存为 int32 的 array.array（每项 4 字节，numpy 可零拷贝读取），
+    百万级顶点时远小于 Python int 列表。
+    """
+    from array import array
+
+    counts = array("i")
+    ptnums = array("i")
+    for prim in geo.iterPrims():
+        nums = [pt.number() for pt in prim.points()]
+        counts.append(len(nums))
+        ptnums.extend(nums)
+    return counts, ptnums
+
+
 def _analyze_with_class(geo, class_attrib):
     """使用已有的 class 属性分析"""
     import hou  # type: ignore
 
     is_prim = (class_attrib.type() == hou.attribType.Prim)
+    is_int = (class_attrib.dataType() == hou.attribData.Int)
 
-    if is_prim:
-        classes = geo.primIntAttribValues("class") if class_attrib.dataType() == hou.attribData.Int else geo.primFloatAttribValues("class")
+    try:
+        import numpy as np
+    except ImportError:
+        components, total = _class_components_py(geo, is_prim, is_int)
     else:
-        classes = geo.pointIntAttribValues("class") if class_attrib.dataType() == hou.attribData.Int else geo.pointFloatAttribValues("class")
-
-    unique_classes = sorted(set(classes))
-    components = []
-
-    for c in unique_classes:
-        if is_prim:
-            prim_count = sum(1 for v in classes if v == c)
-            # 通过 prim 的顶点获取关联的点
-            point_set = set()
-            for prim in geo.iterPrims():
-                if prim.attribValue("class") == c:
-                    for v in prim.vertices():
-                        point_set.add(v.point().number())
-            point_count = len(point_set)
-        else:
-            point_count = sum(1 for v in classes if v == c)
-            prim_count = 0
-
-        components.append({
-            "id": c,
-            "point_count": point_count,
-            "prim_count": prim_count,
-        })
+        components, total = _class_components_np(geo, is_prim, is_int, np)
 
     return {
         "method": "class_attribute",
-        "total_components": len(unique_classes),
+        "total_components": total,
         "total_points": geo.intrinsicValue("pointcount"),
         "total_prims": geo.intrinsicValue("primitivecount"),
         "components": components[:20],
     }
 
 
+def _class_components_np(geo, is_prim, is_int, np):
+    """向量化：一次 np.unique 得到各 class 的元素数；面 class 的点数由 (class, 点) 去重后 bincount"""
+    if is_prim:
+        raw = geo.primIntAttribValuesAsString("class") if is_int else geo.primFloatAttribValuesAsString("class")
+    else:
+        raw = geo.pointIntAttribValuesAsString("class") if is_int else geo.pointFloatAttribValuesAsString("class")
+    classes = np.frombuffer(raw, dtype=np.int32 if is_int else np.float32)
+
+    ids, inverse, counts = np.unique(classes, return_inverse=True, return_counts=True)
+    if is_prim:
+        prim_counts = counts
+        # 面的 class 展开到顶点，同一点在同一 class 中只计一次
+        vcounts, ptnums = _prim_topology(geo)
+        vert_class = np.repeat(inverse, np.frombuffer(vcounts, dtype=np.int32))
+        ptnums = np.frombuffer(ptnums, dtype=np.int32).astype(np.int64)
+        stride = int(ptnums.max(initial=0)) + 1
+        pairs = np.unique(vert_class * stride + ptnums)
+        point_counts = np.bincount(pairs // stride, minlength=len(ids))
+    else:
+        point_counts = counts
+        prim_counts = np.zeros(len(ids), dtype=np.int64)
+
+    components = [
+        {"id": c, "point_count": int(pc), "prim_count": int(fc)}
+        for c, pc, fc in zip(ids[:20].tolist(), point_counts[:20], prim_counts[:20])
+    ]
+    return components, len(ids)
+
+
+def _class_components_py(geo, is_prim, is_int):
+    """纯 Python 回退：单次遍历统计各 class 的点数 / 面数"""
+    if is_prim:
+        classes = geo.primIntAttribValues("class") if is_int else geo.primFloatAttribValues("class")
+        prim_counts = {}
+        point_sets = {}
+        for c, prim in zip(classes, geo.iterPrims()):
+            prim_counts[c] = prim_counts.get(c, 0) + 1
+            point_set = point_sets.setdefault(c, set())
+            for pt in prim.points():
+                point_set.add(pt.number())
+        point_counts = {c: len(pts) for c, pts in point_sets.items()}
+    else:
+        classes = geo.pointIntAttribValues("class") if is_int else geo.pointFloatAttribValues("class")
+        point_counts = {}
+        for c in classes:
+            point_counts[c] = point_counts.get(c, 0) + 1
+        prim_counts = {}
+
+    unique_classes = sorted(point_counts)
+    components = [
+        {"id": c, "point_count": point_counts[c], "prim_count": prim_counts.get(c, 0)}
+        for c in unique_classes[:20]
+    ]
+    return components, len(unique_classes)
+
+
 def _analyze_with_union_find(geo):
     """使用并查集算法计算连通性"""
     n = geo.intrinsicValue("pointcount")
@@ -73,7 +129,82 @@ def _analyze_with_union_find(geo):
     if n == 0:
         return {"error": "几何体没有点"}
 
-    # 并查集
+    counts, ptnums = _prim_topology(geo)
+    try:
+        import numpy as np
+    except ImportError:
+        point_counts, prim_counts = _components_py(n, counts, ptnums)
+    else:
+        point_counts, prim_counts = _components_np(n, counts, ptnums, np)
+
+    # 整理结果（按点数降序，点数相同时按分量内最小点号）
+    components = []
+    for pc, fc in zip(point_counts, prim_counts):
+        components.append({
+            "point_count": pc,
+            "prim_count": fc,
+            "point_ratio": round(pc / n * 100, 2),
+        })
+
+    return {
+        "method": "union_find",
+        "total_components": len(components),
+        "total_points": n,
+        "total_prims": num_prims,
+        "components": components[:20],
+    }
+
+
+def _components_np(n, counts, ptnums, np):
+    """数组并查集：挂接 + 指针跳跃，各分量点数 / 面数由 bincount 得出
+
+    每个面把其余顶点连到首顶点。每轮将每条边两端的根中较大者挂到较小者上
+    （np.minimum.at），再反复 labels = labels[labels] 压缩到根；最终每个分量的
+    根为其最小点号，轮数约为 O(log 直径)。
+
+    Returns:
+        (点数列表, 面数列表)，按点数降序
+    """
+    counts = np.frombuffer(counts, dtype=np.int32)
+    ptnums = np.frombuffer(ptnums, dtype=np.int32)
+
+    nonempty = counts > 0
+    starts = np.cumsum(counts) - counts
+    first_pts = ptnums[starts[nonempty]]
+    a = np.repeat(first_pts, counts[nonempty])
+    b = ptnums
+    keep = a != b
+    a, b = a[keep], b[keep]
+
+    labels = np.arange(n, dtype=np.int32)
+    while len(a):
+        la, lb = labels[a], labels[b]
+        lo = np.minimum(la, lb)
+        hi = np.maximum(la, lb)
+        diff = lo != hi
+        if not diff.any():
+            break
+        np.minimum.at(labels, hi[diff], lo[diff])
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        # 已在同一分量的边不再参与下一轮
+        a, b = a[diff], b[diff]
+
+    # 以根（分量最小点号）为桶直接计数，根按点号升序
+    point_counts = np.bincount(labels, minlength=n)
+    roots = np.flatnonzero(point_counts)
+    point_counts = point_counts[roots]
+    prim_counts = np.bincount(labels[first_pts], minlength=n)[roots]
+
+    order = np.argsort(-point_counts, kind="stable")
+    return point_counts[order].tolist(), prim_counts[order].tolist()
+
+
+def _components_py(n, counts, ptnums):
+    """纯 Python 回退：路径压缩并查集，只累计计数，不保存逐点列表"""
     parent = list(range(n))
 
     def find(x):
@@ -84,51 +215,34 @@ def _analyze_with_union_find(geo):
             parent[x], x = root, parent[x]
         return root
 
-    def union(x, y):
-        px, py = find(x), find(y)
-        if px != py:
-            parent[px] = py
-
-    # 通过面的顶点建立连接
-    for prim in geo.iterPrims():
-        pt_nums = [v.point().number() for v in prim.vertices()]
-        if len(pt_nums) > 1:
-            for i in range(1, len(pt_nums)):
-                union(pt_nums[0], pt_nums[i])
+    first_pts = []
+    offset = 0
+    for count in counts:
+        if count:
+            first = ptnums[offset]
+            first_pts.append(first)
+            rf = find(first)
+            for pt in ptnums[offset + 1:offset + count]:
+                rp = find(pt)
+                if rp != rf:
+                    # 挂到较小的根上，与向量化实现的分量顺序一致
+                    if rp < rf:
+                        parent[rf] = rp
+                        rf = rp
+                    else:
+                        parent[rp] = rf
+        offset += count
 
-    # 统计连通分量
-    comp_points = {}
+    point_counts = {}
     for i in range(n):
         root = find(i)
-        if root not in comp_points:
-            comp_points[root] = []
-        comp_points[root].append(i)
-
-    # 统计每个分量的面数
-    comp_prims = {root: set() for root in comp_points}
-    for prim in geo.iterPrims():
-        verts = list(prim.vertices())
-        if verts:
-            pt_num = verts[0].point().number()
-            root = find(pt_num)
-            comp_prims[root].add(prim.number())
-
-    # 整理结果（按点数降序）
-    components = []
-    for root in sorted(comp_points.keys(), key=lambda r: -len(comp_points[r])):
-        components.append({
-            "point_count": len(comp_points[root]),
-            "prim_count": len(comp_prims[root]),
-            "point_ratio": round(len(comp_points[root]) / n * 100, 2),
-        })
+        point_counts[root] = point_counts.get(root, 0) + 1
+    prim_counts = dict.fromkeys(point_counts, 0)
+    for pt in first_pts:
+        prim_counts[find(pt)] += 1
 
-    return {
-        "method": "union_find",
-        "total_components": len(components),
-        "total_points": n,
-        "total_prims": num_prims,
-        "components": components[:20],
-    }
+    roots = sorted(point_counts, key=lambda r: -point_counts[r])
+    return [point_counts[r] for r in roots], [prim_counts[r] for r in roots]
 
 
 def run(node_path):
@@ -27,10 +27,14 @@ from houdini_agent.qt_compat import QtWidgets, QtCore, QtGui, QSettings, invoke_
 from .i18n import tr, get_language
 from ..utils.ai_client import AIClient, HOUDINI_TOOLS
 from ..utils.mcp import HoudiniMCP
+from ..utils.mcp.cache_store import get_cache_registry
+from ..utils.tool_cache import ToolResultCache
+from ..utils.session_log import SessionLogStore, read_session_file
 from ..utils.token_optimizer import TokenOptimizer, TokenBudget, CompressionStrategy
+from ..utils.token_accounting import ContextLedger, tools_json
+from ..utils.prompt_cache import EXTRAS_FIELD, expand_extras, plan_block_trim, split_rounds
 from ..utils.ultra_optimizer import UltraOptimizer
 from .theme_engine import ThemeEngine
-from .font_settings_dialog import FontSettingsDialog
 from .cursor_widgets import (
     CursorTheme,
     UserMessage,
@@ -56,11 +60,22 @@ import re
 # Mixin 模块（从 ai_tab.py 拆分出的子模块）
 from .header import HeaderMixin
 from .input_area import InputAreaMixin
-from .chat_view import ChatViewMixin
+from .chat_view import ChatViewMixin, text_rows
 from ..core.agent_runner import AgentRunnerMixin
 from ..core.session_manager import SessionManagerMixin
 
 
+class _ToolBatch:
+    """一次主线程批量调度：后台线程逐个从 results 取结果，超时后置 cancelled 让主线程跳过剩余调用"""
+    __slots__ = ("calls", "results", "cancelled", "coalesced")
+
+    def __init__(self, calls: list):
+        self.calls = calls                      # [(tool_name, kwargs)]
+        self.results: queue.Queue = queue.Queue()
+        self.cancelled = threading.Event()
+        self.coalesced = 0                      # 被合并（未实际执行）的只读调用数
+
+
 class AITab(
     HeaderMixin,
     InputAreaMixin,
@@ -82,7 +97,10 @@ class AITab(
     _addNodeOperation = QtCore.Signal(str, object)  # (name, result_dict) ★ 直接传 dict，避免 JSON 序列化/反序列化开销
     _addPythonShell = QtCore.Signal(str, str)  # (code, result_json)
     _addSystemShell = QtCore.Signal(str, str)  # (command, result_json)
+    _systemShellStarted = QtCore.Signal(int, str, str)  # execute_shell 进程启动: (run_id, command, cwd)
+    _systemShellOutput = QtCore.Signal(int, str, bool)  # execute_shell 增量输出: (run_id, text, is_stderr)
     _executeToolRequest = QtCore.Signal(str, dict)  # 工具执行请求信号（线程安全）
+    _executeToolBatchRequest = QtCore.Signal(object)  # 批量工具执行请求（_ToolBatch）
     _addThinking = QtCore.Signal(str)  # 思考内容更新信号（线程安全）
     _finalizeThinkingSignal = QtCore.Signal()  # 结束思考区块（线程安全）
     _resumeThinkingSignal = QtCore.Signal()    # 恢复思考区块（线程安全）
@@ -92,6 +110,7 @@ class AITab(
     _confirmToolRequest = QtCore.Signal()  # 确认模式：请求确认（参数通过属性传递，避免 QueuedConnection dict 问题）
     _confirmToolResult = QtCore.Signal(bool)        # 确认模式：结果 (True=执行, False=取消)
     _toolArgsDelta = QtCore.Signal(str, str, str)   # 流式 VEX 预览: (tool_name, delta, accumulated)
+    _docIndexReady = QtCore.Signal(str)             # 文档索引后台加载完成: labs_catalog
     
     def __init__(self, parent=None, workspace_dir: Optional[Path] = None):
         super().__init__(parent)
@@ -99,6 +118,8 @@ class AITab(
         self.client = AIClient()
         self.mcp = HoudiniMCP()
         self.client.set_tool_executor(self._execute_tool_with_todo)
+        self.client.set_batch_tool_executor(self._execute_tools_batch)
+        self.client.set_prefetch_executor(self._execute_tool_speculative)
         
         # 状态
         self._conversation_history: List[Dict[str, Any]] = []
@@ -124,6 +145,8 @@ class AITab(
         self._session_id = str(uuid.uuid4())[:8]  # 当前会话 ID
         self._cache_dir = Path(__file__).parent.parent.parent / "cache" / "conversations"
         self._cache_dir.mkdir(parents=True, exist_ok=True)
+        # 会话日志：每个会话一个追加式 JSONL，只写增量，序列化与写盘在后台线程
+        self._session_log = SessionLogStore(self._cache_dir)
         self._auto_save_cache = True  # 自动保存缓存
         self._workspace_dir = workspace_dir  # 工作区目录
         
@@ -132,6 +155,11 @@ class AITab(
         self._session_counter = 0               # 用于生成 tab 标签
         # ★ 纯 Python 备份：tab 顺序和标签名（atexit 时 Qt widget 可能已销毁）
         self._tabs_backup: list = []  # [(session_id, tab_label), ...]
+        # 会话级工具结果缓存（跨轮次复用查询结果，场景变化时按节点路径失效）
+        self._tool_caches: Dict[str, ToolResultCache] = {}
+        self._live_python_shells: List[PythonShellWidget] = []  # execute_python 执行中的实时面板
+        self._live_system_shells: Dict[int, SystemShellWidget] = {}  # execute_shell 执行中的实时面板: run_id -> widget
+        self._scene_listener_installed = False
         
         # 静态内容缓存（只计算一次，节省 token 和计算时间）
         self._cached_optimized_system_prompt: Optional[str] = None
@@ -140,6 +168,7 @@ class AITab(
         
         # Token 优化器
         self.token_optimizer = TokenOptimizer()
+        self._token_ledger: Optional[ContextLedger] = None  # 当前会话历史的增量 token 账本
         self._auto_optimize = True  # 自动优化
         self._optimization_strategy = CompressionStrategy.BALANCED
         
@@ -189,7 +218,11 @@ class AITab(
         self._addNodeOperation.connect(self._on_add_node_operation)
         self._addPythonShell.connect(self._on_add_python_shell)
         self._addSystemShell.connect(self._on_add_system_shell)
+        self._systemShellStarted.connect(self._on_system_shell_started)
+        self._systemShellOutput.connect(self._on_system_shell_output)
         self._executeToolRequest.connect(self._on_execute_tool_main_thread, QtCore.Qt.BlockingQueuedConnection)
+        # 批量请求不阻塞发送方：后台线程按单个调用的超时逐个等待结果
+        self._executeToolBatchRequest.connect(self._on_execute_tool_batch_main_thread, QtCore.Qt.QueuedConnection)
         self._addThinking.connect(self._on_add_thinking)
         self._finalizeThinkingSignal.connect(self._finalize_thinking_main_thread)
         self._resumeThinkingSignal.connect(self._resume_thinking_main_thread)
@@ -198,6 +231,7 @@ class AITab(
         self._autoTitleDone.connect(self._on_auto_title_done)
         self._confirmToolRequest.connect(self._on_confirm_tool_request, QtCore.Qt.QueuedConnection)
         self._toolArgsDelta.connect(self._on_tool_args_delta)
+        self._docIndexReady.connect(self._on_doc_index_ready)
         
         # ── 流式 VEX 预览状态 ──
         self._streaming_preview = None          # 当前的 StreamingCodePreview widget
@@ -205,6 +239,8 @@ class AITab(
         self._streaming_last_code = ""          # 上次解析出的完整代码（用于增量 diff）
         
         # 构建并缓存系统提示词（两个版本：有思考 / 无思考）
+        # Labs 节点目录来自文档索引，索引在后台加载完成后再注入（见 _start_doc_index_warmup）
+        self._labs_catalog = ""
         self._system_prompt_think = self._build_system_prompt(with_thinking=True)
         self._system_prompt_no_think = self._build_system_prompt(with_thinking=False)
         self._cached_prompt_think = self.token_optimizer.optimize_system_prompt(
@@ -236,6 +272,8 @@ class AITab(
         
         # ★ 启动时静默检查更新（延迟 5 秒，不阻塞初始化）
         QtCore.QTimer.singleShot(5000, self._silent_update_check)
+        # ★ 文档索引在后台加载（首次构建要几秒，不阻塞面板打开）
+        QtCore.QTimer.singleShot(500, self._start_doc_index_warmup)
         
         # ★ 语言切换时重建系统提示词 + 重新翻译 UI
         from .i18n import language_changed
@@ -256,6 +294,34 @@ class AITab(
         self._cached_optimized_system_prompt = self._cached_prompt_think
         print(f"[i18n] System prompts rebuilt for language: {_lang or get_language()}")
 
+    def _start_doc_index_warmup(self):
+        threading.Thread(target=self._bg_warm_doc_index, name='doc-index-warmup', daemon=True).start()
+
+    def _bg_warm_doc_index(self):
+        """[后台线程] 加载文档索引，完成后把 Labs 节点目录注入系统提示词；随后加载离线帮助语料"""
+        try:
+            from ..utils.doc_rag import get_doc_index
+            catalog = get_doc_index().get_labs_catalog()
+        except Exception:
+            catalog = None
+        if catalog is not None:
+            try:
+                self._docIndexReady.emit(catalog or "")
+            except RuntimeError:
+                return  # 面板已关闭
+        # get_houdini_node_doc / get_node_inputs 不等待语料：就绪前走帮助服务器路径
+        try:
+            from ..utils.doc_corpus import warm_help_corpus
+            warm_help_corpus(background=False)
+        except Exception:
+            pass
+
+    @QtCore.Slot(str)
+    def _on_doc_index_ready(self, catalog: str):
+        if catalog and catalog != self._labs_catalog:
+            self._labs_catalog = catalog
+            self._rebuild_system_prompts()
+
     def _retranslateUi(self, _lang: str = ''):
         """语言切换后重新翻译所有静态 UI 文本"""
         # Header 区域
@@ -367,6 +433,7 @@ Safe Operation Rules:
 -Before setting parameters, MUST call get_node_parameters to see what parameters exist, their names, current values and defaults. Never guess parameter names
 -If modifying multiple parameters, first query all with get_node_parameters, then set them one by one with set_node_parameter
 -In execute_python, always check for None: node=hou.node(path); if node: ...
+-execute_python keeps one namespace per conversation: reuse modules, variables and helper functions from earlier calls instead of re-importing/recomputing; pass reset=true for a clean namespace. Long loops are interrupted at the timeout (default 25s, max 120s)
 -After creating a node, use the returned path. Never guess paths
 -Before connecting nodes, confirm both endpoints exist
 -No duplicate queries: A network_path only needs one query per round. Results remain valid within the round. If you've already inspected a network's structure, reuse the previous result
@@ -435,6 +502,7 @@ Skill System (MUST use for geometry analysis):
 Performance Analysis & Optimization (use when user mentions performance/speed/lag/optimization):
 -Quick diagnosis: First use run_skill(skill_name="analyze_cook_performance", params={"network_path": "/obj/geo1"}) for network-wide cook time ranking and bottleneck identification
 -Detailed analysis: For more precise time breakdown and memory stats, use perf_start_profile to start profiling (can force cook simultaneously), then perf_stop_and_report for detailed report
+-Drill-down & comparison: perf_stop_and_report lists nodes with stable IDs; call it again with focus="<ID>" for per-node detail. Save profiles (save_path) before and after an optimization, then perf_analyze_profile(profile_path=after, baseline_path=before) to verify the improvement
 -After analysis, use existing tools to implement optimizations based on bottleneck nodes and suggestions, then re-run analysis to verify
 -Common optimization techniques:
   1.Add Cache/File Cache nodes before/after expensive nodes to avoid redundant cooking
@@ -488,8 +556,7 @@ NetworkBox Hierarchical Navigation (large network query strategy, MUST follow):
 
         # Inject Labs node catalog (so AI knows Labs tools exist)
         try:
-            from ..utils.doc_rag import get_doc_index
-            labs_catalog = get_doc_index().get_labs_catalog()
+            labs_catalog = self._labs_catalog
             if labs_catalog:
                 base_prompt += f"""
 
@@ -570,6 +637,8 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
         self.btn_update.clicked.connect(self._on_check_update)
         self.btn_font_scale.clicked.connect(self._on_font_settings)
         self.provider_combo.currentIndexChanged.connect(self._on_provider_changed)
+        self._sync_token_model()
+        self.model_combo.currentIndexChanged.connect(self._sync_token_model)
         self.model_combo.currentIndexChanged.connect(self._update_context_stats)
         
         # 字号缩放快捷键
@@ -610,6 +679,7 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
 
     def _on_font_settings(self):
         """打开字号设置面板"""
+        from .font_settings_dialog import FontSettingsDialog
         dlg = FontSettingsDialog(current_scale=self._theme.scale, parent=self)
         dlg.scaleChanged.connect(self._on_font_scale_preview)
         dlg.exec_()
@@ -625,42 +695,41 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
     # ===== 上下文统计 =====
     
     def _estimate_tokens(self, text: str) -> int:
-        """估算文本的 token 数量（粗略估算）
-        
-        中文约 1.5 字符/token，英文约 4 字符/token
-        这里使用简单的混合估算
-        """
-        if not text:
-            return 0
-        
-        # 统计中文字符
-        chinese_chars = sum(1 for c in text if '\u4e00' <= c <= '\u9fff')
-        other_chars = len(text) - chinese_chars
-        
-        # 中文约 1.5 字符/token，其他约 4 字符/token
-        tokens = chinese_chars / 1.5 + other_chars / 4
-        return int(tokens)
+        """估算文本的 token 数量（与上下文统计共用 token_accounting 计数器）"""
+        return self.token_optimizer.estimate_tokens(text)
+    
+    def _sync_token_model(self):
+        """模型切换时同步 token 计数器（tiktoken 编码与启发式校准系数按模型区分）"""
+        self.token_optimizer.model = self.model_combo.currentText()
     
     def _calculate_context_tokens(self) -> int:
-        """计算当前上下文的总 token 数（含工具定义）"""
-        # 缓存工具定义 token 数（只算一次，因为工具定义不变）
-        if not hasattr(self, '_tools_token_cache'):
-            import json as _json
-            from houdini_agent.utils.ai_client import HOUDINI_TOOLS
-            tools_json = _json.dumps(HOUDINI_TOOLS, ensure_ascii=False)
-            self._tools_token_cache = self.token_optimizer.estimate_tokens(tools_json)
+        """计算当前上下文的总 token 数（含工具定义）
         
-        total = self._tools_token_cache
+        对话历史走 ContextLedger：只对新增 / 被修改的消息计数，其余沿用上次结果。
+        """
+        counter = self.token_optimizer.counter
+        ledger = self._token_ledger
+        if ledger is None or ledger.counter is not counter:
+            ledger = self._token_ledger = ContextLedger(counter)
+        
+        # 工具定义（JSON 文本按对象缓存，计数器记忆其 token 数）
+        total = counter.text(tools_json(HOUDINI_TOOLS))
         
         # 系统提示词
-        total += self.token_optimizer.estimate_tokens(self._system_prompt)
+        total += counter.text(self._system_prompt)
         
         # 上下文摘要
         if self._context_summary:
-            total += self.token_optimizer.estimate_tokens(self._context_summary)
+            total += counter.text(self._context_summary)
         
         # 对话历史
-        total += self.token_optimizer.calculate_message_tokens(self._conversation_history)
+        total += ledger.sync(self._conversation_history)
+        
+        # 旧轮次冻结的 RAG / [Context]（随 user 消息重发，不在账本中）
+        for m in self._conversation_history:
+            extras = m.get(EXTRAS_FIELD)
+            if extras:
+                total += counter.messages(extras)
         
         return total
     
@@ -803,8 +872,11 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
         # 计算 cache 命中率
         cache_read = self._token_stats['cache_read']
         cache_write = self._token_stats['cache_write']
-        cache_total = cache_read + cache_write
-        hit_rate_display = f"{(cache_read / cache_total * 100):.1f}%" if cache_total > 0 else "N/A"
+        if cache_read + cache_write > 0:
+            from houdini_agent.utils.token_optimizer import input_cache_ratio
+            hit_rate_display = f"{input_cache_ratio(self._token_stats) * 100:.1f}%"
+        else:
+            hit_rate_display = "N/A"
         
         reasoning = self._token_stats.get('reasoning_tokens', 0)
         reasoning_line = tr('token.reasoning_line', reasoning) if reasoning > 0 else ""
@@ -823,7 +895,10 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
         """显示详细 Token 统计对话框（对齐 Cursor：使用 TokenAnalyticsPanel）"""
         from houdini_agent.ui.cursor_widgets import TokenAnalyticsPanel
         records = getattr(self, '_call_records', []) or []
-        dialog = TokenAnalyticsPanel(records, self._token_stats, parent=self)
+        cache = self._tool_caches.get(self._session_id)
+        dialog = TokenAnalyticsPanel(records, self._token_stats, parent=self,
+                                     tool_cache_stats=cache.stats() if cache else None,
+                                     mcp_cache_stats=get_cache_registry().stats())
         dialog.exec_()
         if dialog.should_reset_stats:
             self._reset_token_stats()
@@ -926,6 +1001,7 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
             self._is_first_content_chunk = True
             
             self.client.reset_stop()
+            self._begin_tool_cache_turn()
             # 启动思考计时器
             self._thinking_timer = QtCore.QTimer(self)
             self._thinking_timer.timeout.connect(lambda: self._updateThinkingTime.emit())
@@ -1053,9 +1129,8 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
         resp = self._agent_response or self._current_response
         if not text or not resp:
             return
-        # 过滤纯空白（只含换行/空格的 chunk）
-        if not text.strip():
-            return
+        # 纯空白 chunk（如段落间的 "\n\n"）也交给 AIResponse：它是段落冻结边界，
+        # 回复开头的空白由 append_content 自行丢弃
         try:
             resp.append_content(text)
             self._scroll_agent_to_bottom(force=False)
@@ -1274,7 +1349,7 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
                 if has_fake and not getattr(self, '_fake_warned', False):
                     self._addStatus.emit(tr('ai.fake_tool'))
                     self._fake_warned = True
-            if buf.strip():
+            if buf:
                 self._appendContent.emit(buf)
             self._output_buffer = ""
             self._last_flush_time = current_time
@@ -1517,7 +1592,14 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
             
             if cache_hit > 0 or cache_miss > 0:
                 rate_percent = cache_rate * 100
-                self._addStatus.emit(f"Cache: {cache_hit}/{cache_hit+cache_miss} ({rate_percent:.0f}%)")
+                prompt_total = max(usage.get('prompt_tokens', 0), cache_hit + cache_miss)
+                self._addStatus.emit(f"Cache: {cache_hit}/{prompt_total} ({rate_percent:.0f}%)")
+        
+        # 投机预取：命中数 / 发起数与节省的工具等待时间
+        prefetch = result.get('prefetch')
+        if prefetch and prefetch.get('served'):
+            self._addStatus.emit(f"Prefetch: {prefetch['served']}/{prefetch['submitted']} "
+                                 f"({prefetch['hit_rate'] * 100:.0f}%), -{prefetch['saved_ms'] / 1000:.1f}s")
         
         # 自动保存缓存（必须在 _set_running(False) 之前，因为此时 agent 引用还有效）
         agent_sid = self._agent_session_id
@@ -1679,16 +1761,40 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
         finally:
             self._hideToolStatus.emit()
     
+    def _execute_tool_speculative(self, tool_name: str, kwargs: dict) -> dict:
+        """投机预取执行器（AIClient 线程池调用）：只读查询，不显示工具状态
+
+        与正常工具共用主线程调度（_tool_lock），结果由 AIClient 决定是否使用。
+        """
+        if not self._agent_mode and tool_name not in self._ASK_MODE_TOOLS:
+            return {"success": False, "error": tr('ask.restricted', tool_name)}
+        if self.client.is_stop_requested():
+            return {"success": False, "error": tr('ai.prefetch_skipped')}
+        if tool_name in self._BG_SAFE_TOOLS:
+            return self._execute_tool_in_bg(tool_name, kwargs)
+        return self._execute_tool_in_main_thread(tool_name, kwargs)
+
     def _execute_tool_in_bg(self, tool_name: str, kwargs: dict) -> dict:
         """在后台线程直接执行工具（不阻塞 UI 主线程）
         
         仅用于不依赖 hou 模块的工具，如 execute_shell、search_local_doc 等。
+        execute_shell 的输出经信号实时写入 Shell 面板，停止按钮（client.request_stop）结束进程。
         """
+        is_shell = tool_name == "execute_shell"
+        if is_shell:
+            self.mcp.set_shell_context(
+                on_start=self._systemShellStarted.emit,
+                on_output=lambda run_id, stream, text: self._systemShellOutput.emit(
+                    run_id, text, stream == 'stderr'),
+                cancel=self.client.is_stop_requested)
         try:
             return self.mcp.execute_tool(tool_name, kwargs)
         except Exception as e:
             import traceback
             return {"success": False, "error": tr('ai.bg_exec_err', f"{e}\n{traceback.format_exc()[:300]}")}
+        finally:
+            if is_shell:
+                self.mcp.set_shell_context()
     
     def _execute_tool_in_main_thread(self, tool_name: str, kwargs: dict) -> dict:
         """在主线程执行工具（线程安全）
@@ -1713,10 +1819,82 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
             
             # 从队列获取结果（有超时保护）
             try:
-                result = self._tool_result_queue.get(timeout=30.0)
+                result = self._tool_result_queue.get(timeout=self._main_thread_wait(tool_name, kwargs))
                 return result
             except queue.Empty:
                 return {"success": False, "error": tr('ai.main_exec_timeout')}
+
+    # 主线程单个工具调用的超时（秒）；批量执行时对每个调用单独计时
+    _MAIN_THREAD_TOOL_TIMEOUT = 30.0
+
+    def _main_thread_wait(self, tool_name: str, kwargs: dict) -> float:
+        """等待主线程工具结果的上限：execute_python 按其自身超时放宽（执行引擎到时会中断代码）"""
+        if tool_name == "execute_python":
+            return max(self._MAIN_THREAD_TOOL_TIMEOUT, self.mcp.python_timeout(kwargs) + 5.0)
+        return self._MAIN_THREAD_TOOL_TIMEOUT
+
+    def _execute_tools_batch(self, calls: list) -> list:
+        """批量执行一轮中的多个工具调用（后台线程调用，AIClient 的批量执行器）
+
+        calls: [(tool_name, kwargs)]，返回与之一一对应的结果列表。
+        连续的主线程工具合并为一次主线程调度（一个 undo group、一次线程切换）；
+        Todo / 后台安全工具会先执行已排队的调用，再按原顺序执行自身，整体顺序不变。
+        """
+        results: list = [None] * len(calls)
+        pending: list = []  # [(idx, tool_name, kwargs)] 等待主线程执行的连续段
+
+        def _flush():
+            if not pending:
+                return
+            batch_results = self._execute_batch_in_main_thread([(n, k) for _, n, k in pending])
+            for (idx, _, _), res in zip(pending, batch_results):
+                results[idx] = res
+            pending.clear()
+
+        for idx, (tool_name, kwargs) in enumerate(calls):
+            if (tool_name in ("add_todo", "update_todo") or tool_name in self._BG_SAFE_TOOLS
+                    or (self._confirm_mode and tool_name in self._CONFIRM_TOOLS)):
+                # 不在主线程批次内执行（或需要逐个确认）：走单个调用路径
+                _flush()
+                results[idx] = self._execute_tool_with_todo(tool_name, **kwargs)
+            elif not self._agent_mode and tool_name not in self._ASK_MODE_TOOLS:
+                results[idx] = {"success": False, "error": tr('ask.restricted', tool_name)}
+            else:
+                pending.append((idx, tool_name, kwargs))
+        _flush()
+        return results
+
+    def _execute_batch_in_main_thread(self, calls: list) -> list:
+        """把多个工具调用一次性调度到主线程，逐个等待结果（每个调用独立超时）
+
+        某个调用超时后，主线程会跳过尚未开始的调用，它们返回 ai.batch_skipped 错误。
+        """
+        if len(calls) == 1:
+            tool_name, kwargs = calls[0]
+            return [self._execute_tool_with_todo(tool_name, **kwargs)]
+
+        names = list(dict.fromkeys(n for n, _ in calls))
+        self._showToolStatus.emit(f"{names[0]} ×{len(calls)}" if len(names) == 1 else
+                                  f"{', '.join(names[:3])}{'…' if len(names) > 3 else ''}")
+        try:
+            with self._tool_lock:
+                batch = _ToolBatch(calls)
+                self._executeToolBatchRequest.emit(batch)
+                results = []
+                for i, (tool_name, kwargs) in enumerate(calls):
+                    try:
+                        results.append(batch.results.get(timeout=self._main_thread_wait(tool_name, kwargs)))
+                    except queue.Empty:
+                        batch.cancelled.set()
+                        results.append({"success": False, "error": tr('ai.main_exec_timeout')})
+                        results.extend({"success": False, "error": tr('ai.batch_skipped', n)}
+                                       for n, _ in calls[i + 1:])
+                        break
+                if batch.coalesced:
+                    print(f"[AI Tab] 批量执行 {len(calls)} 个工具，合并 {batch.coalesced} 个重复只读调用")
+                return results
+        finally:
+            self._hideToolStatus.emit()
     
     # 已自带 checkpoint 追踪的工具（在 _on_add_node_operation 中有专用分支）
     _SELF_TRACKING_TOOLS = frozenset({
@@ -1725,19 +1903,31 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
     })
 
     @staticmethod
-    def _snapshot_network_children() -> dict:
-        """快照当前网络的子节点列表 {path: {name, type, path}}"""
+    def _snapshot_network():
+        """快照目标网络：当前网络编辑器 > /obj/geo1 > /obj"""
         try:
             import hou  # type: ignore
-            network = None
+        except Exception:
+            return None
+        network = None
+        try:
+            editor = hou.ui.curDesktop().paneTabOfType(hou.paneTabType.NetworkEditor)
+            if editor:
+                network = editor.pwd()
+        except Exception:
+            pass
+        if not network:
             try:
-                editor = hou.ui.curDesktop().paneTabOfType(hou.paneTabType.NetworkEditor)
-                if editor:
-                    network = editor.pwd()
-            except Exception:
-                pass
-            if not network:
                 network = hou.node('/obj/geo1') or hou.node('/obj')
+            except Exception:
+                network = None
+        return network
+
+    @classmethod
+    def _snapshot_network_children(cls) -> dict:
+        """快照当前网络的子节点列表 {path: {name, type, path}}（全量遍历，镜像不可用时的回退）"""
+        try:
+            network = cls._snapshot_network()
             if not network:
                 return {}
             return {
@@ -1751,6 +1941,76 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
         except Exception:
             return {}
 
+    # ==========================================================
+    # 跨轮次工具结果缓存
+    # ==========================================================
+
+    @staticmethod
+    def _scene_registry():
+        try:
+            from ..utils.mcp.scene_mirror import get_scene_mirror
+            return get_scene_mirror()
+        except Exception:
+            return None
+
+    def _session_tool_cache(self, session_id: str) -> ToolResultCache:
+        cache = self._tool_caches.get(session_id)
+        if cache is None:
+            cache = ToolResultCache()
+            cache.downstream_resolver = self._resolve_downstream
+            self._tool_caches[session_id] = cache
+        return cache
+
+    def _resolve_downstream(self, paths) -> set:
+        """节点路径 → 下游节点路径；无镜像时按父网络处理"""
+        registry = self._scene_registry()
+        if registry is None:
+            return {p.rsplit('/', 1)[0] or '/' for p in paths}
+        return registry.downstream_paths(paths)
+
+    def _begin_tool_cache_turn(self):
+        """新一轮 Agent 运行前：挂上当前会话的缓存，丢弃无法确认仍有效的场景条目"""
+        cache = self._session_tool_cache(self._session_id)
+        registry = self._scene_registry()
+        if registry is not None and not self._scene_listener_installed:
+            registry.add_listener(self._on_scene_changed)
+            self._scene_listener_installed = True
+        cache.begin_turn(registry.watched_networks() if registry is not None else None)
+        self.client.set_tool_cache(cache)
+
+    def _on_scene_changed(self, paths, downstream: bool):
+        """scene_mirror 回调（主线程）：用户或工具修改了节点 → 所有会话的缓存按路径失效"""
+        for cache in list(self._tool_caches.values()):
+            if paths is None:
+                cache.invalidate_scene()
+            else:
+                cache.invalidate(paths, downstream=downstream)
+
+    @classmethod
+    def _network_change_token(cls) -> tuple:
+        """修改前记录网络状态：镜像可用时只记变更序号（O(1)），否则做全量快照"""
+        try:
+            from ..utils.mcp.scene_mirror import get_scene_mirror
+            registry = get_scene_mirror()
+            network = cls._snapshot_network() if registry is not None else None
+            mirror = registry.mirror_for(network) if network else None
+            if mirror is not None:
+                return (mirror, mirror.seq)
+        except Exception:
+            pass
+        return (None, cls._snapshot_network_children())
+
+    @classmethod
+    def _network_changes_since(cls, token: tuple):
+        """修改后对比 token，返回 {created: [...], deleted: [...]} 或 None"""
+        mirror, state = token
+        if mirror is not None:
+            changes = mirror.changes_since(state)
+            if changes is not False:
+                return changes
+            return None  # 日志已截断 / 镜像失效：无法得知本次变更，不附带 _node_changes
+        return cls._diff_network_children(state, cls._snapshot_network_children())
+
     # ------------------------------------------------------------------
     #  后处理：自动将 AI 回复中的裸节点名解析为完整路径
     # ------------------------------------------------------------------
@@ -1840,32 +2100,95 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
             return None
         return {'created': created, 'deleted': deleted}
 
+    # 修改操作（需要 undo group）
+    _MUTATING_TOOLS = frozenset({
+        "create_node", "create_nodes_batch", "create_wrangle_node",
+        "delete_node", "set_node_parameter", "connect_nodes",
+        "copy_node", "batch_set_parameters", "set_display_flag",
+        "execute_python", "save_hip", "run_skill",
+    })
+
     @QtCore.Slot(str, dict)
     def _on_execute_tool_main_thread(self, tool_name: str, kwargs: dict):
         """在主线程执行工具（槽函数）
         
         注意：此方法在主线程中执行，直接操作 Houdini API 是安全的。
         所有修改操作包裹在 undo group 中，支持一键撤销整个 Agent 操作。
-        ★ 对于未自带 checkpoint 的修改工具，会在执行前后快照网络子节点以检测变更。
+        """
+        result = self._run_tool_main_thread(tool_name, kwargs, tool_name in self._MUTATING_TOOLS)
+        # 给 Houdini 主线程处理 UI 事件的机会（防止事件堆积导致崩溃）
+        try:
+            QtWidgets.QApplication.processEvents()
+        except Exception:
+            pass
+        # 将结果放入队列（线程安全）
+        self._tool_result_queue.put(result)
+
+    @QtCore.Slot(object)
+    def _on_execute_tool_batch_main_thread(self, batch: _ToolBatch):
+        """在主线程按顺序执行一批工具（槽函数）
+
+        整批修改操作共用一个 undo group（一次撤销回到本轮之前）；
+        结果逐个放入 batch.results，后台线程据此对每个调用单独计时。
+        相同参数的只读调用（_COALESCE_TOOLS）在两次之间没有其他调用时直接复用结果。
+        """
+        if batch.cancelled.is_set():
+            return
+        mutating = [n for n, _ in batch.calls if n in self._MUTATING_TOOLS]
+        use_undo_group = bool(mutating)
+        if use_undo_group:
+            try:
+                import hou  # type: ignore
+                label = ", ".join(dict.fromkeys(mutating))
+                hou.undos.beginGroup(f"AI Agent: {label[:80]}")
+            except Exception:
+                use_undo_group = False
+        coalesced: Dict[str, dict] = {}
+        try:
+            for tool_name, kwargs in batch.calls:
+                if batch.cancelled.is_set():
+                    break  # 后台线程已超时放弃：剩余调用不再执行
+                key = None
+                if tool_name in self._COALESCE_TOOLS:
+                    key = f"{tool_name}:{json.dumps(kwargs, sort_keys=True, default=str)}"
+                    if key in coalesced:
+                        batch.coalesced += 1
+                        batch.results.put(dict(coalesced[key]))
+                        continue
+                else:
+                    coalesced.clear()
+                result = self._run_tool_main_thread(tool_name, kwargs, False)
+                if key is not None:
+                    coalesced[key] = result
+                batch.results.put(result)
+        finally:
+            if use_undo_group:
+                try:
+                    import hou  # type: ignore
+                    hou.undos.endGroup()
+                except Exception:
+                    pass
+            try:
+                QtWidgets.QApplication.processEvents()
+            except Exception:
+                pass
+
+    def _run_tool_main_thread(self, tool_name: str, kwargs: dict, use_undo_group: bool) -> dict:
+        """执行单个工具并返回结果（主线程调用，不做结果投递）
+
+        ★ 对于未自带 checkpoint 的修改工具，会在执行前后对比网络子节点以检测变更
+          （scene_mirror 可用时读取其变更日志，否则全量快照）。
         """
         result = {"success": False, "error": tr('ai.unknown_err')}
         
-        # 判断是否为修改操作（需要 undo group）
-        _MUTATING_TOOLS = {
-            "create_node", "create_nodes_batch", "create_wrangle_node",
-            "delete_node", "set_node_parameter", "connect_nodes",
-            "copy_node", "batch_set_parameters", "set_display_flag",
-            "execute_python", "save_hip", "run_skill",
-        }
-        use_undo_group = tool_name in _MUTATING_TOOLS
-        
         # ★ 对不自带 checkpoint 追踪的修改工具，做 before/after 快照
         should_snapshot = (
-            tool_name in _MUTATING_TOOLS
+            tool_name in self._MUTATING_TOOLS
             and tool_name not in self._SELF_TRACKING_TOOLS
             and tool_name != 'save_hip'  # save 无需快照
         )
-        before_children = self._snapshot_network_children() if should_snapshot else {}
+        # 镜像可用时只记录变更序号，执行后按变更日志求 diff（O(变化数)）
+        change_token = self._network_change_token() if should_snapshot else None
         
         try:
             # 对修改操作开启 undo group
@@ -1940,6 +2263,8 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
                         "success": True,
                         "result": tr('ai.check_pass', expected[:30] if expected else 'done')
                     }
+            elif tool_name == "execute_python":
+                result = self._run_python_main_thread(kwargs)
             else:
                 # 其他工具交给 MCP 处理
                 result = self.mcp.execute_tool(tool_name, kwargs)
@@ -1949,8 +2274,7 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
             # ★ 执行后快照 & diff，检测节点变更
             if should_snapshot and result.get("success"):
                 try:
-                    after_children = self._snapshot_network_children()
-                    changes = self._diff_network_children(before_children, after_children)
+                    changes = self._network_changes_since(change_token)
                     if changes:
                         result['_node_changes'] = changes
                 except Exception:
@@ -1963,13 +2287,57 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
                     hou.undos.endGroup()
                 except Exception:
                     pass
-            # 给 Houdini 主线程处理 UI 事件的机会（防止事件堆积导致崩溃）
+        return result
+
+    def _run_python_main_thread(self, kwargs: dict) -> dict:
+        """execute_python（主线程）：代码在本会话的持久命名空间执行
+
+        执行超过一个输出间隔后在 Python Shell 区块创建执行中的面板，输出实时写入；
+        执行期间周期性处理 UI 事件，停止按钮（client.request_stop）可中断执行。
+        """
+        code = kwargs.get('code', '')
+        live: list = []
+
+        def _open_live():
+            resp = self._agent_response or self._current_response
+            if live or not resp or not code:
+                return
             try:
-                QtWidgets.QApplication.processEvents()
-            except Exception:
-                pass
-            # 将结果放入队列（线程安全）
-            self._tool_result_queue.put(result)
+                widget = PythonShellWidget(code=code, running=True, parent=resp)
+                resp.add_shell_widget(widget)
+            except RuntimeError:
+                return  # 回复区域已被 clear 销毁
+            live.append(widget)
+            self._live_python_shells.append(widget)
+            self._scroll_agent_to_bottom()
+
+        def _on_output(stream: str, text: str):
+            _open_live()
+            if live:
+                try:
+                    live[0].append_output(text, stream == 'stderr')
+                except RuntimeError:
+                    pass
+
+        def _on_tick():
+            _open_live()
+            QtWidgets.QApplication.processEvents()
+
+        session = self._agent_session_id or self._session_id
+        self.mcp.set_python_context(session=session, on_output=_on_output,
+                                    cancel=self.client.is_stop_requested, on_tick=_on_tick)
+        try:
+            return self.mcp.execute_tool("execute_python", kwargs)
+        finally:
+            self.mcp.set_python_context(session=session)
+
+    def _take_live_python_shell(self, code: str) -> Optional['PythonShellWidget']:
+        """取出该代码对应的执行中面板（按创建顺序）"""
+        for i, widget in enumerate(self._live_python_shells):
+            if widget.code == code:
+                del self._live_python_shells[i]
+                return widget
+        return None
 
     # ------------------------------------------------------------------
     # 伪造工具调用检测
@@ -1985,7 +2353,7 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
         '|execute_python|execute_shell|check_errors|get_node_inputs|add_todo|update_todo'
         '|verify_and_summarize|run_skill|list_skills'
         '|layout_nodes|get_node_positions'
-        '|perf_start_profile|perf_stop_and_report'
+        '|perf_start_profile|perf_stop_and_report|perf_analyze_profile'
     )
     _FAKE_TOOL_PATTERNS = re.compile(
         r'^\[(?:ok|err)\]\s*(?:' + _ALL_TOOL_NAMES + r')\s*[:\uff1a]',
@@ -2202,13 +2570,19 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
         - 按「轮次」（以 user 消息为分界）裁剪，保护最近 N 轮
         - 如果仅压缩 tool 仍不够，整轮删除最早的轮次
         - 保持 assistant(tool_calls) ↔ tool 的原生链不被打破
+        - 摘要与删除都按缓存块（prompt_cache.CACHE_BLOCK_ROUNDS 轮）进行，保持前缀缓存
         """
         # ★ 使用 agent 锚定的 history（避免压缩错误 session）
         history = self._agent_history if self._agent_history is not None else self._conversation_history
         if len(history) < 6:
             return  # 太少，不需管理
         
-        current_tokens = self.token_optimizer.calculate_message_tokens(history)
+        # 增量账本：逐消息计数（有记忆）+ 按轮次累计，裁剪时按轮次减去，不再整段重算
+        # 旧轮次冻结的 RAG / [Context] 随 user 消息重发，不在账本中，单独计入
+        counter = self.token_optimizer.counter
+        ledger = ContextLedger(counter)
+        extras_tokens = counter.messages([e for m in history for e in m.get(EXTRAS_FIELD) or ()])
+        current_tokens = ledger.sync(history) + extras_tokens
         context_limit = self._get_current_context_limit()
         
         # 更新预算
@@ -2223,64 +2597,42 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
         old_tokens = current_tokens
         
         # --- 按 user 消息划分轮次 ---
-        rounds = []       # [[msg, msg, ...], ...]
-        current_round = []
-        for m in history:
-            if m.get('role') == 'user' and current_round:
-                rounds.append(current_round)
-                current_round = []
-            current_round.append(m)
-        if current_round:
-            rounds.append(current_round)
+        rounds = [history[s:e] for s, e, _ in ledger.rounds()]  # [[msg, msg, ...], ...]
         
         if len(rounds) <= 2:
             return  # 只有 1-2 轮，不裁剪
         
-        # --- 第一遍：压缩旧轮次的 tool 结果（保留最近 60%）---
+        # --- 按缓存块裁剪（prompt_cache.plan_block_trim）---
+        # 第一遍：从最旧的块开始整块摘要 tool 结果（保留最近 60% 轮次），已摘要的不再改写；
+        # 仍超过 55% 时，第二遍从头整块删除轮次。每次裁剪都会改写前缀，一次降到 55%
+        # （而不是刚好低于压缩阈值），之后若干轮内只追加，前缀缓存持续命中
         n_rounds = len(rounds)
-        protect_n = max(2, int(n_rounds * 0.6))
-        for r_idx in range(n_rounds - protect_n):
-            for m in rounds[r_idx]:
-                if m.get('role') == 'tool':
-                    c = m.get('content') or ''
-                    if len(c) > 200:
-                        m['content'] = self.client._summarize_tool_content(c, 200) if hasattr(self.client, '_summarize_tool_content') else c[:200] + '...[summary]'
-        
-        # 重新计算
-        compressed = [m for rnd in rounds for m in rnd]
-        new_tokens = self.token_optimizer.calculate_message_tokens(compressed)
-        
-        if new_tokens < context_limit * self.token_optimizer.budget.compression_threshold:
-            # 压缩 tool 就够了
-            history.clear()
-            history.extend(compressed)
+        summarize = getattr(self.client, '_summarize_tool_content', None) or (
+            lambda c, n: c[:n] + '...[summary]')
+        _, dropped, new_tokens = plan_block_trim(
+            rounds, lambda rnd: counter.messages(expand_extras(rnd)), summarize,
+            target=int(context_limit * 0.55),
+            keep_recent=max(2, int(n_rounds * 0.6)),
+        )
+        
+        if not dropped:
+            # 压缩 tool 就够了（消息对象未变，只是 content 被原地替换）
             saved = old_tokens - new_tokens
             if saved > 0:
-                pct = saved / old_tokens * 100 if old_tokens else 0
                 self._addStatus.emit(tr('opt.auto_status', saved))
             return
         
-        # --- 第二遍：删除最早的完整轮次，直到低于阈值 ---
-        target = int(context_limit * 0.65)  # 目标降到 65%
-        while len(rounds) > 2:
-            # 删除最早的轮次
-            removed = rounds.pop(0)
-            compressed = [m for rnd in rounds for m in rnd]
-            new_tokens = self.token_optimizer.calculate_message_tokens(compressed)
-            if new_tokens <= target:
-                break
-        
         # 在头部插入摘要提示
         summary_note = {
             'role': 'system',
-            'content': tr('ai.old_rounds', n_rounds - len(rounds))
+            'content': tr('ai.old_rounds', dropped)
         }
         
         history.clear()
         history.append(summary_note)
-        history.extend([m for rnd in rounds for m in rnd])
+        history.extend([m for rnd in rounds[dropped:] for m in rnd])
         
-        saved = old_tokens - self.token_optimizer.calculate_message_tokens(history)
+        saved = old_tokens - new_tokens - counter.message(summary_note)
         if saved > 0:
             self._addStatus.emit(tr('opt.auto_status', saved))
             self._render_conversation_history()
@@ -2597,6 +2949,9 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
                     content = msg.get('content')
                     is_current_round = (msg_idx == _last_user_idx)
                     
+                    frozen_extras = msg.get(EXTRAS_FIELD)
+                    if frozen_extras is not None:
+                        msg = {k: v for k, v in msg.items() if k != EXTRAS_FIELD}
                     if isinstance(content, list):
                         if is_current_round and supports_vision:
                             # 当前轮 + 视觉模型：完整保留图片
@@ -2615,6 +2970,10 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
                     else:
                         # 纯文本消息：原样保留
                         history_to_send.append(msg)
+                    # ★ 前缀缓存：旧轮次当时随 user 消息发送的 RAG / [Context] 原样重发，
+                    #   使本次请求的前缀与上一轮请求逐字节一致（当前轮的附加内容在下面重新生成）
+                    if frozen_extras and not is_current_round:
+                        history_to_send.extend(frozen_extras)
                 
                 elif role == 'system':
                     # 系统消息（如历史摘要）保留
@@ -2627,9 +2986,12 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
             
             # 3. 自动 RAG 注入（从用户最新消息中提取关键词，检索相关文档）
             user_last_msg = ""
+            last_user = None
+            extras = []   # 本轮附加的 system 消息（RAG / 上下文提醒），放在末尾
             if self._conversation_history:
                 for msg in reversed(self._conversation_history):
                     if msg.get('role') == 'user':
+                        last_user = msg
                         raw_content = msg.get('content', '')
                         # 多模态内容（list）中提取文字部分
                         if isinstance(raw_content, list):
@@ -2646,77 +3008,58 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
                     conversation_len=len(self._conversation_history),
                 )
                 if rag_context:
-                    messages.append({'role': 'system', 'content': rag_context})
+                    extras.append({'role': 'system', 'content': rag_context})
             
             # 4. 上下文提醒（放在最后，不破坏 cache 前缀）
             # ⚠️ Cache 优化：动态内容放在末尾，保持前缀稳定
             context_reminder = self._get_context_reminder()
             if context_reminder:
                 # 将上下文提醒作为系统消息添加到末尾
-                messages.append({'role': 'system', 'content': f"[Context] {context_reminder}"})
+                extras.append({'role': 'system', 'content': f"[Context] {context_reminder}"})
+            
+            # 冻结到当前 user 消息上：之后的请求在该消息后原样重发，前缀保持不变
+            if last_user is not None:
+                if extras:
+                    last_user[EXTRAS_FIELD] = extras
+                else:
+                    last_user.pop(EXTRAS_FIELD, None)
+            messages.extend(extras)
             
             # Cursor 风格预发送压缩：只压缩 tool 结果，保留 user/assistant 完整
+            # ★ 按缓存块对齐（prompt_cache.plan_block_trim）：摘要与删轮只在块边界推进，
+            #   同样的历史得到同样的结果，历史增长一整块之前前缀不变
             if self._auto_optimize:
-                current_tokens = self.token_optimizer.calculate_message_tokens(messages)
+                counter = self.token_optimizer.counter
+                current_tokens = counter.messages(messages)
                 should_compress, _ = self.token_optimizer.should_compress(current_tokens, context_limit)
                 
                 if should_compress:
                     old_tokens = current_tokens
-                    # 分离系统提示和上下文提醒
-                    first_system = messages[0] if messages and messages[0].get('role') == 'system' else None
-                    last_context = messages[-1] if messages and ('[上下文]' in messages[-1].get('content', '') or '[Context]' in messages[-1].get('content', '')) else None
-                    start_idx = 1 if first_system else 0
-                    end_idx = -1 if last_context else len(messages)
-                    body = messages[start_idx:end_idx] if end_idx != len(messages) else messages[start_idx:]
-                    
-                    # 按 user 消息划分轮次
-                    rounds = []
-                    cur_rnd = []
-                    for m in body:
-                        if m.get('role') == 'user' and cur_rnd:
-                            rounds.append(cur_rnd)
-                            cur_rnd = []
-                        cur_rnd.append(m)
-                    if cur_rnd:
-                        rounds.append(cur_rnd)
-                    
-                    # 第一遍：压缩旧轮次 tool 结果
+                    # 分离系统提示（不可变前缀）和本轮附加内容（末尾）
+                    head = messages[:1]
+                    tail = messages[len(messages) - len(extras):]
+                    rounds = split_rounds(messages[1:len(messages) - len(extras)])
                     n_rounds = len(rounds)
-                    protect_n = max(2, int(n_rounds * 0.6))
-                    for r_idx in range(n_rounds - protect_n):
-                        for m in rounds[r_idx]:
-                            if m.get('role') == 'tool':
-                                c = m.get('content') or ''
-                                if len(c) > 200:
-                                    m['content'] = self.client._summarize_tool_content(c, 200) if hasattr(self.client, '_summarize_tool_content') else c[:200] + '...[summary]'
-                    
-                    compressed_body = [m for rnd in rounds for m in rnd]
-                    
-                    # 如果仍超限，删除最早轮次
-                    target = int(context_limit * 0.7)
-                    while len(rounds) > 2:
-                        test_body = [m for rnd in rounds for m in rnd]
-                        test_msgs = ([first_system] if first_system else []) + test_body + ([last_context] if last_context else [])
-                        if self.token_optimizer.calculate_message_tokens(test_msgs) <= target:
-                            break
-                        rounds.pop(0)
-                    
-                    compressed_body = [m for rnd in rounds for m in rnd]
+                    summarize = getattr(self.client, '_summarize_tool_content', None) or (
+                        lambda c, n: c[:n] + '...[summary]')
+                    _, dropped, _ = plan_block_trim(
+                        rounds, counter.messages, summarize,
+                        target=int(context_limit * 0.7),
+                        fixed=counter.messages(head + tail),
+                        keep_recent=max(2, int(n_rounds * 0.6)),
+                    )
                     
                     # 重组
-                    messages = []
-                    if first_system:
-                        messages.append(first_system)
-                    if n_rounds - len(rounds) > 0:
+                    messages = list(head)
+                    if dropped:
                         messages.append({
                             'role': 'system',
-                            'content': tr('ai.old_rounds', n_rounds - len(rounds))
+                            'content': tr('ai.old_rounds', dropped)
                         })
-                    messages.extend(compressed_body)
-                    if last_context:
-                        messages.append(last_context)
+                    messages.extend(m for rnd in rounds[dropped:] for m in rnd)
+                    messages.extend(tail)
                     
-                    new_tokens = self.token_optimizer.calculate_message_tokens(messages)
+                    new_tokens = counter.messages(messages)
                     saved = old_tokens - new_tokens
                     if saved > 0:
                         self._addStatus.emit(tr('opt.auto_status', saved))
@@ -2934,6 +3277,9 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
                     'success': success,
                     'cwd': arguments.get('cwd', ''),
                 }
+                if 'exit_code' in result:
+                    shell_data['exit_code'] = result['exit_code']
+                    shell_data['elapsed'] = result.get('elapsed', 0.0)
                 self._addSystemShell.emit(command, json.dumps(shell_data))
                 short = f"[ok] $ {command[:40]}" if success else f"[err] {result_text[:50]}"
                 invoke_on_main(self, "_add_tool_result_ui", name, short)
@@ -3531,6 +3877,17 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
             
             clean_output = '\n'.join(clean_parts).strip()
             
+            # 执行中已经创建了实时面板：换成最终结果
+            live = self._take_live_python_shell(code)
+            if live is not None:
+                try:
+                    live.finish(output=clean_output, error=error,
+                                exec_time=exec_time, success=success)
+                    self._scroll_agent_to_bottom()
+                    return
+                except RuntimeError:
+                    pass  # 面板已被销毁，重新创建
+            
             widget = PythonShellWidget(
                 code=code,
                 output=clean_output,
@@ -3545,6 +3902,38 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
         except RuntimeError:
             pass  # widget 已被 clear 销毁
 
+    @QtCore.Slot(int, str, str)
+    def _on_system_shell_started(self, run_id: int, command: str, cwd: str):
+        """execute_shell 进程启动：在 Shell 区块创建执行中的面板"""
+        resp = self._agent_response or self._current_response
+        if not resp:
+            return
+        try:
+            widget = SystemShellWidget(command=command, cwd=cwd, running=True, parent=resp)
+            resp.add_sys_shell_widget(widget)
+        except RuntimeError:
+            return  # 回复区域已被 clear 销毁
+        self._live_system_shells[run_id] = widget
+        self._scroll_agent_to_bottom()
+
+    @QtCore.Slot(int, str, bool)
+    def _on_system_shell_output(self, run_id: int, text: str, is_stderr: bool):
+        widget = self._live_system_shells.get(run_id)
+        if widget is None:
+            return
+        try:
+            widget.append_output(text, is_stderr)
+        except RuntimeError:
+            self._live_system_shells.pop(run_id, None)
+
+    def _take_live_system_shell(self, command: str) -> Optional['SystemShellWidget']:
+        """取出该命令对应的执行中面板（按启动顺序）"""
+        for run_id, widget in self._live_system_shells.items():
+            if widget.command == command:
+                del self._live_system_shells[run_id]
+                return widget
+        return None
+
     @QtCore.Slot(str, str)
     def _on_add_system_shell(self, command: str, result_json: str):
         """处理 execute_shell 的专用 UI 展示"""
@@ -3586,6 +3975,22 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
                 stdout_parts.append(line)
 
             clean_output = '\n'.join(stdout_parts).strip()
+            # 工具结果直接给出的退出码 / 耗时优先（多页结果的状态行不在第一页）
+            if data.get('exit_code') is not None:
+                exit_code = data['exit_code']
+            if data.get('elapsed'):
+                exec_time = data['elapsed']
+
+            # 执行中已经创建了实时面板：换成最终结果
+            live = self._take_live_system_shell(command)
+            if live is not None:
+                try:
+                    live.finish(output=clean_output, error=error, exit_code=exit_code,
+                                exec_time=exec_time, success=success)
+                    self._scroll_agent_to_bottom()
+                    return
+                except RuntimeError:
+                    pass  # 面板已被销毁，重新创建
 
             widget = SystemShellWidget(
                 command=command,
@@ -3648,11 +4053,18 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
         self._pending_ops.clear()
         self._batch_bar.setVisible(False)
         self._session_node_map.clear()
+        self._tool_caches.pop(self._session_id, None)
+        self._live_python_shells.clear()
+        self._live_system_shells.clear()
+        self.mcp.reset_python_session(self._session_id)
         
         while self.chat_layout.count() > 1:
             item = self.chat_layout.takeAt(0)
             if item.widget():
                 item.widget().deleteLater()
+        view = self._history_view()
+        if view is not None:
+            view.reset([])
         
         # 旧 todo_list 已被 deleteLater, 创建新的
         self.todo_list = self._create_todo_list(self.chat_container)
@@ -3662,13 +4074,8 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
         # 同步到 sessions 字典
         self._save_current_session_state()
         
-        # ★ 清空后删除磁盘上的旧 session 文件（防止残留数据在重启后被恢复）
-        try:
-            old_session_file = self._cache_dir / f"session_{self._session_id}.json"
-            if old_session_file.exists():
-                old_session_file.unlink()
-        except Exception:
-            pass
+        # ★ 清空后删除磁盘上的会话日志（防止残留数据在重启后被恢复）
+        self._session_log.delete(self._session_id)
         # ★ 立即更新 manifest（移除已清空的会话条目）
         try:
             self._update_manifest()
@@ -4218,53 +4625,57 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
                 # 如果备份也为空，尝试从 _sessions 字典的 key 中获取
                 tabs_info = [(sid, f"Chat") for sid in self._sessions]
             
-            # 直接写文件，不依赖 Qt 事件循环
+            # 直接提交会话日志，不依赖 Qt 事件循环
             manifest_tabs = []
             for sid, tab_label in tabs_info:
                 if not sid or sid not in self._sessions:
                     continue
-                sdata = self._sessions[sid]
-                history = sdata.get('conversation_history', [])
-                if not history:
-                    continue
-                # 收集 todo 数据（widget 可能已销毁）
-                todo_data = []
-                try:
-                    todo_list_obj = sdata.get('todo_list')
-                    todo_data = todo_list_obj.get_todos_data() if todo_list_obj else []
-                except (RuntimeError, AttributeError, Exception):
-                    pass
-                cache_data = {
-                    'version': '1.0',
-                    'session_id': sid,
-                    'message_count': len(history),
-                    'conversation_history': self._strip_images_for_cache(history),
-                    'context_summary': sdata.get('context_summary', ''),
-                    'todo_data': todo_data,
-                    'token_stats': sdata.get('token_stats', {}),
-                }
-                session_file = self._cache_dir / f"session_{sid}.json"
-                with open(session_file, 'w', encoding='utf-8') as f:
-                    json.dump(cache_data, f, ensure_ascii=False)
-                manifest_tabs.append({
-                    'session_id': sid,
-                    'tab_label': tab_label,
-                    'file': f"session_{sid}.json",
-                })
+                if self._save_session_log(sid, self._sessions[sid]):
+                    manifest_tabs.append(self._manifest_entry(sid, tab_label))
             if manifest_tabs:
-                manifest = {
+                self._session_log.save_manifest({
                     'version': '1.0',
                     'active_session_id': self._session_id,
                     'tabs': manifest_tabs,
-                }
-                manifest_file = self._cache_dir / "sessions_manifest.json"
-                with open(manifest_file, 'w', encoding='utf-8') as f:
-                    json.dump(manifest, f, ensure_ascii=False)
+                })
+            self._session_log.flush(timeout=10.0)
         except Exception:
             pass  # atexit 中不能抛出异常
 
+    def _session_meta(self, sdata: dict) -> dict:
+        """会话日志的元数据（todo 控件可能已销毁）"""
+        todo_data = []
+        try:
+            todo_list_obj = sdata.get('todo_list')
+            todo_data = todo_list_obj.get_todos_data() if todo_list_obj else []
+        except Exception:
+            pass
+        return {
+            'context_summary': sdata.get('context_summary', ''),
+            'todo_data': todo_data,
+            'token_stats': sdata.get('token_stats', {}),
+        }
+
+    def _save_session_log(self, sid: str, sdata: dict) -> bool:
+        """提交一个会话的增量到会话日志；空会话返回 False"""
+        history = sdata.get('conversation_history', [])
+        if not history:
+            return False
+        # ★ 剥离 base64 图片以减小文件大小（只处理新增消息）
+        self._session_log.save(sid, history, self._session_meta(sdata),
+                               prepare=self._strip_images_for_cache)
+        return True
+
+    @staticmethod
+    def _manifest_entry(sid: str, tab_label: str) -> dict:
+        return {
+            'session_id': sid,
+            'tab_label': tab_label,
+            'file': f"session_{sid}.jsonl",
+        }
+
     def _save_cache(self) -> bool:
-        """自动保存：覆写同 session 文件 + manifest + cache_latest.json"""
+        """自动保存：追加当前会话增量 + 原子更新 manifest（写盘在后台线程）"""
         if not self._conversation_history:
             return False
         try:
@@ -4272,24 +4683,11 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
             self._save_current_session_state()
             # ★ 同步 tab 备份
             self._sync_tabs_backup()
-            
-            cache_data = self._build_cache_data()
-            # ★ 剥离 base64 图片以减小缓存文件大小
-            cache_data['conversation_history'] = self._strip_images_for_cache(
-                cache_data.get('conversation_history', [])
-            )
 
-            # 1. 覆写固定的 session 文件（一个 session 只有一个文件）
-            session_file = self._cache_dir / f"session_{self._session_id}.json"
-            with open(session_file, 'w', encoding='utf-8') as f:
-                json.dump(cache_data, f, ensure_ascii=False, indent=2)
-
-            # 2. 覆写 cache_latest.json（用于启动时自动恢复）
-            latest_file = self._cache_dir / "cache_latest.json"
-            with open(latest_file, 'w', encoding='utf-8') as f:
-                json.dump(cache_data, f, ensure_ascii=False, indent=2)
+            if self._session_id in self._sessions:
+                self._save_session_log(self._session_id, self._sessions[self._session_id])
 
-            # 3. 同步更新 sessions_manifest.json（确保所有 tab 信息都是最新的）
+            # 同步更新 sessions_manifest.json（确保所有 tab 信息都是最新的）
             self._update_manifest()
 
             if self._workspace_dir:
@@ -4307,34 +4705,27 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
                 sid = self.session_tabs.tabData(i)
                 if not sid:
                     continue
-                tab_label = self.session_tabs.tabText(i)
-                # 检查该 session 是否有对话文件存在
-                session_file = self._cache_dir / f"session_{sid}.json"
-                if not session_file.exists():
-                    # 检查 _sessions 字典中是否有对话
+                # 该 session 没有日志文件时，检查 _sessions 字典中是否有对话
+                if not self._session_log.has_log(sid):
                     sdata = self._sessions.get(sid, {})
-                    history = sdata.get('conversation_history', [])
-                    if not history:
+                    if not sdata.get('conversation_history'):
                         continue
-                manifest_tabs.append({
-                    'session_id': sid,
-                    'tab_label': tab_label,
-                    'file': f"session_{sid}.json",
-                })
+                manifest_tabs.append(self._manifest_entry(sid, self.session_tabs.tabText(i)))
             if manifest_tabs:
-                manifest = {
+                self._session_log.save_manifest({
                     'version': '1.0',
                     'active_session_id': self._session_id,
                     'tabs': manifest_tabs,
-                }
-                manifest_file = self._cache_dir / "sessions_manifest.json"
-                with open(manifest_file, 'w', encoding='utf-8') as f:
-                    json.dump(manifest, f, ensure_ascii=False, indent=2)
+                })
         except Exception as e:
             print(f"[Cache] 更新 manifest 失败: {e}")
 
-    def _save_all_sessions(self) -> bool:
-        """保存所有打开的会话到磁盘（关闭软件时调用）"""
+    def _save_all_sessions(self, wait: bool = False) -> bool:
+        """保存所有打开的会话到磁盘（定时器 / 关闭软件时调用）
+
+        Args:
+            wait: 是否等待后台写线程落盘（退出时为 True）
+        """
         try:
             # 先保存当前活跃会话的状态到 _sessions 字典
             self._save_current_session_state()
@@ -4342,81 +4733,25 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
             self._sync_tabs_backup()
 
             manifest_tabs = []
-            active_session_id = self._session_id
-
             for i in range(self.session_tabs.count()):
                 sid = self.session_tabs.tabData(i)
-                tab_label = self.session_tabs.tabText(i)
                 if not sid or sid not in self._sessions:
                     continue
+                if self._save_session_log(sid, self._sessions[sid]):
+                    manifest_tabs.append(self._manifest_entry(sid, self.session_tabs.tabText(i)))
+                elif self._session_log.has_log(sid):
+                    # ★ 空会话：清理其磁盘上的旧日志（防止残留）
+                    self._session_log.delete(sid)
 
-                sdata = self._sessions[sid]
-                history = sdata.get('conversation_history', [])
-                if not history:
-                    # ★ 空会话：清理其磁盘上的旧 session 文件（防止残留）
-                    try:
-                        old_file = self._cache_dir / f"session_{sid}.json"
-                        if old_file.exists():
-                            old_file.unlink()
-                    except Exception:
-                        pass
-                    continue  # 空会话不保存
-
-                # 收集 todo 数据（防御 widget 已销毁的情况）
-                todo_data = []
-                try:
-                    todo_list_obj = sdata.get('todo_list')
-                    todo_data = todo_list_obj.get_todos_data() if todo_list_obj else []
-                except (RuntimeError, AttributeError):
-                    pass
-
-                # 写 session 文件（★ 剥离 base64 图片以减小文件大小）
-                cache_data = {
+            if manifest_tabs:
+                self._session_log.save_manifest({
                     'version': '1.0',
-                    'session_id': sid,
-                    'created_at': datetime.now().isoformat(),
-                    'message_count': len(history),
-                    'conversation_history': self._strip_images_for_cache(history),
-                    'context_summary': sdata.get('context_summary', ''),
-                    'todo_data': todo_data,
-                    'token_stats': sdata.get('token_stats', {}),
-                }
-                session_file = self._cache_dir / f"session_{sid}.json"
-                with open(session_file, 'w', encoding='utf-8') as f:
-                    json.dump(cache_data, f, ensure_ascii=False, indent=2)
-
-                manifest_tabs.append({
-                    'session_id': sid,
-                    'tab_label': tab_label,
-                    'file': f"session_{sid}.json",
+                    'active_session_id': self._session_id,
+                    'tabs': manifest_tabs,
                 })
-
-            if not manifest_tabs:
-                return False
-
-            # 写 manifest 文件
-            manifest = {
-                'version': '1.0',
-                'active_session_id': active_session_id,
-                'tabs': manifest_tabs,
-            }
-            manifest_file = self._cache_dir / "sessions_manifest.json"
-            with open(manifest_file, 'w', encoding='utf-8') as f:
-                json.dump(manifest, f, ensure_ascii=False, indent=2)
-
-            # 同时维护 cache_latest.json 兼容性
-            if self._conversation_history:
-                cache_data = self._build_cache_data()
-                # ★ cache_latest 也剥离图片
-                cache_data['conversation_history'] = self._strip_images_for_cache(
-                    cache_data.get('conversation_history', [])
-                )
-                latest_file = self._cache_dir / "cache_latest.json"
-                with open(latest_file, 'w', encoding='utf-8') as f:
-                    json.dump(cache_data, f, ensure_ascii=False, indent=2)
-
-            # print(f"[Cache] 已保存 {len(manifest_tabs)} 个会话到磁盘")
-            return True
+            if wait:
+                self._session_log.flush(timeout=10.0)
+            return bool(manifest_tabs)
         except Exception as e:
             print(f"[Cache] 保存所有会话失败: {e}")
             import traceback; traceback.print_exc()
@@ -4444,12 +4779,14 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
                 sid = tab_info.get('session_id', '')
                 tab_label = tab_info.get('tab_label', 'Chat')
                 session_file = self._cache_dir / tab_info.get('file', '')
-
                 if not session_file.exists():
-                    continue
+                    # 旧版 manifest 指向 .json，日志可能已迁移为 .jsonl（反之亦然）
+                    session_file = self._session_log.session_file(sid)
+                    if session_file is None:
+                        continue
 
-                with open(session_file, 'r', encoding='utf-8') as f:
-                    cache_data = json.load(f)
+                # 逐行流式读取日志，之后的自动保存只追加增量
+                cache_data = self._session_log.load(session_file)
 
                 history = cache_data.get('conversation_history', [])
                 if not history:
@@ -4630,8 +4967,7 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
             silent: 是否静默加载（不显示确认对话框，用于工作区自动恢复）
         """
         try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cache_data = json.load(f)
+            cache_data = self._session_log.load(cache_file)
             
             # 验证数据格式
             if 'conversation_history' not in cache_data:
@@ -4781,6 +5117,7 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
         """显示加载缓存对话框"""
         cache_files = sorted(
             set(self._cache_dir.glob("session_*.json"))
+            | set(self._cache_dir.glob("session_*.jsonl"))
             | set(self._cache_dir.glob("archive_*.json"))
             | set(self._cache_dir.glob("cache_*.json")),
             key=lambda p: p.stat().st_mtime, reverse=True
@@ -4802,19 +5139,18 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
         for cache_file in cache_files:
             # 读取文件信息
             try:
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    msg_count = len(data.get('conversation_history', []))
-                    estimated_tokens = data.get('estimated_tokens', 0)
-                    created_at = data.get('created_at', '')
-                    if created_at:
-                        try:
-                            dt = datetime.fromisoformat(created_at)
-                            created_at = dt.strftime("%Y-%m-%d %H:%M:%S")
-                        except:
-                            pass
-                    token_info = f" | ~{estimated_tokens:,} tokens" if estimated_tokens else ""
-                    item_text = f"{cache_file.name}\n  {msg_count} 条消息{token_info} | {created_at}"
+                data = read_session_file(cache_file)
+                msg_count = len(data.get('conversation_history', []))
+                estimated_tokens = data.get('estimated_tokens', 0)
+                created_at = data.get('created_at', '')
+                if created_at:
+                    try:
+                        dt = datetime.fromisoformat(created_at)
+                        created_at = dt.strftime("%Y-%m-%d %H:%M:%S")
+                    except:
+                        pass
+                token_info = f" | ~{estimated_tokens:,} tokens" if estimated_tokens else ""
+                item_text = f"{cache_file.name}\n  {msg_count} 条消息{token_info} | {created_at}"
             except:
                 item_text = cache_file.name
             
@@ -4849,6 +5185,7 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
         """列出所有缓存文件"""
         cache_files = sorted(
             set(self._cache_dir.glob("session_*.json"))
+            | set(self._cache_dir.glob("session_*.jsonl"))
             | set(self._cache_dir.glob("archive_*.json"))
             | set(self._cache_dir.glob("cache_*.json")),
             key=lambda p: p.stat().st_mtime, reverse=True
@@ -4872,29 +5209,28 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
         lines = ["缓存文件列表:\n"]
         for cache_file in cache_files:
             try:
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    msg_count = len(data.get('conversation_history', []))
-                    created_at = data.get('created_at', '')
-                    session_id = data.get('session_id', '')
-                    estimated_tokens = data.get('estimated_tokens', 0)
-                    
-                    if created_at:
-                        try:
-                            dt = datetime.fromisoformat(created_at)
-                            created_at = dt.strftime("%Y-%m-%d %H:%M:%S")
-                        except:
-                            pass
-                    
-                    size_kb = cache_file.stat().st_size / 1024
-                    lines.append(f"  {cache_file.name}")
-                    lines.append(f"   会话ID: {session_id}")
-                    lines.append(f"   消息数: {msg_count}")
-                    if estimated_tokens:
-                        lines.append(f"   估算Token: ~{estimated_tokens:,}")
-                    lines.append(f"   创建时间: {created_at}")
-                    lines.append(f"   文件大小: {size_kb:.1f} KB")
-                    lines.append("")
+                data = read_session_file(cache_file)
+                msg_count = len(data.get('conversation_history', []))
+                created_at = data.get('created_at', '')
+                session_id = data.get('session_id', '')
+                estimated_tokens = data.get('estimated_tokens', 0)
+                
+                if created_at:
+                    try:
+                        dt = datetime.fromisoformat(created_at)
+                        created_at = dt.strftime("%Y-%m-%d %H:%M:%S")
+                    except:
+                        pass
+                
+                size_kb = cache_file.stat().st_size / 1024
+                lines.append(f"  {cache_file.name}")
+                lines.append(f"   会话ID: {session_id}")
+                lines.append(f"   消息数: {msg_count}")
+                if estimated_tokens:
+                    lines.append(f"   估算Token: ~{estimated_tokens:,}")
+                lines.append(f"   创建时间: {created_at}")
+                lines.append(f"   文件大小: {size_kb:.1f} KB")
+                lines.append("")
             except Exception as e:
                 lines.append(f"[err] {cache_file.name} (读取失败: {str(e)})")
                 lines.append("")
@@ -5005,18 +5341,12 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
     _CONTEXT_HEADERS = ('[Network structure]', '[Selected nodes]',
                         '[网络结构]', '[选中节点]')
 
-    # ★ 分批渲染常量（借鉴 markstream-vue 的批次策略）
-    _BATCH_INITIAL = 30      # 首批渲染最后 N 条消息（用户最近看到的）
-    _BATCH_SIZE = 15          # 后续每批渲染 N 条
-    _BATCH_BUDGET_MS = 8      # 每批时间预算（毫秒）
-
     def _render_conversation_history(self):
         """重新渲染对话历史到 UI
 
-        ★ 分批渲染策略（借鉴 markstream-vue）：
-        1. 首批渲染最后 _BATCH_INITIAL 条消息（用户最近看到的）
-        2. 用 QTimer.singleShot(0) 模拟 idle callback，逐批渲染剩余
-        3. 每批设时间预算，超出则暂停让出主线程
+        ★ 虚拟化渲染：消息按逻辑"轮次"分组后交给当前会话的 HistoryView（ui/chat_view.py），
+        只实例化视口附近的组（首次为末尾约一屏），滚动时按需实例化，远离视口的组回收为
+        占位；长会话恢复的耗时与控件数只取决于可见内容，与历史长度无关。
 
         处理三种数据格式：
         1. role="user" 中嵌入 [Network structure] / [Selected nodes] 等上下文
@@ -5026,58 +5356,27 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
         3. role="tool"（旧缓存格式）
            → 先 add_tool_call 再 set_tool_result（折叠式）
         """
-        # 清空当前显示（保留末尾 stretch）
+        # 清空当前显示（保留末尾 stretch；会话的 TodoList 移出后重新放回）
+        todo = getattr(self, 'todo_list', None)
+        keep_todo = todo is not None and self.chat_layout.indexOf(todo) >= 0
+        if keep_todo:
+            self.chat_layout.removeWidget(todo)
         while self.chat_layout.count() > 1:
             item = self.chat_layout.takeAt(0)
             if item.widget():
                 item.widget().deleteLater()
-
-        # 取消之前的分批渲染定时器
-        if hasattr(self, '_batch_render_timer') and self._batch_render_timer is not None:
-            self._batch_render_timer.stop()
-            self._batch_render_timer = None
+        self._current_response = None
 
         messages = self._conversation_history
-        if not messages:
-            return
-
-        # ★ 预扫描：将消息分组为逻辑"轮次"（每轮 = 一组相关消息）
-        groups = self._group_messages_into_turns(messages)
-        total_groups = len(groups)
-
-        if total_groups <= self._BATCH_INITIAL:
-            # 消息量小，一次性渲染
-            self._render_message_groups(groups, 0, total_groups)
-        else:
-            # ★ 分批渲染：先渲染最后 _BATCH_INITIAL 组（用户最近看到的）
-            # 早期消息用占位符
-            early_count = total_groups - self._BATCH_INITIAL
-
-            # 插入占位符
-            self._batch_placeholder = QtWidgets.QLabel(
-                f"⏳ 加载历史消息 ({early_count} 轮)..."
-            )
-            self._batch_placeholder.setObjectName("batchPlaceholder")
-            self._batch_placeholder.setStyleSheet(
-                "color: #64748b; padding: 8px 12px; font-size: 12px; "
-                "font-style: italic; background: transparent;"
-            )
-            self._batch_placeholder.setAlignment(QtCore.Qt.AlignCenter)
-            # 插入到 stretch 之前
-            self.chat_layout.insertWidget(self.chat_layout.count() - 1,
-                                         self._batch_placeholder)
-
-            # 渲染最后 _BATCH_INITIAL 组
-            self._render_message_groups(groups, early_count, total_groups)
-
-            # 用 QTimer 分批渲染早期消息
-            self._batch_groups = groups
-            self._batch_cursor = early_count  # 从 early_count 向 0 回退
-            self._batch_insert_pos = 0  # 早期消息插入到布局头部
-            self._batch_render_timer = QtCore.QTimer(self)
-            self._batch_render_timer.setSingleShot(True)
-            self._batch_render_timer.timeout.connect(self._render_next_batch)
-            self._batch_render_timer.start(0)  # 下一帧开始
+        view = self._history_view(create=bool(messages))
+        if view is not None:
+            view.reset([messages[si:ei] for si, ei in self._group_messages_into_turns(messages)]
+                       if messages else [])
+        if messages:
+            # 组按需实例化，todo 不能依赖渲染顺序恢复：先整体回放一遍
+            self._replay_history_todos(messages)
+        if keep_todo:
+            self._ensure_todo_in_chat(todo, self.chat_layout)
 
     def _group_messages_into_turns(self, messages: list) -> list:
         """将消息列表分组为逻辑轮次
@@ -5125,17 +5424,6 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
                 i += 1
         return groups
 
-    def _render_message_groups(self, groups: list, start: int, end: int):
-        """渲染 [start, end) 范围内的消息组"""
-        messages = self._conversation_history
-        for gi in range(start, end):
-            si, ei = groups[gi]
-            try:
-                self._render_single_group(messages, si, ei)
-            except Exception:
-                import traceback
-                traceback.print_exc()
-
     def _render_single_group(self, messages: list, si: int, ei: int):
         """渲染一个消息组"""
         msg = messages[si]
@@ -5188,90 +5476,93 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
             response.finalize()
             response.status_label.setText("历史摘要")
 
-    def _render_next_batch(self):
-        """分批渲染回调 — 渲染下一批早期消息（从后向前，插入到布局头部）"""
-        if not hasattr(self, '_batch_groups') or not self._batch_groups:
-            return
-        if self._batch_cursor <= 0:
-            # 全部渲染完毕，移除占位符
-            self._finish_batch_render()
-            return
-
-        batch_start = max(0, self._batch_cursor - self._BATCH_SIZE)
-        batch_end = self._batch_cursor
-        start_time = time.time()
-
-        # ★ 早期消息需要插入到占位符之前（即布局的第 0 个位置开始）
-        # 我们从 batch_start 到 batch_end 按顺序渲染，每个 widget 插入到
-        # 占位符位置之前（insert_pos 递增）
-        messages = self._conversation_history
-        insert_pos = self._batch_insert_pos  # 在此位置之前插入
-        rendered_count = 0
-
-        for gi in range(batch_start, batch_end):
-            si, ei = self._batch_groups[gi]
-            try:
-                widgets_before = self.chat_layout.count()
-                self._render_single_group(messages, si, ei)
-                widgets_after = self.chat_layout.count()
-                added = widgets_after - widgets_before
-
-                # 将新添加的 widget 移动到正确位置（占位符之前）
-                if added > 0:
-                    for _ in range(added):
-                        # 取出最后添加的 widget（在 stretch 之前）
-                        from_idx = self.chat_layout.count() - 2  # -1 是 stretch, -2 是新 widget
-                        item = self.chat_layout.takeAt(from_idx)
-                        if item and item.widget():
-                            self.chat_layout.insertWidget(insert_pos, item.widget())
-                            insert_pos += 1
-                    rendered_count += added
-            except Exception:
-                import traceback
-                traceback.print_exc()
-
-            # 时间预算检查
-            elapsed_ms = (time.time() - start_time) * 1000
-            if elapsed_ms > self._BATCH_BUDGET_MS and gi < batch_end - 1:
-                self._batch_cursor = gi + 1
-                self._batch_insert_pos = insert_pos
-                remaining = gi + 1
-                if hasattr(self, '_batch_placeholder') and self._batch_placeholder:
-                    try:
-                        self._batch_placeholder.setText(
-                            f"⏳ 加载历史消息 ({remaining} 轮)..."
-                        )
-                    except RuntimeError:
-                        pass
-                self._batch_render_timer.start(0)
-                return
-
-        self._batch_cursor = batch_start
-        self._batch_insert_pos = insert_pos
-
-        if self._batch_cursor > 0:
-            if hasattr(self, '_batch_placeholder') and self._batch_placeholder:
-                try:
-                    self._batch_placeholder.setText(
-                        f"⏳ 加载历史消息 ({self._batch_cursor} 轮)..."
-                    )
-                except RuntimeError:
-                    pass
-            self._batch_render_timer.start(0)
+    # ★ 历史组高度估算常量（像素；按默认字体与 480px 宽面板实测拟合，实例化后以实测高度为准）
+    _EST_USER_PX = 27          # 用户消息气泡（不含正文行）
+    _EST_USER_LINE_PX = 14     # 用户消息每行
+    _EST_RESPONSE_PX = 44      # AI 回复块：状态栏 + 边距
+    _EST_COLLAPSED_PX = 116    # 折叠的上下文 / 历史摘要块（整个回复块）
+    _EST_TOOL_PX = 8           # 每个工具调用（执行列表默认折叠）
+    _EST_THINKING_PX = 195     # 思考区（内容区固定高度）
+    _EST_SHELL_PX = 18         # 折叠的 Python / System Shell
+    _EST_LINE_PX = 23          # 正文每行
+    _EST_CODE_PX = 13          # 每个代码块（标题栏）
+    _EST_CODE_LINE_PX = 11     # 代码块每行
+    _EST_CHAR_PX = 7.5         # 半角字符平均宽度
+
+    def _estimate_history_group(self, msgs: list, width: int) -> int:
+        """估算一个消息组渲染后的高度（与 _render_single_group 的分支对应）"""
+        if not msgs:
+            return 0
+        msg = msgs[0]
+        role = msg.get('role', '')
+        raw_content = msg.get('content', '') or ''
+        if isinstance(raw_content, list):
+            content = '\n'.join(
+                part.get('text', '') for part in raw_content
+                if isinstance(part, dict) and part.get('type') == 'text'
+            )
         else:
-            self._finish_batch_render()
+            content = raw_content
+        cols = max(20, int((width - 48) / self._EST_CHAR_PX))
 
-    def _finish_batch_render(self):
-        """完成分批渲染，清理占位符"""
-        if hasattr(self, '_batch_placeholder') and self._batch_placeholder:
-            try:
-                self._batch_placeholder.setVisible(False)
-                self._batch_placeholder.deleteLater()
-            except RuntimeError:
-                pass
-            self._batch_placeholder = None
-        self._batch_groups = None
-        self._batch_render_timer = None
+        if role == 'user':
+            split_pos = min((p for p in (content.find(t) for t in self._CONTEXT_HEADERS) if p != -1),
+                            default=-1)
+            if split_pos >= 0 and len(content) > 300:
+                user_text = content[:split_pos].strip()
+                height = self._EST_COLLAPSED_PX
+                if user_text:
+                    height += self._EST_USER_PX + text_rows(user_text, cols) * self._EST_USER_LINE_PX
+                return height
+            return self._EST_USER_PX + text_rows(content, cols) * self._EST_USER_LINE_PX
+
+        if role == 'assistant':
+            tools = 0
+            final_msg = msg
+            if msg.get('tool_calls'):
+                final_msg = {}
+                for m in msgs:
+                    if m.get('role') != 'assistant':
+                        continue
+                    if m.get('tool_calls'):
+                        tools += sum(1 for tc in m['tool_calls']
+                                     if tc.get('function', {}).get('name') not in self._SILENT_TOOLS)
+                    else:
+                        final_msg = m
+                text = final_msg.get('content', '') or ''
+            elif content.lstrip().startswith('[工具执行结果]'):
+                lines = content.split('\n')
+                tools += sum(1 for line in lines if line.strip().startswith(self._TOOL_LINE_PREFIXES))
+                text = '\n'.join(line for line in lines[1:]
+                                 if not line.strip().startswith(self._TOOL_LINE_PREFIXES))
+            else:
+                tools += sum(1 for m in msgs[1:] if m.get('role') == 'tool')
+                text = content
+            # 正文与代码块分开估算：代码块不折行，行高更小
+            parts = text.split('```') if isinstance(text, str) else ['']
+            height = (self._EST_RESPONSE_PX + tools * self._EST_TOOL_PX
+                      + text_rows('\n'.join(parts[0::2]), cols) * self._EST_LINE_PX
+                      + (len(parts) // 2) * self._EST_CODE_PX
+                      + sum(p.count('\n') for p in parts[1::2]) * self._EST_CODE_LINE_PX)
+            if final_msg.get('thinking'):
+                height += self._EST_THINKING_PX
+            shells = len(final_msg.get('python_shells', ())) + len(final_msg.get('system_shells', ()))
+            return height + shells * self._EST_SHELL_PX
+
+        if role == 'system' and '[历史对话摘要' in content:
+            return self._EST_COLLAPSED_PX
+        return 0
+
+    def _replay_history_todos(self, messages: list):
+        """从历史中的静默工具调用（add_todo / update_todo）恢复 todo 项"""
+        for m in messages:
+            if m.get('role') != 'assistant':
+                continue
+            for tc in m.get('tool_calls') or ():
+                fn = tc.get('function', {})
+                name = fn.get('name', '')
+                if name in self._SILENT_TOOLS:
+                    self._replay_todo_from_tool_call(name, fn.get('arguments', ''))
 
     # ------------------------------------------------------------------
     def _replay_todo_from_tool_call(self, tool_name: str, arguments_str: str):
@@ -5308,7 +5599,8 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
         
         turn_msgs 格式：
           assistant(tool_calls) → tool → [assistant(tool_calls) → tool →] ... → assistant(reply)
-        静默工具（add_todo/update_todo）不显示在执行列表中，但会恢复 todo 数据。
+        静默工具（add_todo/update_todo）不显示在执行列表中，
+        其 todo 数据由 _replay_history_todos 统一恢复。
         """
         response = self._add_ai_response()
         tool_count = 0
@@ -5325,9 +5617,8 @@ SideFX Labs Node Usage Rules (MUST follow strictly):
                     for tc in tc_list:
                         fn = tc.get('function', {})
                         name = fn.get('name', 'unknown')
-                        # 静默工具：恢复 todo 但不显示在执行列表
+                        # 静默工具：不显示在执行列表
                         if name in self._SILENT_TOOLS:
-                            self._replay_todo_from_tool_call(name, fn.get('arguments', ''))
                             continue
                         response.add_status(f"[tool]{name}")
                         tool_count += 1
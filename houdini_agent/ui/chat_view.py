@@ -6,8 +6,14 @@ Chat View — 对话显示和滚动逻辑
 - 对话区域消息添加
 - 滚动控制
 - Toast 消息显示
+- 历史消息虚拟化（HistoryView：只实例化视口附近的消息组）
 """
 
+import time
+import bisect
+import itertools
+import traceback
+
 from houdini_agent.qt_compat import QtWidgets, QtCore, QtGui
 from .cursor_widgets import (
     UserMessage,
@@ -17,9 +23,300 @@ from .cursor_widgets import (
 )
 
 
+# ============================================================
+# 历史消息虚拟化
+# ============================================================
+
+def text_rows(text: str, cols: int) -> int:
+    """估算 text 在每行 cols 个半角字符宽度下折行后的行数（全角字符按 2 列计）"""
+    if not text:
+        return 0
+    rows = 0
+    for line in text.split('\n'):
+        # UTF-8 下 ASCII 1 字节、CJK 3 字节：(字节数 + 字符数) / 2 ≈ 显示列数
+        width = (len(line.encode('utf-8', 'ignore')) + len(line)) // 2
+        rows += max(1, -(-width // cols))
+    return rows
+
+
+class HistoryView(QtCore.QObject):
+    """会话历史的虚拟化窗口：只实例化视口附近的消息组
+
+    chat_layout 结构::
+
+        [上占位] [已实例化的组 lo..hi) [下占位] [实时消息 / TodoList ...] [stretch]
+
+    占位控件的高度 = 窗口外各组高度之和；组高度先按内容估算，实例化后按实际几何尺寸
+    测量并缓存（视口宽度变化时重新测量）。滚动时保证可见组已实例化，按时间预算预加载
+    上下各 PRELOAD_SCREENS 屏，离开视口超过 KEEP_SCREENS 屏的组销毁并折回占位。
+    在视口上方增删内容时以可见控件为锚点修正滚动位置，画面不跳动。
+
+    Args:
+        scroll_area: 会话的 QScrollArea（同时作为 parent，随会话一起销毁）
+        layout: 会话的 chat_layout
+        render: render(view, msgs) -> [QWidget]，渲染一个消息组并返回其顶层控件（已从布局取出）
+        estimate: estimate(msgs, width) -> int，估算消息组在给定视口宽度下的高度
+    """
+
+    PRELOAD_SCREENS = 1.0
+    KEEP_SCREENS = 2.0
+    BUDGET_MS = 8             # 每次同步预加载的时间预算（可见组不受限）
+    DEFAULT_VIEWPORT = (480, 600)   # 会话尚未显示时按此视口估算
+
+    def __init__(self, scroll_area, layout, render, estimate):
+        super().__init__(scroll_area)
+        self.setObjectName("chatHistoryView")
+        self.scroll_area = scroll_area
+        self.layout = layout
+        self.container = layout.parentWidget()
+        self._render = render
+        self._estimate = estimate
+        self._groups: list = []
+        self._heights: list = []
+        self._measured: list = []
+        self._widgets: dict = {}       # 组序号 → 顶层控件列表
+        self._lo = self._hi = 0
+        self._top = self._bottom = None
+        self._width = 0
+        self._pin_bottom = False
+        self.stats = {'materialized': 0, 'recycled': 0, 'syncs': 0}
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self._sync)
+        scroll_area.verticalScrollBar().valueChanged.connect(self.schedule)
+        scroll_area.viewport().installEventFilter(self)
+
+    # ----------------------------------------------------------
+    # 公共接口
+    # ----------------------------------------------------------
+
+    def reset(self, groups: list):
+        """替换为新的历史（调用方已清空布局）；先同步实例化末尾约一屏，再滚动到底部"""
+        self._timer.stop()
+        self._widgets = {}
+        self._top = self._bottom = None
+        self._groups = list(groups)
+        n = len(self._groups)
+        self._lo = self._hi = n
+        if not n:
+            self._heights, self._measured = [], []
+            return
+        width, height = self._viewport_size()
+        self._width = width
+        self._heights = [max(0, int(self._estimate(msgs, width))) for msgs in self._groups]
+        self._measured = [False] * n
+        self._top = self._make_spacer()
+        self._bottom = self._make_spacer()
+        self.layout.insertWidget(0, self._top)
+        self.layout.insertWidget(1, self._bottom)
+        # 首屏：从末尾向前实例化，直到估算高度覆盖一屏
+        filled = 0
+        while self._lo > 0 and filled < height:
+            self._lo -= 1
+            self._place(self._lo, self._materialize(self._lo), top=True)
+            filled += self._heights[self._lo]
+        self._update_spacers()
+        self._pin_bottom = True
+        self.schedule()
+
+    def materialized(self) -> int:
+        """当前已实例化的组数"""
+        return self._hi - self._lo
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    def schedule(self, *_):
+        if self._groups and not self._timer.isActive():
+            self._timer.start()
+
+    def eventFilter(self, obj, event):
+        if event.type() in (QtCore.QEvent.Resize, QtCore.QEvent.Show):
+            self.schedule()
+        return False
+
+    # ----------------------------------------------------------
+    # 实例化 / 回收
+    # ----------------------------------------------------------
+
+    def _make_spacer(self) -> QtWidgets.QWidget:
+        spacer = QtWidgets.QWidget(self.container)
+        spacer.setObjectName("historySpacer")
+        spacer.setAttribute(QtCore.Qt.WA_TransparentForMouseEvents)
+        spacer.setFixedHeight(0)
+        spacer.hide()
+        return spacer
+
+    def _viewport_size(self):
+        vp = self.scroll_area.viewport()
+        if self.scroll_area.isVisible() and vp.width() > 0 and vp.height() > 0:
+            return vp.width(), vp.height()
+        return self.DEFAULT_VIEWPORT
+
+    def _materialize(self, gi: int) -> list:
+        widgets = self._render(self, self._groups[gi]) or []
+        self._widgets[gi] = widgets
+        self.stats['materialized'] += 1
+        return widgets
+
+    def _place(self, gi: int, widgets: list, top: bool):
+        """把组 gi 的控件插入到窗口顶部（上占位之后）或底部（下占位之前）"""
+        idx = 1 if top else self.layout.indexOf(self._bottom)
+        for w in widgets:
+            self.layout.insertWidget(idx, w)
+            if not w.testAttribute(QtCore.Qt.WA_WState_ExplicitShowHide):
+                w.show()
+            idx += 1
+
+    def _recycle(self, gi: int):
+        for w in self._widgets.pop(gi, ()):
+            self.layout.removeWidget(w)
+            w.hide()
+            w.deleteLater()
+        self.stats['recycled'] += 1
+
+    def _update_spacers(self):
+        spacing = max(0, self.layout.spacing())
+        for spacer, total in ((self._top, sum(self._heights[:self._lo])),
+                              (self._bottom, sum(self._heights[self._hi:]))):
+            spacer.setFixedHeight(max(0, total - spacing))
+            spacer.setVisible(total > 0)
+
+    def _measure(self):
+        """按实际几何尺寸更新已实例化组的高度缓存"""
+        spacing = max(0, self.layout.spacing())
+        for gi in range(self._lo, self._hi):
+            shown = [w for w in self._widgets.get(gi, ()) if not w.isHidden()]
+            if shown:
+                h = shown[-1].geometry().bottom() + 1 - shown[0].geometry().top() + spacing
+            else:
+                h = 0
+            self._heights[gi] = h
+            self._measured[gi] = True
+
+    def _settle(self):
+        """处理挂起的布局请求，使新插入控件的几何尺寸与滚动范围生效"""
+        for _ in range(3):
+            QtCore.QCoreApplication.sendPostedEvents(None, QtCore.QEvent.LayoutRequest)
+
+    # ----------------------------------------------------------
+    # 同步窗口
+    # ----------------------------------------------------------
+
+    def _sync(self):
+        if not self._groups or not self.scroll_area.isVisible():
+            return
+        try:
+            self._sync_window()
+        except RuntimeError:
+            # 布局已被外部清空（控件已销毁），放弃当前窗口
+            self._groups = []
+            self._widgets = {}
+
+    def _sync_window(self):
+        self.stats['syncs'] += 1
+        self._settle()
+        vp = self.scroll_area.viewport()
+        width, vh = vp.width(), max(1, vp.height())
+        if width != self._width:
+            # 宽度变化：窗口外的测量值作废，重新按估算（实例化后再测）
+            self._width = width
+            for gi in range(len(self._groups)):
+                if self._measured[gi] and not (self._lo <= gi < self._hi):
+                    self._heights[gi] = max(0, int(self._estimate(self._groups[gi], width)))
+                    self._measured[gi] = False
+        self._measure()
+        self._update_spacers()
+        self._settle()
+
+        sb = self.scroll_area.verticalScrollBar()
+        if self._pin_bottom:
+            sb.setValue(sb.maximum())
+        v = sb.value()
+        n = len(self._groups)
+        offs = list(itertools.accumulate(self._heights, initial=self.layout.contentsMargins().top()))
+
+        def at(y):
+            return min(n, max(0, bisect.bisect_right(offs, y) - 1))
+
+        vis_lo, vis_hi = at(v), min(n, at(v + vh) + 1)
+        keep_lo, keep_hi = at(v - self.KEEP_SCREENS * vh), min(n, at(v + vh + self.KEEP_SCREENS * vh) + 1)
+        pre_lo, pre_hi = at(v - self.PRELOAD_SCREENS * vh), min(n, at(v + vh + self.PRELOAD_SCREENS * vh) + 1)
+
+        # 锚点：视口内第一个已实例化的控件
+        anchor = None
+        for gi in range(max(self._lo, vis_lo), min(self._hi, vis_hi)):
+            for w in self._widgets.get(gi, ()):
+                if not w.isHidden() and w.geometry().bottom() >= v:
+                    anchor = (w, w.y() - v)
+                    break
+            if anchor:
+                break
+
+        changed = False
+        # 1. 回收超出保留范围的组；窗口与可见区不相邻（跳转）时整体回收
+        if self._hi < vis_lo or self._lo > vis_hi:
+            keep_lo = keep_hi = vis_lo
+        while self._lo < self._hi and self._lo < keep_lo:
+            self._recycle(self._lo)
+            self._lo += 1
+            changed = True
+        while self._hi > self._lo and self._hi > keep_hi:
+            self._hi -= 1
+            self._recycle(self._hi)
+            changed = True
+        if self._lo == self._hi:
+            self._lo = self._hi = vis_lo
+
+        # 2. 可见组必须实例化
+        while self._hi < vis_hi:
+            self._place(self._hi, self._materialize(self._hi), top=False)
+            self._hi += 1
+            changed = True
+        while self._lo > vis_lo:
+            self._lo -= 1
+            self._place(self._lo, self._materialize(self._lo), top=True)
+            changed = True
+
+        # 3. 按时间预算预加载上下各一屏（先下后上交替）
+        deadline = time.perf_counter() + self.BUDGET_MS / 1000.0
+        while (self._hi < pre_hi or self._lo > pre_lo) and time.perf_counter() < deadline:
+            if self._hi < pre_hi:
+                self._place(self._hi, self._materialize(self._hi), top=False)
+                self._hi += 1
+            if self._lo > pre_lo:
+                self._lo -= 1
+                self._place(self._lo, self._materialize(self._lo), top=True)
+            changed = True
+        pending = self._hi < pre_hi or self._lo > pre_lo
+
+        if changed:
+            self._update_spacers()
+            self._settle()
+            self._measure()
+            self._update_spacers()
+            self._settle()
+            if self._pin_bottom:
+                sb.setValue(sb.maximum())
+            elif anchor is not None:
+                w, off = anchor
+                try:
+                    sb.setValue(w.y() - off)
+                except RuntimeError:
+                    pass
+        if pending:
+            self._timer.start()
+        elif self._pin_bottom and not changed:
+            self._pin_bottom = False
+
+
 class ChatViewMixin:
     """对话显示、滚动逻辑"""
 
+    _history_rendering = False   # HistoryView 实例化历史组期间屏蔽自动滚动
+
     def _add_user_message(self, text: str, images: list = None):
         """添加用户消息（可含图片缩略图，点击可放大）"""
         msg = UserMessage(text, self.chat_container)
@@ -63,6 +360,8 @@ class ChatViewMixin:
         Args:
             force: 强制滚动（用于新消息）
         """
+        if self._history_rendering:
+            return
         if force or not self._is_user_scrolled_up():
             # 节流：如果已有待执行的滚动定时器，跳过本次
             if not hasattr(self, '_scroll_timer'):
@@ -103,3 +402,39 @@ class ChatViewMixin:
             except RuntimeError:
                 pass
         QtCore.QTimer.singleShot(duration_ms, _remove)
+
+    # ---------- 历史虚拟化 ----------
+
+    def _history_view(self, create: bool = False):
+        """当前会话 scroll_area 上的 HistoryView；create=True 时按需创建"""
+        view = self.scroll_area.findChild(HistoryView, "chatHistoryView")
+        if view is None and create:
+            view = HistoryView(self.scroll_area, self.chat_layout,
+                               self._render_history_group, self._estimate_history_group)
+        return view
+
+    def _render_history_group(self, view: HistoryView, msgs: list) -> list:
+        """在 view 所属会话中渲染一个历史消息组，返回新建的顶层控件（已从布局取出）
+
+        view 可能属于后台会话：渲染期间临时切换到它的布局，并屏蔽自动滚动；
+        历史控件不会成为 _current_response。
+        """
+        saved = (self.scroll_area, self.chat_container, self.chat_layout, self._current_response)
+        self.scroll_area, self.chat_container, self.chat_layout = view.scroll_area, view.container, view.layout
+        self._history_rendering = True
+        layout = view.layout
+        start = layout.count() - 1   # 渲染的控件插在末尾 stretch 之前
+        try:
+            self._render_single_group(msgs, 0, len(msgs))
+        except Exception:
+            traceback.print_exc()
+        finally:
+            self.scroll_area, self.chat_container, self.chat_layout, self._current_response = saved
+            self._history_rendering = False
+        widgets = [layout.itemAt(i).widget() for i in range(start, layout.count() - 1)]
+        widgets = [w for w in widgets if w is not None]
+        # 用 removeWidget 而不是 takeAt：takeAt 取出的 QLayoutItem 由 Python 持有，仍登记为
+        # 控件的布局项，重新插入后新布局项收不到 updateGeometry，尺寸缓存会停留在旧值
+        for w in widgets:
+            layout.removeWidget(w)
+        return widgets
@@ -10,6 +10,7 @@ from datetime import datetime
 from typing import Optional, List, Dict
 import html
 import re
+import math
 import time
 
 from .i18n import tr
@@ -98,10 +99,13 @@ class AuroraBar(QtWidgets.QWidget):
         self.update()
 
     def stop(self):
-        """停止流光动画，收缩为零宽度以保持卡片干净"""
+        """停止流光动画，凝固为极淡银灰色
+
+        保持 3px 宽度：收缩会让右侧内容变宽，已冻结的富文本段全部按新宽度重新排版，
+        长回复结束时卡住界面。
+        """
         self._active = False
         self._timer.stop()
-        self.setFixedWidth(0)
         self.update()
 
     @property
@@ -952,6 +956,219 @@ class UserMessage(QtWidgets.QWidget):
             self._apply_expanded()
 
 
+# ============================================================
+# 流式 Markdown 分块（增量冻结）
+# ============================================================
+
+class MarkdownStreamFreezer:
+    """流式 Markdown 分块器：只扫描新到达的文本，找出可以冻结的完整块
+
+    跨 delta 保存扫描状态（当前未完成的行、围栏状态、自上次冻结以来是否有内容），
+    每个字符只被扫描一次；冻结边界：
+    - 代码块: ``` 开启 → ``` 关闭，关闭行完整到达后整个代码块（连同其前的文本）冻结
+    - 文本段落: 围栏外的空行，且空行之前有实质内容
+    - 长表格 / 长代码块: 每 TABLE_CHUNK_ROWS 行 / CODE_CHUNK_LINES 行冻结一段，
+      单个富文本控件的首次排版耗时随行数线性增长，整张大表一次冻结会卡住事件循环数秒
+
+    feed(text) 返回本次新冻结的块 [(kind, text)]（可能为空），kind：
+    - 'text'       : 普通块（可含完整的短代码块 / 短表格）
+    - 'table'      : 长表格的第一段（表头 + 分隔行 + 数据行）
+    - 'table_rows' : 长表格的后续数据行
+    - 'code'       : 长代码块的第一段（开启围栏 + 代码行）
+    - 'code_lines' : 长代码块的后续代码行（最后一段含关闭围栏）
+    pending 为尚未冻结的尾部文本，flush() 取出并按当前状态标注类型。
+    """
+
+    TABLE_CHUNK_ROWS = 16
+    CODE_CHUNK_LINES = 60
+
+    def __init__(self):
+        self._parts: List[str] = []     # 尚未冻结的文本片段（冻结时才拼接）
+        self._line = ""                 # 当前未完成的行
+        self._pos = 0                   # 已扫描到的位置（相对未冻结文本开头）
+        self._has_content = False       # 上次冻结以来是否出现过非空行
+        self._prev_line = ""            # 上一个完整行（识别表头）
+        self._prev_start = 0            # 上一个完整行的开始位置
+        self._block_start = 0           # 当前表格 / 代码块的开始位置（表头行 / 开启围栏行）
+        self._rows = 0                  # 当前表格 / 代码块自上次冻结以来的行数
+        self._in_table = False
+        self._chunked = False           # 当前表格 / 代码块是否已分段冻结过
+        self.in_code_fence = False
+        self.code_fence_lang = ""
+
+    @property
+    def pending(self) -> str:
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    def feed(self, text: str) -> List[tuple]:
+        """追加一段 delta，返回新冻结的块 [(kind, text)]"""
+        if not text:
+            return []
+        self._parts.append(text)
+        blocks: List[tuple] = []
+        start = 0
+        nl = text.find('\n')
+        while nl >= 0:
+            line = self._line + text[start:nl] if self._line else text[start:nl]
+            self._line = ""
+            line_start = self._pos
+            self._pos += len(line) + 1
+            self._scan_line(line, line_start, blocks)
+            self._prev_line, self._prev_start = line, self._pos - len(line) - 1  # 冻结后位置已平移
+            start = nl + 1
+            nl = text.find('\n', start)
+        if start < len(text):
+            self._line += text[start:]
+        return blocks
+
+    def flush(self) -> tuple:
+        """取出尚未冻结的尾部 (kind, text)；回复结束时调用"""
+        kind = 'text'
+        if self._chunked:
+            kind = 'code_lines' if self.in_code_fence else 'table_rows'
+        pending = self.pending
+        self._parts, self._line, self._pos = [], "", 0
+        return kind, pending
+
+    def _scan_line(self, line: str, line_start: int, blocks: list):
+        """处理一个完整行，可冻结的块追加到 blocks"""
+        stripped = line.strip()
+        if self.in_code_fence:
+            if stripped.startswith('```'):
+                self.in_code_fence = False
+                # 冻结到关闭围栏（含），去掉其后的换行
+                self._emit(blocks, 'code_lines' if self._chunked else 'text', self._pos - 1, self._pos)
+                self._chunked = False
+                return
+            self._rows += 1
+            if self._rows >= self.CODE_CHUNK_LINES:
+                self._emit_chunk(blocks, 'code', 'code_lines')
+            return
+        was_table = self._in_table
+        if was_table:
+            if stripped and '|' in stripped:
+                self._rows += 1
+                if self._rows >= self.TABLE_CHUNK_ROWS:
+                    self._emit_chunk(blocks, 'table', 'table_rows')
+                return
+            self._in_table = False
+            if self._chunked:
+                # 表格结束：剩余数据行单独冻结；空行丢弃，其他行留给后续块
+                self._chunked = False
+                if not stripped:
+                    self._emit(blocks, 'table_rows', line_start, self._pos)
+                    return
+                self._emit(blocks, 'table_rows', line_start, line_start)
+                line_start = 0
+        if stripped.startswith('```'):
+            self.in_code_fence = True
+            self.code_fence_lang = stripped[3:].strip()
+            self._block_start, self._rows = line_start, 0
+            self._has_content = True
+            return
+        if not stripped:
+            if self._has_content:
+                self._emit(blocks, 'text', line_start, self._pos)   # 冻结到空行之前，空行本身丢弃
+            return
+        if not was_table and '|' in self._prev_line and SimpleMarkdown._TABLE_SEP_RE.match(stripped):
+            self._in_table = True
+            self._block_start, self._rows = self._prev_start, 0
+        self._has_content = True
+
+    def _emit_chunk(self, blocks: list, first_kind: str, next_kind: str):
+        """长表格 / 长代码块冻结一段（到当前行末尾）；第一段之前的文本先单独冻结"""
+        if self._chunked:
+            self._emit(blocks, next_kind, self._pos - 1, self._pos)
+        else:
+            self._chunked = True
+            self._emit(blocks, 'text', self._block_start, self._block_start)
+            self._emit(blocks, first_kind, self._pos - 1, self._pos)
+        self._rows = 0
+
+    def _emit(self, blocks: list, kind: str, end: int, rest: int):
+        block = self._cut(end, rest)
+        if block.strip():
+            blocks.append((kind, block))
+
+    def _cut(self, end: int, rest: int) -> str:
+        pending = self.pending
+        block = pending[:end].rstrip('\n')
+        remaining = pending[rest:]
+        self._parts = [remaining] if remaining else []
+        self._pos -= rest
+        self._block_start -= rest
+        self._has_content = False
+        return block
+
+
+class FrozenRichLabel(QtWidgets.QLabel):
+    """冻结段富文本标签 — 缓存 heightForWidth
+
+    QLabel 每次布局都会重新排版整段富文本，大表格冻结后，活跃区域每长一行
+    都会触发一次完整排版；冻结内容不再变化，按宽度缓存即可。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._hfw_cache = {}
+
+    def setText(self, text):
+        self._hfw_cache.clear()
+        super().setText(text)
+
+    def heightForWidth(self, width):
+        h = self._hfw_cache.get(width)
+        if h is None:
+            if len(self._hfw_cache) > 8:
+                self._hfw_cache.clear()
+            h = self._hfw_cache[width] = super().heightForWidth(width)
+        return h
+
+    def changeEvent(self, event):
+        if event.type() in (QtCore.QEvent.FontChange, QtCore.QEvent.StyleChange):
+            self._hfw_cache.clear()
+        super().changeEvent(event)
+
+
+class FrozenTableChunk(QtWidgets.QTextBrowser):
+    """长表格分段 — 只读 QTextBrowser，高度跟随文档
+
+    QLabel 的 sizeHint / minimumSizeHint / heightForWidth 各自重新排版一遍富文本，
+    表格每行的冻结成本是文档单次排版的数倍；长表格分段冻结时直接用文档排版，
+    只在宽度变化时重新排版一次。
+    """
+
+    linkActivated = QtCore.Signal(str)
+
+    def __init__(self, rich_html: str, parent=None):
+        super().__init__(parent)
+        self.setObjectName("richTable")
+        self.setFrameShape(QtWidgets.QFrame.NoFrame)
+        self.setVerticalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
+        self.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
+        self.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Fixed)
+        self.setTextInteractionFlags(
+            QtCore.Qt.TextSelectableByMouse
+            | QtCore.Qt.LinksAccessibleByMouse
+        )
+        self.setOpenLinks(False)
+        self.anchorClicked.connect(lambda url: self.linkActivated.emit(url.toString()))
+        self.document().setDocumentMargin(0)
+        self.setHtml(rich_html)
+        self._layout_width = -1
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        width = self.viewport().width()
+        if width != self._layout_width:
+            self._layout_width = width
+            doc = self.document()
+            doc.setTextWidth(width)
+            self.setFixedHeight(math.ceil(doc.size().height()))
+
+
 # ============================================================
 # AI 回复块（重构版）
 # ============================================================
@@ -971,16 +1188,16 @@ class AIResponse(QtWidgets.QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self._start_time = time.time()
-        self._content = ""
+        self._content_parts: List[str] = []  # 完整回复文本（按 delta 分片，读取时拼接）
         self._has_thinking = False
         self._has_execution = False
         self._shell_count = 0  # Python Shell 执行计数
         
         # ★ 增量渲染状态
         self._frozen_segments: list = []    # 已冻结的富文本段落
-        self._pending_text = ""             # 尚未冻结的尾部文本
-        self._in_code_fence = False         # 是否在代码块内
-        self._code_fence_lang = ""          # 代码块语言
+        self._freezer = MarkdownStreamFreezer()  # 跨 delta 保存扫描状态；pending 为尚未冻结的尾部
+        self._stream_table_columns = None   # 分段冻结中的长表格列定义（对齐方式 + 列宽）
+        self._stream_code_block = None      # 分段冻结中的长代码块（后续行追加到同一控件）
         self._incremental_enabled = True    # 是否启用增量渲染
         
         # ★ 顶层水平布局：AuroraBar（左）+ 内容（右）
@@ -1089,6 +1306,8 @@ class AIResponse(QtWidgets.QWidget):
         # 使用与 line-height 一致的行高计算
         fm = QtGui.QFontMetrics(_stream_font)
         self._content_line_h = int(fm.height() * 1.6)
+        # QPlainTextEdit 不应用 block lineHeight，实际每个视觉行高为向上取整的 lineSpacing
+        self._content_line_px = math.ceil(QtGui.QFontMetricsF(_stream_font).lineSpacing())
         self.content_label.setFixedHeight(self._content_line_h + 4)
         self.content_label.document().contentsChanged.connect(self._auto_resize_content)
         self._summary_layout.addWidget(self.content_label)
@@ -1171,16 +1390,14 @@ class AIResponse(QtWidgets.QWidget):
         cursor.mergeBlockFormat(fmt)
 
     def _auto_resize_content(self):
-        """根据 document 的实际渲染高度动态调整 QPlainTextEdit 的高度。
+        """根据活跃区域的视觉行数动态调整 QPlainTextEdit 的高度。
         
-        使用 doc.size().height() 获取已布局的真实像素高度，
-        加上一个小的底部边距作为最终高度。
+        QPlainTextDocumentLayout 的 documentSize().height() 是视觉行数（由布局增量维护），
+        乘以单行像素高度即为内容高度；不调用 doc.adjustSize()，避免每个 delta 重新布局整篇文档。
         """
         doc = self.content_label.document()
-        # 确保布局信息是最新的
-        doc.adjustSize()
-        doc_height = int(doc.size().height())
-        target = doc_height + 4  # 底部留 4px 余量
+        lines = int(doc.documentLayout().documentSize().height())
+        target = lines * self._content_line_px + 4  # 底部留 4px 余量
         min_h = self._content_line_h + 4
         target = max(target, min_h)
         current_h = self.content_label.height()
@@ -1191,95 +1408,78 @@ class AIResponse(QtWidgets.QWidget):
         """追加内容（流式场景高频调用，需要高效）
         
         ★ 增量渲染策略（借鉴 markstream-vue）：
-        1. 文本追加到 _pending_text
-        2. 检查是否有已完成的段落（双换行分隔 / 代码块闭合）
-        3. 已完成段落冻结为 RichText Widget，不再变动
-        4. 不完整的尾部保留在 QPlainTextEdit 中继续接收 delta
+        1. delta 交给 MarkdownStreamFreezer，只扫描新到达的文本
+        2. 已完成段落（空行分隔 / 代码块闭合）冻结为 RichText Widget，不再变动；
+           长表格 / 长代码块按固定行数分段冻结，单次排版耗时有上限
+        3. 未冻结的尾部保留在 QPlainTextEdit 中：没有冻结时用光标在文档末尾追加，
+           不再每个 delta 重置整个文档；发生冻结时只用剩余的短尾部重建活跃区域
         """
-        if not text.strip():
-            return
+        if not self._content_parts and not text.strip():
+            return  # 回复开头的纯空白不显示；之后的换行 chunk 是段落边界，需要保留
         # 清除 U+FFFD 替换符（encoding 异常残留）
         if '\ufffd' in text:
             text = text.replace('\ufffd', '')
-        self._content += text
-        self._pending_text += text
-
-        # 尝试冻结已完成的段落
-        if self._incremental_enabled:
-            self._try_freeze_completed()
-
-        # 更新活跃区域显示（只显示未冻结的文本）
-        self.content_label.setPlainText(self._pending_text)
-        # setPlainText 会重置 block format，需要重新应用行间距
-        self._apply_line_spacing(160)
-        # 光标移到末尾
+            if not text:
+                return
+        self._content_parts.append(text)
+
+        blocks = self._freezer.feed(text) if self._incremental_enabled else ()
+        for kind, block in blocks:
+            self._freeze_block(kind, block)
+        if blocks:
+            # 活跃区域只保留冻结点之后的尾部（通常只是半行）
+            self.content_label.setPlainText(self._freezer.pending)
+            # setPlainText 会重置 block format，需要重新应用行间距
+            self._apply_line_spacing(160)
+        else:
+            self._append_live_text(text)
+
+    @property
+    def _content(self) -> str:
+        """完整回复文本"""
+        if len(self._content_parts) > 1:
+            self._content_parts = ["".join(self._content_parts)]
+        return self._content_parts[0] if self._content_parts else ""
+
+    @_content.setter
+    def _content(self, text: str):
+        self._content_parts = [text] if text else []
+
+    def _append_live_text(self, text: str):
+        """在活跃区域文档末尾追加文本（新块继承当前块的行间距格式）"""
         cursor = self.content_label.textCursor()
         cursor.movePosition(QtGui.QTextCursor.End)
+        cursor.insertText(text)
         self.content_label.setTextCursor(cursor)
 
-    def _try_freeze_completed(self):
-        """检测并冻结已完成的段落
-        
-        检测规则：
-        - 代码块: ``` 开启 → ``` 关闭，闭合后整个代码块冻结
-        - 文本段落: 两个连续换行 (\n\n) 分隔的文本段落冻结
-        """
-        text = self._pending_text
-        if not text:
+    def _freeze_block(self, kind: str, text: str):
+        """冻结 MarkdownStreamFreezer 产出的一块（kind 见 MarkdownStreamFreezer）"""
+        if kind == 'text':
+            self._freeze_text(text)
             return
-
-        # 按行扫描，寻找可冻结的边界
-        lines = text.split('\n')
-        freeze_up_to = -1  # 冻结到第几行（不含）
-        i = 0
-        in_fence = self._in_code_fence
-
-        while i < len(lines):
-            line = lines[i]
-            stripped = line.strip()
-
-            if in_fence:
-                # 在代码块内，检查关闭围栏
-                if stripped.startswith('```'):
-                    in_fence = False
-                    # 代码块结束 → 可冻结到此行（含）
-                    freeze_up_to = i + 1
-                i += 1
-                continue
-
-            # 检查代码块开启
-            if stripped.startswith('```'):
-                # 如果之前有未冻结的文本段落，先冻结它们
-                if i > 0 and freeze_up_to < i:
-                    # 检查代码块之前是否有空行分隔
-                    pass
-                in_fence = True
-                self._code_fence_lang = stripped[3:].strip()
-                i += 1
-                continue
-
-            # 检查双换行分隔（空行）
-            if not stripped:
-                # 空行 → 如果之前有内容，可以冻结到上一个非空行
-                if i > 0 and freeze_up_to < i:
-                    # 找到一个段落边界
-                    # 但只有在空行之前有实质内容时才冻结
-                    has_content_before = any(lines[j].strip() for j in range(max(0, freeze_up_to + 1 if freeze_up_to >= 0 else 0), i))
-                    if has_content_before:
-                        freeze_up_to = i  # 冻结到空行（含空行）
-            i += 1
-
-        self._in_code_fence = in_fence
-
-        # 执行冻结
-        if freeze_up_to > 0 and not in_fence:
-            frozen_text = '\n'.join(lines[:freeze_up_to])
-            remaining_text = '\n'.join(lines[freeze_up_to:])
-
-            if frozen_text.strip():
-                self._freeze_text(frozen_text)
-
-            self._pending_text = remaining_text
+        if kind in ('table', 'table_rows'):
+            if kind == 'table':
+                self._stream_table_columns = None
+            table_html, self._stream_table_columns = SimpleMarkdown.parse_table_chunk(
+                text, self._stream_table_columns)
+            chunk = FrozenTableChunk(table_html)
+            chunk.linkActivated.connect(self._on_link_activated)
+            self._frozen_layout.addWidget(chunk)
+        elif kind == 'code':
+            first, _, code = text.partition('\n')
+            cb = CodeBlockWidget(code, first.strip()[3:].strip(), self)
+            cb.createWrangleRequested.connect(self.createWrangleRequested.emit)
+            cb.setContentsMargins(0, 6, 0, 6)
+            self._frozen_layout.addWidget(cb)
+            self._stream_code_block = cb
+        else:
+            code, _, last = text.rpartition('\n')
+            if not last.strip().startswith('```'):
+                code = text                     # 只有最后一段带关闭围栏
+            self._stream_code_block.append_code(code)
+        if not self._frozen_container.isVisible():
+            self._frozen_container.setVisible(True)
+        self._frozen_segments.append(text)
 
     def _freeze_text(self, text: str):
         """将一段文本冻结为富文本 Widget"""
@@ -1288,7 +1488,7 @@ class AIResponse(QtWidgets.QWidget):
 
         for seg in segments:
             if seg[0] == 'text':
-                lbl = QtWidgets.QLabel()
+                lbl = FrozenRichLabel()
                 lbl.setWordWrap(True)
                 lbl.setTextFormat(QtCore.Qt.RichText)
                 lbl.setOpenExternalLinks(False)
@@ -1330,7 +1530,7 @@ class AIResponse(QtWidgets.QWidget):
         ★ 直接渲染为富文本，避免历史恢复时也出现跳变。
         """
         self._content = text
-        self._pending_text = ""
+        self._freezer = MarkdownStreamFreezer()
         self._incremental_enabled = False
         
         content = self._clean_content(text)
@@ -1392,7 +1592,7 @@ class AIResponse(QtWidgets.QWidget):
         """完成回复 - 提取最终总结
         
         ★ 增量渲染模式下，大部分段落已经冻结为 Widget，
-        finalize 只需处理最后的 _pending_text 尾部残留。
+        finalize 只需处理最后未冻结的尾部残留。
         """
         # ★ 停止流光边框
         self.aurora_bar.stop()
@@ -1437,11 +1637,12 @@ class AIResponse(QtWidgets.QWidget):
             self.content_label.style().unpolish(self.content_label)
             self.content_label.style().polish(self.content_label)
         elif self._frozen_segments:
-            # 增量模式：已有冻结段落，只需处理 pending 尾部
-            remaining = self._clean_content(self._pending_text)
-            if remaining:
+            # 增量模式：已有冻结段落，只需处理 pending 尾部（可能是长表格 / 长代码块的最后一段）
+            kind, remaining = self._freezer.flush()
+            remaining = self._clean_content(remaining) if kind == 'text' else remaining.strip('\n')
+            if remaining.strip():
                 # ★ 始终将残余文本冻结为富文本，避免 finalize 时的跳变
-                self._freeze_text(remaining)
+                self._freeze_block(kind, remaining)
                 self.content_label.setVisible(False)
             else:
                 # 没有残余文本，隐藏 QPlainTextEdit
@@ -2322,15 +2523,55 @@ class SimpleMarkdown:
     @classmethod
     def _parse_table(cls, lines: list, start: int) -> tuple:
         """解析 Markdown 表格，返回 (html, next_line_index)"""
-        header_line = lines[start].strip()
         if start + 1 >= len(lines):
             return None
-        sep_line = lines[start + 1].strip()
+        headers = cls._split_row(lines[start])
+        aligns = cls._table_aligns(lines[start + 1])
+
+        # 表体
+        rows = []
+        j = start + 2
+        while j < len(lines):
+            row_s = lines[j].strip()
+            if not row_s or '|' not in row_s:
+                break
+            rows.append(cls._split_row(row_s))
+            j += 1
+
+        return (cls._table_html(headers, aligns, rows), j)
 
-        # 解析对齐方式
-        sep_cells = [c.strip() for c in sep_line.strip('|').split('|')]
+    @classmethod
+    def parse_table_chunk(cls, text: str, columns: tuple = None) -> tuple:
+        """长表格分段渲染（流式冻结），返回 (html, columns)
+
+        首段 text 含表头和分隔行，columns 传 None；后续段只有数据行，传入首段返回的 columns。
+        columns = (aligns, widths)，各段使用同一组列宽百分比，上下拼接后列对齐，后续段不重复表头。
+        """
+        lines = [line for line in text.split('\n') if line.strip()]
+        headers = None
+        if columns is None:
+            headers = cls._split_row(lines[0])
+            aligns = cls._table_aligns(lines[1])
+            lines = lines[2:]
+        rows = [cls._split_row(line) for line in lines]
+        if columns is None:
+            columns = (aligns, cls._column_widths([headers] + rows))
+        return cls._table_html(headers, columns[0], rows, columns[1]), columns
+
+    @staticmethod
+    def _split_row(line: str) -> list:
+        line = line.strip()
+        if line.startswith('|'):
+            line = line[1:]
+        if line.endswith('|'):
+            line = line[:-1]
+        return [c.strip() for c in line.split('|')]
+
+    @staticmethod
+    def _table_aligns(sep_line: str) -> list:
+        """解析分隔行的对齐方式"""
         aligns = []
-        for c in sep_cells:
+        for c in sep_line.strip().strip('|').split('|'):
             c = c.strip()
             if c.startswith(':') and c.endswith(':'):
                 aligns.append('center')
@@ -2338,45 +2579,49 @@ class SimpleMarkdown:
                 aligns.append('right')
             else:
                 aligns.append('left')
+        return aligns
 
-        def _parse_row(line: str) -> list:
-            line = line.strip()
-            if line.startswith('|'):
-                line = line[1:]
-            if line.endswith('|'):
-                line = line[:-1]
-            return [c.strip() for c in line.split('|')]
-
-        # 表头
-        headers = _parse_row(header_line)
+    @staticmethod
+    def _column_widths(rows: list) -> list:
+        """按各列最长单元格（中文按 2 个字符计）估算列宽百分比"""
+        cols = max(len(r) for r in rows)
+        lens = [4] * cols
+        for row in rows:
+            for ci, cell in enumerate(row):
+                n = sum(2 if ord(ch) > 0x2e7f else 1 for ch in cell)
+                lens[ci] = min(max(lens[ci], n), 40)
+        total = sum(lens)
+        return [max(1, round(n * 100 / total)) for n in lens]
 
-        # 表体
-        rows = []
-        j = start + 2
-        while j < len(lines):
-            row_s = lines[j].strip()
-            if not row_s or '|' not in row_s:
-                break
-            rows.append(_parse_row(row_s))
-            j += 1
+    @classmethod
+    def _table_html(cls, headers, aligns: list, rows: list, widths: list = None) -> str:
+        """生成表格 HTML（现代极简：无外边框、无斑马纹、仅底线分隔）
 
-        # 生成 HTML（现代极简：无外边框、无斑马纹、仅底线分隔）
+        widths 不为 None 时为长表格的一段：固定列宽，每行都带底线，
+        headers 为 None 的后续段去掉上边距，与前一段无缝衔接。
+        """
+        chunked = widths is not None
+        margin = '10px 0' if not chunked else ('10px 0 0 0' if headers else '0')
         tbl = [
             '<table style="border-collapse:collapse;'
-            'margin:10px 0;width:100%;font-size:0.92em;">'
+            f'margin:{margin};width:100%;font-size:0.92em;">'
         ]
 
+        def _width(ci, first):
+            return f' width="{widths[ci]}%"' if first and chunked and ci < len(widths) else ''
+
         # thead
-        tbl.append('<tr>')
-        for ci, h in enumerate(headers):
-            align = aligns[ci] if ci < len(aligns) else 'left'
-            tbl.append(
-                f'<th style="border-bottom:2px solid rgba(255,255,255,12);'
-                f'padding:7px 14px;'
-                f'background:transparent;color:#e2e8f0;font-weight:600;'
-                f'text-align:{align};font-size:0.95em;">{cls._inline(h)}</th>'
-            )
-        tbl.append('</tr>')
+        if headers is not None:
+            tbl.append('<tr>')
+            for ci, h in enumerate(headers):
+                align = aligns[ci] if ci < len(aligns) else 'left'
+                tbl.append(
+                    f'<th{_width(ci, True)} style="border-bottom:2px solid rgba(255,255,255,12);'
+                    f'padding:7px 14px;'
+                    f'background:transparent;color:#e2e8f0;font-weight:600;'
+                    f'text-align:{align};font-size:0.95em;">{cls._inline(h)}</th>'
+                )
+            tbl.append('</tr>')
 
         # tbody — 统一背景，仅底线分隔
         for ri, row in enumerate(rows):
@@ -2385,17 +2630,17 @@ class SimpleMarkdown:
                 align = aligns[ci] if ci < len(aligns) else 'left'
                 border_bottom = (
                     'border-bottom:1px solid rgba(255,255,255,5);'
-                    if ri < len(rows) - 1 else ''
+                    if chunked or ri < len(rows) - 1 else ''
                 )
                 tbl.append(
-                    f'<td style="{border_bottom}padding:7px 14px;'
+                    f'<td{_width(ci, ri == 0 and headers is None)} style="{border_bottom}padding:7px 14px;'
                     f'background:transparent;color:{CursorTheme.TEXT_PRIMARY};'
                     f'text-align:{align};line-height:1.5;">{cls._inline(cell)}</td>'
                 )
             tbl.append('</tr>')
 
         tbl.append('</table>')
-        return ('\n'.join(tbl), j)
+        return '\n'.join(tbl)
 
     # -------- 行内解析 --------
 
@@ -3021,19 +3266,56 @@ class _CollapsibleShellOutput(QtWidgets.QWidget):
 # Python Shell 执行窗口
 # ============================================================
 
+class _LiveShellOutput(QtWidgets.QTextEdit):
+    """执行中的 Shell 输出：增量追加、自动滚到底部，执行结束后由 _CollapsibleShellOutput 替换"""
+
+    _VISIBLE_LINES = 8
+    _MAX_BLOCKS = 2000  # 只保留最后若干行（完整输出在结束后显示）
+
+    def __init__(self, variant: str = "python", parent=None):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.setLineWrapMode(QtWidgets.QTextEdit.NoWrap)
+        self.setObjectName("shellOutput")
+        self.setProperty("variant", variant)
+        self.setVerticalScrollBarPolicy(QtCore.Qt.ScrollBarAsNeeded)
+        self.document().setMaximumBlockCount(self._MAX_BLOCKS)
+        self.document().setDocumentMargin(4)
+        fm = self.fontMetrics()
+        line_h = fm.lineSpacing() if fm.lineSpacing() > 0 else 17
+        self.setFixedHeight(self._VISIBLE_LINES * line_h + 16)
+        self._fmt_out = QtGui.QTextCharFormat()
+        self._fmt_out.setForeground(QtGui.QColor(CursorTheme.TEXT_PRIMARY))
+        self._fmt_err = QtGui.QTextCharFormat()
+        self._fmt_err.setForeground(QtGui.QColor(CursorTheme.ACCENT_RED))
+
+    def append_text(self, text: str, is_error: bool = False):
+        cursor = self.textCursor()
+        cursor.movePosition(QtGui.QTextCursor.End)
+        cursor.insertText(text, self._fmt_err if is_error else self._fmt_out)
+        bar = self.verticalScrollBar()
+        bar.setValue(bar.maximum())
+
+
 class PythonShellWidget(QtWidgets.QFrame):
-    """Python Shell 执行结果 — 显示代码 + 输出 + 错误"""
+    """Python Shell 执行结果 — 显示代码 + 输出 + 错误
+
+    running=True 时创建执行中的面板：append_output 实时追加输出，finish 换成最终结果。
+    """
     
     def __init__(self, code: str, output: str = "", error: str = "",
-                 exec_time: float = 0.0, success: bool = True, parent=None):
+                 exec_time: float = 0.0, success: bool = True, running: bool = False,
+                 parent=None):
         super().__init__(parent)
         self.setObjectName("PythonShellWidget")
         
-        self.setProperty("state", "ok" if success else "error")
+        self.code = code
+        self.setProperty("state", "running" if running else ("ok" if success else "error"))
         
         layout = QtWidgets.QVBoxLayout(self)
         layout.setContentsMargins(0, 0, 0, 0)
         layout.setSpacing(0)
+        self._layout = layout
         
         # ---- header: Python Shell + 执行时间 ----
         header = QtWidgets.QWidget()
@@ -3048,14 +3330,18 @@ class PythonShellWidget(QtWidgets.QFrame):
         
         hl.addStretch()
         
-        if exec_time > 0:
-            time_lbl = QtWidgets.QLabel(f"{exec_time:.2f}s")
-            time_lbl.setObjectName("shellTimeLbl")
-            hl.addWidget(time_lbl)
+        self._time_lbl = QtWidgets.QLabel(f"{exec_time:.2f}s")
+        self._time_lbl.setObjectName("shellTimeLbl")
+        self._time_lbl.setVisible(exec_time > 0)
+        hl.addWidget(self._time_lbl)
         
-        status_lbl = QtWidgets.QLabel("ok" if success else "err")
-        status_lbl.setObjectName("shellStatusOk" if success else "shellStatusErr")
-        hl.addWidget(status_lbl)
+        if running:
+            self._status_lbl = QtWidgets.QLabel("run")
+            self._status_lbl.setObjectName("shellStatusRun")
+        else:
+            self._status_lbl = QtWidgets.QLabel("ok" if success else "err")
+            self._status_lbl.setObjectName("shellStatusOk" if success else "shellStatusErr")
+        hl.addWidget(self._status_lbl)
         
         layout.addWidget(header)
         
@@ -3078,7 +3364,19 @@ class PythonShellWidget(QtWidgets.QFrame):
         code_widget.setFixedHeight(code_h)
         layout.addWidget(code_widget)
         
-        # ---- 输出区域（可折叠）----
+        # ---- 输出区域（执行中为实时输出，结束后可折叠）----
+        self._live: Optional[_LiveShellOutput] = None
+        if running:
+            self._live = _LiveShellOutput("python", self)
+            layout.addWidget(self._live)
+        else:
+            self._add_result(output, error, success)
+    
+    @property
+    def running(self) -> bool:
+        return self._live is not None
+    
+    def _add_result(self, output: str, error: str, success: bool):
         has_output = bool(output and output.strip())
         has_error = bool(error and error.strip())
         
@@ -3091,28 +3389,57 @@ class PythonShellWidget(QtWidgets.QFrame):
                 parts.append(f'<span style="color:{CursorTheme.ACCENT_RED};">'
                              f'{html.escape(error.strip())}</span>')
             content_html = '<br>'.join(parts)
-            layout.addWidget(_CollapsibleShellOutput(content_html, "#141428", self))
+            self._layout.addWidget(_CollapsibleShellOutput(content_html, "#141428", self))
         
         elif not success:
             err_label = QtWidgets.QLabel("执行失败（无详细信息）")
             err_label.setObjectName("shellErrFallback")
-            layout.addWidget(err_label)
+            self._layout.addWidget(err_label)
+    
+    def append_output(self, text: str, is_error: bool = False):
+        """执行中追加一段输出"""
+        if self._live is not None and text:
+            self._live.append_text(text, is_error)
+    
+    def finish(self, output: str = "", error: str = "", exec_time: float = 0.0,
+               success: bool = True):
+        """执行结束：实时输出区换成最终结果（与直接创建的结果面板一致）"""
+        if self._live is not None:
+            self._layout.removeWidget(self._live)
+            self._live.deleteLater()
+            self._live = None
+        self.setProperty("state", "ok" if success else "error")
+        self._status_lbl.setText("ok" if success else "err")
+        self._status_lbl.setObjectName("shellStatusOk" if success else "shellStatusErr")
+        if exec_time > 0:
+            self._time_lbl.setText(f"{exec_time:.2f}s")
+            self._time_lbl.setVisible(True)
+        for w in (self, self._status_lbl):
+            w.style().unpolish(w)
+            w.style().polish(w)
+        self._add_result(output, error, success)
 
 
 class SystemShellWidget(QtWidgets.QFrame):
-    """System Shell 执行结果 — 显示命令 + stdout/stderr + 退出码"""
+    """System Shell 执行结果 — 显示命令 + stdout/stderr + 退出码
+
+    running=True 时创建执行中的面板：append_output 实时追加输出，finish 换成最终结果。
+    """
 
     def __init__(self, command: str, output: str = "", error: str = "",
                  exit_code: int = 0, exec_time: float = 0.0,
-                 success: bool = True, cwd: str = "", parent=None):
+                 success: bool = True, cwd: str = "", running: bool = False,
+                 parent=None):
         super().__init__(parent)
         self.setObjectName("SystemShellWidget")
 
-        self.setProperty("state", "ok" if success else "error")
+        self.command = command
+        self.setProperty("state", "running" if running else ("ok" if success else "error"))
 
         layout = QtWidgets.QVBoxLayout(self)
         layout.setContentsMargins(0, 0, 0, 0)
         layout.setSpacing(0)
+        self._layout = layout
 
         # ---- header: SHELL + cwd + 执行时间 + 退出码 ----
         header = QtWidgets.QWidget()
@@ -3135,14 +3462,18 @@ class SystemShellWidget(QtWidgets.QFrame):
 
         hl.addStretch()
 
-        if exec_time > 0:
-            time_lbl = QtWidgets.QLabel(f"{exec_time:.2f}s")
-            time_lbl.setObjectName("shellTimeLbl")
-            hl.addWidget(time_lbl)
+        self._time_lbl = QtWidgets.QLabel(f"{exec_time:.2f}s")
+        self._time_lbl.setObjectName("shellTimeLbl")
+        self._time_lbl.setVisible(exec_time > 0)
+        hl.addWidget(self._time_lbl)
 
-        code_lbl = QtWidgets.QLabel(f"exit {exit_code}")
-        code_lbl.setObjectName("shellStatusOk" if exit_code == 0 else "shellStatusErr")
-        hl.addWidget(code_lbl)
+        if running:
+            self._code_lbl = QtWidgets.QLabel("run")
+            self._code_lbl.setObjectName("shellStatusRun")
+        else:
+            self._code_lbl = QtWidgets.QLabel(f"exit {exit_code}")
+            self._code_lbl.setObjectName("shellStatusOk" if exit_code == 0 else "shellStatusErr")
+        hl.addWidget(self._code_lbl)
 
         layout.addWidget(header)
 
@@ -3170,7 +3501,19 @@ class SystemShellWidget(QtWidgets.QFrame):
         cmd_widget.setFixedHeight(cmd_h)
         layout.addWidget(cmd_widget)
 
-        # ---- 输出区域（可折叠）----
+        # ---- 输出区域（执行中为实时输出，结束后可折叠）----
+        self._live: Optional[_LiveShellOutput] = None
+        if running:
+            self._live = _LiveShellOutput("system", self)
+            layout.addWidget(self._live)
+        else:
+            self._add_result(output, error, success)
+
+    @property
+    def running(self) -> bool:
+        return self._live is not None
+
+    def _add_result(self, output: str, error: str, success: bool):
         has_output = bool(output and output.strip())
         has_error = bool(error and error.strip())
 
@@ -3178,17 +3521,40 @@ class SystemShellWidget(QtWidgets.QFrame):
             parts = []
             if has_output:
                 parts.append(f'<span style="color:{CursorTheme.TEXT_PRIMARY};">'
-                             f'{_html.escape(output.strip())}</span>')
+                             f'{html.escape(output.strip())}</span>')
             if has_error:
                 parts.append(f'<span style="color:{CursorTheme.ACCENT_RED};">'
-                             f'{_html.escape(error.strip())}</span>')
+                             f'{html.escape(error.strip())}</span>')
             content_html = '<br>'.join(parts)
-            layout.addWidget(_CollapsibleShellOutput(content_html, "#141414", self))
+            self._layout.addWidget(_CollapsibleShellOutput(content_html, "#141414", self))
 
         elif not success:
             err_label = QtWidgets.QLabel("命令执行失败（无详细信息）")
             err_label.setObjectName("shellErrFallback")
-            layout.addWidget(err_label)
+            self._layout.addWidget(err_label)
+
+    def append_output(self, text: str, is_error: bool = False):
+        """执行中追加一段输出"""
+        if self._live is not None and text:
+            self._live.append_text(text, is_error)
+
+    def finish(self, output: str = "", error: str = "", exit_code: int = 0,
+               exec_time: float = 0.0, success: bool = True):
+        """执行结束：实时输出区换成最终结果（与直接创建的结果面板一致）"""
+        if self._live is not None:
+            self._layout.removeWidget(self._live)
+            self._live.deleteLater()
+            self._live = None
+        self.setProperty("state", "ok" if success else "error")
+        self._code_lbl.setText(f"exit {exit_code}")
+        self._code_lbl.setObjectName("shellStatusOk" if exit_code == 0 else "shellStatusErr")
+        if exec_time > 0:
+            self._time_lbl.setText(f"{exec_time:.2f}s")
+            self._time_lbl.setVisible(True)
+        for w in (self, self._code_lbl):
+            w.style().unpolish(w)
+            w.style().polish(w)
+        self._add_result(output, error, success)
 
 
 # ============================================================
@@ -3238,14 +3604,10 @@ class CodeBlockWidget(QtWidgets.QFrame):
         hl.setContentsMargins(8, 3, 4, 3)
         hl.setSpacing(4)
 
-        lang_text = self._lang.upper() or ("VEX" if self._is_vex() else "CODE")
         # 语言标签 + 行数信息
-        lang_info = f"{lang_text}"
-        if self._line_count > 1:
-            lang_info += f"  ({self._line_count} 行)"
-        lang_lbl = QtWidgets.QLabel(lang_info)
-        lang_lbl.setObjectName("codeBlockLang")
-        hl.addWidget(lang_lbl)
+        self._lang_lbl = QtWidgets.QLabel(self._lang_info())
+        self._lang_lbl.setObjectName("codeBlockLang")
+        hl.addWidget(self._lang_lbl)
         hl.addStretch()
 
         # 操作按钮列表（hover 时显示）
@@ -3311,15 +3673,47 @@ class CodeBlockWidget(QtWidgets.QFrame):
 
         layout.addWidget(self._code_edit)
 
-    def _add_line_numbers(self, highlighted_code: str) -> str:
+    def _lang_info(self) -> str:
+        lang_text = self._lang.upper() or ("VEX" if self._is_vex() else "CODE")
+        if self._line_count > 1:
+            return f"{lang_text}  ({self._line_count} 行)"
+        return lang_text
+
+    def append_code(self, code: str):
+        """流式长代码块：追加后续代码行，只高亮、排版新增的部分"""
+        if not code:
+            return
+        start = self._line_count + 1
+        self._code += '\n' + code
+        self._line_count = self._code.count('\n') + 1
+
+        highlighted = self._highlight(code)
+        code_html = self._add_line_numbers(highlighted, start) if self._show_line_numbers else highlighted
+        doc = self._code_edit.document()
+        cursor = QtGui.QTextCursor(doc)
+        cursor.movePosition(QtGui.QTextCursor.End)
+        cursor.insertBlock()
+        cursor.insertHtml(f'<pre style="margin:0;white-space:pre;">{code_html}</pre>')
+        self._full_h = int(doc.size().height()) + 20
+
+        self._lang_lbl.setText(self._lang_info())
+        toggle = getattr(self, '_toggle_btn', None)
+        if toggle is not None and self._collapsed:
+            toggle.setText(f"展开 ({self._line_count} 行)")
+        elif not self._collapsed:
+            self._code_edit.setFixedHeight(min(self._full_h, self._MAX_HEIGHT))
+            if self._full_h > self._MAX_HEIGHT:
+                self._code_edit.setVerticalScrollBarPolicy(QtCore.Qt.ScrollBarAsNeeded)
+
+    def _add_line_numbers(self, highlighted_code: str, start: int = 1) -> str:
         """为高亮代码添加行号（使用 HTML table 布局）"""
         lines = highlighted_code.split('\n')
-        width = len(str(len(lines)))
+        width = len(str(start + len(lines) - 1))
         result: list = []
         num_color = '#4a5568'  # 暗灰色行号
         sep_color = 'rgba(255,255,255,6)'  # 分隔线
 
-        for i, line in enumerate(lines, 1):
+        for i, line in enumerate(lines, start):
             num = str(i).rjust(width)
             result.append(
                 f'<span style="color:{num_color};user-select:none;'
@@ -3348,40 +3742,41 @@ class CodeBlockWidget(QtWidgets.QFrame):
     def _is_vex(self) -> bool:
         return any(ind in self._code for ind in self._VEX_INDICATORS)
 
-    def _highlight(self) -> str:
+    def _highlight(self, code: str = None) -> str:
+        code = self._code if code is None else code
         lang = self._lang
         # VEX 自动检测
         if lang in ('vex', 'vfl') or (not lang and self._is_vex()):
-            return SyntaxHighlighter.highlight_vex(self._code)
+            return SyntaxHighlighter.highlight_vex(code)
         # Python
         if lang in ('python', 'py'):
-            return SyntaxHighlighter.highlight_python(self._code)
+            return SyntaxHighlighter.highlight_python(code)
         # JSON
         if lang == 'json':
-            return SyntaxHighlighter.highlight_json(self._code)
+            return SyntaxHighlighter.highlight_json(code)
         # YAML
         if lang in ('yaml', 'yml'):
-            return SyntaxHighlighter.highlight_yaml(self._code)
+            return SyntaxHighlighter.highlight_yaml(code)
         # Bash / Shell
         if lang in ('bash', 'sh', 'shell', 'zsh', 'powershell', 'ps1', 'bat', 'cmd'):
-            return SyntaxHighlighter.highlight_bash(self._code)
+            return SyntaxHighlighter.highlight_bash(code)
         # JavaScript / TypeScript
         if lang in ('javascript', 'js', 'typescript', 'ts', 'jsx', 'tsx'):
-            return SyntaxHighlighter.highlight_javascript(self._code)
+            return SyntaxHighlighter.highlight_javascript(code)
         # HScript
         if lang in ('hscript', 'hs'):
-            return SyntaxHighlighter.highlight_hscript(self._code)
+            return SyntaxHighlighter.highlight_hscript(code)
         # GLSL / HLSL / shader
         if lang in ('glsl', 'hlsl', 'shader', 'frag', 'vert', 'wgsl'):
-            return SyntaxHighlighter.highlight_glsl(self._code)
+            return SyntaxHighlighter.highlight_glsl(code)
         # C / C++ / C# (use GLSL tokenizer as base — similar syntax)
         if lang in ('c', 'cpp', 'c++', 'cxx', 'h', 'hpp', 'cs', 'csharp'):
-            return SyntaxHighlighter.highlight_glsl(self._code)
+            return SyntaxHighlighter.highlight_glsl(code)
         # XML / HTML — use plain escaped (simple approach)
         if lang in ('xml', 'html', 'svg'):
-            return html.escape(self._code)
+            return html.escape(code)
         # Fallback: no highlighting
-        return html.escape(self._code)
+        return html.escape(code)
 
     def enterEvent(self, event):
         for btn in self._action_btns:
@@ -3432,7 +3827,7 @@ class RichContentWidget(QtWidgets.QWidget):
 
         for seg in segments:
             if seg[0] == 'text':
-                lbl = QtWidgets.QLabel()
+                lbl = FrozenRichLabel()
                 lbl.setWordWrap(True)
                 lbl.setTextFormat(QtCore.Qt.RichText)
                 lbl.setOpenExternalLinks(False)  # 我们自己处理链接
@@ -4410,6 +4805,8 @@ class TokenAnalyticsPanel(QtWidgets.QDialog):
     - 推理 Token（Reasoning）
     - 延迟（Latency）
     - 每行费用
+    - 工具结果缓存命中（tool_cache_stats，来自 ToolResultCache.stats()）
+    - HoudiniMCP 内部缓存占用（mcp_cache_stats，来自 CacheRegistry.stats()）
     """
 
     _COL_HEADERS = [
@@ -4417,7 +4814,9 @@ class TokenAnalyticsPanel(QtWidgets.QDialog):
         "Output", "Think", "Total", "延迟", "费用", "",
     ]
 
-    def __init__(self, call_records: list, token_stats: dict, parent=None):
+    def __init__(self, call_records: list, token_stats: dict, parent=None,
+                 tool_cache_stats: Optional[dict] = None,
+                 mcp_cache_stats: Optional[dict] = None):
         super().__init__(parent)
         self.setWindowTitle("Token 使用分析")
         self.setMinimumSize(920, 560)
@@ -4429,7 +4828,7 @@ class TokenAnalyticsPanel(QtWidgets.QDialog):
         root.setSpacing(12)
 
         # ---- 摘要卡片 ----
-        root.addWidget(self._build_summary(call_records, token_stats))
+        root.addWidget(self._build_summary(call_records, token_stats, tool_cache_stats, mcp_cache_stats))
 
         # ---- 调用明细表 ----
         root.addWidget(self._build_table(call_records), 1)
@@ -4459,7 +4858,8 @@ class TokenAnalyticsPanel(QtWidgets.QDialog):
         self.accept()
 
     # -------- 摘要区 --------
-    def _build_summary(self, records, stats) -> QtWidgets.QWidget:
+    def _build_summary(self, records, stats, tool_cache_stats=None,
+                       mcp_cache_stats=None) -> QtWidgets.QWidget:
         card = QtWidgets.QFrame()
         card.setObjectName("tokenSummaryCard")
         grid = QtWidgets.QGridLayout(card)
@@ -4475,8 +4875,8 @@ class TokenAnalyticsPanel(QtWidgets.QDialog):
         reqs = stats.get('requests', 0)
         total = stats.get('total_tokens', 0)
         cost = stats.get('estimated_cost', 0.0)
-        cache_total = cache_r + cache_w
-        hit_rate = (cache_r / cache_total * 100) if cache_total > 0 else 0
+        from houdini_agent.utils.token_optimizer import input_cache_ratio
+        hit_rate = input_cache_ratio(stats) * 100
 
         # 平均延迟
         latencies = [r.get('latency', 0) for r in records if r.get('latency', 0) > 0]
@@ -4525,6 +4925,34 @@ class TokenAnalyticsPanel(QtWidgets.QDialog):
             bar.setFixedHeight(8)
             grid.addWidget(bar, 2, 0, 1, len(metrics))
 
+        # 工具结果缓存（跨轮次）
+        if tool_cache_stats and (tool_cache_stats.get('hits') or tool_cache_stats.get('misses')):
+            tc = tool_cache_stats
+            line = QtWidgets.QLabel(
+                f"Tool Cache  ·  hits {tc.get('hits', 0)}  ·  misses {tc.get('misses', 0)}"
+                f"  ·  hit rate {tc.get('hit_rate', 0.0) * 100:.1f}%"
+                f"  ·  entries {tc.get('entries', 0)}  ·  invalidated {tc.get('invalidated', 0)}"
+                f"  ·  evicted {tc.get('evictions', 0)}")
+            line.setObjectName("tokenMetricLabel")
+            line.setAlignment(QtCore.Qt.AlignCenter)
+            grid.addWidget(line, 3, 0, 1, len(metrics))
+
+        # HoudiniMCP 内部缓存（分页结果 / 文档 / 参数模板，按命名空间限额）
+        if mcp_cache_stats and mcp_cache_stats.get('entries'):
+            mc = mcp_cache_stats
+            spaces = "  ".join(f"{name} {s.get('entries', 0)}/{s.get('bytes', 0) / 1024:.0f}KB"
+                               for name, s in (mc.get('namespaces') or {}).items() if s.get('entries'))
+            line = QtWidgets.QLabel(
+                f"MCP Cache  ·  entries {mc.get('entries', 0)}"
+                f"  ·  {mc.get('bytes', 0) / 1048576:.1f} / {mc.get('max_bytes', 0) / 1048576:.1f} MB"
+                f"  ·  hit rate {mc.get('hit_rate', 0.0) * 100:.1f}%"
+                f"  ·  evicted {mc.get('evictions', 0) + mc.get('expired', 0)}"
+                f"  ·  invalidated {mc.get('invalidated', 0)}")
+            line.setObjectName("tokenMetricLabel")
+            line.setAlignment(QtCore.Qt.AlignCenter)
+            line.setToolTip(spaces)
+            grid.addWidget(line, 4, 0, 1, len(metrics))
+
         return card
 
     # -------- 明细表 --------
@@ -359,6 +359,8 @@ _ZH = {
     'ai.tool_exec_err': '工具执行异常: {}',
     'ai.bg_exec_err': '后台执行异常: {}',
     'ai.main_exec_timeout': '主线程执行超时（30秒）',
+    'ai.batch_skipped': '未执行 {}：同批次中前一个调用超时',
+    'ai.prefetch_skipped': '已停止，跳过预取',
     'ai.unknown_err': '未知错误',
     'ai.ask_mode_prompt': (
         '\n\n当前为 Ask 模式（只读）\n'
@@ -676,6 +678,8 @@ _EN = {
     'ai.tool_exec_err': 'Tool execution error: {}',
     'ai.bg_exec_err': 'Background execution error: {}',
     'ai.main_exec_timeout': 'Main thread execution timeout (30s)',
+    'ai.batch_skipped': 'Skipped {}: an earlier call in the same batch timed out',
+    'ai.prefetch_skipped': 'Stopped, prefetch skipped',
     'ai.unknown_err': 'Unknown error',
     'ai.ask_mode_prompt': (
         '\n\nYou are in Ask mode (read-only).\n'
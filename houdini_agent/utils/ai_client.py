@@ -7,13 +7,19 @@ OpenAI-compatible API client with Function Calling, streaming, and web search.
 import os
 import sys
 import json
-import ssl
 import time
 import re
 from typing import List, Dict, Optional, Any, Callable, Generator, Tuple
 from urllib.parse import quote_plus
 
 from shared.common_utils import load_config, save_config
+from .tool_cache import ToolResultCache, STATIC_TOOLS, affects_scene
+from .tool_prefetch import ToolPrefetcher
+from .tool_schedule import plan_round, run_round
+from .sse_stream import OpenAIStreamParser, AnthropicStreamParser
+from .token_accounting import observe_usage
+from .prompt_cache import CACHE_BLOCK_ROUNDS, add_cache_breakpoint, compact_round
+from .lazy_import import lazy_import, module_available
 
 # 强制使用本地 lib 目录中的依赖库
 _lib_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'lib')
@@ -23,13 +29,26 @@ if os.path.exists(_lib_path):
         sys.path.remove(_lib_path)
     sys.path.insert(0, _lib_path)
 
-# 导入 requests
-HAS_REQUESTS = False
-try:
-    import requests
-    HAS_REQUESTS = True
-except ImportError:
-    pass
+# 超时 / 连接错误：异步传输层与 requests 两套异常统一捕获
+# 两个模块都延迟导入（requests 连同 urllib3 等约占面板启动导入时间的一半），
+# 异常类在模块真正导入时登记 —— 模块导入之前不可能抛出它的异常
+_TIMEOUT_ERRORS: tuple = ()
+_CONNECTION_ERRORS: tuple = ()
+
+
+def _register_errors(timeout_error: type, connection_error: type):
+    global _TIMEOUT_ERRORS, _CONNECTION_ERRORS
+    _TIMEOUT_ERRORS += (timeout_error,)
+    _CONNECTION_ERRORS += (connection_error,)
+
+
+# 导入 requests（第一次使用时）
+HAS_REQUESTS = module_available('requests')
+requests = lazy_import('requests', on_load=lambda m: _register_errors(
+    m.exceptions.Timeout, m.exceptions.ConnectionError))
+
+async_transport = lazy_import('.async_transport', __package__, on_load=lambda m: _register_errors(
+    m.TransportTimeout, m.TransportConnectionError))
 
 
 # ============================================================
@@ -65,17 +84,20 @@ class WebSearcher:
     _page_cache: Dict[str, tuple] = {}
     _PAGE_CACHE_TTL = 600  # 10 分钟
 
-    # Trafilatura 可用性
-    _HAS_TRAFILATURA = False
-    
-    def __init__(self):
-        # 检测 trafilatura 可用性（只检测一次）
-        if not WebSearcher._HAS_TRAFILATURA:
+    # Trafilatura 模块（第一次抓取网页时导入；None 表示尚未检测，False 表示不可用）
+    _trafilatura_mod: Any = None
+
+    @classmethod
+    def _trafilatura(cls):
+        """trafilatura 模块，不可用时返回 None（只检测一次：它连同 lxml / dateparser 导入较慢）"""
+        if cls._trafilatura_mod is None:
             try:
-                import trafilatura  # noqa: F401
-                WebSearcher._HAS_TRAFILATURA = True
+                import trafilatura
+                cls._trafilatura_mod = trafilatura
             except ImportError:
-                pass
+                cls._trafilatura_mod = False
+        return cls._trafilatura_mod or None
+
     # ------------------------------------------------------------------
     # 编码修复：requests 默认 ISO-8859-1 会导致中文乱码
     # ------------------------------------------------------------------
@@ -387,9 +409,9 @@ class WebSearcher:
 
             # --- 正文提取：trafilatura 优先，正则降级 ---
             text = None
-            if self._HAS_TRAFILATURA:
+            trafilatura = self._trafilatura()
+            if trafilatura is not None:
                 try:
-                    import trafilatura
                     text = trafilatura.extract(
                         page_html,
                         include_comments=False,
@@ -924,7 +946,7 @@ HOUDINI_TOOLS = [
         "type": "function",
         "function": {
             "name": "execute_python",
-            "description": "在 Houdini Python Shell 中执行代码。可以执行任意 Python 代码，访问 hou 模块操作场景。执行结果（包括 print 输出和错误信息）会完整返回。输出较长时支持分页，用相同 code 和不同 page 翻页查看。",
+            "description": "在 Houdini Python Shell 中执行代码。可以执行任意 Python 代码，访问 hou 模块操作场景。同一对话中命名空间持久保留：之前 import 的模块和定义的变量 / 函数可以直接使用，不必重复导入和计算。最后一行是表达式时返回其值。执行结果（包括 print 输出和错误信息）会完整返回；超时会中断代码并返回已有输出。输出较长时支持分页，用相同 code 和不同 page 翻页查看。",
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -932,6 +954,14 @@ HOUDINI_TOOLS = [
                         "type": "string",
                         "description": "要执行的 Python 代码"
                     },
+                    "timeout": {
+                        "type": "integer",
+                        "description": "超时秒数（默认25，最大120），超时后中断执行"
+                    },
+                    "reset": {
+                        "type": "boolean",
+                        "description": "为 true 时先清空本对话的持久命名空间再执行"
+                    },
                     "page": {
                         "type": "integer",
                         "description": "页码（从1开始），输出较长时翻页查看后续内容。翻页时必须传入与首次相同的 code"
@@ -945,7 +975,7 @@ HOUDINI_TOOLS = [
         "type": "function",
         "function": {
             "name": "execute_shell",
-            "description": "在系统 Shell 中执行命令（非 Houdini Python Shell）。可运行 pip、git、dir/ls、ffmpeg、ssh、scp 等系统命令。工作目录默认为项目根目录。命令有超时限制（默认30秒，最大120秒）。危险命令（如 rm -rf、format、del /s）会被拦截。注意：1)必须生成可直接运行的完整命令，不用占位符；2)需交互的命令必须传非交互式参数；3)优先用精确命令减少输出量(如 find -maxdepth 2)；4)路径有空格需引号包裹；5)命令失败时分析stderr后修正重试，不要盲目重复。",
+            "description": "在系统 Shell 中执行命令（非 Houdini Python Shell）。可运行 pip、git、dir/ls、ffmpeg、ssh、scp 等系统命令。工作目录默认为项目根目录。命令有超时限制（默认30秒，最大120秒），超时或用户停止时结束整个进程树并返回已产生的输出；命令没有标准输入。危险命令（如 rm -rf、format、del /s）会被拦截。注意：1)必须生成可直接运行的完整命令，不用占位符；2)需交互的命令必须传非交互式参数；3)优先用精确命令减少输出量(如 find -maxdepth 2)；4)路径有空格需引号包裹；5)命令失败时分析stderr后修正重试，不要盲目重复。",
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -1281,7 +1311,7 @@ HOUDINI_TOOLS = [
         "type": "function",
         "function": {
             "name": "perf_stop_and_report",
-            "description": "停止性能 Profiling 并返回分析报告。必须先调用 perf_start_profile 启动。报告包含各节点 cook 时间排名、内存统计等。可选保存 .hperf 文件到磁盘。",
+            "description": "停止性能 Profiling 并返回分析报告。必须先调用 perf_start_profile 启动。报告包含节点 self 时间排名、网络 inclusive 时间、问题标记（热点 / 同一帧重复 cook / 内存增长），每个节点带稳定 ID。停止后可再次调用（传 focus 或 page）查看同一次 profile。可选保存 .hperf 文件到磁盘，供之后对比。",
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -1289,6 +1319,14 @@ HOUDINI_TOOLS = [
                         "type": "string",
                         "description": "保存 .hperf profile 文件的路径（可选）。如 'C:/tmp/profile.hperf'"
                     },
+                    "focus": {
+                        "type": "string",
+                        "description": "报告中的节点 ID（如 n1a2b3c4d）或节点路径，返回该节点 / 网络的详情（子节点、各帧 cook 次数）"
+                    },
+                    "top_n": {
+                        "type": "integer",
+                        "description": "排名显示的节点数（默认 15）"
+                    },
                     "page": {
                         "type": "integer",
                         "description": "页码（从1开始），报告较长时翻页查看"
@@ -1297,6 +1335,39 @@ HOUDINI_TOOLS = [
                 "required": []
             }
         }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "perf_analyze_profile",
+            "description": "分析已保存的 profile（perf_stop_and_report 保存的 .hperf、stats JSON 或 CSV），或对比两次 profile（优化前 baseline_path vs 优化后 profile_path）的节点耗时、cook 次数与内存变化。不传 profile_path 时分析最近一次 perf_stop_and_report 的结果。",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "profile_path": {
+                        "type": "string",
+                        "description": "profile 文件路径（可选，默认最近一次 profile）"
+                    },
+                    "baseline_path": {
+                        "type": "string",
+                        "description": "作为对比基准（优化前）的 profile 文件路径（可选）"
+                    },
+                    "focus": {
+                        "type": "string",
+                        "description": "节点 ID 或路径，返回该节点详情"
+                    },
+                    "top_n": {
+                        "type": "integer",
+                        "description": "排名显示的节点数（默认 15）"
+                    },
+                    "page": {
+                        "type": "integer",
+                        "description": "页码（从1开始）"
+                    }
+                },
+                "required": []
+            }
+        }
     }
 ]
 
@@ -1335,9 +1406,13 @@ class AIClient:
             'ollama': 'ollama',  # Ollama 不需要真正的 API key，但需要非空值
             'duojie': self._read_api_key('duojie'),
         }
-        self._ssl_context = self._create_ssl_context()
-        self._web_searcher = WebSearcher()
+        self._ssl_context_obj = None  # 第一次使用时创建（加载 CA 证书约几十毫秒）
+        self._web_searcher_obj: Optional[WebSearcher] = None
         self._tool_executor: Optional[Callable[[str, dict], dict]] = None
+        self._batch_tool_executor: Optional[Callable[[List[Tuple[str, dict]]], List[dict]]] = None
+        self._tool_cache: Optional[ToolResultCache] = None
+        self._prefetch_executor: Optional[Callable[[str, dict], dict]] = None
+        self._prefetcher: Optional[ToolPrefetcher] = None
         
         # Ollama 配置
         self._ollama_base_url = "http://localhost:11434"
@@ -1347,16 +1422,86 @@ class AIClient:
         self._retry_delay = 1.0
         self._chunk_timeout = 60  # Ollama 本地模型可能较慢，增加超时
         
-        # ★ 持久化 HTTP Session（连接池 + Keep-Alive，避免每轮重新 TLS 握手）
-        self._http_session = requests.Session()
-        self._http_session.headers.update({
-            'Content-Type': 'application/json',
-        })
+        # ★ 持久化 HTTP Session（连接池 + Keep-Alive，避免每轮重新 TLS 握手），第一次使用时创建
+        self._http_session_obj = None
+        # ★ 异步传输层：进程内共享的事件循环线程 + 按 provider 主机分池（装了 h2 时走 HTTP/2）
+        # HOUDINI_AGENT_HTTP_TRANSPORT=requests 时回退到 requests.Session；第一次发请求时决定
+        self._transport_obj = None
+        self._transport_resolved = False
+        # 并行 web / shell 工具与标题生成共用的线程池（不再每轮新建）
+        self._background_pool = None
         
         # 停止控制（使用 threading.Event 保证线程安全）
         import threading
         self._stop_event = threading.Event()
     
+    # ------------------------------------------------------------------
+    # 按需初始化（打开面板时不导入 requests / asyncio、不探测 trafilatura）
+    # ------------------------------------------------------------------
+
+    @property
+    def _ssl_context(self):
+        if self._ssl_context_obj is None:
+            self._ssl_context_obj = self._create_ssl_context()
+        return self._ssl_context_obj
+
+    @property
+    def _http_session(self):
+        if self._http_session_obj is None:
+            session = requests.Session()
+            session.headers.update({
+                'Content-Type': 'application/json',
+            })
+            self._http_session_obj = session
+        return self._http_session_obj
+
+    @property
+    def _transport(self):
+        if not self._transport_resolved:
+            self._transport_obj = (async_transport.get_transport()
+                                   if async_transport.use_async_transport() else None)
+            self._transport_resolved = True
+        return self._transport_obj
+
+    @_transport.setter
+    def _transport(self, transport):
+        self._transport_obj = transport
+        self._transport_resolved = True
+
+    @property
+    def _web_searcher(self) -> 'WebSearcher':
+        if self._web_searcher_obj is None:
+            self._web_searcher_obj = WebSearcher()
+        return self._web_searcher_obj
+
+    def _post(self, url: str, **kwargs):
+        """发送 API 请求：默认走异步传输层，否则走 requests.Session（参数与 Session.post 相同）"""
+        if self._transport is not None:
+            kwargs.pop('proxies', None)
+            return self._transport.post(url, **kwargs)
+        return self._http_session.post(url, **kwargs)
+
+    def _retry_wait(self, attempt: int, delay: Optional[float] = None) -> bool:
+        """重试前等待（默认带抖动的指数退避）
+
+        请求停止时立即返回 False，调用方不应再重试；否则返回 True。
+        """
+        if delay is None:
+            delay = async_transport.backoff_delay(attempt, self._retry_delay)
+        return not self._stop_event.wait(delay)
+
+    def _parallel_pool(self):
+        """共享线程池（并行 web / shell 工具、标题生成），首次使用时创建"""
+        if self._background_pool is None:
+            import concurrent.futures
+            self._background_pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=4, thread_name_prefix='houdini-agent-bg')
+        return self._background_pool
+
+    def run_background(self, fn: Callable[[], Any]):
+        """在共享线程池中运行一个后台任务（如会话标题生成），返回 Future"""
+        return self._parallel_pool().submit(fn)
+
     def request_stop(self):
         """请求停止当前请求（线程安全）"""
         self._stop_event.set()
@@ -1376,6 +1521,115 @@ class AIClient:
         """
         self._tool_executor = executor
 
+    def set_batch_tool_executor(self, executor: Callable[[List[Tuple[str, dict]]], List[dict]]):
+        """设置批量工具执行器（可选）
+
+        executor 签名: ([(tool_name, kwargs), ...]) -> [result, ...]，结果与输入一一对应。
+        一轮中有多个 Houdini 工具调用时，用它一次性调度到主线程，代替逐个调用 _tool_executor。
+        """
+        self._batch_tool_executor = executor
+
+    def set_tool_cache(self, cache: Optional[ToolResultCache]):
+        """设置工具结果缓存（会话级，跨轮次复用）；None 时每次 Agent 运行使用临时缓存"""
+        self._tool_cache = cache
+
+    def set_prefetch_executor(self, executor: Optional[Callable[[str, dict], dict]]):
+        """设置投机预取执行器（可选）；None 时不做预取
+
+        executor 签名: (tool_name, kwargs) -> dict，只会收到 tool_cache.CACHEABLE_TOOLS 中的只读工具。
+        在线程池中调用，不应触发工具状态等 UI 反馈。
+        """
+        self._prefetch_executor = executor
+
+    def _start_prefetch(self, tool_cache: ToolResultCache, tools: List[dict]) -> Optional[ToolPrefetcher]:
+        """为本次 Agent 运行创建投机预取器（未设置执行器时返回 None）"""
+        self._finish_prefetch(None)
+        if not self._prefetch_executor:
+            return None
+        names = {t.get('function', {}).get('name') for t in tools or ()}
+        self._prefetcher = ToolPrefetcher(self._prefetch_executor, self._parallel_pool().submit,
+                                          tool_cache, allowed=names)
+        return self._prefetcher
+
+    def _finish_prefetch(self, result: Optional[Dict[str, Any]]):
+        """结束本次运行的预取：丢弃未使用的结果，统计写入 result['prefetch']"""
+        prefetcher, self._prefetcher = self._prefetcher, None
+        if prefetcher is None:
+            return
+        stats = prefetcher.close()
+        if isinstance(result, dict) and stats['submitted']:
+            result['prefetch'] = stats
+
+    def _cache_lookup_round(self, tool_cache: ToolResultCache, calls: List[Tuple[str, dict]]) -> List[Optional[dict]]:
+        """按顺序查询本轮调用的缓存；出现可能修改场景的调用后，其后的场景查询不再读缓存"""
+        hits: List[Optional[dict]] = []
+        mutated = False
+        for tname, targs in calls:
+            hit = None
+            if not mutated or tname in STATIC_TOOLS:
+                hit = tool_cache.lookup(tname, targs)
+                if hit is not None:
+                    print(f"[AI Client] ♻️ 缓存命中: {tname}({json.dumps(targs, ensure_ascii=False)[:80]})")
+            mutated = mutated or affects_scene(tname)
+            hits.append(hit)
+        return hits
+
+    @staticmethod
+    def _cache_update_round(tool_cache: ToolResultCache, calls: List[Tuple[str, dict]],
+                            results: List[Optional[dict]], cached: List[bool]):
+        """按调用顺序维护缓存：修改类工具先失效受影响条目，查询结果随后写入"""
+        for (tname, targs), result, was_cached in zip(calls, results, cached):
+            if was_cached or result is None:
+                continue
+            tool_cache.invalidate_for_tool(tname, targs, result)
+            tool_cache.store(tname, targs, result)
+
+    def _execute_worker_call(self, tname: str, targs: dict) -> dict:
+        """执行一个不依赖 hou 的调用（线程池中）"""
+        try:
+            if tname == 'web_search':
+                return self._execute_web_search(targs)
+            if tname == 'fetch_webpage':
+                return self._execute_fetch_webpage(targs)
+            if not self._tool_executor:
+                return {"success": False, "error": f"工具执行器未设置，无法执行工具: {tname}"}
+            return self._tool_executor(tname, **targs)
+        except Exception as e:
+            import traceback
+            return {"success": False, "error": f"工具执行异常: {str(e)}\n{traceback.format_exc()[:200]}"}
+
+    def _execute_round_calls(self, calls: List[Tuple[str, dict]]) -> List[dict]:
+        """按依赖图执行一轮中未命中缓存的调用（tool_schedule）
+
+        纯 Python 工具进线程池，主线程工具合并为尽量少的批次调度；只有读写冲突的调用保持先后顺序。
+        """
+        if not calls:
+            return []
+        return run_round(plan_round(calls), self._execute_worker_call,
+                         self._execute_houdini_calls, self._parallel_pool().submit)
+
+    def _execute_houdini_calls(self, calls: List[Tuple[str, dict]]) -> List[dict]:
+        """按顺序执行一轮中的 Houdini 工具调用，多个调用时优先走批量执行器"""
+        if self._batch_tool_executor and len(calls) > 1:
+            try:
+                return self._batch_tool_executor(calls)
+            except Exception as e:
+                import traceback
+                print(f"[AI Client] 批量工具执行失败: {e}")
+                err = {"success": False, "error": f"批量工具执行异常: {str(e)}\n{traceback.format_exc()[:200]}"}
+                return [dict(err) for _ in calls]
+        results = []
+        for tname, targs in calls:
+            if not self._tool_executor:
+                results.append({"success": False, "error": f"工具执行器未设置，无法执行工具: {tname}"})
+                continue
+            try:
+                results.append(self._tool_executor(tname, **targs))
+            except Exception as e:
+                import traceback
+                results.append({"success": False, "error": f"工具执行异常: {str(e)}\n{traceback.format_exc()[:200]}"})
+        return results
+
     # ----------------------------------------------------------
     # 工具结果分页：按行分段，让 AI 自主判断是否需要更多
     # ----------------------------------------------------------
@@ -1614,15 +1868,14 @@ class AIClient:
             for r_idx, rnd in enumerate(rounds):
                 if r_idx >= n_rounds - protect_n:
                     break
-                for m in rnd:
-                    c = m.get('content') or ''
-                    if m.get('role') == 'tool' and isinstance(c, str) and len(c) > 300:
-                        m['content'] = self._summarize_tool_content(c, 300)
-                    # ★ assistant 和 user 文本完全保留 ★
+                compact_round(rnd, self._summarize_tool_content, 300)
+                # ★ assistant 和 user 文本完全保留 ★
 
+            # 删除的轮数按缓存块取整（多删不足一块），下次裁剪前前缀保持稳定
             keep_rounds = max(5, int(n_rounds * 0.7))
             if n_rounds > keep_rounds:
-                rounds = rounds[-keep_rounds:]
+                drop = -(-(n_rounds - keep_rounds) // CACHE_BLOCK_ROUNDS) * CACHE_BLOCK_ROUNDS
+                rounds = rounds[min(drop, n_rounds - 5):]
 
         elif trim_level == 2:
             # 中度：保留最近 3 轮（而非 5 轮，避免 level 1 → level 2 无效裁剪）
@@ -1630,21 +1883,15 @@ class AIClient:
             for r_idx, rnd in enumerate(rounds):
                 if r_idx >= len(rounds) - 2:
                     break  # 最近 2 轮的 tool 结果不压缩
-                for m in rnd:
-                    c = m.get('content') or ''
-                    if m.get('role') == 'tool' and isinstance(c, str) and len(c) > 150:
-                        m['content'] = self._summarize_tool_content(c, 150)
-                    # ★ assistant 和 user 文本完全保留 ★
+                compact_round(rnd, self._summarize_tool_content, 150, resummarize=True)
+                # ★ assistant 和 user 文本完全保留 ★
 
         else:
             # 重度：保留最近 2 轮，激进压缩 tool 结果
             rounds = rounds[-2:] if len(rounds) > 2 else rounds
             for rnd in rounds[:-1]:  # 最后一轮不压缩
-                for m in rnd:
-                    c = m.get('content') or ''
-                    if m.get('role') == 'tool' and isinstance(c, str) and len(c) > 100:
-                        m['content'] = self._summarize_tool_content(c, 100)
-                    # ★ assistant 和 user 文本完全保留 ★
+                compact_round(rnd, self._summarize_tool_content, 100, resummarize=True)
+                # ★ assistant 和 user 文本完全保留 ★
 
         # 重组
         body = [m for rnd in rounds for m in rnd]
@@ -1750,6 +1997,7 @@ class AIClient:
 
     def _create_ssl_context(self):
         """创建 SSL 上下文。验证失败时回退到未验证模式（带警告）。"""
+        import ssl
         try:
             context = ssl.create_default_context()
             context.minimum_version = ssl.TLSVersion.TLSv1_2
@@ -1898,7 +2146,7 @@ class AIClient:
         
         try:
             if HAS_REQUESTS:
-                response = self._http_session.post(
+                response = self._post(
                     self._get_api_url(provider),
                     json={'model': self._get_default_model(provider), 'messages': [{'role': 'user', 'content': 'hi'}], 'max_tokens': 1},
                     headers={'Authorization': f'Bearer {api_key}', 'Content-Type': 'application/json'},
@@ -1959,6 +2207,8 @@ class AIClient:
         - DeepSeek/OpenAI: prompt_cache_hit_tokens / prompt_cache_miss_tokens
         - Anthropic 原生: cache_read_input_tokens / cache_creation_input_tokens
         - Factory/Duojie 代理: claude_cache_creation_*_tokens, input_tokens_details 内嵌
+        
+        返回的 prompt_tokens 一律为完整输入（含缓存命中与写入）。
         """
         if not usage:
             return {}
@@ -2021,6 +2271,13 @@ class AIClient:
             or 0
         )
         
+        # Anthropic 原生的 input_tokens 只是最后一个缓存断点之后的部分，不含缓存读取 / 写入；
+        # 统一为完整输入，缓存命中率 = 命中 / 完整输入
+        if 'prompt_tokens' not in usage and (
+                'cache_read_input_tokens' in usage or 'cache_creation_input_tokens' in usage
+                or cache_hit + cache_miss > prompt_tokens):
+            prompt_tokens += cache_hit + cache_miss
+        
         completion = usage.get('completion_tokens', 0) or usage.get('output_tokens', 0)
         total = usage.get('total_tokens', 0) or (prompt_tokens + completion)
         
@@ -2053,9 +2310,13 @@ class AIClient:
         """将 OpenAI 格式的消息列表转换为 Anthropic Messages API 格式。
         
         Returns:
-            (system_text, anthropic_messages)
-            - system_text: 系统提示（Anthropic 要求单独传 system 参数）
-            - anthropic_messages: Anthropic 格式的 messages 列表
+            (system_blocks, anthropic_messages)
+            - system_blocks: 系统提示的 text 块列表（Anthropic 要求单独传 system 参数），
+              末块带 cache_control；没有系统提示时为空列表
+            - anthropic_messages: Anthropic 格式的 messages 列表，最后两条带 cache_control
+        
+        只有开头连续的 system 消息进入顶层 system；之后的 system 消息（RAG、[上下文管理]、
+        [Context] 提醒等）按原位置转为 user 文本块，避免它们的变化使 system 之后的整段缓存失效。
         """
         system_text = ""
         anthropic_msgs: List[Dict[str, Any]] = []
@@ -2064,8 +2325,13 @@ class AIClient:
             role = msg.get('role', '')
             
             if role == 'system':
-                # Anthropic 的 system 不在 messages 里，单独传
-                system_text += (("\n\n" if system_text else "") + (msg.get('content', '') or ''))
+                text = msg.get('content', '') or ''
+                if not anthropic_msgs:
+                    # Anthropic 的 system 不在 messages 里，单独传
+                    system_text += (("\n\n" if system_text else "") + text)
+                elif text:
+                    # 与相邻的 user 消息在下方合并
+                    anthropic_msgs.append({'role': 'user', 'content': [{'type': 'text', 'text': text}]})
                 continue
             
             if role == 'user':
@@ -2174,7 +2440,15 @@ class AIClient:
             else:
                 merged.append(m)
         
-        return system_text, merged
+        # 缓存断点（最多 4 个）：工具定义末尾（_convert_tools_to_anthropic）、系统提示末尾、
+        # 倒数第二条消息（上一次请求的末尾，读取缓存）、最后一条消息（写入供下一次请求读取）
+        system_blocks: List[Dict[str, Any]] = []
+        if system_text:
+            system_blocks.append({'type': 'text', 'text': system_text, 'cache_control': {'type': 'ephemeral'}})
+        for m in merged[-2:]:
+            add_cache_breakpoint(m)
+        
+        return system_blocks, merged
 
     @staticmethod
     def _convert_tools_to_anthropic(tools: List[dict]) -> List[dict]:
@@ -2193,6 +2467,8 @@ class AIClient:
                 'description': func.get('description', ''),
                 'input_schema': func.get('parameters', {'type': 'object', 'properties': {}}),
             })
+        # 工具定义位于缓存前缀的最前面，在末尾加断点
+        anthropic_tools[-1]['cache_control'] = {'type': 'ephemeral'}
         return anthropic_tools
 
     def _chat_stream_anthropic(self,
@@ -2213,7 +2489,7 @@ class AIClient:
         api_url = self._get_api_url(provider, model)
         
         # 消息转换
-        system_text, anth_messages = self._convert_messages_to_anthropic(messages)
+        system_blocks, anth_messages = self._convert_messages_to_anthropic(messages)
         
         payload: Dict[str, Any] = {
             'model': model,
@@ -2225,8 +2501,8 @@ class AIClient:
         if temperature is not None:
             payload['temperature'] = min(max(temperature, 0.0), 1.0)
         
-        if system_text:
-            payload['system'] = system_text
+        if system_blocks:
+            payload['system'] = system_blocks
         
         # 思考模式
         if enable_thinking:
@@ -2254,7 +2530,7 @@ class AIClient:
         
         for attempt in range(self._max_retries):
             try:
-                with self._http_session.post(
+                with self._post(
                     api_url,
                     json=payload,
                     headers=headers,
@@ -2274,204 +2550,45 @@ class AIClient:
                         print(f"[AI Client] Anthropic error: {err_msg}")
                         
                         if response.status_code >= 500 and attempt < self._max_retries - 1:
-                            wait = self._retry_delay * (attempt + 1)
+                            wait = round(async_transport.backoff_delay(attempt, self._retry_delay), 1)
                             print(f"[AI Client] Anthropic server error {response.status_code}, retrying in {wait}s...")
-                            time.sleep(wait)
+                            if not self._retry_wait(attempt, wait):
+                                yield {"type": "stopped", "message": "用户停止了请求"}
+                                return
                             continue
                         
                         yield {"type": "error", "error": f"HTTP {response.status_code}: {err_msg}"}
                         return
                     
-                    # ── 解析 Anthropic SSE 事件流 ──
-                    # 状态
-                    _content_blocks: Dict[int, Dict[str, Any]] = {}  # index → block info
-                    _tool_args_acc: Dict[int, str] = {}  # index → accumulated JSON args
-                    _pending_usage: Dict[str, Any] = {}
-                    _last_stop_reason = None
-                    _got_thinking = False
-                    _enable_thinking_flag = enable_thinking  # 闭包变量
-                    
-                    import codecs
-                    _utf8_decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
-                    _line_buf = ""
-                    _event_type = ""  # 当前 SSE event 类型
-                    
-                    def _process_anthropic_event(event_type: str, data_str: str):
-                        """处理单个 Anthropic SSE 事件，返回要 yield 的 dict 列表"""
-                        nonlocal _content_blocks, _tool_args_acc, _pending_usage, _last_stop_reason, _got_thinking
-                        results = []
-                        
-                        try:
-                            data = json.loads(data_str)
-                        except json.JSONDecodeError:
-                            return results
-                        
-                        ev_type = data.get('type', event_type)
-                        
-                        if ev_type == 'message_start':
-                            msg = data.get('message', {})
-                            usage = msg.get('usage', {})
-                            if usage:
-                                _pending_usage = self._parse_usage(usage)
-                        
-                        elif ev_type == 'content_block_start':
-                            idx = data.get('index', 0)
-                            block = data.get('content_block', {})
-                            _content_blocks[idx] = {
-                                'type': block.get('type', 'text'),
-                                'id': block.get('id', ''),
-                                'name': block.get('name', ''),
-                            }
-                            if block.get('type') == 'tool_use':
-                                _tool_args_acc[idx] = ''
-                        
-                        elif ev_type == 'content_block_delta':
-                            idx = data.get('index', 0)
-                            delta = data.get('delta', {})
-                            delta_type = delta.get('type', '')
-                            block_info = _content_blocks.get(idx, {})
-                            
-                            if delta_type == 'text_delta':
-                                text = delta.get('text', '')
-                                if text:
-                                    results.append({"type": "content", "content": text})
-                            
-                            elif delta_type == 'thinking_delta':
-                                thinking = delta.get('thinking', '')
-                                if thinking:
-                                    if not _got_thinking:
-                                        _got_thinking = True
-                                        print(f"[AI Client] 🧠 Anthropic thinking (首个 chunk, len={len(thinking)}, enable={_enable_thinking_flag})")
-                                    if _enable_thinking_flag:
-                                        results.append({"type": "thinking", "content": thinking})
-                            
-                            elif delta_type == 'input_json_delta':
-                                partial = delta.get('partial_json', '')
-                                if partial and idx in _tool_args_acc:
-                                    _tool_args_acc[idx] += partial
-                                    # 广播 tool_args_delta → UI 流式预览
-                                    tool_name = block_info.get('name', '')
-                                    if tool_name:
-                                        results.append({
-                                            "type": "tool_args_delta",
-                                            "index": idx,
-                                            "name": tool_name,
-                                            "delta": partial,
-                                            "accumulated": _tool_args_acc[idx],
-                                        })
-                        
-                        elif ev_type == 'content_block_stop':
-                            idx = data.get('index', 0)
-                            block_info = _content_blocks.get(idx, {})
-                            if block_info.get('type') == 'tool_use':
-                                # 工具调用完成 → 转换为 OpenAI 格式的 tool_call
-                                tool_id = block_info.get('id', '')
-                                tool_name = block_info.get('name', '')
-                                args_str = _tool_args_acc.get(idx, '{}')
-                                results.append({
-                                    "type": "tool_call",
-                                    "tool_call": {
-                                        'id': tool_id,
-                                        'type': 'function',
-                                        'function': {
-                                            'name': tool_name,
-                                            'arguments': args_str,
-                                        }
-                                    }
-                                })
-                        
-                        elif ev_type == 'message_delta':
-                            delta = data.get('delta', {})
-                            _last_stop_reason = delta.get('stop_reason')
-                            usage = data.get('usage', {})
-                            if usage:
-                                # 合并 usage
-                                parsed = self._parse_usage(usage)
-                                for k, v in parsed.items():
-                                    if isinstance(v, (int, float)):
-                                        _pending_usage[k] = _pending_usage.get(k, 0) + v
-                        
-                        elif ev_type == 'message_stop':
-                            # 映射 stop_reason: end_turn → stop, tool_use → tool_calls
-                            finish = 'stop'
-                            if _last_stop_reason == 'tool_use':
-                                finish = 'tool_calls'
-                            elif _last_stop_reason == 'max_tokens':
-                                finish = 'length'
-                            results.append({
-                                "type": "done",
-                                "finish_reason": finish,
-                                "usage": _pending_usage,
-                            })
-                        
-                        elif ev_type == 'error':
-                            err_msg = data.get('error', {}).get('message', str(data))
-                            results.append({"type": "error", "error": err_msg})
-                        
-                        return results
-                    
-                    # ── 主循环 ──
-                    _should_return = False
+                    # ── 解析 Anthropic SSE 事件流（字节级分行 + 增量参数组装，见 sse_stream.py） ──
+                    parser = AnthropicStreamParser(self._parse_usage, enable_thinking)
                     for raw_chunk in response.iter_content(chunk_size=4096, decode_unicode=False):
                         if not raw_chunk:
                             continue
                         if self._stop_event.is_set():
                             yield {"type": "stopped", "message": "用户停止了请求"}
                             return
-                        
-                        decoded = _utf8_decoder.decode(raw_chunk)
-                        _line_buf += decoded
-                        
-                        while '\n' in _line_buf:
-                            one_line, _line_buf = _line_buf.split('\n', 1)
-                            one_line = one_line.rstrip('\r')
-                            
-                            if not one_line:
-                                continue
-                            
-                            # Anthropic SSE: "event: xxx" 行后跟 "data: {...}" 行
-                            if one_line.startswith('event: '):
-                                _event_type = one_line[7:].strip()
-                                continue
-                            
-                            if one_line.startswith('data: '):
-                                data_str = one_line[6:]
-                                for item in _process_anthropic_event(_event_type, data_str):
-                                    yield item
-                                    if item.get('type') in ('done', 'error'):
-                                        _should_return = True
-                                _event_type = ""  # 重置
-                        
-                        if _should_return:
+                        yield from parser.feed(raw_chunk)
+                        if parser.done:
                             return
                     
-                    # 处理残留
-                    _line_buf += _utf8_decoder.decode(b'', final=True)
-                    if _line_buf.strip():
-                        for line in _line_buf.strip().split('\n'):
-                            line = line.strip()
-                            if line.startswith('event: '):
-                                _event_type = line[7:].strip()
-                            elif line.startswith('data: '):
-                                for item in _process_anthropic_event(_event_type, line[6:]):
-                                    yield item
-                                    if item.get('type') in ('done', 'error'):
-                                        return
-                    
-                    # 流结束但未收到 message_stop
-                    if not _should_return:
-                        yield {"type": "done", "finish_reason": _last_stop_reason or "stop", "usage": _pending_usage}
+                    # 处理残留；流结束但未收到 message_stop 时补发 done
+                    yield from parser.finish()
                     return
                     
-            except requests.exceptions.Timeout:
+            except _TIMEOUT_ERRORS:
                 if attempt < self._max_retries - 1:
-                    time.sleep(self._retry_delay * (attempt + 1))
+                    if not self._retry_wait(attempt):
+                        yield {"type": "stopped", "message": "用户停止了请求"}
+                        return
                     continue
                 yield {"type": "error", "error": f"请求超时（已重试 {self._max_retries} 次）"}
                 return
-            except requests.exceptions.ConnectionError as e:
+            except _CONNECTION_ERRORS as e:
                 if attempt < self._max_retries - 1:
-                    time.sleep(self._retry_delay * (attempt + 1))
+                    if not self._retry_wait(attempt):
+                        yield {"type": "stopped", "message": "用户停止了请求"}
+                        return
                     continue
                 yield {"type": "error", "error": f"连接错误: {str(e)}"}
                 return
@@ -2483,9 +2600,11 @@ class AIClient:
                     'ConnectionReset', 'RemoteDisconnected',
                 ))
                 if is_transient and attempt < self._max_retries - 1:
-                    wait = self._retry_delay * (attempt + 1)
+                    wait = round(async_transport.backoff_delay(attempt, self._retry_delay), 1)
                     print(f"[AI Client] Anthropic 连接中断 ({err_str[:80]}), {wait}s 后重试")
-                    time.sleep(wait)
+                    if not self._retry_wait(attempt, wait):
+                        yield {"type": "stopped", "message": "用户停止了请求"}
+                        return
                     continue
                 yield {"type": "error", "error": f"请求失败: {err_str}"}
                 return
@@ -2502,7 +2621,7 @@ class AIClient:
                         timeout: int = 60) -> Dict[str, Any]:
         """Anthropic Messages 协议的非流式 Chat。"""
         api_url = self._get_api_url(provider, model)
-        system_text, anth_messages = self._convert_messages_to_anthropic(messages)
+        system_blocks, anth_messages = self._convert_messages_to_anthropic(messages)
         
         payload: Dict[str, Any] = {
             'model': model,
@@ -2511,8 +2630,8 @@ class AIClient:
         }
         if temperature is not None:
             payload['temperature'] = min(max(temperature, 0.0), 1.0)
-        if system_text:
-            payload['system'] = system_text
+        if system_blocks:
+            payload['system'] = system_blocks
         if tools:
             payload['tools'] = self._convert_tools_to_anthropic(tools)
             if tool_choice == 'auto':
@@ -2526,7 +2645,7 @@ class AIClient:
         
         for attempt in range(self._max_retries):
             try:
-                response = self._http_session.post(
+                response = self._post(
                     api_url, json=payload, headers=headers,
                     timeout=timeout, proxies={'http': None, 'https': None}
                 )
@@ -2560,14 +2679,16 @@ class AIClient:
                     'usage': self._parse_usage(obj.get('usage', {})),
                     'raw': obj,
                 }
-            except requests.exceptions.Timeout:
+            except _TIMEOUT_ERRORS:
                 if attempt < self._max_retries - 1:
-                    time.sleep(self._retry_delay)
+                    if not self._retry_wait(attempt):
+                        return {'ok': False, 'error': '用户停止了请求', 'stopped': True}
                     continue
                 return {'ok': False, 'error': '请求超时'}
             except Exception as e:
                 if attempt < self._max_retries - 1:
-                    time.sleep(self._retry_delay)
+                    if not self._retry_wait(attempt):
+                        return {'ok': False, 'error': '用户停止了请求', 'stopped': True}
                     continue
                 return {'ok': False, 'error': str(e)}
         
@@ -2661,7 +2782,7 @@ class AIClient:
         print(f"[AI Client] Requesting {api_url} with model {model}")
         for attempt in range(self._max_retries):
             try:
-                with self._http_session.post(
+                with self._post(
                     api_url,
                     json=payload,
                     headers=headers,
@@ -2683,190 +2804,19 @@ class AIClient:
                         
                         # 5xx 服务端错误（502/503/529 等）可重试
                         if response.status_code >= 500 and attempt < self._max_retries - 1:
-                            wait = self._retry_delay * (attempt + 1)
+                            wait = round(async_transport.backoff_delay(attempt, self._retry_delay), 1)
                             print(f"[AI Client] Server error {response.status_code}, retrying in {wait}s...")
-                            time.sleep(wait)
+                            if not self._retry_wait(attempt, wait):
+                                yield {"type": "stopped", "message": "用户停止了请求"}
+                                return
                             continue  # 重试
                         
                         yield {"type": "error", "error": f"HTTP {response.status_code}: {err_msg}"}
                         return
                     
-                    # 解析 SSE 流
-                    tool_calls_buffer = {}  # 缓存工具调用片段
-                    pending_usage = {}  # 收集 usage 数据
-                    last_finish_reason = None
-                    _got_reasoning = False  # 诊断：本轮是否收到 reasoning_content
-                    _enable_thinking = enable_thinking  # 闭包变量，供 _process_sse_line 使用
-                    
-                    # ── 使用 iter_content + 增量解码器 + 手动分行 ──
-                    # 比 iter_lines() 更健壮：
-                    #   1. iter_content() 返回 HTTP body 原始字节块
-                    #   2. 增量解码器正确处理跨 chunk 切断的多字节 UTF-8
-                    #   3. 手动按 \n 分行，避免 requests 内部分行时的编码干扰
-                    import codecs
-                    _utf8_decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
-                    _line_buf = ""  # 解码后、尚未遇到 \n 的文本缓冲
-                    
-                    def _process_sse_line(line):
-                        """处理单行 SSE data，返回要 yield 的 dict 列表"""
-                        nonlocal tool_calls_buffer, pending_usage, last_finish_reason, _got_reasoning, _enable_thinking
-                        results = []
-                        
-                        if not line.startswith('data: '):
-                            return results
-                        
-                        data_str = line[6:]
-                        
-                        if data_str.strip() == '[DONE]':
-                            _reason_tokens = pending_usage.get('reasoning_tokens', 0)
-                            print(f"[AI Client] Received [DONE], reasoning={'YES' if _got_reasoning else 'NO'}(tokens={_reason_tokens}), usage={pending_usage}")
-                            results.append({"type": "done", "finish_reason": last_finish_reason or "stop", "usage": pending_usage})
-                            return results
-                        
-                        try:
-                            data = json.loads(data_str)
-                        except json.JSONDecodeError:
-                            return results
-                        
-                        choices = data.get('choices', [])
-                        usage_data = data.get('usage')
-                        
-                        # usage-only chunk
-                        if usage_data:
-                            pending_usage = self._parse_usage(usage_data)
-                        
-                        if not choices:
-                            return results
-                        
-                        choice = choices[0]
-                        delta = choice.get('delta', {})
-                        finish_reason = choice.get('finish_reason')
-                        
-                        # 思考内容（仅在 enable_thinking=True 时显示）
-                        # 不同代理可能使用不同字段名：reasoning_content / thinking_content / reasoning
-                        # 统一拦截，Think 关闭时全部静默丢弃
-                        _thinking_text = (
-                            delta.get('reasoning_content')
-                            or delta.get('thinking_content')
-                            or delta.get('reasoning')
-                            or ''
-                        )
-                        if _thinking_text:
-                            if not _got_reasoning:
-                                _got_reasoning = True
-                                # 诊断：记录字段名以便排查
-                                _field = ('reasoning_content' if 'reasoning_content' in delta
-                                          else 'thinking_content' if 'thinking_content' in delta
-                                          else 'reasoning')
-                                print(f"[AI Client] 🧠 收到 {_field}（首个 chunk，len={len(_thinking_text)}，enable_thinking={_enable_thinking}）")
-                            if _enable_thinking:
-                                results.append({"type": "thinking", "content": _thinking_text})
-                        
-                        # 普通内容
-                        if 'content' in delta and delta['content']:
-                            results.append({"type": "content", "content": delta['content']})
-                        
-                        # 工具调用
-                        if delta.get('tool_calls'):
-                            for tc in delta['tool_calls']:
-                                idx = tc.get('index', 0)
-                                tc_id = tc.get('id', '')
-                                
-                                if tc_id and idx in tool_calls_buffer:
-                                    existing_id = tool_calls_buffer[idx].get('id', '')
-                                    if existing_id and existing_id != tc_id:
-                                        idx = max(tool_calls_buffer.keys()) + 1
-                                
-                                if idx not in tool_calls_buffer:
-                                    tool_calls_buffer[idx] = {
-                                        'id': tc_id,
-                                        'type': 'function',
-                                        'function': {'name': '', 'arguments': ''}
-                                    }
-                                
-                                if tc_id:
-                                    tool_calls_buffer[idx]['id'] = tc_id
-                                if 'function' in tc:
-                                    fn = tc['function']
-                                    if 'name' in fn and fn['name']:
-                                        tool_calls_buffer[idx]['function']['name'] = fn['name']
-                                    if 'arguments' in fn:
-                                        tool_calls_buffer[idx]['function']['arguments'] += fn['arguments']
-                                        # ★ 广播 tool_call 参数增量 → UI 流式预览
-                                        _tname = tool_calls_buffer[idx]['function'].get('name', '')
-                                        if _tname:
-                                            results.append({
-                                                "type": "tool_args_delta",
-                                                "index": idx,
-                                                "name": _tname,
-                                                "delta": fn['arguments'],
-                                                "accumulated": tool_calls_buffer[idx]['function']['arguments'],
-                                            })
-                        
-                        # 完成（先发送工具调用，但不 return，等后续 usage chunk / [DONE]）
-                        if finish_reason:
-                            if tool_calls_buffer:
-                                # ★ 修复：检测并拆分被代理错误拼接的 arguments（如 duojie Claude 代理）
-                                # 某些代理在流式传输时对多个工具调用使用相同 index，导致 arguments 被拼接为 {...}{...}
-                                import uuid as _uuid
-                                fixed_buffer = {}
-                                next_fix_idx = max(tool_calls_buffer.keys()) + 1
-                                for idx_k in sorted(tool_calls_buffer.keys()):
-                                    tc_entry = tool_calls_buffer[idx_k]
-                                    args_str = tc_entry['function']['arguments'].strip()
-                                    if args_str.startswith('{'):
-                                        try:
-                                            json.loads(args_str)
-                                            fixed_buffer[idx_k] = tc_entry
-                                        except (json.JSONDecodeError, ValueError):
-                                            # 尝试拆分拼接的多个 JSON 对象: {...}{...}
-                                            split_parts = []
-                                            depth = 0
-                                            start = -1
-                                            for ci, ch in enumerate(args_str):
-                                                if ch == '{':
-                                                    if depth == 0:
-                                                        start = ci
-                                                    depth += 1
-                                                elif ch == '}':
-                                                    depth -= 1
-                                                    if depth == 0 and start >= 0:
-                                                        part = args_str[start:ci+1]
-                                                        try:
-                                                            json.loads(part)
-                                                            split_parts.append(part)
-                                                        except:
-                                                            pass
-                                                        start = -1
-                                            if split_parts:
-                                                print(f"[AI Client] 修复拼接的 tool_call arguments: 拆分为 {len(split_parts)} 个独立调用")
-                                                tc_entry['function']['arguments'] = split_parts[0]
-                                                fixed_buffer[idx_k] = tc_entry
-                                                for extra_args in split_parts[1:]:
-                                                    fixed_buffer[next_fix_idx] = {
-                                                        'id': f"call_{_uuid.uuid4().hex[:24]}",
-                                                        'type': 'function',
-                                                        'function': {
-                                                            'name': tc_entry['function']['name'],
-                                                            'arguments': extra_args
-                                                        }
-                                                    }
-                                                    next_fix_idx += 1
-                                            else:
-                                                fixed_buffer[idx_k] = tc_entry
-                                    else:
-                                        fixed_buffer[idx_k] = tc_entry
-                                tool_calls_buffer = fixed_buffer
-
-                                for idx_k in sorted(tool_calls_buffer.keys()):
-                                    results.append({"type": "tool_call", "tool_call": tool_calls_buffer[idx_k]})
-                                tool_calls_buffer = {}
-                            last_finish_reason = finish_reason
-                        
-                        return results
-                    
-                    # ── 主循环：读取原始字节块 → 解码 → 分行 → 处理 ──
-                    _should_return = False
+                    # 解析 SSE 流：原始字节块上直接分行（UTF-8 中 \n 不会落在多字节字符内部），
+                    # 工具调用参数随片段增量组装，见 sse_stream.py
+                    parser = OpenAIStreamParser(self._parse_usage, enable_thinking)
                     for raw_chunk in response.iter_content(chunk_size=4096, decode_unicode=False):
                         if not raw_chunk:
                             continue
@@ -2875,98 +2825,27 @@ class AIClient:
                             yield {"type": "stopped", "message": "用户停止了请求"}
                             return
                         
-                        # 增量解码：跨 chunk 的多字节 UTF-8 字符在此正确拼合
-                        decoded = _utf8_decoder.decode(raw_chunk)
-                        _line_buf += decoded
-                        
-                        # 逐行分割并处理
-                        while '\n' in _line_buf:
-                            one_line, _line_buf = _line_buf.split('\n', 1)
-                            one_line = one_line.rstrip('\r')
-                            if not one_line:
-                                continue
-                            
-                            for item in _process_sse_line(one_line):
-                                yield item
-                                if item.get('type') == 'done':
-                                    _should_return = True
-                        
-                        if _should_return:
+                        yield from parser.feed(raw_chunk)
+                        if parser.done:
                             return
                     
-                    # 处理缓冲区残留（流结束时没有以 \n 结尾的尾行）
-                    _line_buf += _utf8_decoder.decode(b'', final=True)
-                    if _line_buf.strip():
-                        for item in _process_sse_line(_line_buf.strip()):
-                            yield item
-                            if item.get('type') == 'done':
-                                return
-                    
-                    # 流结束但没有收到 [DONE]
-                    if tool_calls_buffer:
-                        # ★ 同样需要修复拼接的 arguments（与 finish_reason 分支保持一致）
-                        import uuid as _uuid2
-                        fixed_buffer2 = {}
-                        next_fix_idx2 = max(tool_calls_buffer.keys()) + 1
-                        for idx_k2 in sorted(tool_calls_buffer.keys()):
-                            tc_entry2 = tool_calls_buffer[idx_k2]
-                            args_str2 = tc_entry2['function']['arguments'].strip()
-                            if args_str2.startswith('{'):
-                                try:
-                                    json.loads(args_str2)
-                                    fixed_buffer2[idx_k2] = tc_entry2
-                                except (json.JSONDecodeError, ValueError):
-                                    split_parts2 = []
-                                    depth2 = 0
-                                    start2 = -1
-                                    for ci2, ch2 in enumerate(args_str2):
-                                        if ch2 == '{':
-                                            if depth2 == 0:
-                                                start2 = ci2
-                                            depth2 += 1
-                                        elif ch2 == '}':
-                                            depth2 -= 1
-                                            if depth2 == 0 and start2 >= 0:
-                                                part2 = args_str2[start2:ci2+1]
-                                                try:
-                                                    json.loads(part2)
-                                                    split_parts2.append(part2)
-                                                except:
-                                                    pass
-                                                start2 = -1
-                                    if split_parts2:
-                                        print(f"[AI Client] 修复拼接的 tool_call arguments (尾部): 拆分为 {len(split_parts2)} 个独立调用")
-                                        tc_entry2['function']['arguments'] = split_parts2[0]
-                                        fixed_buffer2[idx_k2] = tc_entry2
-                                        for extra_args2 in split_parts2[1:]:
-                                            fixed_buffer2[next_fix_idx2] = {
-                                                'id': f"call_{_uuid2.uuid4().hex[:24]}",
-                                                'type': 'function',
-                                                'function': {
-                                                    'name': tc_entry2['function']['name'],
-                                                    'arguments': extra_args2
-                                                }
-                                            }
-                                            next_fix_idx2 += 1
-                                    else:
-                                        fixed_buffer2[idx_k2] = tc_entry2
-                            else:
-                                fixed_buffer2[idx_k2] = tc_entry2
-                        tool_calls_buffer = fixed_buffer2
-                        for idx in sorted(tool_calls_buffer.keys()):
-                            yield {"type": "tool_call", "tool_call": tool_calls_buffer[idx]}
-                    yield {"type": "done", "finish_reason": last_finish_reason or "stop", "usage": pending_usage}
+                    # 处理缓冲区残留；流结束但没有收到 [DONE] 时补发工具调用与 done
+                    yield from parser.finish()
                     return
                     
-            except requests.exceptions.Timeout:
+            except _TIMEOUT_ERRORS:
                 if attempt < self._max_retries - 1:
-                    time.sleep(self._retry_delay * (attempt + 1))
+                    if not self._retry_wait(attempt):
+                        yield {"type": "stopped", "message": "用户停止了请求"}
+                        return
                     continue
                 yield {"type": "error", "error": f"请求超时（已重试 {self._max_retries} 次）"}
                 return
-            except requests.exceptions.ConnectionError as e:
+            except _CONNECTION_ERRORS as e:
                 if attempt < self._max_retries - 1:
-                    time.sleep(self._retry_delay * (attempt + 1))
+                    if not self._retry_wait(attempt):
+                        yield {"type": "stopped", "message": "用户停止了请求"}
+                        return
                     continue
                 yield {"type": "error", "error": f"连接错误: {str(e)}"}
                 return
@@ -2979,9 +2858,11 @@ class AIClient:
                     'ConnectionReset', 'RemoteDisconnected',
                 ))
                 if is_transient and attempt < self._max_retries - 1:
-                    wait = self._retry_delay * (attempt + 1)
+                    wait = round(async_transport.backoff_delay(attempt, self._retry_delay), 1)
                     print(f"[AI Client] 连接中断 ({err_str[:80]}), {wait}s 后重试 ({attempt+1}/{self._max_retries})")
-                    time.sleep(wait)
+                    if not self._retry_wait(attempt, wait):
+                        yield {"type": "stopped", "message": "用户停止了请求"}
+                        return
                     continue
                 yield {"type": "error", "error": f"请求失败: {err_str}"}
                 return
@@ -3046,7 +2927,7 @@ class AIClient:
         
         for attempt in range(self._max_retries):
             try:
-                response = self._http_session.post(
+                response = self._post(
                     self._get_api_url(provider, model),
                     json=payload,
                     headers=headers,
@@ -3067,14 +2948,16 @@ class AIClient:
                     'usage': self._parse_usage(obj.get('usage', {})),
                     'raw': obj
                 }
-            except requests.exceptions.Timeout:
+            except _TIMEOUT_ERRORS:
                 if attempt < self._max_retries - 1:
-                    time.sleep(self._retry_delay)
+                    if not self._retry_wait(attempt):
+                        return {'ok': False, 'error': '用户停止了请求', 'stopped': True}
                     continue
                 return {'ok': False, 'error': '请求超时'}
             except Exception as e:
                 if attempt < self._max_retries - 1:
-                    time.sleep(self._retry_delay)
+                    if not self._retry_wait(attempt):
+                        return {'ok': False, 'error': '用户停止了请求', 'stopped': True}
                     continue
                 return {'ok': False, 'error': str(e)}
         
@@ -3152,10 +3035,11 @@ class AIClient:
         server_error_retries = 0    # 连续服务端错误重试计数
         max_server_retries = 3      # 最多重试 3 次服务端错误
         
-        # ★ Cursor 风格：同轮去重缓存
-        # 如果 AI 在同一 turn 中用相同参数调用相同工具，直接返回缓存结果
-        # key: "tool_name:sorted_args_json" → value: result dict
-        _turn_dedup_cache: Dict[str, dict] = {}
+        # ★ 工具结果缓存：相同参数的查询工具直接返回缓存结果
+        # 宿主通过 set_tool_cache() 提供会话级缓存（跨轮次），否则仅本次运行内有效
+        tool_cache = self._tool_cache if self._tool_cache is not None else ToolResultCache()
+        # ★ 投机预取：流式输出期间提前执行大概率会被请求的只读查询（宿主未提供执行器时为 None）
+        prefetch = self._start_prefetch(tool_cache, effective_tools)
         
         # ★ 消息清洗 dirty 标志（避免每轮都 O(n) 遍历消息列表）
         _needs_sanitize = True
@@ -3249,10 +3133,11 @@ class AIClient:
                 
                 if chunk_type == 'content':
                     content = chunk.get('content', '')
-                    # 清理XML标签（使用预编译正则，避免每 chunk 重复编译）
+                    # 清理XML标签（使用预编译正则；所有模式都以 '<' 开头，绝大多数 chunk 直接跳过）
                     cleaned_chunk = content
-                    for _pat in self._RE_CLEAN_PATTERNS:
-                        cleaned_chunk = _pat.sub('', cleaned_chunk)
+                    if '<' in cleaned_chunk:
+                        for _pat in self._RE_CLEAN_PATTERNS:
+                            cleaned_chunk = _pat.sub('', cleaned_chunk)
                     round_content += cleaned_chunk
                     if on_content and cleaned_chunk:
                         on_content(cleaned_chunk)
@@ -3264,6 +3149,8 @@ class AIClient:
                         on_thinking(thinking_text)
                 
                 elif chunk_type == 'tool_args_delta':
+                    if prefetch is not None:
+                        prefetch.on_args_streamed(chunk.get('name', ''), chunk.get('accumulated', ''))
                     if on_tool_args_delta:
                         on_tool_args_delta(
                             chunk.get('name', ''),
@@ -3335,10 +3222,12 @@ class AIClient:
                             
                         elif is_server_transient or is_compress_fail:
                             # ---- 临时服务器错误：先等待重试，不急着裁剪 ----
-                            wait_seconds = 5 * server_error_retries
+                            wait_seconds = round(async_transport.backoff_delay(server_error_retries - 1, 5.0), 1)
                             if on_content:
                                 on_content(f"\n[服务端暂时不可用，{wait_seconds}秒后重试 ({server_error_retries}/{max_server_retries})...]\n")
-                            time.sleep(wait_seconds)
+                            if not self._retry_wait(server_error_retries - 1, wait_seconds):
+                                should_retry = True
+                                break  # 等待期间用户停止：回到 while 顶部返回停止结果
                             
                             # 只在第2次及以后重试时才裁剪（第1次纯等待重试，给服务器恢复机会）
                             if server_error_retries >= 2:
@@ -3383,6 +3272,8 @@ class AIClient:
                         total_usage['total_tokens'] += usage.get('total_tokens', 0)
                         total_usage['cache_hit_tokens'] += usage.get('cache_hit_tokens', 0)
                         total_usage['cache_miss_tokens'] += usage.get('cache_miss_tokens', 0)
+                        # 用实际输入 token 数校准本地启发式估算（tiktoken 有该模型专属编码时不校准）
+                        observe_usage(model, working_messages, effective_tools, usage)
                     
                     # ---- 记录本次 API 调用详情（对齐 Cursor） ----
                     import datetime as _dt
@@ -3435,8 +3326,9 @@ class AIClient:
             # 如果没有工具调用，完成
             if not round_tool_calls:
                 full_content += round_content
-                # 计算 cache 命中率
-                prompt_total = total_usage['cache_hit_tokens'] + total_usage['cache_miss_tokens']
+                # 计算 cache 命中率（命中 / 完整输入，prompt_tokens 已含缓存部分）
+                prompt_total = max(total_usage['prompt_tokens'],
+                                   total_usage['cache_hit_tokens'] + total_usage['cache_miss_tokens'])
                 if prompt_total > 0:
                     total_usage['cache_hit_rate'] = total_usage['cache_hit_tokens'] / prompt_total
                 else:
@@ -3494,7 +3386,7 @@ class AIClient:
                 assistant_msg['reasoning_content'] = round_thinking or ''
             working_messages.append(assistant_msg)
             
-            # 执行工具调用（web 工具并行，Houdini 工具串行）
+            # 执行工具调用（按依赖图调度：纯 Python 工具并行，Houdini 工具合并到主线程批次）
             # 预处理所有工具调用
             parsed_calls = []
             for tool_call in round_tool_calls:
@@ -3508,91 +3400,33 @@ class AIClient:
                     arguments = {}
                 parsed_calls.append((tool_id, tool_name, arguments, tool_call))
 
-            # ★ 同轮去重：纯查询类工具用相同参数重复调用时直接返回缓存
-            # 只对无副作用的查询工具去重（execute_python/run_skill/web_search 等有副作用的不去重）
-            _DEDUP_TOOLS = frozenset({
-                'get_network_structure', 'get_node_parameters', 'list_children',
-                'read_selection', 'search_node_types', 'semantic_search_nodes',
-                'find_nodes_by_param', 'check_errors', 'search_local_doc',
-                'get_houdini_node_doc', 'get_node_inputs', 'list_skills',
-                'perf_stop_and_report',
-            })
-            
-            # 分离可并行工具（web + shell）和 Houdini 工具（需主线程串行）
-            _ASYNC_TOOL_NAMES = frozenset({'web_search', 'fetch_webpage', 'execute_shell'})
-            async_calls = [(i, pc) for i, pc in enumerate(parsed_calls) if pc[1] in _ASYNC_TOOL_NAMES]
-            houdini_calls = [(i, pc) for i, pc in enumerate(parsed_calls) if pc[1] not in _ASYNC_TOOL_NAMES]
-
             # 结果槽位：保持原始顺序
             results_ordered = [None] * len(parsed_calls)
             dedup_flags = [False] * len(parsed_calls)  # 标记哪些是缓存命中
 
-            # --- 先检查去重缓存 ---
-            for idx, (tid, tname, targs, _tc) in enumerate(parsed_calls):
-                dedup_key = f"{tname}:{json.dumps(targs, sort_keys=True)}"
-                if tname in _DEDUP_TOOLS and dedup_key in _turn_dedup_cache:
-                    # ★ 缓存命中：直接返回之前的结果
-                    results_ordered[idx] = _turn_dedup_cache[dedup_key]
+            # --- 先检查结果缓存（工具名 + 规范化参数；依赖的节点未被修改） ---
+            round_calls = [(tname, targs) for _tid, tname, targs, _tc in parsed_calls]
+            for idx, hit in enumerate(self._cache_lookup_round(tool_cache, round_calls)):
+                if hit is not None:
+                    results_ordered[idx] = hit
                     dedup_flags[idx] = True
-                    print(f"[AI Client] ♻️ 同轮去重命中: {tname}({json.dumps(targs, ensure_ascii=False)[:80]})")
-
-            # 分离未缓存的调用
-            uncached_async = [(i, pc) for i, pc in enumerate(parsed_calls) 
-                             if pc[1] in _ASYNC_TOOL_NAMES and not dedup_flags[i]]
-            uncached_houdini = [(i, pc) for i, pc in enumerate(parsed_calls) 
-                               if pc[1] not in _ASYNC_TOOL_NAMES and not dedup_flags[i]]
-
-            # --- 并行执行未缓存的 async 工具（web + shell） ---
-            if len(uncached_async) > 1:
-                import concurrent.futures
-                def _exec_async(idx_pc):
-                    idx, (tid, tname, targs, _tc) = idx_pc
-                    if tname == 'web_search':
-                        return idx, self._execute_web_search(targs)
-                    elif tname == 'fetch_webpage':
-                        return idx, self._execute_fetch_webpage(targs)
-                    else:  # execute_shell
-                        return idx, self._tool_executor(tname, **targs)
-                with concurrent.futures.ThreadPoolExecutor(max_workers=min(4, len(uncached_async))) as pool:
-                    for idx, result in pool.map(_exec_async, uncached_async):
-                        results_ordered[idx] = result
-            elif len(uncached_async) == 1:
-                idx, (tid, tname, targs, _tc) = uncached_async[0]
-                if tname == 'web_search':
-                    results_ordered[idx] = self._execute_web_search(targs)
-                elif tname == 'fetch_webpage':
-                    results_ordered[idx] = self._execute_fetch_webpage(targs)
-                else:  # execute_shell
-                    results_ordered[idx] = self._tool_executor(tname, **targs)
-
-            # --- 串行执行未缓存的 Houdini 工具（需主线程） ---
-            for idx, (tid, tname, targs, _tc) in uncached_houdini:
-                results_ordered[idx] = self._tool_executor(tname, **targs)
-            
-            # --- 缓存维护 ---
-            # 如果本轮有操作类工具（创建/删除/连接节点等），清除网络结构相关缓存
-            # 因为操作改变了网络状态，之前缓存的查询结果可能已过期
-            _NETWORK_MUTATING_TOOLS = frozenset({
-                'create_node', 'create_nodes_batch', 'delete_node', 'connect_nodes',
-                'create_wrangle_node', 'copy_node', 'set_display_flag', 'undo_redo',
-            })
-            has_mutation = any(
-                pc[1] in _NETWORK_MUTATING_TOOLS 
-                for idx_m, pc in enumerate(parsed_calls) 
-                if not dedup_flags[idx_m]
-            )
-            if has_mutation:
-                # 清除 get_network_structure / list_children / check_errors 的缓存
-                keys_to_remove = [k for k in _turn_dedup_cache 
-                                  if k.startswith(('get_network_structure:', 'list_children:', 'check_errors:'))]
-                for k in keys_to_remove:
-                    del _turn_dedup_cache[k]
+
+            # --- 再取投机预取的结果（不算缓存命中：不加提示前缀，随后写入缓存） ---
+            if prefetch is not None:
+                for idx, res in enumerate(prefetch.take_round(round_calls, dedup_flags)):
+                    if res is not None:
+                        results_ordered[idx] = res
+
+            # --- 按依赖图执行未缓存的调用（纯 Python 工具进线程池，主线程工具合并调度） ---
+            uncached = [i for i in range(len(parsed_calls)) if results_ordered[i] is None]
+            for i, res in zip(uncached, self._execute_round_calls([round_calls[i] for i in uncached])):
+                results_ordered[i] = res
             
-            # 将新执行的查询工具结果写入去重缓存
-            for idx, (tid, tname, targs, _tc) in enumerate(parsed_calls):
-                if not dedup_flags[idx] and tname in _DEDUP_TOOLS and results_ordered[idx]:
-                    dedup_key = f"{tname}:{json.dumps(targs, sort_keys=True)}"
-                    _turn_dedup_cache[dedup_key] = results_ordered[idx]
+            # --- 缓存维护：修改类工具按节点路径失效（含下游），新的查询结果写入缓存 ---
+            self._cache_update_round(tool_cache, round_calls, results_ordered, dedup_flags)
+            # 丢弃本轮未使用的预取，按本轮结果预测下一轮的查询（在下一次请求流式返回期间执行）
+            if prefetch is not None:
+                prefetch.end_round(round_calls, results_ordered)
 
             # --- 统一处理结果（保持原始顺序） ---
             should_break_tool_limit = False
@@ -3629,9 +3463,9 @@ class AIClient:
 
                 result_content = self._compress_tool_result(tool_name, result)
                 
-                # ★ 去重命中时追加提示，引导 AI 不要再重复调用
+                # ★ 缓存命中时追加提示，引导 AI 不要再重复调用
                 if dedup_flags[i]:
-                    result_content = f"[缓存] 本轮已用相同参数调用过此工具，以下是之前的结果（无需再次调用）:\n{result_content}"
+                    result_content = f"[缓存] 之前已用相同参数调用过此工具，且相关节点未被修改，以下是之前的结果（无需再次调用）:\n{result_content}"
 
                 working_messages.append({
                     'role': 'tool',
@@ -3709,8 +3543,9 @@ class AIClient:
             full_content = summary_content if summary_content else full_content
         
         print(f"[AI Client] Reached max iterations ({iteration})")
-        # 计算 cache 命中率
-        prompt_total = total_usage['cache_hit_tokens'] + total_usage['cache_miss_tokens']
+        # 计算 cache 命中率（命中 / 完整输入，prompt_tokens 已含缓存部分）
+        prompt_total = max(total_usage['prompt_tokens'],
+                           total_usage['cache_hit_tokens'] + total_usage['cache_miss_tokens'])
         if prompt_total > 0:
             total_usage['cache_hit_rate'] = total_usage['cache_hit_tokens'] / prompt_total
         else:
@@ -3996,6 +3831,10 @@ class AIClient:
         server_error_retries = 0    # 连续服务端错误重试计数
         max_server_retries = 3      # 最多重试 3 次服务端错误
         
+        # 工具结果缓存（同 agent_loop_stream）
+        tool_cache = self._tool_cache if self._tool_cache is not None else ToolResultCache()
+        prefetch = self._start_prefetch(tool_cache, effective_tools)
+        
         while iteration < max_iterations:
             if self._stop_event.is_set():
                 return {
@@ -4094,11 +3933,11 @@ class AIClient:
                             )
                         else:
                             # 临时服务器错误：等待，第2次开始才裁剪
-                            wait_seconds = 5 * server_error_retries
+                            wait_seconds = round(async_transport.backoff_delay(server_error_retries - 1, 5.0), 1)
                             if on_content:
                                 on_content(f"\n[服务端暂时不可用，{wait_seconds}秒后重试 ({server_error_retries}/{max_server_retries})...]\n")
-                            time.sleep(wait_seconds)
-                            if server_error_retries >= 2:
+                            # 等待期间用户停止：不裁剪，回到 while 顶部返回停止结果
+                            if self._retry_wait(server_error_retries - 1, wait_seconds) and server_error_retries >= 2:
                                 working_messages = self._progressive_trim(
                                     working_messages, tool_calls_history,
                                     trim_level=server_error_retries - 1,
@@ -4124,6 +3963,8 @@ class AIClient:
                         total_usage['total_tokens'] += usage.get('total_tokens', 0)
                         total_usage['cache_hit_tokens'] += usage.get('cache_hit_tokens', 0)
                         total_usage['cache_miss_tokens'] += usage.get('cache_miss_tokens', 0)
+                        # JSON 模式的工具说明已在系统提示中
+                        observe_usage(model, working_messages, None, usage)
                     
                     # ---- 记录本次 API 调用详情（对齐 Cursor） ----
                     import datetime as _dt
@@ -4175,8 +4016,9 @@ class AIClient:
                 if not cleaned_content.strip() and tool_calls_history:
                     # 有工具调用历史但无内容，继续循环等待总结
                     continue
-                # 计算 cache 命中率
-                prompt_total = total_usage['cache_hit_tokens'] + total_usage['cache_miss_tokens']
+                # 计算 cache 命中率（命中 / 完整输入，prompt_tokens 已含缓存部分）
+                prompt_total = max(total_usage['prompt_tokens'],
+                                   total_usage['cache_hit_tokens'] + total_usage['cache_miss_tokens'])
                 if prompt_total > 0:
                     total_usage['cache_hit_rate'] = total_usage['cache_hit_tokens'] / prompt_total
                 else:
@@ -4197,52 +4039,25 @@ class AIClient:
                 json_assistant_msg['reasoning_content'] = ''
             working_messages.append(json_assistant_msg)
             
-            # 执行工具调用（web 工具并行，Houdini 工具串行）
+            # 执行工具调用（按依赖图调度：纯 Python 工具并行，Houdini 工具合并到主线程批次）
             tool_results = []
 
-            _ASYNC_TOOL_NAMES_JSON = frozenset({'web_search', 'fetch_webpage', 'execute_shell'})
-            async_tc = [(i, tc) for i, tc in enumerate(tool_calls) if tc['name'] in _ASYNC_TOOL_NAMES_JSON]
-            houdini_tc = [(i, tc) for i, tc in enumerate(tool_calls) if tc['name'] not in _ASYNC_TOOL_NAMES_JSON]
-
-            # 结果槽位
-            exec_results = [None] * len(tool_calls)
-
-            # 并行 async 工具（web + shell）
-            if len(async_tc) > 1:
-                import concurrent.futures
-                def _exec_async_json(idx_tc):
-                    idx, tc = idx_tc
-                    tname, targs = tc['name'], tc['arguments']
-                    if tname == 'web_search':
-                        return idx, self._execute_web_search(targs)
-                    elif tname == 'fetch_webpage':
-                        return idx, self._execute_fetch_webpage(targs)
-                    else:  # execute_shell
-                        return idx, self._tool_executor(tname, **targs)
-                with concurrent.futures.ThreadPoolExecutor(max_workers=min(4, len(async_tc))) as pool:
-                    for idx, res in pool.map(_exec_async_json, async_tc):
+            # 结果槽位（先填入缓存命中的结果）
+            round_calls = [(tc['name'], tc['arguments']) for tc in tool_calls]
+            exec_results = self._cache_lookup_round(tool_cache, round_calls)
+            cached_flags = [r is not None for r in exec_results]
+            if prefetch is not None:
+                for idx, res in enumerate(prefetch.take_round(round_calls, cached_flags)):
+                    if res is not None:
                         exec_results[idx] = res
-            elif len(async_tc) == 1:
-                idx, tc = async_tc[0]
-                tname, targs = tc['name'], tc['arguments']
-                if tname == 'web_search':
-                    exec_results[idx] = self._execute_web_search(targs)
-                elif tname == 'fetch_webpage':
-                    exec_results[idx] = self._execute_fetch_webpage(targs)
-                else:  # execute_shell
-                    exec_results[idx] = self._tool_executor(tname, **targs)
-
-            # 串行 Houdini 工具
-            for idx, tc in houdini_tc:
-                tname, targs = tc['name'], tc['arguments']
-                if not self._tool_executor:
-                    exec_results[idx] = {"success": False, "error": f"工具执行器未设置，无法执行工具: {tname}"}
-                else:
-                    try:
-                        exec_results[idx] = self._tool_executor(tname, **targs)
-                    except Exception as e:
-                        import traceback
-                        exec_results[idx] = {"success": False, "error": f"工具执行异常: {str(e)}\n{traceback.format_exc()[:200]}"}
+
+            # 按依赖图执行未缓存的调用
+            uncached = [i for i in range(len(tool_calls)) if exec_results[i] is None]
+            for i, res in zip(uncached, self._execute_round_calls([round_calls[i] for i in uncached])):
+                exec_results[i] = res
+            self._cache_update_round(tool_cache, round_calls, exec_results, cached_flags)
+            if prefetch is not None:
+                prefetch.end_round(round_calls, exec_results)
 
             # 统一处理结果
             should_break_limit = False
@@ -4380,8 +4195,9 @@ class AIClient:
             
             full_content = summary_content if summary_content else full_content
         
-        # 计算 cache 命中率
-        prompt_total = total_usage['cache_hit_tokens'] + total_usage['cache_miss_tokens']
+        # 计算 cache 命中率（命中 / 完整输入，prompt_tokens 已含缓存部分）
+        prompt_total = max(total_usage['prompt_tokens'],
+                           total_usage['cache_hit_tokens'] + total_usage['cache_miss_tokens'])
         if prompt_total > 0:
             total_usage['cache_hit_rate'] = total_usage['cache_hit_tokens'] / prompt_total
         else:
@@ -4400,11 +4216,16 @@ class AIClient:
                         model: str = 'gpt-5.2',
                         provider: str = 'openai',
                         **kwargs) -> Dict[str, Any]:
-        """自动选择合适的 Agent Loop 模式"""
-        if self._supports_function_calling(provider, model):
-            return self.agent_loop_stream(messages=messages, model=model, provider=provider, **kwargs)
-        else:
-            return self.agent_loop_json_mode(messages=messages, model=model, provider=provider, **kwargs)
+        """自动选择合适的 Agent Loop 模式（结束后收尾投机预取，统计见 result['prefetch']）"""
+        result = None
+        try:
+            if self._supports_function_calling(provider, model):
+                result = self.agent_loop_stream(messages=messages, model=model, provider=provider, **kwargs)
+            else:
+                result = self.agent_loop_json_mode(messages=messages, model=model, provider=provider, **kwargs)
+        finally:
+            self._finish_prefetch(result)
+        return result
 
 
 # 兼容旧代码
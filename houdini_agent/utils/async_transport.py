@@ -0,0 +1,652 @@
+# -*- coding: utf-8 -*-
+"""
+异步 HTTP 传输层 — 常驻事件循环线程 + 按 provider 主机分池
+
+AIClient 原先所有 provider 共用一个同步 requests.Session：每个流式请求独占调用线程
+读取响应，重试用阻塞的 time.sleep 线性退避。本模块提供：
+
+  - 一个常驻的 asyncio 事件循环线程，所有会话的 HTTP 请求都在其上并发执行，
+    流式响应不再需要一个线程守着一个 socket
+  - 按 (scheme, host, port) 分池：每个 provider 主机独立的 keep-alive 连接池与并发上限
+  - 安装了 httpx + h2 时走 HTTP/2（同一主机的多个流复用一条连接）；否则使用内置的
+    asyncio HTTP/1.1 keep-alive 客户端（支持 chunked / Content-Length / gzip）
+  - backoff_delay()：带抖动的指数退避，供重试使用
+
+同步调用方（AIClient 的生成器、后台线程）通过 stream() 拿到一个类 requests 的响应对象
+（status_code / iter_content / json / text），字节块由事件循环线程推送到队列；
+异步调用方可直接在循环上使用 astream()。
+
+环境变量 HOUDINI_AGENT_HTTP_TRANSPORT=requests 时 AIClient 回退到 requests.Session。
+
+用法::
+
+    transport = get_transport()
+    with transport.stream('POST', url, json_body=payload, headers=headers,
+                          timeout=(10, 60)) as resp:
+        for chunk in resp.iter_content():
+            ...
+"""
+
+import os
+import ssl
+import json
+import zlib
+import queue
+import random
+import asyncio
+import threading
+import concurrent.futures
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+# httpx + h2 为可选依赖：存在时启用 HTTP/2 多路复用
+HAS_HTTPX = False
+HAS_H2 = False
+try:
+    import httpx
+    HAS_HTTPX = True
+    try:
+        import h2  # noqa: F401
+        HAS_H2 = True
+    except ImportError:
+        pass
+except ImportError:
+    httpx = None
+
+
+# ============================================================
+# 异常与退避
+# ============================================================
+
+class TransportError(Exception):
+    """传输层错误基类"""
+
+
+class TransportTimeout(TransportError, TimeoutError):
+    """连接或读取超时"""
+
+
+class TransportConnectionError(TransportError, ConnectionError):
+    """连接失败 / 连接被对端中断"""
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """第 attempt 次（从 0 开始）重试前的等待秒数：base·2^attempt 封顶后乘以 [0.5, 1) 随机抖动
+
+    抖动让多个会话同时遇到 5xx / 断连时不会在同一时刻集中重试。
+    """
+    return min(cap, base * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+
+def use_async_transport() -> bool:
+    return os.environ.get('HOUDINI_AGENT_HTTP_TRANSPORT', 'async').lower() != 'requests'
+
+
+# ============================================================
+# 内置 HTTP/1.1 keep-alive 连接池
+# ============================================================
+
+def _create_ssl_context() -> ssl.SSLContext:
+    ctx = ssl.create_default_context()
+    try:
+        import certifi
+        ctx.load_verify_locations(certifi.where())
+    except Exception:
+        pass
+    ctx.set_alpn_protocols(['http/1.1'])
+    return ctx
+
+
+class _Connection:
+    __slots__ = ('reader', 'writer', 'reused', 'last_used')
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.reused = False
+        self.last_used = 0.0
+
+    def close(self):
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+
+class _StaleConnection(Exception):
+    """复用的空闲连接已被服务端关闭（尚未收到任何响应字节，可安全重发）"""
+
+
+class _HostPool:
+    """单个主机的 keep-alive 连接池"""
+
+    IDLE_TIMEOUT = 60.0
+
+    def __init__(self, scheme: str, host: str, port: int, max_connections: int, stats: Dict[str, int]):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self._idle: deque = deque()
+        self._slots = asyncio.Semaphore(max_connections)
+        self._ssl = _create_ssl_context() if scheme == 'https' else None
+        self._stats = stats
+
+    async def acquire(self, connect_timeout: float) -> _Connection:
+        await self._slots.acquire()
+        loop = asyncio.get_running_loop()
+        try:
+            while self._idle:
+                conn = self._idle.pop()
+                if loop.time() - conn.last_used < self.IDLE_TIMEOUT and not conn.reader.at_eof():
+                    conn.reused = True
+                    self._stats['reused'] += 1
+                    return conn
+                conn.close()
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port, ssl=self._ssl,
+                                            server_hostname=self.host if self._ssl else None,
+                                            limit=2 ** 20),
+                    connect_timeout)
+            except asyncio.TimeoutError:
+                raise TransportTimeout(f"连接超时: {self.host}:{self.port}")
+            except OSError as e:
+                raise TransportConnectionError(f"连接失败: {self.host}:{self.port} ({e})")
+            self._stats['connections'] += 1
+            return _Connection(reader, writer)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn: _Connection, reusable: bool):
+        if reusable:
+            conn.last_used = asyncio.get_running_loop().time()
+            self._idle.append(conn)
+        else:
+            conn.close()
+        self._slots.release()
+
+    def close(self):
+        while self._idle:
+            self._idle.pop().close()
+
+
+async def _read(coro, timeout: float):
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except asyncio.TimeoutError:
+        raise TransportTimeout(f"读取超时（{timeout}s 无数据）")
+    except (ConnectionError, asyncio.IncompleteReadError) as e:
+        raise TransportConnectionError(f"Connection broken: {e}")
+
+
+class _H1Exchange:
+    """一次 HTTP/1.1 请求-响应；body() 为异步字节块迭代器"""
+
+    def __init__(self, pool: _HostPool, conn: _Connection, read_timeout: float):
+        self.pool = pool
+        self.conn = conn
+        self.read_timeout = read_timeout
+        self.status = 0
+        self.headers: Dict[str, str] = {}
+        self._done = False
+        self._reusable = False
+
+    async def send(self, method: str, target: str, host_header: str, headers: Dict[str, str], body: bytes):
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {host_header}",
+                 "Connection: keep-alive", "Accept-Encoding: gzip, identity",
+                 f"Content-Length: {len(body)}"]
+        for k, v in headers.items():
+            if k.lower() not in ('host', 'connection', 'content-length', 'accept-encoding'):
+                lines.append(f"{k}: {v}")
+        w = self.conn.writer
+        w.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body)
+        try:
+            await _read(w.drain(), self.read_timeout)
+            status_line = await _read(self.conn.reader.readline(), self.read_timeout)
+        except TransportConnectionError:
+            if self.conn.reused:
+                raise _StaleConnection()
+            raise
+        if not status_line:
+            if self.conn.reused:
+                raise _StaleConnection()
+            raise TransportConnectionError("RemoteDisconnected: 服务端未返回响应即关闭连接")
+        parts = status_line.decode('latin-1').split(None, 2)
+        self.status = int(parts[1])
+        http10 = parts[0] == 'HTTP/1.0'
+        while True:
+            line = await _read(self.conn.reader.readline(), self.read_timeout)
+            if line in (b'\r\n', b'\n', b''):
+                break
+            k, _, v = line.decode('latin-1').partition(':')
+            self.headers[k.strip().lower()] = v.strip()
+        self._keep_alive = not http10 and self.headers.get('connection', '').lower() != 'close'
+
+    async def body(self) -> AsyncIterator[bytes]:
+        reader = self.conn.reader
+        timeout = self.read_timeout
+        enc = self.headers.get('content-encoding', '').lower()
+        decomp = zlib.decompressobj(16 + zlib.MAX_WBITS) if enc == 'gzip' else (
+            zlib.decompressobj() if enc == 'deflate' else None)
+        try:
+            if self.status in (204, 304) or 100 <= self.status < 200:
+                self._reusable = self._keep_alive
+            elif 'chunked' in self.headers.get('transfer-encoding', '').lower():
+                while True:
+                    size_line = await _read(reader.readline(), timeout)
+                    if not size_line:
+                        raise TransportConnectionError("IncompleteRead: chunked 响应被截断")
+                    size = int(size_line.split(b';', 1)[0].strip() or b'0', 16)
+                    if size == 0:
+                        while (await _read(reader.readline(), timeout)) not in (b'\r\n', b'\n', b''):
+                            pass
+                        break
+                    data = await _read(reader.readexactly(size + 2), timeout)
+                    data = data[:-2]
+                    yield decomp.decompress(data) if decomp else data
+                self._reusable = self._keep_alive
+            elif 'content-length' in self.headers:
+                remaining = int(self.headers['content-length'])
+                while remaining > 0:
+                    data = await _read(reader.read(min(remaining, 65536)), timeout)
+                    if not data:
+                        raise TransportConnectionError("IncompleteRead: 响应体不完整")
+                    remaining -= len(data)
+                    yield decomp.decompress(data) if decomp else data
+                self._reusable = self._keep_alive
+            else:
+                # 无长度信息：读到连接关闭为止
+                while True:
+                    data = await _read(reader.read(65536), timeout)
+                    if not data:
+                        break
+                    yield decomp.decompress(data) if decomp else data
+            if decomp:
+                tail = decomp.flush()
+                if tail:
+                    yield tail
+            self._done = True
+        finally:
+            self.finish()
+
+    def finish(self):
+        if self.conn is not None:
+            self.pool.release(self.conn, self._done and self._reusable)
+            self.conn = None
+
+
+# ============================================================
+# 同步门面：类 requests 的流式响应
+# ============================================================
+
+_EOF = object()
+
+
+class StreamResponse:
+    """供同步调用方使用的响应对象（status_code / headers / iter_content / text / json）"""
+
+    # 调用方读到协议层结束标记（[DONE] / message_stop）后即关闭响应，连接上通常只剩
+    # chunked 结束块：留一小段时间让循环读完，连接即可放回池中复用
+    CLOSE_GRACE = 0.25
+
+    def __init__(self, read_timeout: float):
+        self.status_code = 0
+        self.headers: Dict[str, str] = {}
+        self.encoding = 'utf-8'
+        self._read_timeout = read_timeout
+        self._q: "queue.Queue[Any]" = queue.Queue()
+        self._head = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._future: Optional[concurrent.futures.Future] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._body: Optional[bytes] = None
+        self._consumed = False
+
+    # ---- 事件循环线程写入 ----
+
+    def _set_head(self, status: int, headers: Dict[str, str]):
+        self.status_code = status
+        self.headers = headers
+        self._head.set()
+
+    def _fail(self, exc: BaseException):
+        if not self._head.is_set():
+            self._error = exc
+            self._head.set()
+        else:
+            self._q.put(exc)
+
+    # ---- 调用方读取 ----
+
+    def _wait_head(self, timeout: float):
+        if not self._head.wait(timeout):
+            self.close()
+            raise TransportTimeout(f"等待响应头超时（{timeout}s）")
+        if self._error is not None:
+            raise self._error
+
+    def iter_content(self, chunk_size: int = 4096, decode_unicode: bool = False):
+        """按到达顺序产出字节块（chunk_size 仅为兼容 requests 签名）"""
+        if self._body is not None:
+            if self._body:
+                yield self._body
+            return
+        self._consumed = True
+        while True:
+            try:
+                item = self._q.get(timeout=self._read_timeout)
+            except queue.Empty:
+                self.close()
+                raise TransportTimeout(f"读取超时（{self._read_timeout}s 无数据）")
+            if item is _EOF:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    @property
+    def content(self) -> bytes:
+        if self._body is None:
+            if self._consumed:
+                raise RuntimeError("响应体已被 iter_content 读取")
+            self._body = b''.join(self.iter_content())
+        return self._body
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise TransportError(f"HTTP {self.status_code}: {self.text[:200]}")
+
+    def close(self):
+        """提前结束：宽限 CLOSE_GRACE 秒后取消循环上的读取任务（未读完的连接不放回池中）"""
+        future = self._future
+        if future is None or future.done():
+            return
+        if self._loop is not None and self._head.is_set() and self._error is None:
+            try:
+                self._loop.call_soon_threadsafe(self._loop.call_later, self.CLOSE_GRACE, future.cancel)
+                return
+            except RuntimeError:  # 循环已关闭
+                pass
+        future.cancel()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+# ============================================================
+# 传输层
+# ============================================================
+
+class AsyncTransport:
+    """常驻事件循环线程 + 按主机分池的 HTTP 传输层（线程安全）"""
+
+    MAX_CONNECTIONS_PER_HOST = 8
+
+    def __init__(self, max_connections_per_host: int = MAX_CONNECTIONS_PER_HOST,
+                 prefer_http2: bool = True):
+        self.max_connections_per_host = max_connections_per_host
+        # 只有 httpx 与 h2 都在时才走 httpx（HTTP/2）；否则使用内置的 HTTP/1.1 客户端
+        self._use_httpx = HAS_HTTPX and HAS_H2
+        self.http2 = prefer_http2 and self._use_httpx
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._pools: Dict[Tuple[str, str, int], Any] = {}   # 只在循环线程中访问
+        self.stats = {'requests': 0, 'connections': 0, 'reused': 0, 'retried_stale': 0}
+
+    # ----------------------------------------------------------
+    # 事件循环线程
+    # ----------------------------------------------------------
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    ready = threading.Event()
+
+                    def _run():
+                        asyncio.set_event_loop(loop)
+                        loop.call_soon(ready.set)
+                        loop.run_forever()
+
+                    self._thread = threading.Thread(target=_run, name='houdini-agent-http', daemon=True)
+                    self._thread.start()
+                    ready.wait()
+                    self._loop = loop
+                    print(f"[Transport] 事件循环线程已启动 "
+                          f"({'HTTP/2 via httpx' if self.http2 else 'httpx' if self._use_httpx else 'HTTP/1.1 keep-alive'})")
+        return self._loop
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        """在传输层事件循环上运行协程（任意线程可调用）"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def close(self):
+        if self._loop is None:
+            return
+
+        async def _close_all():
+            current = asyncio.current_task()
+            pending = [t for t in asyncio.all_tasks() if t is not current]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for pool in self._pools.values():
+                if HAS_HTTPX and isinstance(pool, httpx.AsyncClient):
+                    await pool.aclose()
+                else:
+                    pool.close()
+            self._pools.clear()
+        try:
+            self.submit(_close_all()).result(5)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = None
+
+    # ----------------------------------------------------------
+    # 连接池
+    # ----------------------------------------------------------
+
+    def _pool_for(self, scheme: str, host: str, port: int):
+        """按主机取连接池；超时随每个请求传入，不固化在池上"""
+        key = (scheme, host, port)
+        pool = self._pools.get(key)
+        if pool is None:
+            if self._use_httpx:
+                pool = httpx.AsyncClient(
+                    http2=self.http2, trust_env=False,
+                    limits=httpx.Limits(max_connections=self.max_connections_per_host,
+                                        max_keepalive_connections=self.max_connections_per_host,
+                                        keepalive_expiry=_HostPool.IDLE_TIMEOUT))
+            else:
+                pool = _HostPool(scheme, host, port, self.max_connections_per_host, self.stats)
+            self._pools[key] = pool
+        return pool
+
+    # ----------------------------------------------------------
+    # 异步接口（在循环线程上使用）
+    # ----------------------------------------------------------
+
+    def astream(self, method: str, url: str, body: bytes = b'',
+                headers: Optional[Dict[str, str]] = None,
+                timeout: Tuple[float, float] = (10, 60)):
+        """异步上下文管理器工厂：返回 (status, headers, 字节块异步迭代器)
+
+        用法::
+
+            async with transport.astream('POST', url, body, headers) as (status, hdrs, chunks):
+                async for data in chunks:
+                    ...
+        """
+        return _AsyncStream(self, method, url, body, headers or {}, timeout)
+
+    async def _open(self, method, url, body, headers, timeout) -> "_Opened":
+        """发出请求并读取响应头"""
+        connect_timeout, read_timeout = timeout
+        parts = urlsplit(url)
+        scheme = parts.scheme or 'http'
+        host = parts.hostname or 'localhost'
+        port = parts.port or (443 if scheme == 'https' else 80)
+        pool = self._pool_for(scheme, host, port)
+        self.stats['requests'] += 1
+
+        if self._use_httpx:
+            try:
+                req = pool.build_request(method, url, content=body, headers=headers,
+                                         timeout=httpx.Timeout(read_timeout, connect=connect_timeout))
+                resp = await pool.send(req, stream=True)
+            except httpx.TimeoutException as e:
+                raise TransportTimeout(str(e))
+            except httpx.TransportError as e:
+                raise TransportConnectionError(str(e))
+
+            async def _chunks():
+                try:
+                    async for data in resp.aiter_bytes():
+                        yield data
+                except httpx.TimeoutException as e:
+                    raise TransportTimeout(str(e))
+                except httpx.TransportError as e:
+                    raise TransportConnectionError(f"Connection broken: {e}")
+            return _Opened(resp.status_code, {k.lower(): v for k, v in resp.headers.items()},
+                           _chunks(), resp.aclose)
+
+        target = parts.path or '/'
+        if parts.query:
+            target += '?' + parts.query
+        host_header = host if parts.port is None else f"{host}:{port}"
+        for _ in range(2):
+            conn = await pool.acquire(connect_timeout)
+            ex = _H1Exchange(pool, conn, read_timeout)
+            try:
+                await ex.send(method, target, host_header, headers, body)
+            except _StaleConnection:
+                ex.finish()
+                self.stats['retried_stale'] += 1
+                continue
+            except BaseException:
+                ex.finish()
+                raise
+            return _Opened(ex.status, ex.headers, ex.body(), ex.finish)
+        raise TransportConnectionError("ConnectionReset: 连接反复被服务端关闭")
+
+    # ----------------------------------------------------------
+    # 同步接口（任意线程）
+    # ----------------------------------------------------------
+
+    def stream(self, method: str, url: str, json_body: Any = None, data: Optional[bytes] = None,
+               headers: Optional[Dict[str, str]] = None,
+               timeout: Any = (10, 60)) -> StreamResponse:
+        """发起请求，阻塞到响应头到达；响应体由事件循环线程推送，调用方按需读取"""
+        if not isinstance(timeout, (tuple, list)):
+            timeout = (timeout, timeout)
+        headers = dict(headers or {})
+        body = data or b''
+        if json_body is not None:
+            body = json.dumps(json_body, ensure_ascii=False).encode('utf-8')
+            headers.setdefault('Content-Type', 'application/json')
+        resp = StreamResponse(timeout[1])
+
+        async def _pump():
+            opened = None
+            try:
+                opened = await self._open(method, url, body, headers, tuple(timeout))
+                resp._set_head(opened.status, opened.headers)
+                async for piece in opened.chunks:
+                    if piece:
+                        resp._q.put(piece)
+                resp._q.put(_EOF)
+            except asyncio.CancelledError:
+                resp._q.put(_EOF)
+                raise
+            except BaseException as e:
+                resp._fail(e if isinstance(e, TransportError) else TransportConnectionError(str(e)))
+            finally:
+                if opened is not None:
+                    await opened.aclose()
+
+        resp._loop = self.loop
+        resp._future = self.submit(_pump())
+        resp._wait_head(timeout[0] + timeout[1])
+        return resp
+
+    def request(self, method: str, url: str, **kwargs) -> StreamResponse:
+        """非流式请求：读完整个响应体后返回"""
+        resp = self.stream(method, url, **kwargs)
+        resp.content  # noqa: B018  读取完整响应体
+        return resp
+
+    def post(self, url: str, json: Any = None, headers: Optional[Dict[str, str]] = None,
+             stream: bool = False, timeout: Any = (10, 60), **_ignored) -> StreamResponse:
+        """与 requests.Session.post 对齐的入口（忽略 proxies 等参数：始终直连）"""
+        if stream:
+            return self.stream('POST', url, json_body=json, headers=headers, timeout=timeout)
+        return self.request('POST', url, json_body=json, headers=headers, timeout=timeout)
+
+
+class _Opened:
+    """已收到响应头的请求：chunks 为响应体异步迭代器，aclose() 归还 / 关闭连接（幂等）"""
+
+    __slots__ = ('status', 'headers', 'chunks', '_release')
+
+    def __init__(self, status: int, headers: Dict[str, str], chunks, release):
+        self.status = status
+        self.headers = headers
+        self.chunks = chunks
+        self._release = release
+
+    async def aclose(self):
+        await self.chunks.aclose()
+        result = self._release()
+        if asyncio.iscoroutine(result):
+            await result
+
+
+class _AsyncStream:
+    def __init__(self, transport, method, url, body, headers, timeout):
+        self._args = (method, url, body, headers, timeout)
+        self._transport = transport
+        self._opened: Optional[_Opened] = None
+
+    async def __aenter__(self):
+        self._opened = await self._transport._open(*self._args)
+        return self._opened.status, self._opened.headers, self._opened.chunks
+
+    async def __aexit__(self, *exc):
+        if self._opened is not None:
+            await self._opened.aclose()
+        return False
+
+
+# ============================================================
+# 单例
+# ============================================================
+
+_transport: Optional[AsyncTransport] = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> AsyncTransport:
+    """进程内共享的传输层（所有 AIClient / 会话共用同一事件循环与连接池）"""
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = AsyncTransport()
+    return _transport
@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+"""
+离线帮助页语料 — get_houdini_node_doc / get_node_inputs 的字典查找 + 切片
+
+旧路径每次查询：线性遍历 hou.nodeTypeCategories() 找节点类型 → 阻塞 GET 本地帮助服务器
+→ 失败再请求 sidefx.com（8s 超时）→ BeautifulSoup / 正则把 HTML 压平成文本 → 运行时分页；
+只有压平后的文本进入 _doc_page_cache（LRU，128 条），淘汰后下一次翻页又要重新请求。
+
+这里直接从 help 目录的 nodes.zip（wiki 源文件）构建语料，一次完成：
+  - 每个帮助页渲染为纯文本（标题、简介、正文、参数 / 输入 / 输出等小节，去掉 wiki 标记）
+  - 按 PAGE_SIZE 预先切页，每页一条记录
+  - 节点索引："context/node_type" 与短名 → (首页序号, 页数, 总字符数, 标题, 输入端口)
+
+查询时不需要 hou、帮助服务器或网络：二分查找键 + 读取一页记录（mmap），页眉页脚与
+HoudiniMCP._paginate_doc 的格式完全相同。
+缓存：cache/doc_index/help_corpus.bin（doc_store.py），nodes.zip 的 mtime / 大小变化时重建。
+首次构建要渲染整个 nodes.zip（秒级）：面板启动时由 warm_help_corpus() 在后台线程加载 / 构建，
+工具调用用 get_help_corpus_nowait()，语料就绪前返回 None，调用方走原有的帮助页路径。
+"""
+
+import os
+import re
+import json
+import zipfile
+import threading
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .doc_rag import HoudiniDocIndex, _member_wanted
+from .doc_store import DocStore, StoreWriter, pack_record, seq_key
+
+# 每页字符数（与 HoudiniMCP._DOC_PAGE_SIZE 一致）
+PAGE_SIZE = 2500
+
+# AI / hou 使用的类别名 → nodes.zip 中的目录名
+_CONTEXT_ALIASES: Dict[str, str] = {
+    "object": "obj", "rop": "out", "driver": "out", "cop": "cop2",
+}
+
+# 短名冲突时的优先级（与 HoudiniDocIndex._apply_records 相同）
+_CTX_PRIORITY = {"sop": 0, "obj": 1, "dop": 2, "cop2": 3}
+
+# @section → 渲染后的小节标题
+_SECTION_TITLES = {
+    "parameters": "Parameters", "inputs": "Inputs", "outputs": "Outputs",
+    "locals": "Local Variables", "related": "See also", "examples": "Examples",
+}
+
+
+@dataclass
+class CorpusEntry:
+    """语料中一个节点的索引项"""
+    node_type: str          # 内部名
+    context: str            # sop / obj / dop / ...
+    title: str              # 显示名称
+    first_page: int         # 首页在 pages 表中的序号
+    page_count: int
+    total_chars: int
+    inputs: list            # [[label, description], ...]（无 @inputs 时为空）
+
+
+def _encode_entry(e: CorpusEntry) -> bytes:
+    return pack_record([e.node_type, e.context, e.title, str(e.first_page), str(e.page_count),
+                        str(e.total_chars), json.dumps(e.inputs, ensure_ascii=False)])
+
+
+def _decode_entry(f: List[str]) -> CorpusEntry:
+    return CorpusEntry(node_type=f[0], context=f[1], title=f[2], first_page=int(f[3]),
+                       page_count=int(f[4]), total_chars=int(f[5]), inputs=json.loads(f[6]))
+
+
+# ============================================================
+# wiki → 纯文本（纯函数）
+# ============================================================
+
+_DIRECTIVE_RE = re.compile(r"^\s*(?:#\w+:|:include\b|#include\b)")
+_HEADING_RE = re.compile(r"^\s*=+\s*(.+?)\s*=+\s*$")
+_INLINE_SUBS = (
+    (re.compile(r"\[(?:Image|Icon|Include):[^\]]*\]"), ""),
+    (re.compile(r"\[([^\]|\[]+)\|[^\]]+\]"), r"\1"),                      # [文字|链接]
+    (re.compile(r"\[(?:Node|Hom|Vex|Exp|Cmd|Doc):([^\]]+)\]"), r"\1"),   # [Node:sop/box]
+    (re.compile(r"'''(.+?)'''"), r"\1"),
+    (re.compile(r"''(.+?)''"), r"\1"),
+)
+
+
+def _clean_inline(text: str) -> str:
+    for pattern, repl in _INLINE_SUBS:
+        text = pattern.sub(repl, text)
+    return text
+
+
+def _render_block(text: str) -> List[str]:
+    """wiki 段落 → 纯文本行（去掉 #key: 指令与 include，标题去掉 = 号，空行合并）"""
+    out: List[str] = []
+    for line in text.split("\n"):
+        if _DIRECTIVE_RE.match(line):
+            continue
+        m = _HEADING_RE.match(line)
+        line = m.group(1) if m else _clean_inline(line.rstrip().replace("\t", "    "))
+        if not line.strip():
+            if out and out[-1]:
+                out.append("")
+            continue
+        out.append(line)
+    while out and not out[-1]:
+        out.pop()
+    return out
+
+
+def render_help_page(doc: dict) -> str:
+    """HoudiniDocIndex._parse_wiki 的结果 → 帮助页纯文本"""
+    lines: List[str] = []
+    if doc.get("title"):
+        lines.append(doc["title"])
+    if doc.get("description"):
+        lines += ["", _clean_inline(doc["description"])]
+    body = _render_block(doc.get("body", ""))
+    if body:
+        lines += [""] + body
+    for sec, text in doc.get("sections", {}).items():
+        block = _render_block(text)
+        if block:
+            lines += ["", _SECTION_TITLES.get(sec, sec.capitalize()), ""] + block
+    return "\n".join(lines).strip()
+
+
+def parse_inputs(doc: dict) -> list:
+    """@inputs 段落 → [[label, description], ...]（格式与 @parameters 相同）"""
+    inputs = HoudiniDocIndex._parse_parameters(doc.get("sections", {}).get("inputs", ""))
+    out = []
+    for label, desc in inputs:
+        desc = " ".join(w for w in _clean_inline(desc).split()
+                        if not (w.startswith("#") and w.endswith(":")))
+        out.append([_clean_inline(label), desc])
+    return out
+
+
+def format_doc_page(page_text: str, node_type: str, category: str,
+                    page: int, total_pages: int, total_chars: int) -> str:
+    """单页文本加页眉页脚（与 HoudiniMCP._paginate_doc 的输出格式相同）"""
+    header = f"[{node_type} 节点文档] (第 {page}/{total_pages} 页, 共 {total_chars} 字符)\n\n"
+    if total_pages == 1:
+        return header + page_text
+    if page < total_pages:
+        footer = f"\n\n[第 {page}/{total_pages} 页] 还有更多内容，调用 get_houdini_node_doc(node_type=\"{node_type}\", category=\"{category}\", page={page + 1}) 查看下一页"
+    else:
+        footer = f"\n\n[第 {page}/{total_pages} 页 - 最后一页]"
+    return header + page_text + footer
+
+
+def split_pages(text: str, page_size: int = PAGE_SIZE) -> List[str]:
+    """按固定字符数切页（至少一页）"""
+    return [text[i:i + page_size] for i in range(0, len(text), page_size)] or [""]
+
+
+def _member_node(name: str, raw: str) -> Optional[Tuple[str, str, str, str, list]]:
+    """nodes.zip 成员 → (内部名, context, 标题, 纯文本, 输入端口)；非节点页返回 None"""
+    doc = HoudiniDocIndex._parse_wiki(raw)
+    parts = name.replace("\\", "/").split("/")
+    internal = doc.get("internal", "") or Path(parts[-1]).stem
+    context = doc.get("context", "") or (parts[-2] if len(parts) >= 2 and parts[-2] != "nodes" else "")
+    if not internal:
+        return None
+    text = render_help_page(doc)
+    if not text:
+        return None
+    return internal, context.lower(), doc.get("title", "") or internal, text, parse_inputs(doc)
+
+
+def _base_name(node_type: str) -> str:
+    """带命名空间 / 版本的内部名 → 短名（labs::edge_damage::1.0 → edge_damage）"""
+    parts = node_type.split("::")
+    if len(parts) > 1 and re.fullmatch(r"[\d.]+", parts[-1]):
+        parts = parts[:-1]
+    return parts[-1]
+
+
+# ============================================================
+# 语料
+# ============================================================
+
+class HelpCorpus:
+    """预渲染、预分页的节点帮助语料（mmap 只读）
+
+    Args:
+        help_dir: 含 nodes.zip 的目录，None 时与 HoudiniDocIndex 使用相同的发现顺序
+        cache_dir: 缓存目录，None 为 <项目>/cache/doc_index
+    """
+
+    # 缓存格式版本：渲染规则或表结构变化时递增，旧缓存自动重建
+    _STORE_VERSION = "1"
+
+    def __init__(self, help_dir: Optional[str] = None, cache_dir: Optional[str] = None):
+        self._help_dir = HoudiniDocIndex._resolve_help_dir(help_dir)
+        project_root = Path(__file__).parent.parent.parent
+        self._cache_dir = Path(cache_dir) if cache_dir else project_root / "cache" / "doc_index"
+        self._store: Optional[DocStore] = None
+        self._nodes = None
+        self._pages = None
+        self._memo: Dict[str, Optional[CorpusEntry]] = {}
+        self._load_or_build()
+
+    @property
+    def available(self) -> bool:
+        return self._nodes is not None
+
+    def __len__(self) -> int:
+        return len(self._nodes) if self._nodes is not None else 0
+
+    # --- 构建 / 加载 ---
+
+    def _zip_path(self) -> Optional[Path]:
+        """nodes.zip 路径；发现的目录只含 vex / hom.zip（如项目内置 Doc/）时再查 $HFS"""
+        candidates = [self._help_dir]
+        hfs = os.environ.get("HFS")
+        if hfs:
+            candidates.append(Path(hfs) / "houdini" / "help")
+        for d in candidates:
+            if d is not None and (d / "nodes.zip").exists():
+                return d / "nodes.zip"
+        return None
+
+    def _signature(self, zp: Path) -> str:
+        st = zp.stat()
+        return json.dumps([str(zp), st.st_mtime_ns, st.st_size, PAGE_SIZE], separators=(",", ":"))
+
+    def _load_or_build(self):
+        zp = self._zip_path()
+        if zp is None:
+            print("[HelpCorpus] 未找到 nodes.zip，离线帮助语料不可用")
+            return
+        store_file = self._cache_dir / "help_corpus.bin"
+        sig = self._signature(zp)
+        store = DocStore.open(store_file)
+        if store is not None and (store.meta("version") != self._STORE_VERSION
+                                  or store.meta("zip") != sig):
+            store.close()
+            store = None
+        if store is None:
+            try:
+                self._cache_dir.mkdir(parents=True, exist_ok=True)
+                count, pages = self.build(zp, store_file, sig)
+                print(f"[HelpCorpus] 已构建: {count} 个帮助页, {pages} 页")
+            except Exception as e:
+                print(f"[HelpCorpus] 构建失败: {e}")
+                return
+            store = DocStore.open(store_file)
+            if store is None:
+                return
+        self._attach(store)
+
+    def _attach(self, store: DocStore):
+        nodes, pages = store.table("nodes"), store.table("pages")
+        if nodes is None or pages is None:
+            store.close()
+            return
+        self._store, self._nodes, self._pages = store, nodes, pages
+
+    @classmethod
+    def build(cls, zip_path: Path, store_file: Path, signature: str = "") -> Tuple[int, int]:
+        """渲染 nodes.zip 全部帮助页并写入 store_file，返回 (帮助页数, 总页数)"""
+        entries: Dict[str, CorpusEntry] = {}
+        short: Dict[str, CorpusEntry] = {}
+        page_texts: List[str] = []
+        with zipfile.ZipFile(zip_path, "r") as zf:
+            for info in zf.infolist():
+                if not _member_wanted("node", info.filename):
+                    continue
+                try:
+                    parsed = _member_node(info.filename, zf.read(info).decode("utf-8", errors="ignore"))
+                except Exception:
+                    continue
+                if parsed is None:
+                    continue
+                internal, context, title, text, inputs = parsed
+                pages = split_pages(text)
+                entry = CorpusEntry(internal, context, title, len(page_texts), len(pages),
+                                    len(text), inputs)
+                page_texts.extend(pages)
+                key = internal.lower()
+                entries[f"{context}/{key}" if context else key] = entry
+                for name in {key, _base_name(key)}:
+                    prev = short.get(name)
+                    if prev is None or _CTX_PRIORITY.get(context, 99) < _CTX_PRIORITY.get(prev.context, 99):
+                        short[name] = entry
+
+        # 短名与 "context/name" 指向同一条目时共享同一条记录
+        records: Dict[int, bytes] = {}
+        items = list(entries.items()) + [(k, v) for k, v in short.items() if k not in entries]
+        w = StoreWriter()
+        w.add_table("meta", [
+            ("version", pack_record([cls._STORE_VERSION])),
+            ("zip", pack_record([signature])),
+        ])
+        w.add_table("nodes", [
+            (k, records.get(id(e)) or records.setdefault(id(e), _encode_entry(e)))
+            for k, e in items
+        ])
+        w.add_table("pages", [(seq_key(i), pack_record([t])) for i, t in enumerate(page_texts)])
+        w.write(store_file)
+        return len({id(e) for e in entries.values()}), len(page_texts)
+
+    # --- 查询 ---
+
+    def lookup(self, node_type: str, category: str = "sop") -> Optional[CorpusEntry]:
+        """节点类型 → 索引项：先按类别精确匹配，再按短名（跨类别）匹配"""
+        if self._nodes is None:
+            return None
+        name = node_type.lower().strip()
+        cat = category.lower().strip()
+        memo_key = f"{cat}/{name}"
+        if memo_key in self._memo:
+            return self._memo[memo_key]
+        entry = None
+        for key in (memo_key, f"{_CONTEXT_ALIASES.get(cat, cat)}/{name}", name, _base_name(name)):
+            i = self._nodes.find(key)
+            if i >= 0:
+                entry = _decode_entry(self._nodes.str_fields(i))
+                break
+        self._memo[memo_key] = entry
+        return entry
+
+    def page(self, node_type: str, category: str = "sop", page: int = 1) -> Optional[str]:
+        """某一页的文档文本（含页眉页脚）；语料中没有该节点时返回 None"""
+        entry = self.lookup(node_type, category)
+        if entry is None:
+            return None
+        page = max(1, min(page, entry.page_count))
+        text = self._pages.str_fields(entry.first_page + page - 1)[0]
+        # 跨类别命中时页脚提示实际的类别
+        cat = category.lower().strip()
+        if entry.context and entry.context not in (cat, _CONTEXT_ALIASES.get(cat, cat)):
+            category = entry.context
+        return format_doc_page(text, node_type, category, page, entry.page_count, entry.total_chars)
+
+    def inputs(self, node_type: str, category: str = "sop") -> Optional[str]:
+        """输入端口说明（来自帮助页 @inputs）；没有记录时返回 None"""
+        entry = self.lookup(node_type, category)
+        if entry is None or not entry.inputs:
+            return None
+        lines = [f"节点: {node_type} ({entry.title})",
+                 f"输入端口数量: {len(entry.inputs)}",
+                 "",
+                 "输入端口详情:"]
+        for i, (label, desc) in enumerate(entry.inputs):
+            lines.append(f"  [{i}] {label}" + (f" — {desc[:150]}" if desc else ""))
+        return "\n".join(lines)
+
+    def close(self):
+        if self._store is not None:
+            self._nodes = self._pages = None
+            self._store.close()
+            self._store = None
+
+
+# ============================================================
+# 全局单例
+# ============================================================
+
+_corpus_instance: Optional[HelpCorpus] = None
+_corpus_lock = threading.Lock()
+_warm_started = False
+_warm_lock = threading.Lock()
+
+
+def get_help_corpus() -> HelpCorpus:
+    """获取全局离线帮助语料（首次调用时加载或构建；工具可能在线程池中调用，需加锁）"""
+    global _corpus_instance
+    if _corpus_instance is None:
+        with _corpus_lock:
+            if _corpus_instance is None:
+                _corpus_instance = HelpCorpus()
+    return _corpus_instance
+
+
+def warm_help_corpus(background: bool = True) -> None:
+    """加载 / 构建全局语料（只启动一次）；background 为 False 时在调用线程执行（调用方已在后台线程）"""
+    global _warm_started
+    with _warm_lock:
+        if _warm_started:
+            return
+        _warm_started = True
+
+    def _warm():
+        try:
+            get_help_corpus()
+        except Exception as e:
+            print(f"[HelpCorpus] 后台加载失败: {e}")
+
+    if background:
+        threading.Thread(target=_warm, name='help-corpus-warmup', daemon=True).start()
+    else:
+        _warm()
+
+
+def get_help_corpus_nowait() -> Optional[HelpCorpus]:
+    """已加载时返回全局语料；否则确保后台加载已开始并返回 None（不阻塞调用线程，如 Houdini 主线程）"""
+    corpus = _corpus_instance
+    if corpus is None:
+        warm_help_corpus()
+    return corpus
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+文档向量检索层（可选，离线）
+
+为节点文档 / VEX 函数 / 知识库片段预计算向量，存为 NumPy 矩阵，
+查询时做批量余弦 top-k，与 doc_search.py 的 BM25 分数混合（见 HoudiniDocIndex.semantic_search）。
+
+两种向量化方式，均不访问网络：
+  - LocalModelEmbedder : 本地 sentence-transformers 模型目录（环境变量
+                         HOUDINI_AGENT_EMBED_MODEL 或 <项目>/models/embedding）
+  - HashedEmbedder     : 无模型时的回退方案。词项 + 字符 trigram 经 feature hashing
+                         投影到固定维度，按语料 IDF 加权；中文术语先经 doc_search 的
+                         术语表扩展出对应英文词项，使中文描述能命中英文文档
+
+缓存：cache/doc_index/houdini_doc_vectors.npy（矩阵，mmap 打开）
+      cache/doc_index/houdini_doc_vectors.state.npy（向量化器状态，如 IDF 表）
+      cache/doc_index/houdini_doc_vectors.json（行 → (kind, key)、向量化器标识）
+向量缓存与 houdini_doc_index.bin 的 build_id 绑定，文档索引重建后自动失效。
+
+NumPy 不可用时本模块的 HAS_NUMPY = False，调用方应退回纯词法检索。
+"""
+
+import os
+import json
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    np = None  # type: ignore
+    HAS_NUMPY = False
+
+from .doc_search import tokenize, expand_glossary
+
+
+# ============================================================
+# 向量化器
+# ============================================================
+
+class HashedEmbedder:
+    """Feature hashing 向量化（无需模型）
+
+    特征：
+      - 词项（tokenize 结果，含中文 bigram），权重 1.0
+      - 术语表扩展出的英文词项，权重 _GLOSSARY_WEIGHT
+      - 英文词的字符 trigram（带词边界），权重 _GRAM_WEIGHT，容忍词形变化
+        （erode / erosion、scatter / scattering）
+
+    每个特征取 crc32：低位对 dim 取模决定落桶、最高位决定符号（减少碰撞偏差）；
+    IDF 在更大的哈希空间（_IDF_BUCKETS）上统计，避免低维桶内碰撞把 IDF 抹平。
+    特征值 = log(1 + tf) × IDF，最后 L2 归一化。
+    """
+
+    _GLOSSARY_WEIGHT = 0.8
+    _GRAM_WEIGHT = 0.25
+    _IDF_BUCKETS = 1 << 18
+
+    def __init__(self, dim: int = 2048):
+        self.dim = dim
+        self.idf: Optional["np.ndarray"] = None   # [_IDF_BUCKETS] float32
+
+    @property
+    def ident(self) -> str:
+        return f"hashed-v1:{self.dim}"
+
+    def _features(self, text: str) -> Tuple["np.ndarray", "np.ndarray"]:
+        """文本 → (特征 crc32 数组, 加权 tf 数组)"""
+        feats: Dict[int, float] = {}
+
+        def _put(f: str, w: float):
+            h = zlib.crc32(f.encode("utf-8"))
+            feats[h] = feats.get(h, 0.0) + w
+
+        for tok in tokenize(text):
+            _put(tok, 1.0)
+            if tok.isascii() and len(tok) >= 4:
+                padded = f"<{tok}>"
+                for i in range(len(padded) - 2):
+                    _put("#" + padded[i:i + 3], self._GRAM_WEIGHT)
+        for tok in expand_glossary(text):
+            _put(tok, self._GLOSSARY_WEIGHT)
+        n = len(feats)
+        return (np.fromiter(feats.keys(), dtype=np.uint32, count=n),
+                np.fromiter(feats.values(), dtype=np.float32, count=n))
+
+    def _project(self, parsed: List[Tuple["np.ndarray", "np.ndarray"]]) -> "np.ndarray":
+        mat = np.zeros((len(parsed), self.dim), dtype=np.float32)
+        for row, (hashes, tf) in enumerate(parsed):
+            if not len(hashes):
+                continue
+            w = np.log1p(tf)
+            if self.idf is not None:
+                w *= self.idf[hashes % self._IDF_BUCKETS]
+            sign = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+            np.add.at(mat[row], (hashes % self.dim).astype(np.int64), sign * w)
+        return _normalize(mat)
+
+    def fit(self, texts: Sequence[str]) -> "np.ndarray":
+        """以语料统计 IDF 并返回归一化后的语料矩阵"""
+        parsed = [self._features(t) for t in texts]
+        buckets = [np.unique(h % self._IDF_BUCKETS) for h, _ in parsed]
+        df = np.bincount(np.concatenate(buckets) if buckets else np.zeros(0, np.int64),
+                         minlength=self._IDF_BUCKETS).astype(np.float32)
+        n = float(max(len(texts), 1))
+        # 语料中从未出现的特征 IDF 置 0：查询里的这类特征只会经由桶碰撞引入噪声
+        self.idf = np.where(df > 0, np.log((1.0 + n) / (1.0 + df)) + 1.0, 0.0).astype(np.float32)
+        return self._project(parsed)
+
+    def embed(self, texts: Sequence[str]) -> "np.ndarray":
+        return self._project([self._features(t) for t in texts])
+
+    def state(self) -> Optional["np.ndarray"]:
+        return self.idf
+
+    def load_state(self, state: Optional["np.ndarray"]):
+        self.idf = None if state is None else np.asarray(state, dtype=np.float32)
+
+
+class LocalModelEmbedder:
+    """本地 sentence-transformers 模型（只从磁盘加载，离线模式）"""
+
+    def __init__(self, model_dir: Path):
+        # 确保不会尝试联网下载 / 检查更新
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+        os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+        from sentence_transformers import SentenceTransformer  # type: ignore
+        self._model = SentenceTransformer(str(model_dir), device="cpu")
+        self.dim = int(self._model.get_sentence_embedding_dimension())
+        self._name = Path(model_dir).name
+
+    @property
+    def ident(self) -> str:
+        return f"st:{self._name}:{self.dim}"
+
+    def fit(self, texts: Sequence[str]) -> "np.ndarray":
+        return self.embed(texts)
+
+    def embed(self, texts: Sequence[str]) -> "np.ndarray":
+        vecs = self._model.encode(list(texts), batch_size=64, normalize_embeddings=True,
+                                  show_progress_bar=False, convert_to_numpy=True)
+        return np.asarray(vecs, dtype=np.float32)
+
+    def state(self) -> Optional["np.ndarray"]:
+        return None
+
+    def load_state(self, state: Optional["np.ndarray"]):
+        pass
+
+
+def _local_model_dir() -> Optional[Path]:
+    env = os.environ.get("HOUDINI_AGENT_EMBED_MODEL", "").strip()
+    if env:
+        return Path(env) if Path(env).is_dir() else None
+    default = Path(__file__).parent.parent.parent / "models" / "embedding"
+    return default if default.is_dir() else None
+
+
+def create_embedder():
+    """优先本地模型，不可用时回退到 HashedEmbedder"""
+    model_dir = _local_model_dir()
+    if model_dir is not None:
+        try:
+            emb = LocalModelEmbedder(model_dir)
+            print(f"[DocVector] 使用本地模型: {model_dir}")
+            return emb
+        except Exception as e:
+            print(f"[DocVector] 本地模型加载失败，使用 hashed 特征: {e}")
+    return HashedEmbedder()
+
+
+def _normalize(mat: "np.ndarray") -> "np.ndarray":
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (mat / norms).astype(np.float32, copy=False)
+
+
+# ============================================================
+# 向量索引
+# ============================================================
+
+class DocVectorIndex:
+    """(kind, key) → 向量的稠密矩阵 + 批量余弦 top-k
+
+    行按 kind 分段连续存放，kinds 过滤只需对相应行区间做矩阵乘法。
+    """
+
+    MATRIX_FILE = "houdini_doc_vectors.npy"
+    META_FILE = "houdini_doc_vectors.json"
+    STATE_FILE = "houdini_doc_vectors.state.npy"
+
+    def __init__(self, embedder, keys: List[Tuple[str, str]], matrix: "np.ndarray"):
+        self.embedder = embedder
+        self.keys = keys
+        self.matrix = matrix
+        self._ranges: Dict[str, Tuple[int, int]] = {}
+        for row, (kind, _key) in enumerate(keys):
+            start, _end = self._ranges.get(kind, (row, row))
+            self._ranges[kind] = (start, row + 1)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @classmethod
+    def build(cls, embedder, items: Iterable[Tuple[str, str, str]]) -> "DocVectorIndex":
+        """items: [(kind, key, text)]，同一 kind 的条目需连续"""
+        keys, texts = [], []
+        for kind, key, text in items:
+            keys.append((kind, key))
+            texts.append(text)
+        matrix = embedder.fit(texts) if texts else np.zeros((0, embedder.dim), np.float32)
+        return cls(embedder, keys, matrix)
+
+    # ----------------------------------------------------------
+    # 查询
+    # ----------------------------------------------------------
+
+    def _row_spans(self, kinds: Optional[Sequence[str]]) -> List[Tuple[int, int]]:
+        if not kinds:
+            return [(0, len(self.keys))]
+        return sorted(self._ranges[k] for k in kinds if k in self._ranges)
+
+    def search_batch(self, queries: Sequence[str], kinds: Optional[Sequence[str]] = None,
+                     top_k: int = 10) -> List[List[Tuple[float, str, str]]]:
+        """批量查询：一次矩阵乘法得到所有查询与候选行的余弦相似度
+
+        Returns:
+            每条查询一个 [(cosine, kind, key), ...] 列表，按相似度降序
+        """
+        spans = self._row_spans(kinds)
+        if not queries or not spans:
+            return [[] for _ in queries]
+        q = self.embedder.embed(queries)
+        sims = np.concatenate([q @ self.matrix[s:e].T for s, e in spans], axis=1)
+        rows = np.concatenate([np.arange(s, e) for s, e in spans])
+        k = min(top_k, sims.shape[1])
+        if k <= 0:
+            return [[] for _ in queries]
+        part = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        out = []
+        for qi in range(len(queries)):
+            cols = part[qi][np.argsort(-sims[qi, part[qi]])]
+            hits = []
+            for c in cols:
+                score = float(sims[qi, c])
+                if score <= 0.0:
+                    break
+                kind, key = self.keys[rows[c]]
+                hits.append((score, kind, key))
+            out.append(hits)
+        return out
+
+    def search(self, query: str, kinds: Optional[Sequence[str]] = None,
+               top_k: int = 10) -> List[Tuple[float, str, str]]:
+        return self.search_batch([query], kinds, top_k)[0]
+
+    # ----------------------------------------------------------
+    # 持久化
+    # ----------------------------------------------------------
+
+    def save(self, cache_dir: Path, stamp: str):
+        """写出矩阵 / 向量化器状态 / 元数据；stamp 为所属文档索引的 build_id
+
+        元数据最后写入：中途失败时旧元数据的 stamp 不匹配，load() 会拒绝半成品。
+        """
+        cache_dir = Path(cache_dir)
+        arrays = [(self.MATRIX_FILE, np.ascontiguousarray(self.matrix, dtype=np.float32))]
+        state = self.embedder.state()
+        if state is not None:
+            arrays.append((self.STATE_FILE, state))
+        for name, arr in arrays:
+            tmp = cache_dir / (name + ".tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, arr)
+            os.replace(tmp, cache_dir / name)
+        meta = {"stamp": stamp, "embedder": self.embedder.ident,
+                "has_state": state is not None, "keys": self.keys}
+        tmp = cache_dir / (self.META_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, cache_dir / self.META_FILE)
+
+    @classmethod
+    def load(cls, cache_dir: Path, embedder, stamp: str) -> Optional["DocVectorIndex"]:
+        """读取向量缓存；stamp / 向量化器不一致或文件损坏时返回 None"""
+        cache_dir = Path(cache_dir)
+        meta_path = cache_dir / cls.META_FILE
+        mat_path = cache_dir / cls.MATRIX_FILE
+        if not (meta_path.is_file() and mat_path.is_file()):
+            return None
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("stamp") != stamp or meta.get("embedder") != embedder.ident:
+                return None
+            matrix = np.load(mat_path, mmap_mode="r")
+            keys = [tuple(k) for k in meta["keys"]]
+            if matrix.shape != (len(keys), embedder.dim):
+                return None
+            if meta.get("has_state"):
+                embedder.load_state(np.load(cache_dir / cls.STATE_FILE))
+            return cls(embedder, keys, matrix)
+        except Exception as e:
+            print(f"[DocVector] 向量缓存读取失败: {e}")
+            return None
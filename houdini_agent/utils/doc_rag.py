@@ -9,15 +9,26 @@ Houdini 文档轻量级索引系统（重写版）
   - 知识库 → 分段检索  (from Doc/*.txt)
 
 数据源：Houdini help 目录下的 ZIP 文件（wiki 标记格式） + Doc/*.txt 知识库
+缓存：cache/doc_index/houdini_doc_index.bin（doc_store.py，mmap 懒解码）
+可选向量层：cache/doc_index/houdini_doc_vectors.npy（doc_embed.py，需要 NumPy）
 """
 
 import os
 import re
+import sys
+import glob
 import json
+import time
 import zipfile
+import threading
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .doc_search import DocSearchIndex, expand_glossary
+from .doc_store import (DocStore, StoreWriter, LazyRecordList, LazyRecordMap,
+                        pack_record, seq_key)
 
 
 # ============================================================
@@ -61,6 +72,146 @@ class KnowledgeChunk:
     keywords: List[str]     # 关键词列表 (小写)
 
 
+# ============================================================
+# 存储编解码（dataclass ↔ doc_store 记录字段）
+# ============================================================
+
+def _node_fields(d: NodeDoc) -> list:
+    return [d.node_type, d.context, d.title, d.description,
+            json.dumps(d.parameters, ensure_ascii=False)]
+
+
+def _decode_node(f: List[str]) -> NodeDoc:
+    return NodeDoc(node_type=f[0], context=f[1], title=f[2], description=f[3],
+                   parameters=json.loads(f[4]))
+
+
+def _decode_vex(f: List[str]) -> VexDoc:
+    return VexDoc(name=f[0], signature=f[1], description=f[2], category=f[3])
+
+
+def _decode_hom(f: List[str]) -> HomDoc:
+    return HomDoc(name=f[0], doc_type=f[1], signature=f[2], description=f[3])
+
+
+def _decode_chunk(f: List[str]) -> KnowledgeChunk:
+    return KnowledgeChunk(title=f[0], content=f[1], source=f[2],
+                          keywords=f[3].split("\n") if f[3] else [])
+
+
+# ============================================================
+# ZIP 成员解析（纯函数，可在进程池子进程中运行）
+# ============================================================
+
+# (ZIP 文件名, 记录类别)，按此顺序构建
+_ZIP_KINDS = (("nodes.zip", "node"), ("vex.zip", "vex"), ("hom.zip", "hom"))
+
+# 每个子进程任务处理的成员数；少于 _PARALLEL_MIN 个待解析成员时直接串行
+_BATCH_SIZE = 200
+_PARALLEL_MIN = 400
+
+
+def _member_wanted(kind: str, name: str) -> bool:
+    if not name.endswith(".txt") or "/_" in name:
+        return False
+    return not (kind == "node" and name.startswith("_"))
+
+
+def _member_hash(info: zipfile.ZipInfo) -> str:
+    """成员内容指纹：ZIP 中央目录里的 CRC32 + 解压后大小（无需读取内容）"""
+    return f"{info.CRC:08x}:{info.file_size}"
+
+
+def _parse_member(kind: str, name: str, raw: str) -> list:
+    """解析单个 ZIP 成员 → 记录列表（字段顺序与对应 dataclass 一致，可 JSON 序列化）"""
+    doc = HoudiniDocIndex._parse_wiki(raw)
+
+    if kind == "node":
+        internal = doc.get("internal", "")
+        context = doc.get("context", "")
+        if not internal:
+            parts = name.replace("\\", "/").split("/")
+            internal = Path(parts[-1]).stem
+            if not context and len(parts) >= 3:
+                context = parts[-2] if parts[-2] != "nodes" else ""
+        if not internal:
+            return []
+        params = HoudiniDocIndex._parse_parameters(
+            doc.get("sections", {}).get("parameters", "")
+        )
+        return [[internal, context, doc.get("title", internal),
+                 doc.get("description", "")[:300], params[:15]]]
+
+    if kind == "vex":
+        func_name = doc.get("internal", "") or Path(name).stem
+        if not func_name or func_name.startswith("_"):
+            return []
+        # 从 body / usage section 提取签名
+        sig_src = (doc.get("body", "") + "\n"
+                   + doc.get("sections", {}).get("usage", ""))
+        sig = ""
+        sig_m = re.search(r"`([^`]+)`", sig_src)
+        if sig_m:
+            sig = sig_m.group(1)
+        parts = name.replace("\\", "/").split("/")
+        cat = parts[-2] if len(parts) >= 2 and parts[-2] != "vex" else ""
+        return [[func_name, sig[:200], doc.get("description", "")[:200], cat]]
+
+    # hom: 主条目 + @methods 中的方法
+    title = doc.get("title", "")
+    if not title:
+        title = "hou." + Path(name).stem
+    records = [[title, doc.get("type", "") or "class", "", doc.get("description", "")[:300]]]
+    methods_text = doc.get("sections", {}).get("methods", "")
+    if methods_text:
+        records.extend(HoudiniDocIndex._parse_hom_methods(title, methods_text))
+    return records
+
+
+def _parse_member_batch(zip_path: str, kind: str, names: List[str]) -> List[Tuple[str, list]]:
+    """解析一批成员（进程池任务单元：子进程自行打开 ZIP，避免传输原始字节）"""
+    out = []
+    with zipfile.ZipFile(zip_path, "r") as zf:
+        for name in names:
+            try:
+                raw = zf.read(name).decode("utf-8", errors="ignore")
+                out.append((name, _parse_member(kind, name, raw)))
+            except Exception:
+                out.append((name, []))
+    return out
+
+
+def _pool_python() -> Optional[str]:
+    """进程池子进程使用的 Python 解释器
+
+    Houdini 内 sys.executable 是 houdini(.exe)，不能直接用于 spawn，
+    改用 $HFS 自带的 python；找不到则返回 None（串行解析）。
+    """
+    exe = sys.executable or ""
+    if os.path.basename(exe).lower().startswith("python"):
+        return exe
+    hfs = os.environ.get("HFS")
+    if hfs:
+        for pattern in ("python*/python.exe", "python/bin/python3", "bin/python3*"):
+            found = sorted(glob.glob(os.path.join(hfs, pattern)))
+            if found:
+                return found[-1]
+    return None
+
+
+def _default_workers() -> int:
+    """解析进程数：环境变量 HOUDINI_AGENT_DOC_WORKERS 优先（0/1 = 串行）"""
+    env = os.environ.get("HOUDINI_AGENT_DOC_WORKERS")
+    if env is not None:
+        try:
+            return max(0, int(env))
+        except ValueError:
+            pass
+    if _pool_python() is None:
+        return 0
+    return max(0, min(8, (os.cpu_count() or 1) - 1))
+
+
 # ============================================================
 # 核心：轻量级文档索引
 # ============================================================
@@ -70,10 +221,30 @@ class HoudiniDocIndex:
 
     使用 dict 实现 O(1) 查找，替代全量向量化。
     索引来源：$HFS/houdini/help 目录下的 ZIP 文件。
+
+    命中缓存时 node_index / vex_index / hom_index / knowledge_chunks 为
+    doc_store 的懒加载视图（只读 Mapping / Sequence），首次访问某条记录时才解码。
+
+    ZIP 变化时增量构建：缓存中保存每个成员的内容指纹与解析结果，
+    只有指纹变化的成员会被重新解析（进程池并行）。
+
+    Args:
+        help_dir: 文档目录（含 nodes.zip / vex.zip / hom.zip），None 自动发现
+        progress: 构建进度回调 (zip 名, 已完成成员数, 待解析成员总数)
+        workers: 解析进程数，None 取默认值，0/1 为串行
+        cache_dir: 缓存目录，None 为 <项目>/cache/doc_index
     """
 
-    def __init__(self, help_dir: Optional[str] = None):
+    # 缓存格式版本：记录字段或表结构变化时递增，旧缓存自动重建
+    _STORE_VERSION = "5"
+
+    def __init__(self, help_dir: Optional[str] = None,
+                 progress: Optional[Callable[[str, int, int], None]] = None,
+                 workers: Optional[int] = None,
+                 cache_dir: Optional[str] = None):
         self._help_dir = self._resolve_help_dir(help_dir)
+        self._progress = progress
+        self._workers = _default_workers() if workers is None else workers
 
         # 三大索引
         self.node_index: Dict[str, NodeDoc] = {}
@@ -87,15 +258,22 @@ class HoudiniDocIndex:
         self._node_aliases: Dict[str, str] = {}         # 别名(小写) → node_type
         self._vex_categories: Dict[str, List[str]] = {}  # category → [func_names]
         self._all_node_types: Optional[set] = None       # 懒初始化
+        self._search_index: Optional[DocSearchIndex] = None  # 倒排索引（懒初始化）
+        self._store: Optional[DocStore] = None               # mmap 缓存（命中时持有）
+        # 增量构建清单: "zip名:成员名" → (内容指纹, 解析记录)
+        self._member_cache: Dict[str, Tuple[str, list]] = {}
+        # 向量层（懒初始化；False = 不可用，不再重试）。auto_retrieve 在后台线程调用，需加锁
+        self._build_id = ""                                  # 与 houdini_doc_index.bin 绑定的构建标识
+        self._vector_index = None
+        self._vector_lock = threading.Lock()
 
         # 缓存
         project_root = Path(__file__).parent.parent.parent
-        self._cache_dir = project_root / "cache" / "doc_index"
+        self._cache_dir = Path(cache_dir) if cache_dir else project_root / "cache" / "doc_index"
         self._cache_dir.mkdir(parents=True, exist_ok=True)
         self._doc_dir = project_root / "Doc"
 
         self._load_or_build()
-        self._load_knowledge_base()
 
     # ==========================================================
     # 帮助目录发现
@@ -162,55 +340,189 @@ class HoudiniDocIndex:
     # ==========================================================
 
     def _load_or_build(self):
-        cache_file = self._cache_dir / "houdini_doc_index.json"
-
-        if cache_file.exists():
-            try:
-                with open(cache_file, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                if data.get("help_dir") == str(self._help_dir) and data.get("version") == 2:
-                    self._load_from_cache(data)
-                    print(f"[DocIndex] 缓存加载: {len(self.node_index)} 节点, "
-                          f"{len(self.vex_index)} VEX, {len(self.hom_index)} HOM")
-                    return
-            except Exception as e:
-                print(f"[DocIndex] 缓存失败: {e}")
-
-        if not self._help_dir:
-            print("[DocIndex] 未找到 Houdini help 目录，文档索引为空")
-            return
+        store_file = self._cache_dir / "houdini_doc_index.bin"
+        kb_files = self._knowledge_files()
+        kb_sig = self._knowledge_signature(kb_files)
+
+        zip_sig = self._zip_signature()
+
+        store = DocStore.open(store_file)
+        if store is not None and store.meta("version") != self._STORE_VERSION:
+            store.close()
+            store = None
+
+        if store is not None and store.meta("zips") == zip_sig:
+            if store.meta("knowledge") == kb_sig and self._attach_store(store):
+                print(f"[DocIndex] 缓存加载(mmap): {len(self._all_node_types or ())} 节点, "
+                      f"{len(self.vex_index)} VEX, {len(self.hom_index)} HOM, "
+                      f"{len(self.knowledge_chunks)} 知识库片段")
+                return
+            # 文档记录仍然有效，只有知识库文件变化：取出记录，重新解析 txt
+            print("[DocIndex] 知识库已变化，重新解析 Doc/*.txt ...")
+            self._member_cache = self._load_member_cache(store)
+            self._copy_records_from(store)
+            store.close()
+        else:
+            # ZIP 变化（如 Houdini 升级）或无缓存：按成员指纹增量构建
+            if store is not None:
+                self._member_cache = self._load_member_cache(store)
+                store.close()
+            if self._help_dir:
+                print(f"[DocIndex] 构建索引: {self._help_dir} ...")
+                self._build_indexes()
+            else:
+                print("[DocIndex] 未找到 Houdini help 目录，文档索引为空")
 
-        print(f"[DocIndex] 构建索引: {self._help_dir} ...")
-        self._build_indexes()
+        self._load_knowledge_base(kb_files)
+        self._build_aliases()
+        self._search_index = self._build_search_index()
 
         try:
-            self._save_to_cache(cache_file)
-            print(f"[DocIndex] 已缓存: {len(self.node_index)} 节点, "
+            self._save_store(store_file, kb_sig, zip_sig)
+            print(f"[DocIndex] 已缓存: {len(self._all_node_types or ())} 节点, "
                   f"{len(self.vex_index)} VEX, {len(self.hom_index)} HOM")
         except Exception as e:
             print(f"[DocIndex] 缓存保存失败: {e}")
 
+    def _zip_signature(self) -> str:
+        """ZIP 文件签名（路径 + mtime + 大小）；不变时跳过成员级比对"""
+        entries: List[Any] = [str(self._help_dir)]
+        if self._help_dir:
+            for name, _ in _ZIP_KINDS:
+                try:
+                    st = (self._help_dir / name).stat()
+                    entries.append([name, st.st_mtime_ns, st.st_size])
+                except OSError:
+                    continue
+        return json.dumps(entries, separators=(",", ":"))
+
     def _build_indexes(self):
-        """从 ZIP 文件构建所有索引"""
-        for name, builder in [("nodes.zip", self._build_node_index),
-                               ("vex.zip",   self._build_vex_index),
-                               ("hom.zip",   self._build_hom_index)]:
-            zp = self._help_dir / name
-            if zp.exists():
-                print(f"[DocIndex]   解析 {name} ...")
-                builder(zp)
+        """从 ZIP 文件构建所有索引（增量：指纹未变的成员复用缓存记录）"""
+        new_cache: Dict[str, Tuple[str, list]] = {}
+        for zip_name, kind in _ZIP_KINDS:
+            zp = self._help_dir / zip_name
+            if not zp.exists():
+                continue
+            print(f"[DocIndex]   解析 {zip_name} ...")
+            try:
+                with zipfile.ZipFile(zp, "r") as zf:
+                    infos = [i for i in zf.infolist() if _member_wanted(kind, i.filename)]
+            except Exception as e:
+                print(f"[DocIndex] {zip_name} 失败: {e}")
+                continue
+
+            records: Dict[str, list] = {}
+            stale: List[str] = []
+            for info in infos:
+                cached = self._member_cache.get(f"{zip_name}:{info.filename}")
+                if cached is not None and cached[0] == _member_hash(info):
+                    records[info.filename] = cached[1]
+                else:
+                    stale.append(info.filename)
+            records.update(self._parse_members(zp, kind, stale))
+
+            # 按 ZIP 原始顺序应用，保证与串行全量构建结果一致
+            count = 0
+            for info in infos:
+                recs = records.get(info.filename, [])
+                count += self._apply_records(kind, recs)
+                new_cache[f"{zip_name}:{info.filename}"] = (_member_hash(info), recs)
+            label = {"node": "节点文档", "vex": "VEX 函数", "hom": "HOM 条目"}[kind]
+            print(f"[DocIndex]   → {count} {label} "
+                  f"(复用 {len(infos) - len(stale)}, 重新解析 {len(stale)})")
+        self._member_cache = new_cache
         self._build_aliases()
 
+    def _parse_members(self, zip_path: Path, kind: str, names: List[str]) -> Dict[str, list]:
+        """解析指定成员；数量足够且允许多进程时使用进程池，失败自动回退串行"""
+        total = len(names)
+        if not total:
+            return {}
+        batches = [names[i:i + _BATCH_SIZE] for i in range(0, total, _BATCH_SIZE)]
+        results: Dict[str, list] = {}
+
+        if self._workers > 1 and total >= _PARALLEL_MIN:
+            try:
+                import multiprocessing
+                ctx = multiprocessing.get_context("spawn")
+                py = _pool_python()
+                if py and py != sys.executable:
+                    ctx.set_executable(py)
+                with ProcessPoolExecutor(max_workers=min(self._workers, len(batches), 61),
+                                         mp_context=ctx) as pool:
+                    futures = [pool.submit(_parse_member_batch, str(zip_path), kind, b)
+                               for b in batches]
+                    for fut in as_completed(futures):
+                        results.update(fut.result())
+                        self._report_progress(zip_path.name, len(results), total)
+                return results
+            except Exception as e:
+                print(f"[DocIndex]   进程池不可用，改为串行解析: {e}")
+                results.clear()
+
+        for batch in batches:
+            results.update(_parse_member_batch(str(zip_path), kind, batch))
+            self._report_progress(zip_path.name, len(results), total)
+        return results
+
+    def _report_progress(self, zip_name: str, done: int, total: int):
+        if self._progress is not None:
+            try:
+                self._progress(zip_name, done, total)
+            except Exception:
+                pass
+        elif total >= _PARALLEL_MIN and (done == total or done // _BATCH_SIZE % 5 == 0):
+            print(f"[DocIndex]     {zip_name}: {done}/{total}")
+
+    def _apply_records(self, kind: str, records: list) -> int:
+        """把成员解析记录写入索引，返回写入条数"""
+        if kind == "node":
+            # 短名(无context前缀)优先 SOP > OBJ > DOP > 其他
+            _CTX_PRIORITY = {"sop": 0, "obj": 1, "dop": 2, "cop2": 3}
+            for rec in records:
+                nd = NodeDoc(*rec)
+                existing = self.node_index.get(nd.node_type)
+                if existing is None or (
+                    _CTX_PRIORITY.get(nd.context, 99) <
+                    _CTX_PRIORITY.get(existing.context, 99)
+                ):
+                    self.node_index[nd.node_type] = nd
+                if nd.context:
+                    self.node_index[f"{nd.context}/{nd.node_type}"] = nd
+        elif kind == "vex":
+            for rec in records:
+                vd = VexDoc(*rec)
+                self.vex_index[vd.name] = vd
+                if vd.category:
+                    self._vex_categories.setdefault(vd.category, []).append(vd.name)
+        else:
+            for rec in records:
+                self.hom_index[rec[0]] = HomDoc(*rec)
+        return len(records)
+
     # ==========================================================
     # 知识库加载（Doc/*.txt 文件）
     # ==========================================================
 
-    def _load_knowledge_base(self):
-        """从 Doc/ 目录加载 .txt 知识库文件，按 ## 标题分段"""
+    def _knowledge_files(self) -> List[Path]:
         if not self._doc_dir or not self._doc_dir.is_dir():
-            return
+            return []
+        return sorted(self._doc_dir.glob("*.txt"))
 
-        txt_files = list(self._doc_dir.glob("*.txt"))
+    @staticmethod
+    def _knowledge_signature(txt_files: List[Path]) -> str:
+        """知识库文件签名（文件名 + mtime + 大小），用于判断缓存中的片段是否过期"""
+        entries = []
+        for p in txt_files:
+            try:
+                st = p.stat()
+                entries.append([p.name, st.st_mtime_ns, st.st_size])
+            except OSError:
+                continue
+        return json.dumps(entries, separators=(",", ":"))
+
+    def _load_knowledge_base(self, txt_files: List[Path]):
+        """解析 Doc/ 目录下的 .txt 知识库文件，按 ## 标题分段"""
         if not txt_files:
             return
 
@@ -272,91 +584,119 @@ class HoudiniDocIndex:
         return chunks
 
     def search_knowledge(self, query: str, top_k: int = 3) -> List[dict]:
-        """在知识库中搜索与查询匹配的片段"""
+        """在知识库中搜索与查询匹配的片段（BM25）"""
         if not self.knowledge_chunks:
             return []
 
-        ql = query.lower()
-        # 提取查询中的关键词
-        query_words = set(re.findall(r'[a-zA-Z_@][a-zA-Z0-9_@.]*', ql))
-        query_cn = set(re.findall(r'[\u4e00-\u9fff]{2,}', query))
-
-        scored: List[tuple] = []
-        for chunk in self.knowledge_chunks:
-            score = 0.0
-            # 英文关键词匹配
-            chunk_kw_set = set(chunk.keywords)
-            matched = query_words & chunk_kw_set
-            score += len(matched) * 0.3
-            # 中文关键词匹配
-            for cn in query_cn:
-                if cn in chunk.title or cn in chunk.content[:200]:
-                    score += 0.5
-            # 精确子串匹配（标题）
-            for w in query_words:
-                if len(w) >= 3 and w in chunk.title.lower():
-                    score += 0.8
-            if score > 0.2:
-                scored.append((score, chunk))
-
-        scored.sort(key=lambda x: x[0], reverse=True)
         results = []
-        for score, chunk in scored[:top_k]:
-            # 截取内容摘要
-            snippet = chunk.content[:300]
-            if len(chunk.content) > 300:
-                snippet += "..."
-            results.append({
-                "type": "knowledge",
-                "name": chunk.title,
-                "snippet": f"[知识库] {chunk.title}\n{snippet}",
-                "score": min(score, 1.0),
-                "source": chunk.source,
-            })
+        for bm25, _kind, key in self._get_search_index().search(
+                query, kinds=("knowledge",), top_k=top_k):
+            chunk = self.knowledge_chunks[int(key)]
+            score = self._norm_bm25(bm25)
+            if score > 0.2:
+                results.append(self._knowledge_result(chunk, score))
         return results
 
-    # --- 缓存序列化 ---
-
-    def _save_to_cache(self, path: Path):
-        data = {
-            "help_dir": str(self._help_dir),
-            "version": 2,
-            "nodes": {
-                k: {"node_type": v.node_type, "context": v.context,
-                     "title": v.title, "description": v.description,
-                     "parameters": v.parameters}
-                for k, v in self.node_index.items() if "/" not in k
-            },
-            "vex": {
-                k: {"name": v.name, "signature": v.signature,
-                     "description": v.description, "category": v.category}
-                for k, v in self.vex_index.items()
-            },
-            "hom": {
-                k: {"name": v.name, "doc_type": v.doc_type,
-                     "signature": v.signature, "description": v.description}
-                for k, v in self.hom_index.items()
-            },
+    @staticmethod
+    def _knowledge_result(chunk: KnowledgeChunk, score: float) -> dict:
+        # 截取内容摘要
+        snippet = chunk.content[:300]
+        if len(chunk.content) > 300:
+            snippet += "..."
+        return {
+            "type": "knowledge",
+            "name": chunk.title,
+            "snippet": f"[知识库] {chunk.title}\n{snippet}",
+            "score": score,
+            "source": chunk.source,
         }
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
-
-    def _load_from_cache(self, data: dict):
-        for k, v in data.get("nodes", {}).items():
-            doc = NodeDoc(**v)
-            self.node_index[k] = doc
-            if v.get("context"):
-                self.node_index[f"{v['context']}/{k}"] = doc
 
-        for k, v in data.get("vex", {}).items():
-            self.vex_index[k] = VexDoc(**v)
-            if v.get("category"):
-                self._vex_categories.setdefault(v["category"], []).append(k)
+    # --- 缓存序列化（doc_store） ---
+
+    def _save_store(self, path: Path, kb_sig: str, zip_sig: str):
+        build_id = f"{time.time_ns():x}"
+        w = StoreWriter()
+        w.add_table("meta", [
+            ("version", pack_record([self._STORE_VERSION])),
+            ("build_id", pack_record([build_id])),
+            ("help_dir", pack_record([str(self._help_dir)])),
+            ("zips", pack_record([zip_sig])),
+            ("knowledge", pack_record([kb_sig])),
+        ])
+        w.add_table("members", [
+            (k, pack_record([h, json.dumps(recs, ensure_ascii=False, separators=(",", ":"))]))
+            for k, (h, recs) in self._member_cache.items()
+        ])
+        # "context/name" 与短名指向同一 NodeDoc 时共享同一条记录
+        node_recs: Dict[int, bytes] = {}
+        w.add_table("nodes", [
+            (k, node_recs.get(id(d)) or node_recs.setdefault(id(d), pack_record(_node_fields(d))))
+            for k, d in self.node_index.items()
+        ])
+        w.add_table("vex", [
+            (k, pack_record([d.name, d.signature, d.description, d.category]))
+            for k, d in self.vex_index.items()
+        ])
+        w.add_table("hom", [
+            (k, pack_record([d.name, d.doc_type, d.signature, d.description]))
+            for k, d in self.hom_index.items()
+        ])
+        w.add_table("aliases", [(k, pack_record([v])) for k, v in self._node_aliases.items()])
+        w.add_table("vex_cat", [(k, pack_record(["\n".join(v)]))
+                                for k, v in self._vex_categories.items()])
+        w.add_table("knowledge", [
+            (seq_key(i), pack_record([c.title, c.content, c.source, "\n".join(c.keywords)]))
+            for i, c in enumerate(self.knowledge_chunks)
+        ])
+        for name, items in self._get_search_index().to_tables():
+            w.add_table(name, items)
+        w.write(path)
+        self._build_id = build_id
+
+    def _attach_store(self, store: DocStore) -> bool:
+        """把 mmap 缓存挂接为懒加载索引；缺表时返回 False"""
+        names = ("nodes", "vex", "hom", "aliases", "vex_cat", "knowledge")
+        tables = {n: store.table(n) for n in names}
+        search = DocSearchIndex.from_store(store)
+        if search is None or any(t is None for t in tables.values()):
+            return False
+        self.node_index = LazyRecordMap(tables["nodes"], _decode_node)
+        self.vex_index = LazyRecordMap(tables["vex"], _decode_vex)
+        self.hom_index = LazyRecordMap(tables["hom"], _decode_hom)
+        self._node_aliases = LazyRecordMap(tables["aliases"], lambda f: f[0])
+        self._vex_categories = LazyRecordMap(
+            tables["vex_cat"], lambda f: f[0].split("\n") if f[0] else [])
+        self.knowledge_chunks = LazyRecordList(tables["knowledge"], _decode_chunk)
+        self._all_node_types = {k for k in tables["nodes"].keys() if "/" not in k}
+        self._search_index = search
+        self._store = store
+        self._build_id = store.meta("build_id")
+        return True
 
-        for k, v in data.get("hom", {}).items():
-            self.hom_index[k] = HomDoc(**v)
-
-        self._build_aliases()
+    @staticmethod
+    def _load_member_cache(store: DocStore) -> Dict[str, Tuple[str, list]]:
+        """读取增量构建清单（成员指纹 + 解析记录）"""
+        t = store.table("members")
+        if t is None:
+            return {}
+        out = {}
+        for i in range(len(t)):
+            h, recs = t.str_fields(i)
+            out[t.key_at(i)] = (h, json.loads(recs))
+        return out
+
+    def _copy_records_from(self, store: DocStore):
+        """从缓存取出节点/VEX/HOM 记录到内存 dict（知识库除外），之后可安全关闭 store"""
+        if not self._attach_store(store):
+            return
+        self.node_index = dict(self.node_index.items())
+        self.vex_index = dict(self.vex_index.items())
+        self.hom_index = dict(self.hom_index.items())
+        self._vex_categories = dict(self._vex_categories.items())
+        self._node_aliases = {}
+        self.knowledge_chunks = []
+        self._search_index = None
+        self._store = None
 
     # ==========================================================
     # Wiki 格式解析器
@@ -468,143 +808,10 @@ class HoudiniDocIndex:
 
         return doc
 
-    # ==========================================================
-    # 节点索引  (nodes.zip)
-    # ==========================================================
-
-    def _build_node_index(self, zip_path: Path):
-        count = 0
-        try:
-            with zipfile.ZipFile(zip_path, "r") as zf:
-                for name in zf.namelist():
-                    if not name.endswith(".txt") or "/_" in name or name.startswith("_"):
-                        continue
-                    try:
-                        raw = zf.read(name).decode("utf-8", errors="ignore")
-                        doc = self._parse_wiki(raw)
-
-                        internal = doc.get("internal", "")
-                        context = doc.get("context", "")
-                        if not internal:
-                            parts = name.replace("\\", "/").split("/")
-                            internal = Path(parts[-1]).stem
-                            if not context and len(parts) >= 3:
-                                context = parts[-2] if parts[-2] != "nodes" else ""
-                        if not internal:
-                            continue
-
-                        params = self._parse_parameters(
-                            doc.get("sections", {}).get("parameters", "")
-                        )
-
-                        nd = NodeDoc(
-                            node_type=internal,
-                            context=context,
-                            title=doc.get("title", internal),
-                            description=doc.get("description", "")[:300],
-                            parameters=params[:15],
-                        )
-                        # 短名(无context前缀)优先 SOP > OBJ > DOP > 其他
-                        _CTX_PRIORITY = {"sop": 0, "obj": 1, "dop": 2, "cop2": 3}
-                        existing = self.node_index.get(internal)
-                        if existing is None or (
-                            _CTX_PRIORITY.get(context, 99) <
-                            _CTX_PRIORITY.get(existing.context, 99)
-                        ):
-                            self.node_index[internal] = nd
-                        if context:
-                            self.node_index[f"{context}/{internal}"] = nd
-                        count += 1
-                    except Exception:
-                        continue
-        except Exception as e:
-            print(f"[DocIndex] nodes.zip 失败: {e}")
-        print(f"[DocIndex]   -> {count} 节点文档")
-
-    # ==========================================================
-    # VEX 索引  (vex.zip)
-    # ==========================================================
-
-    def _build_vex_index(self, zip_path: Path):
-        count = 0
-        try:
-            with zipfile.ZipFile(zip_path, "r") as zf:
-                for name in zf.namelist():
-                    if not name.endswith(".txt") or "/_" in name:
-                        continue
-                    try:
-                        raw = zf.read(name).decode("utf-8", errors="ignore")
-                        doc = self._parse_wiki(raw)
-                        func_name = doc.get("internal", "") or Path(name).stem
-                        if not func_name or func_name.startswith("_"):
-                            continue
-
-                        # 从 body / usage section 提取签名
-                        sig_src = (doc.get("body", "") + "\n"
-                                   + doc.get("sections", {}).get("usage", ""))
-                        sig = ""
-                        sig_m = re.search(r"`([^`]+)`", sig_src)
-                        if sig_m:
-                            sig = sig_m.group(1)
-
-                        parts = name.replace("\\", "/").split("/")
-                        cat = parts[-2] if len(parts) >= 2 and parts[-2] != "vex" else ""
-
-                        self.vex_index[func_name] = VexDoc(
-                            name=func_name,
-                            signature=sig[:200],
-                            description=doc.get("description", "")[:200],
-                            category=cat,
-                        )
-                        if cat:
-                            self._vex_categories.setdefault(cat, []).append(func_name)
-                        count += 1
-                    except Exception:
-                        continue
-        except Exception as e:
-            print(f"[DocIndex] vex.zip 失败: {e}")
-        print(f"[DocIndex]   → {count} VEX 函数")
-
-    # ==========================================================
-    # HOM 索引  (hom.zip)
-    # ==========================================================
-
-    def _build_hom_index(self, zip_path: Path):
-        count = 0
-        try:
-            with zipfile.ZipFile(zip_path, "r") as zf:
-                for name in zf.namelist():
-                    if not name.endswith(".txt") or "/_" in name:
-                        continue
-                    try:
-                        raw = zf.read(name).decode("utf-8", errors="ignore")
-                        doc = self._parse_wiki(raw)
-                        title = doc.get("title", "")
-                        if not title:
-                            title = "hou." + Path(name).stem
-
-                        # 主条目
-                        self.hom_index[title] = HomDoc(
-                            name=title,
-                            doc_type=doc.get("type", "") or "class",
-                            signature="",
-                            description=doc.get("description", "")[:300],
-                        )
-                        count += 1
-
-                        # 提取方法
-                        methods_text = doc.get("sections", {}).get("methods", "")
-                        if methods_text:
-                            count += self._extract_hom_methods(title, methods_text)
-                    except Exception:
-                        continue
-        except Exception as e:
-            print(f"[DocIndex] hom.zip 失败: {e}")
-        print(f"[DocIndex]   → {count} HOM 条目")
-
-    def _extract_hom_methods(self, parent: str, text: str) -> int:
-        """从 @methods section 提取方法签名"""
-        count = 0
+    @staticmethod
+    def _parse_hom_methods(parent: str, text: str) -> list:
+        """从 @methods section 提取方法签名 → HomDoc 字段记录列表"""
+        records = []
         # 匹配  ::`methodName(self, arg1, arg2)`:  或类似格式
         for m in re.finditer(r"::`(\w+)\(([^)]*)\)`\s*:", text):
             mname = m.group(1)
@@ -625,14 +832,8 @@ class HoudiniDocIndex:
                 else:
                     break  # 非缩进行 = 描述结束
 
-            self.hom_index[full] = HomDoc(
-                name=full,
-                doc_type="method",
-                signature=f"{mname}({margs})",
-                description=" ".join(desc_lines)[:200],
-            )
-            count += 1
-        return count
+            records.append([full, "method", f"{mname}({margs})", " ".join(desc_lines)[:200]])
+        return records
 
     # ==========================================================
     # 参数解析
@@ -679,6 +880,138 @@ class HoudiniDocIndex:
             self._node_aliases[ntype.lower()] = ntype
         self._all_node_types = {k for k in self.node_index if "/" not in k}
 
+    # ==========================================================
+    # 倒排索引（BM25 + n-gram，见 doc_search.py）
+    # ==========================================================
+
+    # BM25 原始分 → (0, 1) 的归一化常数：原始分等于该值时得 0.5
+    _BM25_NORM = 8.0
+
+    @classmethod
+    def _norm_bm25(cls, raw: float) -> float:
+        return round(raw / (raw + cls._BM25_NORM), 3)
+
+    def _get_search_index(self) -> DocSearchIndex:
+        """获取倒排索引（命中缓存时来自 mmap，否则在内存中构建）"""
+        if self._search_index is None:
+            self._search_index = self._build_search_index()
+        return self._search_index
+
+    def _build_search_index(self) -> DocSearchIndex:
+        idx = DocSearchIndex()
+        for ntype in sorted(self._all_node_types or ()):
+            d = self.node_index[ntype]
+            idx.add("node", ntype, name=ntype, fields=(
+                (ntype, 3), (d.title, 3), (d.description, 1),
+                (" ".join(p[0] for p in d.parameters), 1)))
+        for fname, d in self.vex_index.items():
+            idx.add("vex", fname, name=fname, fields=(
+                (fname, 3), (d.description, 1), (d.category, 1)))
+        for hname, d in self.hom_index.items():
+            idx.add("hom", hname, name=hname, fields=(
+                (hname, 3), (d.signature, 1), (d.description, 1)))
+        for i, c in enumerate(self.knowledge_chunks):
+            idx.add("knowledge", str(i), fields=((c.title, 3), (c.content, 1)))
+        idx.finalize()
+        print(f"[DocIndex] 倒排索引: {len(idx)} 文档, {len(idx.postings)} 词项")
+        return idx
+
+    # ==========================================================
+    # 向量层（可选，见 doc_embed.py）
+    # ==========================================================
+
+    # 混合分数 = (1 - w) × BM25 归一化分 + w × 余弦相似度
+    # （benchmarks/bench_doc_semantic.py 上 0.5 的 hit@3 / MRR 最好）
+    _VECTOR_WEIGHT = 0.5
+    # 参与向量检索的文档类别（HOM 条目多为方法签名，向量化收益低）
+    _VECTOR_KINDS = ("node", "vex", "knowledge")
+    # 混合分低于该值的语义结果不注入上下文 / 不补入 search()
+    _SEMANTIC_MIN = 0.3
+
+    def _get_vector_index(self):
+        """获取向量索引；NumPy 不可用或被禁用时返回 None
+
+        设置环境变量 HOUDINI_AGENT_DOC_VECTORS=0 可关闭向量层。
+        """
+        if self._vector_index is not None:
+            return self._vector_index or None
+        if os.environ.get("HOUDINI_AGENT_DOC_VECTORS", "1").strip() == "0":
+            self._vector_index = False
+            return None
+        with self._vector_lock:
+            if self._vector_index is None:
+                self._vector_index = self._load_or_build_vectors() or False
+        return self._vector_index or None
+
+    def _load_or_build_vectors(self):
+        try:
+            from . import doc_embed
+        except ImportError:
+            return None
+        if not doc_embed.HAS_NUMPY:
+            print("[DocIndex] 未安装 NumPy，向量检索层不可用")
+            return None
+        try:
+            embedder = doc_embed.create_embedder()
+            if self._build_id:
+                vec = doc_embed.DocVectorIndex.load(self._cache_dir, embedder, self._build_id)
+                if vec is not None:
+                    return vec
+            t0 = time.perf_counter()
+            vec = doc_embed.DocVectorIndex.build(embedder, self._vector_items())
+            print(f"[DocIndex] 向量索引: {len(vec)} 文档, dim={embedder.dim}, "
+                  f"{(time.perf_counter() - t0) * 1000:.0f} ms")
+            if self._build_id:
+                vec.save(self._cache_dir, self._build_id)
+            return vec
+        except Exception as e:
+            print(f"[DocIndex] 向量索引构建失败: {e}")
+            return None
+
+    def _vector_items(self):
+        """(kind, key, 文本)，同一 kind 连续输出（DocVectorIndex 按 kind 分段）"""
+        for ntype in sorted(self._all_node_types or ()):
+            d = self.node_index[ntype]
+            params = " ".join(p[0] for p in d.parameters)
+            yield "node", ntype, f"{d.title} {ntype}\n{d.description}\n{params}"
+        for fname, d in self.vex_index.items():
+            yield "vex", fname, f"{fname} {d.category}\n{d.description}"
+        for i, c in enumerate(self.knowledge_chunks):
+            yield "knowledge", str(i), f"{c.title}\n{c.content[:1500]}"
+
+    def semantic_search(self, query: str, kinds: Optional[Tuple[str, ...]] = None,
+                        top_k: int = 5) -> List[dict]:
+        """语义检索：BM25 与向量余弦相似度混合打分
+
+        BM25 查询附加术语表扩展词（中文描述 → 英文术语）；
+        向量层不可用时退化为纯 BM25（分数即归一化 BM25）。
+
+        Returns:
+            与 search() 相同格式的结果列表，score 为混合分
+        """
+        kinds = kinds or self._VECTOR_KINDS
+        expanded = " ".join([query] + expand_glossary(query))
+        lexical = {(kind, key): self._norm_bm25(raw) for raw, kind, key in
+                   self._get_search_index().search(expanded, kinds=kinds, top_k=top_k * 4)}
+        vec = self._get_vector_index()
+        if vec is None:
+            blended = lexical
+        else:
+            semantic = {(kind, key): cos for cos, kind, key in
+                        vec.search(query, kinds=kinds, top_k=top_k * 4)}
+            w = self._VECTOR_WEIGHT
+            blended = {ck: round((1 - w) * lexical.get(ck, 0.0) + w * semantic.get(ck, 0.0), 3)
+                       for ck in lexical.keys() | semantic.keys()}
+
+        results = []
+        for (kind, key), score in sorted(blended.items(), key=lambda kv: kv[1], reverse=True):
+            if len(results) >= top_k:
+                break
+            entry = self._make_result(kind, key, score)
+            if entry:
+                results.append(entry)
+        return results
+
     # ==========================================================
     # 查询 API
     # ==========================================================
@@ -723,48 +1056,62 @@ class HoudiniDocIndex:
             results.append({"type": "hom", "name": hom.name,
                             "snippet": self._fmt_hom(hom), "score": 1.0})
 
-        # --- 子串匹配 ---
+        # --- 名称子串/前缀 + 全文 BM25（倒排索引） ---
         if len(results) < top_k:
-            words = {w for w in re.findall(r"[a-zA-Z_][a-zA-Z0-9_]{2,}", ql)}
-            seen = {r["name"] for r in results}
+            idx = self._get_search_index()
+            cand: Dict[tuple, float] = {}
 
+            # "hou" 是所有 HOM 名称的公共前缀，子串匹配无意义
+            words = {w for w in re.findall(r"[a-zA-Z_][a-zA-Z0-9_]{2,}", ql) if w != "hou"}
             for w in words:
+                for is_prefix, kind, key in idx.match_names(w, limit=top_k):
+                    score = (0.5 if kind == "node" else 0.4) + (0.1 if is_prefix else 0.0)
+                    cand[(kind, key)] = max(cand.get((kind, key), 0.0), score)
+
+            for raw, kind, key in idx.search(query, top_k=top_k * 2):
+                score = self._norm_bm25(raw)
+                if score > 0.2:
+                    cand[(kind, key)] = max(cand.get((kind, key), 0.0), score)
+
+            seen = {r["name"] for r in results}
+            for (kind, key), score in sorted(cand.items(), key=lambda kv: kv[1], reverse=True):
                 if len(results) >= top_k:
                     break
-                for ntype in (self._all_node_types or set()):
-                    if w in ntype.lower() and ntype not in seen:
-                        d = self.node_index[ntype]
-                        results.append({"type": "node", "name": ntype,
-                                        "snippet": self._fmt_node(d), "score": 0.5})
-                        seen.add(ntype)
-                        if len(results) >= top_k:
-                            break
-                for fname, d in self.vex_index.items():
-                    if w in fname.lower() and fname not in seen:
-                        results.append({"type": "vex", "name": fname,
-                                        "snippet": self._fmt_vex(d), "score": 0.4})
-                        seen.add(fname)
-                        if len(results) >= top_k:
-                            break
-                for hname, d in self.hom_index.items():
-                    if w in hname.lower() and hname not in seen:
-                        results.append({"type": "hom", "name": hname,
-                                        "snippet": self._fmt_hom(d), "score": 0.4})
-                        seen.add(hname)
-                        if len(results) >= top_k:
-                                    break
-
-        # --- 知识库匹配 ---
-        if len(results) < top_k:
-            kb_results = self.search_knowledge(query, top_k=top_k - len(results))
+                entry = self._make_result(kind, key, score)
+                if entry and entry["name"] not in seen:
+                    results.append(entry)
+                    seen.add(entry["name"])
+
+        # --- 词法命中不足（措辞与文档不一致）：用语义检索补齐 ---
+        if len(results) < top_k and self._get_vector_index() is not None:
             seen = {r["name"] for r in results}
-            for kr in kb_results:
-                if kr["name"] not in seen:
-                    results.append(kr)
-                    seen.add(kr["name"])
+            for entry in self.semantic_search(query, top_k=top_k):
+                if len(results) >= top_k:
+                    break
+                if entry["name"] not in seen and entry["score"] >= self._SEMANTIC_MIN:
+                    results.append(entry)
+                    seen.add(entry["name"])
 
         results.sort(key=lambda x: x["score"], reverse=True)
         return results[:top_k]
+
+    def _make_result(self, kind: str, key: str, score: float) -> Optional[dict]:
+        """倒排索引命中 (kind, key) → search() 结果条目"""
+        if kind == "node":
+            d = self.node_index.get(key)
+            return d and {"type": "node", "name": key,
+                          "snippet": self._fmt_node(d), "score": score}
+        if kind == "vex":
+            d = self.vex_index.get(key)
+            return d and {"type": "vex", "name": key,
+                          "snippet": self._fmt_vex(d), "score": score}
+        if kind == "hom":
+            d = self.hom_index.get(key)
+            return d and {"type": "hom", "name": key,
+                          "snippet": self._fmt_hom(d), "score": score}
+        if kind == "knowledge":
+            return self._knowledge_result(self.knowledge_chunks[int(key)], score)
+        return None
     
     # ==========================================================
     # 自动检索（供 _run_agent 注入上下文）
@@ -834,11 +1181,11 @@ class HoudiniDocIndex:
             if ndoc:
                 _add(self._fmt_node(ndoc), ndoc.node_type)
 
-        # 3) 中文关键词 → 匹配节点标题
+        # 3) 中文关键词 → 匹配节点标题（倒排索引取候选，再校验子串）
         for kw in re.findall(r"[\u4e00-\u9fff]{2,}", user_message)[:3]:
-            for ntype, ndoc in self.node_index.items():
-                if "/" in ntype:
-                    continue
+            for _raw, _kind, ntype in self._get_search_index().search(
+                    kw, kinds=("node",), top_k=5, require_all=True):
+                ndoc = self.node_index[ntype]
                 if kw in ndoc.title or kw in ndoc.description:
                     _add(self._fmt_node(ndoc), ndoc.node_type)
                     break
@@ -880,6 +1227,12 @@ class HoudiniDocIndex:
                     if kr["score"] > 0.3:
                         _add(kr["snippet"], kr["name"])
 
+        # 5) 语义检索 — 覆盖关键词 / _KB_HINTS 未命中的改写式描述（需要向量层）
+        if total < max_chars and self._get_vector_index() is not None:
+            for r in self.semantic_search(user_message, top_k=3):
+                if r["score"] >= self._SEMANTIC_MIN:
+                    _add(r["snippet"], r["name"])
+
         if not snippets:
             return ""
         return "[Houdini 文档参考]\n" + "\n".join(snippets)
@@ -1018,13 +1371,16 @@ class HoudiniDocIndex:
 # ============================================================
 
 _index_instance: Optional[HoudiniDocIndex] = None
+_index_lock = threading.Lock()
 
 
 def get_doc_index(help_dir: Optional[str] = None) -> HoudiniDocIndex:
-    """获取全局文档索引实例（单例）"""
+    """获取全局文档索引实例（单例；面板启动时由后台线程预热，与检索线程并发调用时只构建一次）"""
     global _index_instance
     if _index_instance is None:
-        _index_instance = HoudiniDocIndex(help_dir)
+        with _index_lock:
+            if _index_instance is None:
+                _index_instance = HoudiniDocIndex(help_dir)
     return _index_instance
 
 
@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+"""
+文档倒排索引（BM25 + 字符 n-gram）
+
+为 HoudiniDocIndex 提供与文档规模无关的查询速度：
+  - 词项倒排表: token → [(doc_id, BM25 权重)]，查询只遍历命中的 posting
+  - 名称 n-gram 索引: trigram → [name_id]，用于子串 / 前缀匹配
+
+文档统一以 (kind, key) 标识：
+  kind = "node" / "vex" / "hom" / "knowledge"
+  key  = node_type / 函数名 / HOM 全名 / 知识库片段序号
+
+BM25 权重在构建时预先算好（impact-ordered），查询 = 若干 posting 求和。
+中文术语表（expand_glossary）供语义检索做跨语言查询扩展。
+索引随文档记录一起写入 houdini_doc_index.bin（见 doc_store.py），
+打开后 posting 表按词项懒解码。
+"""
+
+import re
+import math
+import heapq
+from array import array
+from typing import Dict, List, Optional, Tuple, Iterable, Sequence
+
+from .doc_store import DocStore, LazyRecordList, LazyRecordMap, pack_record, seq_key
+
+
+# ============================================================
+# 分词
+# ============================================================
+
+_RE_EN = re.compile(r"[a-z_@][a-z0-9_@]*")
+_RE_CJK = re.compile(r"[\u4e00-\u9fff]+")
+
+# 仅过滤纯虚词；"point" / "node" 等在 Houdini 文档中有区分度，交给 IDF 处理
+_STOP = frozenset({
+    "the", "an", "is", "are", "was", "were", "be", "been", "to", "of", "in",
+    "for", "on", "with", "at", "by", "from", "as", "and", "or", "if", "it",
+    "its", "this", "that", "these", "those", "can", "will", "you", "your",
+    "not", "no", "so", "than", "then", "into", "which", "when", "also",
+    "hou",  # 所有 HOM 条目共有的命名空间前缀，无区分度
+})
+
+
+def tokenize(text: str) -> List[str]:
+    """文本 → 词项列表（保留重复，用于 tf 统计）
+
+    - 英文标识符小写；带下划线的标识符额外拆出子词
+    - 中文连续片段拆成字符 bigram（单字片段保留原字）
+    """
+    if not text:
+        return []
+    tokens: List[str] = []
+    for w in _RE_EN.findall(text.lower()):
+        if len(w) < 2 or w in _STOP:
+            continue
+        tokens.append(w)
+        if "_" in w:
+            tokens.extend(p for p in w.split("_") if len(p) >= 2 and p != w)
+    for run in _RE_CJK.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def _trigrams(s: str) -> List[str]:
+    return [s[i:i + 3] for i in range(len(s) - 2)]
+
+
+# ============================================================
+# 中文术语 → 英文词项（跨语言查询扩展）
+# ============================================================
+
+_ZH_GLOSSARY: Dict[str, str] = {
+    # 几何 / 点操作
+    "点": "point", "面": "primitive face", "边": "edge", "顶点": "vertex",
+    "点云": "point cloud scatter", "散布": "scatter", "撒点": "scatter",
+    "分布": "scatter distribute", "复制": "copy", "实例": "instance copytopoints",
+    "克隆": "copy instance", "删除": "delete blast", "合并": "merge", "融合": "fuse",
+    "分离": "split blast", "布尔": "boolean", "挤出": "extrude polyextrude",
+    "细分": "subdivide", "平滑": "smooth relax", "变形": "deform transform",
+    "弯曲": "bend", "扭曲": "twist", "重采样": "resample", "重拓扑": "remesh",
+    "拓扑": "topology", "连通": "connectivity", "分组": "group", "组": "group",
+    "网格": "mesh grid", "曲线": "curve", "路径": "path curve", "盒子": "box",
+    "立方体": "box cube", "球": "sphere", "圆柱": "tube cylinder", "平面": "grid plane",
+    "地面": "ground grid", "法线": "normal", "切线": "tangent", "包围盒": "bounding box",
+    "距离": "distance xyzdist", "最近": "nearest nearpoint", "查找": "find lookup",
+    "编号": "number ptnum index", "索引": "index", "数量": "count number",
+    # 属性 / 变换
+    "属性": "attribute attrib", "颜色": "color cd", "位置": "position", "速度": "velocity",
+    "旋转": "rotate rotation orient quaternion", "朝向": "orient direction",
+    "缩放": "scale pscale", "大小": "size scale pscale", "随机": "random rand",
+    "变换": "transform matrix", "矩阵": "matrix", "向量": "vector", "数组": "array",
+    "参数": "parameter parm", "通道": "channel chf", "表达式": "expression",
+    "变量": "variable", "函数": "function", "代码": "code snippet", "语法": "syntax",
+    "循环": "loop foreach", "条件": "condition if",
+    # 时间 / 动画
+    "动画": "animation time frame", "时间": "time", "帧": "frame", "关键帧": "keyframe",
+    "摆动": "sway wiggle oscillate sin", "摇摆": "sway wiggle oscillate sin",
+    "飘动": "wind flutter", "风": "wind", "正弦": "sin wave", "波": "wave",
+    # 噪声 / 地形
+    "噪声": "noise", "噪波": "noise", "扰动": "noise distort", "湍流": "turbulence noise",
+    "地形": "terrain heightfield", "高度场": "heightfield", "高度": "height",
+    "山": "mountain", "山脉": "mountain range", "起伏": "mountain noise",
+    "侵蚀": "erosion erode", "风化": "erosion weathering", "河流": "river flow",
+    "遮罩": "mask", "蒙版": "mask", "图层": "layer", "层": "layer", "坡度": "slope",
+    "叠加": "combine layer blend", "混合": "blend combine", "分层": "layer",
+    # 植被
+    "草": "grass", "草地": "grass", "树": "tree", "树枝": "branch", "叶子": "leaf",
+    "植被": "vegetation foliage scatter",
+    # 模拟
+    "模拟": "simulation", "解算": "solver", "求解器": "solver", "刚体": "rbd rigid",
+    "破碎": "fracture voronoi", "碰撞": "collision", "约束": "constraint",
+    "流体": "fluid flip", "烟": "smoke pyro", "烟雾": "smoke pyro", "火": "fire pyro",
+    "爆炸": "explosion pyro", "布料": "cloth vellum", "毛发": "hair fur groom",
+    "粒子": "particle pop", "体积": "volume vdb", "雪": "snow mpm", "沙": "sand",
+    "泥": "mud", "混凝土": "concrete", "橡胶": "rubber", "物理": "physics",
+    # 渲染 / 纹理 / 图像
+    "纹理": "texture", "材质": "material shader", "渲染": "render", "灯光": "light",
+    "相机": "camera", "烘焙": "bake baker", "图像": "image", "合成": "composite",
+    "滤镜": "filter", "贴图": "texture map", "展开": "unwrap uv",
+    # 机器学习 / 其它
+    "机器学习": "machine learning ml", "训练": "train training", "推理": "inference",
+    "模型": "model", "数据集": "dataset", "游戏": "game gamedev", "导出": "export",
+    "导入": "import",
+}
+
+# 术语按长度降序匹配，避免 "点云" 先被 "点" 截断
+_GLOSSARY_TERMS = sorted(_ZH_GLOSSARY, key=len, reverse=True)
+
+
+def expand_glossary(text: str) -> List[str]:
+    """从文本中找出术语表命中的中文词，返回扩展出的英文词项
+
+    文档以英文为主而用户多用中文描述需求：语义检索时把扩展词项拼到查询后面，
+    BM25 与向量层都能借此命中英文文档。
+    """
+    out: List[str] = []
+    rest = text
+    for term in _GLOSSARY_TERMS:
+        if term in rest:
+            out.extend(_ZH_GLOSSARY[term].split())
+            rest = rest.replace(term, " ")
+    return out
+
+
+# ============================================================
+# 倒排索引
+# ============================================================
+
+class DocSearchIndex:
+    """BM25 倒排索引 + 名称 trigram 索引
+
+    用法::
+
+        idx = DocSearchIndex()
+        idx.add("node", "scatter", name="scatter", fields=[(title, 3), (desc, 1)])
+        ...
+        idx.finalize()
+        idx.search("scatter points", kinds=("node",), top_k=5)
+        idx.match_names("scat")
+    """
+
+    FORMAT_VERSION = 1
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self.docs: List[Tuple[str, str]] = []          # doc_id → (kind, key)
+        self.postings: Dict[str, Tuple[List[int], List[float]]] = {}
+        self.names: List[Tuple[str, int]] = []         # name_id → (小写名称, doc_id)
+        self.grams: Dict[str, List[int]] = {}          # trigram → [name_id]
+
+        # 构建期暂存：doc_id → {token: 加权 tf}
+        self._pending: List[Dict[str, float]] = []
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    # ----------------------------------------------------------
+    # 构建
+    # ----------------------------------------------------------
+
+    def add(self, kind: str, key: str, name: str = "",
+            fields: Iterable[Tuple[str, float]] = ()) -> int:
+        """添加一篇文档
+
+        Args:
+            kind: 文档类别
+            key: 类别内唯一键
+            name: 参与子串 / 前缀匹配的名称（空则不进入 n-gram 索引）
+            fields: [(文本, 权重)]，权重即该字段内词项的 tf 倍数
+        """
+        doc_id = len(self.docs)
+        self.docs.append((kind, key))
+        tf: Dict[str, float] = {}
+        for text, weight in fields:
+            for tok in tokenize(text):
+                tf[tok] = tf.get(tok, 0.0) + weight
+        self._pending.append(tf)
+
+        if name:
+            low = name.lower()
+            name_id = len(self.names)
+            self.names.append((low, doc_id))
+            for g in set(_trigrams(low)):
+                self.grams.setdefault(g, []).append(name_id)
+        return doc_id
+
+    def finalize(self):
+        """根据暂存的 tf 计算 BM25 权重，生成最终 posting 表"""
+        n_docs = len(self._pending)
+        if not n_docs:
+            self._pending = []
+            return
+        lengths = [sum(tf.values()) for tf in self._pending]
+        avgdl = (sum(lengths) / n_docs) or 1.0
+
+        df: Dict[str, int] = {}
+        for tf in self._pending:
+            for tok in tf:
+                df[tok] = df.get(tok, 0) + 1
+
+        k1, b = self.K1, self.B
+        postings: Dict[str, Tuple[List[int], List[float]]] = {}
+        for doc_id, tf in enumerate(self._pending):
+            norm = k1 * (1.0 - b + b * lengths[doc_id] / avgdl)
+            for tok, f in tf.items():
+                n = df[tok]
+                idf = math.log(1.0 + (n_docs - n + 0.5) / (n + 0.5))
+                w = idf * f * (k1 + 1.0) / (f + norm)
+                ids, ws = postings.setdefault(tok, ([], []))
+                ids.append(doc_id)
+                ws.append(round(w, 4))
+        self.postings = postings
+        self._pending = []
+
+    # ----------------------------------------------------------
+    # 查询
+    # ----------------------------------------------------------
+
+    def search(self, query: str, kinds: Optional[Sequence[str]] = None,
+               top_k: int = 10, require_all: bool = False) -> List[Tuple[float, str, str]]:
+        """BM25 检索
+
+        Args:
+            query: 查询文本
+            kinds: 限定文档类别（None = 全部）
+            top_k: 返回条数
+            require_all: True 时只返回包含全部查询词项的文档
+
+        Returns:
+            [(bm25_score, kind, key), ...] 按得分降序
+        """
+        q_tokens = set(tokenize(query))
+        if not q_tokens:
+            return []
+        scores: Dict[int, float] = {}
+        hits: Dict[int, int] = {}
+        matched_terms = 0
+        for tok in q_tokens:
+            plist = self.postings.get(tok)
+            if plist is None:
+                if require_all:
+                    return []
+                continue
+            matched_terms += 1
+            ids, ws = plist
+            for doc_id, w in zip(ids, ws):
+                scores[doc_id] = scores.get(doc_id, 0.0) + w
+                if require_all:
+                    hits[doc_id] = hits.get(doc_id, 0) + 1
+        if not scores:
+            return []
+
+        docs = self.docs
+        kind_set = set(kinds) if kinds else None
+        ranked = []
+        for doc_id, s in scores.items():
+            if require_all and hits[doc_id] < matched_terms:
+                continue
+            kind, key = docs[doc_id]
+            if kind_set is not None and kind not in kind_set:
+                continue
+            ranked.append((s, kind, key))
+        ranked.sort(key=lambda x: x[0], reverse=True)
+        return ranked[:top_k]
+
+    def match_names(self, word: str, kinds: Optional[Sequence[str]] = None,
+                    limit: int = 20) -> List[Tuple[bool, str, str]]:
+        """名称子串 / 前缀匹配（trigram 候选 + 子串校验）
+
+        Returns:
+            [(is_prefix, kind, key), ...]  前缀命中优先，其次名称越短越靠前
+        """
+        w = word.lower()
+        if len(w) < 3:
+            return []
+        grams = set(_trigrams(w))
+        lists = []
+        for g in grams:
+            ids = self.grams.get(g)
+            if not ids:
+                return []
+            lists.append(ids)
+        lists.sort(key=len)
+        cand = set(lists[0])
+        for ids in lists[1:]:
+            cand.intersection_update(ids)
+            if not cand:
+                return []
+
+        kind_set = set(kinds) if kinds else None
+        out = []
+        for name_id in cand:
+            name, doc_id = self.names[name_id]
+            pos = name.find(w)
+            if pos < 0:
+                continue
+            kind, key = self.docs[doc_id]
+            if kind_set is not None and kind not in kind_set:
+                continue
+            out.append((pos != 0, len(name), key, kind))
+        return [(not p, k, key) for p, _, key, k in heapq.nsmallest(limit, out)]
+
+    # ----------------------------------------------------------
+    # 持久化（doc_store 表）
+    # ----------------------------------------------------------
+
+    TABLES = ("s_docs", "s_post", "s_names", "s_grams")
+
+    def to_tables(self) -> List[Tuple[str, List[Tuple[str, bytes]]]]:
+        """导出为 StoreWriter.add_table 所需的 (表名, [(键, 记录)]) 列表"""
+        return [
+            ("s_docs", [(seq_key(i), pack_record(d)) for i, d in enumerate(self.docs)]),
+            ("s_post", [(tok, pack_record([array("I", ids).tobytes(), array("f", ws).tobytes()]))
+                        for tok, (ids, ws) in self.postings.items()]),
+            ("s_names", [(seq_key(i), pack_record([name, str(doc_id)]))
+                         for i, (name, doc_id) in enumerate(self.names)]),
+            ("s_grams", [(g, pack_record([array("I", ids).tobytes()]))
+                         for g, ids in self.grams.items()]),
+        ]
+
+    @classmethod
+    def from_store(cls, store: DocStore) -> Optional["DocSearchIndex"]:
+        """基于已打开的 DocStore 构造懒加载索引；缺表时返回 None"""
+        tables = [store.table(n) for n in cls.TABLES]
+        if any(t is None for t in tables):
+            return None
+        t_docs, t_post, t_names, t_grams = tables
+        idx = cls()
+        idx.docs = LazyRecordList(t_docs, tuple)
+        idx.postings = LazyRecordMap(t_post, _decode_posting, raw=True)
+        idx.names = LazyRecordList(t_names, lambda f: (f[0], int(f[1])))
+        idx.grams = LazyRecordMap(t_grams, lambda f: _u32_array(f[0]), raw=True)
+        return idx
+
+
+def _u32_array(buf) -> array:
+    a = array("I")
+    a.frombytes(buf)
+    return a
+
+
+def _decode_posting(fields) -> Tuple[array, array]:
+    ws = array("f")
+    ws.frombytes(fields[1])
+    return _u32_array(fields[0]), ws
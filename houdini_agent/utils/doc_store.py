@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+文档索引二进制存储（mmap + 懒解码）
+
+替代 houdini_doc_index.json：启动时不再 json.load 全量数据、不再为每条记录
+创建 dataclass，而是 mmap 打开文件，查询时按需解码命中的记录。
+
+文件布局（小端）::
+
+    Header   : magic(4s) | version(u32) | table_count(u32) | reserved(u32)
+    目录     : table_count × [ name(16s) | offset(u64) ]
+    每张表   : count(u32) | reserved(u32) | key_blob_len(u64) | rec_blob_len(u64)
+               key_off[count + 1] (u64)    键在 key blob 中的区间，按键字节序排序
+               rec_off[count]     (u64)    记录在 rec blob 中的起点（允许多个键共享一条记录）
+               key blob | rec blob | 补零到 8 字节对齐
+
+    记录     : field_count(u32) | field_len[field_count](u32) | 字段字节...
+
+键有序存放，查找为 O(log n) 二分，不需要在内存中重建 dict。
+"""
+
+import os
+import sys
+import mmap
+import struct
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+
+
+MAGIC = b"HDIX"
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<4sIII")
+_DIR_ENTRY = struct.Struct("<16sQ")
+_TABLE_HEAD = struct.Struct("<IIQQ")
+_U32 = struct.Struct("<I")
+
+Field = Union[str, bytes]
+
+
+# ============================================================
+# 记录编解码
+# ============================================================
+
+def pack_record(fields: Sequence[Field]) -> bytes:
+    """字段列表 → 记录字节（str 以 UTF-8 编码）"""
+    raw = [f.encode("utf-8") if isinstance(f, str) else bytes(f) for f in fields]
+    head = struct.pack(f"<I{len(raw)}I", len(raw), *(len(r) for r in raw))
+    return head + b"".join(raw)
+
+
+def unpack_record(buf, offset: int = 0) -> List[memoryview]:
+    """记录字节 → 字段 memoryview 列表（零拷贝，调用方按需 decode）"""
+    (n,) = _U32.unpack_from(buf, offset)
+    lens = struct.unpack_from(f"<{n}I", buf, offset + 4)
+    mv = memoryview(buf)
+    pos = offset + 4 + 4 * n
+    out = []
+    for ln in lens:
+        out.append(mv[pos:pos + ln])
+        pos += ln
+    return out
+
+
+def unpack_str_record(buf, offset: int = 0) -> List[str]:
+    return [bytes(f).decode("utf-8") for f in unpack_record(buf, offset)]
+
+
+# ============================================================
+# 写入
+# ============================================================
+
+class StoreWriter:
+    """收集若干表后一次性写出
+
+    用法::
+
+        w = StoreWriter()
+        w.add_table("vex", [(key, pack_record([...])), ...])
+        w.write(path)
+    """
+
+    def __init__(self):
+        self._tables: List[Tuple[str, List[Tuple[bytes, bytes]]]] = []
+
+    def add_table(self, name: str, items: Iterable[Tuple[str, bytes]]):
+        """添加一张表；相同记录字节对象会被多个键共享（按 id 去重）"""
+        if len(name.encode("ascii")) > 16:
+            raise ValueError(f"表名过长: {name}")
+        encoded = [(k.encode("utf-8"), rec) for k, rec in items]
+        encoded.sort(key=lambda kv: kv[0])
+        self._tables.append((name, encoded))
+
+    @staticmethod
+    def _table_bytes(items: List[Tuple[bytes, bytes]]) -> bytes:
+        key_off = [0]
+        rec_off = []
+        rec_blob = bytearray()
+        shared: Dict[int, int] = {}
+        for key, rec in items:
+            key_off.append(key_off[-1] + len(key))
+            off = shared.get(id(rec))
+            if off is None:
+                off = len(rec_blob)
+                shared[id(rec)] = off
+                rec_blob += rec
+            rec_off.append(off)
+        key_blob = b"".join(k for k, _ in items)
+        n = len(items)
+        body = b"".join((
+            _TABLE_HEAD.pack(n, 0, len(key_blob), len(rec_blob)),
+            struct.pack(f"<{n + 1}Q", *key_off),
+            struct.pack(f"<{n}Q", *rec_off),
+            key_blob,
+            bytes(rec_blob),
+        ))
+        # 下一张表的偏移数组保持 8 字节对齐，便于 memoryview.cast("Q")
+        return body + b"\x00" * (-len(body) % 8)
+
+    def write(self, path: Path):
+        """原子写入（临时文件 + replace）"""
+        bodies = [self._table_bytes(items) for _, items in self._tables]
+        offset = _HEADER.size + _DIR_ENTRY.size * len(bodies)
+        directory = []
+        for (name, _), body in zip(self._tables, bodies):
+            directory.append(_DIR_ENTRY.pack(name.encode("ascii"), offset))
+            offset += len(body)
+
+        tmp = Path(str(path) + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(bodies), 0))
+            for entry in directory:
+                f.write(entry)
+            for body in bodies:
+                f.write(body)
+        os.replace(tmp, path)
+
+
+# ============================================================
+# 读取
+# ============================================================
+
+class StoreTable:
+    """单张表的只读视图（所有访问直接落在 mmap 上）"""
+
+    def __init__(self, buf, offset: int):
+        self._buf = buf
+        count, _, key_len, rec_len = _TABLE_HEAD.unpack_from(buf, offset)
+        self.count = count
+        pos = offset + _TABLE_HEAD.size
+        self._key_off = memoryview(buf)[pos:pos + 8 * (count + 1)].cast("Q")
+        pos += 8 * (count + 1)
+        self._rec_off = memoryview(buf)[pos:pos + 8 * count].cast("Q")
+        pos += 8 * count
+        self._key_base = pos
+        self._rec_base = pos + key_len
+        if sys.byteorder != "little":  # pragma: no cover - 目标平台均为小端
+            self._key_off = struct.unpack(f"<{count + 1}Q", bytes(self._key_off))
+            self._rec_off = struct.unpack(f"<{count}Q", bytes(self._rec_off))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def key_bytes(self, i: int) -> bytes:
+        base = self._key_base
+        return self._buf[base + self._key_off[i]:base + self._key_off[i + 1]]
+
+    def key_at(self, i: int) -> str:
+        return self.key_bytes(i).decode("utf-8")
+
+    def record_offset(self, i: int) -> int:
+        return self._rec_base + self._rec_off[i]
+
+    def find(self, key: str) -> int:
+        """二分查找键，返回下标；不存在返回 -1"""
+        kb = key.encode("utf-8")
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key_bytes(mid) < kb:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self.key_bytes(lo) == kb:
+            return lo
+        return -1
+
+    def fields(self, i: int) -> List[memoryview]:
+        return unpack_record(self._buf, self.record_offset(i))
+
+    def str_fields(self, i: int) -> List[str]:
+        return unpack_str_record(self._buf, self.record_offset(i))
+
+    def keys(self) -> Iterator[str]:
+        for i in range(self.count):
+            yield self.key_at(i)
+
+
+class DocStore:
+    """mmap 打开的文档索引文件"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, n, _ = _HEADER.unpack_from(self._mm, 0)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f"文件格式不匹配: {magic!r} v{version}")
+            self._tables: Dict[str, StoreTable] = {}
+            for i in range(n):
+                raw_name, off = _DIR_ENTRY.unpack_from(self._mm, _HEADER.size + i * _DIR_ENTRY.size)
+                self._tables[raw_name.rstrip(b"\x00").decode("ascii")] = StoreTable(self._mm, off)
+        except Exception:
+            self.close()
+            raise
+
+    @classmethod
+    def open(cls, path: Path) -> Optional["DocStore"]:
+        """打开存储文件；不存在或格式不符时返回 None"""
+        if not Path(path).is_file():
+            return None
+        try:
+            return cls(path)
+        except Exception as e:
+            print(f"[DocStore] 无法打开 {Path(path).name}: {e}")
+            return None
+
+    def table(self, name: str) -> Optional[StoreTable]:
+        return self._tables.get(name)
+
+    def meta(self, key: str, default: str = "") -> str:
+        """读取 meta 表中的字符串值"""
+        t = self._tables.get("meta")
+        if t is None:
+            return default
+        i = t.find(key)
+        return t.str_fields(i)[0] if i >= 0 else default
+
+    def close(self):
+        # 释放 StoreTable 持有的 memoryview 后才能关闭 mmap
+        for t in getattr(self, "_tables", {}).values():
+            for attr in ("_key_off", "_rec_off"):
+                v = getattr(t, attr, None)
+                if isinstance(v, memoryview):
+                    v.release()
+        self._tables = {}
+        mm = getattr(self, "_mm", None)
+        if mm is not None:
+            try:
+                mm.close()
+            except BufferError:
+                pass  # 仍有外部 memoryview 引用，交给 GC
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# ============================================================
+# 懒加载容器
+# ============================================================
+
+class LazyRecordMap(Mapping):
+    """把 StoreTable 包装成只读 dict：按键解码记录，已解码的记录缓存复用
+
+    raw=True 时 decode 收到字段 memoryview（二进制字段），否则收到 str 列表。
+    """
+
+    def __init__(self, table: StoreTable, decode: Callable[[list], Any], raw: bool = False):
+        self._table = table
+        self._decode = decode
+        self._fields = table.fields if raw else table.str_fields
+        self._memo: Dict[str, Any] = {}
+
+    def __getitem__(self, key: str):
+        try:
+            return self._memo[key]
+        except KeyError:
+            pass
+        i = self._table.find(key)
+        if i < 0:
+            raise KeyError(key)
+        val = self._decode(self._fields(i))
+        self._memo[key] = val
+        return val
+
+    def __contains__(self, key) -> bool:
+        return key in self._memo or (isinstance(key, str) and self._table.find(key) >= 0)
+
+    def __iter__(self) -> Iterator[str]:
+        return self._table.keys()
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+
+class LazyRecordList(Sequence):
+    """按下标访问的懒解码序列（表键为零填充序号，存储顺序即插入顺序）"""
+
+    def __init__(self, table: StoreTable, decode: Callable[[List[str]], Any]):
+        self._table = table
+        self._decode = decode
+        self._memo: Dict[int, Any] = {}
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        val = self._memo.get(i)
+        if val is None:
+            val = self._decode(self._table.str_fields(i))
+            self._memo[i] = val
+        return val
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+
+def seq_key(i: int) -> str:
+    """LazyRecordList 使用的序号键（零填充保证字节序 == 数值序）"""
+    return f"{i:08d}"
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+延迟导入 — 模块代理在第一次访问属性时才真正 import
+
+打开面板时 ai_tab → ai_client / mcp.client 会把 requests（连同 urllib3、idna、charset_normalizer）、
+asyncio、perfMon 分析、文档检索等模块全部导入，而它们只在第一次发请求 / 调用对应工具时才用到。
+
+    requests = lazy_import('requests', on_load=_register_errors)
+    requests.get(...)              # 第一次访问属性时 import，之后转发到真实模块
+
+    perf_report = lazy_import('..perf_report', __package__)   # 支持相对导入
+
+module_available(name)：只查找模块（find_spec），不执行模块代码，用来代替 try: import 的可用性探测。
+模块已经导入时 lazy_import 直接返回真实模块（on_load 立即调用）。
+"""
+
+import sys
+import types
+import importlib
+import importlib.util
+import threading
+from typing import Any, Callable, List, Optional
+
+_lock = threading.RLock()
+
+
+class LazyModule(types.ModuleType):
+    """模块代理：__name__ / __doc__ 等模块自身属性不会触发导入，其余属性访问时导入并转发"""
+
+    def __init__(self, name: str, on_load: Optional[Callable[[types.ModuleType], None]] = None):
+        super().__init__(name)
+        self.__dict__['_lazy_module'] = None
+        self.__dict__['_lazy_callbacks'] = [on_load] if on_load else []
+
+    def _lazy_load(self) -> types.ModuleType:
+        module = self.__dict__['_lazy_module']
+        if module is not None:
+            return module
+        with _lock:
+            module = self.__dict__['_lazy_module']
+            if module is None:
+                module = importlib.import_module(self.__name__)
+                callbacks: List[Callable] = self.__dict__['_lazy_callbacks']
+                for callback in callbacks:
+                    callback(module)
+                callbacks.clear()
+                self.__dict__['_lazy_module'] = module
+        return module
+
+    @property
+    def lazy_loaded(self) -> bool:
+        return self.__dict__['_lazy_module'] is not None
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._lazy_load(), attr)
+
+    def __setattr__(self, attr: str, value: Any):
+        setattr(self._lazy_load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._lazy_load())
+
+    def __repr__(self) -> str:
+        state = 'loaded' if self.lazy_loaded else 'not loaded'
+        return f"<lazy module {self.__name__!r} ({state})>"
+
+
+def lazy_import(name: str, package: Optional[str] = None,
+                on_load: Optional[Callable[[types.ModuleType], None]] = None):
+    """返回模块代理；模块已导入时返回真实模块
+
+    name: 模块名，以 . 开头时相对于 package
+    on_load: 真正导入后调用一次（如把模块里的异常类登记到调用方的异常元组）
+    """
+    if name.startswith('.'):
+        name = importlib.util.resolve_name(name, package)
+    module = sys.modules.get(name)
+    if module is not None and not isinstance(module, LazyModule):
+        if on_load is not None:
+            on_load(module)
+        return module
+    return LazyModule(name, on_load)
+
+
+def module_available(name: str, package: Optional[str] = None) -> bool:
+    """模块能否导入（只查找，不执行模块代码；子模块会先导入其父包）"""
+    if name.startswith('.'):
+        name = importlib.util.resolve_name(name, package)
+    if name in sys.modules:
+        return sys.modules[name] is not None
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def is_loaded(module: Any) -> bool:
+    """代理对应的模块是否已经导入（真实模块总是 True）"""
+    if isinstance(module, LazyModule):
+        return module.lazy_loaded
+    return module is not None
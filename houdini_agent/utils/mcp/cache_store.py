@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+HoudiniMCP 缓存存储 — 按命名空间限额的 LRU + TTL 缓存，按节点路径失效
+
+HoudiniMCP 原先用类级 dict 保存分页工具结果、节点文档、ATS 参数模板和节点输入信息，
+只增不减：长时间会话中查看过的每个节点参数表 / 网络结构 / execute_python 输出都会以
+完整文本常驻 Houdini 进程。这里把它们收拢到一个共享的 CacheRegistry：
+
+    命名空间（CacheNamespace）各自限额：字节数、条目数、可选 TTL
+    写入时估算字节数（字符串 / 容器递归），超出限额按 LRU 淘汰
+    条目可声明依赖的节点路径；scene_mirror 报告节点变化时，依赖该路径、
+    其父网络或子节点的条目被淘汰（与 tool_cache 的失效规则一致）
+
+stats() 汇总各命名空间的条目数、字节数与命中率，供 Token 分析面板显示。
+
+本模块不在 main.py 的重载列表中：注册表是进程级单例，面板重载后继续沿用。
+"""
+
+import sys
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, Hashable, Iterable, Optional, Tuple
+
+_WILDCARD = '*'
+
+# 估算容器大小时最多遍历的对象数（防止异常巨大的结构拖慢写入）
+_SIZE_WALK_LIMIT = 100000
+
+
+def estimate_size(value: Any) -> int:
+    """估算 value 占用的字节数：字符串 / bytes 直接取 getsizeof，容器递归累加
+
+    同一对象只计一次；超过 _SIZE_WALK_LIMIT 个对象后按已遍历部分的平均值外推。
+    """
+    total = 0
+    seen = set()
+    stack = [value]
+    walked = 0
+    pending = 0
+    while stack:
+        obj = stack.pop()
+        oid = id(obj)
+        if oid in seen:
+            continue
+        seen.add(oid)
+        total += sys.getsizeof(obj)
+        walked += 1
+        if walked >= _SIZE_WALK_LIMIT:
+            pending = len(stack)
+            break
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+    if pending:
+        total += pending * (total // walked)
+    return total
+
+
+def _norm_path(p: Any) -> str:
+    p = str(p).strip()
+    return p.rstrip('/') if len(p) > 1 else p
+
+
+def _covers(dep: str, path: str) -> bool:
+    """dep 与 path 相同，或互为祖先 / 子孙"""
+    if dep == _WILDCARD or path == _WILDCARD or dep == path:
+        return True
+    return path.startswith(dep + '/') or dep.startswith(path + '/')
+
+
+class CacheNamespace:
+    """单个命名空间的 LRU + TTL 缓存（线程安全）
+
+    Args:
+        name: 命名空间名称（用于日志与统计）
+        max_bytes: 字节上限（估算值），0 表示不限
+        max_entries: 条目上限，0 表示不限
+        ttl: 条目存活秒数，0 表示不过期
+        clock: 时间源（默认 time.monotonic）
+    """
+
+    def __init__(self, name: str, max_bytes: int = 0, max_entries: int = 0, ttl: float = 0.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key → (value, size, expires_at, deps)；expires_at 为 0 表示不过期，deps 为 None 表示不依赖场景
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int, float, Optional[FrozenSet[str]]]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0      # 超出字节 / 条目限额
+        self.expired = 0        # TTL 到期
+        self.invalidated = 0    # 依赖的节点发生变化
+        self.rejected = 0       # 单条超过字节上限，未写入
+
+    # ----------------------------------------------------------
+    # 查询 / 写入
+    # ----------------------------------------------------------
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry[2] and entry[2] <= self._clock():
+                self._remove(key)
+                self.expired += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, deps: Optional[Iterable[str]] = None,
+            size: Optional[int] = None):
+        """写入条目
+
+        Args:
+            deps: 依赖的节点 / 网络路径；None 表示与场景无关（只按 LRU / TTL 淘汰）
+            size: 已知的字节数（省略时由 estimate_size 估算）
+        """
+        if size is None:
+            size = estimate_size(value)
+        dep_set = None
+        if deps is not None:
+            dep_set = frozenset(_norm_path(p) for p in deps if p) or frozenset((_WILDCARD,))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if self.max_bytes and size > self.max_bytes:
+                self.rejected += 1
+                return
+            expires = self._clock() + self.ttl if self.ttl > 0 else 0.0
+            self._entries[key] = (value, size, expires, dep_set)
+            self._bytes += size
+            self._shrink()
+
+    def pop(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._remove(key)
+            return entry[0]
+
+    def __contains__(self, key: Hashable) -> bool:
+        """不计入命中统计、不刷新 LRU 顺序"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and not (entry[2] and entry[2] <= self._clock())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[1]
+
+    def _shrink(self):
+        """超限时从 LRU 末端淘汰，已过期的计入 expired（调用方持有锁）
+
+        不扫描全表：LRU 中间的过期条目在被访问或轮到淘汰时才移除。
+        """
+        now = self._clock() if self.ttl > 0 else 0.0
+        while self._entries and self._over_quota():
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry[1]
+            if entry[2] and entry[2] <= now:
+                self.expired += 1
+            else:
+                self.evictions += 1
+
+    def _over_quota(self) -> bool:
+        return bool((self.max_bytes and self._bytes > self.max_bytes)
+                    or (self.max_entries and len(self._entries) > self.max_entries))
+
+    # ----------------------------------------------------------
+    # 失效
+    # ----------------------------------------------------------
+
+    def invalidate(self, paths: Optional[Iterable[str]]) -> int:
+        """淘汰依赖 paths（或其父网络 / 子节点）的条目；paths 为 None 时淘汰全部场景条目"""
+        if paths is None:
+            targets = None
+        else:
+            targets = {_norm_path(p) for p in paths if p}
+            if not targets:
+                return 0
+        with self._lock:
+            doomed = [k for k, e in self._entries.items()
+                      if e[3] is not None
+                      and (targets is None or any(_covers(d, t) for d in e[3] for t in targets))]
+            for k in doomed:
+                self._remove(k)
+            self.invalidated += len(doomed)
+            return len(doomed)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = self.expired = self.invalidated = self.rejected = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expired': self.expired,
+                'invalidated': self.invalidated,
+                'rejected': self.rejected,
+            }
+
+
+class CacheRegistry:
+    """命名空间注册表：统一限额、统一失效、汇总统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._namespaces: Dict[str, CacheNamespace] = {}
+        self._listener_installed = False
+
+    def namespace(self, name: str, max_bytes: int = 0, max_entries: int = 0,
+                  ttl: float = 0.0) -> CacheNamespace:
+        """获取（或创建）命名空间；已存在时更新限额，保留已有条目"""
+        with self._lock:
+            ns = self._namespaces.get(name)
+            if ns is None:
+                ns = CacheNamespace(name, max_bytes, max_entries, ttl)
+                self._namespaces[name] = ns
+                return ns
+        with ns._lock:
+            ns.max_bytes, ns.max_entries, ns.ttl = max_bytes, max_entries, ttl
+            ns._shrink()
+        return ns
+
+    def namespaces(self) -> Dict[str, CacheNamespace]:
+        with self._lock:
+            return dict(self._namespaces)
+
+    # ----------------------------------------------------------
+    # 场景变化
+    # ----------------------------------------------------------
+
+    def attach_scene_mirror(self) -> bool:
+        """订阅 scene_mirror 的节点变化（只安装一次）；镜像不可用时返回 False"""
+        if self._listener_installed:
+            return True
+        try:
+            from .scene_mirror import get_scene_mirror
+            mirror = get_scene_mirror()
+        except Exception:
+            mirror = None
+        if mirror is None:
+            return False
+        mirror.add_listener(self._on_scene_changed)
+        self._listener_installed = True
+        return True
+
+    def _on_scene_changed(self, paths, downstream: bool):
+        # 下游节点的参数 / 子网络结构不受上游修改影响；父网络级条目由 _covers 覆盖
+        self.invalidate(paths)
+
+    def invalidate(self, paths: Optional[Iterable[str]]) -> int:
+        paths = None if paths is None else list(paths)
+        return sum(ns.invalidate(paths) for ns in self.namespaces().values())
+
+    def clear(self):
+        for ns in self.namespaces().values():
+            ns.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """各命名空间统计 + 合计（entries / bytes / hits / misses / hit_rate）"""
+        per_ns = {name: ns.stats() for name, ns in self.namespaces().items()}
+        hits = sum(s['hits'] for s in per_ns.values())
+        misses = sum(s['misses'] for s in per_ns.values())
+        return {
+            'entries': sum(s['entries'] for s in per_ns.values()),
+            'bytes': sum(s['bytes'] for s in per_ns.values()),
+            'max_bytes': sum(s['max_bytes'] for s in per_ns.values()),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'evictions': sum(s['evictions'] for s in per_ns.values()),
+            'expired': sum(s['expired'] for s in per_ns.values()),
+            'invalidated': sum(s['invalidated'] for s in per_ns.values()),
+            'namespaces': per_ns,
+        }
+
+
+_registry: Optional[CacheRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_cache_registry() -> CacheRegistry:
+    """进程级缓存注册表"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = CacheRegistry()
+    return _registry
@@ -10,7 +10,8 @@ import sys
 import re
 import time
 import json
-from typing import Any, Optional, Dict, List, Tuple
+import threading
+from typing import Any, Callable, Optional, Dict, List, Tuple
 from pathlib import Path
 
 try:
@@ -31,22 +32,30 @@ if os.path.exists(_lib_path):
         sys.path.remove(_lib_path)
     sys.path.insert(0, _lib_path)
 
-# 导入 requests
-try:
-    import requests
-except ImportError:
-    requests = None  # type: ignore
+from ..lazy_import import lazy_import, module_available
 
-from .settings import read_settings
+# 导入 requests（第一次使用时）
+requests = lazy_import('requests') if module_available('requests') else None  # type: ignore
 
-# 导入 RAG 检索系统
-try:
-    from ..doc_rag import get_doc_rag
-    HAS_DOC_RAG = True
-except ImportError:
-    HAS_DOC_RAG = False
+from .settings import read_settings
+from .cache_store import get_cache_registry
+from .scene_mirror import (get_scene_mirror, read_node_fields, read_node_inputs,
+                           read_network_boxes)
+from .py_worker import DEFAULT_SESSION, PythonWorker
+from .shell_runner import ShellRun, ShellRunCache, run_shell
+# perfMon 分析（第一次调用 perf 工具时导入）
+perf_report = lazy_import('..perf_report', __package__)
+
+# 导入 RAG 检索系统（第一次检索时导入并加载索引）
+HAS_DOC_RAG = module_available('..doc_rag', __package__)
+doc_rag = lazy_import('..doc_rag', __package__)
+if not HAS_DOC_RAG:
     print("[MCP Client] DocRAG 模块未找到，本地文档检索功能不可用")
 
+# 离线帮助语料（nodes.zip 预渲染 + 预分页）
+HAS_HELP_CORPUS = module_available('..doc_corpus', __package__)
+doc_corpus = lazy_import('..doc_corpus', __package__)
+
 # 导入 Skill 系统
 HAS_SKILLS = False
 _list_skills = None   # type: ignore
@@ -96,19 +105,26 @@ class HoudiniMCP:
     # 类级别缓存（跨实例共享，只加载一次）
     _node_types_cache: Optional[Dict[str, List[str]]] = None  # {category: [type_names]}
     _node_types_cache_time: float = 0  # 缓存时间
-    _common_node_inputs_cache: Dict[str, str] = {}  # 常见节点输入信息缓存
-    _ats_cache: Dict[str, Dict[str, Any]] = {}  # ATS缓存: {node_type_key: ats_data}
-
-    # perfMon 性能分析：当前活跃的 profile 对象
+    # 以下缓存由 cache_store 统一管理：按命名空间限额（估算字节 / 条目 / TTL），LRU 淘汰，
+    # 声明了依赖路径的条目在 scene_mirror 报告节点变化时失效
+    _common_node_inputs_cache = get_cache_registry().namespace(
+        'node_inputs', max_bytes=256 << 10, max_entries=512)  # 常见节点输入信息: {category/type: text}
+    _ats_cache = get_cache_registry().namespace(
+        'ats', max_bytes=4 << 20, max_entries=512)  # ATS缓存: {node_type_key: ats_data}
+
+    # perfMon 性能分析：当前活跃的 profile 对象 / 最近一次停止的 profile 的聚合结果
     _active_perf_profile: Any = None
+    _last_perf_analysis: Optional[perf_report.PerfAnalysis] = None
 
-    # 通用工具结果分页缓存：key = "tool_name:unique_key" → 完整文本
-    _tool_page_cache: Dict[str, str] = {}
+    # 通用工具结果分页缓存：key = "tool_name:unique_key" → 完整文本（30 分钟后过期）
+    _tool_page_cache = get_cache_registry().namespace(
+        'tool_pages', max_bytes=8 << 20, max_entries=256, ttl=1800.0)
     _TOOL_PAGE_LINES = 50  # 每页行数
 
     @classmethod
     def _paginate_tool_result(cls, text: str, cache_key: str, tool_hint: str,
-                              page: int = 1, page_lines: int = 0) -> str:
+                              page: int = 1, page_lines: int = 0,
+                              deps: Optional[List[str]] = None) -> str:
         """通用工具结果分页
         
         Args:
@@ -117,11 +133,14 @@ class HoudiniMCP:
             tool_hint: 供 AI 翻页的工具调用提示（如 'get_node_parameters(node_path="/obj/geo1/box1", page=2)'）
             page: 页码（从 1 开始）
             page_lines: 每页行数，0 表示使用默认值
+            deps: 结果依赖的节点 / 网络路径（节点变化时缓存失效）；None 表示一次性输出快照
         """
         if not page_lines:
             page_lines = cls._TOOL_PAGE_LINES
 
-        cls._tool_page_cache[cache_key] = text
+        cls._tool_page_cache.put(cache_key, text, deps, size=sys.getsizeof(text))
+        if deps is not None:
+            get_cache_registry().attach_scene_mirror()
 
         lines = text.split('\n')
         total_lines = len(lines)
@@ -131,8 +150,12 @@ class HoudiniMCP:
 
         start = (page - 1) * page_lines
         end = min(start + page_lines, total_lines)
-        page_text = '\n'.join(lines[start:end])
+        return cls._format_tool_page('\n'.join(lines[start:end]), tool_hint, page, total_pages, total_lines)
 
+    @staticmethod
+    def _format_tool_page(page_text: str, tool_hint: str, page: int,
+                          total_pages: int, total_lines: int) -> str:
+        """给一页内容加上页码头尾（只有一页时原样返回）"""
         if total_pages == 1:
             return page_text
 
@@ -155,6 +178,7 @@ class HoudiniMCP:
         """获取节点网络的拓扑结构（节点名称、类型、连接关系）
         
         这是一个轻量级操作，不读取参数详情。
+        在 Houdini 中由 scene_mirror 的事件驱动镜像提供，返回的 data 应只读使用。
         
         Args:
             network_path: 网络路径，如 '/obj/geo1'。None 则使用当前网络。
@@ -198,101 +222,39 @@ class HoudiniMCP:
             if network is None:
                 return False, {"error": "未找到当前网络，请打开网络编辑器"}
         
+        # 优先使用事件驱动的网络镜像：只重新读取发生过变化的节点
+        registry = get_scene_mirror()
+        mirror = registry.mirror_for(network) if registry is not None else None
+        if mirror is not None:
+            try:
+                return True, mirror.structure()
+            except Exception as e:
+                print(f"[MCP Client] 网络镜像读取失败，回退到全量遍历: {e}")
+
         nodes_data = []
         connections_data = []
         
         try:
-            children = network.children()
-            
-            for node in children:
+            for node in network.children():
                 try:
-                    node_type = node.type()
-                    category = node_type.category().name() if node_type else "Unknown"
-                    type_name = node_type.name() if node_type else "unknown"
-                    
-                    # 获取位置
-                    pos = node.position()
-                    position = [pos[0], pos[1]] if pos else [0, 0]
-                    
-                    # 检查是否有错误
-                    has_errors = False
-                    try:
-                        errors = node.errors()
-                        has_errors = bool(errors)
-                    except Exception:
-                        pass
-                    
-                    node_info = {
-                        "name": node.name(),
-                        "path": node.path(),
-                        "type": f"{category.lower()}/{type_name}",
-                        "type_label": node_type.description() if node_type else "",
-                        "is_displayed": node.isDisplayFlagSet() if hasattr(node, 'isDisplayFlagSet') else False,
-                        "has_errors": has_errors,
-                        "position": position
-                    }
-                    
-                    # 检测 wrangle 类型节点，提取 VEX 代码
-                    _wrangle_keywords = ('wrangle', 'snippet', 'vopnet')
-                    if any(kw in type_name.lower() for kw in _wrangle_keywords):
-                        try:
-                            snippet = node.parm("snippet")
-                            if snippet:
-                                code = snippet.eval()
-                                if code and code.strip():
-                                    node_info["vex_code"] = code.strip()
-                        except Exception:
-                            pass
-                    # 也检测 python 脚本节点
-                    if 'python' in type_name.lower():
-                        try:
-                            for pname in ("python", "code", "script"):
-                                parm = node.parm(pname)
-                                if parm:
-                                    code = parm.eval()
-                                    if code and code.strip():
-                                        node_info["python_code"] = code.strip()
-                                        break
-                        except Exception:
-                            pass
-                    
+                    node_info = read_node_fields(node)
                     nodes_data.append(node_info)
                     
                     # 收集连接关系（含输入端口名称）
-                    for input_idx, input_node in enumerate(node.inputs()):
-                        if input_node is not None:
-                            conn_info = {
-                                "from": input_node.path(),
-                                "to": node.path(),
-                                "input_index": input_idx,
-                            }
-                            # 尝试获取输入端口标签
-                            try:
-                                input_label = node_type.inputLabel(input_idx)
-                                if input_label:
-                                    conn_info["input_label"] = input_label
-                            except Exception:
-                                pass
-                            connections_data.append(conn_info)
+                    for input_idx, input_node, input_label in read_node_inputs(node):
+                        conn_info = {
+                            "from": input_node.path(),
+                            "to": node_info["path"],
+                            "input_index": input_idx,
+                        }
+                        if input_label:
+                            conn_info["input_label"] = input_label
+                        connections_data.append(conn_info)
                 except Exception:
                     continue
             
             # 收集 NetworkBox 信息
-            boxed_node_paths = set()
-            boxes_data = []
-            try:
-                for box in network.networkBoxes():
-                    box_nodes = box.nodes()
-                    box_node_paths = [n.path() for n in box_nodes]
-                    boxed_node_paths.update(box_node_paths)
-                    boxes_data.append({
-                        "name": box.name(),
-                        "comment": box.comment() or "",
-                        "node_count": len(box_nodes),
-                        "nodes": box_node_paths,
-                    })
-            except Exception:
-                pass  # networkBoxes() 可能在某些网络类型下不可用
+            boxes_data, boxed_node_paths = read_network_boxes(network)
 
             return True, {
                 "network_path": network.path(),
@@ -301,7 +263,7 @@ class HoudiniMCP:
                 "nodes": nodes_data,
                 "connections": connections_data,
                 "network_boxes": boxes_data,
-                "boxed_node_paths": list(boxed_node_paths),
+                "boxed_node_paths": boxed_node_paths,
             }
         except Exception as e:
             return False, {"error": f"读取网络结构失败: {str(e)}"}
@@ -528,8 +490,9 @@ class HoudiniMCP:
         type_key = f"{node_type.category().name().lower()}/{node_type.name()}"
         
         # 检查缓存
-        if type_key in HoudiniMCP._ats_cache:
-            return HoudiniMCP._ats_cache[type_key]
+        cached = HoudiniMCP._ats_cache.get(type_key)
+        if cached is not None:
+            return cached
         
         try:
             # 获取参数模板
@@ -578,7 +541,7 @@ class HoudiniMCP:
                         continue
             
             # 缓存ATS数据
-            HoudiniMCP._ats_cache[type_key] = ats_data
+            HoudiniMCP._ats_cache.put(type_key, ats_data)
             return ats_data
             
         except Exception:
@@ -1021,7 +984,7 @@ class HoudiniMCP:
     def semantic_search_nodes(self, description: str, category: str = "sop") -> Tuple[bool, str]:
         """语义搜索节点 - 通过自然语言描述找到合适的节点
         
-        内置常用节点的语义映射
+        内置常用节点的语义映射；文档索引可用时叠加语义检索（BM25 + 向量层）的混合分
         """
         if hou is None:
             return False, "未检测到 Houdini API"
@@ -1103,6 +1066,15 @@ class HoudiniMCP:
                         scores[node] = 0
                     scores[node] += 1
         
+        # 叠加文档语义检索：映射表命中计 1 分/次，语义检索分数在 (0, 1]，
+        # 映射表命中的节点仍然优先，语义检索负责补充映射表未覆盖的描述
+        if HAS_DOC_RAG:
+            try:
+                for r in doc_rag.get_doc_rag().semantic_search(description, kinds=("node",), top_k=10):
+                    scores[r["name"]] = scores.get(r["name"], 0) + r["score"]
+            except Exception as e:
+                print(f"[MCP Client] 语义检索失败: {e}")
+        
         # 获取匹配的节点详情
         cat_filter = category.lower() if category != "all" else None
         
@@ -2150,10 +2122,53 @@ class HoudiniMCP:
     # Python 代码执行（类似 Cursor 终端）
     # ========================================
     
-    def execute_python(self, code: str, timeout: int = 30) -> Tuple[bool, Dict[str, Any]]:
+    # ---------- execute_python 执行引擎 ----------
+    # 会话命名空间在所有 HoudiniMCP 实例间共享（面板重载后重建）
+    _python_worker = PythonWorker(namespace_factory=lambda: {'hou': hou})
+    PYTHON_DEFAULT_TIMEOUT = 25   # 低于 AITab 主线程调度的默认等待上限（30s）
+    PYTHON_MAX_TIMEOUT = 120
+
+    # 由调用方（AITab）通过 set_python_context 设置：当前会话、增量输出 / 取消 / 界面刷新回调
+    _python_session: str = DEFAULT_SESSION
+    _python_on_output: Optional[Callable[[str, str], None]] = None
+    _python_cancel: Optional[Callable[[], bool]] = None
+    _python_on_tick: Optional[Callable[[], None]] = None
+
+    def set_python_context(self, session: Optional[str] = None,
+                           on_output: Optional[Callable[[str, str], None]] = None,
+                           cancel: Optional[Callable[[], bool]] = None,
+                           on_tick: Optional[Callable[[], None]] = None):
+        """设置 execute_python 的会话与回调（None 表示恢复默认）
+
+        session: 持久命名空间的键（每个对话一个）
+        on_output: 增量输出 (stream, text)，在执行线程调用
+        cancel: 在看门狗线程周期性检查（需线程安全），返回 True 时中断执行
+        on_tick: 执行代码输出时周期性调用，主线程执行时用来刷新界面
+        """
+        self._python_session = session or DEFAULT_SESSION
+        self._python_on_output = on_output
+        self._python_cancel = cancel
+        self._python_on_tick = on_tick
+
+    @classmethod
+    def python_timeout(cls, args: Dict[str, Any]) -> float:
+        """execute_python 工具参数 → 实际超时（秒）"""
+        try:
+            timeout = float(args.get("timeout") or cls.PYTHON_DEFAULT_TIMEOUT)
+        except (TypeError, ValueError):
+            timeout = cls.PYTHON_DEFAULT_TIMEOUT
+        return max(1.0, min(timeout, cls.PYTHON_MAX_TIMEOUT))
+
+    def reset_python_session(self, session: Optional[str] = None):
+        """清空会话的持久命名空间（session 为 None 时清空当前会话）"""
+        self._python_worker.reset(session or self._python_session)
+
+    def execute_python(self, code: str, timeout: float = PYTHON_DEFAULT_TIMEOUT) -> Tuple[bool, Dict[str, Any]]:
         """在 Houdini Python 环境中执行代码
         
         类似 Cursor 的终端功能，可以执行任意 Python 代码。
+        代码在当前会话的持久命名空间中执行（import 和变量在后续调用中保留），
+        输出按调用捕获（不影响其他线程的 print），超时或取消时中断执行（见 py_worker）。
         
         Args:
             code: 要执行的 Python 代码
@@ -2163,9 +2178,10 @@ class HoudiniMCP:
             (success, result) 其中 result 包含:
             {
                 "output": str,      # 输出内容
-                "return_value": Any, # 最后一个表达式的返回值
+                "return_value": Any, # 最后一个表达式（或赋值）的值
                 "error": str,       # 错误信息（如果有）
-                "execution_time": float  # 执行时间（秒）
+                "execution_time": float,  # 执行时间（秒）
+                "status": str,      # ok / error / timeout / cancelled
             }
         
         安全注意：
@@ -2178,70 +2194,24 @@ class HoudiniMCP:
         if not code or not code.strip():
             return False, {"error": "代码为空"}
         
-        import io
-        import sys
-        import traceback
-        
-        start_time = time.time()
-        
-        # 捕获输出
-        old_stdout = sys.stdout
-        old_stderr = sys.stderr
-        captured_output = io.StringIO()
-        captured_error = io.StringIO()
+        res = self._python_worker.run(
+            code, session=self._python_session, timeout=timeout,
+            cancel=self._python_cancel, on_output=self._python_on_output,
+            on_tick=self._python_on_tick)
         
+        output = res.output
+        if res.stderr:
+            output += f"\n[stderr]\n{res.stderr}"
+        if res.truncated:
+            output += f"\n[输出过长，已丢弃 {res.truncated} 个字符]"
         result = {
-            "output": "",
-            "return_value": None,
-            "error": "",
-            "execution_time": 0.0
+            "output": output,
+            "return_value": self._safe_repr(res.value) if res.has_value else None,
+            "error": res.error,
+            "execution_time": res.elapsed,
+            "status": res.status,
         }
-        
-        try:
-            sys.stdout = captured_output
-            sys.stderr = captured_error
-            
-            # 准备执行环境
-            exec_globals = {
-                'hou': hou,
-                '__builtins__': __builtins__,
-            }
-            exec_locals = {}
-            
-            # 尝试作为表达式求值（返回最后一个值）
-            try:
-                # 先尝试 eval（单个表达式）
-                return_value = eval(code.strip(), exec_globals, exec_locals)
-                result["return_value"] = self._safe_repr(return_value)
-            except SyntaxError:
-                # 不是单个表达式，用 exec 执行
-                exec(code, exec_globals, exec_locals)
-                
-                # 尝试获取最后一个赋值的值
-                if exec_locals:
-                    last_var = list(exec_locals.keys())[-1]
-                    if not last_var.startswith('_'):
-                        result["return_value"] = self._safe_repr(exec_locals[last_var])
-            
-            result["output"] = captured_output.getvalue()
-            
-            # 检查 stderr
-            stderr_content = captured_error.getvalue()
-            if stderr_content:
-                result["output"] += f"\n[stderr]\n{stderr_content}"
-            
-            result["execution_time"] = time.time() - start_time
-            return True, result
-            
-        except Exception as e:
-            result["error"] = f"{type(e).__name__}: {str(e)}\n{traceback.format_exc()}"
-            result["output"] = captured_output.getvalue()
-            result["execution_time"] = time.time() - start_time
-            return False, result
-            
-        finally:
-            sys.stdout = old_stdout
-            sys.stderr = old_stderr
+        return res.success, result
     
     def _safe_repr(self, value: Any, max_length: int = 1000) -> str:
         """安全地获取对象的字符串表示"""
@@ -2304,12 +2274,14 @@ class HoudiniMCP:
         # 分页快速路径（box_name 也参与缓存键）
         cache_suffix = f":{box_name}" if box_name else ""
         cache_key = f"get_network_structure:{network_path or '_current'}{cache_suffix}"
-        if page > 1 and cache_key in self._tool_page_cache:
+        deps = [network_path or '*']
+        cached = self._tool_page_cache.get(cache_key) if page > 1 else None
+        if cached is not None:
             np_arg = f'network_path="{network_path}", ' if network_path else ''
             bx_arg = f'box_name="{box_name}", ' if box_name else ''
             hint = f'get_network_structure({np_arg}{bx_arg}page={page})'
             return {"success": True, "result": self._paginate_tool_result(
-                self._tool_page_cache[cache_key], cache_key, hint, page)}
+                cached, cache_key, hint, page, deps=deps)}
 
         ok, data = self.get_network_structure(network_path)
         if ok:
@@ -2318,7 +2290,7 @@ class HoudiniMCP:
             bx_arg = f'box_name="{box_name}", ' if box_name else ''
             hint = f'get_network_structure({np_arg}{bx_arg}page={page})'
             return {"success": True, "result": self._paginate_tool_result(
-                text, cache_key, hint, page)}
+                text, cache_key, hint, page, deps=deps)}
         return {"success": False, "error": data.get("error", "未知错误")}
 
     def _tool_get_node_parameters(self, args: Dict[str, Any]) -> Dict[str, Any]:
@@ -2333,10 +2305,11 @@ class HoudiniMCP:
 
         # 分页快速路径：缓存中已有完整结果
         cache_key = f"get_node_parameters:{node_path}"
-        if page > 1 and cache_key in self._tool_page_cache:
+        cached = self._tool_page_cache.get(cache_key) if page > 1 else None
+        if cached is not None:
             hint = f'get_node_parameters(node_path="{node_path}", page={page})'
             return {"success": True, "result": self._paginate_tool_result(
-                self._tool_page_cache[cache_key], cache_key, hint, page)}
+                cached, cache_key, hint, page, deps=[node_path])}
 
         node = hou.node(node_path)
         if node is None:
@@ -2458,7 +2431,7 @@ class HoudiniMCP:
             # 分页返回
             hint = f'get_node_parameters(node_path="{node_path}", page={page})'
             return {"success": True, "result": self._paginate_tool_result(
-                full_text, cache_key, hint, page)}
+                full_text, cache_key, hint, page, deps=[node_path])}
 
         except Exception as e:
             return {"success": False, "error": f"获取参数失败: {str(e)}"}
@@ -2549,11 +2522,13 @@ class HoudiniMCP:
 
         # 分页快速路径
         cache_key = f"list_children:{network_path or '_current'}:r={recursive}"
-        if page > 1 and cache_key in self._tool_page_cache:
+        deps = [network_path or '*']
+        cached = self._tool_page_cache.get(cache_key) if page > 1 else None
+        if cached is not None:
             np_arg = f'network_path="{network_path}", ' if network_path else ''
             hint = f'list_children({np_arg}recursive={recursive}, page={page})'
             return {"success": True, "result": self._paginate_tool_result(
-                self._tool_page_cache[cache_key], cache_key, hint, page)}
+                cached, cache_key, hint, page, deps=deps)}
 
         ok, msg = self.list_children(network_path, recursive, args.get("show_flags", True))
         if not ok:
@@ -2562,7 +2537,7 @@ class HoudiniMCP:
         np_arg = f'network_path="{network_path}", ' if network_path else ''
         hint = f'list_children({np_arg}recursive={recursive}, page={page})'
         return {"success": True, "result": self._paginate_tool_result(
-            msg, cache_key, hint, page)}
+            msg, cache_key, hint, page, deps=deps)}
 
     def _tool_get_geometry_info(self, args: Dict[str, Any]) -> Dict[str, Any]:
         node_path = args.get("node_path", "")
@@ -2643,16 +2618,19 @@ class HoudiniMCP:
         import hashlib
         code_hash = hashlib.md5(code.encode()).hexdigest()[:12]
         cache_key = f"execute_python:{code_hash}"
-        if page > 1 and cache_key in self._tool_page_cache:
+        cached = self._tool_page_cache.get(cache_key) if page > 1 else None
+        if cached is not None:
             hint = f'execute_python(code="...同上...", page={page})'
             return {"success": True, "result": self._paginate_tool_result(
-                self._tool_page_cache[cache_key], cache_key, hint, page)}
+                cached, cache_key, hint, page)}
 
         # 安全检查：检测危险操作
         security_msg = self._check_code_security(code)
         if security_msg:
             return {"success": False, "error": security_msg}
-        ok, result = self.execute_python(code)
+        if args.get("reset"):
+            self.reset_python_session()
+        ok, result = self.execute_python(code, timeout=self.python_timeout(args))
         if ok:
             output_parts = []
             if result.get("output"):
@@ -2732,9 +2710,43 @@ class HoudiniMCP:
                 return f"安全拦截: {msg}\n命令: {command}\n如确需执行，请在系统终端中手动运行。"
         return None
 
+    # execute_shell：最近的执行结果（翻页时按行偏移读取，超量输出在临时文件中）
+    _shell_runs = ShellRunCache(max_entries=32, ttl=1800.0)
+    SHELL_DEFAULT_TIMEOUT = 30
+    SHELL_MAX_TIMEOUT = 120
+    # 由调用方（AITab）在执行工具的线程上通过 set_shell_context 设置；同一轮的多个命令在不同线程并发执行
+    _shell_context = threading.local()
+
+    def set_shell_context(self, on_start: Optional[Callable[[int, str, str], None]] = None,
+                          on_output: Optional[Callable[[int, str, str], None]] = None,
+                          cancel: Optional[Callable[[], bool]] = None):
+        """设置当前线程上 execute_shell 的回调（全部为 None 表示清除）
+
+        on_start: 进程启动 (run_id, command, cwd)
+        on_output: 增量输出 (run_id, stream, text)，在读线程调用
+        cancel: 周期性检查，返回 True 时结束进程树
+        """
+        ctx = self._shell_context
+        ctx.on_start = on_start
+        ctx.on_output = on_output
+        ctx.cancel = cancel
+
+    def _shell_page(self, run: ShellRun, page: int) -> str:
+        """按页读取 ShellRun 的输出（只读取这一页的行）"""
+        page_lines = self._TOOL_PAGE_LINES
+        total_lines = run.line_count
+        total_pages = max(1, (total_lines + page_lines - 1) // page_lines)
+        page = max(1, min(page, total_pages))
+        page_text = '\n'.join(run.lines((page - 1) * page_lines, page_lines))
+        hint = f'execute_shell(command="...同上...", page={page})'
+        return self._format_tool_page(page_text, hint, page, total_pages, total_lines)
+
     def _tool_execute_shell(self, args: Dict[str, Any]) -> Dict[str, Any]:
-        """在系统 Shell 中执行命令（沙盒环境）"""
-        import subprocess
+        """在系统 Shell 中执行命令（沙盒环境）
+
+        输出边产生边推送给 set_shell_context 设置的回调；完整输出由 shell_runner 保存，
+        超量部分在临时文件中，翻页时按行偏移读取。
+        """
         import hashlib
 
         command = args.get("command", "").strip()
@@ -2742,15 +2754,19 @@ class HoudiniMCP:
             return {"success": False, "error": "缺少 command 参数"}
 
         page = int(args.get("page", 1))
-        timeout = min(int(args.get("timeout", 30)), 120)  # 最大 120 秒
+        try:
+            timeout = float(args.get("timeout") or self.SHELL_DEFAULT_TIMEOUT)
+        except (TypeError, ValueError):
+            timeout = self.SHELL_DEFAULT_TIMEOUT
+        timeout = max(1.0, min(timeout, self.SHELL_MAX_TIMEOUT))
 
         # 分页快速路径
         cmd_hash = hashlib.md5(command.encode()).hexdigest()[:12]
         cache_key = f"shell:{cmd_hash}"
-        if page > 1 and cache_key in self._tool_page_cache:
-            hint = f'execute_shell(command="...同上...", page={page})'
-            return {"success": True, "result": self._paginate_tool_result(
-                self._tool_page_cache[cache_key], cache_key, hint, page)}
+        cached = self._shell_runs.get(cache_key) if page > 1 else None
+        if cached is not None:
+            # 翻页本身总是成功的：退出码非 0 时也要让 AI 看到后续页的输出（失败时只回传 error）
+            return {"success": True, "result": self._shell_page(cached, page)}
 
         # 安全检查
         security_msg = self._check_shell_security(command)
@@ -2765,54 +2781,31 @@ class HoudiniMCP:
         if not os.path.isdir(cwd):
             return {"success": False, "error": f"工作目录不存在: {cwd}"}
 
-        start_time = time.time()
+        ctx = self._shell_context
         try:
             # Windows 上用 cmd /c，其他平台用 /bin/sh -c
-            if sys.platform == 'win32':
-                proc = subprocess.run(
-                    command,
-                    shell=True,
-                    capture_output=True,
-                    text=True,
-                    timeout=timeout,
-                    cwd=cwd,
-                    encoding='utf-8',
-                    errors='replace',
-                    env={**os.environ, 'PYTHONIOENCODING': 'utf-8'},
-                    creationflags=subprocess.CREATE_NO_WINDOW,  # ★ 阻止控制台窗口闪烁
-                )
-            else:
-                proc = subprocess.run(
-                    command,
-                    shell=True,
-                    capture_output=True,
-                    text=True,
-                    timeout=timeout,
-                    cwd=cwd,
-                )
-
-            elapsed = time.time() - start_time
-
-            # 组装输出
-            parts = []
-            if proc.stdout:
-                parts.append(proc.stdout.rstrip())
-            if proc.stderr:
-                parts.append(f"[stderr]\n{proc.stderr.rstrip()}")
-            parts.append(f"[退出码: {proc.returncode}, 耗时: {elapsed:.2f}s]")
-            full_text = "\n".join(parts)
-
-            success = proc.returncode == 0
-            hint = f'execute_shell(command="...同上...", page={page})'
-            return {"success": success, "result": self._paginate_tool_result(
-                full_text, cache_key, hint, page)}
-
-        except subprocess.TimeoutExpired:
-            elapsed = time.time() - start_time
-            return {"success": False, "error": f"命令超时（{timeout}s 限制）\n命令: {command}\n耗时: {elapsed:.2f}s"}
+            run = run_shell(command, cwd, timeout,
+                            on_start=getattr(ctx, 'on_start', None),
+                            on_output=getattr(ctx, 'on_output', None),
+                            cancel=getattr(ctx, 'cancel', None))
         except Exception as e:
             return {"success": False, "error": f"Shell 执行失败: {e}"}
 
+        self._shell_runs.put(cache_key, run)
+        # exit_code / elapsed 供界面显示（多页结果的状态行不在第一页）
+        result = {"success": run.success, "result": self._shell_page(run, page),
+                  "status": run.status, "exit_code": run.exit_code, "elapsed": run.elapsed}
+        if run.status in ('timeout', 'cancelled'):
+            reason = f"命令超时（{timeout:g}s 限制），已终止" if run.status == 'timeout' else "命令已取消"
+            error = f"{reason}\n命令: {command}\n耗时: {run.elapsed:.2f}s"
+            # 失败时 AI 只看到 error：附上已产生输出的最后几行（不含状态行）
+            n = run.line_count - 1
+            tail = run.lines(max(0, n - 8), min(n, 8))
+            if tail:
+                error += f"\n已产生 {n} 行输出，最后几行:\n" + '\n'.join(tail)
+            result["error"] = error
+        return result
+
     # ========================================
     # 节点布局工具
     # ========================================
@@ -3031,7 +3024,7 @@ class HoudiniMCP:
         if not query:
             return {"success": False, "error": "缺少 query 参数"}
         try:
-            index = get_doc_rag()
+            index = doc_rag.get_doc_rag()
             results = index.search(query, top_k=min(args.get("top_k", 5), 10))
             if not results:
                 return {"success": True, "result": f"未找到与 '{query}' 相关的文档"}
@@ -3103,12 +3096,26 @@ class HoudiniMCP:
         return {"success": True, "result": result_msg}
 
     def _tool_perf_stop_and_report(self, args: Dict[str, Any]) -> Dict[str, Any]:
-        """停止 perfMon profile 并返回分析报告"""
-        if hou is None:
-            return {"success": False, "error": "Houdini 环境不可用"}
+        """停止 perfMon profile 并返回分析报告（无活跃 profile 时对最近一次结果翻页 / 下钻）"""
+        page = int(args.get("page", 1))
+        focus = str(args.get("focus", "") or "").strip()
+        top_n = int(args.get("top_n", 15) or 15)
+        cache_key = f"perf_stop_and_report:latest:{focus}:{top_n}"
+        focus_arg = f'focus="{focus}", ' if focus else ''
+        hint = f'perf_stop_and_report({focus_arg}page={page})'
+
+        # 分页快速路径：缓存中已有完整报告
+        cached = self._tool_page_cache.get(cache_key) if page > 1 else None
+        if cached is not None:
+            return {"success": True, "result": self._paginate_tool_result(cached, cache_key, hint, page)}
 
         if self._active_perf_profile is None:
-            return {"success": False, "error": "没有活跃的性能 profile。请先调用 perf_start_profile 启动。"}
+            if self._last_perf_analysis is None:
+                return {"success": False, "error": "没有活跃的性能 profile。请先调用 perf_start_profile 启动。"}
+            return self._perf_result(self._last_perf_analysis, focus, top_n, cache_key, hint, page)
+
+        if hou is None:
+            return {"success": False, "error": "Houdini 环境不可用"}
 
         save_path = args.get("save_path", "")
 
@@ -3121,84 +3128,89 @@ class HoudiniMCP:
             return {"success": False, "error": f"停止 profile 失败: {e}"}
 
         # 获取统计数据
-        stats_data = None
         try:
             stats_data = profile.stats()
         except Exception as e:
             return {"success": False, "error": f"获取 profile 统计数据失败: {e}"}
 
-        # 可选：保存到磁盘
+        try:
+            title = profile.title()
+        except Exception:
+            title = ""
+        try:
+            perf = perf_report.PerfProfile.from_stats(stats_data, title=title)
+        except Exception as e:
+            print(f"[MCP] 解析 profile 统计数据失败: {e}")
+            perf = perf_report.PerfProfile(title=title)
+        analysis = perf_report.PerfAnalysis(perf)
+        self._last_perf_analysis = analysis
+
+        # 可选：保存到磁盘（.hperf + 伴随 JSON，之后可用 perf_analyze_profile 离线分析 / 对比）
         save_msg = ""
         if save_path:
             try:
                 hou.perfMon.saveProfile(profile, save_path)
+                perf_report.sidecar_path(save_path).write_text(
+                    json.dumps(perf.to_json(), ensure_ascii=False), encoding="utf-8")
                 save_msg = f"\n已保存 profile 到: {save_path}"
             except Exception as e:
                 save_msg = f"\n保存 profile 失败: {e}"
 
-        # 解析统计数据，提取关键指标
-        report_parts = ["=== 性能分析报告 ==="]
-
-        if isinstance(stats_data, dict):
-            # 尝试提取 cook 事件统计
-            cook_stats = stats_data.get("cookStats", stats_data.get("cook_stats", {}))
-            script_stats = stats_data.get("scriptStats", stats_data.get("script_stats", {}))
-            memory_stats = stats_data.get("memoryStats", stats_data.get("memory_stats", {}))
-
-            if cook_stats:
-                report_parts.append("\n--- Cook 统计 ---")
-                # 解析节点 cook 时间
-                node_times = []
-                if isinstance(cook_stats, dict):
-                    for key, val in cook_stats.items():
-                        if isinstance(val, dict):
-                            t = val.get("time", val.get("selfTime", 0))
-                            node_times.append((key, t))
-                        elif isinstance(val, (int, float)):
-                            node_times.append((key, val))
-                node_times.sort(key=lambda x: x[1], reverse=True)
-                for name, t in node_times[:15]:
-                    report_parts.append(f"  {name}: {t:.2f}ms")
-                if len(node_times) > 15:
-                    report_parts.append(f"  ... 还有 {len(node_times) - 15} 个条目")
-
-            if script_stats:
-                report_parts.append("\n--- 脚本统计 ---")
-                if isinstance(script_stats, dict):
-                    for key, val in list(script_stats.items())[:10]:
-                        report_parts.append(f"  {key}: {val}")
-
-            if memory_stats:
-                report_parts.append("\n--- 内存统计 ---")
-                if isinstance(memory_stats, dict):
-                    for key, val in list(memory_stats.items())[:10]:
-                        report_parts.append(f"  {key}: {val}")
-
-            if not cook_stats and not script_stats and not memory_stats:
-                # 统计格式未知，输出原始数据的摘要
-                import json as _json
-                raw = _json.dumps(stats_data, indent=2, default=str, ensure_ascii=False)
-                if len(raw) > 2000:
-                    raw = raw[:2000] + "\n... (truncated)"
-                report_parts.append("\n--- 原始统计数据 ---")
-                report_parts.append(raw)
-        elif isinstance(stats_data, str):
-            report_parts.append(stats_data[:3000])
-        else:
-            report_parts.append(f"统计数据类型: {type(stats_data).__name__}")
-            report_parts.append(str(stats_data)[:3000])
-
-        if save_msg:
-            report_parts.append(save_msg)
+        extra = ""
+        if not perf.events and stats_data:
+            # 统计格式未知，附上原始数据的摘要
+            raw = json.dumps(stats_data, indent=2, default=str, ensure_ascii=False) \
+                if not isinstance(stats_data, str) else stats_data
+            if len(raw) > 2000:
+                raw = raw[:2000] + "\n... (truncated)"
+            extra = "\n\n--- 原始统计数据 ---\n" + raw
+        return self._perf_result(analysis, focus, top_n, cache_key, hint, page, extra + save_msg)
+
+    def _tool_perf_analyze_profile(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        """分析 / 对比已保存的 profile（.hperf 伴随 JSON、stats JSON、CSV），不需要 Houdini"""
+        profile_path = str(args.get("profile_path", "") or "").strip()
+        baseline_path = str(args.get("baseline_path", "") or "").strip()
+        focus = str(args.get("focus", "") or "").strip()
+        top_n = int(args.get("top_n", 15) or 15)
+        page = int(args.get("page", 1))
 
-        full_report = "\n".join(report_parts)
+        cache_key = f"perf_analyze_profile:{profile_path}:{baseline_path}:{focus}:{top_n}"
+        parts = [f'{k}="{v}"' for k, v in (("profile_path", profile_path),
+                                           ("baseline_path", baseline_path), ("focus", focus)) if v]
+        hint = f'perf_analyze_profile({", ".join(parts + [f"page={page}"])})'
+        cached = self._tool_page_cache.get(cache_key) if page > 1 else None
+        if cached is not None:
+            return {"success": True, "result": self._paginate_tool_result(cached, cache_key, hint, page)}
 
-        # 使用分页返回
-        page = int(args.get("page", 1))
-        cache_key = "perf_stop_and_report:latest"
-        hint = f'perf_stop_and_report(page={page})'
+        try:
+            if profile_path:
+                analysis = perf_report.PerfAnalysis(perf_report.load_profile(profile_path))
+            else:
+                analysis = self._last_perf_analysis
+            if analysis is None:
+                return {"success": False, "error": "没有可分析的 profile：请传入 profile_path，"
+                                                   "或先用 perf_start_profile / perf_stop_and_report 采集一次"}
+            if baseline_path and not focus:
+                baseline = perf_report.PerfAnalysis(perf_report.load_profile(baseline_path))
+                report = perf_report.format_diff(baseline, analysis, top_n)
+                return {"success": True, "result": self._paginate_tool_result(report, cache_key, hint, page)}
+        except Exception as e:
+            return {"success": False, "error": f"读取 profile 失败: {e}"}
+        return self._perf_result(analysis, focus, top_n, cache_key, hint, page)
+
+    def _perf_result(self, analysis: perf_report.PerfAnalysis, focus: str, top_n: int, cache_key: str,
+                     hint: str, page: int, extra: str = "") -> Dict[str, Any]:
+        """总览报告或单节点详情（focus 为稳定 ID / 节点路径），分页返回"""
+        if focus:
+            report = perf_report.format_focus(analysis, focus)
+            if report is None:
+                return {"success": False, "error": f"profile 中没有 ID 或路径为 '{focus}' 的条目"}
+        else:
+            report = perf_report.format_report(analysis, top_n, hint=(
+                'perf_analyze_profile(focus="<ID>") 查看节点详情；'
+                'perf_analyze_profile(profile_path="after.hperf", baseline_path="before.hperf") 对比两次 profile'))
         return {"success": True, "result": self._paginate_tool_result(
-            full_report, cache_key, hint, page)}
+            report + extra, cache_key, hint, page)}
 
     # ========================================
     # 工具分派表 & 用法提示 & 安全检查
@@ -3219,7 +3231,7 @@ class HoudiniMCP:
         "list_children": 'list_children(path="/obj/geo1", page=1)',
         "read_selection": 'read_selection()',
         "set_display_flag": 'set_display_flag(node_path="/obj/geo1/box1")',
-        "copy_node": 'copy_node(source_path="/obj/geo1/box1", dest_parent="/obj/geo1", new_name="box1_copy")',
+        "copy_node": 'copy_node(source_path="/obj/geo1/box1", dest_network="/obj/geo1", new_name="box1_copy")',
         "batch_set_parameters": 'batch_set_parameters(node_path="/obj/geo1/box1", parameters={"sizex":2,"sizey":3})',
         "find_nodes_by_param": 'find_nodes_by_param(network_path="/obj/geo1", param_name="file", param_value="*.bgeo")',
         "save_hip": 'save_hip(file_path="C:/path/to/file.hip")',
@@ -3242,6 +3254,7 @@ class HoudiniMCP:
         # PerfMon 性能分析
         "perf_start_profile": 'perf_start_profile(title="Cook Analysis", force_cook_node="/obj/geo1/output0")',
         "perf_stop_and_report": 'perf_stop_and_report(save_path="C:/tmp/profile.hperf")',
+        "perf_analyze_profile": 'perf_analyze_profile(profile_path="C:/tmp/after.hperf", baseline_path="C:/tmp/before.hperf")',
     }
 
     # 工具名称 -> 处理方法名的映射表
@@ -3283,6 +3296,7 @@ class HoudiniMCP:
         # PerfMon 性能分析
         "perf_start_profile": "_tool_perf_start_profile",
         "perf_stop_and_report": "_tool_perf_stop_and_report",
+        "perf_analyze_profile": "_tool_perf_analyze_profile",
     }
 
     # Python 代码安全黑名单
@@ -3541,10 +3555,11 @@ class HoudiniMCP:
         """获取节点文档（多重降级策略，支持分页）
 
         优先级：
-        1. 分页缓存（之前已获取的文档直接分页返回）
-        2. Houdini 本地帮助服务器（http://127.0.0.1:{port}）
-        3. SideFX 在线文档（https://www.sidefx.com/docs/houdini/）
-        4. hou.NodeType.description() + 参数列表 作为最低限度的文档
+        1. 离线帮助语料（doc_corpus：nodes.zip 预渲染、预分页，字典查找 + 切片）
+        2. 分页缓存（之前已获取的文档直接分页返回）
+        3. Houdini 本地帮助服务器（http://127.0.0.1:{port}）
+        4. SideFX 在线文档（https://www.sidefx.com/docs/houdini/）
+        5. hou.NodeType.description() + 参数列表 作为最低限度的文档
 
         Args:
             node_type: 节点类型名
@@ -3554,6 +3569,11 @@ class HoudiniMCP:
         Returns:
             (success, doc_text)
         """
+        # ---------- 离线语料：不需要 hou / 帮助服务器 / 网络 ----------
+        corpus_page = self._corpus_call('page', node_type, category, page)
+        if corpus_page is not None:
+            return True, corpus_page
+
         if hou is None:
             return False, "未检测到 Houdini API"
 
@@ -3561,8 +3581,9 @@ class HoudiniMCP:
 
         # ---------- 分页快速路径：缓存中已有完整文档 ----------
         cache_key = f"{category}/{node_type}".lower()
-        if page > 1 and cache_key in self._doc_page_cache:
-            return True, self._paginate_doc(self._doc_page_cache[cache_key], node_type, category, page)
+        cached = self._doc_page_cache.get(cache_key) if page > 1 else None
+        if cached is not None:
+            return True, self._paginate_doc(cached, node_type, category, page)
 
         # ---------- 查找节点类型对象 ----------
         node_type_obj = None
@@ -3619,6 +3640,18 @@ class HoudiniMCP:
 
     # ---- 帮助文档 子方法 ----
 
+    @staticmethod
+    def _corpus_call(method: str, *args) -> Optional[str]:
+        """查询离线帮助语料（HelpCorpus.page / inputs）；语料未就绪（后台构建中）、不可用或未收录时返回 None"""
+        if not HAS_HELP_CORPUS:
+            return None
+        try:
+            corpus = doc_corpus.get_help_corpus_nowait()
+            return getattr(corpus, method)(*args) if corpus is not None and corpus.available else None
+        except Exception as e:
+            print(f"[MCP] 离线帮助语料查询失败: {e}")
+            return None
+
     def _html_to_text(self, html: str) -> str:
         """将 HTML 转为可读纯文本"""
         try:
@@ -3644,8 +3677,8 @@ class HoudiniMCP:
         text = '\n'.join(lines)
         return text
 
-    # 文档分页缓存：key = "category/node_type" → 完整纯文本
-    _doc_page_cache: Dict[str, str] = {}
+    # 文档分页缓存：key = "category/node_type" → 完整纯文本（与场景无关，只按限额淘汰）
+    _doc_page_cache = get_cache_registry().namespace('doc_pages', max_bytes=4 << 20, max_entries=128)
     _DOC_PAGE_SIZE = 2500  # 每页字符数
 
     def _paginate_doc(self, text: str, node_type: str, category: str, page: int = 1) -> str:
@@ -3658,7 +3691,7 @@ class HoudiniMCP:
             page: 页码（从 1 开始）
         """
         cache_key = f"{category}/{node_type}".lower()
-        self._doc_page_cache[cache_key] = text
+        self._doc_page_cache.put(cache_key, text, size=sys.getsizeof(text))
 
         total_chars = len(text)
         page_size = self._DOC_PAGE_SIZE
@@ -3687,8 +3720,9 @@ class HoudiniMCP:
         """从 Houdini 本地帮助服务器获取文档"""
         # 先检查分页缓存（避免重复请求）
         cache_key = f"{category}/{node_type}".lower()
-        if cache_key in self._doc_page_cache and page > 1:
-            return self._paginate_doc(self._doc_page_cache[cache_key], node_type, category, page)
+        cached = self._doc_page_cache.get(cache_key) if page > 1 else None
+        if cached is not None:
+            return self._paginate_doc(cached, node_type, category, page)
 
         if not requests:
             return None
@@ -3723,8 +3757,9 @@ class HoudiniMCP:
         """从 SideFX 在线文档获取"""
         # 先检查分页缓存
         cache_key = f"{category}/{node_type}".lower()
-        if cache_key in self._doc_page_cache and page > 1:
-            return self._paginate_doc(self._doc_page_cache[cache_key], node_type, category, page)
+        cached = self._doc_page_cache.get(cache_key) if page > 1 else None
+        if cached is not None:
+            return self._paginate_doc(cached, node_type, category, page)
 
         if not requests:
             return None
@@ -3807,10 +3842,16 @@ class HoudiniMCP:
         common_inputs = self._load_common_node_inputs()
         if type_lower in common_inputs:
             return True, common_inputs[type_lower]
+
+        # 离线帮助语料（帮助页 @inputs）
+        corpus_info = self._corpus_call('inputs', node_type, category)
+        if corpus_info is not None:
+            return True, corpus_info
         
         # 检查动态缓存
-        if cache_key in HoudiniMCP._common_node_inputs_cache:
-            return True, HoudiniMCP._common_node_inputs_cache[cache_key]
+        cached = HoudiniMCP._common_node_inputs_cache.get(cache_key)
+        if cached is not None:
+            return True, cached
         
         if hou is None:
             return False, "未检测到 Houdini API"
@@ -3854,7 +3895,7 @@ class HoudiniMCP:
             result = "\n".join(info_lines)
             
             # 缓存结果
-            HoudiniMCP._common_node_inputs_cache[cache_key] = result
+            HoudiniMCP._common_node_inputs_cache.put(cache_key, result)
             
             return True, result
             
@@ -0,0 +1,493 @@
+# -*- coding: utf-8 -*-
+"""
+execute_python 执行引擎 — 按调用捕获输出、协作式超时 / 取消、增量输出、按会话保留命名空间
+
+HoudiniMCP.execute_python 原先在整个进程范围替换 sys.stdout / sys.stderr，在 Houdini 主线程先 eval 再 exec，
+timeout 参数不起作用，输出全部缓冲到执行结束才返回：
+    死循环 / 慢循环会冻结 Houdini 界面，只能强制结束进程
+    执行期间其他线程（AI 请求线程、MCP 服务器）的 print 被捕获进工具输出，同时从控制台消失
+    每次调用都是全新的命名空间，Agent 反复 import、重算中间结果
+
+PythonWorker：
+    输出捕获：执行期间 sys.stdout / sys.stderr 换成按线程分流的 _StreamRouter，
+        只有执行代码的线程写入本次调用的缓冲，其他线程照常写到原始流；没有执行中的调用时恢复原始流
+    超时 / 取消：后台线程 _Interrupter 每隔 CHUNK_INTERVAL 检查截止时间与取消回调，
+        向执行线程投递异步异常 ExecutionTimeout / ExecutionCancelled（C 调用要等它返回后才能中断）
+        执行线程上不挂 settrace / setprofile 钩子：它们在每次（C）函数调用时运行 Python 代码，
+        函数调用密集的代码（逐点 p.position() 之类）会慢好几倍
+    增量输出：执行代码 print 时，每隔 CHUNK_INTERVAL 把新输出按流推送给 on_output 回调，并调用 on_tick
+        （主线程执行时由调用方刷新界面、响应停止按钮；不 print 的代码执行期间收不到 on_tick，只能等超时）
+    持久命名空间：每个会话一个 dict（预置 namespace_factory 提供的变量，如 hou），
+        import 和变量在同一会话的后续调用中保留
+    返回值：只有一个表达式时返回其值；最后一个语句是表达式且值不为 None 时返回其值；
+        否则返回本次绑定的最后一个变量（与旧实现一致）
+
+不依赖 hou：预置变量由调用方提供，可以用桩模块单独运行（见 benchmarks/bench_py_worker.py）。
+"""
+
+import ast
+import sys
+import time
+import builtins
+import itertools
+import linecache
+import threading
+import traceback
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 增量输出推送 / 取消检查 / on_tick 的间隔（秒）
+CHUNK_INTERVAL = 0.1
+
+# 单次调用保留的输出字符数上限（死循环 print 不会撑爆内存），超出部分只计数
+MAX_OUTPUT_CHARS = 1 << 20
+
+# 最多保留的会话命名空间数（LRU 淘汰）
+MAX_SESSIONS = 16
+
+DEFAULT_SESSION = 'default'
+
+OutputCallback = Callable[[str, str], None]  # (stream: "stdout" / "stderr", text)
+
+
+class ExecutionTimeout(BaseException):
+    """执行超过 timeout（继承 BaseException：用户代码里的 except Exception 不会吞掉它）"""
+
+
+class ExecutionCancelled(BaseException):
+    """cancel 回调返回 True，执行被取消"""
+
+
+@dataclass
+class ExecResult:
+    """一次执行的结果
+
+    status: ok / error / timeout / cancelled
+    value: 返回值（has_value 为 False 时无意义）
+    truncated: 超出 MAX_OUTPUT_CHARS 被丢弃的字符数
+    """
+    status: str = 'ok'
+    output: str = ''
+    stderr: str = ''
+    error: str = ''
+    value: Any = None
+    has_value: bool = False
+    elapsed: float = 0.0
+    truncated: int = 0
+
+    @property
+    def success(self) -> bool:
+        return self.status == 'ok'
+
+
+# ============================================================
+# 输出捕获
+# ============================================================
+
+class _Capture:
+    """单次调用的输出缓冲：完整保留（有上限）+ 待推送的增量块"""
+
+    def __init__(self, on_output: Optional[OutputCallback],
+                 on_tick: Optional[Callable[[], None]] = None):
+        self.on_output = on_output
+        self.on_tick = on_tick
+        self.parts: Dict[str, List[str]] = {'stdout': [], 'stderr': []}
+        self.size = 0
+        self.truncated = 0
+        self._pending: List[Tuple[str, str]] = []
+        self._next_tick = time.monotonic() + CHUNK_INTERVAL
+        # 与 _Interrupter 互斥：回调执行期间（可能处理 Qt 事件、运行其他 Python 槽函数）不投递异常，
+        # 投递之后不再调用回调
+        self.guard = threading.Lock()
+        self.busy = False
+        self.interrupted = False
+
+    def write(self, stream: str, text) -> int:
+        if not isinstance(text, str):
+            text = str(text)
+        n = len(text)
+        room = MAX_OUTPUT_CHARS - self.size
+        if room <= 0:
+            self.truncated += n
+        else:
+            if n > room:
+                self.truncated += n - room
+                text = text[:room]
+            self.size += len(text)
+            self.parts[stream].append(text)
+            if self.on_output is not None:
+                self._pending.append((stream, text))
+        if time.monotonic() >= self._next_tick:
+            self.tick()
+        return n
+
+    def tick(self):
+        """推送增量输出并调用 on_tick（按 CHUNK_INTERVAL 节流，回调里再 print 不会重入）"""
+        self._next_tick = time.monotonic() + CHUNK_INTERVAL
+        with self.guard:
+            if self.busy or self.interrupted:
+                return
+            self.busy = True
+        try:
+            self.push()
+            if self.on_tick is not None:
+                try:
+                    self.on_tick()
+                except Exception:
+                    pass
+        finally:
+            self.busy = False
+
+    def push(self):
+        """把待推送的输出按流合并后交给 on_output"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        merged: List[Tuple[str, List[str]]] = []
+        for stream, text in pending:
+            if merged and merged[-1][0] == stream:
+                merged[-1][1].append(text)
+            else:
+                merged.append((stream, [text]))
+        for stream, texts in merged:
+            try:
+                self.on_output(stream, ''.join(texts))
+            except Exception:
+                pass
+
+    def text(self, stream: str) -> str:
+        return ''.join(self.parts[stream])
+
+
+class _StreamRouter:
+    """sys.stdout / sys.stderr 的按线程分流代理：执行线程写入本次调用的缓冲，其他线程写原始流"""
+
+    def __init__(self, original, stream: str):
+        self._original = original
+        self._stream = stream
+
+    def write(self, text):
+        capture = _captures.get(threading.get_ident())
+        if capture is not None:
+            return capture.write(self._stream, text)
+        if self._original is not None:
+            return self._original.write(text)
+        return len(text)
+
+    def flush(self):
+        if threading.get_ident() not in _captures and self._original is not None:
+            self._original.flush()
+
+    def __getattr__(self, item):
+        return getattr(self._original, item)
+
+
+# 线程 id → 当前捕获；非空时 sys.stdout / sys.stderr 为 _StreamRouter
+_captures: Dict[int, _Capture] = {}
+_routers: Dict[str, _StreamRouter] = {}
+_router_lock = threading.Lock()
+
+
+def _attach(capture: _Capture) -> Optional[_Capture]:
+    """为当前线程登记捕获，返回被覆盖的外层捕获（嵌套执行时恢复用）"""
+    tid = threading.get_ident()
+    with _router_lock:
+        for stream in ('stdout', 'stderr'):
+            current = getattr(sys, stream)
+            if not isinstance(current, _StreamRouter):
+                router = _StreamRouter(current, stream)
+                _routers[stream] = router
+                setattr(sys, stream, router)
+        outer = _captures.get(tid)
+        _captures[tid] = capture
+        return outer
+
+
+def _detach(outer: Optional[_Capture]):
+    tid = threading.get_ident()
+    with _router_lock:
+        if outer is not None:
+            _captures[tid] = outer
+            return
+        _captures.pop(tid, None)
+        if _captures:
+            return
+        # 没有执行中的调用：恢复原始流（期间被别人再次替换过的流保持原样，代理自身会直通）
+        for stream, router in list(_routers.items()):
+            if getattr(sys, stream) is router:
+                setattr(sys, stream, router._original)
+            del _routers[stream]
+
+
+# ============================================================
+# 超时 / 取消
+# ============================================================
+
+def _set_async_exc(tid: int, exc) -> bool:
+    """向线程 tid 投递异步异常；exc 为 None 时撤销尚未送达的异常（仅 CPython）"""
+    try:
+        import ctypes
+        n = ctypes.pythonapi.PyThreadState_SetAsyncExc(
+            ctypes.c_ulong(tid), ctypes.py_object(exc) if exc is not None else None)
+    except Exception:
+        return False
+    return n == 1
+
+
+class _Interrupter(threading.Thread):
+    """后台线程：超过截止时间或 cancel 返回 True 时，向执行线程投递 ExecutionTimeout / ExecutionCancelled
+
+    cancel 在本线程调用（需线程安全，如 threading.Event.is_set）；只投递一次。
+    """
+
+    def __init__(self, tid: int, capture: _Capture, deadline: Optional[float],
+                 cancel: Optional[Callable[[], bool]]):
+        super().__init__(name='PythonWorkerWatchdog', daemon=True)
+        self.tid = tid
+        self.capture = capture
+        self.deadline = deadline
+        self.cancel = cancel
+        self.fired = False
+        self._done = threading.Event()
+
+    def _due(self):
+        """应投递的异常类型，尚未到期时为 None"""
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return ExecutionTimeout
+        if self.cancel is not None:
+            try:
+                if self.cancel():
+                    return ExecutionCancelled
+            except Exception:
+                pass
+        return None
+
+    def run(self):
+        while not self._done.wait(CHUNK_INTERVAL):
+            exc = self._due()
+            if exc is None:
+                continue
+            with self.capture.guard:
+                if self._done.is_set():
+                    return
+                if self.capture.busy:
+                    continue  # 回调执行中，下一轮再投递
+                self.fired = _set_async_exc(self.tid, exc)
+                self.capture.interrupted = True
+            return
+
+    def stop(self) -> bool:
+        """执行结束：停止线程，返回是否已经投递过异常"""
+        with self.capture.guard:
+            self._done.set()
+            return self.fired
+
+
+def _drain_async_exc():
+    """等待已投递的异步异常在这里送达，不让它泄漏到调用方之后的代码
+
+    （不用 PyThreadState_SetAsyncExc(tid, NULL) 撤销：3.11 上撤销后可能卡死）
+    """
+    try:
+        end = time.monotonic() + 0.2
+        while time.monotonic() < end:
+            pass
+    except (ExecutionTimeout, ExecutionCancelled):
+        pass
+
+
+# ============================================================
+# 代码编译
+# ============================================================
+
+_FILENAME_PREFIX = '<agent-python-'
+_counter = itertools.count(1)
+
+# 保留源码的最近调用数：持久命名空间里的函数在之后的调用中出错时，traceback 仍能显示源码行
+_SOURCE_KEEP = 256
+_sources: 'deque[str]' = deque()
+
+
+def _remember_source(filename: str, code: str):
+    linecache.cache[filename] = (len(code), None, code.splitlines(True), filename)
+    _sources.append(filename)
+    while len(_sources) > _SOURCE_KEEP:
+        linecache.cache.pop(_sources.popleft(), None)
+
+
+_OWN_SCOPE = (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp, ast.Lambda)
+
+
+def _bound_names(body: List[ast.stmt]) -> List[str]:
+    """顶层语句绑定的名字，按首次出现的源码顺序（赋值 / for / with / import / def / class 等）"""
+    names: Dict[str, None] = {}
+    for stmt in body:
+        found = []
+        stack: List[ast.AST] = [stmt]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+                found.append((node.lineno, node.col_offset, node.id))
+            elif isinstance(node, (ast.Import, ast.ImportFrom)):
+                for alias in node.names:
+                    if alias.name != '*':
+                        found.append((node.lineno, node.col_offset,
+                                      alias.asname or alias.name.split('.')[0]))
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                found.append((node.lineno, node.col_offset, node.name))
+                continue  # 函数 / 类体内的名字不在模块命名空间
+            elif isinstance(node, _OWN_SCOPE):
+                continue  # 推导式 / lambda 的变量有自己的作用域
+            stack.extend(ast.iter_child_nodes(node))
+        for _line, _col, name in sorted(found):
+            names.setdefault(name)
+    return list(names)
+
+
+def _compile(code: str, filename: str):
+    """编译为 (主体, 末尾表达式, 是否只有这一个表达式, 绑定的名字)
+
+    末尾是表达式时单独按 eval 编译以取得返回值。
+    """
+    tree = ast.parse(code, filename, 'exec')
+    tail_expr = None
+    single = len(tree.body) == 1
+    if tree.body and isinstance(tree.body[-1], ast.Expr):
+        tail_expr = compile(ast.Expression(tree.body.pop().value), filename, 'eval')
+    return compile(tree, filename, 'exec'), tail_expr, single, _bound_names(tree.body)
+
+
+_NOTHING = object()
+
+
+def _last_bound(ns: Dict[str, Any], names: List[str]):
+    """本次代码绑定的最后一个变量（按首次出现顺序，与旧实现的 exec locals 一致）"""
+    for name in reversed(names):
+        if not name.startswith('_') and name in ns:
+            return ns[name]
+    return _NOTHING
+
+
+def _format_error(exc: BaseException) -> str:
+    """异常类型 + 消息 + 从用户代码开始的 traceback（去掉执行引擎自身的帧）"""
+    tb = exc.__traceback__
+    while tb is not None and not tb.tb_frame.f_code.co_filename.startswith(_FILENAME_PREFIX):
+        tb = tb.tb_next
+    lines = traceback.format_exception(type(exc), exc, tb)
+    return f"{type(exc).__name__}: {exc}\n{''.join(lines)}"
+
+
+# ============================================================
+# 执行引擎
+# ============================================================
+
+class PythonWorker:
+    """按会话保留命名空间的 Python 执行器（在调用线程执行）
+
+    namespace_factory: 新建会话命名空间时调用，返回需要预置的变量（如 {'hou': hou}）
+    """
+
+    def __init__(self, namespace_factory: Optional[Callable[[], Dict[str, Any]]] = None,
+                 max_sessions: int = MAX_SESSIONS):
+        self.namespace_factory = namespace_factory
+        self.max_sessions = max_sessions
+        self._namespaces: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    # ---------- 命名空间 ----------
+
+    def namespace(self, session: str = DEFAULT_SESSION) -> Dict[str, Any]:
+        with self._lock:
+            ns = self._namespaces.get(session)
+            if ns is not None:
+                self._namespaces.move_to_end(session)
+                return ns
+            ns = {'__name__': '__main__', '__builtins__': builtins}
+            if self.namespace_factory is not None:
+                ns.update(self.namespace_factory())
+            self._namespaces[session] = ns
+            while len(self._namespaces) > self.max_sessions:
+                self._namespaces.popitem(last=False)
+            return ns
+
+    def reset(self, session: Optional[str] = None):
+        """清空一个会话的命名空间；session 为 None 时清空全部"""
+        with self._lock:
+            if session is None:
+                self._namespaces.clear()
+            else:
+                self._namespaces.pop(session, None)
+
+    def sessions(self) -> List[str]:
+        with self._lock:
+            return list(self._namespaces)
+
+    # ---------- 执行 ----------
+
+    def run(self, code: str, session: str = DEFAULT_SESSION,
+            timeout: Optional[float] = None,
+            cancel: Optional[Callable[[], bool]] = None,
+            on_output: Optional[OutputCallback] = None,
+            on_tick: Optional[Callable[[], None]] = None) -> ExecResult:
+        """在 session 的命名空间中执行 code
+
+        timeout: 秒，None / 0 表示不限时
+        cancel: 在看门狗线程周期性调用（需线程安全），返回 True 时中断执行
+        on_output: 增量输出回调 (stream, text)，与执行在同一线程调用
+        on_tick: 执行代码输出时周期性调用（主线程执行时用于刷新界面）
+        """
+        result = ExecResult()
+        start = time.monotonic()
+        filename = f"{_FILENAME_PREFIX}{next(_counter)}>"
+        try:
+            body, tail_expr, single, bound = _compile(code, filename)
+        except SyntaxError as e:
+            result.status = 'error'
+            result.error = ''.join(traceback.format_exception_only(type(e), e))
+            return result
+        _remember_source(filename, code)
+
+        ns = self.namespace(session)
+        capture = _Capture(on_output, on_tick)
+        deadline = start + timeout if timeout else None
+
+        interrupter = None
+        if deadline is not None or cancel is not None:
+            interrupter = _Interrupter(threading.get_ident(), capture, deadline, cancel)
+            interrupter.start()
+        outer = _attach(capture)
+        try:
+            try:
+                exec(body, ns)
+                value = eval(tail_expr, ns) if tail_expr is not None else _NOTHING
+                if value is _NOTHING or (value is None and not single):
+                    value = _last_bound(ns, bound)
+                if value is not _NOTHING:
+                    result.value = value
+                    result.has_value = True
+            finally:
+                # 投递过异常且它不是正在传播的异常：说明还没送达，在这里接住
+                if (interrupter is not None and interrupter.stop()
+                        and not isinstance(sys.exc_info()[1], (ExecutionTimeout, ExecutionCancelled))):
+                    _drain_async_exc()
+        except ExecutionTimeout:
+            result.status = 'timeout'
+            result.error = f"TimeoutError: 执行超过 {timeout:g}s，已中断"
+        except ExecutionCancelled:
+            result.status = 'cancelled'
+            result.error = "Cancelled: 执行已被用户取消"
+        except BaseException as e:  # noqa: B036 — SystemExit / KeyboardInterrupt 也只结束本次执行
+            result.status = 'error'
+            result.error = _format_error(e)
+        finally:
+            _detach(outer)
+            capture.push()
+        if result.has_value:
+            ns['_'] = result.value
+
+        result.output = capture.text('stdout')
+        result.stderr = capture.text('stderr')
+        result.truncated = capture.truncated
+        result.elapsed = time.monotonic() - start
+        return result
@@ -0,0 +1,599 @@
+# -*- coding: utf-8 -*-
+"""节点网络镜像 - 由 hou 节点事件回调增量维护的网络拓扑缓存
+
+get_network_structure() 与 ai_tab 的前后快照原本每次都遍历网络全部子节点，
+逐个调用 errors() / inputs() / inputLabel() / parm().eval()。大网络下这些
+hou 调用主导了工具延迟。
+
+NetworkMirror 在首次查询时遍历一次网络，之后只通过事件回调记录变化：
+    网络级: ChildCreated / ChildDeleted / NetworkBox* / NameChanged → 增删记录、分组失效
+    节点级: NameChanged / InputRewired / ParmTupleChanged /
+            FlagChanged / AppearanceChanged / PositionChanged → 标记对应字段为脏
+
+查询时只对脏字段重新调用 hou（O(变化数)），结构结果在无事件期间直接复用；
+变更日志（序号 → 创建/删除）让前后 diff 不再需要两次全量快照。
+
+记录以 node.sessionId() 为键，重命名不影响连接关系。回调内部异常只会把镜像
+标记为失效，下次查询时全量重建，不会影响 Houdini。
+
+SceneMirror.add_listener() 可订阅变化（节点路径 + 是否影响下游），tool_cache 据此让
+用户手动修改过的节点对应的缓存结果失效；downstream_paths() 基于镜像中的连接关系
+计算下游节点，不调用 hou。
+
+本模块不在 main.py 的重载列表中：单例与已注册的回调在面板重开后继续有效。
+设置环境变量 HOUDINI_AGENT_SCENE_MIRROR=0 可禁用镜像（回退到全量遍历）。
+"""
+
+from __future__ import annotations
+
+import os
+import weakref
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    import hou  # type: ignore
+except Exception:
+    hou = None  # type: ignore
+
+
+# 含内嵌代码的节点：类型名关键字 → 代码参数名
+_WRANGLE_KEYWORDS = ('wrangle', 'snippet', 'vopnet')
+_PYTHON_CODE_PARMS = ("python", "code", "script")
+_CODE_PARMS = frozenset(("snippet",) + _PYTHON_CODE_PARMS)
+
+# 记录的字段分组（脏标记粒度）
+_ALL_FIELDS = frozenset(("meta", "flags", "errors", "position", "code", "inputs"))
+
+
+# ============================================================
+# 单节点读取（镜像与全量遍历共用）
+# ============================================================
+
+def read_node_fields(node: Any, fields=_ALL_FIELDS, info: Optional[Dict[str, Any]] = None
+                     ) -> Dict[str, Any]:
+    """读取节点信息中指定的字段分组，写入 info（get_network_structure 的节点格式）"""
+    info = {} if info is None else info
+    node_type = node.type()
+    type_name = node_type.name() if node_type else "unknown"
+
+    if "meta" in fields:
+        category = node_type.category().name() if node_type else "Unknown"
+        info["name"] = node.name()
+        info["path"] = node.path()
+        info["type"] = f"{category.lower()}/{type_name}"
+        info["type_label"] = node_type.description() if node_type else ""
+    if "flags" in fields:
+        info["is_displayed"] = node.isDisplayFlagSet() if hasattr(node, 'isDisplayFlagSet') else False
+    if "errors" in fields:
+        has_errors = False
+        try:
+            has_errors = bool(node.errors())
+        except Exception:
+            pass
+        info["has_errors"] = has_errors
+    if "position" in fields:
+        pos = node.position()
+        info["position"] = [pos[0], pos[1]] if pos else [0, 0]
+    if "code" in fields:
+        info.pop("vex_code", None)
+        info.pop("python_code", None)
+        # 检测 wrangle 类型节点，提取 VEX 代码
+        if any(kw in type_name.lower() for kw in _WRANGLE_KEYWORDS):
+            try:
+                snippet = node.parm("snippet")
+                if snippet:
+                    code = snippet.eval()
+                    if code and code.strip():
+                        info["vex_code"] = code.strip()
+            except Exception:
+                pass
+        # 也检测 python 脚本节点
+        if 'python' in type_name.lower():
+            try:
+                for pname in _PYTHON_CODE_PARMS:
+                    parm = node.parm(pname)
+                    if parm:
+                        code = parm.eval()
+                        if code and code.strip():
+                            info["python_code"] = code.strip()
+                            break
+            except Exception:
+                pass
+    return info
+
+
+def read_node_inputs(node: Any) -> List[Tuple[int, Any, str]]:
+    """[(输入端口序号, 上游节点, 端口标签)]，跳过未连接端口"""
+    node_type = node.type()
+    out = []
+    for input_idx, input_node in enumerate(node.inputs()):
+        if input_node is None:
+            continue
+        label = ""
+        try:
+            label = node_type.inputLabel(input_idx) or ""
+        except Exception:
+            pass
+        out.append((input_idx, input_node, label))
+    return out
+
+
+def read_network_boxes(network: Any) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """读取 NetworkBox 信息 → (boxes_data, boxed_node_paths)"""
+    boxed_node_paths = set()
+    boxes_data = []
+    try:
+        for box in network.networkBoxes():
+            box_nodes = box.nodes()
+            box_node_paths = [n.path() for n in box_nodes]
+            boxed_node_paths.update(box_node_paths)
+            boxes_data.append({
+                "name": box.name(),
+                "comment": box.comment() or "",
+                "node_count": len(box_nodes),
+                "nodes": box_node_paths,
+            })
+    except Exception:
+        pass  # networkBoxes() 可能在某些网络类型下不可用
+    return boxes_data, list(boxed_node_paths)
+
+
+# ============================================================
+# 单个网络的镜像
+# ============================================================
+
+class _NodeRecord:
+    __slots__ = ("node", "info", "inputs", "dirty")
+
+    def __init__(self, node: Any):
+        self.node = node
+        self.info: Dict[str, Any] = {}
+        self.inputs: List[Tuple[int, int, str]] = []   # (端口序号, 上游 sessionId, 端口标签)
+        self.dirty = set(_ALL_FIELDS)
+
+
+class NetworkMirror:
+    """单个网络的增量镜像
+
+    用法::
+
+        mirror = get_scene_mirror().mirror_for(network)
+        data = mirror.structure()          # 与 get_network_structure 的 data 相同
+        token = mirror.seq
+        ...                                # 执行修改
+        changes = mirror.changes_since(token)
+    """
+
+    # 变更日志长度上限；早于日志起点的 changes_since() 返回 False
+    LOG_LIMIT = 4096
+
+    _NETWORK_EVENTS = ("ChildCreated", "ChildDeleted", "NetworkBoxCreated",
+                       "NetworkBoxChanged", "NetworkBoxDeleted", "NameChanged",
+                       "BeingDeleted")
+    _NODE_EVENTS = ("NameChanged", "InputRewired", "ParmTupleChanged", "FlagChanged",
+                    "AppearanceChanged", "PositionChanged")
+
+    def __init__(self, network: Any, hou_module: Any = None,
+                 on_change: Optional[Callable[[Optional[List[str]], bool], None]] = None):
+        self._hou = hou_module or hou
+        self.network = network
+        self.path = network.path()
+        self._on_change = on_change     # (节点路径列表, 是否影响下游)
+        self._lock = threading.RLock()
+        self._records: Dict[int, _NodeRecord] = {}
+        self._boxes: Optional[Tuple[List[Dict[str, Any]], List[str]]] = None
+        self._result: Optional[Dict[str, Any]] = None
+        self._log: deque = deque()      # (seq, "created"/"deleted", sessionId, 摘要)
+        self._floor = 0                 # 早于该序号的变化已不在日志中
+        self.seq = 0
+        self.valid = True
+        self._broken = False
+        self.stats = {"events": 0, "refreshed": 0, "resyncs": 0}
+
+        ev = self._hou.nodeEventType
+        self._net_events = tuple(getattr(ev, n) for n in self._NETWORK_EVENTS)
+        self._node_events = tuple(getattr(ev, n) for n in self._NODE_EVENTS)
+        network.addEventCallback(self._net_events, self._on_network_event)
+        self._resync()
+
+    # ----------------------------------------------------------
+    # 回调注册
+    # ----------------------------------------------------------
+
+    def _watch(self, node: Any):
+        try:
+            node.addEventCallback(self._node_events, self._on_node_event)
+        except Exception:
+            pass
+
+    def _unwatch(self, node: Any):
+        try:
+            node.removeEventCallback(self._node_events, self._on_node_event)
+        except Exception:
+            pass
+
+    def detach(self):
+        """移除全部回调（镜像被淘汰或网络删除时调用）"""
+        with self._lock:
+            for rec in self._records.values():
+                self._unwatch(rec.node)
+            try:
+                self.network.removeEventCallback(self._net_events, self._on_network_event)
+            except Exception:
+                pass
+            self._records.clear()
+            self._result = None
+            self.valid = False
+
+    def _resync(self):
+        """全量重建（首次创建或回调异常后）"""
+        for rec in self._records.values():
+            self._unwatch(rec.node)
+        self._records = {}
+        for node in self.network.children():
+            self._records[node.sessionId()] = _NodeRecord(node)
+            self._watch(node)
+        self._boxes = None
+        self._result = None
+        self._broken = False
+        self._log.clear()
+        self._floor = self.seq
+        self.stats["resyncs"] += 1
+
+    # ----------------------------------------------------------
+    # 事件处理
+    # ----------------------------------------------------------
+
+    def _touch(self):
+        self.seq += 1
+        self.stats["events"] += 1
+        self._result = None
+
+    def _append_log(self, kind: str, sid: int, summary: Optional[Dict[str, str]]):
+        if len(self._log) >= self.LOG_LIMIT:
+            self._floor = self._log.popleft()[0]
+        self._log.append((self.seq, kind, sid, summary))
+
+    def _on_network_event(self, event_type=None, **kwargs):
+        try:
+            with self._lock:
+                ev = self._hou.nodeEventType
+                self._touch()
+                changed = [self.path]
+                downstream = False
+                if event_type == ev.ChildCreated:
+                    child = kwargs["child_node"]
+                    sid = child.sessionId()
+                    if sid not in self._records:
+                        self._records[sid] = _NodeRecord(child)
+                        self._watch(child)
+                        self._append_log("created", sid, None)
+                    self._boxes = None
+                    changed = [child.path()]
+                elif event_type == ev.ChildDeleted:
+                    sid = kwargs["child_node"].sessionId()
+                    rec = self._records.pop(sid, None)
+                    if rec is not None:
+                        summary = self._summary(rec)
+                        self._append_log("deleted", sid, summary)
+                        changed = [summary["path"] or self.path]
+                        downstream = True
+                        # 下游节点的输入端口随之断开
+                        for other in self._records.values():
+                            if any(src == sid for _, src, _ in other.inputs):
+                                other.dirty.update(("inputs", "errors"))
+                                changed.append(other.info.get("path", ""))
+                    self._boxes = None
+                elif event_type == ev.NameChanged:
+                    # 网络自身改名：全部子节点路径随之变化
+                    for rec in self._records.values():
+                        rec.dirty.add("meta")
+                    self._boxes = None
+                    self.path = self.network.path()
+                    changed.append(self.path)
+                elif event_type == ev.BeingDeleted:
+                    self.valid = False
+                else:
+                    # NetworkBox 创建 / 修改 / 删除
+                    self._boxes = None
+            if self._on_change is not None:
+                self._on_change([p for p in changed if p], downstream)
+        except Exception as e:
+            self._broken = True
+            print(f"[SceneMirror] 网络事件处理失败，下次查询将全量重建: {e}")
+
+    def _on_node_event(self, event_type=None, node=None, **kwargs):
+        try:
+            with self._lock:
+                rec = self._records.get(node.sessionId()) if node is not None else None
+                if rec is None:
+                    return
+                ev = self._hou.nodeEventType
+                self._touch()
+                if event_type == ev.NameChanged:
+                    rec.dirty.add("meta")
+                    self._boxes = None          # box 内节点路径随名称变化
+                elif event_type == ev.InputRewired:
+                    rec.dirty.update(("inputs", "errors"))
+                elif event_type == ev.ParmTupleChanged:
+                    rec.dirty.add("errors")
+                    pt = kwargs.get("parm_tuple")
+                    if pt is None or pt.name() in _CODE_PARMS:
+                        rec.dirty.add("code")
+                elif event_type == ev.FlagChanged:
+                    rec.dirty.add("flags")
+                elif event_type == ev.AppearanceChanged:
+                    rec.dirty.add("errors")
+                elif event_type == ev.PositionChanged:
+                    rec.dirty.add("position")
+                path = rec.info.get("path") or node.path()
+            if self._on_change is not None:
+                # 参数 / 连接 / 标志变化会改变下游节点的 cook 结果
+                self._on_change([path], event_type in (ev.ParmTupleChanged, ev.InputRewired,
+                                                       ev.FlagChanged))
+        except Exception as e:
+            self._broken = True
+            print(f"[SceneMirror] 节点事件处理失败，下次查询将全量重建: {e}")
+
+    # ----------------------------------------------------------
+    # 查询
+    # ----------------------------------------------------------
+
+    @staticmethod
+    def _summary(rec: _NodeRecord) -> Dict[str, str]:
+        info = rec.info
+        return {"name": info.get("name", ""),
+                "type": info.get("type", "").split("/", 1)[-1],
+                "path": info.get("path", "")}
+
+    def _refresh(self, rec: _NodeRecord):
+        """只重新读取记录中的脏字段"""
+        if not rec.dirty:
+            return
+        fields = set(rec.dirty)
+        rec.dirty.clear()
+        # 写入新 dict：已返回给调用方的旧结构保持不变
+        rec.info = read_node_fields(rec.node, fields, dict(rec.info))
+        if "inputs" in fields:
+            rec.inputs = [(idx, src.sessionId(), label)
+                          for idx, src, label in read_node_inputs(rec.node)]
+        self.stats["refreshed"] += 1
+
+    def structure(self) -> Dict[str, Any]:
+        """网络结构（格式同 HoudiniMCP.get_network_structure 的 data）
+
+        无事件期间返回同一个 dict 对象，调用方应只读使用。
+        """
+        with self._lock:
+            if self._broken:
+                self._resync()
+            if self._result is not None:
+                return self._result
+            nodes_data = []
+            for rec in self._records.values():
+                self._refresh(rec)
+                nodes_data.append(rec.info)
+
+            connections_data = []
+            paths = {sid: rec.info["path"] for sid, rec in self._records.items()}
+            for rec in self._records.values():
+                for idx, src_sid, label in rec.inputs:
+                    src_path = paths.get(src_sid)
+                    if src_path is None:
+                        # 上游不在本网络（如 subnet 间接输入）：直接读取路径
+                        src_path = self._foreign_path(src_sid)
+                        if src_path is None:
+                            continue
+                    conn = {"from": src_path, "to": rec.info["path"], "input_index": idx}
+                    if label:
+                        conn["input_label"] = label
+                    connections_data.append(conn)
+
+            if self._boxes is None:
+                self._boxes = read_network_boxes(self.network)
+            boxes_data, boxed_paths = self._boxes
+
+            net_type = self.network.type()
+            self._result = {
+                "network_path": self.network.path(),
+                "network_type": net_type.name() if net_type else "unknown",
+                "node_count": len(nodes_data),
+                "nodes": nodes_data,
+                "connections": connections_data,
+                "network_boxes": boxes_data,
+                "boxed_node_paths": boxed_paths,
+            }
+            return self._result
+
+    def _foreign_path(self, sid: int) -> Optional[str]:
+        try:
+            node = self._hou.nodeBySessionId(sid)
+            return node.path() if node is not None else None
+        except Exception:
+            return None
+
+    def downstream_of(self, paths: Iterable[str]) -> Set[str]:
+        """paths 中节点在本网络内的全部下游节点路径（只读镜像记录，不调用 hou）
+
+        连接关系或路径尚未读取 / 已过期时无法确定下游，返回网络自身路径（即整个网络）。
+        """
+        with self._lock:
+            if self._broken or any(rec.dirty & {"inputs", "meta"} for rec in self._records.values()):
+                return {self.path}
+            by_path = {rec.info.get("path"): sid for sid, rec in self._records.items()}
+            outputs: Dict[int, List[int]] = {}
+            for sid, rec in self._records.items():
+                for _, src, _ in rec.inputs:
+                    outputs.setdefault(src, []).append(sid)
+            stack = [by_path[p] for p in paths if p in by_path]
+            seen: Set[int] = set()
+            while stack:
+                for dst in outputs.get(stack.pop(), ()):
+                    if dst not in seen:
+                        seen.add(dst)
+                        stack.append(dst)
+            return {self._records[sid].info["path"] for sid in seen}
+
+    def children_snapshot(self) -> Dict[str, Dict[str, str]]:
+        """{path: {name, type, path}}（与 ai_tab._snapshot_network_children 格式相同）"""
+        with self._lock:
+            out = {}
+            for rec in self._records.values():
+                if "meta" in rec.dirty:
+                    self._refresh(rec)
+                s = self._summary(rec)
+                out[s["path"]] = s
+            return out
+
+    def changes_since(self, seq: int) -> Optional[Dict[str, List[Dict[str, str]]]]:
+        """序号 seq 之后创建 / 删除的子节点
+
+        Returns:
+            {"created": [...], "deleted": [...]}；无变化返回 None；
+            日志已截断或镜像失效时返回 False（调用方需回退到全量快照）
+        """
+        with self._lock:
+            if not self.valid or self._broken or seq < self._floor:
+                return False
+            created: Dict[int, None] = {}
+            deleted: Dict[int, Dict[str, str]] = {}
+            for s, kind, sid, summary in self._log:
+                if s <= seq:
+                    continue
+                if kind == "created":
+                    created[sid] = None
+                elif sid in created:
+                    del created[sid]        # 期间创建又删除：相互抵消
+                else:
+                    deleted[sid] = summary
+            created_list = []
+            for sid in created:
+                rec = self._records.get(sid)
+                if rec is not None:
+                    if "meta" in rec.dirty:
+                        self._refresh(rec)
+                    created_list.append(self._summary(rec))
+            if not created_list and not deleted:
+                return None
+            return {"created": sorted(created_list, key=lambda d: d["path"]),
+                    "deleted": sorted(deleted.values(), key=lambda d: d["path"])}
+
+
+# ============================================================
+# 镜像注册表（全局单例）
+# ============================================================
+
+class SceneMirror:
+    """按网络管理 NetworkMirror，LRU 淘汰；场景清空 / 加载时全部丢弃"""
+
+    MAX_NETWORKS = 8
+
+    def __init__(self, hou_module: Any = None):
+        self._hou = hou_module or hou
+        self._mirrors: "OrderedDict[int, NetworkMirror]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._listeners: List[Any] = []   # weakref.WeakMethod / weakref.ref
+        try:
+            self._hou.hipFile.addEventCallback(self._on_hip_event)
+        except Exception:
+            pass
+
+    def _on_hip_event(self, event_type):
+        names = ("BeforeClear", "BeforeLoad", "AfterClear", "AfterLoad")
+        hip_ev = self._hou.hipFileEventType
+        if any(event_type == getattr(hip_ev, n, None) for n in names):
+            self.clear()
+
+    def mirror_for(self, network: Any) -> Optional[NetworkMirror]:
+        """获取（必要时创建）网络镜像；网络不支持事件回调时返回 None"""
+        try:
+            sid = network.sessionId()
+        except Exception:
+            return None
+        with self._lock:
+            mirror = self._mirrors.get(sid)
+            if mirror is not None and mirror.valid:
+                self._mirrors.move_to_end(sid)
+                return mirror
+            if mirror is not None:
+                mirror.detach()
+                del self._mirrors[sid]
+            try:
+                mirror = NetworkMirror(network, self._hou, self._notify)
+            except Exception as e:
+                print(f"[SceneMirror] 无法镜像 {network.path()}: {e}")
+                return None
+            self._mirrors[sid] = mirror
+            while len(self._mirrors) > self.MAX_NETWORKS:
+                _, old = self._mirrors.popitem(last=False)
+                old.detach()
+            return mirror
+
+    def clear(self):
+        with self._lock:
+            for m in self._mirrors.values():
+                m.detach()
+            self._mirrors.clear()
+        self._notify(None, True)
+
+    # ----------------------------------------------------------
+    # 变化订阅
+    # ----------------------------------------------------------
+
+    def add_listener(self, callback: Callable[[Optional[List[str]], bool], None]):
+        """订阅场景变化：callback(paths, downstream)，paths 为 None 表示整个场景
+
+        只保存弱引用：面板重载后旧实例的回调自动失效。
+        """
+        ref = weakref.WeakMethod(callback) if hasattr(callback, "__self__") else weakref.ref(callback)
+        with self._lock:
+            self._listeners = [r for r in self._listeners if r() is not None and r() != callback]
+            self._listeners.append(ref)
+
+    def _notify(self, paths: Optional[List[str]], downstream: bool):
+        if not self._listeners:
+            return
+        for ref in list(self._listeners):
+            cb = ref()
+            if cb is None:
+                continue
+            try:
+                cb(paths, downstream)
+            except Exception as e:
+                print(f"[SceneMirror] 变化监听回调失败: {e}")
+
+    def watched_networks(self) -> Set[str]:
+        """正在监听的网络路径（其子节点的变化都会通知到监听者）"""
+        with self._lock:
+            return {m.path for m in self._mirrors.values() if m.valid}
+
+    def downstream_paths(self, paths: Iterable[str]) -> Set[str]:
+        """节点路径 → 其下游节点路径（同网络内）；所在网络未被镜像时返回父网络路径"""
+        out: Set[str] = set()
+        with self._lock:
+            mirrors = {m.path: m for m in self._mirrors.values() if m.valid}
+        for p in paths:
+            parent = p.rsplit("/", 1)[0] or "/"
+            mirror = mirrors.get(parent)
+            out |= mirror.downstream_of([p]) if mirror is not None else {parent}
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {m.network.path() if m.valid else f"#{sid}": dict(m.stats, nodes=len(m._records))
+                    for sid, m in self._mirrors.items()}
+
+
+_scene_mirror: Optional[SceneMirror] = None
+
+
+def get_scene_mirror() -> Optional[SceneMirror]:
+    """全局镜像注册表；hou 不可用或被环境变量禁用时返回 None"""
+    global _scene_mirror
+    if hou is None or os.environ.get("HOUDINI_AGENT_SCENE_MIRROR", "1").strip() == "0":
+        return None
+    if _scene_mirror is None:
+        _scene_mirror = SceneMirror()
+    return _scene_mirror
@@ -9,7 +9,6 @@ from __future__ import annotations
     对比 client.py（面向内部 AI Agent 的直接 Python 调用）。
 """
 
-import asyncio
 import glob
 import logging
 import os
@@ -26,15 +25,12 @@ try:
 except Exception:
 	hou = None  # type: ignore
 
-try:
-	import requests
-except Exception:
-	requests = None  # type: ignore
+from ..lazy_import import lazy_import, module_available
 
-try:
-	from bs4 import BeautifulSoup
-except Exception:
-	BeautifulSoup = None  # type: ignore
+# asyncio 只在服务器线程里用到；requests / bs4 第一次使用时导入
+asyncio = lazy_import('asyncio')
+requests = lazy_import('requests') if module_available('requests') else None  # type: ignore
+bs4 = lazy_import('bs4') if module_available('bs4') else None  # type: ignore
 
 from .settings import read_settings
 from .logger import get_logger
@@ -131,7 +127,7 @@ def _setup_fastmcp_tools():
 	def get_houdini_help(help_type: str, item_name: str) -> dict:
 		if requests is None:
 			return err("requests 未安装。")
-		if BeautifulSoup is None:
+		if bs4 is None:
 			return err("bs4 未安装。请安装 beautifulsoup4。")
 		base_url = "https://www.sidefx.com/docs/houdini/"
 		url_mapping = {
@@ -148,7 +144,7 @@ def _setup_fastmcp_tools():
 		resp = requests.get(full_url, timeout=s.request_timeout)
 		if resp.status_code != 200:
 			return err(f"Failed to fetch help page. Status code: {resp.status_code}")
-		soup = BeautifulSoup(resp.text, 'html.parser')
+		soup = bs4.BeautifulSoup(resp.text, 'html.parser')
 		h1 = soup.find('h1', class_='title')
 		if h1:
 			title_text = (h1.contents[0].strip() if h1.contents else "").strip()
@@ -0,0 +1,494 @@
+# -*- coding: utf-8 -*-
+"""
+execute_shell 执行器 — 流式读取输出、超量输出落盘、按行偏移分页、可取消、限制并发进程数
+
+HoudiniMCP._tool_execute_shell 原先用 subprocess.run(capture_output=True) 阻塞等待（最长 120 秒）：
+    命令结束前界面上什么都看不到，pip install / 构建脚本像卡死一样
+    全部输出读进内存再拼成一个字符串，分页缓存里存整份文本，大输出（日志、find）占用几十 MB
+    停止按钮对运行中的命令无效，只能等它结束或超时；超时只杀 shell，不杀它启动的子进程
+
+run_shell：
+    Popen + 每个管道一个读线程，按块读取、增量解码，完整的行立即推送给 on_output 回调
+    每个流写入 SpooledLines：内存中按行保存，超过 SPILL_CHARS 字符后整体转存到临时文件，
+        内存里只保留稀疏的行偏移索引（array），分页时按偏移 seek + read 读出一页，不加载全文
+    主线程每 POLL_INTERVAL 检查超时与 cancel 回调，超时 / 取消时结束整个进程树
+        （POSIX：新会话 + killpg；Windows：taskkill /T）
+    全局信号量限制同时运行的进程数（MAX_CONCURRENT）；同一轮的多个命令由 tool_schedule
+        分派到并行线程池并发执行，超出槽位的命令排队（排队期间同样响应取消）
+
+ShellRun 把 stdout、[stderr] 段、状态行拼成一份虚拟文档（格式与旧实现的完整文本一致），
+ShellRunCache 按 LRU / TTL 保留最近的结果供翻页，淘汰时关闭临时文件。
+
+不依赖 hou，可以单独运行（见 benchmarks/bench_shell_runner.py）。
+"""
+
+import os
+import sys
+import time
+import codecs
+import locale
+import tempfile
+import itertools
+import threading
+import subprocess
+from array import array
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+# 单个流在内存中保留的字符数，超出后转存到临时文件
+SPILL_CHARS = 256 << 10
+
+# 单个流写入临时文件的字节数上限，超出部分只计行数（死循环输出不会写满磁盘）
+MAX_SPILL_BYTES = 256 << 20
+
+# 同时运行的 shell 进程数上限
+MAX_CONCURRENT = 4
+
+# 超时 / 取消检查间隔（秒）
+POLL_INTERVAL = 0.1
+
+# 进程结束后等待读线程读完管道的时间（后台子进程可能一直持有管道）
+READER_GRACE = 1.0
+
+# 每次从管道读取的字节数
+READ_SIZE = 64 << 10
+
+# 没有换行的输出积攒到这么多字符也推送（进度条、二进制输出）
+MAX_PENDING_CHARS = 64 << 10
+
+# (run_id, stream: "stdout" / "stderr", text)
+OutputCallback = Callable[[int, str, str], None]
+# (run_id, command, cwd)
+StartCallback = Callable[[int, str, str], None]
+
+_slots = threading.BoundedSemaphore(MAX_CONCURRENT)
+_run_ids = itertools.count(1)
+
+
+# ============================================================
+# 按行存储（超量落盘）
+# ============================================================
+
+class SpooledLines:
+    """按行追加的文本；超过 spill_chars 后转存到临时文件，按行号读取
+
+    write 可以传入任意切分的文本块，不完整的末行暂存到下一次 write 或 close。
+    落盘后只在内存里保留稀疏的行偏移索引（每 INDEX_STRIDE 行一项），
+    读取时从所在索引点 seek，读出覆盖目标行的字节再切分。
+    写入在读线程，读取在 close 之后（或其他线程翻页时），用锁保护文件位置。
+    """
+
+    INDEX_STRIDE = 64
+
+    def __init__(self, spill_chars: int = SPILL_CHARS, max_bytes: int = MAX_SPILL_BYTES):
+        self._spill_chars = spill_chars
+        self._max_bytes = max_bytes
+        self._lines: List[str] = []
+        self._chars = 0
+        self._file = None
+        self._index = array('q')  # 落盘后：第 k * INDEX_STRIDE 行的起始字节偏移
+        self._count = 0           # 落盘后的行数
+        self._size = 0            # 落盘后的文件字节数
+        self._partial = ''
+        self._lock = threading.Lock()
+        self._closed = False
+        self.blank_tail = 0   # 末尾连续空白行数（输出时按 rstrip 去掉）
+        self.written = 0      # 写入的字符总数
+        self.dropped = 0      # 超出 max_bytes 未保留的行数
+
+    @property
+    def spilled(self) -> bool:
+        return self._file is not None
+
+    @property
+    def line_count(self) -> int:
+        with self._lock:
+            return self._count if self._file is not None else len(self._lines)
+
+    def write(self, text: str):
+        if not text:
+            return
+        with self._lock:
+            if self._closed:
+                return
+            self.written += len(text)
+            # 通用换行（与 text=True 一致）：\r\n、\r 都算换行；块末尾的 \r 留到下一块再判断
+            data = self._partial + text
+            hold_cr = data.endswith('\r')
+            if hold_cr:
+                data = data[:-1]
+            parts = data.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+            self._partial = parts.pop() + ('\r' if hold_cr else '')
+            if parts:
+                self._add(parts)
+
+    def close(self):
+        """结束写入：不完整的末行作为最后一行"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._partial:
+                self._add([self._partial.rstrip('\r')])
+                self._partial = ''
+            if self._file is not None:
+                self._file.flush()
+
+    def _add(self, lines: List[str]):
+        # 末尾空白行计数：整块都是空白时累加，否则从块尾重新计
+        blank = 0
+        for line in reversed(lines):
+            if line.strip():
+                break
+            blank += 1
+        self.blank_tail = self.blank_tail + blank if blank == len(lines) else blank
+
+        if self._file is None:
+            self._lines.extend(lines)
+            self._chars += sum(map(len, lines)) + len(lines)
+            if self._chars > self._spill_chars:
+                self._spill()
+            return
+        self._append_spilled(lines)
+
+    def _append_spilled(self, lines: List[str]):
+        """按索引步长分组编码写入，每组开头记录一个索引点"""
+        if self.dropped:
+            self.dropped += len(lines)  # 已超出上限：后续行都不保留，避免中间缺行
+            return
+        stride = self.INDEX_STRIDE
+        blobs = []
+        i = 0
+        while i < len(lines):
+            at = self._count % stride
+            j = min(len(lines), i + stride - at)
+            blob = ('\n'.join(lines[i:j]) + '\n').encode('utf-8', 'surrogatepass')
+            if self._size + len(blob) > self._max_bytes:
+                self.dropped += len(lines) - i
+                break
+            if at == 0:
+                self._index.append(self._size)
+            blobs.append(blob)
+            self._size += len(blob)
+            self._count += j - i
+            i = j
+        if blobs:
+            self._file.write(b''.join(blobs))
+
+    def _spill(self):
+        self._file = tempfile.TemporaryFile(prefix='houdini_agent_shell_')
+        lines, self._lines, self._chars = self._lines, [], 0
+        self._append_spilled(lines)
+
+    def lines(self, start: int, count: int) -> List[str]:
+        """读取 [start, start + count) 行"""
+        with self._lock:
+            if self._file is None:
+                return self._lines[start:start + count]
+            stride = self.INDEX_STRIDE
+            start = max(0, min(start, self._count))
+            end = max(start, min(start + count, self._count))
+            if end == start:
+                return []
+            k0 = start // stride
+            k1 = (end + stride - 1) // stride
+            lo = self._index[k0]
+            hi = self._index[k1] if k1 < len(self._index) else self._size
+            self._file.flush()
+            self._file.seek(lo)
+            data = self._file.read(hi - lo)
+            self._file.seek(0, os.SEEK_END)
+        base = k0 * stride
+        return data.decode('utf-8', 'surrogatepass').split('\n')[start - base:end - base]
+
+    def memory_bytes(self) -> int:
+        """内存中保留的大致字节数（行文本 + 偏移索引）"""
+        with self._lock:
+            return (sum(sys.getsizeof(l) for l in self._lines) + sys.getsizeof(self._lines)
+                    + self._index.itemsize * len(self._index))
+
+    def discard(self):
+        with self._lock:
+            self._closed = True
+            self._lines = []
+            if self._file is not None:
+                try:
+                    self._file.close()
+                except OSError:
+                    pass
+
+
+# ============================================================
+# 一次执行
+# ============================================================
+
+class ShellRun:
+    """一次 shell 执行的结果
+
+    status: ok（进程退出，无论退出码）/ timeout / cancelled
+    lines(start, count) / line_count：stdout、[stderr] 段、状态行组成的虚拟文档，
+    与旧实现的完整文本 "\\n".join([stdout.rstrip(), "[stderr]\\n" + stderr.rstrip(), "[退出码: ...]"]) 一致
+    """
+
+    def __init__(self, command: str, cwd: str, timeout: float):
+        self.id = next(_run_ids)
+        self.command = command
+        self.cwd = cwd
+        self.timeout = timeout
+        self.stdout = SpooledLines()
+        self.stderr = SpooledLines()
+        self.status = 'ok'
+        self.exit_code: Optional[int] = None
+        self.elapsed = 0.0
+        self.queued = 0.0  # 等待进程槽位的时间
+        self._segments: List[Tuple[object, int]] = []
+
+    @property
+    def success(self) -> bool:
+        return self.status == 'ok' and self.exit_code == 0
+
+    def status_line(self) -> str:
+        if self.status == 'timeout':
+            return f"[超时: 超过 {self.timeout:g}s 限制，已终止, 耗时: {self.elapsed:.2f}s]"
+        if self.status == 'cancelled':
+            return f"[已取消, 耗时: {self.elapsed:.2f}s]"
+        return f"[退出码: {self.exit_code}, 耗时: {self.elapsed:.2f}s]"
+
+    def _build_segments(self):
+        segments: List[Tuple[object, int]] = []
+        for label, store in ((None, self.stdout), ("[stderr]", self.stderr)):
+            if not store.written:
+                continue
+            if label:
+                segments.append(([label], 1))
+            # rstrip：去掉末尾空白行；全是空白时保留一个空行
+            visible = store.line_count - store.blank_tail
+            segments.append((store, visible) if visible > 0 else ([''], 1))
+            if store.dropped:
+                segments.append(([f"[输出超过 {MAX_SPILL_BYTES >> 20} MB，后 {store.dropped} 行未保留]"], 1))
+        segments.append(([self.status_line()], 1))
+        self._segments = segments
+
+    @property
+    def line_count(self) -> int:
+        return sum(n for _, n in self._segments)
+
+    def lines(self, start: int, count: int) -> List[str]:
+        out: List[str] = []
+        pos = 0
+        for source, n in self._segments:
+            if count <= 0:
+                break
+            if start < pos + n:
+                lo = max(0, start - pos)
+                hi = min(n, lo + count)
+                chunk = source.lines(lo, hi - lo) if isinstance(source, SpooledLines) else source[lo:hi]
+                if isinstance(source, SpooledLines) and hi == n and chunk:
+                    chunk[-1] = chunk[-1].rstrip()  # 与 rstrip 一致：末行去掉尾部空白
+                out.extend(chunk)
+                count -= len(chunk)
+                start = pos + hi
+            pos += n
+        return out
+
+    def text(self) -> str:
+        return '\n'.join(self.lines(0, self.line_count))
+
+    def memory_bytes(self) -> int:
+        return self.stdout.memory_bytes() + self.stderr.memory_bytes()
+
+    def discard(self):
+        self.stdout.discard()
+        self.stderr.discard()
+
+
+# ============================================================
+# 执行
+# ============================================================
+
+def _stream_encoding() -> str:
+    # Windows 上强制子进程 utf-8（PYTHONIOENCODING），其他平台按本地编码（与 text=True 一致）
+    if sys.platform == 'win32':
+        return 'utf-8'
+    return locale.getpreferredencoding(False) or 'utf-8'
+
+
+def _pump(run: ShellRun, pipe, store: SpooledLines, stream: str,
+          on_output: Optional[OutputCallback]):
+    """读线程：读取管道 → 增量解码 → 写入 store，完整的行推送给 on_output"""
+    decoder = codecs.getincrementaldecoder(_stream_encoding())('replace')
+    read = getattr(pipe, 'read1', pipe.read)
+    pending = ''
+    try:
+        while True:
+            data = read(READ_SIZE)
+            if not data:
+                break
+            text = decoder.decode(data)
+            store.write(text)
+            if on_output is None or not text:
+                continue
+            pending += text
+            cut = pending.rfind('\n') + 1
+            if not cut and len(pending) >= MAX_PENDING_CHARS:
+                cut = len(pending)
+            if cut:
+                on_output(run.id, stream, pending[:cut])
+                pending = pending[cut:]
+    except (OSError, ValueError):
+        pass
+    finally:
+        tail = decoder.decode(b'', final=True)
+        store.write(tail)
+        store.close()
+        pending += tail
+        if on_output is not None and pending:
+            try:
+                on_output(run.id, stream, pending)
+            except Exception:
+                pass
+        try:
+            pipe.close()
+        except OSError:
+            pass
+
+
+def _kill_tree(proc: subprocess.Popen):
+    """结束 shell 及其启动的子进程"""
+    try:
+        if sys.platform == 'win32':
+            subprocess.run(['taskkill', '/F', '/T', '/PID', str(proc.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                           creationflags=subprocess.CREATE_NO_WINDOW, timeout=5)
+        else:
+            import signal
+            os.killpg(proc.pid, signal.SIGKILL)
+    except (OSError, subprocess.SubprocessError):
+        pass
+    try:
+        proc.kill()
+    except OSError:
+        pass
+
+
+def run_shell(command: str, cwd: str, timeout: float,
+              on_start: Optional[StartCallback] = None,
+              on_output: Optional[OutputCallback] = None,
+              cancel: Optional[Callable[[], bool]] = None) -> ShellRun:
+    """执行 shell 命令，返回 ShellRun（进程无法启动时抛 OSError）
+
+    on_start: 进程启动后调用一次（排队中被取消则不调用）
+    on_output: 在读线程调用，text 为一到多行完整文本（最后一块可能不以换行结尾）
+    cancel: 每 POLL_INTERVAL 检查一次，返回 True 时结束进程树
+    """
+    run = ShellRun(command, cwd, timeout)
+    t0 = time.time()
+    while not _slots.acquire(timeout=POLL_INTERVAL):
+        if cancel is not None and cancel():
+            run.status = 'cancelled'
+            run.queued = time.time() - t0
+            run.stdout.close()
+            run.stderr.close()
+            run._build_segments()
+            return run
+    run.queued = time.time() - t0
+    try:
+        _execute(run, on_start, on_output, cancel)
+    finally:
+        _slots.release()
+    run._build_segments()
+    return run
+
+
+def _execute(run: ShellRun, on_start, on_output, cancel):
+    kwargs = dict(shell=True, cwd=run.cwd, stdin=subprocess.DEVNULL,
+                  stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if sys.platform == 'win32':
+        kwargs['env'] = {**os.environ, 'PYTHONIOENCODING': 'utf-8'}
+        kwargs['creationflags'] = subprocess.CREATE_NO_WINDOW  # ★ 阻止控制台窗口闪烁
+    else:
+        kwargs['start_new_session'] = True  # 独立进程组，超时 / 取消时整组结束
+
+    start = time.time()
+    proc = subprocess.Popen(run.command, **kwargs)
+    readers = [
+        threading.Thread(target=_pump, args=(run, proc.stdout, run.stdout, 'stdout', on_output),
+                         name=f'shell-{run.id}-stdout', daemon=True),
+        threading.Thread(target=_pump, args=(run, proc.stderr, run.stderr, 'stderr', on_output),
+                         name=f'shell-{run.id}-stderr', daemon=True),
+    ]
+    for t in readers:
+        t.start()
+    if on_start is not None:
+        on_start(run.id, run.command, run.cwd)
+
+    deadline = start + run.timeout
+    while True:
+        try:
+            proc.wait(timeout=POLL_INTERVAL)
+            break
+        except subprocess.TimeoutExpired:
+            pass
+        if time.time() >= deadline:
+            run.status = 'timeout'
+        elif cancel is not None and cancel():
+            run.status = 'cancelled'
+        else:
+            continue
+        _kill_tree(proc)
+        proc.wait()
+        break
+
+    run.exit_code = proc.returncode
+    for t in readers:
+        t.join(READER_GRACE)
+    # 读线程仍未结束（后台子进程持有管道）：冻结已读到的内容，剩余输出丢弃
+    run.stdout.close()
+    run.stderr.close()
+    run.elapsed = time.time() - start
+
+
+# ============================================================
+# 结果缓存（翻页）
+# ============================================================
+
+class ShellRunCache:
+    """最近的 ShellRun（LRU + TTL），淘汰时关闭临时文件"""
+
+    def __init__(self, max_entries: int = 32, ttl: float = 1800.0):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._runs: 'OrderedDict[str, Tuple[float, ShellRun]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key: str, run: ShellRun):
+        evicted = []
+        with self._lock:
+            old = self._runs.pop(key, None)
+            if old is not None and old[1] is not run:
+                evicted.append(old[1])
+            self._runs[key] = (time.time(), run)
+            while len(self._runs) > self._max_entries:
+                evicted.append(self._runs.popitem(last=False)[1][1])
+        for r in evicted:
+            r.discard()
+
+    def get(self, key: str) -> Optional[ShellRun]:
+        with self._lock:
+            entry = self._runs.get(key)
+            if entry is None:
+                return None
+            if self._ttl and time.time() - entry[0] > self._ttl:
+                del self._runs[key]
+            else:
+                self._runs.move_to_end(key)
+                return entry[1]
+        entry[1].discard()
+        return None
+
+    def clear(self):
+        with self._lock:
+            runs = [r for _, r in self._runs.values()]
+            self._runs.clear()
+        for r in runs:
+            r.discard()
@@ -0,0 +1,534 @@
+# -*- coding: utf-8 -*-
+"""
+perfMon 性能分析引擎 — 解析、聚合、对比 profile 并生成分页报告
+
+旧的 perf_stop_and_report 只猜测 profile.stats() 的几个键名（cookStats / cook_stats …），
+打印前 15 项，格式不认识时直接截取 2000 字符原始 JSON；analyze_cook_performance 技能
+另外只读取一层子节点的 lastCookTime()。这里统一为：
+
+    解析：profile.stats() 的 dict、保存的 stats JSON（含 perf_stop_and_report 写出的
+          <profile>.hperf.json 伴随文件）、exportAsCSV 的 CSV → PerfEvent 事件表
+    聚合：按节点路径层级计算 self / inclusive 时间、cook 次数、涉及帧数、内存增长
+    标记：hot（self 时间占比高）、recook（同一帧重复 cook，缓存反复失效）、memory（内存增长大）
+    对比：两个 profile（优化前 / 后）逐节点的时间、cook 次数、内存变化
+    报告：按耗时排序的紧凑文本；每个节点带稳定 ID（路径的 CRC32），可用 focus 下钻
+
+纯 Python，不依赖 hou（只有读取没有伴随 JSON 的 .hperf 时才需要 hou.perfMon.loadProfile）。
+"""
+
+import io
+import re
+import csv
+import json
+import zlib
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# 伴随 JSON 的格式标识
+FORMAT_TAG = "houdini_agent.perf/1"
+
+# 问题判定阈值
+HOT_SHARE = 0.10            # self 时间占总时间的比例
+HOT_MIN_MS = 5.0
+RECOOK_MIN = 2              # 同一帧内多出的 cook 次数
+MEMORY_MIN = 32 << 20       # 内存增长（字节）
+
+# 字段别名（按 _norm_key 归一化后比较）
+_PATH_KEYS = ("path", "node", "nodepath", "object", "objectpath", "name")
+_KIND_KEYS = ("kind", "type", "event", "eventtype", "category")
+_SELF_KEYS = ("selftime", "self", "time", "cooktime", "duration", "ms")
+_TOTAL_KEYS = ("totaltime", "total", "inclusivetime", "inclusive")
+_COUNT_KEYS = ("count", "cookcount", "cooks", "calls", "numcooks", "numevents")
+_MEMORY_KEYS = ("memory", "memorygrowth", "memgrowth", "memorydelta", "growth", "mem", "bytes")
+_FRAME_KEYS = ("frame", "fr")
+_TIME_KEYS = frozenset(_SELF_KEYS + _TOTAL_KEYS)
+_NON_ALNUM = re.compile(r"[^a-z0-9]")
+# 只起容器作用的键（其下仍是事件 / 映射）
+_CONTAINERS = ("events", "objects", "nodes", "stats", "data", "items", "entries")
+
+# stats dict 中的分区 → 事件类别
+_SECTIONS = {
+    "cookstats": "cook", "cooks": "cook", "cook": "cook",
+    "scriptstats": "script", "scripts": "script", "script": "script",
+    "memorystats": "memory", "memory": "memory",
+    "solvestats": "solve", "drawstats": "draw", "renderstats": "render",
+}
+
+
+# ============================================================
+# 事件表
+# ============================================================
+
+@dataclass
+class PerfEvent:
+    """profile 中的一条事件（聚合格式的统计项视为 count 次事件的合计）"""
+    path: str                   # 节点路径；非节点事件为事件名
+    kind: str = "cook"          # cook / script / memory / ...
+    self_ms: float = 0.0
+    total_ms: float = 0.0       # 事件报告的总时间（含期间 cook 的输入），未知时等于 self_ms
+    count: int = 1
+    memory: int = 0             # 内存增长（字节）
+    frame: Optional[float] = None
+
+    def row(self) -> list:
+        return [self.path, self.kind, self.self_ms, self.total_ms, self.count, self.memory, self.frame]
+
+
+@lru_cache(maxsize=1024)
+def _norm_key(k: Any) -> str:
+    """键名归一化：小写、只保留字母数字，去掉单位后缀 ms（"Self Time (ms)" → "selftime"）"""
+    k = _NON_ALNUM.sub("", str(k).lower())
+    return k[:-2] if k.endswith("ms") and k[:-2] in _TIME_KEYS else k
+
+
+def _pick(d: Dict[str, Any], keys: Tuple[str, ...]):
+    for k in keys:
+        if k in d and d[k] not in (None, ""):
+            return d[k]
+    return None
+
+
+def _num(v: Any, default: float = 0.0) -> float:
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return float(v)
+    if isinstance(v, str):
+        try:
+            return float(v.replace(",", "").strip())
+        except ValueError:
+            return default
+    return default
+
+
+def _event_from_dict(d: Dict[str, Any], path: str = "", kind: str = "cook",
+                     keep_path: bool = False) -> Optional[PerfEvent]:
+    """一条记录（dict）→ PerfEvent；既没有时间也没有内存 / 次数时返回 None
+
+    keep_path: 记录来自 {路径: 统计} 映射，忽略记录内的 name 等字段
+    """
+    nd = {_norm_key(k): v for k, v in d.items()}
+    if not keep_path:
+        path = str(_pick(nd, _PATH_KEYS) or path)
+    path = path.strip()
+    if not path:
+        return None
+    kind = str(_pick(nd, _KIND_KEYS) or kind).lower()
+    self_v = _pick(nd, _SELF_KEYS)
+    if self_v is None and "starttime" in nd and "endtime" in nd:
+        self_v = _num(nd["endtime"]) - _num(nd["starttime"])
+    total_v = _pick(nd, _TOTAL_KEYS)
+    count_v = _pick(nd, _COUNT_KEYS)
+    mem_v = _pick(nd, _MEMORY_KEYS)
+    if self_v is None and total_v is None and count_v is None and mem_v is None:
+        return None
+    self_ms = _num(self_v if self_v is not None else total_v)
+    frame_v = _pick(nd, _FRAME_KEYS)
+    return PerfEvent(path=path, kind=kind, self_ms=self_ms,
+                     total_ms=_num(total_v, self_ms) if total_v is not None else self_ms,
+                     count=int(_num(count_v, 1)) if count_v is not None else 1,
+                     memory=int(_num(mem_v)), frame=_num(frame_v) if frame_v is not None else None)
+
+
+def _walk(node: Any, kind: str, path: str, out: List[PerfEvent],
+          tree: bool = False, keep_path: bool = False):
+    """递归解析未知结构：事件列表、分区（cookStats …）、{路径: 统计} 映射、带 children 的树
+
+    tree: node 是 path 的子节点（children 中的相对名称拼接到父路径之后）
+    """
+    if isinstance(node, list):
+        for item in node:
+            _walk(item, kind, path, out, tree)
+        return
+    if not isinstance(node, dict):
+        return
+    scalars = {k: v for k, v in node.items() if not isinstance(v, (dict, list))}
+    own = None if keep_path else _pick({_norm_key(k): v for k, v in scalars.items()}, _PATH_KEYS)
+    if own:
+        own = str(own).strip()
+        path = f"{path.rstrip('/')}/{own}" if tree and path.startswith("/") and not own.startswith("/") else own
+    ev = _event_from_dict(scalars, path, kind, keep_path=True) if scalars else None
+    if ev is not None:
+        out.append(ev)
+    for key, val in node.items():
+        nk = _norm_key(key)
+        if nk == "children":
+            _walk(val, kind, path, out, tree=True)
+        elif nk in _SECTIONS:
+            _walk(val, _SECTIONS[nk], path, out)
+        elif str(key).startswith("/"):
+            if isinstance(val, (int, float)) and not isinstance(val, bool):
+                out.append(PerfEvent(path=str(key), kind=kind, self_ms=float(val), total_ms=float(val)))
+            else:
+                _walk(val, kind, str(key), out, keep_path=True)
+        elif isinstance(val, (dict, list)) and nk in _CONTAINERS:
+            _walk(val, kind, path, out, tree)
+
+
+class PerfProfile:
+    """一次 profile 的事件表"""
+
+    def __init__(self, events: Iterable[PerfEvent] = (), title: str = "", source: str = "",
+                 frames: int = 0):
+        self.events: List[PerfEvent] = list(events)
+        self.title = title
+        self.source = source
+        # profile 覆盖的帧数（事件不带帧号时用于判断重复 cook），0 = 未知
+        self.frames = frames
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    @classmethod
+    def from_stats(cls, data: Any, title: str = "", source: str = "") -> "PerfProfile":
+        """profile.stats() / stats JSON → PerfProfile（也接受本模块写出的伴随 JSON）"""
+        if isinstance(data, str):
+            data = json.loads(data)
+        if isinstance(data, dict) and data.get("format") == FORMAT_TAG:
+            return cls([PerfEvent(*row) for row in data.get("events", [])],
+                       title=title or data.get("title", ""), source=source,
+                       frames=int(data.get("frames", 0)))
+        events: List[PerfEvent] = []
+        _walk(data, "cook", "", events)
+        frames = 0
+        if isinstance(data, dict):
+            title = title or str(data.get("title", "") or data.get("name", ""))
+            nd = {_norm_key(k): v for k, v in data.items()}
+            frames = int(_num(_pick(nd, ("frames", "framecount", "numframes"))))
+        return cls(events, title=title, source=source, frames=frames)
+
+    @classmethod
+    def from_csv(cls, text: str, title: str = "", source: str = "") -> "PerfProfile":
+        """exportAsCSV 导出的 CSV（首行为列名）→ PerfProfile"""
+        events = []
+        for row in csv.DictReader(io.StringIO(text)):
+            ev = _event_from_dict(row)
+            if ev is not None:
+                events.append(ev)
+        return cls(events, title=title, source=source)
+
+    def to_json(self) -> dict:
+        return {"format": FORMAT_TAG, "title": self.title, "frames": self.frames,
+                "events": [ev.row() for ev in self.events]}
+
+
+def sidecar_path(profile_path: str) -> Path:
+    """.hperf 的伴随 JSON 路径（perf_stop_and_report 保存 profile 时一并写出）"""
+    return Path(str(profile_path) + ".json")
+
+
+def load_profile(path: str) -> PerfProfile:
+    """读取保存的 profile：stats JSON / CSV / .hperf（优先伴随 JSON，否则需要 hou）"""
+    p = Path(path)
+    title = p.stem
+    if p.suffix.lower() == ".hperf":
+        side = sidecar_path(path)
+        if side.is_file():
+            return PerfProfile.from_stats(json.loads(side.read_text(encoding="utf-8")),
+                                          title=title, source=str(p))
+        try:
+            import hou  # type: ignore
+        except ImportError:
+            raise ValueError(f"{p.name} 没有伴随的 {side.name}，读取 .hperf 需要在 Houdini 中运行")
+        profile = hou.perfMon.loadProfile(str(p))
+        return PerfProfile.from_stats(profile.stats(), title=title, source=str(p))
+    text = p.read_text(encoding="utf-8")
+    if p.suffix.lower() == ".csv":
+        return PerfProfile.from_csv(text, title=title, source=str(p))
+    return PerfProfile.from_stats(json.loads(text), title=title, source=str(p))
+
+
+# ============================================================
+# 聚合
+# ============================================================
+
+def node_id(path: str) -> str:
+    """稳定 ID：路径的 CRC32（同一节点在不同 profile / 分页中 ID 相同）"""
+    return f"n{zlib.crc32(path.encode('utf-8')):08x}"
+
+
+def _parent(path: str) -> str:
+    return path.rsplit("/", 1)[0]
+
+
+@dataclass
+class NodeStat:
+    """单个节点（或网络）的聚合统计"""
+    path: str
+    id: str
+    self_ms: float = 0.0
+    inclusive_ms: float = 0.0       # self + 所有子孙节点的 self
+    cooks: int = 0
+    recooks: int = 0                # 超出涉及帧数的 cook 次数
+    memory: int = 0
+    frames: Dict[float, int] = field(default_factory=dict)   # 帧 → cook 次数
+    kinds: Dict[str, float] = field(default_factory=dict)    # 事件类别 → self 时间
+    children: List[str] = field(default_factory=list)
+    issues: List[str] = field(default_factory=list)
+
+
+class PerfAnalysis:
+    """PerfProfile 的聚合结果"""
+
+    def __init__(self, profile: PerfProfile):
+        self.profile = profile
+        self.nodes: Dict[str, NodeStat] = {}
+        self.others: Dict[str, NodeStat] = {}       # 非节点事件（脚本等）
+        self.total_ms = 0.0
+        self.total_memory = 0
+        self._aggregate()
+
+    def _stat(self, table: Dict[str, NodeStat], path: str) -> NodeStat:
+        st = table.get(path)
+        if st is None:
+            st = table[path] = NodeStat(path=path, id=node_id(path))
+        return st
+
+    def _aggregate(self):
+        for ev in self.profile.events:
+            table = self.nodes if ev.path.startswith("/") else self.others
+            st = self._stat(table, ev.path)
+            st.self_ms += ev.self_ms
+            st.memory += ev.memory
+            st.kinds[ev.kind] = st.kinds.get(ev.kind, 0.0) + ev.self_ms
+            if ev.kind == "cook":
+                st.cooks += ev.count
+                if ev.frame is not None:
+                    st.frames[ev.frame] = st.frames.get(ev.frame, 0) + ev.count
+            self.total_ms += ev.self_ms
+            self.total_memory += ev.memory
+
+        # 沿路径层级补齐父网络并累加 inclusive 时间
+        linked = set()
+        for path in list(self.nodes):
+            child, parent = path, _parent(path)
+            while parent and child not in linked:
+                linked.add(child)
+                self._stat(self.nodes, parent).children.append(child)
+                child, parent = parent, _parent(parent)
+        for path in sorted(self.nodes, key=lambda p: p.count("/"), reverse=True):
+            st = self.nodes[path]
+            st.inclusive_ms += st.self_ms
+            parent = _parent(path)
+            if parent in self.nodes:
+                self.nodes[parent].inclusive_ms += st.inclusive_ms
+        for st in self.others.values():
+            st.inclusive_ms = st.self_ms
+
+        frames = self.profile.frames or len({f for st in self.nodes.values() for f in st.frames}) or 1
+        hot_ms = max(HOT_MIN_MS, self.total_ms * HOT_SHARE)
+        for st in self.nodes.values():
+            st.recooks = (sum(c - 1 for c in st.frames.values()) if st.frames
+                          else max(0, st.cooks - frames))
+            if st.self_ms >= hot_ms:
+                st.issues.append("hot")
+            if st.recooks >= RECOOK_MIN and st.recooks * 2 >= st.cooks:
+                st.issues.append("recook")
+            if st.memory >= MEMORY_MIN:
+                st.issues.append("memory")
+
+    def find(self, key: str) -> Optional[NodeStat]:
+        """按稳定 ID 或路径查找"""
+        key = key.strip()
+        for table in (self.nodes, self.others):
+            if key in table:
+                return table[key]
+        for table in (self.nodes, self.others):
+            for st in table.values():
+                if st.id == key:
+                    return st
+        return None
+
+    def leaves(self) -> List[NodeStat]:
+        """有自身事件的节点（不含只由子节点补齐的父网络），按 self 时间降序"""
+        return sorted((st for st in self.nodes.values() if st.self_ms or st.cooks or st.memory),
+                      key=lambda s: (-s.self_ms, s.path))
+
+    def networks(self) -> List[NodeStat]:
+        return sorted((st for st in self.nodes.values() if st.children),
+                      key=lambda s: (-s.inclusive_ms, s.path))
+
+
+# ============================================================
+# 报告
+# ============================================================
+
+_ISSUE_LABELS = {"hot": "热点", "recook": "重复cook", "memory": "内存增长"}
+
+
+def _fmt_mem(n: int) -> str:
+    sign = "+" if n >= 0 else "-"
+    n = abs(n)
+    if n >= 1 << 30:
+        return f"{sign}{n / (1 << 30):.2f}GB"
+    if n >= 1 << 20:
+        return f"{sign}{n / (1 << 20):.1f}MB"
+    if n >= 1 << 10:
+        return f"{sign}{n / (1 << 10):.0f}KB"
+    return f"{sign}{n}B"
+
+
+def _fmt_node(st: NodeStat, total_ms: float) -> str:
+    share = st.self_ms / total_ms * 100 if total_ms else 0.0
+    s = f"  [{st.id}] {st.path}  self {st.self_ms:.2f}ms ({share:.0f}%)"
+    if st.children:
+        s += f"  incl {st.inclusive_ms:.2f}ms"
+    if st.cooks:
+        s += f"  cook×{st.cooks}"
+    if st.memory:
+        s += f"  {_fmt_mem(st.memory)}"
+    if st.issues:
+        s += "  ⚑" + ",".join(_ISSUE_LABELS[i] for i in st.issues)
+    return s
+
+
+def format_report(analysis: PerfAnalysis, top_n: int = 15, hint: str = "") -> str:
+    """总览报告：热点节点、网络 inclusive 排名、问题列表、非节点事件"""
+    prof = analysis.profile
+    leaves = analysis.leaves()
+    lines = [f"=== 性能分析报告{': ' + prof.title if prof.title else ''} ===",
+             f"事件 {len(prof)} 条, 节点 {len(leaves)} 个, 总 self 时间 {analysis.total_ms:.2f}ms, "
+             f"内存增长 {_fmt_mem(analysis.total_memory)}"]
+    if not prof.events:
+        lines.append("\n(profile 中没有可识别的事件)")
+        return "\n".join(lines)
+
+    if leaves:
+        lines.append(f"\n--- 节点 self 时间排名（前 {min(top_n, len(leaves))}）---")
+        lines += [_fmt_node(st, analysis.total_ms) for st in leaves[:top_n]]
+        if len(leaves) > top_n:
+            lines.append(f"  ... 还有 {len(leaves) - top_n} 个节点")
+
+    nets = analysis.networks()
+    if nets:
+        lines.append("\n--- 网络 inclusive 时间 ---")
+        for st in nets[:max(3, top_n // 3)]:
+            lines.append(f"  [{st.id}] {st.path}  incl {st.inclusive_ms:.2f}ms  "
+                         f"self {st.self_ms:.2f}ms  子节点 {len(st.children)}")
+
+    issues = [st for st in leaves if st.issues]
+    if issues:
+        lines.append("\n--- 问题 ---")
+        for st in issues[:top_n]:
+            for issue in st.issues:
+                if issue == "hot":
+                    lines.append(f"  [热点] [{st.id}] {st.path}: self {st.self_ms:.2f}ms，"
+                                 f"占总时间 {st.self_ms / max(analysis.total_ms, 1e-9) * 100:.0f}%")
+                elif issue == "recook":
+                    lines.append(f"  [重复cook] [{st.id}] {st.path}: cook {st.cooks} 次，其中 {st.recooks} 次"
+                                 "为同一帧的重复 cook —— 检查上游反复失效 / 时间相关表达式，考虑加 Cache")
+                else:
+                    lines.append(f"  [内存增长] [{st.id}] {st.path}: {_fmt_mem(st.memory)}")
+
+    if analysis.others:
+        lines.append("\n--- 其他事件（脚本等）---")
+        for st in sorted(analysis.others.values(), key=lambda s: -s.self_ms)[:10]:
+            kinds = "/".join(sorted(st.kinds))
+            lines.append(f"  [{st.id}] {st.path} ({kinds})  {st.self_ms:.2f}ms")
+
+    if hint:
+        lines.append(f"\n提示: {hint}")
+    return "\n".join(lines)
+
+
+def format_focus(analysis: PerfAnalysis, key: str) -> Optional[str]:
+    """单个节点 / 网络的详情（focus 下钻）；找不到时返回 None"""
+    st = analysis.find(key)
+    if st is None:
+        return None
+    lines = [f"=== [{st.id}] {st.path} ===",
+             f"self {st.self_ms:.2f}ms, inclusive {st.inclusive_ms:.2f}ms "
+             f"(占总时间 {st.inclusive_ms / max(analysis.total_ms, 1e-9) * 100:.1f}%)",
+             f"cook {st.cooks} 次, 重复 cook {st.recooks} 次, 内存 {_fmt_mem(st.memory)}"]
+    if st.issues:
+        lines.append("问题: " + ", ".join(_ISSUE_LABELS[i] for i in st.issues))
+    if st.kinds:
+        lines.append("事件类别: " + ", ".join(f"{k} {v:.2f}ms" for k, v in sorted(st.kinds.items())))
+    if st.children:
+        lines.append(f"\n--- 子节点（按 inclusive 时间, 共 {len(st.children)}）---")
+        kids = sorted((analysis.nodes[c] for c in st.children), key=lambda s: (-s.inclusive_ms, s.path))
+        lines += [_fmt_node(c, analysis.total_ms) for c in kids]
+    if st.frames:
+        lines.append(f"\n--- 各帧 cook 次数（共 {len(st.frames)} 帧）---")
+        for frame, n in sorted(st.frames.items(), key=lambda kv: (-kv[1], kv[0]))[:20]:
+            lines.append(f"  帧 {frame:g}: {n} 次")
+    return "\n".join(lines)
+
+
+# ============================================================
+# 对比
+# ============================================================
+
+@dataclass
+class DiffRow:
+    path: str
+    id: str
+    before_ms: float
+    after_ms: float
+    before_cooks: int
+    after_cooks: int
+    memory_delta: int
+
+    @property
+    def delta_ms(self) -> float:
+        return self.after_ms - self.before_ms
+
+
+def diff_profiles(before: PerfAnalysis, after: PerfAnalysis) -> List[DiffRow]:
+    """逐节点对比 self 时间 / cook 次数 / 内存（按时间变化绝对值降序）"""
+    rows = []
+    for path in set(before.nodes) | set(after.nodes):
+        b, a = before.nodes.get(path), after.nodes.get(path)
+        if (b is None or not (b.self_ms or b.cooks)) and (a is None or not (a.self_ms or a.cooks)):
+            continue       # 只由子节点补齐的父网络
+        rows.append(DiffRow(path=path, id=node_id(path),
+                            before_ms=b.self_ms if b else 0.0, after_ms=a.self_ms if a else 0.0,
+                            before_cooks=b.cooks if b else 0, after_cooks=a.cooks if a else 0,
+                            memory_delta=(a.memory if a else 0) - (b.memory if b else 0)))
+    rows.sort(key=lambda r: (-abs(r.delta_ms), r.path))
+    return rows
+
+
+def _pct(before: float, after: float) -> str:
+    return f"{(after - before) / before * 100:+.0f}%" if before else "新增"
+
+
+def format_diff(before: PerfAnalysis, after: PerfAnalysis, top_n: int = 15) -> str:
+    rows = diff_profiles(before, after)
+    b_cooks = sum(st.cooks for st in before.nodes.values())
+    a_cooks = sum(st.cooks for st in after.nodes.values())
+    lines = [f"=== 性能对比: {before.profile.title or '优化前'} → {after.profile.title or '优化后'} ===",
+             f"总 self 时间 {before.total_ms:.2f}ms → {after.total_ms:.2f}ms "
+             f"({after.total_ms - before.total_ms:+.2f}ms, {_pct(before.total_ms, after.total_ms)})",
+             f"cook 次数 {b_cooks} → {a_cooks}, 内存增长 {_fmt_mem(before.total_memory)} → "
+             f"{_fmt_mem(after.total_memory)}"]
+    changed = [r for r in rows if r.delta_ms or r.before_cooks != r.after_cooks or r.memory_delta]
+    if changed:
+        lines.append(f"\n--- 变化最大的节点（前 {min(top_n, len(changed))}）---")
+        for r in changed[:top_n]:
+            if r.before_cooks == 0 and not r.before_ms:
+                tag = "  [新增]"
+            elif r.after_cooks == 0 and not r.after_ms:
+                tag = "  [消失]"
+            else:
+                tag = ""
+            s = (f"  [{r.id}] {r.path}  self {r.before_ms:.2f} → {r.after_ms:.2f}ms "
+                 f"({r.delta_ms:+.2f}ms, {_pct(r.before_ms, r.after_ms)})")
+            if r.before_cooks != r.after_cooks:
+                s += f"  cook {r.before_cooks} → {r.after_cooks}"
+            if r.memory_delta:
+                s += f"  内存 {_fmt_mem(r.memory_delta)}"
+            lines.append(s + tag)
+        if len(changed) > top_n:
+            lines.append(f"  ... 还有 {len(changed) - top_n} 个节点有变化")
+    else:
+        lines.append("\n(各节点无变化)")
+    fixed = [st for st in before.leaves() if st.issues and not after.nodes.get(st.path, NodeStat("", "")).issues]
+    new = [st for st in after.leaves() if st.issues and not before.nodes.get(st.path, NodeStat("", "")).issues]
+    if fixed or new:
+        lines.append("\n--- 问题变化 ---")
+        lines += [f"  已消除 [{st.id}] {st.path}: " + ",".join(_ISSUE_LABELS[i] for i in st.issues)
+                  for st in fixed[:top_n]]
+        lines += [f"  新出现 [{st.id}] {st.path}: " + ",".join(_ISSUE_LABELS[i] for i in st.issues)
+                  for st in new[:top_n]]
+    return "\n".join(lines)
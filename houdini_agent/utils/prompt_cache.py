@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Prompt 前缀缓存 — 按缓存块对齐的上下文裁剪、冻结的轮次附加内容、Anthropic cache_control 断点
+
+DeepSeek / OpenAI 的自动前缀缓存与 Anthropic 的 cache_control 断点都只对「与之前请求逐字节
+相同的前缀」生效（缓存顺序：工具定义 → 系统提示 → 消息）。原先几处上下文处理都会改写前缀：
+
+    _manage_context / 预发送压缩 / _progressive_trim 每次都把旧轮次的 tool 结果重新摘要
+        （摘要本身仍超过阈值，会被再次摘要），删除的轮数随历史增长逐轮变化
+    RAG 检索结果与 [Context] 提醒只在当轮发送，下一轮请求在上一条 user 消息之后就与缓存分叉
+    Anthropic 协议把所有 system 消息（包括末尾的 RAG / [Context] / [上下文管理]）拼进顶层
+        system，而 system 位于消息之前，整段缓存每轮失效
+
+这里提供请求组装阶段共用的规则：
+
+    不可变前缀 = 工具定义 + 系统提示 + 已冻结的历史轮次；随轮次发送的附加 system 消息记录在
+        该轮 user 消息的 _prompt_extras 字段中，之后的请求原样重发
+    plan_block_trim()：超过水位时按缓存块（CACHE_BLOCK_ROUNDS 轮一块）从最旧的块开始摘要
+        tool 结果，仍超限再整块删除最早的轮次，一次降到目标水位；已摘要的内容不再改写
+    add_cache_breakpoint()：给 Anthropic 消息的最后一个内容块加 cache_control
+"""
+
+from typing import Any, Callable, Dict, List, Tuple
+
+# 每个缓存块包含的轮次数（轮次以 user 消息分界）
+CACHE_BLOCK_ROUNDS = 4
+
+# 已摘要的 tool 结果结尾（AIClient._summarize_tool_content / 截断回退），不再重复摘要
+SUMMARY_MARKERS = ('...[摘要]', '...[summary]')
+
+# user 消息上记录随该轮发送的附加 system 消息（RAG / [Context]）的内部字段
+EXTRAS_FIELD = '_prompt_extras'
+
+_EPHEMERAL = {'type': 'ephemeral'}
+
+
+def is_summarized(text: Any) -> bool:
+    return isinstance(text, str) and text.endswith(SUMMARY_MARKERS)
+
+
+def split_rounds(messages: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """按 user 消息划分轮次；首个 user 之前的消息归入第一轮"""
+    rounds: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    for m in messages:
+        if m.get('role') == 'user' and current:
+            rounds.append(current)
+            current = []
+        current.append(m)
+    if current:
+        rounds.append(current)
+    return rounds
+
+
+def expand_extras(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """按发送时的形式展开：每条 user 消息之后跟随其冻结的附加 system 消息"""
+    out: List[Dict[str, Any]] = []
+    for m in messages:
+        out.append(m)
+        extras = m.get(EXTRAS_FIELD)
+        if extras:
+            out.extend(extras)
+    return out
+
+
+def compact_round(rnd: List[Dict[str, Any]], summarize: Callable[[str, int], str],
+                  max_len: int = 200, resummarize: bool = False) -> int:
+    """原地摘要一轮中的长 tool 结果与冻结的附加内容（RAG 等），返回改写的消息数
+
+    轮次中原有的 system 消息（旧轮次摘要等）不动。已摘要的内容默认跳过（保持前缀不变）；resummarize=True 时按更短的 max_len 再次摘要
+    （上下文超限的紧急裁剪）。
+    """
+    targets: List[Dict[str, Any]] = []
+    for m in rnd:
+        if m.get('role') == 'tool':
+            targets.append(m)
+        else:
+            targets.extend(m.get(EXTRAS_FIELD) or ())
+    changed = 0
+    for m in targets:
+        c = m.get('content') or ''
+        if isinstance(c, str) and len(c) > max_len and (resummarize or not is_summarized(c)):
+            m['content'] = summarize(c, max_len)
+            changed += 1
+    return changed
+
+
+def plan_block_trim(rounds: List[List[Dict[str, Any]]],
+                    count: Callable[[List[Dict[str, Any]]], int],
+                    summarize: Callable[[str, int], str],
+                    target: int,
+                    fixed: int = 0,
+                    keep_recent: int = 2,
+                    min_rounds: int = 2,
+                    max_len: int = 200,
+                    block: int = CACHE_BLOCK_ROUNDS) -> Tuple[int, int, int]:
+    """按缓存块把 rounds 裁剪到 target 以下
+
+    第一步从最旧的块开始，整块摘要 tool 结果（最近 keep_recent 轮所在的块不动）；仍超限则
+    从头整块删除轮次（至少保留 min_rounds 轮）。摘要原地写入 rounds 中的消息，删除由调用方
+    按返回值执行。target 应明显低于触发裁剪的水位：裁剪一次改写一次前缀，留出的余量决定了
+    之后多少轮内前缀保持不变。
+
+    Args:
+        count: 一组消息的 token 数（应使用有记忆的计数器）
+        fixed: rounds 之外同样会发送的 token 数（系统提示、末尾提醒等）
+
+    Returns:
+        (已摘要到第几轮, 应从头删除的轮数, 裁剪后的 token 数)
+    """
+    n = len(rounds)
+    tokens = [count(r) for r in rounds]
+    total = fixed + sum(tokens)
+    compacted = 0
+    end = max(0, n - keep_recent) // block * block
+    while compacted < end and total > target:
+        stop = min(end, compacted + block)
+        for i in range(compacted, stop):
+            if compact_round(rounds[i], summarize, max_len):
+                new = count(rounds[i])
+                total += new - tokens[i]
+                tokens[i] = new
+        compacted = stop
+    dropped = 0
+    while total > target and n - dropped > min_rounds:
+        stop = min(n - min_rounds, dropped + block)
+        total -= sum(tokens[dropped:stop])
+        dropped = stop
+    return compacted, dropped, total
+
+
+def add_cache_breakpoint(message: Dict[str, Any]) -> bool:
+    """给 Anthropic 格式消息的最后一个非空内容块加 cache_control；成功返回 True"""
+    content = message.get('content')
+    if isinstance(content, str):
+        if not content:
+            return False
+        message['content'] = [{'type': 'text', 'text': content, 'cache_control': _EPHEMERAL}]
+        return True
+    if not isinstance(content, list):
+        return False
+    for block in reversed(content):
+        if not isinstance(block, dict):
+            continue
+        if block.get('type') == 'text' and not block.get('text'):
+            continue
+        block['cache_control'] = _EPHEMERAL
+        return True
+    return False
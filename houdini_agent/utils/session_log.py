@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""
+会话持久化 — 每个会话一个追加式 JSONL 日志，后台线程写盘
+
+原先每次自动保存都把所有会话的完整 conversation_history 以 indent=2 的 JSON 重写
+（活跃会话还要再写一份 cache_latest.json），并在 Qt 主线程上执行；长会话带大段工具
+输出时每次保存要几百毫秒。SessionLogStore 改为：
+
+    session_<id>.jsonl  每行一条记录：
+        {"op": "meta", ...}           会话元数据（摘要 / todo / token 统计），变化时追加
+        {"op": "msg", "m": {...}}     一条消息
+        {"op": "trunc", "n": k}       历史被截断到前 k 条（上下文压缩 / 旧消息被改写）
+    sessions_manifest.json           标签列表，临时文件 + fsync + os.replace 原子更新
+
+主线程只做 O(n) 的身份比较（消息对象及其字段值是否仍是上次写入的那些对象），
+把新增消息的浅拷贝交给后台写线程序列化并追加；日志体积超过存活内容的 2 倍时，
+写线程直接按行重放日志压实（不再序列化 Python 对象）。读取时逐行流式解析，
+末尾的不完整行（写入中途崩溃）被忽略。旧版 session_<id>.json 仍可读取，首次保存时
+迁移为 .jsonl。
+"""
+
+import os
+import json
+import queue
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+LOG_VERSION = '2.0'
+
+
+def _atomic_write(path: Path, data: bytes):
+    """临时文件 + fsync + os.replace：读者只会看到完整的旧文件或新文件"""
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _signature(msg: dict) -> tuple:
+    """消息的身份签名：字段值对象本身（及列表长度）。
+
+    字段被重新赋值（如旧 tool 结果被摘要替换）或内容列表增删元素时签名改变；
+    比较时用 `is`，不序列化。
+    """
+    return tuple((k, v, len(v) if isinstance(v, list) else -1) for k, v in msg.items())
+
+
+def _same(msg: dict, sig: tuple) -> bool:
+    if len(msg) != len(sig):
+        return False
+    for (k, v), (k0, v0, n0) in zip(msg.items(), sig):
+        if v is not v0 or k != k0 or (n0 >= 0 and len(v) != n0):
+            return False
+    return True
+
+
+def _dumps(obj: Any) -> bytes:
+    return (json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=str) + '\n').encode('utf-8')
+
+
+def read_session_file(path: Path) -> Dict[str, Any]:
+    """读取会话文件（.jsonl 日志逐行流式解析；.json 为旧版 / 存档完整文档）
+
+    返回与旧版缓存文件相同结构的 dict：session_id / conversation_history /
+    context_summary / todo_data / token_stats / message_count / created_at。
+    """
+    path = Path(path)
+    if path.suffix != '.jsonl':
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    history: List[dict] = []
+    meta: Dict[str, Any] = {}
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # 写入中途中断的残行
+            op = rec.get('op')
+            if op == 'msg':
+                history.append(rec['m'])
+            elif op == 'trunc':
+                del history[rec.get('n', 0):]
+            elif op == 'meta':
+                meta = rec
+    data = {k: v for k, v in meta.items() if k != 'op'}
+    data.setdefault('session_id', path.stem[len('session_'):])
+    data['conversation_history'] = history
+    data['message_count'] = len(history)
+    return data
+
+
+def _replay_lines(path: Path) -> Tuple[Optional[bytes], List[bytes], int]:
+    """按行重放日志：返回 (最后一条 meta 行, 存活消息行, 完整行的总字节数)，不解析消息内容"""
+    meta_line = None
+    lines: List[bytes] = []
+    valid = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            valid += len(line)
+            if line.startswith(b'{"op":"msg"'):
+                lines.append(line)
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if rec.get('op') == 'trunc':
+                del lines[rec.get('n', 0):]
+            elif rec.get('op') == 'meta':
+                meta_line = line
+    return meta_line, lines, valid
+
+
+class _SessionState:
+    """主线程侧：已交给写线程的消息（对象 + 签名）与最后一次元数据"""
+    __slots__ = ('entries', 'meta', 'created_at')
+
+    def __init__(self, created_at: str = ''):
+        self.entries: List[Tuple[dict, tuple]] = []
+        self.meta: Optional[str] = None
+        self.created_at = created_at or datetime.now().isoformat()
+
+
+class SessionLogStore:
+    """会话日志存储（主线程调用 save / save_manifest / delete，写盘在后台线程）
+
+    用法::
+
+        store = SessionLogStore(cache_dir)
+        store.save(sid, history, meta, prepare=strip_images)   # 每次自动保存
+        store.save_manifest(manifest)
+        store.flush()                                          # 退出前等待写完
+    """
+
+    COMPACT_MIN_BYTES = 256 * 1024  # 日志小于此值时不压实
+    COMPACT_RATIO = 2.0             # 日志字节数 > 存活内容 × 此值时压实
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        self._states: Dict[str, _SessionState] = {}
+        self._manifest: Optional[bytes] = None
+        self._queue: "queue.Queue" = queue.Queue()
+        # 写线程侧：sid → [日志字节数, 存活消息行字节数列表, meta 行字节数]；None 表示尚未扫描
+        self._sizes: Dict[str, list] = {}
+        self._lost: set = set()   # 追加时发现日志文件已不存在的会话：下次保存整体重写
+        self.stats = {'saves': 0, 'appended': 0, 'rewrites': 0, 'compactions': 0, 'bytes_written': 0}
+        self._thread = threading.Thread(target=self._worker, name='SessionLogWriter', daemon=True)
+        self._thread.start()
+
+    # ----------------------------------------------------------
+    # 路径
+    # ----------------------------------------------------------
+
+    def log_path(self, sid: str) -> Path:
+        return self.cache_dir / f"session_{sid}.jsonl"
+
+    def legacy_path(self, sid: str) -> Path:
+        return self.cache_dir / f"session_{sid}.json"
+
+    def has_log(self, sid: str) -> bool:
+        return sid in self._states or self.log_path(sid).exists() or self.legacy_path(sid).exists()
+
+    def session_file(self, sid: str) -> Optional[Path]:
+        """会话在磁盘上的文件（优先 .jsonl 日志，其次旧版 .json）"""
+        for p in (self.log_path(sid), self.legacy_path(sid)):
+            if p.exists():
+                return p
+        return None
+
+    # ----------------------------------------------------------
+    # 主线程 API
+    # ----------------------------------------------------------
+
+    def load(self, path: Path) -> Dict[str, Any]:
+        """读取会话文件；若是本存储的日志，记住返回的消息对象，之后的保存只追加增量"""
+        path = Path(path)
+        data = read_session_file(path)
+        sid = data.get('session_id')
+        if path.suffix == '.jsonl' and sid and path == self.log_path(sid):
+            state = _SessionState(data.get('created_at', ''))
+            state.entries = [(m, _signature(m)) for m in data['conversation_history']]
+            self._states[sid] = state
+        return data
+
+    def save(self, sid: str, history: List[dict], meta: Dict[str, Any],
+             prepare: Optional[Callable[[List[dict]], List[dict]]] = None) -> int:
+        """保存会话增量，返回交给写线程的新消息数
+
+        Args:
+            history: 会话的 conversation_history（只读，不会被修改）
+            meta: 元数据（context_summary / todo_data / token_stats 等，需可 JSON 序列化）
+            prepare: 写盘前对新增消息的变换（如剥离 base64 图片），只作用于增量
+        """
+        state = self._states.get(sid)
+        fresh = state is None or sid in self._lost
+        if fresh:
+            self._lost.discard(sid)
+            state = self._states[sid] = _SessionState(state.created_at if state else '')
+        entries = state.entries
+        n = min(len(entries), len(history))
+        keep = 0
+        while keep < n and history[keep] is entries[keep][0] and _same(history[keep], entries[keep][1]):
+            keep += 1
+        trunc = keep if keep < len(entries) else None
+        new_msgs = history[keep:]
+
+        meta = dict(meta, session_id=sid, version=LOG_VERSION, created_at=state.created_at)
+        meta_json = json.dumps(meta, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+        meta_changed = meta_json != state.meta
+        if not new_msgs and trunc is None and not meta_changed and not fresh:
+            return 0
+
+        del entries[keep:]
+        entries.extend((m, _signature(m)) for m in new_msgs)
+        state.meta = meta_json
+        # 浅拷贝：写线程序列化期间主线程可能替换字段值
+        payload = [dict(m) for m in (prepare(new_msgs) if prepare and new_msgs else new_msgs)]
+        self.stats['saves'] += 1
+        self._queue.put(('append', sid, fresh, trunc, payload, meta_json if meta_changed or fresh else None))
+        return len(new_msgs)
+
+    def save_manifest(self, manifest: Dict[str, Any]):
+        """原子更新 sessions_manifest.json（内容未变时跳过）"""
+        data = json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8')
+        if data == self._manifest:
+            return
+        self._manifest = data
+        self._queue.put(('manifest', data))
+
+    def delete(self, sid: str):
+        """删除会话日志（含旧版 .json）"""
+        self._states.pop(sid, None)
+        self._queue.put(('delete', sid))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待此前提交的写入全部完成"""
+        done = threading.Event()
+        self._queue.put(('barrier', done))
+        return done.wait(timeout)
+
+    # ----------------------------------------------------------
+    # 写线程
+    # ----------------------------------------------------------
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                kind = job[0]
+                if kind == 'append':
+                    self._write_append(*job[1:])
+                elif kind == 'manifest':
+                    _atomic_write(self.cache_dir / "sessions_manifest.json", job[1])
+                elif kind == 'delete':
+                    self._sizes.pop(job[1], None)
+                    for p in (self.log_path(job[1]), self.legacy_path(job[1])):
+                        if p.exists():
+                            p.unlink()
+                elif kind == 'barrier':
+                    job[1].set()
+            except Exception as e:
+                print(f"[Cache] 会话日志写入失败: {e}")
+
+    def _write_append(self, sid: str, fresh: bool, trunc: Optional[int], msgs: List[dict],
+                      meta_json: Optional[str]):
+        path = self.log_path(sid)
+        lines = [_dumps({'op': 'msg', 'm': m}) for m in msgs]
+        meta_line = (b'{"op":"meta",' + meta_json[1:].encode('utf-8') + b'\n') if meta_json else None
+        if not fresh and not path.exists():
+            # 日志被外部删除：只剩增量，先写下，并让主线程下次保存时整体重写
+            self._lost.add(sid)
+            fresh = True
+        if fresh:
+            # 本进程首次保存该会话：整体重写为快照
+            self._rewrite(sid, meta_line, lines)
+            legacy = self.legacy_path(sid)
+            if legacy.exists():
+                legacy.unlink()
+            self.stats['rewrites'] += 1
+            return
+        sizes = self._sizes.get(sid)
+        if sizes is None:
+            # 恢复后的第一次追加：扫描现有日志得到存活内容大小，截掉上次崩溃留下的残行
+            old_meta, live, valid = _replay_lines(path)
+            if valid < path.stat().st_size:
+                os.truncate(path, valid)
+            sizes = self._sizes[sid] = [valid, [len(x) for x in live], len(old_meta or b'')]
+        out = []
+        if trunc is not None:
+            out.append(_dumps({'op': 'trunc', 'n': trunc}))
+            del sizes[1][trunc:]
+        if meta_line:
+            out.append(meta_line)
+            sizes[2] = len(meta_line)
+        out.extend(lines)
+        sizes[1].extend(len(x) for x in lines)
+        data = b''.join(out)
+        with open(path, 'ab') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        sizes[0] += len(data)
+        self.stats['appended'] += len(lines)
+        self.stats['bytes_written'] += len(data)
+        live = sum(sizes[1]) + sizes[2]
+        if sizes[0] > self.COMPACT_MIN_BYTES and sizes[0] > live * self.COMPACT_RATIO:
+            self._compact(sid)
+
+    def _rewrite(self, sid: str, meta_line: Optional[bytes], lines: List[bytes]):
+        data = (meta_line or b'') + b''.join(lines)
+        _atomic_write(self.log_path(sid), data)
+        self._sizes[sid] = [len(data), [len(x) for x in lines], len(meta_line or b'')]
+        self.stats['bytes_written'] += len(data)
+
+    def _compact(self, sid: str):
+        """按行重放日志，只保留最后的 meta 与存活消息（原子替换）"""
+        meta_line, lines, _ = _replay_lines(self.log_path(sid))
+        self._rewrite(sid, meta_line, lines)
+        self.stats['compactions'] += 1
@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+"""
+SSE 流式解析器 — OpenAI 兼容协议与 Anthropic Messages 协议
+
+原先 chat_stream / _chat_stream_anthropic 对每个字节块做增量 UTF-8 解码、拼接到
+字符串缓冲，再用 split('\\n', 1) 逐行切分（每切一行都复制一次剩余缓冲），工具调用
+参数片段拼接后在结束时整体 json.loads，失败再做一遍花括号扫描修复。长推理输出下
+这些开销都落在 UI 进程上。
+
+本模块：
+  - 在原始字节上找最后一个 '\\n'：UTF-8 中 '\\n' 不会出现在多字节字符内部，因此
+    无需增量解码器；字节块中的完整行经 memoryview 一次解码、在 C 层切分，未完成
+    的尾部字节留到下一块；不再逐行复制剩余缓冲
+  - data 负载用 JSONDecoder.raw_decode(line, 6) 从偏移处直接解析，不切片
+  - ToolArgsAssembler 随片段到达增量扫描 JSON 结构（只用正则跳到 { } " \\ 四种
+    字符），实时记录顶层对象边界：单个完整对象直接使用，无需校验解析；被代理拼接
+    的 {...}{...} 按已知边界拆分，无需再扫描
+
+解析器输出与 AIClient 原有的内部 chunk 格式一致：
+    {"type": "content" | "thinking" | "tool_args_delta" | "tool_call" | "done" | "error", ...}
+
+用法::
+
+    parser = OpenAIStreamParser(client._parse_usage, enable_thinking=True)
+    for raw in response.iter_content(chunk_size=4096):
+        yield from parser.feed(raw)
+        if parser.done:
+            return
+    yield from parser.finish()
+"""
+
+import re
+import json
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+# ============================================================
+# 工具调用参数增量组装
+# ============================================================
+
+# JSON 结构字符；'\\\\.' 把转义序列作为整体跳过，末尾孤立的 '\\' 单独匹配（跨片段转义）
+_RE_JSON_STRUCT = re.compile(r'\\.|[{}"\\]', re.S)
+
+
+class ToolArgsAssembler:
+    """单个工具调用的参数片段组装器
+
+    片段到达时增量维护 JSON 扫描状态（是否在字符串内、花括号深度、待处理转义），
+    并记录每个顶层对象的 [start, end) 区间。结束时：
+      - 恰好一个顶层对象 → 原样使用
+      - 多个顶层对象（代理把多个调用的参数拼在了同一 index 上）→ 按边界拆分
+      - 不完整 / 非对象 → 原样交给调用方（与旧逻辑一致）
+    """
+
+    __slots__ = ('text', 'spans', '_depth', '_in_str', '_escape', '_obj_start')
+
+    def __init__(self):
+        self.text = ''
+        self.spans: List[Tuple[int, int]] = []
+        self._depth = 0
+        self._in_str = False
+        self._escape = False
+        self._obj_start = -1
+
+    def feed(self, fragment: str):
+        base = len(self.text)
+        self.text += fragment
+        pos = 0
+        if self._escape:
+            # 上一片段以 '\\' 结尾：本片段首字符属于转义序列
+            self._escape = False
+            pos = 1
+        in_str = self._in_str
+        depth = self._depth
+        for m in _RE_JSON_STRUCT.finditer(fragment, pos):
+            tok = m.group()
+            if in_str:
+                if tok == '"':
+                    in_str = False
+                elif tok == '\\':
+                    self._escape = True     # 只可能出现在片段末尾
+            elif tok == '"':
+                in_str = True
+            elif tok == '{':
+                if depth == 0:
+                    self._obj_start = base + m.start()
+                depth += 1
+            elif tok == '}' and depth > 0:
+                depth -= 1
+                if depth == 0 and self._obj_start >= 0:
+                    self.spans.append((self._obj_start, base + m.end()))
+                    self._obj_start = -1
+        self._in_str = in_str
+        self._depth = depth
+
+    def parts(self) -> Optional[List[str]]:
+        """被拼接的多个对象 → 拆分后的参数字符串列表；其余情况返回 None（原样使用）"""
+        if not self.spans:
+            return None
+        if len(self.spans) == 1:
+            s, e = self.spans[0]
+            if e - s == len(self.text.strip()):
+                return None                 # 恰好一个完整对象
+            # 对象后还有多余内容：取出对象本身
+        parts = []
+        for s, e in self.spans:
+            part = self.text[s:e]
+            try:
+                json.loads(part)
+                parts.append(part)
+            except ValueError:
+                pass
+        return parts or None
+
+
+# ============================================================
+# 基类：字节块分行
+# ============================================================
+
+_raw_decode = json.JSONDecoder().raw_decode
+
+
+class _SSEStreamParser:
+    """字节块 → SSE 行 → 子类 _on_line(line, out)"""
+
+    def __init__(self, parse_usage: Callable[[dict], Dict[str, Any]], enable_thinking: bool = True):
+        self._parse_usage = parse_usage
+        self._enable_thinking = enable_thinking
+        self._buf = b''                 # 跨字节块的未完成行（原始字节）
+        self.done = False               # 已产出终止事件（done / error），调用方应结束读取
+        self.pending_usage: Dict[str, Any] = {}
+
+    def feed(self, chunk: bytes) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        buf = self._buf + chunk if self._buf else chunk
+        last = buf.rfind(b'\n')
+        if last < 0:
+            self._buf = bytes(buf)
+            return out
+        self._buf = buf[last + 1:]
+        # 完整行区间整体解码一次（memoryview 不复制字节），C 层按 '\n' 切分
+        on_line = self._on_line
+        for line in str(memoryview(buf)[:last], 'utf-8', 'ignore').split('\n'):
+            if line:
+                if line[-1] == '\r':
+                    line = line[:-1]
+                on_line(line, out)
+        return out
+
+    def _flush_tail(self, out: List[Dict[str, Any]]):
+        """流结束时处理没有以 '\n' 结尾的尾行"""
+        tail = self._buf.decode('utf-8', errors='ignore').strip()
+        self._buf = b''
+        if tail:
+            self._on_line(tail, out)
+
+    @staticmethod
+    def _data(line: str) -> Any:
+        """'data: ' 行的 JSON 负载；raw_decode 从偏移 6 处直接解析，不切片"""
+        try:
+            data, end = _raw_decode(line, 6)
+            if end == len(line):
+                return data
+        except ValueError:
+            pass
+        try:
+            return json.loads(line[6:])     # 前后有空白等非常规格式
+        except ValueError:
+            return None
+
+    def _on_line(self, line: str, out: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+
+# ============================================================
+# OpenAI 兼容协议
+# ============================================================
+
+class OpenAIStreamParser(_SSEStreamParser):
+    """OpenAI Chat Completions SSE（DeepSeek / GLM / Ollama / 各类中转同格式）"""
+
+    def __init__(self, parse_usage: Callable[[dict], Dict[str, Any]], enable_thinking: bool = True):
+        super().__init__(parse_usage, enable_thinking)
+        self.tool_calls: Dict[int, Dict[str, Any]] = {}
+        self._args: Dict[int, ToolArgsAssembler] = {}
+        self.last_finish_reason: Optional[str] = None
+        self._got_reasoning = False
+
+    def _on_line(self, line, out):
+        if not line.startswith('data: '):
+            return
+        data = self._data(line)
+        if data is None and line[6:].strip() == '[DONE]':
+            _reason_tokens = self.pending_usage.get('reasoning_tokens', 0)
+            print(f"[AI Client] Received [DONE], reasoning={'YES' if self._got_reasoning else 'NO'}"
+                  f"(tokens={_reason_tokens}), usage={self.pending_usage}")
+            out.append({"type": "done", "finish_reason": self.last_finish_reason or "stop",
+                        "usage": self.pending_usage})
+            self.done = True
+            return
+        if not isinstance(data, dict):
+            return
+
+        usage_data = data.get('usage')
+        if usage_data:
+            self.pending_usage = self._parse_usage(usage_data)
+
+        choices = data.get('choices')
+        if not choices:
+            return
+        choice = choices[0]
+        delta = choice.get('delta') or {}
+
+        # 思考内容：不同代理字段名不同，Think 关闭时静默丢弃
+        thinking = delta.get('reasoning_content') or delta.get('thinking_content') or delta.get('reasoning')
+        if thinking:
+            if not self._got_reasoning:
+                self._got_reasoning = True
+                _field = ('reasoning_content' if 'reasoning_content' in delta
+                          else 'thinking_content' if 'thinking_content' in delta
+                          else 'reasoning')
+                print(f"[AI Client] 🧠 收到 {_field}（首个 chunk，len={len(thinking)}，"
+                      f"enable_thinking={self._enable_thinking}）")
+            if self._enable_thinking:
+                out.append({"type": "thinking", "content": thinking})
+
+        content = delta.get('content')
+        if content:
+            out.append({"type": "content", "content": content})
+
+        tool_calls = delta.get('tool_calls')
+        if tool_calls:
+            self._on_tool_deltas(tool_calls, out)
+
+        # 完成：先发送工具调用，等后续 usage chunk / [DONE] 再结束
+        finish_reason = choice.get('finish_reason')
+        if finish_reason:
+            out.extend(self.flush_tool_calls())
+            self.last_finish_reason = finish_reason
+
+    def _on_tool_deltas(self, tool_calls: List[dict], out: List[Dict[str, Any]]):
+        buffer = self.tool_calls
+        for tc in tool_calls:
+            idx = tc.get('index', 0)
+            tc_id = tc.get('id', '')
+            if tc_id and idx in buffer:
+                existing_id = buffer[idx].get('id', '')
+                if existing_id and existing_id != tc_id:
+                    idx = max(buffer.keys()) + 1
+            entry = buffer.get(idx)
+            if entry is None:
+                entry = buffer[idx] = {'id': tc_id, 'type': 'function',
+                                       'function': {'name': '', 'arguments': ''}}
+                self._args[idx] = ToolArgsAssembler()
+            if tc_id:
+                entry['id'] = tc_id
+            fn = tc.get('function')
+            if fn:
+                if fn.get('name'):
+                    entry['function']['name'] = fn['name']
+                if 'arguments' in fn:
+                    frag = fn['arguments'] or ''
+                    asm = self._args[idx]
+                    asm.feed(frag)
+                    entry['function']['arguments'] = asm.text
+                    name = entry['function']['name']
+                    if name:
+                        # 广播参数增量 → UI 流式预览
+                        out.append({"type": "tool_args_delta", "index": idx, "name": name,
+                                    "delta": frag, "accumulated": asm.text})
+
+    def flush_tool_calls(self) -> List[Dict[str, Any]]:
+        """产出已组装的工具调用（按 index 排序），拆分被代理拼接的参数"""
+        if not self.tool_calls:
+            return []
+        buffer = self.tool_calls
+        fixed: Dict[int, Dict[str, Any]] = {}
+        next_idx = max(buffer.keys()) + 1
+        for idx in sorted(buffer.keys()):
+            entry = buffer[idx]
+            asm = self._args.get(idx)
+            parts = asm.parts() if asm is not None and entry['function']['arguments'].lstrip().startswith('{') else None
+            fixed[idx] = entry
+            if parts:
+                # 某些代理对多个工具调用使用相同 index，arguments 被拼接为 {...}{...}
+                print(f"[AI Client] 修复拼接的 tool_call arguments: 拆分为 {len(parts)} 个独立调用")
+                entry['function']['arguments'] = parts[0]
+                for extra in parts[1:]:
+                    fixed[next_idx] = {'id': f"call_{uuid.uuid4().hex[:24]}", 'type': 'function',
+                                       'function': {'name': entry['function']['name'], 'arguments': extra}}
+                    next_idx += 1
+        self.tool_calls = {}
+        self._args = {}
+        return [{"type": "tool_call", "tool_call": fixed[k]} for k in sorted(fixed.keys())]
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """流结束（连接关闭）：处理尾行；没有收到 [DONE] 时补发工具调用与 done"""
+        out: List[Dict[str, Any]] = []
+        self._flush_tail(out)
+        if self.done:
+            return out
+        out.extend(self.flush_tool_calls())
+        out.append({"type": "done", "finish_reason": self.last_finish_reason or "stop",
+                    "usage": self.pending_usage})
+        self.done = True
+        return out
+
+
+# ============================================================
+# Anthropic Messages 协议
+# ============================================================
+
+class AnthropicStreamParser(_SSEStreamParser):
+    """Anthropic SSE："event: xxx" 行后跟 "data: {...}" 行，输出 OpenAI 分支相同的 chunk"""
+
+    def __init__(self, parse_usage: Callable[[dict], Dict[str, Any]], enable_thinking: bool = True):
+        super().__init__(parse_usage, enable_thinking)
+        self._event_type = ''
+        self._blocks: Dict[int, Dict[str, Any]] = {}
+        self._args: Dict[int, ToolArgsAssembler] = {}
+        self.last_stop_reason: Optional[str] = None
+        self._got_thinking = False
+
+    def _on_line(self, line, out):
+        if line.startswith('event: '):
+            self._event_type = line[7:].strip()
+            return
+        if not line.startswith('data: '):
+            return
+        data = self._data(line)
+        event_type, self._event_type = self._event_type, ''
+        if not isinstance(data, dict):
+            return
+        self._on_event(data.get('type', event_type), data, out)
+
+    def _on_event(self, ev_type: str, data: dict, out: List[Dict[str, Any]]):
+        if ev_type == 'content_block_delta':
+            idx = data.get('index', 0)
+            delta = data.get('delta') or {}
+            delta_type = delta.get('type', '')
+            if delta_type == 'text_delta':
+                text = delta.get('text', '')
+                if text:
+                    out.append({"type": "content", "content": text})
+            elif delta_type == 'thinking_delta':
+                thinking = delta.get('thinking', '')
+                if thinking:
+                    if not self._got_thinking:
+                        self._got_thinking = True
+                        print(f"[AI Client] 🧠 Anthropic thinking (首个 chunk, len={len(thinking)}, "
+                              f"enable={self._enable_thinking})")
+                    if self._enable_thinking:
+                        out.append({"type": "thinking", "content": thinking})
+            elif delta_type == 'input_json_delta':
+                partial = delta.get('partial_json', '')
+                asm = self._args.get(idx)
+                if partial and asm is not None:
+                    asm.feed(partial)
+                    tool_name = self._blocks.get(idx, {}).get('name', '')
+                    if tool_name:
+                        out.append({"type": "tool_args_delta", "index": idx, "name": tool_name,
+                                    "delta": partial, "accumulated": asm.text})
+
+        elif ev_type == 'message_start':
+            usage = (data.get('message') or {}).get('usage')
+            if usage:
+                self.pending_usage = self._parse_usage(usage)
+
+        elif ev_type == 'content_block_start':
+            idx = data.get('index', 0)
+            block = data.get('content_block') or {}
+            self._blocks[idx] = {'type': block.get('type', 'text'), 'id': block.get('id', ''),
+                                 'name': block.get('name', '')}
+            if block.get('type') == 'tool_use':
+                self._args[idx] = ToolArgsAssembler()
+
+        elif ev_type == 'content_block_stop':
+            idx = data.get('index', 0)
+            block = self._blocks.get(idx, {})
+            if block.get('type') == 'tool_use':
+                # 工具调用完成 → OpenAI 格式的 tool_call
+                asm = self._args.pop(idx, None)
+                out.append({"type": "tool_call", "tool_call": {
+                    'id': block.get('id', ''), 'type': 'function',
+                    'function': {'name': block.get('name', ''),
+                                 'arguments': asm.text if asm is not None else '{}'},
+                }})
+
+        elif ev_type == 'message_delta':
+            self.last_stop_reason = (data.get('delta') or {}).get('stop_reason')
+            usage = data.get('usage')
+            if usage:
+                # message_delta 的 usage 是累计值（通常只有 output_tokens，新版 API 也带输入与缓存），
+                # 与 message_start 的取较大者，再重算合计与命中率
+                merged = self.pending_usage
+                for k, v in self._parse_usage(usage).items():
+                    if isinstance(v, (int, float)) and k != 'cache_hit_rate':
+                        merged[k] = max(merged.get(k, 0), v)
+                prompt = merged.get('prompt_tokens', 0)
+                merged['total_tokens'] = prompt + merged.get('completion_tokens', 0)
+                merged['cache_hit_rate'] = merged.get('cache_hit_tokens', 0) / prompt if prompt > 0 else 0
+
+        elif ev_type == 'message_stop':
+            # stop_reason 映射：end_turn → stop, tool_use → tool_calls, max_tokens → length
+            finish = {'tool_use': 'tool_calls', 'max_tokens': 'length'}.get(self.last_stop_reason, 'stop')
+            out.append({"type": "done", "finish_reason": finish, "usage": self.pending_usage})
+            self.done = True
+
+        elif ev_type == 'error':
+            err_msg = (data.get('error') or {}).get('message', str(data))
+            out.append({"type": "error", "error": err_msg})
+            self.done = True
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """流结束：处理尾行；未收到 message_stop 时补发 done"""
+        out: List[Dict[str, Any]] = []
+        self._flush_tail(out)
+        if not self.done:
+            out.append({"type": "done", "finish_reason": self.last_stop_reason or "stop",
+                        "usage": self.pending_usage})
+            self.done = True
+        return out
@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""
+Token 记账 — 逐消息记忆的 token 计数、按轮次累计、用 API usage 校准启发式估算
+
+原先 TokenOptimizer.calculate_message_tokens、AITab._calculate_context_tokens 和
+_manage_context 每次都把整段历史重新过一遍 count_tokens（tiktoken 缺失时是正则估算），
+_manage_context 每删除一轮又全量重算一次（O(历史²)），AITab._estimate_tokens 还另有一套估算。
+这里统一为一个记账服务：
+
+    TokenCounter（按模型）：消息指纹（content / tool_calls 的字符串本身；str 自带哈希缓存，
+        同一对象反复查询是 O(1)）→ 原始 token 数，按字符量做 LRU 限额
+    ContextLedger：一段历史的逐消息计数与按轮次（user 消息分界）累计；
+        追加、裁剪、原地压缩 tool 结果后只重算变化的消息
+    observe_usage()：API 返回的 prompt_tokens 与本地估算之比（EMA）校准启发式估算；
+        tiktoken 有该模型自己的编码时为精确计数，不做校准；回退 cl100k_base 的模型
+        （DeepSeek、Claude、GLM 等）和正则估算一样参与校准
+
+本模块不在 main.py 的重载列表中：计数器与校准系数是进程级状态，面板重载后继续沿用。
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .token_optimizer import count_tokens, has_exact_encoding
+
+# 单条消息的格式开销（role、分隔符等）/ 单个 tool_call 的结构开销 / 单张图片（低分辨率模式）
+MESSAGE_OVERHEAD = 4
+TOOL_CALL_OVERHEAD = 8
+IMAGE_TOKENS = 765
+
+# 记忆表按 key 中的字符总量限额（历史中仍在使用的字符串本就常驻，这里只限制已丢弃消息的残留）
+_MEMO_MAX_CHARS = 8_000_000
+
+# 校准：EMA 系数、采样门槛（估算过小的请求比值噪声大）、比值允许范围（超出视为异常样本）
+_CALIBRATION_ALPHA = 0.3
+_CALIBRATION_MIN_TOKENS = 200
+_CALIBRATION_RANGE = (0.4, 2.5)
+
+# 多模态内容中图片部分的占位
+_IMAGE = object()
+
+
+def _fingerprint(msg: Dict[str, Any]) -> Tuple[Any, Tuple[Tuple[str, str], ...]]:
+    """消息 → 计数相关部分的指纹：(content, ((name, arguments), ...))
+
+    role 不参与计数（开销固定），不计入指纹，相同内容的消息共享记忆。
+    """
+    content = msg.get('content') or ''
+    if isinstance(content, list):
+        parts = []
+        for part in content:
+            if isinstance(part, dict):
+                kind = part.get('type')
+                if kind == 'text':
+                    parts.append(part.get('text', '') or '')
+                elif kind == 'image_url':
+                    parts.append(_IMAGE)
+            elif isinstance(part, str):
+                parts.append(part)
+        content = tuple(parts)
+    elif not isinstance(content, str):
+        content = str(content)
+    calls = ()
+    tool_calls = msg.get('tool_calls')
+    if tool_calls:
+        calls = tuple(_call_key(tc) for tc in tool_calls)
+    return content, calls
+
+
+def _call_key(tc: Dict[str, Any]) -> Tuple[str, str]:
+    fn = tc.get('function') or {}
+    args = fn.get('arguments', '') or ''
+    return fn.get('name', '') or '', args if isinstance(args, str) else str(args)
+
+
+def _key_chars(key: Any) -> int:
+    if isinstance(key, str):
+        return len(key)
+    content, calls = key
+    n = len(content) if isinstance(content, str) else sum(len(p) for p in content if p is not _IMAGE)
+    return n + sum(len(name) + len(args) for name, args in calls)
+
+
+class TokenCounter:
+    """单个模型的 token 计数器（线程安全）
+
+    公开方法返回校准后的 token 数；记忆表中保存原始计数，校准系数变化后无需重算。
+    """
+
+    def __init__(self, model: str = ''):
+        self.model = model
+        self.exact = has_exact_encoding(model)
+        self._lock = threading.Lock()
+        self._memo: "OrderedDict[Any, int]" = OrderedDict()
+        self._memo_chars = 0
+        self.scale = 1.0
+        self.samples = 0
+        self.hits = 0
+        self.misses = 0
+
+    # ----------------------------------------------------------
+    # 计数
+    # ----------------------------------------------------------
+
+    def scaled(self, raw: int) -> int:
+        """原始计数 → 校准后的计数"""
+        if self.exact or self.scale == 1.0:
+            return raw
+        return int(raw * self.scale)
+
+    def raw_text(self, text: str) -> int:
+        if not text:
+            return 0
+        return self._lookup(text)
+
+    def raw_message(self, msg: Dict[str, Any]) -> int:
+        return self._lookup(_fingerprint(msg))
+
+    def raw_messages(self, messages: List[Dict[str, Any]]) -> int:
+        return sum(self._lookup(_fingerprint(m)) for m in messages)
+
+    def text(self, text: str) -> int:
+        return self.scaled(self.raw_text(text))
+
+    def message(self, msg: Dict[str, Any]) -> int:
+        return self.scaled(self.raw_message(msg))
+
+    def messages(self, messages: List[Dict[str, Any]]) -> int:
+        """消息列表的总 token 数（含 tool_calls、多模态内容与格式开销）"""
+        return self.scaled(self.raw_messages(messages))
+
+    def _lookup(self, key: Any) -> int:
+        with self._lock:
+            n = self._memo.get(key)
+            if n is not None:
+                self._memo.move_to_end(key)
+                self.hits += 1
+                return n
+            self.misses += 1
+        # 计数不持锁（tiktoken / 正则可能较慢）；并发重复计算同一条的结果相同，无害
+        n = self._count(key)
+        chars = _key_chars(key)
+        with self._lock:
+            if key not in self._memo:
+                self._memo[key] = n
+                self._memo_chars += chars
+                while self._memo_chars > _MEMO_MAX_CHARS and len(self._memo) > 1:
+                    old, _ = self._memo.popitem(last=False)
+                    self._memo_chars -= _key_chars(old)
+        return n
+
+    def _count(self, key: Any) -> int:
+        if isinstance(key, str):
+            return count_tokens(key, self.model)
+        content, calls = key
+        if isinstance(content, str):
+            total = count_tokens(content, self.model)
+        else:
+            total = sum(IMAGE_TOKENS if p is _IMAGE else count_tokens(p, self.model) for p in content)
+        for name, args in calls:
+            total += count_tokens(name, self.model) + count_tokens(args, self.model) + TOOL_CALL_OVERHEAD
+        return total + MESSAGE_OVERHEAD
+
+    # ----------------------------------------------------------
+    # 校准
+    # ----------------------------------------------------------
+
+    def observe(self, estimated_raw: int, actual: int) -> bool:
+        """用一次请求的实际 prompt token 数校准启发式估算；返回是否采纳了该样本"""
+        if self.exact or estimated_raw < _CALIBRATION_MIN_TOKENS or actual <= 0:
+            return False
+        ratio = actual / estimated_raw
+        lo, hi = _CALIBRATION_RANGE
+        if not lo <= ratio <= hi:
+            return False
+        with self._lock:
+            if self.samples == 0:
+                self.scale = ratio
+            else:
+                self.scale += _CALIBRATION_ALPHA * (ratio - self.scale)
+            self.samples += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'model': self.model,
+                'exact': self.exact,
+                'scale': self.scale,
+                'samples': self.samples,
+                'entries': len(self._memo),
+                'chars': self._memo_chars,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+class ContextLedger:
+    """一段对话历史的增量 token 账本
+
+    sync(history) 按位置比对上次的消息对象及其 content / tool_calls 引用，只对新增或被替换、
+    被原地修改的消息查询计数器（计数器本身也有记忆），并维护按轮次的累计值。
+    """
+
+    def __init__(self, counter: TokenCounter):
+        self.counter = counter
+        self._msgs: List[Dict[str, Any]] = []
+        self._refs: List[Tuple[Any, Any]] = []
+        self._tokens: List[int] = []
+        self._starts: List[int] = []     # 各轮起始下标
+        self._raw = 0
+
+    def sync(self, history: List[Dict[str, Any]]) -> int:
+        """与 history 对齐，返回校准后的总 token 数"""
+        msgs, refs, tokens = self._msgs, self._refs, self._tokens
+        n_old = len(msgs)
+        changed = len(history) != n_old
+        for i, m in enumerate(history):
+            ref = (m.get('content'), m.get('tool_calls'))
+            if i < n_old and msgs[i] is m and refs[i][0] is ref[0] and refs[i][1] is ref[1]:
+                continue
+            n = self.counter.raw_message(m)
+            if i < n_old:
+                msgs[i], refs[i] = m, ref
+                self._raw += n - tokens[i]
+                tokens[i] = n
+            else:
+                msgs.append(m)
+                refs.append(ref)
+                tokens.append(n)
+                self._raw += n
+            changed = True
+        if len(history) < n_old:
+            self._raw -= sum(tokens[len(history):])
+            del msgs[len(history):], refs[len(history):], tokens[len(history):]
+        if changed or not self._starts and msgs:
+            self._starts = [i for i, m in enumerate(msgs)
+                            if i == 0 or m.get('role') == 'user']
+        return self.total
+
+    @property
+    def total(self) -> int:
+        return self.counter.scaled(self._raw)
+
+    def rounds(self) -> List[Tuple[int, int, int]]:
+        """按 user 消息划分的轮次：[(起始下标, 结束下标, 校准后的 token 数), ...]"""
+        out = []
+        bounds = self._starts + [len(self._msgs)]
+        for s, e in zip(bounds, bounds[1:]):
+            out.append((s, e, self.counter.scaled(sum(self._tokens[s:e]))))
+        return out
+
+    def clear(self):
+        self._msgs, self._refs, self._tokens, self._starts = [], [], [], []
+        self._raw = 0
+
+
+# ============================================================
+# 进程级计数器
+# ============================================================
+
+_counters: Dict[str, TokenCounter] = {}
+_counters_lock = threading.Lock()
+
+
+def get_token_counter(model: str = '') -> TokenCounter:
+    """按模型名获取（或创建）计数器"""
+    key = (model or '').strip()
+    counter = _counters.get(key)
+    if counter is None:
+        with _counters_lock:
+            counter = _counters.get(key)
+            if counter is None:
+                counter = _counters[key] = TokenCounter(key)
+    return counter
+
+
+def request_prompt_tokens(usage: Dict[str, Any]) -> int:
+    """从 AIClient._parse_usage 的结果还原本次请求的完整输入 token 数
+
+    OpenAI / DeepSeek 的 prompt_tokens 已包含缓存命中与未命中部分；
+    Anthropic 原生的 input_tokens 不含缓存读取 / 写入，需要加回。
+    """
+    prompt = usage.get('prompt_tokens', 0) or 0
+    cached = (usage.get('cache_hit_tokens', 0) or 0) + (usage.get('cache_miss_tokens', 0) or 0)
+    return prompt + cached if cached > prompt else prompt
+
+
+# 工具定义列表 → JSON 文本（按对象缓存：HOUDINI_TOOLS 等列表在进程内是同一对象）
+_tools_text: Dict[int, Tuple[list, str]] = {}
+
+
+def tools_json(tools: List[dict]) -> str:
+    """工具定义的 JSON 文本（用于计数；同一列表对象只序列化一次）"""
+    entry = _tools_text.get(id(tools))
+    if entry is None or entry[0] is not tools:
+        import json
+        if len(_tools_text) >= 8:
+            _tools_text.clear()
+        entry = _tools_text[id(tools)] = (tools, json.dumps(tools, ensure_ascii=False))
+    return entry[1]
+
+
+def observe_usage(model: str, messages: List[Dict[str, Any]], tools: Optional[List[dict]],
+                  usage: Dict[str, Any]) -> bool:
+    """用一次 API 调用的 usage 校准该模型的启发式估算
+
+    Args:
+        messages: 本次发送的消息列表（含系统提示）
+        tools: 本次发送的工具定义（None 表示未发送）
+        usage: AIClient._parse_usage 的结果
+    """
+    counter = get_token_counter(model)
+    if counter.exact or not usage:
+        return False
+    estimated = counter.raw_messages(messages)
+    if tools:
+        estimated += counter.raw_text(tools_json(tools))
+    accepted = counter.observe(estimated, request_prompt_tokens(usage))
+    if accepted and counter.samples == 1:
+        print(f"[Token] {model or 'default'} 本地估算校准: ×{counter.scale:.2f} "
+              f"(估算 {estimated} / 实际 {request_prompt_tokens(usage)})")
+    return accepted
@@ -20,6 +20,7 @@ from enum import Enum
 # ============================================================
 _tiktoken = None
 _encoding_cache: Dict[str, Any] = {}
+_native_encodings: set = set()  # tiktoken 自带编码映射的模型（其余模型回退 cl100k_base，只是近似）
 
 def _get_encoding(model: str):
     """获取 tiktoken 编码器（带缓存）"""
@@ -38,6 +39,7 @@ def _get_encoding(model: str):
         if key not in _encoding_cache:
             try:
                 _encoding_cache[key] = _tiktoken.encoding_for_model(key)
+                _native_encodings.add(key)
             except KeyError:
                 # 未知模型回退 cl100k_base（GPT-4 / Claude 通用）
                 if 'cl100k' not in _encoding_cache:
@@ -48,6 +50,13 @@ def _get_encoding(model: str):
         return None
 
 
+
+def has_exact_encoding(model: str) -> bool:
+    """tiktoken 是否有该模型自己的编码（回退 cl100k_base 的模型只是近似计数）"""
+    if _get_encoding(model) is None:
+        return False
+    return (model or 'gpt-5.2') in _native_encodings
+
 def count_tokens(text: str, model: str = '') -> int:
     """精准计算 token 数量
     
@@ -144,23 +153,33 @@ def calculate_cost(
     
     Args:
         model: 模型名
-        input_tokens: 总输入 token（prompt_tokens）
+        input_tokens: 总输入 token（prompt_tokens，含缓存命中与写入）
         output_tokens: 总输出 token（completion_tokens，含 reasoning）
         cache_hit: 缓存命中 token
-        cache_miss: 缓存未命中 token
+        cache_miss: 缓存未命中 / 写入 token
         reasoning_tokens: 推理 token（是 output_tokens 的子集）
     
     Returns:
         估算费用（USD）
     """
+    in_cost, out_cost = _cost_parts(model, input_tokens, output_tokens, cache_hit, cache_miss,
+                                    reasoning_tokens)
+    return in_cost + out_cost
+
+
+def _cost_parts(model: str, input_tokens: int, output_tokens: int, cache_hit: int,
+                cache_miss: int, reasoning_tokens: int):
+    """(输入费用, 输出费用)"""
     p = _match_pricing(model)
     M = 1_000_000.0
     
     # 输入费用
-    # cache_hit 按缓存价格计，cache_miss 按正常输入价格计
-    # 若 cache_hit + cache_miss > 0 则优先使用分拆，否则全部按 input_tokens 计
+    # cache_hit 按缓存价格计，其余输入按正常价格计。未命中部分取 input_tokens - cache_hit
+    # 与 cache_miss 的较大者：OpenAI 只报告命中数，Anthropic 的 cache_miss 只是缓存写入，
+    # 断点之后未缓存的输入也要计费
     if cache_hit > 0 or cache_miss > 0:
-        in_cost = (cache_hit * p.get('input_cache', p['input']) + cache_miss * p['input']) / M
+        uncached = max(input_tokens - cache_hit, cache_miss)
+        in_cost = (cache_hit * p.get('input_cache', p['input']) + uncached * p['input']) / M
     else:
         in_cost = input_tokens * p['input'] / M
     
@@ -169,19 +188,42 @@ def calculate_cost(
     normal_out = max(0, output_tokens - reasoning_tokens)
     out_cost = (normal_out * p['output'] + reasoning_tokens * reasoning_price) / M
     
-    return in_cost + out_cost
+    return in_cost, out_cost
+
+
+def _stats_cache(stats: dict):
+    """聚合统计字典 → (缓存命中, 缓存未命中)"""
+    return (stats.get('cache_read', stats.get('cache_hit', stats.get('cache_hit_tokens', 0))),
+            stats.get('cache_write', stats.get('cache_miss', stats.get('cache_miss_tokens', 0))))
+
 
+def input_cache_ratio(stats: dict) -> float:
+    """输入中由缓存命中的比例（缓存命中 / 总输入 token）"""
+    cache_hit, _ = _stats_cache(stats)
+    total = stats.get('input_tokens', 0) or 0
+    return min(1.0, cache_hit / total) if total > 0 else 0.0
 
-def calculate_cost_from_stats(model: str, stats: dict) -> float:
-    """从聚合统计字典中计算费用"""
-    return calculate_cost(
-        model=model,
-        input_tokens=stats.get('input_tokens', 0),
-        output_tokens=stats.get('output_tokens', 0),
-        cache_hit=stats.get('cache_read', stats.get('cache_hit', stats.get('cache_hit_tokens', 0))),
-        cache_miss=stats.get('cache_write', stats.get('cache_miss', stats.get('cache_miss_tokens', 0))),
-        reasoning_tokens=stats.get('reasoning_tokens', 0),
-    )
+
+def calculate_cost_from_stats(model: str, stats: dict, breakdown: bool = False):
+    """从聚合统计字典中计算费用
+    
+    breakdown=True 时返回 {'cost', 'input_cost', 'output_cost', 'input_cache_ratio',
+    'cache_savings'}：cache_savings 为缓存命中部分按正常输入价格计费时多出的费用。
+    """
+    cache_hit, cache_miss = _stats_cache(stats)
+    input_tokens = stats.get('input_tokens', 0)
+    in_cost, out_cost = _cost_parts(model, input_tokens, stats.get('output_tokens', 0),
+                                    cache_hit, cache_miss, stats.get('reasoning_tokens', 0))
+    if not breakdown:
+        return in_cost + out_cost
+    p = _match_pricing(model)
+    return {
+        'cost': in_cost + out_cost,
+        'input_cost': in_cost,
+        'output_cost': out_cost,
+        'input_cache_ratio': input_cache_ratio(stats),
+        'cache_savings': cache_hit * (p['input'] - p.get('input_cache', p['input'])) / 1_000_000.0,
+    }
 
 
 # ============================================================
@@ -215,38 +257,22 @@ class TokenOptimizer:
         self.model = model  # 用于 tiktoken
         self._compression_history: List[Dict[str, Any]] = []  # 压缩历史记录
     
+    @property
+    def counter(self):
+        """当前模型的 token 计数器（token_accounting：逐消息记忆 + usage 校准）"""
+        from .token_accounting import get_token_counter
+        return get_token_counter(self.model)
+
     def estimate_tokens(self, text: str) -> int:
-        """估算文本的 token 数量（优先 tiktoken）"""
-        return count_tokens(text, self.model)
+        """估算文本的 token 数量（优先 tiktoken，否则为校准后的启发式估算）"""
+        return self.counter.text(text)
     
     def calculate_message_tokens(self, messages: List[Dict[str, Any]]) -> int:
-        """计算消息列表的总 token 数（含 tool_calls、多模态内容）"""
-        total = 0
-        for msg in messages:
-            content = msg.get('content', '') or ''
-            if isinstance(content, list):
-                # 多模态消息：提取文字部分计算 token，图片按固定开销估算
-                for part in content:
-                    if isinstance(part, dict):
-                        if part.get('type') == 'text':
-                            total += self.estimate_tokens(part.get('text', ''))
-                        elif part.get('type') == 'image_url':
-                            total += 765  # 图片固定约 765 token（低分辨率模式）
-                    elif isinstance(part, str):
-                        total += self.estimate_tokens(part)
-            else:
-                total += self.estimate_tokens(content)
-            # tool_calls 中的函数名和参数也占 token
-            tool_calls = msg.get('tool_calls')
-            if tool_calls:
-                for tc in tool_calls:
-                    fn = tc.get('function', {})
-                    total += self.estimate_tokens(fn.get('name', ''))
-                    total += self.estimate_tokens(fn.get('arguments', ''))
-                    total += 8  # tool_call 结构开销（id, type, function wrapper）
-            # 消息格式开销（role, 格式字符等）
-            total += 4
-        return total
+        """计算消息列表的总 token 数（含 tool_calls、多模态内容）
+
+        逐消息记忆：历史中未变化的消息不重复计数。
+        """
+        return self.counter.messages(messages)
     
     def compress_tool_result(self, result: Dict[str, Any], max_length: int = 200) -> str:
         """压缩工具调用结果
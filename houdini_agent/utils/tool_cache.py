@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+"""
+工具结果缓存 — 会话级 LRU，按节点路径精确失效
+
+原先 agent_loop_stream 只在单次 Agent 运行内对查询工具去重，并在任何修改操作后
+按前缀清空网络类缓存；跨轮次时同样的 get_node_parameters / get_houdini_node_doc
+会被反复执行。ToolResultCache 以 "工具名 + 规范化参数" 为键，每条结果记录它依赖
+的节点路径：
+
+    静态工具（文档 / 节点类型 / 技能列表）  → 无依赖，只按 LRU 淘汰
+    场景工具（参数 / 网络结构 / 错误检查…）  → 依赖参数中的节点或网络路径
+    轮次工具（read_selection 等）            → 只在当前轮次内有效
+
+修改类工具执行后由 invalidate_for_tool() 计算受影响路径（可选地扩展到下游节点），
+只淘汰依赖这些路径、其父网络或其子节点的条目。用户在 Houdini 中的手动修改由
+scene_mirror 的事件监听转发到 invalidate()；新一轮开始时，未被镜像监听覆盖的场景
+条目会被丢弃（begin_turn），避免跨轮次读到过期结果。镜像只监听网络的直接子节点，
+递归查询（check_errors 检查整个子树、find_nodes_by_param / list_children 递归模式）
+看不到嵌套子网内的手动修改，新一轮开始时一律丢弃。
+
+每次失效都记入变更日志（version 递增）：在缓存之外持有结果的一方（tool_prefetch 的投机
+预取）可用 changed_since() 判断某个查询在记录的版本之后是否可能已过期。
+"""
+
+import json
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Optional, Set, Tuple
+
+
+# 结果与场景无关：只依赖帮助文档 / 节点类型表 / 技能列表
+STATIC_TOOLS = frozenset({
+    'search_node_types', 'semantic_search_nodes', 'search_local_doc',
+    'get_houdini_node_doc', 'get_node_inputs', 'list_skills',
+})
+
+# 依赖场景的查询工具 → 参数中表示依赖路径的键（缺省时依赖整个场景 '*'）
+# 键名必须与 HOUDINI_TOOLS 中的参数名一致（见 benchmarks/bench_tool_cache.py 的校验）
+SCENE_TOOLS: Dict[str, Tuple[str, ...]] = {
+    'get_network_structure': ('network_path',),
+    'get_node_parameters': ('node_path',),
+    'list_children': ('network_path',),
+    'check_errors': ('node_path',),
+    'find_nodes_by_param': ('network_path',),
+    'get_node_positions': ('network_path',),
+    'list_network_boxes': ('parent_path',),
+}
+
+# 读取整个子树的场景查询 → 决定是否递归的参数及其默认值（None 表示总是递归）
+# check_errors 作用于网络时检查 allSubChildren
+RECURSIVE_READS: Dict[str, Optional[Tuple[str, bool]]] = {
+    'check_errors': None,
+    'find_nodes_by_param': ('recursive', True),
+    'list_children': ('recursive', False),
+}
+
+# 只在当前轮次内去重（选择集 / 性能分析结果随时可能变化）
+TURN_TOOLS = frozenset({'read_selection', 'perf_stop_and_report', 'perf_analyze_profile'})
+
+CACHEABLE_TOOLS = STATIC_TOOLS | frozenset(SCENE_TOOLS) | TURN_TOOLS
+
+# 不影响场景的非查询工具：执行后无需失效
+_NEUTRAL_TOOLS = frozenset({
+    'web_search', 'fetch_webpage', 'execute_shell', 'add_todo', 'update_todo',
+    'save_hip', 'perf_start_profile', 'verify_and_summarize',
+})
+
+# 修改类工具 → (受影响路径的参数键, 是否波及下游节点)；参数值可以是路径列表
+# 新建节点使用 "<父网络>/<名称或 *>"：只命中父网络级条目，不影响兄弟节点
+# create_nodes_batch 没有父网络参数（建在当前网络中），按范围未知处理
+_MUTATION_PATHS: Dict[str, Tuple[Tuple[str, ...], bool]] = {
+    'set_node_parameter': (('node_path',), True),
+    'batch_set_parameters': (('node_paths',), True),
+    'delete_node': (('node_path',), True),
+    'connect_nodes': (('to_path',), True),
+    'set_display_flag': (('node_path',), False),
+    'layout_nodes': (('network_path',), False),
+    'create_network_box': (('parent_path',), False),
+    'add_nodes_to_box': (('parent_path',), False),
+}
+_CREATE_TOOLS: Dict[str, Tuple[str, str]] = {
+    'create_node': ('parent_path', 'node_name'),
+    'create_wrangle_node': ('parent_path', 'node_name'),
+    'copy_node': ('dest_network', 'new_name'),
+}
+
+_WILDCARD = '*'
+
+
+def affects_scene(tool_name: str) -> bool:
+    """工具是否可能修改场景（同一轮中其后的场景查询不能再读缓存）"""
+    return tool_name not in CACHEABLE_TOOLS and tool_name not in _NEUTRAL_TOOLS
+
+
+def _norm_path(p: Any) -> str:
+    p = str(p).strip()
+    return p.rstrip('/') if len(p) > 1 else p
+
+
+def arg_paths(args: Dict[str, Any], keys: Iterable[str]) -> Set[str]:
+    """参数中 keys 对应的路径（单个路径或路径列表），规范化后去重"""
+    paths = set()
+    for k in keys:
+        v = args.get(k)
+        for p in (v if isinstance(v, (list, tuple)) else (v,)):
+            if p:
+                paths.add(_norm_path(p))
+    return paths
+
+
+def is_recursive_read(tool_name: str, args: Dict[str, Any]) -> bool:
+    """查询是否读取整个子树（镜像看不到嵌套子网内的修改）"""
+    if tool_name not in RECURSIVE_READS:
+        return False
+    flag = RECURSIVE_READS[tool_name]
+    if flag is None:
+        return True
+    key, default = flag
+    value = (args or {}).get(key)
+    if value is None:
+        return default
+    if isinstance(value, str):
+        return value.strip().lower() not in ('false', '0', 'no', '')
+    return bool(value)
+
+
+def _covers(dep: str, path: str) -> bool:
+    """dep 与 path 相同，或互为祖先 / 子孙"""
+    if dep == _WILDCARD or path == _WILDCARD or dep == path:
+        return True
+    return path.startswith(dep + '/') or dep.startswith(path + '/')
+
+
+def _parent(path: str) -> str:
+    return path.rsplit('/', 1)[0] or '/'
+
+
+class ToolResultCache:
+    """会话级工具结果缓存（线程安全）
+
+    用法::
+
+        cache = ToolResultCache()
+        hit = cache.lookup(name, args)
+        if hit is None:
+            result = execute(name, args)
+            cache.store(name, args, result)
+        cache.invalidate_for_tool(name, args, result)   # 修改类工具执行后
+    """
+
+    MAX_ENTRIES = 256
+    # 变更日志保留的失效记录数（更早的版本一律视为已过期）
+    CHANGE_LOG_SIZE = 64
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # key → (tool_name, deps, result, 是否递归查询)；deps 为 None 表示静态条目
+        self._entries: "OrderedDict[str, Tuple[str, Optional[FrozenSet[str]], dict, bool]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0       # LRU 容量淘汰
+        self.invalidated = 0     # 因场景修改失效
+        # 下游解析器：paths → paths ∪ 下游节点路径（由宿主提供，通常基于 scene_mirror）
+        self.downstream_resolver: Optional[Callable[[Set[str]], Set[str]]] = None
+        # 变更日志：(version, 失效路径)；路径为 None 表示整个场景
+        self.version = 0
+        self._changes: "deque[Tuple[int, Optional[FrozenSet[str]]]]" = deque(maxlen=self.CHANGE_LOG_SIZE)
+
+    # ----------------------------------------------------------
+    # 键与依赖
+    # ----------------------------------------------------------
+
+    @staticmethod
+    def make_key(tool_name: str, args: Dict[str, Any]) -> str:
+        """工具名 + 规范化参数：去掉空值与默认分页，路径去掉末尾斜杠"""
+        norm = {}
+        for k, v in (args or {}).items():
+            if v is None or v == '' or (k == 'page' and str(v) == '1'):
+                continue
+            if isinstance(v, str):
+                v = v.strip()
+                if k.endswith('path') or k == 'dest_network':
+                    v = _norm_path(v)
+            norm[k] = v
+        return f"{tool_name}:{json.dumps(norm, sort_keys=True, ensure_ascii=False, default=str)}"
+
+    @staticmethod
+    def _deps(tool_name: str, args: Dict[str, Any]) -> Optional[FrozenSet[str]]:
+        if tool_name in STATIC_TOOLS:
+            return None
+        deps = arg_paths(args, SCENE_TOOLS.get(tool_name, ()))
+        return frozenset(deps or (_WILDCARD,))
+
+    # ----------------------------------------------------------
+    # 查询 / 写入
+    # ----------------------------------------------------------
+
+    def lookup(self, tool_name: str, args: Dict[str, Any]) -> Optional[dict]:
+        if tool_name not in CACHEABLE_TOOLS:
+            return None
+        key = self.make_key(tool_name, args)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def peek(self, tool_name: str, args: Dict[str, Any]) -> Optional[dict]:
+        """查询但不更新 LRU 顺序与命中统计（供预取等旁路判断）"""
+        if tool_name not in CACHEABLE_TOOLS:
+            return None
+        with self._lock:
+            entry = self._entries.get(self.make_key(tool_name, args))
+            return entry[2] if entry is not None else None
+
+    def store(self, tool_name: str, args: Dict[str, Any], result: dict):
+        """只缓存成功的查询结果"""
+        if tool_name not in CACHEABLE_TOOLS or not result or not result.get('success'):
+            return
+        key = self.make_key(tool_name, args)
+        deps = self._deps(tool_name, args)
+        recursive = is_recursive_read(tool_name, args)
+        with self._lock:
+            self._entries[key] = (tool_name, deps, result, recursive)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    # ----------------------------------------------------------
+    # 失效
+    # ----------------------------------------------------------
+
+    def invalidate(self, paths: Iterable[str], downstream: bool = False) -> int:
+        """淘汰依赖 paths（或其父网络 / 子节点）的场景条目，返回淘汰数"""
+        targets = {_norm_path(p) for p in paths if p}
+        if not targets:
+            return 0
+        with self._lock:
+            has_scene = any(entry[1] is not None for entry in self._entries.values())
+        if downstream and self.downstream_resolver is not None and has_scene:
+            try:
+                targets = set(self.downstream_resolver(targets)) | targets
+            except Exception as e:
+                print(f"[ToolCache] 下游解析失败，按父网络失效: {e}")
+                targets |= {_parent(p) for p in targets}
+        elif downstream:
+            # 无拓扑信息（或没有场景条目、不值得解析）：下游未知，按整个父网络处理
+            targets |= {_parent(p) for p in targets}
+        with self._lock:
+            self._log_change(frozenset(targets))
+            if not has_scene:
+                return 0
+            doomed = [k for k, (_, deps, _r, _rec) in self._entries.items()
+                      if deps is not None and any(_covers(d, t) for d in deps for t in targets)]
+            for k in doomed:
+                del self._entries[k]
+            self.invalidated += len(doomed)
+            return len(doomed)
+
+    def invalidate_scene(self) -> int:
+        """淘汰全部场景相关条目（undo / 任意代码执行 / 场景重载）"""
+        return self._drop(lambda tool, deps, recursive: deps is not None)
+
+    def invalidate_for_tool(self, tool_name: str, args: Dict[str, Any], result: Optional[dict]) -> int:
+        """修改类工具执行后调用：按工具语义计算受影响路径"""
+        if tool_name in CACHEABLE_TOOLS or tool_name in _NEUTRAL_TOOLS:
+            return 0
+        args = args or {}
+        if tool_name in _MUTATION_PATHS:
+            keys, downstream = _MUTATION_PATHS[tool_name]
+            paths = arg_paths(args, keys)
+            if paths:
+                return self.invalidate(paths, downstream=downstream)
+        elif tool_name in _CREATE_TOOLS:
+            parent_key, name_key = _CREATE_TOOLS[tool_name]
+            parent = args.get(parent_key)
+            if parent:
+                name = (args.get(name_key) if name_key else None) or _WILDCARD
+                return self.invalidate([f"{_norm_path(parent)}/{name}"])
+        # 未知工具 / 参数缺失 / execute_python / run_skill / undo_redo：无法界定范围
+        return self.invalidate_scene()
+
+    def begin_turn(self, watched_networks: Optional[Set[str]] = None) -> int:
+        """新一轮开始：丢弃轮次条目、递归查询，以及不在 watched_networks 监听范围内的场景条目
+
+        watched_networks 为 scene_mirror 正在监听的网络路径；None 表示无监听（丢弃全部场景条目）。
+        镜像只监听这些网络的直接子节点，递归查询依赖的子树在监听范围之外。
+        """
+        watched = {_norm_path(p) for p in (watched_networks or ())}
+
+        def _stale(tool, deps, recursive):
+            if deps is None:
+                return False
+            if tool in TURN_TOOLS or recursive or not watched:
+                return True
+            return any(d == _WILDCARD or (d not in watched and _parent(d) not in watched)
+                       for d in deps)
+        return self._drop(_stale)
+
+    def _drop(self, predicate) -> int:
+        with self._lock:
+            self._log_change(None)
+            doomed = [k for k, (tool, deps, _r, rec) in self._entries.items() if predicate(tool, deps, rec)]
+            for k in doomed:
+                del self._entries[k]
+            self.invalidated += len(doomed)
+            return len(doomed)
+
+    def clear(self):
+        with self._lock:
+            self._log_change(None)
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = self.invalidated = 0
+
+    # ----------------------------------------------------------
+    # 变更日志
+    # ----------------------------------------------------------
+
+    def _log_change(self, paths: Optional[FrozenSet[str]]):
+        """记录一次失效（调用方持有 _lock）"""
+        self.version += 1
+        self._changes.append((self.version, paths))
+
+    def changed_since(self, version: int, tool_name: str, args: Dict[str, Any]) -> bool:
+        """version 之后的失效是否可能影响该查询的结果（静态工具恒为 False）"""
+        deps = self._deps(tool_name, args or {})
+        if deps is None:
+            return False
+        with self._lock:
+            if version >= self.version:
+                return False
+            if not self._changes or self._changes[0][0] > version + 1:
+                return True  # 日志已滚动，无法确认
+            for v, paths in self._changes:
+                if v <= version:
+                    continue
+                if paths is None or any(_covers(d, t) for d in deps for t in paths):
+                    return True
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidated': self.invalidated,
+            }
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+投机预取 — 在 LLM 流式输出期间提前执行大概率会被请求的只读查询
+
+chat_stream 流式返回时 Houdini 主线程是空闲的，而工具调用序列高度可预测：
+create_node 之后几乎总是对新节点 get_node_parameters，修改参数 / 连线 / 新建 Wrangle 之后是 check_errors，
+search_node_types 之后是 get_houdini_node_doc。ToolPrefetcher 在两个时机提前发起查询：
+
+    参数流式到达时（tool_args_delta）：某个可缓存工具的参数 JSON 已完整 → 立即执行同一调用，
+        不必等整条回复结束
+    一轮工具执行完成后：按上表预测下一轮的查询（新节点路径从工具结果中解析），
+        在下一次请求流式返回期间执行
+
+只预取 tool_cache.CACHEABLE_TOOLS 中的只读工具，且必须在本次运行的工具列表内（Ask 模式等）。
+结果按 "工具名 + 规范化参数" 暂存：模型确实请求了同一调用时直接使用（正在执行的会等待其
+完成），否则在本轮结束时丢弃。场景查询提交后若依赖的路径被失效（ToolResultCache 变更日志），
+结果作废，由正常流程重新执行。
+
+执行器由宿主提供（AIClient.set_prefetch_executor），与正常工具共用主线程调度，
+因此投机查询占用主线程的时间计入 wasted_ms，作为命中率之外的代价指标。
+"""
+
+import json
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .tool_cache import CACHEABLE_TOOLS, STATIC_TOOLS, TURN_TOOLS, ToolResultCache, affects_scene
+
+# 每轮最多发起的投机查询数（与正常工具争用主线程，宁少勿滥）
+MAX_PER_ROUND = 6
+# 模型请求了正在执行的预取时，等待其完成的上限（秒）；超时后按未命中处理
+WAIT_TIMEOUT = 30.0
+
+# 工具参数的默认值：预取键与查询键统一去掉，避免 {"category": "sop"} 与省略时不匹配
+_DEFAULT_ARGS: Dict[str, Dict[str, Any]] = {
+    'get_houdini_node_doc': {'category': 'sop'},
+    'get_node_inputs': {'category': 'sop'},
+}
+
+# 新建节点工具 → 父网络参数键
+_CREATED_PARENT = {
+    'create_node': 'parent_path',
+    'create_wrangle_node': 'parent_path',
+}
+# 修改类工具 → 之后需要 check_errors 的节点路径参数键
+_CHECK_AFTER = {
+    'set_node_parameter': 'node_path',
+    'batch_set_parameters': 'node_path',
+    'connect_nodes': 'to_path',
+}
+
+_RE_NODE_PATH = re.compile(r'/[\w.\-]+(?:/[\w.\-]+)+')
+_RE_NODE_TYPE = re.compile(r'^-\s*`(\w+)/([^`]+)`', re.MULTILINE)
+
+
+def _normalize(tool_name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+    defaults = _DEFAULT_ARGS.get(tool_name)
+    if not defaults:
+        return args or {}
+    return {k: v for k, v in (args or {}).items() if defaults.get(k, object()) != v}
+
+
+def prefetch_key(tool_name: str, args: Dict[str, Any]) -> str:
+    """预取结果的匹配键（ToolResultCache.make_key + 去掉默认参数）"""
+    return ToolResultCache.make_key(tool_name, _normalize(tool_name, args))
+
+
+def _result_text(result: Optional[dict]) -> str:
+    if not result or not result.get('success'):
+        return ''
+    text = result.get('result', '')
+    return text if isinstance(text, str) else ''
+
+
+def predict_follow_ups(tool_name: str, args: Dict[str, Any],
+                       result: Optional[dict]) -> List[Tuple[str, Dict[str, Any]]]:
+    """一次成功的工具调用 → 下一轮大概率出现的只读查询 [(tool_name, args), ...]"""
+    if not result or not result.get('success'):
+        return []
+    args = args or {}
+    out: List[Tuple[str, Dict[str, Any]]] = []
+    if tool_name in _CREATED_PARENT:
+        parent = str(args.get(_CREATED_PARENT[tool_name]) or '').rstrip('/')
+        m = _RE_NODE_PATH.search(_result_text(result))
+        if m and (not parent or m.group(0).startswith(parent + '/')):
+            path = m.group(0)
+            # 新建的普通节点接下来通常是查看 / 设置参数；Wrangle 节点则先确认 VEX 能否编译
+            if tool_name == 'create_node':
+                out.append(('get_node_parameters', {'node_path': path}))
+            else:
+                out.append(('check_errors', {'node_path': path}))
+    elif tool_name in _CHECK_AFTER:
+        path = args.get(_CHECK_AFTER[tool_name])
+        if path:
+            out.append(('check_errors', {'node_path': path}))
+    elif tool_name in ('search_node_types', 'semantic_search_nodes'):
+        m = _RE_NODE_TYPE.search(_result_text(result))
+        if m:
+            category, type_name = m.group(1), m.group(2)
+            doc_args: Dict[str, Any] = {'node_type': type_name}
+            if category != 'sop':
+                doc_args['category'] = category
+            out.append(('get_houdini_node_doc', doc_args))
+    return out
+
+
+class _Pending:
+    __slots__ = ('name', 'args', 'version', 'future', 'exec_s', 'reason')
+
+    def __init__(self, name: str, args: Dict[str, Any], version: int, reason: str):
+        self.name = name
+        self.args = args
+        self.version = version
+        self.future = None
+        self.exec_s = 0.0
+        self.reason = reason
+
+
+class ToolPrefetcher:
+    """单次 Agent 运行内的投机预取（由 Agent 线程驱动，执行在线程池中）
+
+    用法::
+
+        pf = ToolPrefetcher(executor, pool.submit, tool_cache, allowed=tool_names)
+        pf.on_args_streamed(name, accumulated)        # tool_args_delta
+        result = pf.take(name, args)                  # 缓存未命中时；None 表示需正常执行
+        pf.end_round(executed_calls, results)         # 丢弃未使用的结果并预测下一轮
+        stats = pf.close()
+    """
+
+    def __init__(self, executor: Callable[[str, Dict[str, Any]], dict],
+                 submit: Callable[..., Any],
+                 tool_cache: ToolResultCache,
+                 allowed: Optional[set] = None,
+                 max_per_round: int = MAX_PER_ROUND,
+                 wait_timeout: float = WAIT_TIMEOUT):
+        self._executor = executor
+        self._submit = submit
+        self._cache = tool_cache
+        self._allowed = (set(allowed) & CACHEABLE_TOOLS) if allowed is not None else set(CACHEABLE_TOOLS)
+        self.max_per_round = max_per_round
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._pending: Dict[str, _Pending] = {}
+        self._round_submitted = 0
+        self._closed = False
+        self.submitted = 0
+        self.served = 0
+        self.stale = 0           # 结果已过期（依赖路径被修改）或执行失败
+        self.wasted = 0          # 未被请求而丢弃
+        self.saved_s = 0.0       # 被请求时节省的等待时间（执行耗时 − 等待耗时）
+        self.wasted_s = 0.0      # 被丢弃的查询占用的执行时间
+        self.rounds: List[Dict[str, Any]] = []   # 每轮 {'submitted', 'served', 'saved_ms'}
+        self._round = self._new_round()
+
+    # ----------------------------------------------------------
+    # 发起
+    # ----------------------------------------------------------
+
+    def prefetch(self, tool_name: str, args: Dict[str, Any], reason: str = '') -> bool:
+        """发起一次投机查询；不可预取、已在执行或已有缓存时返回 False"""
+        if self._closed or tool_name not in self._allowed or tool_name in TURN_TOOLS:
+            return False
+        if self._round_submitted >= self.max_per_round or not isinstance(args, dict):
+            return False
+        key = prefetch_key(tool_name, args)
+        with self._lock:
+            if key in self._pending:
+                return False
+        if self._cache.peek(tool_name, args) is not None or \
+                self._cache.peek(tool_name, _normalize(tool_name, args)) is not None:
+            return False
+        entry = _Pending(tool_name, dict(args), self._cache.version, reason)
+
+        def _run():
+            t0 = time.perf_counter()
+            try:
+                return self._executor(tool_name, dict(args))
+            finally:
+                entry.exec_s = time.perf_counter() - t0
+
+        try:
+            entry.future = self._submit(_run)
+        except RuntimeError:
+            return False  # 线程池已关闭（面板重载 / 退出）
+        with self._lock:
+            self._pending[key] = entry
+        self._round_submitted += 1
+        self.submitted += 1
+        self._round['submitted'] += 1
+        print(f"[Prefetch] {reason or '预取'}: {tool_name}({json.dumps(args, ensure_ascii=False)[:80]})")
+        return True
+
+    def on_args_streamed(self, tool_name: str, accumulated: str) -> bool:
+        """tool_args_delta 回调：参数 JSON 已完整时提前执行同一调用"""
+        if tool_name not in self._allowed or not accumulated.rstrip().endswith('}'):
+            return False
+        try:
+            args = json.loads(accumulated)
+        except (ValueError, TypeError):
+            return False
+        return self.prefetch(tool_name, args, '参数已完整')
+
+    # ----------------------------------------------------------
+    # 使用
+    # ----------------------------------------------------------
+
+    def take(self, tool_name: str, args: Dict[str, Any]) -> Optional[dict]:
+        """取出与该调用匹配的预取结果（必要时等待执行完成）；None 表示需正常执行"""
+        if tool_name not in self._allowed:
+            return None
+        with self._lock:
+            entry = self._pending.pop(prefetch_key(tool_name, args), None)
+        if entry is None:
+            return None
+        t0 = time.perf_counter()
+        try:
+            result = entry.future.result(timeout=self.wait_timeout)
+        except Exception as e:
+            print(f"[Prefetch] {tool_name} 预取失败，改为正常执行: {e}")
+            entry.future.cancel()
+            self.stale += 1
+            return None
+        waited = time.perf_counter() - t0
+        if not isinstance(result, dict) or not result.get('success') or \
+                self._cache.changed_since(entry.version, entry.name, entry.args):
+            self.stale += 1
+            self.wasted_s += entry.exec_s
+            return None
+        saved = max(0.0, entry.exec_s - waited)
+        self.served += 1
+        self.saved_s += saved
+        self._round['served'] += 1
+        self._round['saved_ms'] += saved * 1000
+        print(f"[Prefetch] ✓ 命中: {tool_name}（执行 {entry.exec_s * 1000:.0f}ms，等待 {waited * 1000:.0f}ms）")
+        return result
+
+    def take_round(self, calls: List[Tuple[str, Dict[str, Any]]],
+                   skip: List[bool]) -> List[Optional[dict]]:
+        """按顺序为本轮调用取预取结果；skip 为已命中缓存的调用
+
+        与 _cache_lookup_round 相同：出现可能修改场景的调用后，其后的场景查询不再使用预取结果。
+        """
+        out: List[Optional[dict]] = [None] * len(calls)
+        mutated = False
+        for i, (tname, targs) in enumerate(calls):
+            if not skip[i] and (not mutated or tname in STATIC_TOOLS):
+                out[i] = self.take(tname, targs)
+            mutated = mutated or affects_scene(tname)
+        return out
+
+    # ----------------------------------------------------------
+    # 收尾
+    # ----------------------------------------------------------
+
+    def _discard(self) -> int:
+        with self._lock:
+            leftovers = list(self._pending.values())
+            self._pending.clear()
+        for entry in leftovers:
+            if entry.future.cancel():
+                continue  # 尚未开始执行，无代价
+            self.wasted += 1
+            if entry.future.done():
+                self.wasted_s += entry.exec_s
+            else:
+                # 仍在执行：完成后计入占用时间
+                entry.future.add_done_callback(lambda _f, e=entry: self._add_wasted(e))
+        return len(leftovers)
+
+    def _add_wasted(self, entry: _Pending):
+        with self._lock:
+            self.wasted_s += entry.exec_s
+
+    def end_round(self, calls: Optional[List[Tuple[str, Dict[str, Any]]]] = None,
+                  results: Optional[List[Optional[dict]]] = None):
+        """一轮工具执行完成：丢弃未被请求的预取，按本轮结果预测下一轮的查询"""
+        self.rounds.append(self._round)
+        self._round = self._new_round()
+        self._discard()
+        self._round_submitted = 0
+        for (tname, targs), result in zip(calls or (), results or ()):
+            for name, args in predict_follow_ups(tname, targs, result):
+                self.prefetch(name, args, f'{tname} 之后')
+
+    @staticmethod
+    def _new_round() -> Dict[str, Any]:
+        return {'submitted': 0, 'served': 0, 'saved_ms': 0.0}
+
+    def close(self) -> Dict[str, Any]:
+        """结束本次运行：丢弃所有未使用的结果，返回统计"""
+        if not self._closed:
+            self._closed = True
+            self._discard()
+            if self.submitted:
+                s = self.stats()
+                print(f"[Prefetch] 本次运行: 发起 {s['submitted']}，命中 {s['served']} "
+                      f"({s['hit_rate'] * 100:.0f}%)，节省 {s['saved_ms']:.0f}ms，"
+                      f"丢弃 {s['wasted'] + s['stale']}（占用 {s['wasted_ms']:.0f}ms）")
+        return self.stats()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'submitted': self.submitted,
+            'served': self.served,
+            'stale': self.stale,
+            'wasted': self.wasted,
+            'hit_rate': self.served / self.submitted if self.submitted else 0.0,
+            'saved_ms': self.saved_s * 1000,
+            'wasted_ms': self.wasted_s * 1000,
+            'rounds': list(self.rounds),
+        }
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+工具调度 — 按依赖图执行一轮中的工具调用
+
+原先 agent_loop_stream / agent_loop_json_mode 只让 web_search / fetch_webpage / execute_shell
+并行（且总是排在本轮所有 Houdini 工具之前），其余调用一律按顺序串行；search_local_doc、
+list_skills、Todo 等不依赖 hou 的调用还会把主线程批次截断成多次调度。这里为每轮调用建依赖图：
+
+    执行位置：WORKER_TOOLS（纯 Python，不依赖 hou）→ 线程池；其余 → 主线程
+    读写集合：场景查询读取参数中的节点 / 网络路径（tool_cache.SCENE_TOOLS），修改类工具写入
+        受影响路径（带下游时扩展到父网络），无法界定范围的写入整个场景；execute_shell 读取、save_hip
+        写入磁盘文件（'@files'，与范围未知的写入同样冲突）；Todo 工具共用一条顺序通道
+    依赖：两次调用的读写集合冲突（写-读 / 读-写 / 写-写，路径相同或互为祖先 / 子孙）时，
+        后者等待前者；只读调用之间没有依赖
+
+执行时（run_round）：依赖已满足的 worker 调用立即提交到线程池；主线程调用凑成一批一次调度
+（批内保持原顺序，批内的依赖自然满足），与线程池中的调用重叠执行。
+"""
+
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from .tool_cache import (STATIC_TOOLS, SCENE_TOOLS, TURN_TOOLS, _CREATE_TOOLS, _MUTATION_PATHS,
+                         _NEUTRAL_TOOLS, _WILDCARD, _covers, _norm_path, _parent, arg_paths)
+
+# 不依赖 hou 的工具：在线程池中执行，不占主线程
+WORKER_TOOLS = frozenset({
+    'web_search', 'fetch_webpage', 'execute_shell',
+    'search_local_doc', 'list_skills',
+    'add_todo', 'update_todo',
+})
+
+# 必须彼此保持顺序的调用通道（Todo 列表的增改）
+_LANES = {
+    'add_todo': 'todo',
+    'update_todo': 'todo',
+}
+
+_SCENE = frozenset((_WILDCARD,))
+_NONE: FrozenSet[str] = frozenset()
+# 磁盘文件：shell 命令可能读取刚保存的 .hip 或 execute_python 写出的文件
+_FILES = frozenset(('@files',))
+
+
+def call_access(tool_name: str, args: Dict[str, Any]) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+    """工具调用 → (读取的场景路径, 写入的场景路径)；'*' 表示整个场景"""
+    args = args or {}
+    if tool_name == 'execute_shell':
+        return _FILES, _NONE
+    if tool_name == 'save_hip':
+        return _SCENE, _FILES
+    if tool_name in WORKER_TOOLS or tool_name in STATIC_TOOLS:
+        return _NONE, _NONE
+    if tool_name in SCENE_TOOLS or tool_name in TURN_TOOLS:
+        paths = frozenset(arg_paths(args, SCENE_TOOLS.get(tool_name, ())))
+        return paths or _SCENE, _NONE
+    if tool_name in _NEUTRAL_TOOLS:
+        # 在主线程上读取场景（保存、性能分析、验证）
+        return _SCENE, _NONE
+    if tool_name in _MUTATION_PATHS:
+        keys, downstream = _MUTATION_PATHS[tool_name]
+        paths = arg_paths(args, keys)
+        if downstream:
+            paths |= {_parent(p) for p in paths}
+        return _NONE, frozenset(paths) or _SCENE
+    if tool_name in _CREATE_TOOLS:
+        parent = args.get(_CREATE_TOOLS[tool_name][0])
+        return _NONE, frozenset((_norm_path(parent),)) if parent else _SCENE
+    # execute_python / run_skill / undo_redo 等：范围未知
+    return _NONE, _SCENE
+
+
+class CallNode:
+    """依赖图中的一次调用"""
+    __slots__ = ('index', 'name', 'args', 'worker', 'reads', 'writes', 'lane', 'deps')
+
+    def __init__(self, index: int, name: str, args: Dict[str, Any]):
+        self.index = index
+        self.name = name
+        self.args = args
+        self.worker = name in WORKER_TOOLS
+        self.reads, self.writes = call_access(name, args)
+        self.lane = _LANES.get(name)
+        self.deps: List[int] = []
+
+    def conflicts(self, other: "CallNode") -> bool:
+        if self.lane is not None and self.lane == other.lane:
+            return True
+        for w in self.writes:
+            if any(_covers(w, p) for p in other.reads) or any(_covers(w, p) for p in other.writes):
+                return True
+        return any(_covers(w, p) for w in other.writes for p in self.reads)
+
+
+def plan_round(calls: List[Tuple[str, Dict[str, Any]]]) -> List[CallNode]:
+    """为一轮调用建依赖图：每个调用依赖它之前所有与之冲突的调用"""
+    nodes = [CallNode(i, name, args) for i, (name, args) in enumerate(calls)]
+    for j, node in enumerate(nodes):
+        node.deps = [i for i in range(j) if nodes[i].conflicts(node)]
+    return nodes
+
+
+def run_round(nodes: List[CallNode],
+              run_worker: Callable[[str, Dict[str, Any]], dict],
+              run_main: Callable[[List[Tuple[str, Dict[str, Any]]]], List[dict]],
+              submit: Callable[..., Any]) -> List[Optional[dict]]:
+    """按依赖图执行一轮调用，返回与 nodes 一一对应的结果
+
+    Args:
+        run_worker: 在线程池中执行单个 worker 调用
+        run_main: 一次主线程调度执行一批调用（按顺序，结果一一对应）
+        submit: 线程池提交函数（ThreadPoolExecutor.submit）
+    """
+    n = len(nodes)
+    results: List[Optional[dict]] = [None] * n
+    if n == 1:
+        node = nodes[0]
+        results[0] = run_worker(node.name, node.args) if node.worker else \
+            run_main([(node.name, node.args)])[0]
+        return results
+    done = [False] * n
+    started = [False] * n
+    running: Dict[Any, int] = {}
+
+    def _collect(futures):
+        for f in futures:
+            idx = running.pop(f)
+            try:
+                results[idx] = f.result()
+            except Exception as e:
+                results[idx] = {"success": False, "error": f"工具执行异常: {e}"}
+            done[idx] = True
+
+    while not all(done):
+        _collect([f for f in running if f.done()])
+        for node in nodes:
+            if not started[node.index] and node.worker and all(done[d] for d in node.deps):
+                started[node.index] = True
+                running[submit(run_worker, node.name, node.args)] = node.index
+        # 主线程批次：依赖已完成或位于同一批次之前的调用
+        batch: List[CallNode] = []
+        in_batch = set()
+        for node in nodes:
+            if not started[node.index] and not node.worker and \
+                    all(done[d] or d in in_batch for d in node.deps):
+                batch.append(node)
+                in_batch.add(node.index)
+        if batch:
+            for node in batch:
+                started[node.index] = True
+            batch_results = run_main([(node.name, node.args) for node in batch])
+            for node, res in zip(batch, batch_results):
+                results[node.index] = res
+                done[node.index] = True
+            continue
+        if running:
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            _collect(finished)
+    return results
+